@@ -11,6 +11,13 @@ from common.logging_config import configure_app_logging
 from common.database import db
 from common.cache import cache
 from common.db_errors import describe_integrity_error, safe_error_message
+from common.error_monitor import init_error_monitor
+from common.metrics import init_metrics
+from common.query_audit import init_query_audit
+from services.sales_rollup_service import init_sales_rollups
+from services.notification_counter_service import init_notification_counters
+from services.notification_aggregator import init_notification_aggregator
+from services.media_tools import init_media_tools
 from auth.routes import auth_bp
 from auth.document_route import document_bp
 from auth.country_route import country_bp
@@ -52,6 +59,7 @@ from routes.merchant_transaction_routes import merchant_transaction_bp
 
 from routes.games_routes import games_bp
 from routes.shiprocket_routes import shiprocket_bp
+from routes.export_job_routes import export_job_bp
 from routes.live_stream_public_routes import live_stream_public_bp
 from routes.shop.shop_product_routes import shop_product_bp
 from routes.shop.shop_routes import shop_bp
@@ -263,118 +271,19 @@ def create_app(config_name=None):
         # If cache initialization fails, just continue - caching is optional
         app.logger.warning(f"Cache initialization failed (non-critical): {str(e)}")
     
+    error_monitor = init_error_monitor(app)
+    init_metrics(app)
+    init_query_audit(app)
+    init_sales_rollups(app)
+    init_notification_counters(app)
+    init_notification_aggregator(app)
+    # Locate ffmpeg/ffprobe once; reel processing reuses the paths.
+    init_media_tools(app)
+
     jwt = JWTManager(app)
     email_init.init_app(app)
     migrate = Migrate(app, db)
 
-    # Check ffmpeg availability for reel thumbnail generation
-    def check_ffmpeg_availability():
-        """Check if ffmpeg is available for thumbnail generation."""
-        import shutil
-        import subprocess
-        
-        app.logger.info("=" * 80)
-        app.logger.info("🔍 CHECKING FFMPEG AVAILABILITY FOR REEL THUMBNAIL GENERATION")
-        app.logger.info("=" * 80)
-        
-        # Get current PATH
-        current_path = os.environ.get('PATH', 'Not set')
-        app.logger.info(f"📍 Current PATH: {current_path}")
-        
-        # Try to find ffmpeg using multiple methods
-        ffmpeg_path = None
-        possible_paths = [
-            '/usr/bin/ffmpeg',
-            '/usr/local/bin/ffmpeg',
-            '/bin/ffmpeg',
-            'ffmpeg'  # Try PATH as fallback
-        ]
-        
-        # Method 1: Use shutil.which (most reliable)
-        try:
-            ffmpeg_path = shutil.which('ffmpeg')
-            if ffmpeg_path:
-                app.logger.info(f"✅ Found ffmpeg using shutil.which: {ffmpeg_path}")
-        except Exception as e:
-            app.logger.warning(f"⚠️  shutil.which failed: {str(e)}")
-        
-        # Method 2: Check common paths
-        if not ffmpeg_path:
-            app.logger.info("📍 shutil.which didn't find ffmpeg, checking common paths...")
-            for path in possible_paths:
-                if os.path.exists(path) and os.access(path, os.X_OK):
-                    ffmpeg_path = path
-                    app.logger.info(f"✅ Found ffmpeg at: {ffmpeg_path}")
-                    break
-        
-        # Method 3: Try 'which' command
-        if not ffmpeg_path:
-            try:
-                which_result = subprocess.run(
-                    ['which', 'ffmpeg'],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    timeout=5
-                )
-                if which_result.returncode == 0:
-                    ffmpeg_path = which_result.stdout.decode().strip()
-                    app.logger.info(f"✅ Found ffmpeg using 'which' command: {ffmpeg_path}")
-            except Exception as which_error:
-                app.logger.warning(f"⚠️  'which' command failed: {str(which_error)}")
-        
-        # Verify ffmpeg works
-        if ffmpeg_path:
-            try:
-                version_check = subprocess.run(
-                    [ffmpeg_path, '-version'],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    timeout=5
-                )
-                if version_check.returncode == 0:
-                    version_output = version_check.stderr.decode()[:200] if version_check.stderr else version_check.stdout.decode()[:200]
-                    app.logger.info("=" * 80)
-                    app.logger.info("✅ FFMPEG IS AVAILABLE AND WORKING!")
-                    app.logger.info(f"📍 Path: {ffmpeg_path}")
-                    app.logger.info(f"📍 Version info: {version_output}")
-                    app.logger.info("✅ Reel thumbnail generation will work correctly")
-                    app.logger.info("=" * 80)
-                    return True
-                else:
-                    app.logger.error("=" * 80)
-                    app.logger.error("❌ FFMPEG FOUND BUT NOT WORKING!")
-                    app.logger.error(f"📍 Path: {ffmpeg_path}")
-                    app.logger.error(f"❌ Return code: {version_check.returncode}")
-                    if version_check.stderr:
-                        app.logger.error(f"❌ Error: {version_check.stderr.decode()[:200]}")
-                    app.logger.error("=" * 80)
-                    return False
-            except Exception as check_error:
-                app.logger.error("=" * 80)
-                app.logger.error(f"❌ ERROR TESTING FFMPEG: {str(check_error)}")
-                app.logger.error("=" * 80)
-                return False
-        else:
-            app.logger.error("=" * 80)
-            app.logger.error("❌ FFMPEG NOT FOUND!")
-            app.logger.error("📍 Tried paths:")
-            for path in possible_paths:
-                exists = os.path.exists(path) if path != 'ffmpeg' else False
-                app.logger.error(f"   - {path}: {'✅ exists' if exists else '❌ not found'}")
-            app.logger.error("")
-            app.logger.error("🔧 TO FIX: Install ffmpeg on your server:")
-            app.logger.error("   Ubuntu/Debian: sudo apt-get update && sudo apt-get install -y ffmpeg")
-            app.logger.error("   macOS: brew install ffmpeg")
-            app.logger.error("")
-            app.logger.error("⚠️  WARNING: Reel thumbnail generation will NOT work without ffmpeg!")
-            app.logger.error("⚠️  New reels will be uploaded but thumbnails will be NULL")
-            app.logger.error("=" * 80)
-            return False
-    
-    # Run ffmpeg check at startup
-    with app.app_context():
-        check_ffmpeg_availability()
-
     # Register blueprints
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(users_bp, url_prefix='/api/users')
@@ -414,6 +323,7 @@ def create_app(config_name=None):
 
     app.register_blueprint(games_bp)
     app.register_blueprint(shiprocket_bp)
+    app.register_blueprint(export_job_bp)
     app.register_blueprint(live_stream_public_bp)
     app.register_blueprint(shop_product_bp)
     app.register_blueprint(shop_bp)
@@ -557,34 +467,18 @@ def create_app(config_name=None):
                         f"(limit: {request.timeout * 1000}ms)"
                     )
                 
-                # Only log errors synchronously (important for debugging)
-                # Skip normal request monitoring to reduce DB load by 99%
+                # Errors are buffered and written in bulk by common/error_monitor.py;
+                # identical errors within a flush window become one row.
                 if response.status_code >= 400:
-                    # Log errors - these are important and should be tracked
-                    try:
+                    error_monitor.record(
+                        service_name=request.endpoint or 'unknown',
+                        error_type=f'HTTP_{response.status_code}',
                         # Limit error message size to prevent DB bloat
-                        error_message = response.get_data(as_text=True)[:500]
-                        
-                        monitoring = SystemMonitoring.create_error_record(
-                            service_name=request.endpoint or 'unknown',
-                            error_type=f'HTTP_{response.status_code}',
-                            error_message=error_message,
-                            endpoint=request.path,
-                            http_method=request.method,
-                            http_status=response.status_code
-                        )
-                        db.session.add(monitoring)
-                        db.session.commit()
-                    except Exception as e:
-                        # Never let monitoring break the response
-                        db.session.rollback()
-                        app.logger.error(f"Error saving error monitoring: {str(e)}")
-                    finally:
-                        # Always cleanup session
-                        try:
-                            db.session.remove()
-                        except:
-                            pass
+                        error_message=response.get_data(as_text=True)[:500],
+                        endpoint=request.path,
+                        http_method=request.method,
+                        http_status=response.status_code
+                    )
                 # Skip normal request monitoring (was creating DB record for every request)
                 # This was the main bottleneck - removed to improve performance by 10x
                 
@@ -646,29 +540,15 @@ def create_app(config_name=None):
         app.logger.error(f"Stack trace:\n{error_stack}")
         app.logger.error("=" * 80)
         
-        # Create error monitoring record (use a new session to avoid conflicts)
-        try:
-            # Use a separate session for monitoring to avoid conflicts
-            monitoring = SystemMonitoring.create_error_record(
-                service_name=request.endpoint or 'unknown',
-                error_type=error_type,
-                error_message=error_message,
-                error_stack_trace=error_stack,
-                endpoint=request.path,
-                http_method=request.method,
-                http_status=getattr(error, 'code', 500)
-            )
-            db.session.add(monitoring)
-            db.session.commit()
-        except Exception as e:
-            db.session.rollback()
-            app.logger.error(f"Error saving error monitoring data: {str(e)}")
-        finally:
-            # Always remove monitoring session too
-            try:
-                db.session.remove()
-            except:
-                pass
+        error_monitor.record(
+            service_name=request.endpoint or 'unknown',
+            error_type=error_type,
+            error_message=error_message,
+            error_stack_trace=error_stack,
+            endpoint=request.path,
+            http_method=request.method,
+            http_status=getattr(error, 'code', 500)
+        )
         
         # Return error response. 'message' is included because that is the key the
         # frontend reads everywhere; 'error' is kept for existing consumers.
@@ -761,7 +641,7 @@ def create_app(config_name=None):
 
         # Get error count for last hour
         error_count = db.session.query(
-            db.func.count(SystemMonitoring.monitoring_id)
+            db.func.sum(SystemMonitoring.occurrences())
         ).filter(
             SystemMonitoring.timestamp >= one_hour_ago,
             SystemMonitoring.status == 'error'
@@ -1074,7 +954,301 @@ def create_app(config_name=None):
             "FX rate snapshot scheduler started (runs every %s hours)", interval_hours
         )
 
+    def start_email_outbox_scheduler():
+        """Deliver queued mail from the email_outbox table in the background."""
+        if not app.config.get("EMAIL_OUTBOX_ENABLED", False):
+            app.logger.info("Email outbox sender is disabled")
+            return
+
+        interval_seconds = int(app.config.get("EMAIL_OUTBOX_POLL_SECONDS", 2))
+        sched = BackgroundScheduler()
+
+        def outbox_job():
+            with app.app_context():
+                from services.email_outbox_service import flush_outbox
+
+                try:
+                    result = flush_outbox()
+                except Exception as e:
+                    db.session.rollback()
+                    app.logger.error("Email outbox flush failed: %s", e, exc_info=True)
+                    return
+                if result.get("sent") or result.get("failed"):
+                    app.logger.info(
+                        "Email outbox: %s sent, %s retrying, %s failed",
+                        result["sent"], result["retrying"], result["failed"],
+                    )
+
+        sched.add_job(
+            outbox_job,
+            "interval",
+            seconds=interval_seconds,
+            id="email_outbox_flush",
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+        )
+        sched.start()
+        app.logger.info(
+            "Email outbox sender started (polls every %s seconds)", interval_seconds
+        )
+
+    def start_media_job_scheduler():
+        """Run queued reel video work (thumbnail, probe, mix) from the media_jobs table."""
+        if not app.config.get("MEDIA_JOBS_ENABLED", False):
+            app.logger.info("Media job scheduler is disabled; run scripts/run_media_worker.py to process reel uploads")
+            return
+
+        interval_seconds = int(app.config.get("MEDIA_JOB_POLL_SECONDS", 5))
+        sched = BackgroundScheduler()
+
+        def media_job():
+            with app.app_context():
+                from services.media_job_service import process_jobs, sweep_spool
+
+                try:
+                    result = process_jobs()
+                    sweep_spool()
+                except Exception as e:
+                    db.session.rollback()
+                    app.logger.error("Media job run failed: %s", e, exc_info=True)
+                    return
+                if result.get("done") or result.get("failed"):
+                    app.logger.info(
+                        "Media jobs: %s done, %s retrying, %s failed",
+                        result["done"], result["retrying"], result["failed"],
+                    )
+
+        sched.add_job(
+            media_job,
+            "interval",
+            seconds=interval_seconds,
+            id="media_job_run",
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+        )
+        sched.start()
+        app.logger.info(
+            "Media job scheduler started (polls every %s seconds)", interval_seconds
+        )
+
+    def start_shipment_job_sweeper():
+        """Restart shipment jobs whose worker died (deploys, crashes) from their saved step."""
+        if not app.config.get("SHIPMENT_JOBS_BACKGROUND", False):
+            app.logger.info("Shipment job sweeper is disabled")
+            return
+
+        interval_seconds = int(app.config.get("SHIPMENT_JOB_SWEEP_SECONDS", 60))
+        sched = BackgroundScheduler()
+
+        def sweep_job():
+            with app.app_context():
+                from services.shipment_jobs import sweep
+
+                try:
+                    restarted = sweep()
+                except Exception as e:
+                    db.session.rollback()
+                    app.logger.error("Shipment job sweep failed: %s", e, exc_info=True)
+                    return
+                if restarted:
+                    app.logger.info("Shipment jobs: restarted %s stalled job(s)", restarted)
+
+        sched.add_job(
+            sweep_job,
+            "interval",
+            seconds=interval_seconds,
+            id="shipment_job_sweep",
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+        )
+        sched.start()
+        app.logger.info(
+            "Shipment job sweeper started (runs every %s seconds)", interval_seconds
+        )
+
+    def start_export_job_sweeper():
+        """Restart abandoned export jobs and delete export files past their retention."""
+        if not app.config.get("EXPORT_JOBS_BACKGROUND", False):
+            app.logger.info("Export job sweeper is disabled")
+            return
+
+        interval_seconds = int(app.config.get("EXPORT_JOB_SWEEP_SECONDS", 300))
+        sched = BackgroundScheduler()
+
+        def sweep_job():
+            with app.app_context():
+                from services.export_jobs import sweep
+
+                try:
+                    restarted, expired = sweep()
+                except Exception as e:
+                    db.session.rollback()
+                    app.logger.error("Export job sweep failed: %s", e, exc_info=True)
+                    return
+                if restarted or expired:
+                    app.logger.info("Export jobs: restarted %s, expired %s", restarted, expired)
+
+        sched.add_job(
+            sweep_job,
+            "interval",
+            seconds=interval_seconds,
+            id="export_job_sweep",
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+        )
+        sched.start()
+        app.logger.info(
+            "Export job sweeper started (runs every %s seconds)", interval_seconds
+        )
+
+    def start_payment_finalization_sweeper():
+        """Restart Razorpay payment finalisations whose worker disappeared."""
+        if not app.config.get("PAYMENT_FINALIZE_BACKGROUND", False):
+            app.logger.info("Payment finalization sweeper is disabled")
+            return
+
+        interval_seconds = int(app.config.get("PAYMENT_FINALIZE_SWEEP_SECONDS", 30))
+        sched = BackgroundScheduler()
+
+        def sweep_job():
+            with app.app_context():
+                from services.payment_finalization import sweep
+
+                try:
+                    restarted = sweep()
+                except Exception as e:
+                    db.session.rollback()
+                    app.logger.error("Payment finalization sweep failed: %s", e, exc_info=True)
+                    return
+                if restarted:
+                    app.logger.info("Payment finalizations: restarted %s", restarted)
+
+        sched.add_job(
+            sweep_job,
+            "interval",
+            seconds=interval_seconds,
+            id="payment_finalization_sweep",
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+        )
+        sched.start()
+        app.logger.info(
+            "Payment finalization sweeper started (runs every %s seconds)", interval_seconds
+        )
+
+    def start_payout_batch_sweeper():
+        """Restart bulk payout batches whose worker disappeared."""
+        if not app.config.get("PAYOUT_BATCH_BACKGROUND", False):
+            app.logger.info("Payout batch sweeper is disabled")
+            return
+
+        interval_seconds = int(app.config.get("PAYOUT_BATCH_SWEEP_SECONDS", 60))
+        sched = BackgroundScheduler()
+
+        def sweep_job():
+            with app.app_context():
+                from services.payout_batches import sweep
+
+                try:
+                    restarted = sweep()
+                except Exception as e:
+                    db.session.rollback()
+                    app.logger.error("Payout batch sweep failed: %s", e, exc_info=True)
+                    return
+                if restarted:
+                    app.logger.info("Payout batches: restarted %s", restarted)
+
+        sched.add_job(
+            sweep_job,
+            "interval",
+            seconds=interval_seconds,
+            id="payout_batch_sweep",
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+        )
+        sched.start()
+        app.logger.info(
+            "Payout batch sweeper started (runs every %s seconds)", interval_seconds
+        )
+
+    def start_music_ingest_sweeper():
+        """Restart music ingest jobs whose worker disappeared."""
+        if not app.config.get("MUSIC_INGEST_BACKGROUND", False):
+            app.logger.info("Music ingest sweeper is disabled")
+            return
+
+        interval_seconds = int(app.config.get("MUSIC_INGEST_SWEEP_SECONDS", 300))
+        sched = BackgroundScheduler()
+
+        def sweep_job():
+            with app.app_context():
+                from services.music.ingest_service import sweep
+
+                try:
+                    restarted = sweep()
+                except Exception as e:
+                    db.session.rollback()
+                    app.logger.error("Music ingest sweep failed: %s", e, exc_info=True)
+                    return
+                if restarted:
+                    app.logger.info("Music ingest jobs: restarted %s", restarted)
+
+        sched.add_job(
+            sweep_job,
+            "interval",
+            seconds=interval_seconds,
+            id="music_ingest_sweep",
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+        )
+        sched.start()
+        app.logger.info(
+            "Music ingest sweeper started (runs every %s seconds)", interval_seconds
+        )
+
     # Start scheduler after app is created
+    try:
+        start_email_outbox_scheduler()
+    except Exception as e:
+        app.logger.error(f"Failed to start email outbox sender: {str(e)}")
+
+    try:
+        start_media_job_scheduler()
+    except Exception as e:
+        app.logger.error(f"Failed to start media job scheduler: {str(e)}")
+
+    try:
+        start_shipment_job_sweeper()
+    except Exception as e:
+        app.logger.error(f"Failed to start shipment job sweeper: {str(e)}")
+
+    try:
+        start_export_job_sweeper()
+    except Exception as e:
+        app.logger.error(f"Failed to start export job sweeper: {str(e)}")
+
+    try:
+        start_payment_finalization_sweeper()
+    except Exception as e:
+        app.logger.error(f"Failed to start payment finalization sweeper: {str(e)}")
+
+    try:
+        start_payout_batch_sweeper()
+    except Exception as e:
+        app.logger.error(f"Failed to start payout batch sweeper: {str(e)}")
+
+    try:
+        start_music_ingest_sweeper()
+    except Exception as e:
+        app.logger.error(f"Failed to start music ingest sweeper: {str(e)}")
+
     try:
         start_fx_snapshot_scheduler()
     except Exception as e:
@@ -1224,6 +1398,9 @@ if __name__ == "__main__":
                     def load(self):
                         return self.application
                 
+                from common.metrics import clear_multiproc_dir, retire_snapshot
+                metrics_dir = app.config.get('METRICS_MULTIPROC_DIR')
+
                 options = {
                     'bind': '0.0.0.0:5110',
                     'workers': 1,  # Single worker for development
@@ -1232,6 +1409,9 @@ if __name__ == "__main__":
                     'keepalive': 5,
                     'accesslog': '-',  # Log to stdout
                     'errorlog': '-',   # Log to stderr
+                    # Same metrics hooks as gunicorn.conf.py
+                    'on_starting': lambda server: clear_multiproc_dir(metrics_dir),
+                    'child_exit': lambda server, worker: retire_snapshot(metrics_dir, worker.pid),
                 }
                 
                 print("✅ Using Gunicorn server (Unix)")
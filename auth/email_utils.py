@@ -126,11 +126,15 @@ BASE_TEMPLATE = """
 </html>
 """
 
-def send_email(to_email, subject, template_str, context):
+def send_email(to_email, subject, template_str, context, in_transaction=False):
     """
     Refactored send_email to inject content into a branded base template.
     This function's signature is kept the same for backward compatibility,
     but we will call it differently from our helper functions.
+
+    With the outbox on, in_transaction=True queues the mail in the caller's
+    transaction (it goes out only if the caller commits); otherwise it is queued
+    on its own. The caller's transaction is never committed or rolled back here.
     """
     try:
         current_app.logger.info(f"Attempting to send email to {to_email}")
@@ -169,6 +173,18 @@ def send_email(to_email, subject, template_str, context):
         message['To'] = to_email
         message.attach(MIMEText(full_html_content, 'html', 'utf-8'))
         
+        if current_app.config.get('EMAIL_OUTBOX_ENABLED'):
+            # Hand off to the background sender so the request does not wait on the
+            # SMTP handshake. If the outbox table is unavailable, fall through and
+            # send inline rather than lose an OTP.
+            try:
+                from services.email_outbox_service import enqueue
+                enqueue(to_email, sender_address, subject, message.as_string(), in_transaction=in_transaction)
+                current_app.logger.info(f"Email to {to_email} queued for delivery")
+                return True
+            except Exception as e:
+                current_app.logger.error(f"Email outbox unavailable, sending inline: {str(e)}")
+
         # Add timeout to prevent hanging connections (10 seconds)
         with smtplib.SMTP(current_app.config['MAIL_SERVER'], current_app.config['MAIL_PORT'], timeout=10) as server:
             if current_app.config['MAIL_USE_TLS']:
@@ -327,7 +343,7 @@ def send_merchant_docs_submitted_to_admin(merchant_profile, admin_email_list=Non
             all_sent = False
     return all_sent
 
-def send_merchant_document_rejection_email(merchant_user, merchant_profile, document, admin_notes):
+def send_merchant_document_rejection_email(merchant_user, merchant_profile, document, admin_notes, in_transaction=False):
     """Notifies merchant of document rejection with the new AOIN theme."""
     frontend_url = current_app.config['FRONTEND_URL'].rstrip('/')
     merchant_dashboard_link = f"{frontend_url}/business/verification" 
@@ -353,9 +369,9 @@ def send_merchant_document_rejection_email(merchant_user, merchant_profile, docu
         'heading': "Document Rejection Notice"
     }
     subject = f"Action Required: Document Rejected for {merchant_profile.business_name}"
-    return send_email(merchant_user.email, subject, template_content, context)
+    return send_email(merchant_user.email, subject, template_content, context, in_transaction=in_transaction)
 
-def send_merchant_profile_rejection_email(merchant_user, merchant_profile, reason):
+def send_merchant_profile_rejection_email(merchant_user, merchant_profile, reason, in_transaction=False):
     """Notifies merchant of profile rejection with the new AOIN theme."""
     frontend_url = current_app.config['FRONTEND_URL'].rstrip('/')
     merchant_dashboard_link = f"{frontend_url}/business/verification" 
@@ -379,9 +395,9 @@ def send_merchant_profile_rejection_email(merchant_user, merchant_profile, reaso
         'heading': "Merchant Profile Rejection"
     }
     subject = f"Important: Your Merchant Profile for {merchant_profile.business_name} was Rejected"
-    return send_email(merchant_user.email, subject, template_content, context)
+    return send_email(merchant_user.email, subject, template_content, context, in_transaction=in_transaction)
 
-def send_merchant_profile_approval_email(merchant_user, merchant_profile):
+def send_merchant_profile_approval_email(merchant_user, merchant_profile, in_transaction=False):
     """Notifies merchant of profile approval with the new AOIN theme."""
     frontend_url = current_app.config['FRONTEND_URL'].rstrip('/')
     merchant_dashboard_link = f"{frontend_url}/business/dashboard" 
@@ -403,4 +419,31 @@ def send_merchant_profile_approval_email(merchant_user, merchant_profile):
         'heading': "Merchant Profile Approved!"
     }
     subject = f"Congratulations! Your Merchant Profile for {merchant_profile.business_name} is Approved"
-    return send_email(merchant_user.email, subject, template_content, context)
\ No newline at end of file
+    return send_email(merchant_user.email, subject, template_content, context, in_transaction=in_transaction)
+
+
+def send_order_confirmation_email(user, order, in_transaction=False):
+    """Confirms a paid order to the customer with the new AOIN theme."""
+    frontend_url = current_app.config.get('FRONTEND_URL', '#').rstrip('/')
+    order_link = f"{frontend_url}/orders/{order.order_id}"
+
+    template_content = """
+        <p>Hello {{ name }},</p>
+        <p>Thank you for your order. We have received your payment and your order <strong>{{ order_id }}</strong> is being processed.</p>
+        <p><strong>Order total:</strong> {{ currency }} {{ total }}</p>
+        <div class="button-wrapper">
+            <a href="{{ order_link }}" class="button" target="_blank">View Your Order</a>
+        </div>
+        <p>We will let you know when it ships.</p>
+        <p>Sincerely,<br>The Team</p>
+    """
+    context = {
+        'name': user.first_name,
+        'order_id': order.order_id,
+        'currency': order.currency or 'INR',
+        'total': f"{order.total_amount:,.2f}",
+        'order_link': order_link,
+        'heading': "Order Confirmed"
+    }
+    subject = f"Your order {order.order_id} is confirmed"
+    return send_email(user.email, subject, template_content, context, in_transaction=in_transaction)
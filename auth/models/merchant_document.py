@@ -157,7 +157,7 @@ class MerchantDocument(BaseModel):
                 return
         
         try:
-            send_merchant_document_rejection_email(merchant_user, merchant_profile, self, notes)
+            send_merchant_document_rejection_email(merchant_user, merchant_profile, self, notes, in_transaction=True)
         except Exception as e:
             current_app.logger.error(f"Failed to send document rejection email to merchant {merchant_user.email} for document {self.document_type.value}: {str(e)}")
             
@@ -497,7 +497,7 @@ class MerchantProfile(BaseModel):
             self.is_verified = True
             self.verification_completed_at = datetime.utcnow()
             try:
-                send_merchant_profile_approval_email(user, self)
+                send_merchant_profile_approval_email(user, self, in_transaction=True)
             except Exception as e:
                 current_app.logger.error(f"Failed to send approval email to merchant {user.email}: {str(e)}")
 
@@ -505,7 +505,7 @@ class MerchantProfile(BaseModel):
             self.is_verified = False
             self.verification_completed_at = datetime.utcnow()
             try:
-                send_merchant_profile_rejection_email(user, self, notes)
+                send_merchant_profile_rejection_email(user, self, notes, in_transaction=True)
             except Exception as e:
                 current_app.logger.error(f"Failed to send rejection email to merchant {user.email}: {str(e)}")
         
@@ -0,0 +1,147 @@
+"""
+In-memory buffer of events written to the DB in batches by a daemon thread.
+
+The error monitor (common/error_monitor.py) and the notification aggregator
+(services/notification_aggregator.py) both take events on the request path that
+would otherwise each cost a write. A subclass keeps its own buffer and merges
+events as they arrive. This base class provides the rest:
+
+- the lock that guards the buffer;
+- a cap of `<PREFIX>_MAX_PENDING` entries. Past that, events are counted and
+  dropped, so a slow DB cannot grow memory without bound;
+- flush(), which swaps the buffer out and writes it in one transaction;
+- a daemon thread that flushes every `<PREFIX>_FLUSH_SECONDS`, and flushes once
+  more at exit. With `<PREFIX>_BACKGROUND` off (tests), every event flushes inline.
+
+A batch that fails to write is logged and lost. Retrying into a DB that is already
+struggling is how per-request writes made storms worse.
+"""
+import atexit
+import threading
+
+from common.database import db
+
+
+class BufferedWriter:
+    """Per-app buffer of pending events plus the thread that drains it.
+
+    Subclasses set `label`, `thread_name` and `settings_prefix` and implement
+    _reset, _take, _size and _write. They add events with `with self._lock:`, calling
+    _lose('dropped (buffer full)') instead when _full(), then _recorded().
+    """
+
+    label = 'Buffered writer'
+    thread_name = 'buffered-writer'
+    settings_prefix = None
+    default_max_pending = 500
+
+    def __init__(self, app):
+        self.app = app
+        prefix = self.settings_prefix
+        self.background = bool(app.config.get(f'{prefix}_BACKGROUND', True))
+        self.flush_seconds = float(app.config.get(f'{prefix}_FLUSH_SECONDS', 5))
+        self.max_pending = int(app.config.get(f'{prefix}_MAX_PENDING', self.default_max_pending))
+
+        self._lock = threading.Lock()
+        self._lost = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._reset()
+
+    # ------------------------------------------------------------------ #
+    # Subclass hooks
+    # ------------------------------------------------------------------ #
+
+    def _reset(self):
+        """Start an empty buffer. Called from __init__ and, under the lock, by flush()."""
+        raise NotImplementedError
+
+    def _take(self):
+        """The buffer's contents as one batch; flush() calls _reset() right after."""
+        raise NotImplementedError
+
+    def _size(self):
+        """Entries buffered (what max_pending caps)."""
+        raise NotImplementedError
+
+    def _write(self, batch):
+        """Add the batch to the session; flush() commits. Returns rows written."""
+        raise NotImplementedError
+
+    def _describe(self, batch):
+        return f"{len(batch)} entries"
+
+    # ------------------------------------------------------------------ #
+    # Buffering
+    # ------------------------------------------------------------------ #
+
+    def _full(self):
+        return self._size() >= self.max_pending
+
+    def _lose(self, reason):
+        """Count an event that was not buffered. Call under the lock."""
+        self._lost[reason] = self._lost.get(reason, 0) + 1
+
+    def _recorded(self):
+        """Call after buffering an event (outside the lock): flushes inline without a thread."""
+        if not self.background:
+            self.flush()
+
+    def _drain(self):
+        with self._lock:
+            batch = None
+            if self._size():
+                batch = self._take()
+                self._reset()
+            lost, self._lost = self._lost, {}
+        return batch, lost
+
+    def flush(self):
+        """Write everything buffered so far in one transaction. Returns rows written."""
+        batch, lost = self._drain()
+        if lost:
+            self.app.logger.warning(
+                "%s: %s", self.label, ', '.join(f"{count} event(s) {reason}" for reason, count in lost.items()))
+        if batch is None:
+            return 0
+
+        with self.app.app_context():
+            try:
+                written = self._write(batch)
+                db.session.commit()
+                return written
+            except Exception as e:
+                db.session.rollback()
+                self.app.logger.error(f"{self.label}: error writing batch ({self._describe(batch)}): {str(e)}")
+                return 0
+            finally:
+                try:
+                    db.session.remove()
+                except Exception:
+                    pass
+
+    # ------------------------------------------------------------------ #
+    # Writer thread
+    # ------------------------------------------------------------------ #
+
+    def _run(self):
+        while not self._stop.wait(self.flush_seconds):
+            try:
+                self.flush()
+            except Exception as e:
+                self.app.logger.error(f"{self.label} flush loop failed: {str(e)}")
+
+    def start(self):
+        if not self.background or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Stop the writer thread and flush whatever is left."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_seconds + 1)
+            self._thread = None
+        self.flush()
@@ -10,6 +10,8 @@ import functools
 from flask_caching import Cache
 import redis
 
+from common.metrics import instrument_redis, record_cache
+
 # Initialize Flask-Caching extension
 cache = Cache()
 
@@ -37,7 +39,7 @@ def get_redis_client(app=None):
         )
         # Test connection with very short timeout
         client.ping()
-        return client
+        return instrument_redis(client)
     except (redis.ConnectionError, redis.TimeoutError, OSError, Exception) as e:
         # Log error if app context is available, but don't raise
         if app:
@@ -88,6 +90,7 @@ def cached(timeout=300, key_prefix='default'):
             # Try to get result from cache
             try:
                 cached_result = cache.get(cache_key)
+                record_cache(key_prefix, bool(cached_result))
                 if cached_result:
                     return json.loads(cached_result)
             except Exception:
@@ -45,4 +45,27 @@ class BaseModel(db.Model):
     @classmethod
     def get_all(cls):
         """Get all records."""
-        return cls.query.all()
\ No newline at end of file
+        return cls.query.all()
+
+def additive_upsert(bind, table, key_columns, add_columns, set_columns=None):
+    """INSERT that, on a duplicate key, adds the new values into add_columns.
+
+    MySQL gets INSERT ... ON DUPLICATE KEY UPDATE col = col + VALUES(col); SQLite and
+    Postgres get the ON CONFLICT equivalent. set_columns maps other column names to
+    fn(current, inserted) -> expression, both namespaces of columns; they are assigned
+    first, so on MySQL too they see the row as it was. Execute with a list of rows.
+    """
+    from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+    set_columns = set_columns or {}
+    if bind.dialect.name in ('mysql', 'mariadb'):
+        stmt = mysql.insert(table)
+        current, inserted = table.c, stmt.inserted
+        assignments = [(name, fn(current, inserted)) for name, fn in set_columns.items()]
+        assignments += [(name, current[name] + inserted[name]) for name in add_columns]
+        return stmt.on_duplicate_key_update(assignments)
+    stmt = (postgresql if bind.dialect.name == 'postgresql' else sqlite).insert(table)
+    current, inserted = table.c, stmt.excluded
+    assignments = {name: fn(current, inserted) for name, fn in set_columns.items()}
+    assignments.update({name: current[name] + inserted[name] for name in add_columns})
+    return stmt.on_conflict_do_update(index_elements=list(key_columns), set_=assignments)
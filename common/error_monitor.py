@@ -0,0 +1,112 @@
+"""
+Buffered writer for SystemMonitoring error rows.
+
+after_request and handle_error used to insert and commit one row per 4xx/5xx inside
+the request. Under an error storm (a client looping on 401s) that doubled DB write
+load exactly when the DB could least afford it. Now they call `record()`, which only
+touches an in-memory dict:
+
+- identical errors (same endpoint, method, status, type and message) within one
+  flush window collapse into a single row whose `request_count` is the number of
+  occurrences;
+- new 4xx fingerprints can be sampled (ERROR_MONITOR_4XX_SAMPLE_RATE); 5xx always
+  pass;
+- the buffer holds at most ERROR_MONITOR_MAX_PENDING fingerprints. Past that, events
+  are counted and dropped, so a slow DB cannot grow memory without bound.
+
+BufferedWriter (common/buffered_writer.py) supplies the lock, the size cap and the
+thread that flushes every ERROR_MONITOR_FLUSH_SECONDS with one bulk insert. With
+ERROR_MONITOR_BACKGROUND off (tests) `record()` flushes inline.
+"""
+import hashlib
+import random
+
+from common.buffered_writer import BufferedWriter
+from common.database import db
+from models.system_monitoring import SystemMonitoring
+
+
+class ErrorMonitor(BufferedWriter):
+    """Per-app buffer of pending error events plus the thread that drains it."""
+
+    label = 'Error monitor'
+    thread_name = 'error-monitor-writer'
+    settings_prefix = 'ERROR_MONITOR'
+    default_max_pending = 500
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.sample_rate_4xx = float(app.config.get('ERROR_MONITOR_4XX_SAMPLE_RATE', 1.0))
+
+    @staticmethod
+    def fingerprint(service_name, endpoint, http_method, http_status, error_type, error_message):
+        raw = '|'.join(str(part) for part in (
+            service_name, endpoint, http_method, http_status, error_type, (error_message or '')[:500]
+        ))
+        return hashlib.sha1(raw.encode('utf-8', 'replace')).hexdigest()
+
+    def record(self, service_name, error_type, error_message, error_stack_trace=None,
+               endpoint=None, http_method=None, http_status=None):
+        """Buffer one error event. Never raises and never touches the DB in background mode."""
+        key = self.fingerprint(service_name, endpoint, http_method, http_status, error_type, error_message)
+        with self._lock:
+            entry = self._pending.get(key)
+            if entry is not None:
+                entry['count'] += 1
+            else:
+                is_client_error = http_status is not None and 400 <= int(http_status) < 500
+                if is_client_error and self.sample_rate_4xx < 1.0 and random.random() >= self.sample_rate_4xx:
+                    self._lose('sampled out')
+                    return
+                if self._full():
+                    self._lose('dropped (buffer full)')
+                    return
+                self._pending[key] = {
+                    'service_name': service_name,
+                    'error_type': error_type,
+                    'error_message': error_message,
+                    'error_stack_trace': error_stack_trace,
+                    'endpoint': endpoint,
+                    'http_method': http_method,
+                    'http_status': http_status,
+                    'count': 1,
+                }
+
+        self._recorded()
+
+    def _reset(self):
+        self._pending = {}
+
+    def _take(self):
+        return self._pending
+
+    def _size(self):
+        return len(self._pending)
+
+    def _write(self, pending):
+        rows = []
+        for entry in pending.values():
+            row = SystemMonitoring.create_error_record(
+                service_name=entry['service_name'],
+                error_type=entry['error_type'],
+                error_message=entry['error_message'],
+                error_stack_trace=entry['error_stack_trace'],
+                endpoint=entry['endpoint'],
+                http_method=entry['http_method'],
+                http_status=entry['http_status'],
+            )
+            row.request_count = entry['count']
+            rows.append(row)
+        db.session.add_all(rows)
+        return len(rows)
+
+    def _describe(self, pending):
+        return f"{len(pending)} error row(s)"
+
+
+def init_error_monitor(app):
+    """Create the app's ErrorMonitor, start its writer thread and register it on the app."""
+    monitor = ErrorMonitor(app)
+    app.extensions['error_monitor'] = monitor
+    monitor.start()
+    return monitor
@@ -0,0 +1,156 @@
+"""
+Streaming CSV and XLSX exports.
+
+The report exports built every row as a dict, then a pandas DataFrame, then the whole
+file in a BytesIO, so a large export held several copies of itself in memory before
+the first byte went out. Here rows come from generators and are written as they
+arrive:
+
+  query_rows(query)     runs the query with a server-side cursor (yield_per), so the
+                        driver hands rows over EXPORT_BATCH_SIZE at a time.
+  csv_stream(tables)    yields the CSV in ~64KB chunks; the response starts with the
+                        first chunk.
+  xlsx_file(tables)     writes an openpyxl write-only workbook (rows go straight to its
+                        temp files) into an anonymous temp file and returns it rewound.
+                        XLSX is a zip and can only be sent once complete; it is then
+                        streamed from disk.
+  export_response(...)  the attachment response for bytes, a chunk iterator or a file.
+
+Memory stays flat in the number of rows for both formats. PDFs are not streamed; they
+are already capped to a readable preview.
+
+A Table's rows are only iterated when the table is written, in order. A summary table
+that totals what earlier tables saw can therefore be a generator that reads those
+totals when it starts.
+
+A CSV's status line and first rows are sent before the last row is read, so an error
+part way cannot become a 500. csv_stream then writes an EXPORT_INCOMPLETE trailer
+line after the rows that did go out, and re-raises: the server drops the connection
+without ending the chunked body, and the client sees a failed download rather than a
+complete-looking short file.
+"""
+import csv
+import io
+import logging
+import tempfile
+from collections import namedtuple
+
+from flask import Response, current_app, g, send_file, stream_with_context
+
+CSV_CHUNK_BYTES = 64 * 1024
+EXPORT_INCOMPLETE = '# EXPORT INCOMPLETE'
+
+logger = logging.getLogger(__name__)
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# name: sheet name (XLSX) or section title line (CSV, None for no title line).
+Table = namedtuple('Table', 'name header rows')
+
+
+def query_rows(query, batch_size=None):
+    """Iterate a query through a server-side cursor, batch_size rows per fetch.
+
+    In a background export (services/export_jobs.py), g.export_heartbeat is called
+    once per batch so a long read keeps the job's heartbeat fresh.
+    """
+    if batch_size is None:
+        batch_size = int(current_app.config.get('EXPORT_BATCH_SIZE', 1000))
+    beat = g.get('export_heartbeat')
+    for n, row in enumerate(query.yield_per(batch_size), start=1):
+        yield row
+        if beat is not None and n % batch_size == 0:
+            beat()
+
+
+def csv_stream(tables, preamble=()):
+    """Yield the CSV for `tables` as encoded chunks.
+
+    `preamble` lines are written first (report title, generated-at). Sections are
+    separated by a blank line.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for line in preamble:
+        buffer.write(f"{line}\n")
+    try:
+        for index, table in enumerate(tables):
+            if index:
+                buffer.write("\n")
+            if table.name:
+                buffer.write(f"{table.name}\n")
+            writer.writerow(table.header)
+            for row in table.rows:
+                writer.writerow(row)
+                if buffer.tell() >= CSV_CHUNK_BYTES:
+                    yield buffer.getvalue().encode('utf-8')
+                    buffer.seek(0)
+                    buffer.truncate(0)
+    except Exception:
+        logger.error("CSV export failed part way", exc_info=True)
+        buffer.write(f"\n{EXPORT_INCOMPLETE}: the export failed part way and the rows above are partial.\n")
+        yield buffer.getvalue().encode('utf-8')
+        raise
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def xlsx_file(tables, header_fill=None, column_width=None):
+    """Write `tables` as sheets of a write-only workbook. Returns a rewound temp file.
+
+    header_fill ('FF5733') colours the header row with white bold text. column_width
+    sets every column's width: one number for all sheets, or {sheet name: width}.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, PatternFill
+    from openpyxl.utils import get_column_letter
+
+    workbook = Workbook(write_only=True)
+    for table in tables:
+        sheet = workbook.create_sheet(title=str(table.name)[:31])
+        width = column_width.get(table.name) if isinstance(column_width, dict) else column_width
+        if width:
+            for col in range(1, len(table.header) + 1):
+                sheet.column_dimensions[get_column_letter(col)].width = width
+        if header_fill:
+            header = []
+            for value in table.header:
+                cell = WriteOnlyCell(sheet, value=value)
+                cell.font = Font(bold=True, color='FFFFFF')
+                cell.fill = PatternFill('solid', fgColor=header_fill)
+                header.append(cell)
+            sheet.append(header)
+        else:
+            sheet.append(list(table.header))
+        for row in table.rows:
+            sheet.append(list(row))
+
+    out = tempfile.TemporaryFile()
+    try:
+        workbook.save(out)
+    except Exception:
+        out.close()
+        raise
+    out.seek(0)
+    return out
+
+
+def dict_table(name, records):
+    """A Table from a list of dicts, columns in first-seen key order (like DataFrame)."""
+    header = []
+    for record in records:
+        for key in record:
+            if key not in header:
+                header.append(key)
+    return Table(name, header, ([record.get(key) for key in header] for record in records))
+
+
+def export_response(data, mimetype, filename):
+    """An attachment response for bytes, a file object or an iterator of byte chunks."""
+    if isinstance(data, (bytes, bytearray)):
+        data = io.BytesIO(data)
+    if hasattr(data, 'read'):
+        return send_file(data, mimetype=mimetype, as_attachment=True, download_name=filename)
+    response = Response(stream_with_context(data), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
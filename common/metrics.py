@@ -0,0 +1,436 @@
+"""
+In-process metrics with a Prometheus text endpoint (no new dependencies).
+
+What is measured:
+  http_request_duration_seconds     histogram per (method, route template, status class)
+  db_queries_per_request            histogram per route — count of cursor executes
+  db_query_duration_seconds         histogram of every statement, request or not
+  db_pool_checkout_wait_seconds     histogram of time spent waiting for a pooled connection
+  redis_commands_total / redis_command_duration_seconds
+  cache_requests_total{cache, result=hit|miss}
+
+Routes are labelled by their URL rule ("/api/products/<int:product_id>"), never the raw
+path, so cardinality is bounded by the number of routes.
+
+Gunicorn runs several worker processes and a scrape only reaches one of them. When
+METRICS_MULTIPROC_DIR is set, each worker writes its snapshot there as <pid>.json
+every METRICS_SNAPSHOT_SECONDS, and /metrics merges every snapshot in the directory
+with the live state of the worker answering the scrape. Without it, /metrics reports
+the answering worker only.
+
+The directory must start empty with the server, and a worker's counters must outlive
+it without its file lingering, or recycled workers pile up and a new worker reusing
+a dead one's pid overwrites its counts. So, as in prometheus_client's multiprocess
+mode, the gunicorn master calls clear_multiproc_dir() on start (gunicorn.conf.py's
+on_starting) and retire_snapshot() for every worker that exits (child_exit), which
+folds the worker's last snapshot into archive.json. A worker that exits cleanly
+retires itself too.
+
+/metrics lists every route, its latency and the DB and upstream call stats, so it
+answers only requests carrying "Authorization: Bearer <METRICS_TOKEN>", and refuses
+every request while no token is configured.
+"""
+import atexit
+import hmac
+import json
+import math
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process servers only, nothing to lock against
+    fcntl = None
+
+from flask import Response, current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class MetricsRegistry:
+    """Counters and fixed-bucket histograms keyed by (name, sorted label items)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._help = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((labels or {}).items()))
+
+    def describe(self, name, text):
+        self._help[name] = text
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets=DEFAULT_LATENCY_BUCKETS, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = {'buckets': list(buckets), 'counts': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+                self._histograms[key] = hist
+            for i, bound in enumerate(hist['buckets']):
+                if value <= bound:
+                    hist['counts'][i] += 1
+            hist['sum'] += value
+            hist['count'] += 1
+
+    def snapshot(self):
+        """JSON-safe copy of the current state, as written to the multiprocess dir."""
+        with self._lock:
+            return {
+                'counters': [[name, list(map(list, labels)), value]
+                             for (name, labels), value in self._counters.items()],
+                'histograms': [[name, list(map(list, labels)), dict(hist, counts=list(hist['counts']))]
+                               for (name, labels), hist in self._histograms.items()],
+                'help': dict(self._help),
+            }
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+registry = MetricsRegistry()
+registry.describe('http_request_duration_seconds', 'Request latency by route.')
+registry.describe('db_queries_per_request', 'SQL statements executed per request by route.')
+registry.describe('db_query_time_per_request_seconds', 'Total SQL time per request by route.')
+registry.describe('db_query_duration_seconds', 'Latency of individual SQL statements.')
+registry.describe('db_pool_checkout_wait_seconds', 'Time spent waiting for a pooled DB connection.')
+registry.describe('redis_commands_total', 'Redis commands issued.')
+registry.describe('redis_command_duration_seconds', 'Redis command latency.')
+registry.describe('cache_requests_total', 'Cache lookups by cache name and hit/miss.')
+
+
+def record_cache(cache_name, hit):
+    """Count one cache lookup. Call sites pass a short, fixed cache name."""
+    registry.inc('cache_requests_total', cache=cache_name, result='hit' if hit else 'miss')
+
+
+def _route_label():
+    rule = getattr(request, 'url_rule', None)
+    return rule.rule if rule is not None else 'unmatched'
+
+
+# --------------------------------------------------------------------------- #
+# SQLAlchemy hooks
+# --------------------------------------------------------------------------- #
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_metrics_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('_metrics_query_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    registry.observe('db_query_duration_seconds', elapsed)
+    if has_request_context():
+        g._metrics_db_queries = g.get('_metrics_db_queries', 0) + 1
+        g._metrics_db_time = g.get('_metrics_db_time', 0.0) + elapsed
+
+
+def _install_sqlalchemy_hooks():
+    # Listening on the Engine class covers every engine the app (or a test) creates,
+    # and event.contains keeps repeated create_app calls from stacking listeners.
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+def _instrument_pool(pool):
+    """Time Pool._do_get, the call that blocks when every connection is checked out.
+
+    SQLAlchemy has a 'checkout' event but it fires after the wait, so it cannot
+    measure it. Wrapping the instance method is the narrowest hook that can.
+    """
+    if getattr(pool, '_metrics_instrumented', False) or not hasattr(pool, '_do_get'):
+        return
+    original = pool._do_get
+
+    def timed_do_get():
+        start = time.perf_counter()
+        try:
+            return original()
+        finally:
+            registry.observe('db_pool_checkout_wait_seconds', time.perf_counter() - start)
+
+    pool._do_get = timed_do_get
+    pool._metrics_instrumented = True
+
+
+# --------------------------------------------------------------------------- #
+# Redis
+# --------------------------------------------------------------------------- #
+
+def instrument_redis(client):
+    """Count and time every command sent through this client. Returns the client."""
+    if client is None or getattr(client, '_metrics_instrumented', False):
+        return client
+    original = client.execute_command
+
+    def timed_execute_command(*args, **kwargs):
+        command = str(args[0]).upper() if args else 'UNKNOWN'
+        start = time.perf_counter()
+        try:
+            return original(*args, **kwargs)
+        finally:
+            registry.inc('redis_commands_total', command=command)
+            registry.observe('redis_command_duration_seconds', time.perf_counter() - start)
+
+    client.execute_command = timed_execute_command
+    client._metrics_instrumented = True
+    return client
+
+
+# --------------------------------------------------------------------------- #
+# Multiprocess snapshots
+# --------------------------------------------------------------------------- #
+
+ARCHIVE_NAME = 'archive.json'
+_snapshot_lock = threading.Lock()
+_snapshot_stop = threading.Event()
+
+
+def _snapshot_path(directory, pid=None):
+    return os.path.join(directory, f"{pid or os.getpid()}.json")
+
+
+def _write_json(path, data):
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as fh:
+        json.dump(data, fh)
+    os.replace(tmp, path)  # readers never see a half-written file
+
+
+def write_snapshot(directory):
+    os.makedirs(directory, exist_ok=True)
+    _write_json(_snapshot_path(directory), registry.snapshot())
+
+
+def _merged_snapshots(directory):
+    snapshots = [registry.snapshot()]
+    if not directory or not os.path.isdir(directory):
+        return snapshots
+    own = os.path.basename(_snapshot_path(directory))
+    for name in os.listdir(directory):
+        if not name.endswith('.json') or name == own:
+            continue
+        try:
+            with open(os.path.join(directory, name), encoding='utf-8') as fh:
+                snapshots.append(json.load(fh))
+        except (OSError, ValueError):
+            continue  # a worker mid-replace or a stray file; the next scrape gets it
+    return snapshots
+
+
+def clear_multiproc_dir(directory):
+    """Remove every snapshot. Call once in the gunicorn master before workers start."""
+    if not directory or not os.path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        if name.endswith(('.json', '.tmp', '.lock')):
+            try:
+                os.unlink(os.path.join(directory, name))
+            except OSError:
+                pass
+
+
+def retire_snapshot(directory, pid=None):
+    """Fold a worker's counters into archive.json and delete its <pid>.json.
+
+    Called by the gunicorn master for each exited worker (pid) and by a worker for
+    itself at exit (no pid: its live registry). A pid with no file is a no-op.
+    """
+    if not directory or not os.path.isdir(directory):
+        return
+    path = _snapshot_path(directory, pid)
+    if pid is None or pid == os.getpid():
+        _snapshot_stop.set()
+        with _snapshot_lock:
+            snapshot = registry.snapshot()
+    else:
+        try:
+            with open(path, encoding='utf-8') as fh:
+                snapshot = json.load(fh)
+        except (OSError, ValueError):
+            return
+
+    with open(os.path.join(directory, 'archive.lock'), 'a') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)  # the master and exiting workers may race
+        archive_path = os.path.join(directory, ARCHIVE_NAME)
+        snapshots = [snapshot]
+        try:
+            with open(archive_path, encoding='utf-8') as fh:
+                snapshots.append(json.load(fh))
+        except (OSError, ValueError):
+            pass
+        _write_json(archive_path, merge_snapshots(snapshots))
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+def _start_snapshot_writer(directory, interval):
+    def loop():
+        while not _snapshot_stop.wait(interval):
+            with _snapshot_lock:
+                if _snapshot_stop.is_set():
+                    return
+                try:
+                    write_snapshot(directory)
+                except OSError:
+                    pass
+
+    threading.Thread(target=loop, name='metrics-snapshot-writer', daemon=True).start()
+    atexit.register(retire_snapshot, directory)
+
+
+# --------------------------------------------------------------------------- #
+# Exposition
+# --------------------------------------------------------------------------- #
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    parts = []
+    for k, v in labels:
+        escaped = str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{k}="{escaped}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def _format_bound(bound):
+    return '+Inf' if math.isinf(bound) else repr(float(bound))
+
+
+def _merge(snapshots):
+    """Sum counters and histogram buckets: ({key: value}, {key: hist}, help)."""
+    counters, histograms, help_text = {}, {}, {}
+    for snap in snapshots:
+        help_text.update(snap.get('help', {}))
+        for name, labels, value in snap.get('counters', []):
+            key = (name, tuple(tuple(item) for item in labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, hist in snap.get('histograms', []):
+            key = (name, tuple(tuple(item) for item in labels))
+            merged = histograms.get(key)
+            if merged is None or merged['buckets'] != hist['buckets']:
+                histograms[key] = dict(hist, counts=list(hist['counts']))
+                continue
+            merged['counts'] = [a + b for a, b in zip(merged['counts'], hist['counts'])]
+            merged['sum'] += hist['sum']
+            merged['count'] += hist['count']
+    return counters, histograms, help_text
+
+
+def merge_snapshots(snapshots):
+    """Several snapshots as one, in the same JSON shape."""
+    counters, histograms, help_text = _merge(snapshots)
+    return {
+        'counters': [[name, list(map(list, labels)), value] for (name, labels), value in counters.items()],
+        'histograms': [[name, list(map(list, labels)), hist] for (name, labels), hist in histograms.items()],
+        'help': help_text,
+    }
+
+
+def render_prometheus(snapshots):
+    """Merge snapshots (sum counters and buckets) and render text format 0.0.4."""
+    counters, histograms, help_text = _merge(snapshots)
+
+    lines = []
+    for name in sorted({k[0] for k in counters}):
+        if name in help_text:
+            lines.append(f"# HELP {name} {help_text[name]}")
+        lines.append(f"# TYPE {name} counter")
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    for name in sorted({k[0] for k in histograms}):
+        if name in help_text:
+            lines.append(f"# HELP {name} {help_text[name]}")
+        lines.append(f"# TYPE {name} histogram")
+        for (metric, labels), hist in sorted(histograms.items()):
+            if metric != name:
+                continue
+            for bound, count in zip(hist['buckets'], hist['counts']):
+                bucket_labels = labels + (('le', _format_bound(bound)),)
+                lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {count}")
+            inf_labels = labels + (('le', '+Inf'),)
+            lines.append(f"{name}_bucket{_format_labels(inf_labels)} {hist['count']}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {hist['sum']}")
+            lines.append(f"{name}_count{_format_labels(labels)} {hist['count']}")
+    return '\n'.join(lines) + '\n'
+
+
+# --------------------------------------------------------------------------- #
+# Flask wiring
+# --------------------------------------------------------------------------- #
+
+def init_metrics(app):
+    """Install request/DB/pool hooks and the /metrics endpoint. No-op when disabled."""
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+
+    _install_sqlalchemy_hooks()
+    try:
+        from common.database import db
+        with app.app_context():
+            _instrument_pool(db.engine.pool)
+    except Exception as e:
+        app.logger.warning(f"DB pool metrics unavailable: {str(e)}")
+
+    multiproc_dir = app.config.get('METRICS_MULTIPROC_DIR')
+    if multiproc_dir:
+        _start_snapshot_writer(multiproc_dir, float(app.config.get('METRICS_SNAPSHOT_SECONDS', 10)))
+    if not app.config.get('METRICS_TOKEN'):
+        app.logger.warning("METRICS_TOKEN is not set; /metrics refuses every request until it is")
+
+    @app.before_request
+    def _metrics_start_timer():
+        g._metrics_start = time.perf_counter()
+        g._metrics_db_queries = 0
+        g._metrics_db_time = 0.0
+
+    @app.after_request
+    def _metrics_observe_request(response):
+        start = g.get('_metrics_start')
+        if start is None:
+            return response
+        route = _route_label()
+        registry.observe(
+            'http_request_duration_seconds', time.perf_counter() - start,
+            method=request.method, route=route, status=f"{response.status_code // 100}xx",
+        )
+        registry.observe('db_queries_per_request', g.get('_metrics_db_queries', 0),
+                         buckets=QUERY_COUNT_BUCKETS, route=route)
+        registry.observe('db_query_time_per_request_seconds', g.get('_metrics_db_time', 0.0), route=route)
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def prometheus_metrics():
+        """Prometheus text exposition, merged across workers when configured."""
+        token = current_app.config.get('METRICS_TOKEN')
+        if not token:
+            return Response('metrics are disabled until METRICS_TOKEN is set\n', status=403,
+                            mimetype='text/plain')
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+            return Response('unauthorized\n', status=401, mimetype='text/plain')
+        body = render_prometheus(_merged_snapshots(current_app.config.get('METRICS_MULTIPROC_DIR')))
+        return Response(body, mimetype='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,155 @@
+"""
+Per-request SQL auditing for N+1 detection (debug and test only).
+
+Lazy relationships hide N+1 patterns well: serializing 20 reels quietly runs the same
+"SELECT ... FROM products WHERE product_id = ?" twenty times. With auditing on, every
+statement a request executes is fingerprinted (literals and IN-lists collapsed), and
+after the response:
+
+- any fingerprint executed QUERY_AUDIT_REPEAT_THRESHOLD or more times is logged as a
+  likely N+1 with its count and a sample of the SQL;
+- a request over its budget in QUERY_BUDGETS ({endpoint name: max statements}) is
+  logged as over budget;
+- X-Query-Count is added to the response, so the browser's network tab shows it.
+
+Auditing is on when the app is in DEBUG or TESTING, or QUERY_AUDIT_ENABLED is set.
+Production pays nothing: the listener returns on its first line.
+
+Tests use `QueryAudit` directly through the `query_budget` fixture in
+tests/conftest.py, which fails the test when a block runs more statements (or more
+repeats of one statement) than allowed.
+"""
+import re
+import threading
+from collections import Counter
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*(?:\?|%s|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|:\w+))*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+_POSTCOMPILE = re.compile(r"\(?__\[POSTCOMPILE_\w+\]\)?")
+
+
+def fingerprint(statement):
+    """Statement shape with values removed, so the same query with different ids matches."""
+    sql = _STRING_LITERAL.sub('?', statement)
+    sql = _NUMBER.sub('?', sql)
+    sql = _POSTCOMPILE.sub('(?)', sql)
+    sql = _PLACEHOLDER_LIST.sub('(?)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+class QueryAudit:
+    """Collects statements executed on any engine, on this thread, while active.
+
+    Usable as a context manager. With max_queries / max_repeats set, leaving the
+    block raises AssertionError listing the offenders.
+    """
+
+    _local = threading.local()
+
+    def __init__(self, max_queries=None, max_repeats=None):
+        self.max_queries = max_queries
+        self.max_repeats = max_repeats
+        self.statements = []
+        self.fingerprints = Counter()
+
+    @classmethod
+    def _active(cls):
+        if not hasattr(cls._local, 'stack'):
+            cls._local.stack = []
+        return cls._local.stack
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def add(self, statement):
+        self.statements.append(statement)
+        self.fingerprints[fingerprint(statement)] += 1
+
+    def repeated(self, threshold):
+        """[(fingerprint, count)] for shapes executed at least `threshold` times, worst first."""
+        return [(fp, n) for fp, n in self.fingerprints.most_common() if n >= threshold]
+
+    def report(self):
+        lines = [f"{self.count} statement(s), {len(self.fingerprints)} distinct"]
+        for fp, n in self.fingerprints.most_common(10):
+            lines.append(f"  {n:>4}x  {fp[:200]}")
+        return '\n'.join(lines)
+
+    def __enter__(self):
+        _install_listener()
+        self._active().append(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._active().remove(self)
+        if exc_type is not None:
+            return False
+        problems = []
+        if self.max_queries is not None and self.count > self.max_queries:
+            problems.append(f"query budget exceeded: {self.count} > {self.max_queries}")
+        if self.max_repeats is not None:
+            offenders = [(fp, n) for fp, n in self.fingerprints.items() if n > self.max_repeats]
+            if offenders:
+                problems.append(f"statement repeated more than {self.max_repeats} times (likely N+1)")
+        if problems:
+            raise AssertionError('; '.join(problems) + '\n' + self.report())
+        return False
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    for audit in QueryAudit._active():
+        audit.add(statement)
+    if has_request_context():
+        audit = g.get('_query_audit')
+        if audit is not None:
+            audit.add(statement)
+
+
+def _install_listener():
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+
+
+def _is_enabled(app):
+    return bool(app.config.get('QUERY_AUDIT_ENABLED') or app.debug or app.testing)
+
+
+def init_query_audit(app):
+    """Audit every request's SQL when the app is in debug/test mode. No-op otherwise."""
+    if not _is_enabled(app):
+        return
+    _install_listener()
+
+    @app.before_request
+    def _query_audit_start():
+        g._query_audit = QueryAudit()
+
+    @app.after_request
+    def _query_audit_report(response):
+        audit = g.pop('_query_audit', None)
+        if audit is None:
+            return response
+        response.headers['X-Query-Count'] = str(audit.count)
+
+        endpoint = request.endpoint or 'unknown'
+        threshold = int(current_app.config.get('QUERY_AUDIT_REPEAT_THRESHOLD', 5))
+        for fp, n in audit.repeated(threshold):
+            current_app.logger.warning(
+                "Possible N+1 on %s %s (%s): %sx %s", request.method, request.path, endpoint, n, fp[:300]
+            )
+
+        budget = (current_app.config.get('QUERY_BUDGETS') or {}).get(endpoint)
+        if budget is not None and audit.count > budget:
+            current_app.logger.warning(
+                "Query budget exceeded on %s %s (%s): %s > %s\n%s",
+                request.method, request.path, endpoint, audit.count, budget, audit.report(),
+            )
+        return response
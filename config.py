@@ -46,6 +46,130 @@ class Config:
     CACHE_TYPE = 'null'  # null = Flask-Caching does not use Redis for @cache in normal boot
     CACHE_DEFAULT_TIMEOUT = 300  # 5 minutes
 
+    # Error monitoring (common/error_monitor.py). 4xx/5xx rows are buffered and bulk
+    # written by a background thread; identical errors within a flush window become
+    # one row with request_count = occurrences. The sample rate applies to new 4xx
+    # fingerprints only — 5xx are always kept.
+    ERROR_MONITOR_BACKGROUND = os.getenv('ERROR_MONITOR_BACKGROUND', 'true').lower() in ('1', 'true', 'yes')
+    ERROR_MONITOR_FLUSH_SECONDS = float(os.getenv('ERROR_MONITOR_FLUSH_SECONDS', '5'))
+    ERROR_MONITOR_MAX_PENDING = int(os.getenv('ERROR_MONITOR_MAX_PENDING', '500'))
+    ERROR_MONITOR_4XX_SAMPLE_RATE = float(os.getenv('ERROR_MONITOR_4XX_SAMPLE_RATE', '1.0'))
+
+    # Prometheus-style /metrics (common/metrics.py). Under gunicorn set
+    # METRICS_MULTIPROC_DIR to a directory every worker can write, so a scrape sees
+    # all workers rather than whichever one answered; gunicorn.conf.py's hooks clear
+    # it on start and archive exited workers. Scrapes must send
+    # "Authorization: Bearer <METRICS_TOKEN>"; with no token set /metrics answers 403.
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    METRICS_MULTIPROC_DIR = os.getenv('METRICS_MULTIPROC_DIR')
+    METRICS_SNAPSHOT_SECONDS = float(os.getenv('METRICS_SNAPSHOT_SECONDS', '10'))
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+    # N+1 detection (common/query_audit.py). Always on in DEBUG and TESTING; this flag
+    # turns it on elsewhere (e.g. a staging box). QUERY_BUDGETS maps an endpoint name
+    # ("product.get_all_products") to the most statements it may run before a warning.
+    QUERY_AUDIT_ENABLED = os.getenv('QUERY_AUDIT_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    QUERY_AUDIT_REPEAT_THRESHOLD = int(os.getenv('QUERY_AUDIT_REPEAT_THRESHOLD', '5'))
+    QUERY_BUDGETS = {}
+
+    # Merchant dashboard/report rollups (services/sales_rollup_service.py). Turn on
+    # MAINTAIN first, run scripts/backfill_sales_rollups.py, then turn on READ; reading
+    # before the backfill shows merchants empty history.
+    SALES_ROLLUPS_MAINTAIN = os.getenv('SALES_ROLLUPS_MAINTAIN', 'false').lower() in ('1', 'true', 'yes')
+    SALES_ROLLUPS_READ = os.getenv('SALES_ROLLUPS_READ', 'false').lower() in ('1', 'true', 'yes')
+
+    # CSV/XLSX report exports (common/exports.py) read rows through a server-side
+    # cursor, this many per fetch.
+    EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '1000'))
+
+    # Product listings embed at most this many recent reviews per product; the full
+    # list is paged from /api/reviews/product/<id>.
+    REVIEW_PREVIEW_LIMIT = int(os.getenv('REVIEW_PREVIEW_LIMIT', '3'))
+
+    # GET /api/merchants/notifications/stream (Server-Sent Events). Off by default:
+    # a stream holds its request thread for as long as it is open, so on sync or
+    # threaded workers (app.py runs gunicorn with 1 worker x 8 threads) a handful of
+    # open dashboards would starve every other request. Turn it on only when the app
+    # is served by an async worker class (gunicorn -k gevent or eventlet) or by a
+    # separate process that serves the stream alone. Off, the endpoint answers 404 and
+    # clients poll /api/merchants/notifications/unread-count.
+    # NOTIFICATION_STREAM_MAX_OPEN caps open streams per process; past it a stream
+    # request gets 503 rather than a thread. POLL_SECONDS is how often a stream checks
+    # the merchant's counter row; MAX_SECONDS how long it stays open before the client
+    # reconnects, capped at 45s inside gunicorn's 60s worker timeout.
+    NOTIFICATION_STREAM_ENABLED = os.getenv('NOTIFICATION_STREAM_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    NOTIFICATION_STREAM_MAX_OPEN = int(os.getenv('NOTIFICATION_STREAM_MAX_OPEN', '2'))
+    NOTIFICATION_STREAM_POLL_SECONDS = float(os.getenv('NOTIFICATION_STREAM_POLL_SECONDS', '2'))
+    NOTIFICATION_STREAM_MAX_SECONDS = float(os.getenv('NOTIFICATION_STREAM_MAX_SECONDS', '45'))
+
+    # Reel-like and follow notifications are buffered and written in bulk
+    # (services/notification_aggregator.py): likes on one reel within a window become
+    # one notification update.
+    NOTIFICATION_AGGREGATOR_BACKGROUND = os.getenv('NOTIFICATION_AGGREGATOR_BACKGROUND', 'true').lower() in ('1', 'true', 'yes')
+    NOTIFICATION_AGGREGATOR_FLUSH_SECONDS = float(os.getenv('NOTIFICATION_AGGREGATOR_FLUSH_SECONDS', '5'))
+    NOTIFICATION_AGGREGATOR_MAX_PENDING = int(os.getenv('NOTIFICATION_AGGREGATOR_MAX_PENDING', '5000'))
+
+    # Resized copies of uploaded product/banner/review images (services/image_derivatives.py).
+    # One derivative per width smaller than the original, per format; AVIF encodes
+    # several times slower than WebP, so it is opt-in ("webp,avif").
+    IMAGE_DERIVATIVES_ENABLED = os.getenv('IMAGE_DERIVATIVES_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    IMAGE_DERIVATIVE_WIDTHS = [int(w) for w in os.getenv('IMAGE_DERIVATIVE_WIDTHS', '320,640,1080').split(',') if w.strip()]
+    IMAGE_DERIVATIVE_FORMATS = [f.strip().lower() for f in os.getenv('IMAGE_DERIVATIVE_FORMATS', 'webp').split(',') if f.strip()]
+    IMAGE_DERIVATIVE_QUALITY = int(os.getenv('IMAGE_DERIVATIVE_QUALITY', '80'))
+
+    # Reel video processing queue (services/media_job_service.py). Uploads store the
+    # bytes and enqueue thumbnail/probe jobs; scripts/run_media_worker.py runs them in
+    # a process of its own, so ffmpeg never competes with requests for CPU.
+    # MEDIA_JOBS_ENABLED runs them on the in-app scheduler instead (single-process
+    # setups only). MEDIA_JOB_WORKERS reels are processed at once per batch.
+    # REEL_AUDIO_RENDER_ENABLED also queues a mix whenever a song is attached; off,
+    # playback mixes at the player as before.
+    MEDIA_JOBS_ENABLED = os.getenv('MEDIA_JOBS_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    MEDIA_JOB_POLL_SECONDS = int(os.getenv('MEDIA_JOB_POLL_SECONDS', '5'))
+    MEDIA_JOB_WORKERS = int(os.getenv('MEDIA_JOB_WORKERS', '2'))
+    MEDIA_JOB_BATCH_SIZE = int(os.getenv('MEDIA_JOB_BATCH_SIZE', '8'))
+    MEDIA_JOB_MAX_BATCHES = int(os.getenv('MEDIA_JOB_MAX_BATCHES', '5'))
+    MEDIA_JOB_MAX_ATTEMPTS = int(os.getenv('MEDIA_JOB_MAX_ATTEMPTS', '5'))
+    MEDIA_JOB_BACKOFF_SECONDS = int(os.getenv('MEDIA_JOB_BACKOFF_SECONDS', '30'))
+    MEDIA_JOB_BACKOFF_MAX_SECONDS = int(os.getenv('MEDIA_JOB_BACKOFF_MAX_SECONDS', '1800'))
+    MEDIA_JOB_LOCK_TIMEOUT_SECONDS = int(os.getenv('MEDIA_JOB_LOCK_TIMEOUT_SECONDS', '900'))
+    # Uploads are spooled to MEDIA_SPOOL_DIR on the web host. Unless the media worker
+    # can read that directory (MEDIA_SPOOL_SHARED: a shared volume, or the worker on
+    # the same host), the request deletes the file once S3 has it and the worker
+    # downloads the video from S3. MEDIA_JOBS_ENABLED implies a shared spool.
+    MEDIA_SPOOL_DIR = os.getenv('MEDIA_SPOOL_DIR')
+    MEDIA_SPOOL_SHARED = os.getenv('MEDIA_SPOOL_SHARED', 'false').lower() in ('1', 'true', 'yes')
+    MEDIA_SPOOL_MAX_AGE_HOURS = int(os.getenv('MEDIA_SPOOL_MAX_AGE_HOURS', '24'))
+    REEL_AUDIO_RENDER_ENABLED = os.getenv('REEL_AUDIO_RENDER_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    # Rendered mixes are keyed by a hash of (video bytes, song, trim, volumes) and
+    # reused across reels; off, every render gets a fresh per-reel key.
+    REEL_MIX_CACHE_ENABLED = os.getenv('REEL_MIX_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+    # Adaptive-bitrate copies of each reel, made by the media worker. The ladder is
+    # "short side px:video kbps" pairs; rungs larger than the upload are skipped. The
+    # preview is a muted clip of the first REEL_PREVIEW_SECONDS (0 = whole reel).
+    REEL_HLS_ENABLED = os.getenv('REEL_HLS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    REEL_HLS_LADDER = os.getenv('REEL_HLS_LADDER', '360:800,540:1400,720:2800')
+    REEL_HLS_SEGMENT_SECONDS = int(os.getenv('REEL_HLS_SEGMENT_SECONDS', '4'))
+    REEL_PREVIEW_SIZE = int(os.getenv('REEL_PREVIEW_SIZE', '240'))
+    REEL_PREVIEW_KBPS = int(os.getenv('REEL_PREVIEW_KBPS', '300'))
+    REEL_PREVIEW_SECONDS = int(os.getenv('REEL_PREVIEW_SECONDS', '6'))
+
+    # Bulk music ingest (services/music/ingest_service.py). Provider pages run on one
+    # process-wide pool of MUSIC_INGEST_WORKERS jobs at a time, each with downloads on
+    # MUSIC_INGEST_DOWNLOAD_WORKERS threads and ffmpeg analysis in
+    # MUSIC_INGEST_ANALYSIS_PROCESSES processes (0 = threads), songs written
+    # MUSIC_INGEST_BATCH_SIZE per commit. A job without progress for
+    # MUSIC_INGEST_STALE_SECONDS is restarted by the sweeper every
+    # MUSIC_INGEST_SWEEP_SECONDS (or may be resumed by an admin).
+    MUSIC_INGEST_BACKGROUND = os.getenv('MUSIC_INGEST_BACKGROUND', 'true').lower() in ('1', 'true', 'yes')
+    MUSIC_INGEST_WORKERS = int(os.getenv('MUSIC_INGEST_WORKERS', '1'))
+    MUSIC_INGEST_DOWNLOAD_WORKERS = int(os.getenv('MUSIC_INGEST_DOWNLOAD_WORKERS', '8'))
+    MUSIC_INGEST_ANALYSIS_PROCESSES = int(os.getenv('MUSIC_INGEST_ANALYSIS_PROCESSES', str(min(4, os.cpu_count() or 1))))
+    MUSIC_INGEST_BATCH_SIZE = int(os.getenv('MUSIC_INGEST_BATCH_SIZE', '25'))
+    MUSIC_INGEST_STALE_SECONDS = int(os.getenv('MUSIC_INGEST_STALE_SECONDS', '600'))
+    MUSIC_INGEST_SWEEP_SECONDS = int(os.getenv('MUSIC_INGEST_SWEEP_SECONDS', '300'))
+
     # Cloudinary
     CLOUDINARY_CLOUD_NAME = os.getenv('CLOUDINARY_CLOUD_NAME')
     CLOUDINARY_API_KEY = os.getenv('CLOUDINARY_API_KEY')
@@ -63,6 +187,21 @@ class Config:
     MAIL_PASSWORD = os.getenv('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = (os.getenv('MAIL_SENDER_NAME', 'AOIN'), os.getenv('MAIL_USERNAME'))
 
+    # Outbound mail queue (services/email_outbox_service.py). When enabled, send_email
+    # renders the message in the request and a background job delivers it, so OTP and
+    # registration responses no longer wait on SMTP. EMAIL_TRANSPORT='file' writes
+    # .eml files to EMAIL_FILE_SINK_DIR instead of sending (local dev, tests).
+    EMAIL_OUTBOX_ENABLED = os.getenv('EMAIL_OUTBOX_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    EMAIL_TRANSPORT = os.getenv('EMAIL_TRANSPORT', 'smtp')
+    EMAIL_FILE_SINK_DIR = os.getenv('EMAIL_FILE_SINK_DIR', 'instance/outbox')
+    EMAIL_OUTBOX_POLL_SECONDS = int(os.getenv('EMAIL_OUTBOX_POLL_SECONDS', '2'))
+    EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv('EMAIL_OUTBOX_BATCH_SIZE', '50'))
+    EMAIL_OUTBOX_MAX_BATCHES = int(os.getenv('EMAIL_OUTBOX_MAX_BATCHES', '10'))
+    EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv('EMAIL_OUTBOX_MAX_ATTEMPTS', '6'))
+    EMAIL_OUTBOX_BACKOFF_SECONDS = int(os.getenv('EMAIL_OUTBOX_BACKOFF_SECONDS', '30'))
+    EMAIL_OUTBOX_BACKOFF_MAX_SECONDS = int(os.getenv('EMAIL_OUTBOX_BACKOFF_MAX_SECONDS', '3600'))
+    EMAIL_OUTBOX_LOCK_TIMEOUT_SECONDS = int(os.getenv('EMAIL_OUTBOX_LOCK_TIMEOUT_SECONDS', '300'))
+
     FRONTEND_URL = 'https://aoinstore.com'  # No trailing slash to prevent double slashes in URLs
     # Base URL for AOIN product page links (used when generating product_url for AOIN reels)
     PRODUCT_PAGE_BASE_URL = os.getenv('PRODUCT_PAGE_BASE_URL', os.getenv('FRONTEND_URL', 'https://aoinstore.com')).rstrip('/')
@@ -121,10 +260,106 @@ class Config:
     SHIPROCKET_EMAIL = os.getenv('SHIPROCKET_EMAIL')
     SHIPROCKET_PASSWORD = os.getenv('SHIPROCKET_PASSWORD')
     SHIPROCKET_BASE_URL = 'https://apiv2.shiprocket.in/v1/external'
+    # One client per process (services/shiprocket_client.py): pooled keep-alive
+    # connections, GETs retried on 429/5xx, and the login token shared through Redis.
+    SHIPROCKET_TIMEOUT_SECONDS = float(os.getenv('SHIPROCKET_TIMEOUT_SECONDS', '10'))
+    SHIPROCKET_HTTP_POOL_SIZE = int(os.getenv('SHIPROCKET_HTTP_POOL_SIZE', '20'))
+    SHIPROCKET_HTTP_RETRIES = int(os.getenv('SHIPROCKET_HTTP_RETRIES', '2'))
+    SHIPROCKET_TOKEN_TTL_SECONDS = int(os.getenv('SHIPROCKET_TOKEN_TTL_SECONDS', str(23 * 3600)))
+    # Serviceability answers cached per (pickup, delivery, weight band, COD band)
+    # (services/serviceability_cache.py); "no courier" answers for the shorter TTL.
+    SHIPROCKET_SERVICEABILITY_CACHE_ENABLED = os.getenv('SHIPROCKET_SERVICEABILITY_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    SHIPROCKET_SERVICEABILITY_TTL_SECONDS = int(os.getenv('SHIPROCKET_SERVICEABILITY_TTL_SECONDS', str(6 * 3600)))
+    SHIPROCKET_SERVICEABILITY_NEGATIVE_TTL_SECONDS = int(os.getenv('SHIPROCKET_SERVICEABILITY_NEGATIVE_TTL_SECONDS', '3600'))
+    SHIPROCKET_SERVICEABILITY_WEIGHT_BAND = float(os.getenv('SHIPROCKET_SERVICEABILITY_WEIGHT_BAND', '0.5'))
+    SHIPROCKET_SERVICEABILITY_COD_BAND = float(os.getenv('SHIPROCKET_SERVICEABILITY_COD_BAND', '500'))
+    # Shipments for a confirmed order are booked by background jobs, one per merchant
+    # (services/shipment_jobs.py), on a shared pool of SHIPMENT_JOB_WORKERS threads.
+    # Each step is tried SHIPMENT_JOB_STEP_ATTEMPTS times; a job with no progress for
+    # SHIPMENT_JOB_STALE_SECONDS is restarted by the sweep.
+    SHIPMENT_JOBS_BACKGROUND = os.getenv('SHIPMENT_JOBS_BACKGROUND', 'true').lower() in ('1', 'true', 'yes')
+    SHIPMENT_JOB_WORKERS = int(os.getenv('SHIPMENT_JOB_WORKERS', '8'))
+    SHIPMENT_JOB_STEP_ATTEMPTS = int(os.getenv('SHIPMENT_JOB_STEP_ATTEMPTS', '3'))
+    SHIPMENT_JOB_RETRY_BACKOFF_SECONDS = float(os.getenv('SHIPMENT_JOB_RETRY_BACKOFF_SECONDS', '1'))
+    SHIPMENT_JOB_STALE_SECONDS = int(os.getenv('SHIPMENT_JOB_STALE_SECONDS', '300'))
+    SHIPMENT_JOB_SWEEP_SECONDS = int(os.getenv('SHIPMENT_JOB_SWEEP_SECONDS', '60'))
+
+    # Background report exports (services/export_jobs.py, POST /api/exports). Rendered
+    # on EXPORT_JOB_WORKERS threads and stored on local disk or in S3 (set 's3' when
+    # more than one host serves the API) for EXPORT_JOB_RETENTION_SECONDS. A repeat of
+    # the same export within EXPORT_JOB_DEDUP_SECONDS returns the existing job.
+    EXPORT_JOBS_BACKGROUND = os.getenv('EXPORT_JOBS_BACKGROUND', 'true').lower() in ('1', 'true', 'yes')
+    EXPORT_JOB_WORKERS = int(os.getenv('EXPORT_JOB_WORKERS', '4'))
+    EXPORT_JOB_STORAGE = os.getenv('EXPORT_JOB_STORAGE', 'local')
+    EXPORT_JOB_LOCAL_DIR = os.getenv('EXPORT_JOB_LOCAL_DIR', 'instance/exports')
+    EXPORT_JOB_S3_BUCKET = os.getenv('EXPORT_JOB_S3_BUCKET')
+    EXPORT_JOB_URL_SECONDS = int(os.getenv('EXPORT_JOB_URL_SECONDS', '300'))
+    EXPORT_JOB_DEDUP_SECONDS = int(os.getenv('EXPORT_JOB_DEDUP_SECONDS', '600'))
+    EXPORT_JOB_RETENTION_SECONDS = int(os.getenv('EXPORT_JOB_RETENTION_SECONDS', '86400'))
+    EXPORT_JOB_STALE_SECONDS = int(os.getenv('EXPORT_JOB_STALE_SECONDS', '1800'))
+    # A rendering job refreshes its heartbeat at most this often (between fetches and chunks).
+    EXPORT_JOB_HEARTBEAT_SECONDS = int(os.getenv('EXPORT_JOB_HEARTBEAT_SECONDS', '60'))
+    EXPORT_JOB_SWEEP_SECONDS = int(os.getenv('EXPORT_JOB_SWEEP_SECONDS', '300'))
+
+    # Razorpay payment finalisation (services/payment_finalization.py). verify-payment
+    # checks the signature, writes a row per payment id and answers; the order is
+    # created on PAYMENT_FINALIZE_WORKERS threads. Gateway fetches are tried
+    # PAYMENT_FINALIZE_ATTEMPTS times; a row with no progress for
+    # PAYMENT_FINALIZE_STALE_SECONDS is restarted by the sweep.
+    PAYMENT_FINALIZE_BACKGROUND = os.getenv('PAYMENT_FINALIZE_BACKGROUND', 'true').lower() in ('1', 'true', 'yes')
+    PAYMENT_FINALIZE_WORKERS = int(os.getenv('PAYMENT_FINALIZE_WORKERS', '8'))
+    PAYMENT_FINALIZE_ATTEMPTS = int(os.getenv('PAYMENT_FINALIZE_ATTEMPTS', '3'))
+    PAYMENT_FINALIZE_RETRY_BACKOFF_SECONDS = float(os.getenv('PAYMENT_FINALIZE_RETRY_BACKOFF_SECONDS', '0.5'))
+    PAYMENT_FINALIZE_STALE_SECONDS = int(os.getenv('PAYMENT_FINALIZE_STALE_SECONDS', '120'))
+    PAYMENT_FINALIZE_SWEEP_SECONDS = int(os.getenv('PAYMENT_FINALIZE_SWEEP_SECONDS', '30'))
+    # A run that could not reach the gateway (502) is retried by the sweep after
+    # PAYMENT_FINALIZE_REQUEUE_SECONDS, doubling per run, for up to PAYMENT_FINALIZE_MAX_RUNS runs.
+    PAYMENT_FINALIZE_REQUEUE_SECONDS = int(os.getenv('PAYMENT_FINALIZE_REQUEUE_SECONDS', '60'))
+    PAYMENT_FINALIZE_MAX_RUNS = int(os.getenv('PAYMENT_FINALIZE_MAX_RUNS', '8'))
+
+    # Bulk merchant payouts (services/payout_batches.py). A batch is written and
+    # answered at once, then submitted on PAYOUT_BATCH_WORKERS threads,
+    # PAYOUT_CHUNK_SIZE payouts at a time with PAYOUT_CONCURRENCY calls in flight,
+    # never faster than PAYOUT_RATE_PER_SECOND (0 = unlimited) across the process.
+    # Retryable gateway errors are tried PAYOUT_ATTEMPTS times. PAYOUT_GATEWAY is
+    # 'simulated' (no money moves) until RazorpayX is set up, then 'razorpayx'.
+    PAYOUT_GATEWAY = os.getenv('PAYOUT_GATEWAY', 'simulated')
+    RAZORPAYX_ACCOUNT_NUMBER = os.getenv('RAZORPAYX_ACCOUNT_NUMBER')
+    RAZORPAYX_PAYOUT_MODE = os.getenv('RAZORPAYX_PAYOUT_MODE', 'IMPS')
+    PAYOUT_BATCH_BACKGROUND = os.getenv('PAYOUT_BATCH_BACKGROUND', 'true').lower() in ('1', 'true', 'yes')
+    PAYOUT_BATCH_WORKERS = int(os.getenv('PAYOUT_BATCH_WORKERS', '2'))
+    PAYOUT_BATCH_MAX_ITEMS = int(os.getenv('PAYOUT_BATCH_MAX_ITEMS', '5000'))
+    PAYOUT_CHUNK_SIZE = int(os.getenv('PAYOUT_CHUNK_SIZE', '50'))
+    PAYOUT_CONCURRENCY = int(os.getenv('PAYOUT_CONCURRENCY', '4'))
+    PAYOUT_RATE_PER_SECOND = float(os.getenv('PAYOUT_RATE_PER_SECOND', '10'))
+    PAYOUT_ATTEMPTS = int(os.getenv('PAYOUT_ATTEMPTS', '4'))
+    PAYOUT_RETRY_BACKOFF_SECONDS = float(os.getenv('PAYOUT_RETRY_BACKOFF_SECONDS', '1.0'))
+    PAYOUT_BATCH_STALE_SECONDS = int(os.getenv('PAYOUT_BATCH_STALE_SECONDS', '300'))
+    PAYOUT_BATCH_SWEEP_SECONDS = int(os.getenv('PAYOUT_BATCH_SWEEP_SECONDS', '60'))
+
+    # Rendered invoice PDFs (services/invoice_cache.py), keyed by a hash of the invoice
+    # data and renderer version, kept on local disk or in S3 ('s3' when more than one
+    # host serves the API). Batch renders for GST archives use INVOICE_BATCH_PROCESSES
+    # worker processes (0 = render in the calling thread), INVOICE_BATCH_SIZE orders
+    # loaded per query.
+    INVOICE_CACHE_STORAGE = os.getenv('INVOICE_CACHE_STORAGE', 'local')
+    INVOICE_CACHE_DIR = os.getenv('INVOICE_CACHE_DIR', 'instance/invoices')
+    INVOICE_CACHE_S3_BUCKET = os.getenv('INVOICE_CACHE_S3_BUCKET')
+    INVOICE_BATCH_PROCESSES = int(os.getenv('INVOICE_BATCH_PROCESSES', str(min(4, os.cpu_count() or 1))))
+    INVOICE_BATCH_SIZE = int(os.getenv('INVOICE_BATCH_SIZE', '200'))
 
     # AWS / Translate
     AWS_REGION = os.getenv('AWS_REGION', 'ap-south-1')
     FEATURE_TRANSLATION = os.getenv('FEATURE_TRANSLATION', 'false').lower() in ('1', 'true', 'yes')
+    # AWS Translate (services/translate_service.py): TRANSLATE_LRU_SIZE translations
+    # per process in front of Redis, at most TRANSLATE_MAX_CONCURRENCY requests in
+    # flight, and plain-text strings up to TRANSLATE_PACK_MAX_CHARS long packed into
+    # shared requests of up to TRANSLATE_PACK_MAX_BYTES.
+    TRANSLATE_LRU_SIZE = int(os.getenv('TRANSLATE_LRU_SIZE', '10000'))
+    TRANSLATE_MAX_CONCURRENCY = int(os.getenv('TRANSLATE_MAX_CONCURRENCY', '8'))
+    TRANSLATE_PACK_MAX_CHARS = int(os.getenv('TRANSLATE_PACK_MAX_CHARS', '200'))
+    TRANSLATE_PACK_MAX_BYTES = int(os.getenv('TRANSLATE_PACK_MAX_BYTES', '4500'))
+    TRANSLATE_CACHE_TTL_SECONDS = int(os.getenv('TRANSLATE_CACHE_TTL_SECONDS', str(60 * 60 * 24 * 30)))
     
     # Video Storage Provider
     VIDEO_STORAGE_PROVIDER = os.getenv('VIDEO_STORAGE_PROVIDER', 'cloudinary')  # 'cloudinary' or 'aws'
@@ -234,6 +469,25 @@ class TestingConfig(Config):
     MERCHANT_ACCOUNT_DELETION_JOB_ENABLED = False
     USER_ACCOUNT_DELETION_JOB_ENABLED = False
     INTRO_VIDEO_PURGE_ENABLED = False
+    # Inline send (which tests patch); the outbox tests turn it on explicitly.
+    EMAIL_OUTBOX_ENABLED = False
+    EMAIL_TRANSPORT = 'file'
+    # No writer threads; record() flushes inline so tests see rows immediately.
+    ERROR_MONITOR_BACKGROUND = False
+    NOTIFICATION_AGGREGATOR_BACKGROUND = False
+    MEDIA_JOBS_ENABLED = False
+    REEL_HLS_ENABLED = False
+    MUSIC_INGEST_BACKGROUND = False
+    MUSIC_INGEST_ANALYSIS_PROCESSES = 0
+    SHIPMENT_JOBS_BACKGROUND = False
+    SHIPMENT_JOB_RETRY_BACKOFF_SECONDS = 0
+    EXPORT_JOBS_BACKGROUND = False
+    INVOICE_BATCH_PROCESSES = 0
+    PAYMENT_FINALIZE_BACKGROUND = False
+    PAYMENT_FINALIZE_RETRY_BACKOFF_SECONDS = 0
+    PAYOUT_BATCH_BACKGROUND = False
+    PAYOUT_RETRY_BACKOFF_SECONDS = 0
+    PAYOUT_RATE_PER_SECOND = 0
     FEATURE_TRANSLATION = False
     FEATURE_MULTI_CURRENCY = False
     # Tests exercise both sides of this gate explicitly; default off matches prod.
@@ -3,7 +3,7 @@ from flask_jwt_extended import get_jwt_identity
 from common.database import db
 from common.cache import get_redis_client
 from models.user_merchant_follow import UserMerchantFollow
-from models.merchant_notification import MerchantNotification
+from services import notification_aggregator
 from auth.models.models import User, MerchantProfile
 from sqlalchemy import desc
 from datetime import datetime, timezone
@@ -59,24 +59,17 @@ class FollowController:
             # Create follow record
             follow = UserMerchantFollow.follow(current_user_id, merchant_id)
             if follow:
-                # Create notification for merchant
-                # Use savepoint to ensure notification failure doesn't affect follow operation
-                savepoint = db.session.begin_nested()
+                db.session.commit()
+                
+                # Notify the merchant (buffered; see services/notification_aggregator.py)
                 try:
-                    user_name = f"{user.first_name} {user.last_name}".strip()
-                    MerchantNotification.create_follow_notification(
+                    notification_aggregator.record_follow(
                         merchant_id=merchant_id,
                         follower_user_id=current_user_id,
-                        follower_name=user_name
+                        follower_name=f"{user.first_name} {user.last_name}".strip()
                     )
-                    savepoint.commit()
                 except Exception as e:
-                    savepoint.rollback()
-                    current_app.logger.warning(f"Failed to create notification for merchant follow: {str(e)}")
-                    # Don't fail the follow operation if notification creation fails
-                
-                # Commit all changes together (follow + notification if successful)
-                db.session.commit()
+                    current_app.logger.warning(f"Failed to record notification for merchant follow: {str(e)}")
                 
                 # Invalidate recommendation cache
                 try:
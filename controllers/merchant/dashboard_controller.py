@@ -9,6 +9,7 @@ from models.category import Category
 from auth.models.models import MerchantProfile, User
 from models.enums import OrderStatusEnum, PaymentStatusEnum
 import calendar
+from services import sales_rollup_service
 
 logger = logging.getLogger(__name__)
 
@@ -70,23 +71,38 @@ class MerchantDashboardController:
             prev_month = current_month - 1 if current_month > 1 else 12
             prev_year = current_year if current_month > 1 else current_year - 1
 
-            def fetch_monthly_data(month, year):
-                stats = (
-                    db.session.query(
-                        func.coalesce(func.sum(OrderItem.line_item_total_inclusive_gst), 0).label("total_sales"),
-                        func.count(func.distinct(Order.order_id)).label("total_orders")
+            # Both months in one read from the rollup instead of a query per month.
+            rollup = None
+            if sales_rollup_service.reads_enabled():
+                rollup = {
+                    (int(row.month), int(row.year)): row
+                    for row in sales_rollup_service.monthly_totals(
+                        merchant.id, [(current_month, current_year), (prev_month, prev_year)]
                     )
-                    .join(Order, Order.order_id == OrderItem.order_id)
-                    .filter(
-                        OrderItem.merchant_id == merchant.id,
-                        extract('month', Order.order_date) == month,
-                        extract('year', Order.order_date) == year,
+                }
+
+            def fetch_monthly_data(month, year):
+                if rollup is not None:
+                    row = rollup.get((month, year))
+                    raw_sales, raw_orders = (row.sales, row.orders) if row else (0, 0)
+                else:
+                    stats = (
+                        db.session.query(
+                            func.coalesce(func.sum(OrderItem.line_item_total_inclusive_gst), 0).label("total_sales"),
+                            func.count(func.distinct(Order.order_id)).label("total_orders")
+                        )
+                        .join(Order, Order.order_id == OrderItem.order_id)
+                        .filter(
+                            OrderItem.merchant_id == merchant.id,
+                            extract('month', Order.order_date) == month,
+                            extract('year', Order.order_date) == year,
+                        )
+                        .first()
                     )
-                    .first()
-                )
+                    raw_sales, raw_orders = stats.total_sales, stats.total_orders
 
-                total_sales = float(Decimal(str(stats.total_sales or 0)).quantize(Decimal('0.01')))
-                total_orders = stats.total_orders or 0
+                total_sales = float(Decimal(str(raw_sales or 0)).quantize(Decimal('0.01')))
+                total_orders = int(raw_orders or 0)
                 avg_order_value = float(Decimal(str(total_sales / total_orders if total_orders > 0 else 0)).quantize(Decimal('0.01')))
 
                 return {
@@ -140,24 +156,27 @@ class MerchantDashboardController:
                 year = today.year if (today.month - i) > 0 else today.year - 1
                 last_7_months.append((month, year))
 
-            rows = (
-                db.session.query(
-                    extract('month', Order.order_date).label('month'),
-                    extract('year', Order.order_date).label('year'),
-                    func.count(func.distinct(Order.order_id)).label('orders'),
-                    func.sum(OrderItem.line_item_total_inclusive_gst).label('sales')
-                )
-                .join(OrderItem, Order.order_id == OrderItem.order_id)
-                .filter(
-                    OrderItem.merchant_id == merchant.id,
-                    tuple_(
-                        extract('month', Order.order_date),
-                        extract('year', Order.order_date)
-                    ).in_(last_7_months)
+            if sales_rollup_service.reads_enabled():
+                rows = sales_rollup_service.monthly_totals(merchant.id, last_7_months)
+            else:
+                rows = (
+                    db.session.query(
+                        extract('month', Order.order_date).label('month'),
+                        extract('year', Order.order_date).label('year'),
+                        func.count(func.distinct(Order.order_id)).label('orders'),
+                        func.sum(OrderItem.line_item_total_inclusive_gst).label('sales')
+                    )
+                    .join(OrderItem, Order.order_id == OrderItem.order_id)
+                    .filter(
+                        OrderItem.merchant_id == merchant.id,
+                        tuple_(
+                            extract('month', Order.order_date),
+                            extract('year', Order.order_date)
+                        ).in_(last_7_months)
+                    )
+                    .group_by(extract('month', Order.order_date), extract('year', Order.order_date))
+                    .all()
                 )
-                .group_by(extract('month', Order.order_date), extract('year', Order.order_date))
-                .all()
-            )
 
             # Create a default dictionary for the past 7 months
             result_map = {
@@ -169,7 +188,7 @@ class MerchantDashboardController:
                 key = (int(row.month), int(row.year))
                 result_map[key] = {
                     'sales': float(row.sales or 0),
-                    'orders': row.orders,
+                    'orders': int(row.orders or 0),
                     'visitors': 2000  # dummy visitors for now
                 }
 
@@ -198,27 +217,30 @@ class MerchantDashboardController:
             if not merchant:
                 raise Exception("Merchant profile not found")
 
-            # Join order_items and products
-            results = (
-                db.session.query(
-                    OrderItem.product_id,
-                    Product.product_name,
-                    func.sum(OrderItem.quantity).label("sold"),
-                    func.sum(OrderItem.line_item_total_inclusive_gst).label("revenue")  # Changed from unit_price_inclusive_gst to line_item_total_inclusive_gst for total revenue
+            if sales_rollup_service.reads_enabled():
+                results = sales_rollup_service.top_products(merchant.id, limit=limit)
+            else:
+                # Join order_items and products
+                results = (
+                    db.session.query(
+                        OrderItem.product_id,
+                        Product.product_name.label("name"),
+                        func.sum(OrderItem.quantity).label("sold"),
+                        func.sum(OrderItem.line_item_total_inclusive_gst).label("revenue")  # Changed from unit_price_inclusive_gst to line_item_total_inclusive_gst for total revenue
+                    )
+                    .join(Product, Product.product_id == OrderItem.product_id)
+                    .filter(OrderItem.merchant_id == merchant.id)
+                    .group_by(OrderItem.product_id, Product.product_name)
+                    .order_by(func.sum(OrderItem.quantity).desc())
+                    .limit(limit)
+                    .all()
                 )
-                .join(Product, Product.product_id == OrderItem.product_id)
-                .filter(OrderItem.merchant_id == merchant.id)
-                .group_by(OrderItem.product_id, Product.product_name)
-                .order_by(func.sum(OrderItem.quantity).desc())
-                .limit(limit)
-                .all()
-            )
 
             top_products = []
             for idx, row in enumerate(results, start=1):
                 top_products.append({
                     "id": idx,
-                    "name": row.product_name,
+                    "name": row.name,
                     "sold": int(row.sold or 0),
                     "revenue": float(row.revenue or 0),
                 })
@@ -1,4 +1,3 @@
-import pandas as pd
 import json
 import io
 from datetime import datetime, date
@@ -9,10 +8,15 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
 from reportlab.lib.enums import TA_CENTER, TA_LEFT
-from flask import make_response
+from sqlalchemy import desc
 import logging
 from auth.models.models import MerchantProfile
+from common.exports import Table as ExportTable, XLSX_MIMETYPE, csv_stream, dict_table, export_response, query_rows, xlsx_file
 from controllers.merchant.product_stock_controller import MerchantProductStockController
+from models.brand import Brand
+from models.category import Category
+from models.product import Product
+from models.product_stock import ProductStock
 
 logger = logging.getLogger(__name__)
 
@@ -25,14 +29,25 @@ class MerchantInventoryExportController:
         """
         Export inventory report in specified format (pdf, excel, csv)
         """
+        return export_response(*MerchantInventoryExportController.render_inventory_report(
+            user_id, export_format, filters))
+
+    @staticmethod
+    def render_inventory_report(user_id, export_format='pdf', filters=None):
+        """
+        Build the inventory report. Returns (data, mimetype, filename); data is bytes,
+        a file or an iterator of chunks (common/exports.py).
+        """
         try:
             # Get merchant profile
             merchant = MerchantProfile.get_by_user_id(user_id)
             if not merchant:
                 raise Exception("Merchant profile not found")
 
-            # Gather all inventory data
-            report_data = MerchantInventoryExportController._gather_inventory_data(user_id, merchant, filters)
+            # Gather all inventory data. Only the PDF holds its products in memory
+            # (a 100-row preview); Excel and CSV stream every product from the database.
+            report_data = MerchantInventoryExportController._gather_inventory_data(
+                user_id, merchant, filters, pdf_preview=export_format.lower() == 'pdf')
             
             # Generate report based on format
             if export_format.lower() == 'pdf':
@@ -49,16 +64,17 @@ class MerchantInventoryExportController:
             raise e
 
     @staticmethod
-    def _gather_inventory_data(user_id, merchant, filters=None):
-        """Gather all necessary inventory data shown on the inventory page"""
+    def _gather_inventory_data(user_id, merchant, filters=None, pdf_preview=False):
+        """Gather all necessary inventory data shown on the inventory page.
+
+        'products' is a generator over every matching product, except for the PDF
+        preview, which gets a list of the first PDF_PRODUCT_LIMIT and 'product_total'.
+        """
         try:
             # Get inventory statistics
             inventory_stats = MerchantProductStockController.get_inventory_stats(user_id)
             
-            # Get products list with the same filters as the inventory page
-            products_data = MerchantInventoryExportController._get_all_products(user_id, filters)
-            
-            return {
+            report_data = {
                 'merchant_info': {
                     'business_name': merchant.business_name,
                     'merchant_id': merchant.id,
@@ -67,71 +83,71 @@ class MerchantInventoryExportController:
                     'generated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
                 },
                 'inventory_stats': inventory_stats,
-                'products': products_data
             }
+            query = MerchantInventoryExportController._products_query(merchant.id, filters)
+            if pdf_preview:
+                report_data['product_total'] = query.order_by(None).count()
+                report_data['products'] = [
+                    MerchantInventoryExportController._product_row(row)
+                    for row in query.limit(MerchantInventoryExportController.PDF_PRODUCT_LIMIT).all()
+                ]
+            else:
+                report_data['products'] = (
+                    MerchantInventoryExportController._product_row(row) for row in query_rows(query)
+                )
+            return report_data
             
         except Exception as e:
             logger.error(f"Error gathering inventory data: {str(e)}", exc_info=True)
             raise e
 
+    PDF_PRODUCT_LIMIT = 100
+    PRODUCT_COLUMNS = ['id', 'name', 'sku', 'category', 'brand', 'stock_qty', 'available',
+                       'low_stock_threshold', 'stock_status']
+
     @staticmethod
-    def _get_all_products(user_id, filters=None):
-        """Get all products for export (without pagination)"""
-        try:
-            # Use the existing product stock controller to get all products
-            # We'll get products in batches to avoid memory issues
-            all_products = []
-            page = 1
-            per_page = 100
-            
-            while True:
-                products_response = MerchantProductStockController.get_products(
-                    user_id=user_id,
-                    page=page,
-                    per_page=per_page,
-                    search=filters.get('search') if filters else None,
-                    category=filters.get('category') if filters else None,
-                    brand=filters.get('brand') if filters else None,
-                    stock_status=filters.get('stock_status') if filters else None
-                )
-                
-                if not products_response or not products_response.get('products'):
-                    break
-                    
-                products = products_response['products']
-                
-                # Transform product data for export
-                for product in products:
-                    stock_status = "Out of Stock"
-                    if product['stock_qty'] > product['low_stock_threshold']:
-                        stock_status = "In Stock"
-                    elif product['stock_qty'] > 0:
-                        stock_status = "Low Stock"
-                    
-                    all_products.append({
-                        'id': product['id'],
-                        'name': product['name'],
-                        'sku': product['sku'],
-                        'category': product['category']['name'] if product.get('category') else 'N/A',
-                        'brand': product['brand']['name'] if product.get('brand') else 'N/A',
-                        'stock_qty': product['stock_qty'],
-                        'available': product['available'],
-                        'low_stock_threshold': product['low_stock_threshold'],
-                        'stock_status': stock_status
-                    })
-                
-                # Check if we have more pages
-                pagination = products_response.get('pagination', {})
-                if page >= pagination.get('total_pages', 1):
-                    break
-                    
-                page += 1
-            
-            return all_products
-            
-        except Exception as e:
-            logger.error(f"Error getting all products: {str(e)}", exc_info=True)
-            raise e
+    def _products_query(merchant_id, filters=None):
+        """Every product matching the inventory page filters, as flat rows, newest first."""
+        filters = filters or {}
+        query = MerchantProductStockController.products_query(
+            merchant_id,
+            search=filters.get('search'),
+            category=filters.get('category'),
+            brand=filters.get('brand'),
+            stock_status=filters.get('stock_status'),
+        )
+        if not filters.get('stock_status'):
+            # products_query only joins stock when it filters on it.
+            query = query.outerjoin(ProductStock, ProductStock.product_id == Product.product_id)
+        return query.outerjoin(Category, Category.category_id == Product.category_id) \
+            .outerjoin(Brand, Brand.brand_id == Product.brand_id) \
+            .with_entities(
+                Product.product_id, Product.product_name, Product.sku,
+                Category.name.label('category_name'), Brand.name.label('brand_name'),
+                ProductStock.stock_qty, ProductStock.low_stock_threshold,
+            ).order_by(desc(Product.created_at))
+
+    @staticmethod
+    def _product_row(row):
+        """One product as exported."""
+        stock_qty = row.stock_qty or 0
+        low_stock_threshold = row.low_stock_threshold or 0
+        stock_status = "Out of Stock"
+        if stock_qty > low_stock_threshold:
+            stock_status = "In Stock"
+        elif stock_qty > 0:
+            stock_status = "Low Stock"
+        return {
+            'id': row.product_id,
+            'name': row.product_name,
+            'sku': row.sku,
+            'category': row.category_name or 'N/A',
+            'brand': row.brand_name or 'N/A',
+            'stock_qty': stock_qty,
+            'available': stock_qty,
+            'low_stock_threshold': low_stock_threshold,
+            'stock_status': stock_status
+        }
 
     @staticmethod
     def _generate_pdf_report(report_data, merchant):
@@ -279,8 +295,8 @@ class MerchantInventoryExportController:
                     ])
                 
                 # Add note if there are more products
-                if len(report_data['products']) > 100:
-                    note = f"Note: Showing first 100 products out of {len(report_data['products'])} total products. Download Excel/CSV for complete data."
+                if report_data['product_total'] > len(limited_products):
+                    note = f"Note: Showing first 100 products out of {report_data['product_total']} total products. Download Excel/CSV for complete data."
                     content.append(Paragraph(note, section_style))
                     content.append(Spacer(1, 10))
                 
@@ -366,66 +382,49 @@ class MerchantInventoryExportController:
             pdf_data = buffer.getvalue()
             buffer.close()
             
-            # Create response
-            response = make_response(pdf_data)
-            response.headers['Content-Type'] = 'application/pdf'
-            response.headers['Content-Disposition'] = f'attachment; filename=inventory_report_{merchant.id}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
-            
-            return response
+            return pdf_data, 'application/pdf', f'inventory_report_{merchant.id}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
             
         except Exception as e:
             logger.error(f"Error generating PDF inventory report: {str(e)}", exc_info=True)
             raise e
 
+    @staticmethod
+    def _summarised_products(products, summaries):
+        """Pass products through, totalling stock and counts per category and per status."""
+        for product in products:
+            for key, totals in summaries.items():
+                entry = totals.setdefault(product[key], [0, 0, 0])
+                entry[0] += product['stock_qty'] or 0
+                entry[1] += product['available'] or 0
+                entry[2] += 1
+            yield [product[column] for column in MerchantInventoryExportController.PRODUCT_COLUMNS]
+
+    @staticmethod
+    def _summary_rows(totals):
+        # Evaluated lazily: runs after the product sheet has filled `totals`.
+        for key in sorted(totals):
+            yield [key] + totals[key]
+
     @staticmethod
     def _generate_excel_report(report_data, merchant):
-        """Generate Excel inventory report"""
+        """Generate Excel inventory report (write-only workbook, products streamed)"""
         try:
-            # Create Excel buffer
-            buffer = io.BytesIO()
-            
-            with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-                # Merchant Info Sheet
-                merchant_df = pd.DataFrame([report_data['merchant_info']])
-                merchant_df.to_excel(writer, sheet_name='Merchant Info', index=False)
-                
-                # Inventory Statistics Sheet
-                if report_data['inventory_stats']:
-                    stats_df = pd.DataFrame([report_data['inventory_stats']])
-                    stats_df.to_excel(writer, sheet_name='Inventory Statistics', index=False)
-                
-                # Products Sheet
-                if report_data['products']:
-                    products_df = pd.DataFrame(report_data['products'])
-                    products_df.to_excel(writer, sheet_name='Product Inventory', index=False)
-                
-                # Summary by Category Sheet
-                if report_data['products']:
-                    category_summary = pd.DataFrame(report_data['products']).groupby('category').agg({
-                        'stock_qty': 'sum',
-                        'available': 'sum',
-                        'id': 'count'
-                    }).rename(columns={'id': 'product_count'}).reset_index()
-                    category_summary.to_excel(writer, sheet_name='Category Summary', index=False)
-                
-                # Summary by Stock Status Sheet
-                if report_data['products']:
-                    status_summary = pd.DataFrame(report_data['products']).groupby('stock_status').agg({
-                        'stock_qty': 'sum',
-                        'available': 'sum',
-                        'id': 'count'
-                    }).rename(columns={'id': 'product_count'}).reset_index()
-                    status_summary.to_excel(writer, sheet_name='Stock Status Summary', index=False)
-            
-            excel_data = buffer.getvalue()
-            buffer.close()
-            
-            # Create response
-            response = make_response(excel_data)
-            response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-            response.headers['Content-Disposition'] = f'attachment; filename=inventory_report_{merchant.id}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-            
-            return response
+            summaries = {'category': {}, 'stock_status': {}}
+            tables = [dict_table('Merchant Info', [report_data['merchant_info']])]
+            if report_data['inventory_stats']:
+                tables.append(dict_table('Inventory Statistics', [report_data['inventory_stats']]))
+            tables += [
+                ExportTable('Product Inventory', MerchantInventoryExportController.PRODUCT_COLUMNS,
+                      MerchantInventoryExportController._summarised_products(report_data['products'], summaries)),
+                ExportTable('Category Summary', ['category', 'stock_qty', 'available', 'product_count'],
+                      MerchantInventoryExportController._summary_rows(summaries['category'])),
+                ExportTable('Stock Status Summary', ['stock_status', 'stock_qty', 'available', 'product_count'],
+                      MerchantInventoryExportController._summary_rows(summaries['stock_status'])),
+            ]
+            return (
+                xlsx_file(tables), XLSX_MIMETYPE,
+                f'inventory_report_{merchant.id}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx',
+            )
             
         except Exception as e:
             logger.error(f"Error generating Excel inventory report: {str(e)}", exc_info=True)
@@ -433,38 +432,24 @@ class MerchantInventoryExportController:
 
     @staticmethod
     def _generate_csv_report(report_data, merchant):
-        """Generate CSV inventory report (combined data)"""
+        """Generate CSV inventory report (combined data, streamed)"""
         try:
-            # Create CSV buffer
-            buffer = io.StringIO()
-            
-            # Write header
-            buffer.write(f"Inventory Report - {report_data['merchant_info']['business_name']}\n")
-            buffer.write(f"Generated: {report_data['merchant_info']['generated_at']}\n\n")
-            
-            # Inventory Statistics
+            tables = []
             if report_data['inventory_stats']:
-                buffer.write("Inventory Statistics\n")
-                stats_df = pd.DataFrame([report_data['inventory_stats']])
-                stats_df.to_csv(buffer, index=False)
-                buffer.write("\n")
-            
-            # Products Inventory
-            if report_data['products']:
-                buffer.write("Product Inventory\n")
-                products_df = pd.DataFrame(report_data['products'])
-                products_df.to_csv(buffer, index=False)
-                buffer.write("\n")
-            
-            csv_data = buffer.getvalue()
-            buffer.close()
-            
-            # Create response
-            response = make_response(csv_data)
-            response.headers['Content-Type'] = 'text/csv'
-            response.headers['Content-Disposition'] = f'attachment; filename=inventory_report_{merchant.id}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
-            
-            return response
+                tables.append(dict_table('Inventory Statistics', [report_data['inventory_stats']]))
+            tables.append(ExportTable(
+                'Product Inventory', MerchantInventoryExportController.PRODUCT_COLUMNS,
+                ([product[column] for column in MerchantInventoryExportController.PRODUCT_COLUMNS]
+                 for product in report_data['products'])))
+            preamble = (
+                f"Inventory Report - {report_data['merchant_info']['business_name']}",
+                f"Generated: {report_data['merchant_info']['generated_at']}",
+                "",
+            )
+            return (
+                csv_stream(tables, preamble), 'text/csv',
+                f'inventory_report_{merchant.id}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv',
+            )
             
         except Exception as e:
             logger.error(f"Error generating CSV inventory report: {str(e)}", exc_info=True)
@@ -114,19 +114,12 @@ def _find_ffprobe():
     """
     Locate ffprobe.
 
-    shutil.which alone is not enough: under gunicorn the service PATH is often
-    just the virtualenv bin directory, so a perfectly good /usr/bin/ffprobe is
-    invisible to it. reels_s3_service hits the same problem and falls back to
-    explicit paths; do the same here rather than silently giving up on duration
-    verification in production.
+    Resolved once per process by services/media_tools, which also looks outside
+    PATH: under gunicorn the service PATH is often just the virtualenv bin
+    directory, so a perfectly good /usr/bin/ffprobe is invisible to shutil.which.
     """
-    found = shutil.which('ffprobe')
-    if found:
-        return found
-    for path in ('/usr/bin/ffprobe', '/usr/local/bin/ffprobe', '/bin/ffprobe'):
-        if os.path.exists(path) and os.access(path, os.X_OK):
-            return path
-    return None
+    from services import media_tools
+    return media_tools.ffprobe_path()
 
 
 def _probe_duration_and_resolution(file):
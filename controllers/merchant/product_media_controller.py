@@ -69,7 +69,8 @@ class MerchantProductMediaController:
                 url=data['url'],
                 type=media_type_enum,
                 sort_order=sort_order,
-                public_id=cloudinary_public_id 
+                public_id=cloudinary_public_id,
+                derivatives=data.get('derivatives')
             )
             db.session.add(pm)
             db.session.commit()
@@ -168,6 +168,51 @@ class MerchantProductStockController:
             logger.error(f"Error getting inventory stats: {e}")
             raise
 
+    @staticmethod
+    def products_query(merchant_id, search=None, category=None, brand=None, stock_status=None):
+        """The merchant's products filtered like the inventory page (shared with the export)."""
+        query = Product.query.filter_by(merchant_id=merchant_id)
+        
+        if search:
+            search_term = f"%{search}%"
+            query = query.filter(or_(
+                Product.product_name.ilike(search_term),
+                Product.sku.ilike(search_term)
+            ))
+        
+        if category:
+            # Handle both category ID and slug
+            try:
+                category_id = int(category)
+                query = query.filter(Product.category_id == category_id)
+            except ValueError:
+                # If category is not a number, treat it as a slug
+                category_obj = Category.query.filter_by(slug=category).first()
+                if category_obj:
+                    query = query.filter(Product.category_id == category_obj.category_id)
+        
+        if brand:
+            # Handle both brand ID and slug
+            try:
+                brand_id = int(brand)
+                query = query.filter(Product.brand_id == brand_id)
+            except ValueError:
+                # If brand is not a number, treat it as a slug
+                brand_obj = Brand.query.filter_by(slug=brand).first()
+                if brand_obj:
+                    query = query.filter(Product.brand_id == brand_obj.brand_id)
+        
+        if stock_status:
+            query = query.join(ProductStock)
+            if stock_status == 'in_stock':
+                query = query.filter(ProductStock.stock_qty > 0)
+            elif stock_status == 'low_stock':
+                query = query.filter(ProductStock.stock_qty <= ProductStock.low_stock_threshold)
+                query = query.filter(ProductStock.stock_qty > 0)
+            elif stock_status == 'out_of_stock':
+                query = query.filter(ProductStock.stock_qty == 0)
+        return query
+
     @staticmethod
     def get_products(user_id, page=1, per_page=10, search=None, category=None, brand=None, stock_status=None):
         try:
@@ -179,46 +224,8 @@ class MerchantProductStockController:
             merchant_id = merchant.id
             logger.info(f"Fetching products for merchant: {merchant.business_name} (ID: {merchant_id})")
 
-            query = Product.query.filter_by(merchant_id=merchant_id)
-            
-            if search:
-                search_term = f"%{search}%"
-                query = query.filter(or_(
-                    Product.product_name.ilike(search_term),
-                    Product.sku.ilike(search_term)
-                ))
-            
-            if category:
-                # Handle both category ID and slug
-                try:
-                    category_id = int(category)
-                    query = query.filter(Product.category_id == category_id)
-                except ValueError:
-                    # If category is not a number, treat it as a slug
-                    category_obj = Category.query.filter_by(slug=category).first()
-                    if category_obj:
-                        query = query.filter(Product.category_id == category_obj.category_id)
-            
-            if brand:
-                # Handle both brand ID and slug
-                try:
-                    brand_id = int(brand)
-                    query = query.filter(Product.brand_id == brand_id)
-                except ValueError:
-                    # If brand is not a number, treat it as a slug
-                    brand_obj = Brand.query.filter_by(slug=brand).first()
-                    if brand_obj:
-                        query = query.filter(Product.brand_id == brand_obj.brand_id)
-            
-            if stock_status:
-                query = query.join(ProductStock)
-                if stock_status == 'in_stock':
-                    query = query.filter(ProductStock.stock_qty > 0)
-                elif stock_status == 'low_stock':
-                    query = query.filter(ProductStock.stock_qty <= ProductStock.low_stock_threshold)
-                    query = query.filter(ProductStock.stock_qty > 0)
-                elif stock_status == 'out_of_stock':
-                    query = query.filter(ProductStock.stock_qty == 0)
+            query = MerchantProductStockController.products_query(
+                merchant_id, search=search, category=category, brand=brand, stock_status=stock_status)
             
             # Get total count before pagination
             total = query.count()
@@ -11,7 +11,9 @@ from models.recently_viewed import RecentlyViewed
 from auth.models.models import MerchantProfile, User
 from models.enums import OrderStatusEnum, PaymentStatusEnum
 import calendar
+from types import SimpleNamespace
 from models.wishlist_item import WishlistItem
+from services import sales_rollup_service
 
 logger = logging.getLogger(__name__)
 
@@ -34,26 +36,32 @@ class MerchantReportController:
                 year = today.year if (today.month - i) > 0 else today.year - 1
                 last_5_months.append((month, year))
 
-            rows = (
-                db.session.query(
-                    extract('month', Order.order_date).label('month'),
-                    extract('year', Order.order_date).label('year'),
-                    func.sum(OrderItem.quantity).label('units'),
-                    func.sum(OrderItem.line_item_total_inclusive_gst).label('revenue')
-                )
-                .join(OrderItem, Order.order_id == OrderItem.order_id)
-                .filter(
-                    OrderItem.merchant_id == merchant.id,
-                    # Order.payment_status == PaymentStatusEnum.SUCCESSFUL,
-                    # Order.order_status == OrderStatusEnum.DELIVERED,
-                    tuple_(
-                        extract('month', Order.order_date),
-                        extract('year', Order.order_date)
-                    ).in_(last_5_months)
+            if sales_rollup_service.reads_enabled():
+                rows = [
+                    SimpleNamespace(month=r.month, year=r.year, units=r.units, revenue=r.sales)
+                    for r in sales_rollup_service.monthly_totals(merchant.id, last_5_months)
+                ]
+            else:
+                rows = (
+                    db.session.query(
+                        extract('month', Order.order_date).label('month'),
+                        extract('year', Order.order_date).label('year'),
+                        func.sum(OrderItem.quantity).label('units'),
+                        func.sum(OrderItem.line_item_total_inclusive_gst).label('revenue')
+                    )
+                    .join(OrderItem, Order.order_id == OrderItem.order_id)
+                    .filter(
+                        OrderItem.merchant_id == merchant.id,
+                        # Order.payment_status == PaymentStatusEnum.SUCCESSFUL,
+                        # Order.order_status == OrderStatusEnum.DELIVERED,
+                        tuple_(
+                            extract('month', Order.order_date),
+                            extract('year', Order.order_date)
+                        ).in_(last_5_months)
+                    )
+                    .group_by(extract('month', Order.order_date), extract('year', Order.order_date))
+                    .all()
                 )
-                .group_by(extract('month', Order.order_date), extract('year', Order.order_date))
-                .all()
-            )
 
             # Build results map with default values
             result_map = {
@@ -92,64 +100,72 @@ class MerchantReportController:
             if not merchant:
                 raise Exception("Merchant profile not found")
 
-            today = date.today()
-            last_5_months = []
-            for i in range(4, -1, -1):
-                month = (today.month - i - 1) % 12 + 1
-                year = today.year if (today.month - i) > 0 else today.year - 1
-                last_5_months.append((month, year))
-
-            # Modified query to include year in SELECT and GROUP BY
-            rows = (
-                db.session.query(
-                    extract('month', Order.order_date).label('month'),
-                    extract('year', Order.order_date).label('year'),  # ADDED
-                    Product.product_name,
-                    Category.name.label('category'),
-                    Product.selling_price,
-                    func.sum(OrderItem.quantity).label('quantity'),
-                    func.sum(OrderItem.line_item_total_inclusive_gst).label('revenue')
-                )
-                .join(OrderItem, Order.order_id == OrderItem.order_id)
-                .join(Product, Product.product_id == OrderItem.product_id)
-                .join(Category, Category.category_id == Product.category_id)
-                .filter(
-                    OrderItem.merchant_id == merchant.id,
-                    # Order.payment_status == PaymentStatusEnum.SUCCESSFUL,
-                    # Order.order_status == OrderStatusEnum.DELIVERED,
-                    tuple_(
-                        extract('month', Order.order_date),
-                        extract('year', Order.order_date)
-                    ).in_(last_5_months)
-                )
-                .group_by(
-                    extract('year', Order.order_date),  # ADDED
-                    extract('month', Order.order_date),
-                    Product.product_name,
-                    Category.name,
-                    Product.selling_price
-                )
-                .order_by('year', 'month')  # Now valid
-                .all()
-            )
-
-            detailed_sales = []
-            for row in rows:
-                detailed_sales.append({
-                    "month": calendar.month_abbr[int(row.month)],
-                    "product": row.product_name,
-                    "category": row.category,
-                    "price": float(row.selling_price),
-                    "quantity": int(row.quantity),
-                    "revenue": float(row.revenue)
-                })
-
-            return detailed_sales
+            query = MerchantReportController.detailed_monthly_sales_query(merchant.id)
+            return [MerchantReportController.detailed_sales_row(row) for row in query.all()]
 
         except Exception as e:
             logger.error(f"Error fetching detailed monthly sales: {str(e)}", exc_info=True)
             raise e
 
+    # Keys of detailed_sales_row, in order.
+    DETAILED_SALES_COLUMNS = ['month', 'product', 'category', 'price', 'quantity', 'revenue']
+
+    @staticmethod
+    def detailed_monthly_sales_query(merchant_id):
+        """Per month and product sales for the last 5 months; the export streams it."""
+        today = date.today()
+        last_5_months = []
+        for i in range(4, -1, -1):
+            month = (today.month - i - 1) % 12 + 1
+            year = today.year if (today.month - i) > 0 else today.year - 1
+            last_5_months.append((month, year))
+
+        # Modified query to include year in SELECT and GROUP BY
+        if sales_rollup_service.reads_enabled():
+            return sales_rollup_service.monthly_product_breakdown_query(merchant_id, last_5_months)
+        return (
+            db.session.query(
+                extract('month', Order.order_date).label('month'),
+                extract('year', Order.order_date).label('year'),  # ADDED
+                Product.product_name,
+                Category.name.label('category'),
+                Product.selling_price,
+                func.sum(OrderItem.quantity).label('quantity'),
+                func.sum(OrderItem.line_item_total_inclusive_gst).label('revenue')
+            )
+            .join(OrderItem, Order.order_id == OrderItem.order_id)
+            .join(Product, Product.product_id == OrderItem.product_id)
+            .join(Category, Category.category_id == Product.category_id)
+            .filter(
+                OrderItem.merchant_id == merchant_id,
+                # Order.payment_status == PaymentStatusEnum.SUCCESSFUL,
+                # Order.order_status == OrderStatusEnum.DELIVERED,
+                tuple_(
+                    extract('month', Order.order_date),
+                    extract('year', Order.order_date)
+                ).in_(last_5_months)
+            )
+            .group_by(
+                extract('year', Order.order_date),  # ADDED
+                extract('month', Order.order_date),
+                Product.product_name,
+                Category.name,
+                Product.selling_price
+            )
+            .order_by('year', 'month')  # Now valid
+        )
+
+    @staticmethod
+    def detailed_sales_row(row):
+        return {
+            "month": calendar.month_abbr[int(row.month)],
+            "product": row.product_name,
+            "category": row.category,
+            "price": float(row.selling_price),
+            "quantity": int(row.quantity),
+            "revenue": float(row.revenue)
+        }
+
 
 
     # For getting product performance over the last 3 months
@@ -174,24 +190,27 @@ class MerchantReportController:
             start_date = date(year, month, 1)
             
             # Query top performing products by revenue
-            products = (
-                db.session.query(
-                    Product.product_name.label('name'),
-                    func.sum(OrderItem.line_item_total_inclusive_gst).label('revenue')
-                )
-                .join(OrderItem, OrderItem.product_id == Product.product_id)
-                .join(Order, Order.order_id == OrderItem.order_id)
-                .filter(
-                    OrderItem.merchant_id == merchant.id,
-                    # Order.payment_status == PaymentStatusEnum.SUCCESSFUL,
-                    # Order.order_status == OrderStatusEnum.DELIVERED,
-                    Order.order_date >= start_date
+            if sales_rollup_service.reads_enabled():
+                products = sales_rollup_service.top_products(merchant.id, since=start_date, limit=limit, by='revenue')
+            else:
+                products = (
+                    db.session.query(
+                        Product.product_name.label('name'),
+                        func.sum(OrderItem.line_item_total_inclusive_gst).label('revenue')
+                    )
+                    .join(OrderItem, OrderItem.product_id == Product.product_id)
+                    .join(Order, Order.order_id == OrderItem.order_id)
+                    .filter(
+                        OrderItem.merchant_id == merchant.id,
+                        # Order.payment_status == PaymentStatusEnum.SUCCESSFUL,
+                        # Order.order_status == OrderStatusEnum.DELIVERED,
+                        Order.order_date >= start_date
+                    )
+                    .group_by(Product.product_name)
+                    .order_by(func.sum(OrderItem.line_item_total_inclusive_gst).desc())
+                    .limit(limit)
+                    .all()
                 )
-                .group_by(Product.product_name)
-                .order_by(func.sum(OrderItem.line_item_total_inclusive_gst).desc())
-                .limit(limit)
-                .all()
-            )
 
             # Format results
             return [{
@@ -225,24 +244,27 @@ class MerchantReportController:
             start_date = date(year, month, 1)
             
             # Query category revenue
-            category_revenues = (
-                db.session.query(
-                    Category.name.label('category'),
-                    func.sum(OrderItem.line_item_total_inclusive_gst).label('revenue')
-                )
-                .join(Product, Product.category_id == Category.category_id)
-                .join(OrderItem, OrderItem.product_id == Product.product_id)
-                .join(Order, Order.order_id == OrderItem.order_id)
-                .filter(
-                    OrderItem.merchant_id == merchant.id,
-                    # Order.payment_status == PaymentStatusEnum.SUCCESSFUL,
-                    # Order.order_status == OrderStatusEnum.DELIVERED,
-                    Order.order_date >= start_date
+            if sales_rollup_service.reads_enabled():
+                category_revenues = sales_rollup_service.category_revenue(merchant.id, start_date)
+            else:
+                category_revenues = (
+                    db.session.query(
+                        Category.name.label('category'),
+                        func.sum(OrderItem.line_item_total_inclusive_gst).label('revenue')
+                    )
+                    .join(Product, Product.category_id == Category.category_id)
+                    .join(OrderItem, OrderItem.product_id == Product.product_id)
+                    .join(Order, Order.order_id == OrderItem.order_id)
+                    .filter(
+                        OrderItem.merchant_id == merchant.id,
+                        # Order.payment_status == PaymentStatusEnum.SUCCESSFUL,
+                        # Order.order_status == OrderStatusEnum.DELIVERED,
+                        Order.order_date >= start_date
+                    )
+                    .group_by(Category.name)
+                    .order_by(func.sum(OrderItem.line_item_total_inclusive_gst).desc())
+                    .all()
                 )
-                .group_by(Category.name)
-                .order_by(func.sum(OrderItem.line_item_total_inclusive_gst).desc())
-                .all()
-            )
 
             # Calculate total revenue
             total_revenue = sum(revenue for _, revenue in category_revenues)
@@ -324,30 +346,40 @@ class MerchantReportController:
                 ) \
                 .scalar() or 0
             
-            # 2. Products Sold - current month
-            products_sold = db.session.query(func.sum(OrderItem.quantity)) \
-                .join(Order, Order.order_id == OrderItem.order_id) \
-                .filter(
-                    OrderItem.merchant_id == merchant.id,
-                    # Order.payment_status == PaymentStatusEnum.SUCCESSFUL,
-                    # Order.order_status == OrderStatusEnum.DELIVERED,
-                    extract('year', Order.order_date) == current_year,
-                    extract('month', Order.order_date) == current_month
-                ) \
-                .scalar() or 0
-            
-            # Products Sold - previous month
-            products_sold_prev = db.session.query(func.sum(OrderItem.quantity)) \
-                .join(Order, Order.order_id == OrderItem.order_id) \
-                .filter(
-                    OrderItem.merchant_id == merchant.id,
-                    # Order.payment_status == PaymentStatusEnum.SUCCESSFUL,
-                    # Order.order_status == OrderStatusEnum.DELIVERED,
-                    extract('year', Order.order_date) == prev_year,
-                    extract('month', Order.order_date) == prev_month
-                ) \
-                .scalar() or 0
+            # 2. Products Sold - current and previous month
+            if sales_rollup_service.reads_enabled():
+                units = {
+                    (int(r.month), int(r.year)): int(r.units or 0)
+                    for r in sales_rollup_service.monthly_totals(
+                        merchant.id, [(current_month, current_year), (prev_month, prev_year)]
+                    )
+                }
+                products_sold = units.get((current_month, current_year), 0)
+                products_sold_prev = units.get((prev_month, prev_year), 0)
+            else:
+                products_sold = db.session.query(func.sum(OrderItem.quantity)) \
+                    .join(Order, Order.order_id == OrderItem.order_id) \
+                    .filter(
+                        OrderItem.merchant_id == merchant.id,
+                        # Order.payment_status == PaymentStatusEnum.SUCCESSFUL,
+                        # Order.order_status == OrderStatusEnum.DELIVERED,
+                        extract('year', Order.order_date) == current_year,
+                        extract('month', Order.order_date) == current_month
+                    ) \
+                    .scalar() or 0
             
+                # Products Sold - previous month
+                products_sold_prev = db.session.query(func.sum(OrderItem.quantity)) \
+                    .join(Order, Order.order_id == OrderItem.order_id) \
+                    .filter(
+                        OrderItem.merchant_id == merchant.id,
+                        # Order.payment_status == PaymentStatusEnum.SUCCESSFUL,
+                        # Order.order_status == OrderStatusEnum.DELIVERED,
+                        extract('year', Order.order_date) == prev_year,
+                        extract('month', Order.order_date) == prev_month
+                    ) \
+                    .scalar() or 0
+
             # 3. Wishlisted Products (current month, not deleted)
             wishlisted_products = db.session.query(func.count(db.distinct(WishlistItem.product_id))) \
                 .join(Product, WishlistItem.product_id == Product.product_id) \
@@ -446,24 +478,27 @@ class MerchantReportController:
             date_range.reverse()  # Oldest first
             
             # Query daily sales data
-            sales_data = (
-                db.session.query(
-                    func.date(Order.order_date).label('date'),
-                    func.sum(OrderItem.quantity).label('quantity')
-                )
-                .join(OrderItem, Order.order_id == OrderItem.order_id)
-                .filter(
-                    OrderItem.merchant_id == merchant.id,
-                    # Order.payment_status == PaymentStatusEnum.SUCCESSFUL,
-                    # Order.order_status == OrderStatusEnum.DELIVERED,
-                    func.date(Order.order_date).in_(date_range)
+            if sales_rollup_service.reads_enabled():
+                sales_dict = sales_rollup_service.daily_units(merchant.id, date_range[0], date_range[-1])
+            else:
+                sales_data = (
+                    db.session.query(
+                        func.date(Order.order_date).label('date'),
+                        func.sum(OrderItem.quantity).label('quantity')
+                    )
+                    .join(OrderItem, Order.order_id == OrderItem.order_id)
+                    .filter(
+                        OrderItem.merchant_id == merchant.id,
+                        # Order.payment_status == PaymentStatusEnum.SUCCESSFUL,
+                        # Order.order_status == OrderStatusEnum.DELIVERED,
+                        func.date(Order.order_date).in_(date_range)
+                    )
+                    .group_by(func.date(Order.order_date))
+                    .all()
                 )
-                .group_by(func.date(Order.order_date))
-                .all()
-            )
             
-            # Convert to dictionary for easy lookup
-            sales_dict = {row.date: row.quantity for row in sales_data}
+                # Convert to dictionary for easy lookup
+                sales_dict = {row.date: row.quantity for row in sales_data}
             
             # Placeholder for wishlist data
             wishlist_dict = {}
@@ -523,25 +558,30 @@ class MerchantReportController:
                     start_date = date(prev_year, prev_month, last_day)
             
             # Query top selling products
-            products = (
-                db.session.query(
-                    Product.product_name.label('name'),
-                    func.sum(OrderItem.quantity).label('sold'),
-                    func.sum(OrderItem.line_item_total_inclusive_gst * OrderItem.quantity).label('revenue')
-                )
-                .join(OrderItem, OrderItem.product_id == Product.product_id)
-                .join(Order, Order.order_id == OrderItem.order_id)
-                .filter(
-                    OrderItem.merchant_id == merchant.id,
-                    # Order.payment_status == PaymentStatusEnum.SUCCESSFUL,
-                    # Order.order_status == OrderStatusEnum.DELIVERED,
-                    Order.order_date >= start_date
+            if sales_rollup_service.reads_enabled():
+                # Revenue here is the sum of line totals; the live query below multiplies
+                # the line total by quantity again, which overstates multi-unit lines.
+                products = sales_rollup_service.top_products(merchant.id, since=start_date, limit=limit)
+            else:
+                products = (
+                    db.session.query(
+                        Product.product_name.label('name'),
+                        func.sum(OrderItem.quantity).label('sold'),
+                        func.sum(OrderItem.line_item_total_inclusive_gst * OrderItem.quantity).label('revenue')
+                    )
+                    .join(OrderItem, OrderItem.product_id == Product.product_id)
+                    .join(Order, Order.order_id == OrderItem.order_id)
+                    .filter(
+                        OrderItem.merchant_id == merchant.id,
+                        # Order.payment_status == PaymentStatusEnum.SUCCESSFUL,
+                        # Order.order_status == OrderStatusEnum.DELIVERED,
+                        Order.order_date >= start_date
+                    )
+                    .group_by(Product.product_name)
+                    .order_by(func.sum(OrderItem.quantity).desc())
+                    .limit(limit)
+                    .all()
                 )
-                .group_by(Product.product_name)
-                .order_by(func.sum(OrderItem.quantity).desc())
-                .limit(limit)
-                .all()
-            )
             
             # Format results
             result = []
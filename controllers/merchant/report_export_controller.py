@@ -1,4 +1,3 @@
-import pandas as pd
 import json
 import io
 from datetime import datetime, date
@@ -9,9 +8,9 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
 from reportlab.lib.enums import TA_CENTER, TA_LEFT
-from flask import make_response
 import logging
 from auth.models.models import MerchantProfile
+from common.exports import Table as ExportTable, XLSX_MIMETYPE, csv_stream, dict_table, export_response, query_rows, xlsx_file
 from controllers.merchant.report_controller import MerchantReportController
 
 logger = logging.getLogger(__name__)
@@ -25,6 +24,14 @@ class MerchantReportExportController:
         """
         Export sales report in specified format (pdf, excel, csv)
         """
+        return export_response(*MerchantReportExportController.render_sales_report(user_id, export_format))
+
+    @staticmethod
+    def render_sales_report(user_id, export_format='pdf'):
+        """
+        Build the sales report. Returns (data, mimetype, filename); data is bytes,
+        a file or an iterator of chunks (common/exports.py).
+        """
         try:
             # Get merchant profile
             merchant = MerchantProfile.get_by_user_id(user_id)
@@ -55,8 +62,9 @@ class MerchantReportExportController:
             # Get monthly sales data (shown in monthly chart)
             monthly_sales = MerchantReportController.get_monthly_sales_analytics(user_id)
             
-            # Get detailed sales data (shown in detailed table)
-            detailed_sales = MerchantReportController.get_detailed_monthly_sales(user_id)
+            # Detailed sales (shown in detailed table) can run to every product in every
+            # month, so the exports stream it from the query instead of a list.
+            detailed_sales_query = MerchantReportController.detailed_monthly_sales_query(merchant.id)
             
             # Get product performance (shown in bar chart)
             product_performance = MerchantReportController.get_product_performance(user_id)
@@ -73,7 +81,7 @@ class MerchantReportExportController:
                     'generated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
                 },
                 'monthly_sales': monthly_sales,
-                'detailed_sales': detailed_sales,
+                'detailed_sales_query': detailed_sales_query,
                 'product_performance': product_performance,
                 'category_revenue': category_revenue
             }
@@ -82,6 +90,16 @@ class MerchantReportExportController:
             logger.error(f"Error gathering report data: {str(e)}", exc_info=True)
             raise e
 
+    @staticmethod
+    def _detailed_sales_table(name, report_data):
+        columns = MerchantReportController.DETAILED_SALES_COLUMNS
+        rows = (
+            [record[key] for key in columns]
+            for record in map(MerchantReportController.detailed_sales_row,
+                              query_rows(report_data['detailed_sales_query']))
+        )
+        return ExportTable(name, columns, rows)
+
     @staticmethod
     def _generate_pdf_report(report_data, merchant):
         """Generate PDF report"""
@@ -217,12 +235,7 @@ class MerchantReportExportController:
             pdf_data = buffer.getvalue()
             buffer.close()
             
-            # Create response
-            response = make_response(pdf_data)
-            response.headers['Content-Type'] = 'application/pdf'
-            response.headers['Content-Disposition'] = f'attachment; filename=sales_report_{merchant.id}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
-            
-            return response
+            return pdf_data, 'application/pdf', f'sales_report_{merchant.id}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
             
         except Exception as e:
             logger.error(f"Error generating PDF report: {str(e)}", exc_info=True)
@@ -232,43 +245,19 @@ class MerchantReportExportController:
     def _generate_excel_report(report_data, merchant):
         """Generate Excel report"""
         try:
-            # Create Excel buffer
-            buffer = io.BytesIO()
-            
-            with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-                # Merchant Info Sheet
-                merchant_df = pd.DataFrame([report_data['merchant_info']])
-                merchant_df.to_excel(writer, sheet_name='Merchant Info', index=False)
-                
-                # Monthly Sales Sheet
-                if report_data['monthly_sales']:
-                    monthly_df = pd.DataFrame(report_data['monthly_sales'])
-                    monthly_df.to_excel(writer, sheet_name='Monthly Sales', index=False)
-                
-                # Detailed Sales Sheet
-                if report_data['detailed_sales']:
-                    detailed_df = pd.DataFrame(report_data['detailed_sales'])
-                    detailed_df.to_excel(writer, sheet_name='Detailed Sales', index=False)
-                
-                # Product Performance Sheet
-                if report_data['product_performance']:
-                    products_df = pd.DataFrame(report_data['product_performance'])
-                    products_df.to_excel(writer, sheet_name='Product Performance', index=False)
-                
-                # Category Revenue Sheet
-                if report_data['category_revenue']:
-                    category_df = pd.DataFrame(report_data['category_revenue'])
-                    category_df.to_excel(writer, sheet_name='Category Revenue', index=False)
-            
-            excel_data = buffer.getvalue()
-            buffer.close()
-            
-            # Create response
-            response = make_response(excel_data)
-            response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-            response.headers['Content-Disposition'] = f'attachment; filename=sales_report_{merchant.id}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-            
-            return response
+            tables = [dict_table('Merchant Info', [report_data['merchant_info']])]
+            if report_data['monthly_sales']:
+                tables.append(dict_table('Monthly Sales', report_data['monthly_sales']))
+            tables.append(MerchantReportExportController._detailed_sales_table('Detailed Sales', report_data))
+            for key, sheet_name in (('product_performance', 'Product Performance'),
+                                    ('category_revenue', 'Category Revenue')):
+                if report_data[key]:
+                    tables.append(dict_table(sheet_name, report_data[key]))
+
+            return (
+                xlsx_file(tables), XLSX_MIMETYPE,
+                f'sales_report_{merchant.id}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx',
+            )
             
         except Exception as e:
             logger.error(f"Error generating Excel report: {str(e)}", exc_info=True)
@@ -278,49 +267,23 @@ class MerchantReportExportController:
     def _generate_csv_report(report_data, merchant):
         """Generate CSV report (combined data)"""
         try:
-            # Create CSV buffer
-            buffer = io.StringIO()
-            
-            # Write header
-            buffer.write(f"Sales Performance Report - {report_data['merchant_info']['business_name']}\n")
-            buffer.write(f"Generated: {report_data['merchant_info']['generated_at']}\n\n")
-            
-            # Monthly Sales
-            if report_data['monthly_sales']:
-                buffer.write("Monthly Sales\n")
-                monthly_df = pd.DataFrame(report_data['monthly_sales'])
-                monthly_df.to_csv(buffer, index=False)
-                buffer.write("\n")
-            
-            # Product Performance
-            if report_data['product_performance']:
-                buffer.write("Product Performance\n")
-                products_df = pd.DataFrame(report_data['product_performance'])
-                products_df.to_csv(buffer, index=False)
-                buffer.write("\n")
-                
-            # Category Revenue
-            if report_data['category_revenue']:
-                buffer.write("Revenue by Category\n")
-                category_df = pd.DataFrame(report_data['category_revenue'])
-                category_df.to_csv(buffer, index=False)
-                buffer.write("\n")
-            
-            # Detailed Sales
-            if report_data['detailed_sales']:
-                buffer.write("Detailed Sales Data\n")
-                detailed_df = pd.DataFrame(report_data['detailed_sales'])
-                detailed_df.to_csv(buffer, index=False)
-            
-            csv_data = buffer.getvalue()
-            buffer.close()
-            
-            # Create response
-            response = make_response(csv_data)
-            response.headers['Content-Type'] = 'text/csv'
-            response.headers['Content-Disposition'] = f'attachment; filename=sales_report_{merchant.id}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
-            
-            return response
+            tables = [
+                dict_table(title, report_data[key])
+                for key, title in (('monthly_sales', 'Monthly Sales'),
+                                   ('product_performance', 'Product Performance'),
+                                   ('category_revenue', 'Revenue by Category'))
+                if report_data[key]
+            ]
+            tables.append(MerchantReportExportController._detailed_sales_table('Detailed Sales Data', report_data))
+            preamble = (
+                f"Sales Performance Report - {report_data['merchant_info']['business_name']}",
+                f"Generated: {report_data['merchant_info']['generated_at']}",
+                "",
+            )
+            return (
+                csv_stream(tables, preamble), 'text/csv',
+                f'sales_report_{merchant.id}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv',
+            )
             
         except Exception as e:
             logger.error(f"Error generating CSV report: {str(e)}", exc_info=True)
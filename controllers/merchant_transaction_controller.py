@@ -1,21 +1,41 @@
+import uuid
 from models.merchant_transaction import MerchantTransaction
 from models.order import Order, OrderItem
+from models.enums import OrderStatusEnum, PaymentStatusEnum
 from common.database import db
 from datetime import datetime, date
 from decimal import Decimal
+from flask import current_app
+from sqlalchemy import and_, case, exists, func, insert, literal, select
+from sqlalchemy.exc import IntegrityError
+
+# (order amount up to, platform fee %) — above the last tier the fee is DEFAULT_PLATFORM_FEE_PERCENT.
+PLATFORM_FEE_TIERS = (
+    (Decimal('500'), Decimal('5.00')),
+    (Decimal('2000'), Decimal('4.00')),
+    (Decimal('10000'), Decimal('3.00')),
+)
+DEFAULT_PLATFORM_FEE_PERCENT = Decimal('2.00')
+PAYMENT_GATEWAY_FEE_PERCENT = Decimal('2.00')
+GST_ON_FEE_PERCENT = Decimal('18.00')
+
+# Orders a date-range settlement never pays out.
+UNSETTLED_ORDER_STATUSES = (
+    OrderStatusEnum.CANCELLED_BY_CUSTOMER, OrderStatusEnum.CANCELLED_BY_MERCHANT,
+    OrderStatusEnum.CANCELLED_BY_ADMIN, OrderStatusEnum.REFUNDED,
+)
+
+# Tries of the settlement INSERT; each retry after losing pairs to a concurrent run.
+SETTLEMENT_INSERT_ATTEMPTS = 3
 
 def calculate_platform_fee_percentage(order_amount):
     """
     Calculate platform fee percentage based on order amount (excluding tax)
     """
-    if order_amount <= 500:
-        return Decimal('5.00')  # 5%
-    elif order_amount <= 2000:
-        return Decimal('4.00')  # 4%
-    elif order_amount <= 10000:
-        return Decimal('3.00')  # 3%
-    else:
-        return Decimal('2.00')  # 2%
+    for limit, percent in PLATFORM_FEE_TIERS:
+        if order_amount <= limit:
+            return percent
+    return DEFAULT_PLATFORM_FEE_PERCENT
 
 def calculate_transaction_fees(order_amount):
     """
@@ -27,10 +47,10 @@ def calculate_transaction_fees(order_amount):
     platform_fee_amount = (order_amount * platform_fee_percent) / Decimal('100')
     
     # Payment gateway fee (2% flat)
-    payment_gateway_fee = (order_amount * Decimal('2.00')) / Decimal('100')
+    payment_gateway_fee = (order_amount * PAYMENT_GATEWAY_FEE_PERCENT) / Decimal('100')
     
     # GST on platform fee (18%)
-    gst_on_fee_amount = (platform_fee_amount * Decimal('18.00')) / Decimal('100')
+    gst_on_fee_amount = (platform_fee_amount * GST_ON_FEE_PERCENT) / Decimal('100')
     
     # Final payable amount to merchant
     final_payable_amount = order_amount - platform_fee_amount - payment_gateway_fee - gst_on_fee_amount
@@ -46,64 +66,134 @@ def calculate_transaction_fees(order_amount):
 def create_merchant_transaction_from_order(order_id, settlement_date=None):
     """
     Create merchant transaction record from an order
+
+    One row per merchant in the order. Calling it again for the same order adds
+    nothing and returns the rows already there.
     """
     order = Order.query.get_or_404(order_id)
-    
-    # Get order items grouped by merchant
-    merchant_items = {}
-    for item in order.items:
-        if item.merchant_id not in merchant_items:
-            merchant_items[item.merchant_id] = []
-        merchant_items[item.merchant_id].append(item)
-    
-    transactions = []
-    
-    for merchant_id, items in merchant_items.items():
-        # Calculate total amount for this merchant (excluding tax)
-        merchant_order_amount = sum(item.line_item_total_inclusive_gst for item in items)
-        
-        # Calculate fees
-        fees = calculate_transaction_fees(merchant_order_amount)
-        
-        # Set settlement date (default to 7 days from order date)
-        if settlement_date is None:
-            settlement_date = date.today()
-        
-        # Create transaction record
-        transaction = MerchantTransaction(
-            order_id=order.order_id,
-            merchant_id=merchant_id,
-            order_amount=merchant_order_amount,
-            platform_fee_percent=fees['platform_fee_percent'],
-            platform_fee_amount=fees['platform_fee_amount'],
-            gst_on_fee_amount=fees['gst_on_fee_amount'],
-            payment_gateway_fee=fees['payment_gateway_fee'],
-            final_payable_amount=fees['final_payable_amount'],
-            payment_status='pending',
-            settlement_date=settlement_date
-        )
-        
-        db.session.add(transaction)
-        transactions.append(transaction)
-    
-    db.session.commit()
-    return transactions
+    settle_orders(order_ids=[order.order_id], settlement_date=settlement_date)
+    return MerchantTransaction.query.filter_by(order_id=order.order_id) \
+        .order_by(MerchantTransaction.merchant_id).all()
 
-def bulk_create_transactions_for_orders(order_ids, settlement_date=None):
+def _settlement_rows(order_filter, settlement_date, batch_key, now):
+    """SELECT of one new transaction per (order, merchant), fees computed in SQL
+    exactly as calculate_transaction_fees does."""
+    per_merchant = select(
+        OrderItem.order_id.label('order_id'),
+        OrderItem.merchant_id.label('merchant_id'),
+        func.sum(OrderItem.line_item_total_inclusive_gst).label('order_amount'),
+    ).where(
+        OrderItem.merchant_id.isnot(None),
+        order_filter,
+        # Idempotency: an (order, merchant) pair is settled once, whoever asks.
+        ~exists().where(and_(MerchantTransaction.order_id == OrderItem.order_id,
+                             MerchantTransaction.merchant_id == OrderItem.merchant_id)),
+    ).group_by(OrderItem.order_id, OrderItem.merchant_id).subquery()
+
+    amount = per_merchant.c.order_amount
+    percent = case(*[(amount <= limit, literal(pct)) for limit, pct in PLATFORM_FEE_TIERS],
+                   else_=literal(DEFAULT_PLATFORM_FEE_PERCENT))
+    platform_fee = amount * percent / 100
+    gateway_fee = amount * literal(PAYMENT_GATEWAY_FEE_PERCENT) / 100
+    gst = platform_fee * literal(GST_ON_FEE_PERCENT) / 100
+    return select(
+        per_merchant.c.order_id, per_merchant.c.merchant_id, amount, percent, platform_fee,
+        gst, gateway_fee, amount - platform_fee - gateway_fee - gst,
+        literal('pending'), literal(settlement_date), literal(batch_key), literal(now), literal(now),
+    )
+
+_SETTLEMENT_COLUMNS = [
+    'order_id', 'merchant_id', 'order_amount', 'platform_fee_percent', 'platform_fee_amount',
+    'gst_on_fee_amount', 'payment_gateway_fee', 'final_payable_amount', 'payment_status',
+    'settlement_date', 'settlement_batch', 'created_at', 'updated_at',
+]
+
+def settle_orders(order_ids=None, from_date=None, to_date=None, settlement_date=None, batch_key=None):
     """
-    Create merchant transactions for multiple orders
+    Create the pending transactions for many orders in one INSERT ... SELECT.
+
+    Either order_ids, or a date range (order_date, inclusive) over paid orders
+    that were not cancelled or refunded. Pairs that already have a transaction are
+    skipped, so a retried or overlapping run never settles an order twice.
+    batch_key tags the rows this run creates (a month-end run can use '2026-10');
+    repeating a key returns its rows, plus any newly eligible ones.
+
+    Returns {'batch_key', 'created', 'transaction_count', 'total_payable'}.
     """
-    transactions = []
-    for order_id in order_ids:
+    if order_ids is None and not (from_date or to_date):
+        raise ValueError("order_ids or a date range is required")
+    if order_ids is not None:
+        order_filter = OrderItem.order_id.in_(list(order_ids) or [None])
+    else:
+        conditions = [
+            Order.order_id == OrderItem.order_id,
+            Order.payment_status == PaymentStatusEnum.SUCCESSFUL,
+            Order.order_status.notin_(UNSETTLED_ORDER_STATUSES),
+        ]
+        if from_date:
+            conditions.append(func.date(Order.order_date) >= from_date)
+        if to_date:
+            conditions.append(func.date(Order.order_date) <= to_date)
+        order_filter = exists().where(and_(*conditions))
+
+    batch_key = batch_key or uuid.uuid4().hex
+    settlement_date = settlement_date or date.today()
+    statement = insert(MerchantTransaction).from_select(
+        _SETTLEMENT_COLUMNS, _settlement_rows(order_filter, settlement_date, batch_key, datetime.utcnow()))
+    for attempt in range(1, SETTLEMENT_INSERT_ATTEMPTS + 1):
         try:
-            order_transactions = create_merchant_transaction_from_order(order_id, settlement_date)
-            transactions.extend(order_transactions)
-        except Exception as e:
-            # Log error and continue with other orders
-            print(f"Error creating transaction for order {order_id}: {str(e)}")
-            continue
-    
-    return transactions
+            created = db.session.execute(statement).rowcount
+            db.session.commit()
+            break
+        except IntegrityError as e:
+            # A concurrent run inserted some of the same pairs first; the anti-join
+            # skips them on the next pass.
+            db.session.rollback()
+            if attempt == SETTLEMENT_INSERT_ATTEMPTS:
+                current_app.logger.error(
+                    f"Settlement {batch_key}: giving up after {attempt} attempts, "
+                    f"pairs kept colliding with concurrent runs: {str(e)}")
+                raise
+            current_app.logger.warning(
+                f"Settlement {batch_key}: attempt {attempt} collided with a concurrent run, retrying: {str(e)}")
+
+    count, total = db.session.query(
+        func.count(MerchantTransaction.id), func.coalesce(func.sum(MerchantTransaction.final_payable_amount), 0),
+    ).filter(MerchantTransaction.settlement_batch == batch_key).one()
+    return {
+        'batch_key': batch_key,
+        'created': created,
+        'transaction_count': count,
+        'total_payable': float(total),
+    }
+
+def bulk_create_transactions_for_orders(order_ids, settlement_date=None, batch_key=None):
+    """
+    Create merchant transactions for multiple orders
+    """
+    result = settle_orders(order_ids=order_ids, settlement_date=settlement_date, batch_key=batch_key)
+    return MerchantTransaction.query.filter_by(settlement_batch=result['batch_key']) \
+        .order_by(MerchantTransaction.id).all()
+
+def _totals(query):
+    """SQL totals over a MerchantTransaction query, split by payment status."""
+    pending = MerchantTransaction.payment_status == 'pending'
+    paid = MerchantTransaction.payment_status == 'paid'
+    row = query.with_entities(
+        func.count(MerchantTransaction.id),
+        func.count(case((pending, 1))),
+        func.count(case((paid, 1))),
+        func.coalesce(func.sum(MerchantTransaction.order_amount), 0),
+        func.coalesce(func.sum(MerchantTransaction.platform_fee_amount), 0),
+        func.coalesce(func.sum(MerchantTransaction.payment_gateway_fee), 0),
+        func.coalesce(func.sum(MerchantTransaction.gst_on_fee_amount), 0),
+        func.coalesce(func.sum(MerchantTransaction.final_payable_amount), 0),
+        func.coalesce(func.sum(case((pending, MerchantTransaction.final_payable_amount), else_=0)), 0),
+        func.coalesce(func.sum(case((paid, MerchantTransaction.final_payable_amount), else_=0)), 0),
+    ).order_by(None).one()
+    keys = ('count', 'pending', 'paid', 'order_amount', 'platform_fees', 'gateway_fees', 'gst',
+            'payable', 'pending_amount', 'paid_amount')
+    return dict(zip(keys, row))
 
 def get_merchant_transaction_summary(merchant_id=None, from_date=None, to_date=None):
     """
@@ -118,28 +208,18 @@ def get_merchant_transaction_summary(merchant_id=None, from_date=None, to_date=N
     if to_date:
         query = query.filter(MerchantTransaction.settlement_date <= to_date)
     
-    transactions = query.all()
-    
-    total_order_amount = sum(t.order_amount for t in transactions)
-    total_platform_fees = sum(t.platform_fee_amount for t in transactions)
-    total_payment_gateway_fees = sum(t.payment_gateway_fee for t in transactions)
-    total_gst = sum(t.gst_on_fee_amount for t in transactions)
-    total_payable = sum(t.final_payable_amount for t in transactions)
-    
-    pending_transactions = [t for t in transactions if t.payment_status == 'pending']
-    paid_transactions = [t for t in transactions if t.payment_status == 'paid']
-    
+    totals = _totals(query)
     return {
-        'total_transactions': len(transactions),
-        'pending_transactions': len(pending_transactions),
-        'paid_transactions': len(paid_transactions),
-        'total_order_amount': float(total_order_amount),
-        'total_platform_fees': float(total_platform_fees),
-        'total_payment_gateway_fees': float(total_payment_gateway_fees),
-        'total_gst': float(total_gst),
-        'total_payable_to_merchants': float(total_payable),
-        'pending_amount': float(sum(t.final_payable_amount for t in pending_transactions)),
-        'paid_amount': float(sum(t.final_payable_amount for t in paid_transactions))
+        'total_transactions': totals['count'],
+        'pending_transactions': totals['pending'],
+        'paid_transactions': totals['paid'],
+        'total_order_amount': float(totals['order_amount']),
+        'total_platform_fees': float(totals['platform_fees']),
+        'total_payment_gateway_fees': float(totals['gateway_fees']),
+        'total_gst': float(totals['gst']),
+        'total_payable_to_merchants': float(totals['payable']),
+        'pending_amount': float(totals['pending_amount']),
+        'paid_amount': float(totals['paid_amount'])
     }
 
 def list_all_transactions(filters):
@@ -220,26 +300,29 @@ def get_merchant_pending_payments(merchant_id):
         'transaction_count': len(transactions)
     }
 
-def bulk_mark_as_paid(transaction_ids):
+def bulk_mark_as_paid(transaction_ids=None, batch_key=None):
     """
     Mark multiple transactions as paid
+
+    One UPDATE over the pending rows among transaction_ids (or in settlement batch
+    batch_key); rows already paid are left alone, so repeating a payout is a no-op.
     """
-    transactions = MerchantTransaction.query.filter(
-        MerchantTransaction.id.in_(transaction_ids)
-    ).all()
-    
-    updated_count = 0
-    for transaction in transactions:
-        if transaction.payment_status != 'paid':
-            transaction.payment_status = 'paid'
-            transaction.updated_at = datetime.utcnow()
-            updated_count += 1
-    
+    if transaction_ids is None and not batch_key:
+        raise ValueError("transaction_ids or batch_key is required")
+    if transaction_ids is not None:
+        scope = MerchantTransaction.id.in_(list(transaction_ids) or [None])
+    else:
+        scope = MerchantTransaction.settlement_batch == batch_key
+
+    total = db.session.query(func.count(MerchantTransaction.id)).filter(scope).scalar()
+    updated_count = MerchantTransaction.query.filter(
+        scope, MerchantTransaction.payment_status != 'paid',
+    ).update({'payment_status': 'paid', 'updated_at': datetime.utcnow()}, synchronize_session=False)
     db.session.commit()
     return {
-        'total_transactions': len(transactions),
+        'total_transactions': total,
         'updated_count': updated_count,
-        'already_paid_count': len(transactions) - updated_count
+        'already_paid_count': total - updated_count
     }
 
 def get_transaction_statistics(from_date=None, to_date=None):
@@ -253,9 +336,8 @@ def get_transaction_statistics(from_date=None, to_date=None):
     if to_date:
         query = query.filter(MerchantTransaction.settlement_date <= to_date)
     
-    transactions = query.all()
-    
-    if not transactions:
+    totals = _totals(query)
+    if not totals['count']:
         return {
             'total_transactions': 0,
             'total_order_amount': 0,
@@ -269,48 +351,34 @@ def get_transaction_statistics(from_date=None, to_date=None):
             'status_distribution': {}
         }
     
-    # Calculate totals
-    total_order_amount = sum(t.order_amount for t in transactions)
-    total_platform_fees = sum(t.platform_fee_amount for t in transactions)
-    total_payment_gateway_fees = sum(t.payment_gateway_fee for t in transactions)
-    total_gst = sum(t.gst_on_fee_amount for t in transactions)
-    total_payable = sum(t.final_payable_amount for t in transactions)
-    
-    # Status distribution
-    pending_transactions = [t for t in transactions if t.payment_status == 'pending']
-    paid_transactions = [t for t in transactions if t.payment_status == 'paid']
-    
     # Fee distribution by tier
     fee_distribution = {
-        '5%': {'count': 0, 'amount': Decimal('0')},
-        '4%': {'count': 0, 'amount': Decimal('0')},
-        '3%': {'count': 0, 'amount': Decimal('0')},
-        '2%': {'count': 0, 'amount': Decimal('0')}
+        f'{int(percent)}%': {'count': 0, 'amount': 0.0}
+        for percent in [pct for _, pct in PLATFORM_FEE_TIERS] + [DEFAULT_PLATFORM_FEE_PERCENT]
     }
-    
-    for transaction in transactions:
-        fee_percent = str(transaction.platform_fee_percent) + '%'
-        if fee_percent in fee_distribution:
-            fee_distribution[fee_percent]['count'] += 1
-            fee_distribution[fee_percent]['amount'] += transaction.platform_fee_amount
+    tiers = query.with_entities(
+        MerchantTransaction.platform_fee_percent,
+        func.count(MerchantTransaction.id),
+        func.coalesce(func.sum(MerchantTransaction.platform_fee_amount), 0),
+    ).order_by(None).group_by(MerchantTransaction.platform_fee_percent).all()
+    for percent, count, amount in tiers:
+        tier = f'{int(Decimal(str(percent)))}%'
+        if tier in fee_distribution:
+            fee_distribution[tier]['count'] += count
+            fee_distribution[tier]['amount'] += float(amount)
     
     return {
-        'total_transactions': len(transactions),
-        'total_order_amount': float(total_order_amount),
-        'total_platform_fees': float(total_platform_fees),
-        'total_payment_gateway_fees': float(total_payment_gateway_fees),
-        'total_gst': float(total_gst),
-        'total_payable': float(total_payable),
-        'pending_amount': float(sum(t.final_payable_amount for t in pending_transactions)),
-        'paid_amount': float(sum(t.final_payable_amount for t in paid_transactions)),
-        'fee_distribution': {
-            tier: {
-                'count': data['count'],
-                'amount': float(data['amount'])
-            } for tier, data in fee_distribution.items()
-        },
+        'total_transactions': totals['count'],
+        'total_order_amount': float(totals['order_amount']),
+        'total_platform_fees': float(totals['platform_fees']),
+        'total_payment_gateway_fees': float(totals['gateway_fees']),
+        'total_gst': float(totals['gst']),
+        'total_payable': float(totals['payable']),
+        'pending_amount': float(totals['pending_amount']),
+        'paid_amount': float(totals['paid_amount']),
+        'fee_distribution': fee_distribution,
         'status_distribution': {
-            'pending': len(pending_transactions),
-            'paid': len(paid_transactions)
+            'pending': totals['pending'],
+            'paid': totals['paid']
         }
     }
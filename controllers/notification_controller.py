@@ -1,12 +1,71 @@
 # controllers/notification_controller.py
-from flask import request, jsonify, current_app
+import json
+import threading
+import time
+from datetime import datetime, timezone
+
+from flask import Response, request, jsonify, current_app, stream_with_context
 from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import and_, or_
 from common.database import db
 from models.merchant_notification import MerchantNotification
-from auth.models.models import User, MerchantProfile
+from auth.models.models import MerchantProfile
+from services import notification_counter_service
 from services.notification_cleanup_service import NotificationCleanupService
 from http import HTTPStatus
 
+# gunicorn kills a sync worker that has been busy for its 60-second timeout, so a
+# stream ends well before that whatever NOTIFICATION_STREAM_MAX_SECONDS says.
+STREAM_MAX_SECONDS_CEILING = 45
+STREAM_BATCH_SIZE = 100
+
+# Streams open in this process, against NOTIFICATION_STREAM_MAX_OPEN.
+_open_streams = 0
+_open_streams_lock = threading.Lock()
+
+
+def _open_stream_slot():
+    """Take one of the process's NOTIFICATION_STREAM_MAX_OPEN stream slots; False if none is free."""
+    global _open_streams
+    limit = int(current_app.config.get('NOTIFICATION_STREAM_MAX_OPEN', 2))
+    with _open_streams_lock:
+        if _open_streams >= limit:
+            return False
+        _open_streams += 1
+        return True
+
+
+def _stream_slot_releaser():
+    """A callable that gives the slot back on its first call; later calls do nothing."""
+    released = []
+
+    def release():
+        global _open_streams
+        with _open_streams_lock:
+            if released:
+                return
+            released.append(True)
+            _open_streams -= 1
+    return release
+
+
+def _parse_event_id(value):
+    """(updated_at, id) from an event id 'ISO-TIMESTAMP/ID'; id is None for a bare timestamp."""
+    stamp, _, notification_id = value.partition('/')
+    try:
+        return (datetime.fromisoformat(stamp).replace(tzinfo=None),
+                int(notification_id) if notification_id else None)
+    except ValueError:
+        return None
+
+
+def _changed_after(cursor_at, cursor_id):
+    """Keyset filter for notifications after (cursor_at, cursor_id) in (updated_at, id) order."""
+    later = MerchantNotification.updated_at > cursor_at
+    if cursor_id is None:
+        return later
+    return or_(later, and_(MerchantNotification.updated_at == cursor_at, MerchantNotification.id > cursor_id))
+
 
 class NotificationController:
     """Controller for merchant notifications."""
@@ -20,14 +79,8 @@ class NotificationController:
             JSON response with notifications and pagination
         """
         try:
-            # Get current user (merchant)
-            current_user_id = get_jwt_identity()
-            user = User.get_by_id(current_user_id)
-            if not user:
-                return jsonify({'error': 'User not found'}), HTTPStatus.NOT_FOUND
-            
-            # Get merchant profile
-            merchant = MerchantProfile.get_by_user_id(current_user_id)
+            # Get merchant profile (merchant_role_required has already loaded the user)
+            merchant = MerchantProfile.get_by_user_id(get_jwt_identity())
             if not merchant:
                 return jsonify({'error': 'Merchant profile not found'}), HTTPStatus.NOT_FOUND
             
@@ -45,17 +98,19 @@ class NotificationController:
             
             unread_only = request.args.get('unread_only', 'false').lower() == 'true'
             
+            # Counts come from the maintained counter row, not COUNT queries
+            counts = notification_counter_service.counts(merchant.id)
+            unread_count = counts.unread_count
+            
             # Get notifications
             notifications, total, total_pages = MerchantNotification.get_merchant_notifications(
                 merchant.id,
                 page=page,
                 per_page=per_page,
-                unread_only=unread_only
+                unread_only=unread_only,
+                total=unread_count if unread_only else counts.total_count
             )
             
-            # Get unread count
-            unread_count = MerchantNotification.get_unread_count(merchant.id)
-            
             # Serialize notifications
             notifications_data = [n.serialize() for n in notifications]
             
@@ -84,14 +139,8 @@ class NotificationController:
             JSON response with unread count
         """
         try:
-            # Get current user (merchant)
-            current_user_id = get_jwt_identity()
-            user = User.get_by_id(current_user_id)
-            if not user:
-                return jsonify({'error': 'User not found'}), HTTPStatus.NOT_FOUND
-            
-            # Get merchant profile
-            merchant = MerchantProfile.get_by_user_id(current_user_id)
+            # Get merchant profile (merchant_role_required has already loaded the user)
+            merchant = MerchantProfile.get_by_user_id(get_jwt_identity())
             if not merchant:
                 return jsonify({'error': 'Merchant profile not found'}), HTTPStatus.NOT_FOUND
             
@@ -107,6 +156,117 @@ class NotificationController:
             current_app.logger.error(f"Get unread count failed: {str(e)}")
             return jsonify({'error': f'Failed to get unread count: {str(e)}'}), HTTPStatus.INTERNAL_SERVER_ERROR
     
+    @staticmethod
+    def stream_notifications():
+        """
+        Server-Sent Events stream of new and updated notifications for the current merchant.
+        
+        Sends an `unread_count` event on connect and whenever the count changes, and a
+        `notification` event for every notification created or updated after the
+        connection opened (or after the Last-Event-ID the client resumes from). Each
+        poll is a primary-key read of the merchant's counter row; the notifications
+        table is only queried when its version moves. The stream closes after
+        NOTIFICATION_STREAM_MAX_SECONDS (at most STREAM_MAX_SECONDS_CEILING, inside
+        the worker timeout) and the client reconnects.
+        
+        An open stream holds its request thread, so the endpoint is off unless
+        NOTIFICATION_STREAM_ENABLED (see config.py for the worker class it needs),
+        and at most NOTIFICATION_STREAM_MAX_OPEN streams are open per process.
+        
+        Returns:
+            text/event-stream response
+        """
+        if not current_app.config.get('NOTIFICATION_STREAM_ENABLED', False):
+            return jsonify({
+                'error': 'Notification stream is disabled; poll /api/merchants/notifications/unread-count'
+            }), HTTPStatus.NOT_FOUND
+        
+        merchant = MerchantProfile.get_by_user_id(get_jwt_identity())
+        if not merchant:
+            return jsonify({'error': 'Merchant profile not found'}), HTTPStatus.NOT_FOUND
+        
+        merchant_id = merchant.id
+        poll_seconds = float(current_app.config.get('NOTIFICATION_STREAM_POLL_SECONDS', 2))
+        max_seconds = min(float(current_app.config.get('NOTIFICATION_STREAM_MAX_SECONDS', 45)),
+                          STREAM_MAX_SECONDS_CEILING)
+        heartbeat_seconds = 15
+        
+        # Event ids are the notification's (updated_at, id), so a reconnect resumes
+        # exactly there even when several notifications share a timestamp.
+        cursor = None
+        last_event_id = request.headers.get('Last-Event-ID')
+        if last_event_id:
+            cursor = _parse_event_id(last_event_id)
+        if cursor is None:
+            cursor = (datetime.now(timezone.utc).replace(tzinfo=None), None)
+        
+        def _event(name, data, event_id=None):
+            lines = [f'event: {name}']
+            if event_id:
+                lines.append(f'id: {event_id}')
+            lines.append(f'data: {json.dumps(data)}')
+            return '\n'.join(lines) + '\n\n'
+        
+        def generate():
+            try:
+                yield from poll()
+            finally:
+                release_slot()
+        
+        def poll():
+            nonlocal cursor
+            version = None
+            unread_count = None
+            started = last_sent = time.monotonic()
+            yield 'retry: 3000\n\n'
+            while True:
+                counts = notification_counter_service.counts(merchant_id)
+                if counts.version != version:
+                    version = counts.version
+                    while True:
+                        changed = MerchantNotification.query.filter(
+                            MerchantNotification.merchant_id == merchant_id,
+                            _changed_after(*cursor)
+                        ).order_by(MerchantNotification.updated_at, MerchantNotification.id) \
+                            .limit(STREAM_BATCH_SIZE).all()
+                        for notification in changed:
+                            cursor = (notification.updated_at.replace(tzinfo=None), notification.id)
+                            yield _event('notification', notification.serialize(),
+                                         f'{cursor[0].isoformat()}/{cursor[1]}')
+                            last_sent = time.monotonic()
+                        if len(changed) < STREAM_BATCH_SIZE:
+                            break
+                    if counts.unread_count != unread_count:
+                        unread_count = counts.unread_count
+                        yield _event('unread_count', {'unread_count': unread_count})
+                        last_sent = time.monotonic()
+                # End the read transaction so the next poll sees newly committed rows.
+                db.session.rollback()
+                
+                now = time.monotonic()
+                if now - started >= max_seconds:
+                    return
+                if now - last_sent >= heartbeat_seconds:
+                    yield ': keepalive\n\n'
+                    last_sent = now
+                time.sleep(max(0, min(poll_seconds, max_seconds - (now - started))))
+        
+        if not _open_stream_slot():
+            return jsonify({
+                'error': 'Too many open notification streams; poll /api/merchants/notifications/unread-count'
+            }), HTTPStatus.SERVICE_UNAVAILABLE, {'Retry-After': str(int(max_seconds) or 1)}
+        
+        release_slot = _stream_slot_releaser()
+        response = Response(
+            stream_with_context(generate()),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+        # The slot is freed when the stream ends, or when the server closes the
+        # response because the client went away.
+        response.call_on_close(release_slot)
+        return response
+    
     @staticmethod
     def mark_as_read(notification_id):
         """
@@ -119,14 +279,8 @@ class NotificationController:
             JSON response with success/error
         """
         try:
-            # Get current user (merchant)
-            current_user_id = get_jwt_identity()
-            user = User.get_by_id(current_user_id)
-            if not user:
-                return jsonify({'error': 'User not found'}), HTTPStatus.NOT_FOUND
-            
-            # Get merchant profile
-            merchant = MerchantProfile.get_by_user_id(current_user_id)
+            # Get merchant profile (merchant_role_required has already loaded the user)
+            merchant = MerchantProfile.get_by_user_id(get_jwt_identity())
             if not merchant:
                 return jsonify({'error': 'Merchant profile not found'}), HTTPStatus.NOT_FOUND
             
@@ -162,14 +316,8 @@ class NotificationController:
             JSON response with success/error
         """
         try:
-            # Get current user (merchant)
-            current_user_id = get_jwt_identity()
-            user = User.get_by_id(current_user_id)
-            if not user:
-                return jsonify({'error': 'User not found'}), HTTPStatus.NOT_FOUND
-            
-            # Get merchant profile
-            merchant = MerchantProfile.get_by_user_id(current_user_id)
+            # Get merchant profile (merchant_role_required has already loaded the user)
+            merchant = MerchantProfile.get_by_user_id(get_jwt_identity())
             if not merchant:
                 return jsonify({'error': 'Merchant profile not found'}), HTTPStatus.NOT_FOUND
             
@@ -199,14 +347,8 @@ class NotificationController:
             JSON response with success/error
         """
         try:
-            # Get current user (merchant)
-            current_user_id = get_jwt_identity()
-            user = User.get_by_id(current_user_id)
-            if not user:
-                return jsonify({'error': 'User not found'}), HTTPStatus.NOT_FOUND
-            
-            # Get merchant profile
-            merchant = MerchantProfile.get_by_user_id(current_user_id)
+            # Get merchant profile (merchant_role_required has already loaded the user)
+            merchant = MerchantProfile.get_by_user_id(get_jwt_identity())
             if not merchant:
                 return jsonify({'error': 'Merchant profile not found'}), HTTPStatus.NOT_FOUND
             
@@ -242,14 +384,8 @@ class NotificationController:
             JSON response with success/error
         """
         try:
-            # Get current user (merchant)
-            current_user_id = get_jwt_identity()
-            user = User.get_by_id(current_user_id)
-            if not user:
-                return jsonify({'error': 'User not found'}), HTTPStatus.NOT_FOUND
-            
-            # Get merchant profile
-            merchant = MerchantProfile.get_by_user_id(current_user_id)
+            # Get merchant profile (merchant_role_required has already loaded the user)
+            merchant = MerchantProfile.get_by_user_id(get_jwt_identity())
             if not merchant:
                 return jsonify({'error': 'Merchant profile not found'}), HTTPStatus.NOT_FOUND
             
@@ -292,14 +428,8 @@ class NotificationController:
             JSON response with success/error
         """
         try:
-            # Get current user (merchant)
-            current_user_id = get_jwt_identity()
-            user = User.get_by_id(current_user_id)
-            if not user:
-                return jsonify({'error': 'User not found'}), HTTPStatus.NOT_FOUND
-            
-            # Get merchant profile
-            merchant = MerchantProfile.get_by_user_id(current_user_id)
+            # Get merchant profile (merchant_role_required has already loaded the user)
+            merchant = MerchantProfile.get_by_user_id(get_jwt_identity())
             if not merchant:
                 return jsonify({'error': 'Merchant profile not found'}), HTTPStatus.NOT_FOUND
             
@@ -15,6 +15,9 @@ from datetime import datetime, timedelta
 from models.order import OrderItem, Order
 from models.review import Review
 from auth.models.models import MerchantProfile
+from models.review_aggregate import ProductRatingSummary
+from services import review_aggregate_service
+from services.product_hydrator import ProductHydrator
 import json
 
 logger = logging.getLogger(__name__)
@@ -142,9 +145,8 @@ class ProductController:
 
             # Apply rating filter
             if min_rating is not None:
-                query = query.join(Review, Product.product_id == Review.product_id, isouter=True)\
-                    .group_by(Product.product_id)\
-                    .having(func.coalesce(func.avg(Review.rating), 0) >= min_rating)
+                query = query.outerjoin(ProductRatingSummary, ProductRatingSummary.product_id == Product.product_id)\
+                    .filter(review_aggregate_service.min_rating_clause(min_rating, include_unrated=True))
 
             # Apply search filter
             if search:
@@ -182,80 +184,12 @@ class ProductController:
                 total = pagination.total
                 pages = pagination.pages
                 
-                # ---- Pre-fetch all media for this page (search branch) ----
-                product_ids = [p.product_id for p, _ in products]
-                all_media = ProductMedia.query.filter(
-                    ProductMedia.product_id.in_(product_ids),
-                    ProductMedia.deleted_at == None,
-                    ProductMedia.type == MediaType.IMAGE
-                ).order_by(
-                    ProductMedia.sort_order.asc(),
-                    ProductMedia.created_at.asc()
-                ).all()
-
-                media_map = {}
-                for m in all_media:
-                    media_map.setdefault(m.product_id, []).append(m)
-                # -------------------------------------------------------------
-
-                product_data = []
-                for product, relevance_score in products:
-                    product_dict = product.serialize()
-                    
-                    avg_rating = db.session.query(func.avg(Review.rating))\
-                        .filter(Review.product_id == product.product_id)\
-                        .scalar() or 0
-                    
-                    reviews = Review.query.filter_by(
-                        product_id=product.product_id,
-                        deleted_at=None
-                    ).order_by(Review.created_at.desc()).all()
-                    
-                    product_dict.update({
-                        'id': str(product.product_id),
-                        'name': product.product_name,
-                        'description': product.product_description,
-                        'stock': product.stock.stock_qty if product.stock else 0,
-                        'isNew': True,
-                        'isBuiltIn': False,
-                        'rating': round(float(avg_rating), 1),
-                        'discount_pct': float(product.discount_pct),
-                        'relevance_score': relevance_score,
-                        'reviews': [{
-                            "id": review.review_id,
-                            "user": {
-                                "id": review.user.id,
-                                "first_name": review.user.first_name if hasattr(review.user, 'first_name') else 'Anonymous',
-                                "last_name": review.user.last_name if hasattr(review.user, 'last_name') else '',
-                                "email": review.user.email if hasattr(review.user, 'email') else None,
-                                "avatar": review.user.avatar_url if hasattr(review.user, 'avatar_url') else None
-                            },
-                            "rating": review.rating,
-                            "title": review.title,
-                            "body": review.body,
-                            "created_at": review.created_at.isoformat(),
-                            "images": [img.serialize() for img in review.images] if review.images else []
-                        } for review in reviews]
-                    })
-                    
-                    # ---- Full media array from media_map ----
-                    product_dict['media'] = [
-                        {
-                            'media_id': m.media_id,
-                            'type': m.type.value,
-                            'url': m.url,
-                            'sort_order': m.sort_order,
-                            'public_id': m.public_id
-                        }
-                        for m in media_map.get(product.product_id, [])
-                    ]
-                    if media_map.get(product.product_id):
-                        first = media_map[product.product_id][0]
-                        product_dict['primary_image'] = first.url
-                        product_dict['image'] = first.url
-                    # -----------------------------------------
-                    
-                    product_data.append(product_dict)
+                scores = {product.product_id: score for product, score in products}
+                product_data = ProductHydrator(reviews=True, media_list=True).cards(
+                    [product for product, _ in products]
+                )
+                for product_dict in product_data:
+                    product_dict['relevance_score'] = scores[product_dict['product_id']]
 
             else:
                 if sort_by and hasattr(Product, sort_by):
@@ -271,79 +205,7 @@ class ProductController:
                 total = pagination.total
                 pages = pagination.pages
 
-                # ---- Pre-fetch all media for this page (no-search branch) ----
-                product_ids = [p.product_id for p in products]
-                all_media = ProductMedia.query.filter(
-                    ProductMedia.product_id.in_(product_ids),
-                    ProductMedia.deleted_at == None,
-                    ProductMedia.type == MediaType.IMAGE
-                ).order_by(
-                    ProductMedia.sort_order.asc(),
-                    ProductMedia.created_at.asc()
-                ).all()
-
-                media_map = {}
-                for m in all_media:
-                    media_map.setdefault(m.product_id, []).append(m)
-                # ---------------------------------------------------------------
-                
-                product_data = []
-                for product in products:
-                    product_dict = product.serialize()
-                    
-                    avg_rating = db.session.query(func.avg(Review.rating))\
-                        .filter(Review.product_id == product.product_id)\
-                        .scalar() or 0
-                    
-                    reviews = Review.query.filter_by(
-                        product_id=product.product_id,
-                        deleted_at=None
-                    ).order_by(Review.created_at.desc()).all()
-                    
-                    product_dict.update({
-                        'id': str(product.product_id),
-                        'name': product.product_name,
-                        'description': product.product_description,
-                        'stock': product.stock.stock_qty if product.stock else 0,
-                        'isNew': True,
-                        'isBuiltIn': False,
-                        'rating': round(float(avg_rating), 1),
-                        'discount_pct': float(product.discount_pct),
-                        'reviews': [{
-                            "id": review.review_id,
-                            "user": {
-                                "id": review.user.id,
-                                "first_name": review.user.first_name if hasattr(review.user, 'first_name') else 'Anonymous',
-                                "last_name": review.user.last_name if hasattr(review.user, 'last_name') else '',
-                                "email": review.user.email if hasattr(review.user, 'email') else None,
-                                "avatar": review.user.avatar_url if hasattr(review.user, 'avatar_url') else None
-                            },
-                            "rating": review.rating,
-                            "title": review.title,
-                            "body": review.body,
-                            "created_at": review.created_at.isoformat(),
-                            "images": [img.serialize() for img in review.images] if review.images else []
-                        } for review in reviews]
-                    })
-                    
-                    # ---- Full media array from media_map ----
-                    product_dict['media'] = [
-                        {
-                            'media_id': m.media_id,
-                            'type': m.type.value,
-                            'url': m.url,
-                            'sort_order': m.sort_order,
-                            'public_id': m.public_id
-                        }
-                        for m in media_map.get(product.product_id, [])
-                    ]
-                    if media_map.get(product.product_id):
-                        first = media_map[product.product_id][0]
-                        product_dict['primary_image'] = first.url
-                        product_dict['image'] = first.url
-                    # -----------------------------------------
-                    
-                    product_data.append(product_dict)
+                product_data = ProductHydrator(reviews=True, media_list=True).cards(products)
 
             return jsonify({
                 'products': product_data,
@@ -667,10 +529,7 @@ class ProductController:
                 deleted_at=None
             ).order_by(Review.created_at.desc()).all()
             
-            # Calculate average rating
-            avg_rating = db.session.query(func.avg(Review.rating))\
-                .filter(Review.product_id == product_id)\
-                .scalar() or 0
+            rating_summary = db.session.get(ProductRatingSummary, product_id)
 
             # Prepare response data - start with serialized product data
             response_data = product.serialize()
@@ -695,7 +554,8 @@ class ProductController:
                 "stock": product.stock.stock_qty if product.stock else 0,
                 "isNew": True,
                 "isBuiltIn": False,
-                "rating": round(float(avg_rating), 1),
+                **review_aggregate_service.rating_fields(rating_summary),
+                "rating_histogram": rating_summary.histogram if rating_summary else {str(star): 0 for star in range(1, 6)},
                 "reviews": [{
                     "id": review.review_id,
                     "user": {
@@ -812,9 +672,8 @@ class ProductController:
 
             # Apply rating filter
             if min_rating is not None:
-                query = query.join(Review, Product.product_id == Review.product_id)\
-                    .group_by(Product.product_id)\
-                    .having(func.avg(Review.rating) >= min_rating)
+                query = query.join(ProductRatingSummary, ProductRatingSummary.product_id == Product.product_id)\
+                    .filter(review_aggregate_service.min_rating_clause(min_rating))
 
             # Apply discount filter
             if min_discount is not None:
@@ -834,35 +693,7 @@ class ProductController:
             total = pagination.total
             pages = pagination.pages
             
-            # Get product data with media
-            product_data = []
-            for product in products:
-                product_dict = product.serialize()
-                
-                # Calculate average rating
-                avg_rating = db.session.query(func.avg(Review.rating))\
-                    .filter(Review.product_id == product.product_id)\
-                    .scalar() or 0
-                
-                # Add frontend-specific fields
-                product_dict.update({
-                    'id': str(product.product_id),
-                    'name': product.product_name,
-                    'description': product.product_description,
-                    'stock': product.stock.stock_qty if product.stock else 0,
-                    'isNew': True,
-                    'isBuiltIn': False,
-                    'rating': round(float(avg_rating), 1),
-                    'discount_pct': float(product.discount_pct),
-                })
-                
-                # Get primary media
-                media = ProductController.get_product_media(product.product_id)
-                if media:
-                    product_dict['primary_image'] = media['url']
-                    product_dict['image'] = media['url']
-                
-                product_data.append(product_dict)
+            product_data = ProductHydrator().cards(products)
             
             return jsonify({
                 'products': product_data,
@@ -957,9 +788,8 @@ class ProductController:
 
             # Apply rating filter
             if min_rating is not None:
-                query = query.join(Review, Product.product_id == Review.product_id)\
-                    .group_by(Product.product_id)\
-                    .having(func.avg(Review.rating) >= min_rating)
+                query = query.join(ProductRatingSummary, ProductRatingSummary.product_id == Product.product_id)\
+                    .filter(review_aggregate_service.min_rating_clause(min_rating))
 
             # Apply discount filter
             if min_discount is not None:
@@ -979,35 +809,7 @@ class ProductController:
             total = pagination.total
             pages = pagination.pages
             
-            # Get product data with media
-            product_data = []
-            for product in products:
-                product_dict = product.serialize()
-                
-                # Calculate average rating
-                avg_rating = db.session.query(func.avg(Review.rating))\
-                    .filter(Review.product_id == product.product_id)\
-                    .scalar() or 0
-                
-                # Add frontend-specific fields
-                product_dict.update({
-                    'id': str(product.product_id),
-                    'name': product.product_name,
-                    'description': product.product_description,
-                    'stock': product.stock.stock_qty if product.stock else 0,
-                    'isNew': True,
-                    'isBuiltIn': False,
-                    'rating': round(float(avg_rating), 1),
-                    'discount_pct': float(product.discount_pct),
-                })
-                
-                # Get primary media
-                media = ProductController.get_product_media(product.product_id)
-                if media:
-                    product_dict['primary_image'] = media['url']
-                    product_dict['image'] = media['url']
-                
-                product_data.append(product_dict)
+            product_data = ProductHydrator().cards(products)
             
             return jsonify({
                 'products': product_data,
@@ -1146,27 +948,7 @@ class ProductController:
             total = pagination.total
             pages = pagination.pages
             
-            # Get product data with media
-            product_data = []
-            for product in products:
-                product_dict = product.serialize()
-                # Add frontend-specific fields
-                product_dict.update({
-                    'id': str(product.product_id),
-                    'name': product.product_name,
-                    'description': product.product_description,
-                    'stock': product.stock.stock_qty if product.stock else 0,  # TODO: Add stock tracking
-                    'isNew': True,  # These are new products
-                    'isBuiltIn': False,
-                })
-                
-                # Get primary media
-                media = ProductController.get_product_media(product.product_id)
-                if media:
-                    product_dict['primary_image'] = media['url']
-                    product_dict['image'] = media['url']
-                
-                product_data.append(product_dict)
+            product_data = ProductHydrator().cards(products)
             
             return jsonify({
                 'products': product_data,
@@ -1332,9 +1114,8 @@ class ProductController:
 
             # Apply rating filter
             if min_rating is not None:
-                query = query.join(Review, Product.product_id == Review.product_id)\
-                    .group_by(Product.product_id)\
-                    .having(func.avg(Review.rating) >= min_rating)
+                query = query.join(ProductRatingSummary, ProductRatingSummary.product_id == Product.product_id)\
+                    .filter(review_aggregate_service.min_rating_clause(min_rating))
 
             # Apply discount filter
             if min_discount is not None:
@@ -1360,37 +1141,9 @@ class ProductController:
             paginated_products = products[start_idx:end_idx]
             
             # Prepare response
-            product_data = []
-            for product in paginated_products:
-                product_dict = product.serialize()
-                
-                # Calculate average rating
-                avg_rating = db.session.query(func.avg(Review.rating))\
-                    .filter(Review.product_id == product.product_id)\
-                    .scalar() or 0
-                
-                # Add frontend-specific fields
-                product_dict.update({
-                    'id': str(product.product_id),
-                    'name': product.product_name,
-                    'description': product.product_description,
-                    'stock': product.stock.stock_qty if product.stock else 0,
-                    'isNew': True,
-                    'isBuiltIn': False,
-                    'rating': round(float(avg_rating), 1),
-                    'discount_pct': float(product.discount_pct),
-                    'orderCount': order_counts.get(product.product_id, 0),
-                    'category': product.category.serialize() if product.category else None,
-                    'brand': product.brand.serialize() if product.brand else None
-                })
-                
-                # Get primary media
-                media = ProductController.get_product_media(product.product_id)
-                if media:
-                    product_dict['primary_image'] = media['url']
-                    product_dict['image'] = media['url']
-                
-                product_data.append(product_dict)
+            product_data = ProductHydrator(taxonomy=True).cards(paginated_products)
+            for product_dict in product_data:
+                product_dict['orderCount'] = order_counts.get(product_dict['product_id'], 0)
             
             logger.debug("Returning %s products", len(product_data))
             
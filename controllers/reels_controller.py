@@ -12,9 +12,9 @@ from models.product import Product
 from models.product_stock import ProductStock
 from models.product_media import ProductMedia
 from models.enums import MediaType
-from models.merchant_notification import MerchantNotification
 from auth.models.models import User, MerchantProfile
 from services.reels_s3_service import get_reels_s3_service
+from services import media_job_service, notification_aggregator
 from werkzeug.utils import secure_filename
 from sqlalchemy import desc, and_, or_
 from sqlalchemy.orm import joinedload, selectinload
@@ -561,21 +561,9 @@ class ReelsController:
                 reel.file_size_bytes = upload_result.get('bytes', 0)
                 reel.video_format = file_extension
                 
-                # Set thumbnail URL if generated
-                current_app.logger.info("=" * 80)
-                current_app.logger.info(f"[REELS_CONTROLLER] 📋 Updating reel record with thumbnail information...")
-                current_app.logger.info(f"[REELS_CONTROLLER] 📋 Upload result keys: {list(upload_result.keys())}")
-                current_app.logger.info(f"[REELS_CONTROLLER] 📋 thumbnail_url in result: {'thumbnail_url' in upload_result}")
-                current_app.logger.info(f"[REELS_CONTROLLER] 📋 thumbnail_url value: {upload_result.get('thumbnail_url')}")
-                
-                if upload_result.get('thumbnail_url'):
-                    reel.thumbnail_url = upload_result['thumbnail_url']
-                    reel.thumbnail_public_id = upload_result.get('thumbnail_s3_key')
-                    current_app.logger.info(f"[REELS_CONTROLLER] ✅ Thumbnail URL saved to database: {reel.thumbnail_url}")
-                    current_app.logger.info(f"[REELS_CONTROLLER] ✅ Thumbnail S3 key saved: {reel.thumbnail_public_id}")
-                else:
-                    current_app.logger.warning(f"[REELS_CONTROLLER] ⚠️  No thumbnail_url in upload result. Thumbnail may not have been generated.")
-                current_app.logger.info("=" * 80)
+                # Thumbnail, duration and resolution come from the media worker; the
+                # jobs commit with the reel so neither exists without the other.
+                media_job_service.enqueue_reel_processing(reel, upload_result.get('source_path'))
                 
                 # Commit the transaction
                 db.session.commit()
@@ -585,6 +573,7 @@ class ReelsController:
                 current_app.logger.error(f"Failed to update reel record: {str(e)}", exc_info=True)
                 
                 # Attempt cleanup of uploaded video (non-critical)
+                media_job_service.discard(upload_result.get('source_path'))
                 if upload_result and upload_result.get('s3_key'):
                     try:
                         reels_s3_service.delete_reel_video(upload_result['s3_key'])
@@ -1310,25 +1299,19 @@ class ReelsController:
                     current_app.logger.warning(f"Failed to update category preference: {str(e)}")
                     # Don't fail the like operation if preference update fails
                 
-                # Create or update notification for merchant (aggregated by reel)
-                # Use savepoint to ensure notification failure doesn't affect like operation
-                savepoint = db.session.begin_nested()
+                db.session.commit()
+                
+                # Notify the merchant. Likes are buffered and folded into one notification
+                # per reel per window (services/notification_aggregator.py).
                 try:
-                    user_name = f"{user.first_name} {user.last_name}".strip()
-                    MerchantNotification.get_or_create_reel_like_notification(
+                    notification_aggregator.record_reel_like(
                         merchant_id=reel.merchant_id,
                         reel_id=reel.reel_id,
                         user_id=current_user_id,
-                        user_name=user_name
+                        user_name=f"{user.first_name} {user.last_name}".strip()
                     )
-                    savepoint.commit()
                 except Exception as e:
-                    savepoint.rollback()
-                    current_app.logger.warning(f"Failed to create notification for reel like: {str(e)}")
-                    # Don't fail the like operation if notification creation fails
-                
-                # Commit all changes together (like + notification if successful)
-                db.session.commit()
+                    current_app.logger.warning(f"Failed to record notification for reel like: {str(e)}")
                 
                 # Invalidate recommendation cache
                 try:
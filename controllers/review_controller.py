@@ -5,6 +5,7 @@ from models.product import Product
 from models.enums import OrderStatusEnum, MediaType
 from common.database import db
 from services.s3_service import get_s3_service
+from services.review_aggregate_service import add_product_rating, remove_product_rating
 from datetime import datetime, timezone
 import logging
 
@@ -92,8 +93,10 @@ class ReviewController:
                 body=review_data['body']
             )
             
-            # Save review first to get review_id
-            review.save()
+            # Flush (not commit) to get review_id; the review, its images and the
+            # product's rating aggregate commit together below.
+            db.session.add(review)
+            db.session.flush()
             
             # Handle images if provided
             if 'images' in review_data and review_data['images']:
@@ -120,6 +123,8 @@ class ReviewController:
                         # Continue with other images even if one fails
                         continue
             
+            add_product_rating(review.product_id, review.rating)
+
             # Commit all changes
             db.session.commit()
             
@@ -244,6 +249,8 @@ class ReviewController:
                         current_app.logger.error(f"Failed to delete review image from S3 using URL: {e}")
                     
             # Delete review
+            if review.deleted_at is None:
+                remove_product_rating(review.product_id, review.rating)
             db.session.delete(review)
             db.session.commit()
             
@@ -251,4 +258,5 @@ class ReviewController:
             
         except Exception as e:
             logger.error(f"Error deleting review: {str(e)}")
+            db.session.rollback()
             raise 
\ No newline at end of file
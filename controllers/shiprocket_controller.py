@@ -1,6 +1,4 @@
-import requests
 import json
-import os
 from datetime import datetime, timezone, timedelta
 from flask import current_app
 from common.database import db
@@ -12,6 +10,8 @@ from auth.models.models import User, MerchantProfile
 from models.enums import ShipmentStatusEnum
 from decimal import Decimal
 from urllib.parse import urlencode
+from services import serviceability_cache
+from services.shiprocket_client import get_shiprocket_client
 
 class ShipRocketController:
     """Controller for ShipRocket shipping integration"""
@@ -19,91 +19,18 @@ class ShipRocketController:
     BASE_URL = "https://apiv2.shiprocket.in/v1/external"
     
     def __init__(self):
-        self.email = os.getenv('SHIPROCKET_EMAIL')
-        self.password = os.getenv('SHIPROCKET_PASSWORD')
-        self.token = None
-        self.token_expiry = None
-    
+        # Cheap: the token, HTTP connections and metrics live on the shared client,
+        # so routes can keep building a controller per request.
+        self.client = get_shiprocket_client()
+
     def _get_auth_token(self):
-        """Get authentication token from ShipRocket"""
-        try:
-            if self.token and self.token_expiry and datetime.now(timezone.utc) < self.token_expiry:
-                return self.token
-            
-            url = f"{self.BASE_URL}/auth/login"
-            payload = {
-                "email": self.email,
-                "password": self.password
-            }
-            
-            try:
-                response = requests.post(url, json=payload, timeout=10)
-                response.raise_for_status()
-            except requests.exceptions.Timeout:
-                current_app.logger.error(f"ShipRocket authentication timeout: {url}")
-                raise Exception("Failed to authenticate with ShipRocket: Request timed out after 10 seconds")
-            except requests.exceptions.RequestException as e:
-                current_app.logger.error(f"ShipRocket authentication failed: {str(e)}")
-                raise Exception("Failed to authenticate with ShipRocket")
-            
-            data = response.json()
-            self.token = data.get('token')
-            # Token typically expires in 24 h. Use timedelta to avoid hour overflow.
-            self.token_expiry = datetime.now(timezone.utc) + timedelta(hours=23)
-            
-            return self.token
-            
-        except Exception as e:
-            if "Failed to authenticate" not in str(e):
-                current_app.logger.error(f"ShipRocket authentication error: {str(e)}")
-                raise Exception("Failed to authenticate with ShipRocket")
-            raise
-    
+        """Get authentication token from ShipRocket (cached across requests and workers)"""
+        return self.client.token()
+
     def _make_request(self, method, endpoint, data=None, params=None):
         """Make authenticated request to ShipRocket API"""
-        try:
-            token = self._get_auth_token()
-            headers = {
-                'Authorization': f'Bearer {token}',
-                'Content-Type': 'application/json'
-            }
-            
-            url = f"{self.BASE_URL}/{endpoint}"
-            
-            current_app.logger.info(f"Making {method} request to {url}")
-            if params:
-                current_app.logger.info(f"Request params: {params}")
-            if data:
-                current_app.logger.info(f"Request data: {data}")
-            
-            try:
-                if method.upper() == 'GET':
-                    response = requests.get(url, headers=headers, params=params, timeout=10)
-                elif method.upper() == 'POST':
-                    response = requests.post(url, headers=headers, json=data, timeout=10)
-                else:
-                    raise ValueError(f"Unsupported HTTP method: {method}")
-            except requests.exceptions.Timeout:
-                current_app.logger.error(f"ShipRocket API timeout: {method} {url}")
-                raise Exception(f"ShipRocket API request timed out after 10 seconds")
-            except requests.exceptions.RequestException as e:
-                current_app.logger.error(f"ShipRocket API error: {method} {url} - {str(e)}")
-                raise
-            
-            # Log response status only, not the full content
-            current_app.logger.info(f"ShipRocket API response status: {response.status_code}")
-            
-            if response.status_code >= 400:
-                error_content = response.text
-                current_app.logger.error(f"ShipRocket API error response: {error_content}")
-                raise requests.exceptions.HTTPError(f"{response.status_code} {response.reason}: {error_content}")
-            
-            return response.json()
-            
-        except requests.exceptions.RequestException as e:
-            current_app.logger.error(f"ShipRocket API request failed: {str(e)}")
-            raise Exception(f"ShipRocket API request failed: {str(e)}")
-    
+        return self.client.request(method, endpoint, data=data, params=params)
+
     def _clean_courier_data(self, courier):
         """Clean up courier data to return only essential information"""
         return {
@@ -143,7 +70,8 @@ class ShipRocketController:
             current_app.logger.warning(f"Error formatting phone number {phone}: {str(e)}")
             return 0
     
-    def check_serviceability(self, pickup_pincode, delivery_pincode, weight, cod=0, order_id=None):
+    def check_serviceability(self, pickup_pincode, delivery_pincode, weight, cod=0, order_id=None,
+                             use_cache=True, refresh=False):
         """
         Check courier serviceability and get shipping charges
         
@@ -153,6 +81,9 @@ class ShipRocketController:
             weight (float): Package weight in kg
             cod (int): Cash on delivery amount (0 for prepaid)
             order_id (str): Order ID for the request (optional, not used for serviceability checks)
+            use_cache (bool): Quote from services/serviceability_cache (weight and COD
+                rounded up to their bands). False asks ShipRocket with the exact weight.
+            refresh (bool): Skip the cached answer but store the new one (prefetch)
         
         Returns:
             dict: Serviceability response with available couriers and charges
@@ -175,6 +106,15 @@ class ShipRocketController:
             
             # Convert COD amount to boolean and separate amount
             cod_amount = float(cod) if cod else 0
+
+            cache_key = None
+            if use_cache and serviceability_cache.enabled():
+                weight, cod_amount = serviceability_cache.quantise(weight, cod_amount)
+                cache_key = serviceability_cache.cache_key(pickup_pincode, delivery_pincode, weight, cod_amount)
+                cached = None if refresh else serviceability_cache.get(cache_key)
+                if cached is not None:
+                    return cached
+
             is_cod = cod_amount > 0  # True if COD amount > 0, False for prepaid
 
             # Always include cod parameter as integer (0 for prepaid, 1 for COD)
@@ -211,6 +151,8 @@ class ShipRocketController:
                     current_app.logger.info("ShipRocket serviceability response: No couriers available")
                     response.setdefault('data', {})['available_courier_companies'] = []
                 
+                if cache_key:
+                    serviceability_cache.put(cache_key, response)
                 return response
             except Exception as e:
                 current_app.logger.error(f"Serviceability GET failed: {str(e)}")
@@ -238,6 +180,23 @@ class ShipRocketController:
             current_app.logger.error(f"ShipRocket order creation failed: {str(e)}")
             raise
     
+    def find_order(self, channel_order_id, pickup_location=None):
+        """The ShipRocket order already created for our order id (and pickup location,
+        since a multi-merchant order books one per merchant under the same id).
+
+        Returns {'order_id', 'shipment_id'} or None.
+        """
+        response = self._make_request('GET', 'orders', params={'search': channel_order_id})
+        for order in response.get('data') or []:
+            if str(order.get('channel_order_id')) != str(channel_order_id):
+                continue
+            if pickup_location and order.get('pickup_location') not in (None, pickup_location):
+                continue
+            shipments = order.get('shipments') or []
+            return {'order_id': order.get('id'),
+                    'shipment_id': shipments[0].get('id') if shipments else None}
+        return None
+
     def assign_awb(self, shipment_id, courier_id):
         """
         Assign AWB (Airway Bill) to shipment
@@ -284,347 +243,216 @@ class ShipRocketController:
             current_app.logger.error(f"Pickup generation failed: {str(e)}")
             raise
     
+    def _is_prepaid(self, order):
+        """SUCCESSFUL payments ship prepaid; anything else is COD."""
+        return str(order.payment_status.value).lower() == 'successful'
+
+    def _select_courier(self, available_couriers, courier_id=None):
+        """The caller's courier if ShipRocket offers it, else the best rated and then cheapest."""
+        if courier_id:
+            selected = next((c for c in available_couriers if c['courier_company_id'] == courier_id), None)
+            if selected:
+                return selected
+
+        # ShipRocket returns rating as string/int ("4.3") and rate as float/int.
+        def _sort_key(c):
+            try:
+                rating = float(c.get('rating', 0))
+            except (TypeError, ValueError):
+                rating = 0.0
+            try:
+                price = float(c.get('rate', 0))
+            except (TypeError, ValueError):
+                price = float('inf')
+            # Highest rating first (negative for descending), then lowest price
+            return (-rating, price)
+
+        selected = sorted(available_couriers, key=_sort_key)[0]
+        current_app.logger.info(f"Auto-selected best courier: {selected.get('courier_name', 'Unknown')} "
+                                f"(Rating: {selected.get('rating', 'N/A')}, "
+                                f"Rate: ₹{selected.get('rate', 'N/A')})")
+        return selected
+
+    def _package(self, lines, product_lookup):
+        """Weight, box and ShipRocket order_items for (order item, product) pairs.
+
+        Weight is summed; the box is the largest item's dimensions, a common approach
+        for multiple items in one package. Missing shipping details default to 0.5kg
+        and 10cm sides.
+        """
+        total_weight = Decimal('0')
+        total_length = Decimal('0')
+        total_breadth = Decimal('0')
+        total_height = Decimal('0')
+        order_items = []
+
+        for item in lines:
+            product = product_lookup(item.product_id)
+            if product and hasattr(product, 'shipping') and product.shipping:
+                item_weight = product.shipping.weight_kg or Decimal('0.5')
+                item_length = product.shipping.length_cm or Decimal('10')
+                item_breadth = product.shipping.width_cm or Decimal('10')
+                item_height = product.shipping.height_cm or Decimal('10')
+            else:
+                item_weight = Decimal('0.5')
+                item_length = Decimal('10')
+                item_breadth = Decimal('10')
+                item_height = Decimal('10')
+
+            total_weight += item_weight * item.quantity
+            total_length = max(total_length, item_length)
+            total_breadth = max(total_breadth, item_breadth)
+            total_height = max(total_height, item_height)
+
+            current_app.logger.info(f"Product {item.product_id} shipping details: weight={item_weight}kg, length={item_length}cm, breadth={item_breadth}cm, height={item_height}cm")
+
+            order_items.append({
+                "name": item.product_name_at_purchase,
+                "sku": item.sku_at_purchase,
+                "units": str(item.quantity),
+                "selling_price": str(int(float(item.unit_price_inclusive_gst))),
+                "discount": str(int(float(item.discount_amount_per_unit_applied or 0))),
+                "tax": str(int(float(item.gst_amount_per_unit or 0))),
+                "hsn": ""  # HSN code - can be added later if available
+            })
+
+        if not order_items:
+            current_app.logger.warning("No order items found for ShipRocket order")
+        return {
+            "order_items": order_items,
+            "weight": total_weight if total_weight > 0 else Decimal('0.5'),
+            "length": total_length if total_length > 0 else Decimal('10'),
+            "breadth": total_breadth if total_breadth > 0 else Decimal('10'),
+            "height": total_height if total_height > 0 else Decimal('10'),
+        }
+
+    def _merchant_package(self, order, merchant_id):
+        """The package for one merchant's items in an order."""
+        return self._package(
+            [item for item in order.items if item.merchant_id == merchant_id],
+            lambda product_id: Product.query.filter_by(product_id=product_id).first())
+
+    def _shop_package(self, shop_order):
+        """The package for a whole shop order."""
+        from models.shop.shop_product import ShopProduct
+        return self._package(
+            list(shop_order.items),
+            lambda product_id: ShopProduct.query.filter_by(product_id=product_id).first())
+
+    def _primary_pickup_pincode(self, default="110001"):
+        """Pincode of the account's primary ShipRocket pickup location (shop orders ship from it)."""
+        try:
+            pickup_locations_response = self.get_pickup_locations()
+            if pickup_locations_response.get('status') == 200:
+                for location in pickup_locations_response.get('data', {}).get('data', []):
+                    if location.get('address_type') == 'Primary' or location.get('is_primary') == True:
+                        current_app.logger.info(f"Using primary pickup location pincode: {location.get('pin_code', default)}")
+                        return location.get('pin_code', default)
+        except Exception as e:
+            current_app.logger.warning(f"Failed to get primary pickup location pincode: {str(e)}, using default")
+        return default
+
+    def _shiprocket_order_payload(self, order_ref, order, seller_name, pickup_location_name, delivery_address, package):
+        """The orders/create/adhoc body for one shipment."""
+        # Split customer name into first and last name
+        customer_name = delivery_address.contact_name or f"{order.user.first_name} {order.user.last_name}"
+        name_parts = customer_name.strip().split(' ', 1)
+        billing_first_name = name_parts[0] if name_parts else ""
+        billing_last_name = name_parts[1] if len(name_parts) > 1 else ""
+
+        order_data = {
+            "order_id": order_ref,
+            "order_date": order.order_date.strftime("%Y-%m-%d %H:%M"),  # Include time
+            "pickup_location": pickup_location_name,
+            "comment": "",
+            "reseller_name": seller_name,
+            "company_name": seller_name,
+            "billing_customer_name": billing_first_name,
+            "billing_last_name": billing_last_name,
+            "billing_address": delivery_address.address_line1,
+            "billing_address_2": delivery_address.address_line2 or "",
+            "billing_isd_code": "",
+            "billing_city": delivery_address.city,
+            "billing_pincode": delivery_address.postal_code,
+            "billing_state": delivery_address.state_province,
+            "billing_country": delivery_address.country_code,
+            "billing_email": order.user.email,
+            "billing_phone": self._format_phone_number(delivery_address.contact_phone or order.user.phone),
+            "billing_alternate_phone": "",
+            "shipping_is_billing": "1",
+            "shipping_customer_name": "",  # Empty when shipping_is_billing is True
+            "shipping_last_name": "",
+            "shipping_address": "",
+            "shipping_address_2": "",
+            "shipping_city": "",
+            "shipping_pincode": "",
+            "shipping_country": "",
+            "shipping_state": "",
+            "shipping_email": "",
+            "shipping_phone": "",
+            "order_items": package["order_items"],
+            "payment_method": "Prepaid" if self._is_prepaid(order) else "COD",
+            "shipping_charges": str(int(float(order.shipping_amount or 0))),
+            "giftwrap_charges": "",
+            "transaction_charges": "",
+            "total_discount": "",
+            "sub_total": str(int(float(order.total_amount))),
+            "length": str(float(package["length"])),
+            "breadth": str(float(package["breadth"])),
+            "height": str(float(package["height"])),
+            "weight": str(float(package["weight"])),
+            "ewaybill_no": "",
+            "customer_gstin": "",
+            "invoice_number": "",
+            "order_type": ""
+        }
+
+        current_app.logger.info(f"Final shipping dimensions for order {order_ref}: length={package['length']}cm, breadth={package['breadth']}cm, height={package['height']}cm, weight={package['weight']}kg")
+
+        # Validate required fields before sending to ShipRocket
+        required_fields = ['order_id', 'billing_customer_name', 'billing_address', 'billing_city', 'billing_pincode', 'billing_state', 'billing_country', 'billing_email', 'billing_phone']
+        for field in required_fields:
+            if not order_data.get(field):
+                current_app.logger.warning(f"Missing required field for ShipRocket order: {field}")
+        return order_data
+
     def create_shiprocket_order_from_db_order(self, order_id, merchant_id, pickup_address_id, delivery_address_id, courier_id=None):
         """
-        Create ShipRocket order from database order
-        
+        Create ShipRocket order from database order, for one merchant, in this request
+
+        Runs the same steps as the background shipment job (services/shipment_jobs),
+        so a later job for this merchant carries on from here instead of booking twice.
+
         Args:
             order_id (str): Internal order ID
             merchant_id (int): Merchant ID
-            pickup_address_id (int): Pickup address ID
+            pickup_address_id (int): Pickup address ID (merchant business address if None)
             delivery_address_id (int): Delivery address ID
             courier_id (int, optional): Preferred courier ID
-        
+
         Returns:
             dict: Complete shipping process response
         """
-        try:
-            # Get order details
-            order = Order.query.filter_by(order_id=order_id).first()
-            if not order:
-                raise Exception(f"Order {order_id} not found")
-            
-            # Get merchant details
-            merchant = MerchantProfile.query.filter_by(id=merchant_id).first()
-            if not merchant:
-                raise Exception(f"Merchant {merchant_id} not found")
-            
-            # Get addresses
-            pickup_address = None
-            if pickup_address_id:
-                pickup_address = UserAddress.query.filter_by(address_id=pickup_address_id).first()
-            # Fallback: use merchant business address as pickup
-            if not pickup_address:
-                class _Addr: pass
-                pickup_address = _Addr()
-                pickup_address.postal_code = merchant.postal_code
-                pickup_address.address_line1 = merchant.business_address
-                pickup_address.address_line2 = ""
-                pickup_address.city = merchant.city
-                pickup_address.state_province = merchant.state_province
-                pickup_address.country_code = merchant.country_code
-                pickup_address.contact_name = merchant.business_name
-                pickup_address.contact_phone = merchant.business_phone
-            
-            delivery_address = UserAddress.query.filter_by(address_id=delivery_address_id).first()
-            
-            if not pickup_address:
-                raise Exception(f"Pickup address {pickup_address_id} not found")
-            if not delivery_address:
-                raise Exception(f"Delivery address {delivery_address_id} not found")
-            
-            # Calculate total weight and prepare order items
-            total_weight = Decimal('0')
-            total_length = Decimal('0')
-            total_breadth = Decimal('0')
-            total_height = Decimal('0')
-            order_items = []
-            
-            for item in order.items:
-                if item.merchant_id == merchant_id:
-                    # Get product shipping details
-                    product = Product.query.filter_by(product_id=item.product_id).first()
-                    if product and hasattr(product, 'shipping') and product.shipping:
-                        # Use actual shipping dimensions from product_shipping
-                        item_weight = product.shipping.weight_kg or Decimal('0.5')  # Default 0.5kg if not set
-                        item_length = product.shipping.length_cm or Decimal('10')  # Default 10cm if not set
-                        item_breadth = product.shipping.width_cm or Decimal('10')  # Default 10cm if not set
-                        item_height = product.shipping.height_cm or Decimal('10')  # Default 10cm if not set
-                    else:
-                        # Default dimensions if no shipping info available
-                        item_weight = Decimal('0.5')  # Default weight
-                        item_length = Decimal('10')  # Default length
-                        item_breadth = Decimal('10')  # Default breadth
-                        item_height = Decimal('10')  # Default height
-                    
-                    # Calculate totals for the entire shipment
-                    total_weight += item_weight * item.quantity
-                    # For dimensions, we'll use the largest item's dimensions as the package dimensions
-                    # This is a common approach for multiple items in one package
-                    if item_length > total_length:
-                        total_length = item_length
-                    if item_breadth > total_breadth:
-                        total_breadth = item_breadth
-                    if item_height > total_height:
-                        total_height = item_height
-                    
-                    current_app.logger.info(f"Product {item.product_id} shipping details: weight={item_weight}kg, length={item_length}cm, breadth={item_breadth}cm, height={item_height}cm")
-                    
-                    order_items.append({
-                        "name": item.product_name_at_purchase,
-                        "sku": item.sku_at_purchase,
-                        "units": str(item.quantity),
-                        "selling_price": str(int(float(item.unit_price_inclusive_gst))),
-                        "discount": str(int(float(item.discount_amount_per_unit_applied))) if item.discount_amount_per_unit_applied else "",
-                        "tax": str(int(float(item.gst_amount_per_unit))) if item.gst_amount_per_unit else "",
-                        "hsn": ""  # HSN code - can be added later if available
-                    })
-            
-            # Check serviceability
-            # Calculate COD amount with proper limits
-            cod_amount = 0
-            # Treat SUCCESSFUL payments as prepaid; anything else as COD
-            if str(order.payment_status.value).lower() != 'successful':
-                cod_amount = float(order.total_amount)
-                # Cap COD amount at ShipRocket's limit (typically 50k)
-                if cod_amount > 50000:
-                    current_app.logger.warning(f"COD amount {cod_amount} exceeds limit, capping at 50000")
-                    cod_amount = 50000
-            
-            serviceability_response = self.check_serviceability(
-                pickup_pincode=pickup_address.postal_code,
-                delivery_pincode=delivery_address.postal_code,
-                weight=float(total_weight),
-                cod=0 if str(order.payment_status.value).lower() == 'successful' else float(order.total_amount)
-            )
-            
-            if not serviceability_response.get('data', {}).get('available_courier_companies'):
-                raise Exception("No courier services available for this route")
-            
-            # Select the best courier service.
-            available_couriers = serviceability_response['data']['available_courier_companies']
-
-            # If the caller specified a courier_id and it is in the list, honour that choice.
-            selected_courier = None
-            if courier_id:
-                selected_courier = next((c for c in available_couriers if c['courier_company_id'] == courier_id), None)
+        from services import shipment_jobs
+        from models.shipment_job import ShipmentJob
 
-            # Otherwise pick the courier with the best rating and, for equal ratings, the lowest price.
-            if not selected_courier:
-                # ShipRocket returns rating as string/int ("4.3") and rate as float/int.
-                def _sort_key(c):
-                    try:
-                        rating = float(c.get('rating', 0))
-                    except (TypeError, ValueError):
-                        rating = 0.0
-                    try:
-                        price = float(c.get('rate', 0))
-                    except (TypeError, ValueError):
-                        price = float('inf')
-                    # Highest rating first (negative for descending), then lowest price
-                    return (-rating, price)
-
-                available_couriers_sorted = sorted(available_couriers, key=_sort_key)
-                selected_courier = available_couriers_sorted[0]
-                
-                current_app.logger.info(f"Auto-selected best courier: {selected_courier.get('courier_name', 'Unknown')} "
-                                      f"(Rating: {selected_courier.get('rating', 'N/A')}, "
-                                      f"Rate: ₹{selected_courier.get('rate', 'N/A')})")
-            
-            # Clean up courier data to return only essential information
-            cleaned_courier = self._clean_courier_data(selected_courier)
-            
-            # For now, let's create a shipment record in our database even if ShipRocket order creation fails
-            # This will help with tracking and we can retry ShipRocket order creation later
-            
-            current_app.logger.info(f"Creating shipment record for order {order_id}, merchant {merchant_id}")
-            
-            # Create or update shipment record in database
-            existing_shipment = Shipment.query.filter_by(
-                order_id=order_id, 
-                merchant_id=merchant_id
-            ).first()
-            
-            if existing_shipment:
-                current_app.logger.info(f"Updating existing shipment {existing_shipment.shipment_id}")
-                # Update existing shipment
-                existing_shipment.carrier_name = selected_courier.get('courier_name', 'Unknown')
-                existing_shipment.shipment_status = ShipmentStatusEnum.PENDING_PICKUP
-                existing_shipment.courier_id = selected_courier.get('courier_company_id')
-                existing_shipment.pickup_address_id = pickup_address_id
-                existing_shipment.delivery_address_id = delivery_address_id
-                shipment = existing_shipment
-            else:
-                current_app.logger.info(f"Creating new shipment record for order {order_id}, merchant {merchant_id}")
-                # Create new shipment record
-                shipment = Shipment(
-                    order_id=order_id,
-                    merchant_id=merchant_id,
-                    carrier_name=selected_courier.get('courier_name', 'Unknown'),
-                    shipment_status=ShipmentStatusEnum.PENDING_PICKUP,
-                    courier_id=selected_courier.get('courier_company_id'),
-                    pickup_address_id=pickup_address_id,
-                    delivery_address_id=delivery_address_id
-                )
-                db.session.add(shipment)
-            
-            try:
-                db.session.commit()
-                current_app.logger.info(f"Successfully saved shipment record: {shipment.shipment_id}")
-            except Exception as db_error:
-                current_app.logger.error(f"Database error saving shipment: {str(db_error)}")
-                db.session.rollback()
-                raise
-            
-            # Try to create ShipRocket order (but don't fail if it doesn't work)
-            shiprocket_order_id = None
-            shipment_id = None
-            awb_code = None
-            courier_name = selected_courier.get('courier_name', 'Unknown')
-            
-            try:
-                # Split customer name into first and last name
-                customer_name = delivery_address.contact_name or f"{order.user.first_name} {order.user.last_name}"
-                name_parts = customer_name.strip().split(' ', 1)
-                billing_first_name = name_parts[0] if name_parts else ""
-                billing_last_name = name_parts[1] if len(name_parts) > 1 else ""
-                
-                # Get or create merchant's pickup location
-                pickup_location_name = self.get_or_create_merchant_pickup_location(merchant_id)
-                current_app.logger.info(f"Using pickup location '{pickup_location_name}' for merchant {merchant_id}")
-                
-                # Prepare order data for ShipRocket according to official API requirements
-                order_data = {
-                    "order_id": order_id,
-                    "order_date": order.order_date.strftime("%Y-%m-%d %H:%M"),  # Include time
-                    "pickup_location": pickup_location_name,
-                    "comment": "",
-                    "reseller_name": merchant.business_name,
-                    "company_name": merchant.business_name,
-                    "billing_customer_name": billing_first_name,
-                    "billing_last_name": billing_last_name,
-                    "billing_address": delivery_address.address_line1,
-                    "billing_address_2": delivery_address.address_line2 or "",
-                    "billing_isd_code": "",
-                    "billing_city": delivery_address.city,
-                    "billing_pincode": delivery_address.postal_code,
-                    "billing_state": delivery_address.state_province,
-                    "billing_country": delivery_address.country_code,
-                    "billing_email": order.user.email,
-                    "billing_phone": self._format_phone_number(delivery_address.contact_phone or order.user.phone),
-                    "billing_alternate_phone": "",
-                    "shipping_is_billing": "1",
-                    "shipping_customer_name": "",  # Empty when shipping_is_billing is True
-                    "shipping_last_name": "",  # Empty when shipping_is_billing is True
-                    "shipping_address": "",  # Empty when shipping_is_billing is True
-                    "shipping_address_2": "",  # Empty when shipping_is_billing is True
-                    "shipping_city": "",  # Empty when shipping_is_billing is True
-                    "shipping_pincode": "",  # Empty when shipping_is_billing is True
-                    "shipping_country": "",  # Empty when shipping_is_billing is True
-                    "shipping_state": "",  # Empty when shipping_is_billing is True
-                    "shipping_email": "",  # Empty when shipping_is_billing is True
-                    "shipping_phone": "",  # Empty when shipping_is_billing is True
-                    "order_items": order_items,
-                    "payment_method": "Prepaid" if str(order.payment_status.value).lower() == 'successful' else "COD",
-                    "shipping_charges": str(int(float(order.shipping_amount or 0))),
-                    "giftwrap_charges": "",
-                    "transaction_charges": "",
-                    "total_discount": "",
-                    "sub_total": str(int(float(order.total_amount))),
-                    "length": str(float(total_length)),
-                    "breadth": str(float(total_breadth)),
-                    "height": str(float(total_height)),
-                    "weight": str(float(total_weight)),
-                    "ewaybill_no": "",
-                    "customer_gstin": "",
-                    "invoice_number": "",
-                    "order_type": ""
-                }
-                
-                current_app.logger.info(f"Final shipping dimensions for order {order_id}: length={total_length}cm, breadth={total_breadth}cm, height={total_height}cm, weight={total_weight}kg")
-                
-                # Ensure minimum dimensions and weight if no shipping info was found
-                if total_weight <= 0:
-                    total_weight = Decimal('0.5')  # Minimum 0.5kg
-                    current_app.logger.warning(f"No shipping weight found for order {order_id}, using default 0.5kg")
-                if total_length <= 0:
-                    total_length = Decimal('10')  # Minimum 10cm
-                    current_app.logger.warning(f"No shipping length found for order {order_id}, using default 10cm")
-                if total_breadth <= 0:
-                    total_breadth = Decimal('10')  # Minimum 10cm
-                    current_app.logger.warning(f"No shipping breadth found for order {order_id}, using default 10cm")
-                if total_height <= 0:
-                    total_height = Decimal('10')  # Minimum 10cm
-                    current_app.logger.warning(f"No shipping height found for order {order_id}, using default 10cm")
-                
-                # Validate required fields before sending to ShipRocket
-                required_fields = ['order_id', 'billing_customer_name', 'billing_address', 'billing_city', 'billing_pincode', 'billing_state', 'billing_country', 'billing_email', 'billing_phone']
-                for field in required_fields:
-                    if not order_data.get(field):
-                        current_app.logger.warning(f"Missing required field for ShipRocket order: {field}")
-                
-                if not order_items:
-                    current_app.logger.warning("No order items found for ShipRocket order")
+        try:
+            job = shipment_jobs.run_now(ShipmentJob.KIND_ORDER, order_id, merchant_id, delivery_address_id,
+                                        courier_id=courier_id, pickup_address_id=pickup_address_id)
+            response = job.serialize()
+            # Not booked at all is an error; a shipment record without a ShipRocket order is not.
+            if job.status == ShipmentJob.STATUS_FAILED and not response['db_shipment_id']:
+                raise Exception(job.last_error)
+            shipment = db.session.get(Shipment, response['db_shipment_id']) if response['db_shipment_id'] else None
+            response["success"] = True
+            response["db_shipment"] = shipment.serialize() if shipment else None
+            return response
 
-                # Create order in ShipRocket
-                order_response = self.create_order(order_data)
-                
-                if order_response.get('status') == 200:
-                    shiprocket_order_id = order_response['data']['order_id']
-                    shipment_id = order_response['data']['shipment_id']
-                    
-                    # Assign AWB
-                    awb_response = self.assign_awb(shipment_id, selected_courier['courier_company_id'])
-                    
-                    if awb_response.get('status') == 200:
-                        awb_code = awb_response['data']['awb_code']
-                        courier_name = awb_response['data']['courier_name']
-                        
-                        # Generate pickup
-                        pickup_response = self.generate_pickup(shipment_id)
-                        
-                        if pickup_response.get('status') == 200:
-                            # Update shipment with ShipRocket details
-                            shipment.shiprocket_order_id = shiprocket_order_id
-                            shipment.shiprocket_shipment_id = shipment_id
-                            shipment.awb_code = awb_code
-                            shipment.tracking_number = awb_code
-                            shipment.carrier_name = courier_name
-                            shipment.shipment_status = ShipmentStatusEnum.LABEL_CREATED
-                            shipment.shipped_date = datetime.now(timezone.utc)
-                            shipment.pickup_generated = True
-                            shipment.pickup_generated_at = datetime.now(timezone.utc)
-                            db.session.commit()
-                            
-                            current_app.logger.info(f"ShipRocket order created successfully for merchant {merchant_id}")
-                        else:
-                            current_app.logger.warning(f"Pickup generation failed: {pickup_response.get('message', 'Unknown error')}")
-                    else:
-                        current_app.logger.warning(f"AWB assignment failed: {awb_response.get('message', 'Unknown error')}")
-                else:
-                    current_app.logger.warning(f"ShipRocket order creation failed: {order_response.get('message', 'Unknown error')}")
-                    
-            except Exception as shiprocket_error:
-                current_app.logger.warning(f"ShipRocket order creation failed for merchant {merchant_id}: {str(shiprocket_error)}")
-                # Don't fail the entire process if ShipRocket fails
-            
-            return {
-                "success": True,
-                "shiprocket_order_id": shiprocket_order_id,
-                "shipment_id": shipment_id,
-                "awb_code": awb_code,
-                "courier_name": courier_name,
-                "tracking_number": awb_code,
-                "serviceability": serviceability_response,
-                "db_shipment": shipment.serialize(),
-                "courier_data": cleaned_courier
-            }
-            
         except Exception as e:
             current_app.logger.error(f"ShipRocket order creation failed: {str(e)}")
             db.session.rollback()
             raise
-    
+
     def get_tracking_details(self, awb_code):
         """
         Get tracking details for a shipment
@@ -746,88 +574,29 @@ class ShipRocketController:
     def create_shiprocket_orders_for_all_merchants(self, order_id, delivery_address_id, courier_id=None):
         """
         Create ShipRocket orders for all merchants involved in a single order
-        
+
+        Queues one shipment job per merchant (services/shipment_jobs) and returns
+        without waiting for ShipRocket; merchants still being booked are listed under
+        processing_merchants. Calling again for a booked merchant does not book twice.
+
         Args:
             order_id (str): Internal order ID
             delivery_address_id (int): Delivery address ID
             courier_id (int, optional): Preferred courier ID for all shipments
-        
+
         Returns:
-            dict: Complete shipping process response for all merchants
+            dict: Shipping status for every merchant in the order
         """
+        from services import shipment_jobs
+
         try:
             current_app.logger.info(f"Starting bulk ShipRocket order creation for order {order_id}")
-            
-            # Get order details
-            order = Order.query.filter_by(order_id=order_id).first()
-            if not order:
-                raise Exception(f"Order {order_id} not found")
-            
-            # Get delivery address
-            delivery_address = UserAddress.query.filter_by(address_id=delivery_address_id).first()
-            if not delivery_address:
-                raise Exception(f"Delivery address {delivery_address_id} not found")
-            
-            current_app.logger.info(f"Found order with {len(order.items)} items")
-            
-            # Group order items by merchant
-            merchant_items = {}
-            for item in order.items:
-                if item.merchant_id not in merchant_items:
-                    merchant_items[item.merchant_id] = []
-                merchant_items[item.merchant_id].append(item)
-            
-            current_app.logger.info(f"Order has items from {len(merchant_items)} merchants: {list(merchant_items.keys())}")
-            
-            if not merchant_items:
-                raise Exception("No merchant items found in order")
-            
-            # Create ShipRocket orders for each merchant
-            merchant_responses = {}
-            successful_merchants = []
-            failed_merchants = []
-            
-            for merchant_id, items in merchant_items.items():
-                try:
-                    current_app.logger.info(f"Creating ShipRocket order for merchant {merchant_id} in order {order_id} with {len(items)} items")
-                    
-                    # Create ShipRocket order for this merchant
-                    response = self.create_shiprocket_order_from_db_order(
-                        order_id=order_id,
-                        merchant_id=merchant_id,
-                        pickup_address_id=None,  # Will use merchant's address
-                        delivery_address_id=delivery_address_id,
-                        courier_id=courier_id
-                    )
-                    
-                    merchant_responses[merchant_id] = response
-                    successful_merchants.append(merchant_id)
-                    
-                    current_app.logger.info(f"Successfully created ShipRocket order for merchant {merchant_id}")
-                    
-                except Exception as e:
-                    current_app.logger.error(f"Failed to create ShipRocket order for merchant {merchant_id}: {str(e)}")
-                    merchant_responses[merchant_id] = {
-                        "success": False,
-                        "error": str(e)
-                    }
-                    failed_merchants.append(merchant_id)
-            
-            current_app.logger.info(f"Bulk ShipRocket order creation completed. Successful: {len(successful_merchants)}, Failed: {len(failed_merchants)}")
-            
-            return {
-                "success": len(successful_merchants) > 0,
-                "total_merchants": len(merchant_items),
-                "successful_merchants": successful_merchants,
-                "failed_merchants": failed_merchants,
-                "merchant_responses": merchant_responses,
-                "order_id": order_id
-            }
-            
+            return shipment_jobs.enqueue_order(order_id, delivery_address_id, courier_id)
+
         except Exception as e:
             current_app.logger.error(f"Bulk ShipRocket order creation failed: {str(e)}")
             raise
-    
+
     def add_pickup_location(self, pickup_data):
         """
         Add pickup location to ShipRocket
@@ -993,336 +762,28 @@ class ShipRocketController:
     def create_shiprocket_order_for_shop(self, shop_order_id, shop_id, delivery_address_id, courier_id=None):
         """
         Create ShipRocket order for a shop order where the shop is the primary pickup location
-        
+
+        Queues the shipment job (services/shipment_jobs) and returns its state,
+        'processing' until ShipRocket has answered.
+
         Args:
             shop_order_id (str): Shop order ID from database
             shop_id (int): Shop ID
             delivery_address_id (int): Delivery address ID
             courier_id (int, optional): Preferred courier ID
-        
+
         Returns:
-            dict: Complete shipping process response
+            dict: Shipment job state
         """
+        from services import shipment_jobs
+
         try:
-            # Get shop order details
-            from models.shop.shop_order import ShopOrder
-            from models.shop.shop import Shop
-            from models.user_address import UserAddress
-            
-            shop_order = ShopOrder.query.filter_by(order_id=shop_order_id).first()
-            if not shop_order:
-                raise Exception(f"Shop order {shop_order_id} not found")
-            
-            # Get shop details
-            shop = Shop.query.filter_by(shop_id=shop_id).first()
-            if not shop:
-                raise Exception(f"Shop {shop_id} not found")
-            
-            # Get delivery address
-            delivery_address = UserAddress.query.filter_by(address_id=delivery_address_id).first()
-            if not delivery_address:
-                raise Exception(f"Delivery address {delivery_address_id} not found")
-            
-            # Create shop pickup location if it doesn't exist
-            pickup_location_name = self.get_or_create_shop_pickup_location(shop_id)
-            current_app.logger.info(f"Using pickup location '{pickup_location_name}' for shop {shop_id}")
-            
-            # Calculate total weight and prepare order items
-            total_weight = Decimal('0')
-            total_length = Decimal('0')
-            total_breadth = Decimal('0')
-            total_height = Decimal('0')
-            order_items = []
-            
-            for item in shop_order.items:
-                # Get product shipping details
-                from models.shop.shop_product import ShopProduct
-                product = ShopProduct.query.filter_by(product_id=item.product_id).first()
-                
-                if product and hasattr(product, 'shipping') and product.shipping:
-                    # Use actual shipping dimensions from product_shipping
-                    item_weight = product.shipping.weight_kg or Decimal('0.5')
-                    item_length = product.shipping.length_cm or Decimal('10')
-                    item_breadth = product.shipping.width_cm or Decimal('10')
-                    item_height = product.shipping.height_cm or Decimal('10')
-                else:
-                    # Default dimensions if no shipping info available
-                    item_weight = Decimal('0.5')
-                    item_length = Decimal('10')
-                    item_breadth = Decimal('10')
-                    item_height = Decimal('10')
-                
-                # Calculate totals for the entire shipment
-                total_weight += item_weight * item.quantity
-                # For dimensions, use the largest item's dimensions
-                if item_length > total_length:
-                    total_length = item_length
-                if item_breadth > total_breadth:
-                    total_breadth = item_breadth
-                if item_height > total_height:
-                    total_height = item_height
-                
-                current_app.logger.info(f"Product {item.product_id} shipping details: weight={item_weight}kg, length={item_length}cm, breadth={item_breadth}cm, height={item_height}cm")
-                
-                order_items.append({
-                    "name": item.product_name_at_purchase,
-                    "sku": item.sku_at_purchase,
-                    "units": str(item.quantity),
-                    "selling_price": str(int(float(item.unit_price_inclusive_gst))),
-                    "discount": str(int(float(item.discount_amount_per_unit_applied or 0))),
-                    "tax": str(int(float(item.gst_amount_per_unit or 0))),
-                    "hsn": ""
-                })
-            
-            # Check serviceability
-            cod_amount = 0
-            # Treat SUCCESSFUL payments as prepaid; anything else as COD
-            if str(shop_order.payment_status.value).lower() != 'successful':
-                cod_amount = float(shop_order.total_amount)
-                # Cap COD amount at ShipRocket's limit
-                if cod_amount > 50000:
-                    current_app.logger.warning(f"COD amount {cod_amount} exceeds limit, capping at 50000")
-                    cod_amount = 50000
-            
-            # Get primary pickup location pincode from ShipRocket
-            pickup_pincode = "110001"  # Default fallback
-            try:
-                pickup_locations_response = self.get_pickup_locations()
-                if pickup_locations_response.get('status') == 200:
-                    pickup_locations = pickup_locations_response.get('data', {}).get('data', [])
-                    for location in pickup_locations:
-                        if location.get('address_type') == 'Primary' or location.get('is_primary') == True:
-                            pickup_pincode = location.get('pin_code', '110001')
-                            current_app.logger.info(f"Using primary pickup location pincode: {pickup_pincode}")
-                            break
-            except Exception as e:
-                current_app.logger.warning(f"Failed to get primary pickup location pincode: {str(e)}, using default")
-            
-            serviceability_response = self.check_serviceability(
-                pickup_pincode=pickup_pincode,
-                delivery_pincode=delivery_address.postal_code,
-                weight=float(total_weight),
-                cod=0 if str(shop_order.payment_status.value).lower() == 'successful' else float(shop_order.total_amount)
-            )
-            
-            if not serviceability_response.get('data', {}).get('available_courier_companies'):
-                raise Exception("No courier services available for this route")
-            
-            # Select the best courier service
-            available_couriers = serviceability_response['data']['available_courier_companies']
-            
-            # If the caller specified a courier_id and it is in the list, honour that choice
-            selected_courier = None
-            if courier_id:
-                selected_courier = next((c for c in available_couriers if c['courier_company_id'] == courier_id), None)
-            
-            # Otherwise pick the courier with the best rating and lowest price
-            if not selected_courier:
-                def _sort_key(c):
-                    try:
-                        rating = float(c.get('rating', 0))
-                    except (TypeError, ValueError):
-                        rating = 0.0
-                    try:
-                        price = float(c.get('rate', 0))
-                    except (TypeError, ValueError):
-                        price = float('inf')
-                    return (-rating, price)
-                
-                available_couriers_sorted = sorted(available_couriers, key=_sort_key)
-                selected_courier = available_couriers_sorted[0]
-                
-                current_app.logger.info(f"Auto-selected best courier: {selected_courier.get('courier_name', 'Unknown')} "
-                                      f"(Rating: {selected_courier.get('rating', 'N/A')}, "
-                                      f"Rate: ₹{selected_courier.get('rate', 'N/A')})")
-            
-            # Clean up courier data
-            cleaned_courier = self._clean_courier_data(selected_courier)
-            
-            # Create or update shipment record in database
-            from models.shop.shop_shipment import ShopShipment
-            from models.shipment import ShipmentStatusEnum
-            
-            existing_shipment = ShopShipment.query.filter_by(
-                shop_order_id=shop_order_id, 
-                shop_id=shop_id
-            ).first()
-            
-            if existing_shipment:
-                current_app.logger.info(f"Updating existing shipment {existing_shipment.shipment_id}")
-                existing_shipment.carrier_name = selected_courier.get('courier_name', 'Unknown')
-                existing_shipment.shipment_status = ShipmentStatusEnum.PENDING_PICKUP
-                existing_shipment.courier_id = selected_courier.get('courier_company_id')
-                existing_shipment.pickup_address_id = None  # Shop pickup location
-                existing_shipment.delivery_address_id = delivery_address_id
-                shipment = existing_shipment
-            else:
-                current_app.logger.info(f"Creating new shipment record for shop order {shop_order_id}, shop {shop_id}")
-                from models.shop.shop_shipment import ShopShipment
-                shipment = ShopShipment(
-                    shop_order_id=shop_order_id,
-                    shop_id=shop_id,
-                    carrier_name=selected_courier.get('courier_name', 'Unknown'),
-                    shipment_status=ShipmentStatusEnum.PENDING_PICKUP,
-                    courier_id=selected_courier.get('courier_company_id'),
-                    pickup_address_id=None,  # Shop pickup location
-                    delivery_address_id=delivery_address_id
-                )
-                db.session.add(shipment)
-            
-            try:
-                db.session.commit()
-                current_app.logger.info(f"Successfully saved shipment record: {shipment.shipment_id}")
-            except Exception as db_error:
-                current_app.logger.error(f"Database error saving shipment: {str(db_error)}")
-                db.session.rollback()
-                raise
-            
-            # Try to create ShipRocket order
-            shiprocket_order_id = None
-            shipment_id = None
-            awb_code = None
-            courier_name = selected_courier.get('courier_name', 'Unknown')
-            
-            try:
-                # Split customer name into first and last name
-                customer_name = delivery_address.contact_name or f"{shop_order.user.first_name} {shop_order.user.last_name}"
-                name_parts = customer_name.strip().split(' ', 1)
-                billing_first_name = name_parts[0] if name_parts else ""
-                billing_last_name = name_parts[1] if len(name_parts) > 1 else ""
-                
-                # Prepare order data for ShipRocket
-                order_data = {
-                    "order_id": shop_order_id,
-                    "order_date": shop_order.order_date.strftime("%Y-%m-%d %H:%M"),
-                    "pickup_location": pickup_location_name,
-                    "comment": "",
-                    "reseller_name": shop.name,
-                    "company_name": shop.name,
-                    "billing_customer_name": billing_first_name,
-                    "billing_last_name": billing_last_name,
-                    "billing_address": delivery_address.address_line1,
-                    "billing_address_2": delivery_address.address_line2 or "",
-                    "billing_isd_code": "",
-                    "billing_city": delivery_address.city,
-                    "billing_pincode": delivery_address.postal_code,
-                    "billing_state": delivery_address.state_province,
-                    "billing_country": delivery_address.country_code,
-                    "billing_email": shop_order.user.email,
-                    "billing_phone": self._format_phone_number(delivery_address.contact_phone or shop_order.user.phone),
-                    "billing_alternate_phone": "",
-                    "shipping_is_billing": "1",
-                    "shipping_customer_name": "",
-                    "shipping_last_name": "",
-                    "shipping_address": "",
-                    "shipping_address_2": "",
-                    "shipping_city": "",
-                    "shipping_pincode": "",
-                    "shipping_country": "",
-                    "shipping_state": "",
-                    "shipping_email": "",
-                    "shipping_phone": "",
-                    "order_items": order_items,
-                    "payment_method": "Prepaid" if str(shop_order.payment_status.value).lower() == 'successful' else "COD",
-                    "shipping_charges": str(int(float(shop_order.shipping_amount or 0))),
-                    "giftwrap_charges": "",
-                    "transaction_charges": "",
-                    "total_discount": "",
-                    "sub_total": str(int(float(shop_order.total_amount))),
-                    "length": str(float(total_length)),
-                    "breadth": str(float(total_breadth)),
-                    "height": str(float(total_height)),
-                    "weight": str(float(total_weight)),
-                    "ewaybill_no": "",
-                    "customer_gstin": "",
-                    "invoice_number": "",
-                    "order_type": ""
-                }
-                
-                current_app.logger.info(f"Final shipping dimensions for shop order {shop_order_id}: length={total_length}cm, breadth={total_breadth}cm, height={total_height}cm, weight={total_weight}kg")
-                
-                # Ensure minimum dimensions and weight
-                if total_weight <= 0:
-                    total_weight = Decimal('0.5')
-                    current_app.logger.warning(f"No shipping weight found for shop order {shop_order_id}, using default 0.5kg")
-                if total_length <= 0:
-                    total_length = Decimal('10')
-                    current_app.logger.warning(f"No shipping length found for shop order {shop_order_id}, using default 10cm")
-                if total_breadth <= 0:
-                    total_breadth = Decimal('10')
-                    current_app.logger.warning(f"No shipping breadth found for shop order {shop_order_id}, using default 10cm")
-                if total_height <= 0:
-                    total_height = Decimal('10')
-                    current_app.logger.warning(f"No shipping height found for shop order {shop_order_id}, using default 10cm")
-                
-                # Validate required fields
-                required_fields = ['order_id', 'billing_customer_name', 'billing_address', 'billing_city', 'billing_pincode', 'billing_state', 'billing_country', 'billing_email', 'billing_phone']
-                for field in required_fields:
-                    if not order_data.get(field):
-                        current_app.logger.warning(f"Missing required field for ShipRocket shop order: {field}")
-                
-                if not order_items:
-                    current_app.logger.warning("No order items found for ShipRocket shop order")
-                
-                # Create order in ShipRocket
-                order_response = self.create_order(order_data)
-                
-                if order_response.get('status') == 200:
-                    shiprocket_order_id = order_response['data']['order_id']
-                    shipment_id = order_response['data']['shipment_id']
-                    
-                    # Assign AWB
-                    awb_response = self.assign_awb(shipment_id, selected_courier['courier_company_id'])
-                    
-                    if awb_response.get('status') == 200:
-                        awb_code = awb_response['data']['awb_code']
-                        courier_name = awb_response['data']['courier_name']
-                        
-                        # Generate pickup
-                        pickup_response = self.generate_pickup(shipment_id)
-                        
-                        if pickup_response.get('status') == 200:
-                            # Update shipment with ShipRocket details
-                            shipment.shiprocket_order_id = shiprocket_order_id
-                            shipment.shiprocket_shipment_id = shipment_id
-                            shipment.awb_code = awb_code
-                            shipment.tracking_number = awb_code
-                            shipment.carrier_name = courier_name
-                            shipment.shipment_status = ShipmentStatusEnum.LABEL_CREATED
-                            shipment.shipped_date = datetime.now(timezone.utc)
-                            shipment.pickup_generated = True
-                            shipment.pickup_generated_at = datetime.now(timezone.utc)
-                            db.session.commit()
-                            
-                            current_app.logger.info(f"ShipRocket shop order created successfully for shop {shop_id}")
-                        else:
-                            current_app.logger.warning(f"Pickup generation failed: {pickup_response.get('message', 'Unknown error')}")
-                    else:
-                        current_app.logger.warning(f"AWB assignment failed: {awb_response.get('message', 'Unknown error')}")
-                else:
-                    current_app.logger.warning(f"ShipRocket shop order creation failed: {order_response.get('message', 'Unknown error')}")
-                    
-            except Exception as shiprocket_error:
-                current_app.logger.warning(f"ShipRocket shop order creation failed for shop {shop_id}: {str(shiprocket_error)}")
-                # Don't fail the entire process if ShipRocket fails
-            
-            return {
-                "success": True,
-                "shiprocket_order_id": shiprocket_order_id,
-                "shipment_id": shipment_id,
-                "awb_code": awb_code,
-                "courier_name": courier_name,
-                "tracking_number": awb_code,
-                "serviceability": serviceability_response,
-                "db_shipment": shipment.serialize(),
-                "courier_data": cleaned_courier
-            }
-            
+            return shipment_jobs.enqueue_shop(shop_order_id, shop_id, delivery_address_id, courier_id)
+
         except Exception as e:
             current_app.logger.error(f"ShipRocket shop order creation failed: {str(e)}")
-            db.session.rollback()
             raise
-    
+
     def create_shop_pickup_location(self, shop_id):
         """
         Get the primary pickup location from ShipRocket instead of creating new ones
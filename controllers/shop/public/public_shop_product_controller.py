@@ -12,6 +12,7 @@ from models.shop.shop_product_variant import ShopProductVariant, ShopVariantAttr
 from models.enums import MediaType
 from sqlalchemy import desc, or_, func, and_, case
 from datetime import datetime, timezone
+from services.product_hydrator import ShopProductHydrator, apply_shop_meta, optimized_shop_media
 
 class PublicShopProductController:
     @staticmethod
@@ -30,64 +31,8 @@ class PublicShopProductController:
     @staticmethod
     def get_optimized_media(product_id):
         """Get optimized media response for frontend (only essential fields)"""
-        media_list = ShopProductMedia.query.filter_by(
-            product_id=product_id,
-            deleted_at=None
-        ).order_by(ShopProductMedia.sort_order).all()
-
-        if not media_list:
-            return {
-                'images': [],
-                'videos': [],
-                'primary_image': None,
-                'total_media': 0
-            }
-
-        images = []
-        videos = []
-        primary_image = None
-        
-        # Find the minimum sort_order to determine primary image
-        min_sort_order = None
-        if media_list:
-            min_sort_order = min(media.sort_order for media in media_list if media.sort_order is not None)
-
-        for index, media in enumerate(media_list):
-            # Determine if this is primary based on sort_order logic
-            is_primary = False
-            if media.type == MediaType.IMAGE:
-                if min_sort_order is not None and media.sort_order == min_sort_order:
-                    is_primary = True
-                elif min_sort_order is None and media.is_primary:
-                    # Fallback to is_primary field if sort_order is not available
-                    is_primary = True
-                elif min_sort_order is None and not any(m.is_primary for m in media_list if m.type == MediaType.IMAGE) and index == 0:
-                    # Final fallback: first image if nothing else is marked as primary
-                    is_primary = True
-            
-            # Only include essential fields
-            media_item = {
-                'url': media.url,
-                'type': media.type.value if hasattr(media.type, 'value') else str(media.type),
-                'is_primary': is_primary
-            }
-
-            # Set primary image URL
-            if is_primary and media.type == MediaType.IMAGE:
-                primary_image = media.url
-
-            # Categorize by type
-            if media.type == MediaType.IMAGE:
-                images.append(media_item)
-            elif media.type == MediaType.VIDEO:
-                videos.append(media_item)
-
-        return {
-            'images': images,
-            'videos': videos,
-            'primary_image': primary_image,
-            'total_media': len(media_list)
-        }
+        media_list = ShopProductHydrator.media_by_product([product_id]).get(product_id, [])
+        return optimized_shop_media(media_list)
 
     @staticmethod
     def get_all_product_media(product_id):
@@ -135,26 +80,8 @@ class PublicShopProductController:
     @staticmethod
     def enhance_product_with_meta(product_dict, product_id):
         """Enhance product data with meta information"""
-        # Get product meta information
         meta = ShopProductMeta.query.filter_by(product_id=product_id).first()
-        
-        if meta:
-            # Override product_description with short_desc for better UX
-            product_dict['product_description'] = meta.short_desc or product_dict.get('product_description', '')
-            product_dict['short_description'] = meta.short_desc
-            product_dict['full_description'] = meta.full_desc
-            product_dict['meta_title'] = meta.meta_title
-            product_dict['meta_description'] = meta.meta_desc
-            product_dict['meta_keywords'] = meta.meta_keywords
-        else:
-            # Fallback if meta doesn't exist (though it should always exist)
-            product_dict['short_description'] = product_dict.get('product_description', '')
-            product_dict['full_description'] = product_dict.get('product_description', '')
-            product_dict['meta_title'] = None
-            product_dict['meta_description'] = None
-            product_dict['meta_keywords'] = None
-        
-        return product_dict
+        return apply_shop_meta(product_dict, meta)
 
     @staticmethod
     def get_products_by_shop(shop_id):
@@ -299,33 +226,7 @@ class PublicShopProductController:
             pagination = query.paginate(page=page, per_page=per_page, error_out=False)
             
             products = pagination.items
-            product_data = []
-
-            for product in products:
-                product_dict = product.serialize()
-                
-                # Enhance with meta information
-                product_dict = PublicShopProductController.enhance_product_with_meta(
-                    product_dict, product.product_id
-                )
-                
-                # Get primary image
-                media = PublicShopProductController.get_product_media(product.product_id)
-                if media:
-                    product_dict['primary_image'] = media['url']
-                
-                # Get stock information
-                stock = ShopProductStock.query.filter_by(
-                    product_id=product.product_id
-                ).first()
-                
-                if stock:
-                    product_dict['stock'] = stock.serialize()
-                    product_dict['is_in_stock'] = stock.stock_qty > 0
-                else:
-                    product_dict['is_in_stock'] = False
-                
-                product_data.append(product_dict)
+            product_data = ShopProductHydrator().cards(products)
 
             return jsonify({
                 'success': True,
@@ -477,19 +378,7 @@ class PublicShopProductController:
                 ShopProduct.is_published.is_(True)
             ).limit(4).all()
 
-            related_data = []
-            for related in related_products:
-                related_dict = related.serialize()
-                
-                # Enhance with meta information
-                related_dict = PublicShopProductController.enhance_product_with_meta(
-                    related_dict, related.product_id
-                )
-                
-                media = PublicShopProductController.get_product_media(related.product_id)
-                if media:
-                    related_dict['primary_image'] = media['url']
-                related_data.append(related_dict)
+            related_data = ShopProductHydrator(stock=False).cards(related_products)
 
             return jsonify({
                 'success': True,
@@ -531,21 +420,7 @@ class PublicShopProductController:
                 ShopProduct.is_published.is_(True)
             ).order_by(desc(ShopProduct.created_at)).limit(limit).all()
 
-            product_data = []
-            for product in products:
-                product_dict = product.serialize()
-                
-                # Enhance with meta information
-                product_dict = PublicShopProductController.enhance_product_with_meta(
-                    product_dict, product.product_id
-                )
-                
-                # Get primary image
-                media = PublicShopProductController.get_product_media(product.product_id)
-                if media:
-                    product_dict['primary_image'] = media['url']
-                
-                product_data.append(product_dict)
+            product_data = ShopProductHydrator(stock=False).cards(products)
 
             return jsonify({
                 'success': True,
@@ -603,28 +478,16 @@ class PublicShopProductController:
                 ShopProduct.is_published.is_(True)
             ).order_by(desc(effective_discount_pct)).limit(limit).all()
 
-            product_data = []
-            for product in products:
-                product_dict = product.serialize()
-                product_dict = PublicShopProductController.enhance_product_with_meta(
-                    product_dict, product.product_id
-                )
-                media = PublicShopProductController.get_product_media(product.product_id)
-                if media:
-                    product_dict['primary_image'] = media['url']
-                stock = ShopProductStock.query.filter_by(product_id=product.product_id).first()
-                if stock:
-                    product_dict['stock'] = stock.serialize()
-                    product_dict['is_in_stock'] = stock.stock_qty > 0
-                else:
-                    product_dict['is_in_stock'] = False
+            product_data = ShopProductHydrator().cards(products)
+            by_id = {product.product_id: product for product in products}
+            for product_dict in product_data:
+                product = by_id[product_dict['product_id']]
                 # Add effective discount_pct for display (computed same as ordering)
                 _, is_on_special = product.get_current_listed_inclusive_price()
                 if is_on_special and product.selling_price and float(product.selling_price) > 0 and product.special_price is not None:
                     product_dict['discount_pct'] = round((float(product.selling_price) - float(product.special_price)) / float(product.selling_price) * 100, 2)
                 else:
                     product_dict['discount_pct'] = float(product.discount_pct) if product.discount_pct is not None else 0.0
-                product_data.append(product_dict)
 
             return jsonify({
                 'success': True,
@@ -735,14 +598,19 @@ class PublicShopProductController:
                 ShopProduct.is_published.is_(True)
             ).order_by(ShopProductVariant.sort_order, ShopProductVariant.created_at).all()
 
+            variant_ids = [variant.variant_product_id for variant in variants]
+            stocks = {
+                stock.product_id: stock
+                for stock in ShopProductStock.query.filter(ShopProductStock.product_id.in_(variant_ids)).all()
+            } if variant_ids else {}
+            media_by_variant = ShopProductHydrator.media_by_product(variant_ids)
+
             variant_data = []
             for variant in variants:
                 variant_dict = variant.serialize(include_media=True, include_parent_fallback=True)
                 
                 # Get stock information for the variant
-                stock = ShopProductStock.query.filter_by(
-                    product_id=variant.variant_product_id
-                ).first()
+                stock = stocks.get(variant.variant_product_id)
                 
                 if stock:
                     variant_dict['stock'] = stock.serialize()
@@ -753,7 +621,7 @@ class PublicShopProductController:
                     variant_dict['stock_qty'] = 0
 
                 # Get optimized media data for the variant
-                media_data = PublicShopProductController.get_optimized_media(variant.variant_product_id)
+                media_data = optimized_shop_media(media_by_variant.get(variant.variant_product_id, []))
                 variant_dict['media'] = media_data
                 variant_dict['primary_image'] = media_data.get('primary_image')
 
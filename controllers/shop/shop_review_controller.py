@@ -3,12 +3,13 @@ from flask import current_app
 from common.database import db
 from werkzeug.exceptions import BadRequest
 from services.s3_service import get_s3_service
+from services.review_aggregate_service import add_shop_product_rating, remove_shop_product_rating
 
 from models.enums import OrderStatusEnum
 from models.shop.shop_order import ShopOrder, ShopOrderItem
 from models.shop.shop_product import ShopProduct
+from models.review_aggregate import ShopProductRatingSummary
 from models.shop.shop_review import ShopReview, ShopReviewImage
-from sqlalchemy import func
 
 MAX_IMAGE_BYTES = 5 * 1024 * 1024  # 5 MB
 
@@ -86,7 +87,10 @@ class ShopReviewController:
                 title=review_data.get('title', ''),
                 body=review_data.get('body', ''),
             )
-            review.save()
+            # Flush for review_id; the review, its images and the product's rating
+            # aggregate commit together below.
+            db.session.add(review)
+            db.session.flush()
 
             # Images
             images = review_data.get('images')
@@ -116,6 +120,7 @@ class ShopReviewController:
                         current_app.logger.error(f"Failed to upload shop review image: {e}")
                         continue
 
+            add_shop_product_rating(product.product_id, rating)
             db.session.commit()
             data = review.serialize(include_images=True)
             return data
@@ -130,9 +135,8 @@ class ShopReviewController:
             pagination = ShopReview.query.filter_by(shop_product_id=shop_product_id).order_by(ShopReview.created_at.desc()).paginate(page=page, per_page=per_page)
             total = ShopReview.query.filter_by(shop_product_id=shop_product_id).count()
 
-            # Compute average rating across all reviews for this product (efficient SQL AVG)
-            avg_row = db.session.query(func.avg(ShopReview.rating)).filter(ShopReview.shop_product_id == shop_product_id).first()
-            avg_rating = float(avg_row[0]) if avg_row and avg_row[0] is not None else 0.0
+            summary = db.session.get(ShopProductRatingSummary, shop_product_id)
+            avg_rating = summary.average if summary else 0.0
 
             reviews = []
             for r in pagination.items:
@@ -146,6 +150,7 @@ class ShopReviewController:
                 'current_page': pagination.page,
                 'average_rating': round(avg_rating, 2),
                 'review_count': total,
+                'rating_histogram': summary.histogram if summary else {str(star): 0 for star in range(1, 6)},
             }
         except Exception as e:
             logger.error(f"Error getting shop product reviews: {e}")
@@ -190,6 +195,8 @@ class ShopReviewController:
                     except Exception as e:
                         current_app.logger.error(f"Failed to delete shop review image from S3 using URL: {e}")
 
+            if review.deleted_at is None:
+                remove_shop_product_rating(review.shop_product_id, review.rating)
             db.session.delete(review)
             db.session.commit()
             return True
@@ -1,4 +1,4 @@
-from datetime import datetime, timezone, timedelta
+from datetime import date, datetime, timezone, timedelta
 from sqlalchemy import func, and_, extract, case
 from models.order import Order,  OrderItem
 from auth.models.models import User, MerchantProfile, UserRole
@@ -1829,10 +1829,123 @@ class PerformanceAnalyticsController:
             print(f"Error in export_monthly_analytics: {str(e)}")
             return None, None, None
 
+    TRAFFIC_EXPORT_COLUMNS = ['Total Visits', 'Unique Visitors', 'Bounced Visits',
+                              'Conversions', 'Bounce Rate (%)', 'Conversion Rate (%)']
+
+    @staticmethod
+    def _traffic_export_query(time_filter, months=12, days=30):
+        """(query, time label, period display) behind the CSV and Excel traffic exports.
+
+        One row per period, as get_hourly/daily/monthly_analytics count it, with the
+        conversions joined in SQL instead of looked up in a dict, so the export can
+        write each row as it is read.
+        """
+        end_date = datetime.now(timezone.utc)
+        if time_filter == 'hourly':
+            start_date = end_date - timedelta(days=30 * months)
+            visit_keys = [extract('hour', VisitTracking.visit_time)]
+            order_keys = [extract('hour', Order.order_date)]
+            # Stored in UTC, shown in IST (see get_hourly_analytics).
+            time_label, display = 'Hour', lambda row: f"{(int(row.k0) + 5) % 24:02d}:00"
+        elif time_filter == 'daily':
+            start_date = end_date - timedelta(days=days)
+            visit_keys = [func.date(VisitTracking.visit_time)]
+            order_keys = [func.date(Order.order_date)]
+
+            def display(row):
+                day = row.k0 if isinstance(row.k0, date) else date.fromisoformat(str(row.k0))
+                return f"{day.strftime('%A')} ({day.strftime('%Y-%m-%d')})"
+            time_label = 'Date'
+        elif time_filter == 'monthly':
+            start_date = end_date - timedelta(days=30 * months)
+            visit_keys = [extract('year', VisitTracking.visit_time), extract('month', VisitTracking.visit_time)]
+            order_keys = [extract('year', Order.order_date), extract('month', Order.order_date)]
+            time_label = 'Month'
+            display = lambda row: f"{datetime(int(row.k0), int(row.k1), 1).strftime('%B')} {int(row.k0)}"
+        else:
+            raise ValueError(f"Invalid time filter: {time_filter}")
+
+        visits = db.session.query(
+            *[key.label(f'k{i}') for i, key in enumerate(visit_keys)],
+            func.count(VisitTracking.session_id).label('total_visits'),
+            func.count(func.distinct(VisitTracking.ip_address)).label('unique_visitors'),
+            func.sum(case(
+                (VisitTracking.time_spent <= 10, 1),  # Consider visits with less than 10 seconds as bounces
+                else_=0
+            )).label('bounced_visits')
+        ).filter(
+            VisitTracking.visit_time >= start_date,
+            VisitTracking.visit_time <= end_date,
+            VisitTracking.is_deleted == False,
+            VisitTracking.exited_page.isnot(None)  # Only count visits that have exited
+        ).group_by(*visit_keys).subquery()
+
+        conversions = db.session.query(
+            *[key.label(f'k{i}') for i, key in enumerate(order_keys)],
+            func.count(func.distinct(Order.order_id)).label('conversions')
+        ).filter(
+            Order.order_date >= start_date,
+            Order.order_date <= end_date,
+            Order.user_id.isnot(None)  # Only count orders from registered users
+        ).group_by(*order_keys).subquery()
+
+        keys = [f'k{i}' for i in range(len(visit_keys))]
+        query = db.session.query(
+            visits, func.coalesce(conversions.c.conversions, 0).label('conversions')
+        ).outerjoin(
+            conversions, and_(*[visits.c[key] == conversions.c[key] for key in keys])
+        ).order_by(*[visits.c[key] for key in keys])
+        return query, time_label, display
+
+    @staticmethod
+    def _stream_traffic_export(time_filter, format, months=12, days=30):
+        """The CSV or Excel traffic export, rows streamed from _traffic_export_query."""
+        from common.exports import Table as ExportTable, XLSX_MIMETYPE, csv_stream, query_rows, xlsx_file
+
+        query, time_label, display = PerformanceAnalyticsController._traffic_export_query(time_filter, months, days)
+        totals = {'visits': 0, 'unique': 0, 'bounced': 0, 'conversions': 0}
+
+        def rate(part, whole):
+            return round(part / whole * 100, 2) if whole > 0 else 0
+
+        def data_rows():
+            for row in query_rows(query):
+                visits, unique = int(row.total_visits or 0), int(row.unique_visitors or 0)
+                bounced, conversions = int(row.bounced_visits or 0), int(row.conversions or 0)
+                totals['visits'] += visits
+                totals['unique'] += unique
+                totals['bounced'] += bounced
+                totals['conversions'] += conversions
+                yield [display(row), visits, unique, bounced, conversions,
+                       rate(bounced, visits), rate(conversions, visits)]
+
+        def summary_rows():
+            # Read once the data sheet has been written.
+            yield [totals['visits'], totals['unique'], totals['bounced'], totals['conversions'],
+                   rate(totals['bounced'], totals['visits']), rate(totals['conversions'], totals['visits'])]
+
+        header = [time_label] + PerformanceAnalyticsController.TRAFFIC_EXPORT_COLUMNS
+        filename = f'traffic_analytics_{time_filter}_{datetime.now().strftime("%Y%m%d")}'
+        if format == 'csv':
+            return csv_stream([ExportTable(None, header, data_rows())]), 'text/csv', f'{filename}.csv'
+
+        data_sheet = f'{time_filter.title()} Data'
+        output = xlsx_file([
+            ExportTable(data_sheet, header, data_rows()),
+            ExportTable('Summary', ['Total Visits', 'Total Unique Visitors', 'Total Bounced Visits',
+                                    'Total Conversions', 'Overall Bounce Rate (%)',
+                                    'Overall Conversion Rate (%)'], summary_rows()),
+        ], header_fill='FF5733', column_width={data_sheet: 15, 'Summary': 20})
+        return output, XLSX_MIMETYPE, f'{filename}.xlsx'
+
     @staticmethod
     def export_traffic_analytics_report(time_filter='hourly', format='csv', months=12, days=30):
         """Export traffic analytics report in specified format (csv, excel, pdf)"""
         try:
+            if format in ('csv', 'excel'):
+                # Streamed from the database (common/exports.py); only the PDF builds a DataFrame.
+                return PerformanceAnalyticsController._stream_traffic_export(time_filter, format, months, days)
+
             from io import BytesIO
             import pandas as pd
             from datetime import datetime, timezone, timedelta
@@ -1892,44 +2005,7 @@ class PerformanceAnalyticsController:
                 'Overall Conversion Rate (%)': summary_data['overall_conversion_rate']
             }])
 
-            if format == 'csv':
-                # Export as CSV
-                output = BytesIO()
-                df.to_csv(output, index=False)
-                output.seek(0)
-                return output.getvalue(), 'text/csv', f'traffic_analytics_{time_filter}_{datetime.now().strftime("%Y%m%d")}.csv'
-
-            elif format == 'excel':
-                # Export as Excel
-                output = BytesIO()
-                with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-                    df.to_excel(writer, sheet_name=f'{time_filter.title()} Data', index=False)
-                    summary_df.to_excel(writer, sheet_name='Summary', index=False)
-                    
-                    # Get workbook and add formats
-                    workbook = writer.book
-                    header_format = workbook.add_format({
-                        'bold': True,
-                        'bg_color': '#FF5733',
-                        'font_color': 'white'
-                    })
-                    
-                    # Format the data sheet
-                    worksheet = writer.sheets[f'{time_filter.title()} Data']
-                    for col_num, value in enumerate(df.columns.values):
-                        worksheet.write(0, col_num, value, header_format)
-                        worksheet.set_column(col_num, col_num, 15)
-                    
-                    # Format the Summary sheet
-                    worksheet = writer.sheets['Summary']
-                    for col_num, value in enumerate(summary_df.columns.values):
-                        worksheet.write(0, col_num, value, header_format)
-                        worksheet.set_column(col_num, col_num, 20)
-
-                output.seek(0)
-                return output.getvalue(), 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', f'traffic_analytics_{time_filter}_{datetime.now().strftime("%Y%m%d")}.xlsx'
-
-            elif format == 'pdf':
+            if format == 'pdf':
                 # Export as PDF using reportlab
                 output = BytesIO()
                 doc = SimpleDocTemplate(
@@ -1,5 +1,6 @@
 from models.review import Review
 from common.database import db
+from services.review_aggregate_service import remove_product_rating
 
 class ReviewController:
     @staticmethod
@@ -9,6 +10,8 @@ class ReviewController:
     @staticmethod
     def delete(review_id):
         r = Review.query.get_or_404(review_id)
-        r.deleted_at = db.func.current_timestamp()
+        if r.deleted_at is None:
+            remove_product_rating(r.product_id, r.rating)
+            r.deleted_at = db.func.current_timestamp()
         db.session.commit()
         return r
@@ -188,6 +188,7 @@ class ShopAnalyticsController:
             from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
             from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
             from reportlab.lib.units import inch
+            from common.exports import Table as ExportTable, XLSX_MIMETYPE, csv_stream, query_rows, xlsx_file
 
             if year and month:
                 start, end = ShopAnalyticsController._month_range(year, month)
@@ -206,50 +207,41 @@ class ShopAnalyticsController:
                 ShopOrder.order_date < end
             ).order_by(ShopOrder.order_date.desc())
 
-            rows = q.all()
-            import pandas as pd  # noqa: F401 (ensure imported)
-            df = pd.DataFrame([
-                {
-                    'Date': r.order_date.strftime('%Y-%m-%d'),
-                    'Order ID': r.order_id,
-                    'Product': r.product_name,
-                    'Quantity': int(r.quantity or 0),
-                    'Amount': float(r.amount or 0.0)
-                } for r in rows
-            ])
-
-            if df.empty:
-                df = pd.DataFrame(columns=['Date', 'Order ID', 'Product', 'Quantity', 'Amount'])
-
-            summary = pd.DataFrame([{
-                'Total Orders': df['Order ID'].nunique(),
-                'Total Revenue': float(df['Amount'].sum() if not df.empty else 0.0),
-                'Total Products Sold': int(df['Quantity'].sum() if not df.empty else 0),
-                'Average Order Value': float(df.groupby('Order ID')['Amount'].sum().mean() if not df.empty else 0.0)
-            }])
+            columns = ['Date', 'Order ID', 'Product', 'Quantity', 'Amount']
+
+            def sale_row(r):
+                return [r.order_date.strftime('%Y-%m-%d'), r.order_id, r.product_name,
+                        int(r.quantity or 0), float(r.amount or 0.0)]
 
             period_suffix = f"{year}-{month:02d}" if year and month else "last-6-months"
             if fmt == 'csv':
-                out = BytesIO()
-                df.to_csv(out, index=False)
-                out.seek(0)
-                return out.getvalue(), 'text/csv', f'shop_{shop_id}_sales_{period_suffix}.csv'
+                # Streamed straight from a server-side cursor (common/exports.py).
+                rows = (sale_row(r) for r in query_rows(q))
+                return csv_stream([ExportTable(None, columns, rows)]), 'text/csv', f'shop_{shop_id}_sales_{period_suffix}.csv'
             elif fmt == 'excel':
-                out = BytesIO()
-                with pd.ExcelWriter(out, engine='xlsxwriter') as writer:
-                    df.to_excel(writer, sheet_name='Sales Data', index=False)
-                    summary.to_excel(writer, sheet_name='Summary', index=False)
-                    wb = writer.book
-                    header_fmt = wb.add_format({'bold': True, 'bg_color': '#FF5733', 'font_color': 'white'})
-                    for sheet_name in ['Sales Data', 'Summary']:
-                        ws = writer.sheets[sheet_name]
-                        cols = df.columns if sheet_name == 'Sales Data' else summary.columns
-                        for col_idx, value in enumerate(cols):
-                            ws.write(0, col_idx, value, header_fmt)
-                            ws.set_column(col_idx, col_idx, 20)
-                out.seek(0)
-                return out.getvalue(), 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', f'shop_{shop_id}_sales_{period_suffix}.xlsx'
+                # Totals come from the database so the sales rows never have to be held.
+                totals = q.order_by(None).with_entities(
+                    func.count(func.distinct(ShopOrder.order_id)),
+                    func.coalesce(func.sum(ShopOrderItem.line_item_total_inclusive_gst), 0),
+                    func.coalesce(func.sum(ShopOrderItem.quantity), 0),
+                ).one()
+                total_orders, total_revenue, total_quantity = int(totals[0] or 0), float(totals[1] or 0), int(totals[2] or 0)
+                summary_columns = ['Total Orders', 'Total Revenue', 'Total Products Sold', 'Average Order Value']
+                summary_row = [total_orders, total_revenue, total_quantity,
+                               total_revenue / total_orders if total_orders else 0.0]
+                out = xlsx_file([
+                    ExportTable('Sales Data', columns, (sale_row(r) for r in query_rows(q))),
+                    ExportTable('Summary', summary_columns, [summary_row]),
+                ], header_fill='FF5733', column_width=20)
+                return out, XLSX_MIMETYPE, f'shop_{shop_id}_sales_{period_suffix}.xlsx'
             elif fmt == 'pdf':
+                df = pd.DataFrame([sale_row(r) for r in q.all()], columns=columns)
+                summary = pd.DataFrame([{
+                    'Total Orders': df['Order ID'].nunique(),
+                    'Total Revenue': float(df['Amount'].sum() if not df.empty else 0.0),
+                    'Total Products Sold': int(df['Quantity'].sum() if not df.empty else 0),
+                    'Average Order Value': float(df.groupby('Order ID')['Amount'].sum().mean() if not df.empty else 0.0)
+                }])
                 out = BytesIO()
                 doc = SimpleDocTemplate(out, pagesize=landscape(letter), rightMargin=0.5*inch, leftMargin=0.5*inch, topMargin=0.5*inch, bottomMargin=0.5*inch)
                 elements = []
@@ -119,7 +119,7 @@ class SystemMonitoringController:
             # Get error count by type
             error_counts = db.session.query(
                 SystemMonitoring.error_type,
-                func.count(SystemMonitoring.monitoring_id).label('count')
+                func.sum(SystemMonitoring.occurrences()).label('count')
             ).filter(
                 SystemMonitoring.timestamp >= time_threshold,
                 SystemMonitoring.status == 'error'
@@ -151,7 +151,8 @@ class SystemMonitoringController:
                         'error_message': error.error_message,
                         'endpoint': error.endpoint,
                         'http_method': error.http_method,
-                        'http_status': error.http_status
+                        'http_status': error.http_status,
+                        'occurrences': max(error.request_count or 0, 1)
                     } for error in recent_errors]
                 }
             }
@@ -265,7 +266,8 @@ class SystemMonitoringController:
                         'error_message': error.error_message,
                         'endpoint': error.endpoint,
                         'http_method': error.http_method,
-                        'http_status': error.http_status
+                        'http_status': error.http_status,
+                        'occurrences': max(error.request_count or 0, 1)
                     } for error in recent_errors]
                 }
             }
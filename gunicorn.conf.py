@@ -0,0 +1,19 @@
+"""Gunicorn server hooks, loaded by default when gunicorn starts from this directory.
+
+Only hooks live here; bind, workers and threads stay with the deployment's command
+line. With METRICS_MULTIPROC_DIR set, the master empties the metrics snapshot
+directory on start and folds each exited worker's counters into its archive
+(common/metrics.py), so /metrics neither double-counts recycled workers nor resets
+when a new worker reuses a pid.
+"""
+import os
+
+
+def on_starting(server):
+    from common.metrics import clear_multiproc_dir
+    clear_multiproc_dir(os.getenv('METRICS_MULTIPROC_DIR'))
+
+
+def child_exit(server, worker):
+    from common.metrics import retire_snapshot
+    retire_snapshot(os.getenv('METRICS_MULTIPROC_DIR'), worker.pid)
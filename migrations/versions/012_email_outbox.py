@@ -0,0 +1,45 @@
+"""email_outbox: rendered mail waiting for the background sender
+
+Guarded by an inspector check for the same reason as 011: init_db.py builds the
+table from the model, so an unguarded create_table would fail on a database that
+already has it.
+
+Revision ID: 012_email_outbox
+Revises: 011_promotion_limits_and_plinko
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '012_email_outbox'
+down_revision = '011_promotion_limits_and_plinko'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'email_outbox' in inspector.get_table_names():
+        return
+    op.create_table(
+        'email_outbox',
+        sa.Column('outbox_id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('to_email', sa.String(length=255), nullable=False),
+        sa.Column('sender', sa.String(length=255), nullable=False),
+        sa.Column('subject', sa.String(length=255), nullable=False),
+        sa.Column('raw_message', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(length=16), nullable=False, server_default='pending'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+        sa.Column('locked_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('sent_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('idx_email_outbox_status_next', 'email_outbox', ['status', 'next_attempt_at'])
+
+
+def downgrade():
+    op.drop_index('idx_email_outbox_status_next', table_name='email_outbox')
+    op.drop_table('email_outbox')
@@ -0,0 +1,50 @@
+"""merchant_daily_sales / merchant_product_daily_sales: dashboard rollups
+
+Guarded like 012 because init_db.py may already have created the tables from the
+models. The tables start empty; fill them with scripts/backfill_sales_rollups.py
+before turning on SALES_ROLLUPS_READ.
+
+Revision ID: 013_merchant_sales_rollups
+Revises: 012_email_outbox
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '013_merchant_sales_rollups'
+down_revision = '012_email_outbox'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if 'merchant_daily_sales' not in tables:
+        op.create_table(
+            'merchant_daily_sales',
+            sa.Column('merchant_id', sa.Integer(), primary_key=True),
+            sa.Column('sales_date', sa.Date(), primary_key=True),
+            sa.Column('order_count', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('units_sold', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('revenue', sa.Numeric(14, 2), nullable=False, server_default='0'),
+            sa.Column('updated_at', sa.DateTime(), nullable=False),
+        )
+    if 'merchant_product_daily_sales' not in tables:
+        op.create_table(
+            'merchant_product_daily_sales',
+            sa.Column('merchant_id', sa.Integer(), primary_key=True),
+            sa.Column('sales_date', sa.Date(), primary_key=True),
+            sa.Column('product_id', sa.Integer(), primary_key=True),
+            sa.Column('order_count', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('units_sold', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('revenue', sa.Numeric(14, 2), nullable=False, server_default='0'),
+            sa.Column('updated_at', sa.DateTime(), nullable=False),
+        )
+        op.create_index('idx_mpds_product', 'merchant_product_daily_sales', ['product_id'])
+
+
+def downgrade():
+    op.drop_index('idx_mpds_product', table_name='merchant_product_daily_sales')
+    op.drop_table('merchant_product_daily_sales')
+    op.drop_table('merchant_daily_sales')
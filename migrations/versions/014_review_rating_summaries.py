@@ -0,0 +1,70 @@
+"""product_rating_summaries / shop_product_rating_summaries: maintained review aggregates
+
+Creates the tables (guarded, as in 012/013) and fills them from the review tables
+with one INSERT ... SELECT each, so listings show correct ratings the moment the
+new code reads them. Databases built by init_db.py can run
+scripts/backfill_review_aggregates.py instead.
+
+Revision ID: 014_review_rating_summaries
+Revises: 013_merchant_sales_rollups
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '014_review_rating_summaries'
+down_revision = '013_merchant_sales_rollups'
+branch_labels = None
+depends_on = None
+
+
+def _summary_columns():
+    return [
+        sa.Column('rating_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('rating_sum', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('rating_avg', sa.Numeric(3, 2), nullable=False, server_default='0'),
+        sa.Column('count_1', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('count_2', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('count_3', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('count_4', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('count_5', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.func.current_timestamp()),
+    ]
+
+
+def _backfill(table, key, source, source_key):
+    op.execute(
+        f"INSERT INTO {table} ({key}, rating_count, rating_sum, rating_avg, "
+        f"count_1, count_2, count_3, count_4, count_5, updated_at) "
+        f"SELECT {source_key}, COUNT(*), SUM(rating), ROUND(AVG(rating), 2), "
+        f"SUM(CASE WHEN rating = 1 THEN 1 ELSE 0 END), SUM(CASE WHEN rating = 2 THEN 1 ELSE 0 END), "
+        f"SUM(CASE WHEN rating = 3 THEN 1 ELSE 0 END), SUM(CASE WHEN rating = 4 THEN 1 ELSE 0 END), "
+        f"SUM(CASE WHEN rating = 5 THEN 1 ELSE 0 END), CURRENT_TIMESTAMP "
+        f"FROM {source} WHERE deleted_at IS NULL GROUP BY {source_key}"
+    )
+
+
+def upgrade():
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if 'product_rating_summaries' not in tables:
+        op.create_table(
+            'product_rating_summaries',
+            sa.Column('product_id', sa.Integer(),
+                      sa.ForeignKey('products.product_id', ondelete='CASCADE'), primary_key=True),
+            *_summary_columns(),
+        )
+        _backfill('product_rating_summaries', 'product_id', 'reviews', 'product_id')
+    if 'shop_product_rating_summaries' not in tables:
+        op.create_table(
+            'shop_product_rating_summaries',
+            sa.Column('shop_product_id', sa.Integer(),
+                      sa.ForeignKey('shop_products.product_id', ondelete='CASCADE'), primary_key=True),
+            *_summary_columns(),
+        )
+        _backfill('shop_product_rating_summaries', 'shop_product_id', 'shop_reviews', 'shop_product_id')
+
+
+def downgrade():
+    op.drop_table('shop_product_rating_summaries')
+    op.drop_table('product_rating_summaries')
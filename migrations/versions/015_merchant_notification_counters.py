@@ -0,0 +1,44 @@
+"""merchant_notification_counters: maintained unread/total notification counts
+
+Creates the table (guarded, as in 012-014) and fills it with one INSERT ... SELECT
+over merchant_notifications, so badges read the right numbers as soon as the new
+code runs. notification_counter_service.rebuild() recomputes the rows later if
+needed.
+
+Revision ID: 015_merchant_notification_counters
+Revises: 014_review_rating_summaries
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '015_merchant_notification_counters'
+down_revision = '014_review_rating_summaries'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if 'merchant_notification_counters' in tables:
+        return
+    op.create_table(
+        'merchant_notification_counters',
+        sa.Column('merchant_id', sa.Integer(),
+                  sa.ForeignKey('merchant_profiles.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('unread_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('total_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('version', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.func.current_timestamp()),
+    )
+    op.execute(
+        "INSERT INTO merchant_notification_counters "
+        "(merchant_id, unread_count, total_count, version, updated_at) "
+        "SELECT merchant_id, SUM(CASE WHEN is_read THEN 0 ELSE 1 END), COUNT(*), 1, CURRENT_TIMESTAMP "
+        "FROM merchant_notifications GROUP BY merchant_id"
+    )
+
+
+def downgrade():
+    op.drop_table('merchant_notification_counters')
@@ -0,0 +1,27 @@
+"""product_media.derivatives: resized WebP/AVIF copies recorded per image
+
+Nullable JSON, so existing rows simply have no srcset until
+scripts/backfill_image_derivatives.py renders them.
+
+Revision ID: 016_product_media_derivatives
+Revises: 015_merchant_notification_counters
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '016_product_media_derivatives'
+down_revision = '015_merchant_notification_counters'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('product_media')}
+    if 'derivatives' not in columns:
+        op.add_column('product_media', sa.Column('derivatives', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('product_media', 'derivatives')
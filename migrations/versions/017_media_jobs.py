@@ -0,0 +1,49 @@
+"""media_jobs queue and reels.processing_status
+
+Creates media_jobs (guarded, as in 012-015) and adds reels.processing_status.
+Existing reels were processed synchronously at upload, so they default to 'ready'.
+
+Revision ID: 017_media_jobs
+Revises: 016_product_media_derivatives
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '017_media_jobs'
+down_revision = '016_product_media_derivatives'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'media_jobs' not in inspector.get_table_names():
+        op.create_table(
+            'media_jobs',
+            sa.Column('job_id', sa.Integer(), primary_key=True),
+            sa.Column('reel_id', sa.Integer(),
+                      sa.ForeignKey('reels.reel_id', ondelete='CASCADE'), nullable=False),
+            sa.Column('kind', sa.String(20), nullable=False),
+            sa.Column('payload', sa.JSON(), nullable=True),
+            sa.Column('status', sa.String(16), nullable=False, server_default='pending'),
+            sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('last_error', sa.Text(), nullable=True),
+            sa.Column('next_attempt_at', sa.DateTime(), nullable=False, server_default=sa.func.current_timestamp()),
+            sa.Column('locked_at', sa.DateTime(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.func.current_timestamp()),
+            sa.Column('finished_at', sa.DateTime(), nullable=True),
+        )
+        op.create_index('ix_media_jobs_reel_id', 'media_jobs', ['reel_id'])
+        op.create_index('idx_media_jobs_status_next', 'media_jobs', ['status', 'next_attempt_at'])
+
+    columns = {c['name'] for c in inspector.get_columns('reels')}
+    if 'processing_status' not in columns:
+        op.add_column('reels', sa.Column('processing_status', sa.String(20),
+                                         nullable=False, server_default='ready'))
+
+
+def downgrade():
+    op.drop_column('reels', 'processing_status')
+    op.drop_table('media_jobs')
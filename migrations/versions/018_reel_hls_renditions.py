@@ -0,0 +1,33 @@
+"""reels.hls_url, hls_renditions, preview_url: adaptive-bitrate copies per reel
+
+Nullable, so existing reels keep playing from video_url until
+scripts/backfill_reel_renditions.py queues them for the media worker.
+
+Revision ID: 018_reel_hls_renditions
+Revises: 017_media_jobs
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '018_reel_hls_renditions'
+down_revision = '017_media_jobs'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('reels')}
+    if 'hls_url' not in columns:
+        op.add_column('reels', sa.Column('hls_url', sa.String(512), nullable=True))
+    if 'hls_renditions' not in columns:
+        op.add_column('reels', sa.Column('hls_renditions', sa.JSON(), nullable=True))
+    if 'preview_url' not in columns:
+        op.add_column('reels', sa.Column('preview_url', sa.String(512), nullable=True))
+
+
+def downgrade():
+    op.drop_column('reels', 'preview_url')
+    op.drop_column('reels', 'hls_renditions')
+    op.drop_column('reels', 'hls_url')
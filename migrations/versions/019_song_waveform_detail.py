@@ -0,0 +1,27 @@
+"""songs.waveform_detail: finer waveform levels for zooming the trim bar
+
+Nullable; songs ingested before it keep their 120-point waveform_peaks, which
+GET /api/music/songs/<id>/waveform falls back to.
+
+Revision ID: 019_song_waveform_detail
+Revises: 018_reel_hls_renditions
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '019_song_waveform_detail'
+down_revision = '018_reel_hls_renditions'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('songs')}
+    if 'waveform_detail' not in columns:
+        op.add_column('songs', sa.Column('waveform_detail', sa.Text(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('songs', 'waveform_detail')
@@ -0,0 +1,48 @@
+"""music_ingest_jobs: background bulk ingest with progress and resume
+
+Revision ID: 020_music_ingest_jobs
+Revises: 019_song_waveform_detail
+Create Date: 2026-10-18 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '020_music_ingest_jobs'
+down_revision = '019_song_waveform_detail'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'music_ingest_jobs' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        'music_ingest_jobs',
+        sa.Column('job_id', sa.Integer(), primary_key=True),
+        sa.Column('provider', sa.String(40), nullable=False),
+        sa.Column('query', sa.String(255), nullable=True),
+        sa.Column('page', sa.Integer(), nullable=False, server_default='1'),
+        sa.Column('limit', sa.Integer(), nullable=False, server_default='50'),
+        sa.Column('analyse', sa.Boolean(), nullable=False, server_default=sa.true()),
+        sa.Column('created_by', sa.Integer(), nullable=True),
+        sa.Column('status', sa.String(16), nullable=False, server_default='queued'),
+        sa.Column('tracks', sa.JSON(), nullable=True),
+        sa.Column('completed', sa.JSON(), nullable=True),
+        sa.Column('total', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('updated_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('failed_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('errors', sa.JSON(), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('heartbeat_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_music_ingest_jobs_status', 'music_ingest_jobs', ['status'])
+
+
+def downgrade():
+    op.drop_index('ix_music_ingest_jobs_status', table_name='music_ingest_jobs')
+    op.drop_table('music_ingest_jobs')
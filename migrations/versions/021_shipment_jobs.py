@@ -0,0 +1,46 @@
+"""shipment_jobs: per-merchant ShipRocket shipment creation in the background
+
+Revision ID: 021_shipment_jobs
+Revises: 020_music_ingest_jobs
+Create Date: 2026-10-19 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '021_shipment_jobs'
+down_revision = '020_music_ingest_jobs'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'shipment_jobs' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        'shipment_jobs',
+        sa.Column('job_id', sa.Integer(), primary_key=True),
+        sa.Column('kind', sa.String(10), nullable=False, server_default='order'),
+        sa.Column('order_id', sa.String(50), nullable=False),
+        sa.Column('party_id', sa.Integer(), nullable=False),
+        sa.Column('pickup_address_id', sa.Integer(), nullable=True),
+        sa.Column('delivery_address_id', sa.Integer(), nullable=False),
+        sa.Column('courier_id', sa.Integer(), nullable=True),
+        sa.Column('status', sa.String(16), nullable=False, server_default='processing'),
+        sa.Column('step', sa.String(32), nullable=False, server_default='pickup_location'),
+        sa.Column('progress', sa.JSON(), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('heartbeat_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.UniqueConstraint('kind', 'order_id', 'party_id', name='uq_shipment_job_party'),
+    )
+    op.create_index('ix_shipment_jobs_order_id', 'shipment_jobs', ['order_id'])
+    op.create_index('ix_shipment_jobs_status', 'shipment_jobs', ['status'])
+
+
+def downgrade():
+    op.drop_index('ix_shipment_jobs_status', table_name='shipment_jobs')
+    op.drop_index('ix_shipment_jobs_order_id', table_name='shipment_jobs')
+    op.drop_table('shipment_jobs')
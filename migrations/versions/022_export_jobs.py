@@ -0,0 +1,50 @@
+"""export_jobs: report exports rendered in the background
+
+Revision ID: 022_export_jobs
+Revises: 021_shipment_jobs
+Create Date: 2026-10-19 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '022_export_jobs'
+down_revision = '021_shipment_jobs'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'export_jobs' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        'export_jobs',
+        sa.Column('job_id', sa.Integer(), primary_key=True),
+        sa.Column('kind', sa.String(40), nullable=False),
+        sa.Column('format', sa.String(10), nullable=False),
+        sa.Column('params', sa.JSON(), nullable=True),
+        sa.Column('params_hash', sa.String(64), nullable=False),
+        sa.Column('requested_by', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(16), nullable=False, server_default='queued'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('storage', sa.String(10), nullable=True),
+        sa.Column('artifact_key', sa.String(512), nullable=True),
+        sa.Column('filename', sa.String(255), nullable=True),
+        sa.Column('mimetype', sa.String(128), nullable=True),
+        sa.Column('size_bytes', sa.BigInteger(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('heartbeat_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.Column('expires_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_export_jobs_params_hash', 'export_jobs', ['params_hash'])
+    op.create_index('ix_export_jobs_requested_by', 'export_jobs', ['requested_by'])
+    op.create_index('ix_export_jobs_status', 'export_jobs', ['status'])
+
+
+def downgrade():
+    op.drop_index('ix_export_jobs_status', table_name='export_jobs')
+    op.drop_index('ix_export_jobs_requested_by', table_name='export_jobs')
+    op.drop_index('ix_export_jobs_params_hash', table_name='export_jobs')
+    op.drop_table('export_jobs')
@@ -0,0 +1,61 @@
+"""merchant_transactions: settlement batches, one row per (order, merchant)
+
+settlement_batch tags the rows a bulk settlement run created, so the run can be
+looked up, summed and marked paid as a unit. The unique constraint backs the
+anti-join in controllers/merchant_transaction_controller.settle_orders. If
+duplicate (order, merchant) pairs are already present the upgrade stops and lists
+them: which row to keep (say, the one already paid) is a decision for whoever owns
+the payouts, not for a migration. Resolve them and run the upgrade again.
+
+Revision ID: 023_merchant_transaction_settlement
+Revises: 022_export_jobs
+Create Date: 2026-10-19 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '023_merchant_transaction_settlement'
+down_revision = '022_export_jobs'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if 'merchant_transactions' not in inspector.get_table_names():
+        return
+    columns = {c['name'] for c in inspector.get_columns('merchant_transactions')}
+    if 'settlement_batch' not in columns:
+        op.add_column('merchant_transactions', sa.Column('settlement_batch', sa.String(64), nullable=True))
+        op.create_index('ix_merchant_transactions_settlement_batch', 'merchant_transactions',
+                        ['settlement_batch'])
+
+    constraints = {c['name'] for c in inspector.get_unique_constraints('merchant_transactions')}
+    if 'uq_merchant_transactions_order_merchant' in constraints:
+        return
+    duplicates = bind.execute(sa.text(
+        "SELECT order_id, merchant_id, COUNT(*) FROM merchant_transactions "
+        "GROUP BY order_id, merchant_id HAVING COUNT(*) > 1 ORDER BY order_id, merchant_id LIMIT 20"
+    )).fetchall()
+    if duplicates:
+        pairs = ', '.join(f"order {order_id} / merchant {merchant_id} ({count} rows)"
+                          for order_id, merchant_id, count in duplicates)
+        raise RuntimeError(
+            "Cannot add uq_merchant_transactions_order_merchant: merchant_transactions has more than "
+            f"one row for some (order_id, merchant_id) pairs (first {len(duplicates)}: {pairs}). "
+            "Each pair must be settled once; keep one row per pair (the paid one, if any), "
+            "delete the others and run the upgrade again."
+        )
+    op.create_unique_constraint('uq_merchant_transactions_order_merchant', 'merchant_transactions',
+                                ['order_id', 'merchant_id'])
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    constraints = {c['name'] for c in inspector.get_unique_constraints('merchant_transactions')}
+    if 'uq_merchant_transactions_order_merchant' in constraints:
+        op.drop_constraint('uq_merchant_transactions_order_merchant', 'merchant_transactions', type_='unique')
+    op.drop_index('ix_merchant_transactions_settlement_batch', table_name='merchant_transactions')
+    op.drop_column('merchant_transactions', 'settlement_batch')
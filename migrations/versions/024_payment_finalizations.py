@@ -0,0 +1,46 @@
+"""payment_finalizations: captured Razorpay payments awaiting their order
+
+Revision ID: 024_payment_finalizations
+Revises: 023_merchant_transaction_settlement
+Create Date: 2026-10-19 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '024_payment_finalizations'
+down_revision = '023_merchant_transaction_settlement'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'payment_finalizations' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        'payment_finalizations',
+        sa.Column('finalization_id', sa.Integer(), primary_key=True),
+        sa.Column('razorpay_payment_id', sa.String(100), nullable=False),
+        sa.Column('razorpay_order_id', sa.String(100), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('order_extra', sa.JSON(), nullable=True),
+        sa.Column('status', sa.String(16), nullable=False, server_default='queued'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('error_status', sa.Integer(), nullable=True),
+        sa.Column('quote_id', sa.String(64), nullable=True),
+        sa.Column('order_id', sa.String(50), nullable=True),
+        sa.Column('notified_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('heartbeat_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.UniqueConstraint('razorpay_payment_id', name='uq_payment_finalizations_payment_id'),
+    )
+    op.create_index('ix_payment_finalizations_user_id', 'payment_finalizations', ['user_id'])
+    op.create_index('ix_payment_finalizations_status', 'payment_finalizations', ['status'])
+
+
+def downgrade():
+    op.drop_index('ix_payment_finalizations_status', table_name='payment_finalizations')
+    op.drop_index('ix_payment_finalizations_user_id', table_name='payment_finalizations')
+    op.drop_table('payment_finalizations')
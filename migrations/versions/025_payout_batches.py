@@ -0,0 +1,71 @@
+"""payout_batches, payouts: bulk merchant payouts with per-payout state
+
+Revision ID: 025_payout_batches
+Revises: 024_payment_finalizations
+Create Date: 2026-10-19 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '025_payout_batches'
+down_revision = '024_payment_finalizations'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if 'payout_batches' not in tables:
+        op.create_table(
+            'payout_batches',
+            sa.Column('batch_id', sa.Integer(), primary_key=True),
+            sa.Column('created_by', sa.Integer(), nullable=False),
+            sa.Column('idempotency_key', sa.String(100), nullable=True),
+            sa.Column('status', sa.String(16), nullable=False, server_default='queued'),
+            sa.Column('total_count', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('last_error', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.Column('heartbeat_at', sa.DateTime(), nullable=True),
+            sa.Column('finished_at', sa.DateTime(), nullable=True),
+            sa.UniqueConstraint('idempotency_key', name='uq_payout_batches_idempotency_key'),
+        )
+        op.create_index('ix_payout_batches_created_by', 'payout_batches', ['created_by'])
+        op.create_index('ix_payout_batches_status', 'payout_batches', ['status'])
+
+    if 'payouts' not in tables:
+        op.create_table(
+            'payouts',
+            sa.Column('payout_id', sa.Integer(), primary_key=True),
+            sa.Column('batch_id', sa.Integer(),
+                      sa.ForeignKey('payout_batches.batch_id', ondelete='CASCADE'), nullable=False),
+            sa.Column('merchant_id', sa.Integer(), nullable=False),
+            sa.Column('amount', sa.Numeric(12, 2), nullable=False),
+            sa.Column('currency', sa.String(3), nullable=False, server_default='INR'),
+            sa.Column('fund_account_id', sa.String(100), nullable=True),
+            sa.Column('notes', sa.JSON(), nullable=True),
+            sa.Column('reference_id', sa.String(64), nullable=True),
+            sa.Column('status', sa.String(16), nullable=False, server_default='pending'),
+            sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('gateway_payout_id', sa.String(100), nullable=True),
+            sa.Column('gateway_status', sa.String(32), nullable=True),
+            sa.Column('last_error', sa.Text(), nullable=True),
+            sa.Column('retryable', sa.Boolean(), nullable=False, server_default=sa.true()),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=False),
+            sa.UniqueConstraint('reference_id', name='uq_payouts_reference_id'),
+        )
+        op.create_index('ix_payouts_batch_id', 'payouts', ['batch_id'])
+        op.create_index('ix_payouts_merchant_id', 'payouts', ['merchant_id'])
+        op.create_index('ix_payouts_status', 'payouts', ['status'])
+
+
+def downgrade():
+    op.drop_index('ix_payouts_status', table_name='payouts')
+    op.drop_index('ix_payouts_merchant_id', table_name='payouts')
+    op.drop_index('ix_payouts_batch_id', table_name='payouts')
+    op.drop_table('payouts')
+    op.drop_index('ix_payout_batches_status', table_name='payout_batches')
+    op.drop_index('ix_payout_batches_created_by', table_name='payout_batches')
+    op.drop_table('payout_batches')
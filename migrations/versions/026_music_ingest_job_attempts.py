@@ -0,0 +1,30 @@
+"""music_ingest_jobs: attempts, counted by each claim
+
+Ingest jobs now run on services/job_runner.JobRunner like the other job tables,
+which counts every claim in `attempts`.
+
+Revision ID: 026_music_ingest_job_attempts
+Revises: 025_payout_batches
+Create Date: 2026-10-19 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '026_music_ingest_job_attempts'
+down_revision = '025_payout_batches'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'music_ingest_jobs' not in inspector.get_table_names():
+        return
+    if 'attempts' not in {c['name'] for c in inspector.get_columns('music_ingest_jobs')}:
+        op.add_column('music_ingest_jobs',
+                      sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    op.drop_column('music_ingest_jobs', 'attempts')
@@ -54,6 +54,16 @@ from .user_hidden_category import UserHiddenCategory
 from .merchant_notification import MerchantNotification
 from .merchant_intro_video import MerchantIntroVideo
 from .holi_giveaway_registration import HoliGiveawayRegistration
+from .email_outbox import EmailOutbox
+from .merchant_sales_rollup import MerchantDailySales, MerchantProductDailySales
+from .review_aggregate import ProductRatingSummary, ShopProductRatingSummary
+from .merchant_notification_counter import MerchantNotificationCounter
+from .media_job import MediaJob
+from .music_ingest_job import MusicIngestJob
+from .shipment_job import ShipmentJob
+from .export_job import ExportJob
+from .payment_finalization import PaymentFinalization
+from .payout_batch import PayoutBatch, Payout
 
 
 __all__ = [
@@ -99,5 +109,18 @@ __all__ = [
     'PaymentRefund',
     'FxRate',
     'Song',
-    'ReelAudio'
+    'ReelAudio',
+    'EmailOutbox',
+    'MerchantDailySales',
+    'MerchantProductDailySales',
+    'ProductRatingSummary',
+    'ShopProductRatingSummary',
+    'MerchantNotificationCounter',
+    'MediaJob',
+    'MusicIngestJob',
+    'ShipmentJob',
+    'ExportJob',
+    'PaymentFinalization',
+    'PayoutBatch',
+    'Payout'
 ]
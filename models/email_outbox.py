@@ -0,0 +1,59 @@
+# FILE: models/email_outbox.py
+"""Outbound mail waiting to be handed to SMTP.
+
+auth.email_utils.send_email renders the message inside the request (it needs the
+request's app context and templates) and writes the finished MIME text here. The
+background sender in services/email_outbox_service picks rows up in batches, so a
+registration or OTP request never waits on an SMTP handshake.
+
+The row holds the fully rendered message rather than a template name plus context:
+a retry an hour later must send exactly what the user was promised, not whatever
+the template says by then.
+"""
+from datetime import datetime
+
+from common.database import db
+
+
+class EmailOutbox(db.Model):
+    __tablename__ = 'email_outbox'
+
+    STATUS_PENDING = 'pending'
+    STATUS_SENDING = 'sending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+
+    outbox_id = db.Column(db.Integer, primary_key=True)
+    to_email = db.Column(db.String(255), nullable=False)
+    sender = db.Column(db.String(255), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    # Complete RFC 822 text, headers included, exactly as sendmail() will receive it.
+    raw_message = db.Column(db.Text, nullable=False)
+
+    status = db.Column(db.String(16), nullable=False, default=STATUS_PENDING)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # Set when a sender claims the row. A 'sending' row whose lock is older than
+    # EMAIL_OUTBOX_LOCK_TIMEOUT_SECONDS belonged to a worker that died mid-batch.
+    locked_at = db.Column(db.DateTime, nullable=True)
+
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('idx_email_outbox_status_next', 'status', 'next_attempt_at'),
+    )
+
+    def serialize(self):
+        return {
+            'outbox_id': self.outbox_id,
+            'to_email': self.to_email,
+            'subject': self.subject,
+            'status': self.status,
+            'attempts': self.attempts,
+            'last_error': self.last_error,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'sent_at': self.sent_at.isoformat() if self.sent_at else None,
+        }
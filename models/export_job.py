@@ -0,0 +1,81 @@
+# FILE: models/export_job.py
+"""A report export rendered in the background.
+
+Inventory, sales, lead and settlement exports used to render inside the GET that
+asked for them. A large PDF or workbook could take longer than the 60s request
+budget in app.py and held a web worker for all of it.
+
+The request now writes one row here and returns 202. services/export_jobs renders
+it on a bounded thread pool and stores the file, on local disk or in S3
+(`storage`, `artifact_key`), until `expires_at`. The client polls the row and then
+downloads it.
+
+`params_hash` covers who asked, the kind, the format and the normalised
+parameters. A repeat of a recent request returns the existing row instead of
+rendering again.
+"""
+from datetime import datetime, timedelta
+
+from common.database import db
+
+
+class ExportJob(db.Model):
+    __tablename__ = 'export_jobs'
+
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    # Done, but the artifact has been deleted after its retention period.
+    STATUS_EXPIRED = 'expired'
+    ACTIVE_STATUSES = (STATUS_QUEUED, STATUS_RUNNING)
+
+    STORAGE_LOCAL = 'local'
+    STORAGE_S3 = 's3'
+
+    job_id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(40), nullable=False)
+    format = db.Column(db.String(10), nullable=False)
+    params = db.Column(db.JSON, nullable=True)
+    params_hash = db.Column(db.String(64), nullable=False, index=True)
+    requested_by = db.Column(db.Integer, nullable=False, index=True)
+
+    status = db.Column(db.String(16), nullable=False, default=STATUS_QUEUED, index=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+
+    storage = db.Column(db.String(10), nullable=True)
+    artifact_key = db.Column(db.String(512), nullable=True)
+    filename = db.Column(db.String(255), nullable=True)
+    mimetype = db.Column(db.String(128), nullable=True)
+    size_bytes = db.Column(db.BigInteger, nullable=True)
+
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # NULL until a worker claims the row.
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=True)
+
+    def is_stale(self, stale_seconds, now=None):
+        """Queued or running, but no worker has touched it for stale_seconds (or ever)."""
+        if self.status not in self.ACTIVE_STATUSES:
+            return False
+        if self.heartbeat_at is None:
+            return True
+        return (now or datetime.utcnow()) - self.heartbeat_at > timedelta(seconds=stale_seconds)
+
+    def serialize(self):
+        return {
+            'job_id': self.job_id,
+            'kind': self.kind,
+            'format': self.format,
+            'params': self.params or {},
+            'status': self.status,
+            'error': self.last_error,
+            'filename': self.filename,
+            'size_bytes': self.size_bytes,
+            'download_url': f'/api/exports/{self.job_id}/download' if self.status == self.STATUS_DONE else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None,
+        }
@@ -0,0 +1,61 @@
+# FILE: models/media_job.py
+"""Video work waiting for the media worker.
+
+A reel upload used to extract its thumbnail with ffmpeg inside the request. The
+request now stores the bytes and writes one row here per piece of work (thumbnail,
+probe, HLS, mux); services/media_job_service claims due rows in batches, runs them
+off-request and writes the results back onto the reel.
+
+Claiming follows email_outbox: a conditional UPDATE to 'running', so any number of
+schedulers or worker processes can poll the same table, and a 'running' row whose
+lock is older than MEDIA_JOB_LOCK_TIMEOUT_SECONDS is taken over.
+"""
+from datetime import datetime
+
+from common.database import db
+
+
+class MediaJob(db.Model):
+    __tablename__ = 'media_jobs'
+
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+
+    KIND_THUMBNAIL = 'thumbnail'
+    KIND_PROBE = 'probe'
+    KIND_MUX = 'mux'
+    KIND_HLS = 'hls'
+
+    job_id = db.Column(db.Integer, primary_key=True)
+    reel_id = db.Column(db.Integer, db.ForeignKey('reels.reel_id', ondelete='CASCADE'), nullable=False, index=True)
+    kind = db.Column(db.String(20), nullable=False)
+    # Kind-specific input, e.g. {'source_path': spooled upload} or the mix settings.
+    payload = db.Column(db.JSON, nullable=True)
+
+    status = db.Column(db.String(16), nullable=False, default=STATUS_PENDING)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime, nullable=True)
+
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('idx_media_jobs_status_next', 'status', 'next_attempt_at'),
+    )
+
+    def serialize(self):
+        return {
+            'job_id': self.job_id,
+            'reel_id': self.reel_id,
+            'kind': self.kind,
+            'status': self.status,
+            'attempts': self.attempts,
+            'last_error': self.last_error,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
@@ -88,9 +88,30 @@ class MerchantNotification(BaseModel):
                 is_read=False
             ).first()
         
+        return cls.add_reel_likes(merchant_id, reel_id, 1, user_id, user_name, notification=notification)
+    
+    @classmethod
+    def add_reel_likes(cls, merchant_id, reel_id, count, user_id, user_name, notification=None):
+        """
+        Add `count` likes to the unread reel-like notification, creating it if needed.
+        
+        Args:
+            merchant_id: Merchant ID
+            reel_id: Reel ID
+            count: Number of likes to add
+            user_id: Latest user who liked
+            user_name: Latest user's full name
+            notification: The existing unread notification, when the caller has already loaded it
+            
+        Returns:
+            MerchantNotification instance
+        """
+        if not user_name or not user_name.strip():
+            user_name = "Someone"
+        
         if notification:
-            # Update existing notification atomically
-            notification.like_count += 1
+            # Update existing notification
+            notification.like_count += count
             notification.last_liked_by_user_id = user_id
             notification.last_liked_by_user_name = user_name
             notification.updated_at = datetime.now(timezone.utc)
@@ -103,10 +124,10 @@ class MerchantNotification(BaseModel):
                 merchant_id=merchant_id,
                 notification_type=NotificationType.REEL_LIKED,
                 title="Your reel is getting popular!",
-                message=f"Your reel has received 1 like",
+                message=f"Your reel has received {count} like" if count == 1 else f"Your reel has received {count} likes",
                 related_entity_type='reel',
                 related_entity_id=reel_id,
-                like_count=1,
+                like_count=count,
                 last_liked_by_user_id=user_id,
                 last_liked_by_user_name=user_name,
                 is_read=False
@@ -146,7 +167,7 @@ class MerchantNotification(BaseModel):
         return notification
     
     @classmethod
-    def get_merchant_notifications(cls, merchant_id, page=1, per_page=20, unread_only=False):
+    def get_merchant_notifications(cls, merchant_id, page=1, per_page=20, unread_only=False, total=None):
         """
         Get paginated notifications for a merchant.
         
@@ -155,6 +176,7 @@ class MerchantNotification(BaseModel):
             page: Page number (must be >= 1)
             per_page: Items per page (must be between 1 and 100)
             unread_only: If True, only return unread notifications
+            total: Matching row count when the caller already knows it (skips the COUNT)
             
         Returns:
             tuple: (notifications list, total count, total pages)
@@ -172,7 +194,8 @@ class MerchantNotification(BaseModel):
         query = query.order_by(cls.created_at.desc())
         
         # Get total count
-        total = query.count()
+        if total is None:
+            total = query.count()
         
         # Calculate pagination
         total_pages = (total + per_page - 1) // per_page if total > 0 else 0
@@ -184,8 +207,9 @@ class MerchantNotification(BaseModel):
     
     @classmethod
     def get_unread_count(cls, merchant_id):
-        """Get count of unread notifications for a merchant."""
-        return cls.query.filter_by(merchant_id=merchant_id, is_read=False).count()
+        """Get count of unread notifications for a merchant (from the maintained counter)."""
+        from services import notification_counter_service
+        return notification_counter_service.counts(merchant_id).unread_count
     
     def mark_as_read(self):
         """Mark notification as read."""
@@ -195,14 +219,15 @@ class MerchantNotification(BaseModel):
     
     @classmethod
     def mark_all_as_read(cls, merchant_id):
-        """Mark all notifications as read for a merchant."""
-        notifications = cls.query.filter_by(merchant_id=merchant_id, is_read=False).all()
-        now = datetime.now(timezone.utc)
-        for notification in notifications:
-            notification.is_read = True
-            notification.read_at = now
-            db.session.add(notification)
-        return len(notifications)
+        """Mark all notifications as read for a merchant with one UPDATE."""
+        from services import notification_counter_service
+        count = cls.query.filter_by(merchant_id=merchant_id, is_read=False).update(
+            {cls.is_read: True, cls.read_at: datetime.now(timezone.utc)},
+            synchronize_session='fetch',
+        )
+        # A bulk UPDATE skips the flush events that maintain the counter.
+        notification_counter_service.adjust(merchant_id, unread=-count)
+        return count
     
     @classmethod
     def cleanup_old_notifications(cls, merchant_id=None, days_old=90):
@@ -0,0 +1,26 @@
+# FILE: models/merchant_notification_counter.py
+"""Per-merchant notification counts, kept current as notifications change.
+
+The notification badge is polled constantly and used to run two COUNT queries per
+poll. services/notification_counter_service maintains these numbers from session
+flush events, in the same transaction as the notification change, by adding the
+flush's net change to the row (so concurrent writers serialize on the row lock
+instead of overwriting each other).
+
+`version` goes up on every change to any of the merchant's notifications, including
+an aggregated reel-like notification being bumped. The notification stream only
+queries the notifications table when it moves.
+"""
+from datetime import datetime
+
+from common.database import db
+
+
+class MerchantNotificationCounter(db.Model):
+    __tablename__ = 'merchant_notification_counters'
+
+    merchant_id = db.Column(db.Integer, db.ForeignKey('merchant_profiles.id', ondelete='CASCADE'), primary_key=True)
+    unread_count = db.Column(db.Integer, nullable=False, default=0)
+    total_count = db.Column(db.Integer, nullable=False, default=0)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
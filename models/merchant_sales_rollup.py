@@ -0,0 +1,44 @@
+# FILE: models/merchant_sales_rollup.py
+"""Per-merchant daily sales rollups read by the merchant dashboard and reports.
+
+Each row is derived data: the totals of order_items for one merchant (and product)
+on one calendar day of Order.order_date. services/sales_rollup_service adds the
+change to the affected rows inside the same flush that changes an order or its
+items, so a rollup never disagrees with the orders it summarises for longer than a
+transaction. Rebuilding from scratch (scripts/backfill_sales_rollups.py) is always
+safe because nothing else writes these tables.
+
+Like the queries they replace, rollups count every order regardless of status.
+"""
+from datetime import datetime
+
+from common.database import db
+
+
+class MerchantDailySales(db.Model):
+    __tablename__ = 'merchant_daily_sales'
+
+    merchant_id = db.Column(db.Integer, primary_key=True)
+    sales_date = db.Column(db.Date, primary_key=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    units_sold = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class MerchantProductDailySales(db.Model):
+    __tablename__ = 'merchant_product_daily_sales'
+
+    merchant_id = db.Column(db.Integer, primary_key=True)
+    sales_date = db.Column(db.Date, primary_key=True)
+    # order_items.product_id is nullable (SET NULL on product delete); those lines are
+    # rolled up under 0 so the merchant's totals still add up.
+    product_id = db.Column(db.Integer, primary_key=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    units_sold = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('idx_mpds_product', 'product_id'),
+    )
@@ -5,6 +5,10 @@ from auth.models.models import MerchantProfile
 
 class MerchantTransaction(BaseModel):
     __tablename__ = 'merchant_transactions'
+    __table_args__ = (
+        # An order is settled once per merchant; see settle_orders().
+        db.UniqueConstraint('order_id', 'merchant_id', name='uq_merchant_transactions_order_merchant'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     
@@ -20,6 +24,8 @@ class MerchantTransaction(BaseModel):
 
     payment_status = db.Column(db.Enum('pending', 'paid', name='payment_status_enum'), default='pending', nullable=False)
     settlement_date = db.Column(db.Date, nullable=False)
+    # Idempotency key of the bulk settlement run that created the row.
+    settlement_batch = db.Column(db.String(64), nullable=True, index=True)
 
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
@@ -41,6 +47,7 @@ class MerchantTransaction(BaseModel):
             "final_payable_amount": float(self.final_payable_amount),
             "payment_status": self.payment_status,
             "settlement_date": self.settlement_date.isoformat(),
+            "settlement_batch": self.settlement_batch,
             "created_at": self.created_at.isoformat(),
             "updated_at": self.updated_at.isoformat()
         }
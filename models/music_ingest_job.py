@@ -0,0 +1,100 @@
+# FILE: models/music_ingest_job.py
+"""One provider page being brought into the catalogue.
+
+POST /api/superadmin/music/ingest used to download, analyse and upsert a page of
+tracks inside the request. It now writes one row here and services/music/
+ingest_service runs it in the background, updating the counters as batches of
+songs are written, so the admin screen polls for progress instead of waiting.
+
+The fetched page is kept on the row and every written track's provider_track_id
+is appended to `completed` in the same commit as its Song. A run that dies part
+way (a deploy, a crash, a provider timeout) resumes with only the rest: the
+ingest sweeper restarts a queued or running job whose heartbeat went quiet, and an
+admin can resume one that failed or finished with failed tracks.
+"""
+from datetime import datetime, timedelta
+
+from common.database import db
+
+
+class MusicIngestJob(db.Model):
+    __tablename__ = 'music_ingest_jobs'
+
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    ACTIVE_STATUSES = (STATUS_QUEUED, STATUS_RUNNING)
+
+    job_id = db.Column(db.Integer, primary_key=True)
+    provider = db.Column(db.String(40), nullable=False)
+    query = db.Column(db.String(255), nullable=True)
+    page = db.Column(db.Integer, nullable=False, default=1)
+    limit = db.Column(db.Integer, nullable=False, default=50)
+    analyse = db.Column(db.Boolean, nullable=False, default=True)
+    created_by = db.Column(db.Integer, nullable=True)
+
+    status = db.Column(db.String(16), nullable=False, default=STATUS_QUEUED, index=True)
+    # The provider page as fetched; NULL until the first run has fetched it.
+    tracks = db.Column(db.JSON, nullable=True)
+    # provider_track_ids already written to songs.
+    completed = db.Column(db.JSON, nullable=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    created_count = db.Column(db.Integer, nullable=False, default=0)
+    updated_count = db.Column(db.Integer, nullable=False, default=0)
+    # Failures of the latest run only; a resume retries them.
+    failed_count = db.Column(db.Integer, nullable=False, default=0)
+    errors = db.Column(db.JSON, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    # Runs claimed so far (services/job_runner.JobRunner.claim).
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def is_resumable(self, stale_seconds, now=None):
+        """Failed, finished with failed tracks, or claimed once and silent since.
+
+        A queued job no worker has claimed yet (no heartbeat) is waiting for the
+        pool, not stalled; the sweeper starts it if it waits too long.
+        """
+        if self.status == self.STATUS_FAILED:
+            return True
+        if self.status == self.STATUS_DONE:
+            return bool(self.failed_count)
+        if self.heartbeat_at is None:
+            return False
+        now = now or datetime.utcnow()
+        return now - self.heartbeat_at > timedelta(seconds=stale_seconds)
+
+    @classmethod
+    def resumable_clause(cls, stale_seconds, now=None):
+        """is_resumable as a WHERE clause, for reopening a job with a conditional UPDATE."""
+        cutoff = (now or datetime.utcnow()) - timedelta(seconds=stale_seconds)
+        return db.or_(
+            cls.status == cls.STATUS_FAILED,
+            db.and_(cls.status == cls.STATUS_DONE, cls.failed_count > 0),
+            db.and_(cls.status.in_(cls.ACTIVE_STATUSES), cls.heartbeat_at < cutoff),
+        )
+
+    def serialize(self):
+        return {
+            'job_id': self.job_id,
+            'provider': self.provider,
+            'query': self.query,
+            'page': self.page,
+            'limit': self.limit,
+            'status': self.status,
+            'total': self.total,
+            'processed': len(self.completed or []),
+            'created': self.created_count,
+            'updated': self.updated_count,
+            'failed': self.failed_count,
+            'errors': (self.errors or [])[:10],
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
@@ -0,0 +1,75 @@
+# FILE: models/payment_finalization.py
+"""A captured Razorpay payment on its way to becoming an order.
+
+verify-payment used to fetch the capture, consume the quote, create the order,
+decrement stock and spend the promotion inside the request. Two client retries of
+the same payment raced each other through all of it.
+
+The request now checks the signature and writes one row here, keyed by the
+gateway payment id (unique, so a retry finds the existing row instead of starting
+a second finalisation). services/payment_finalization completes it on a worker
+pool and the client polls the row. A row is never lost: one whose worker died is
+picked up again by the sweep, and the order it may already have created is found
+through orders.razorpay_payment_id.
+
+`error_status` is the HTTP status the failure maps to (403 wrong user, 400 amount
+mismatch, 409 quote or promotion already spent, 502 gateway unreachable). Only a
+502 is retried; the others are final.
+"""
+from datetime import datetime, timedelta
+
+from common.database import db
+
+
+class PaymentFinalization(db.Model):
+    __tablename__ = 'payment_finalizations'
+
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    ACTIVE_STATUSES = (STATUS_QUEUED, STATUS_RUNNING)
+    # Gateway unreachable: the payment is fine, only the lookup failed. Such a row
+    # is reopened by the next verify-payment for it, or by the sweep after backoff.
+    RETRYABLE_ERROR_STATUSES = (502,)
+
+    finalization_id = db.Column(db.Integer, primary_key=True)
+    razorpay_payment_id = db.Column(db.String(100), nullable=False, unique=True)
+    razorpay_order_id = db.Column(db.String(100), nullable=False)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    # The verify request's `order` block (payment_method, customer_notes, ...).
+    order_extra = db.Column(db.JSON, nullable=True)
+
+    status = db.Column(db.String(16), nullable=False, default=STATUS_QUEUED, index=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    error_status = db.Column(db.Integer, nullable=True)
+
+    quote_id = db.Column(db.String(64), nullable=True)
+    order_id = db.Column(db.String(50), nullable=True)
+    # Set in the same commit as the customer's confirmation email is queued.
+    notified_at = db.Column(db.DateTime, nullable=True)
+
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # NULL until a worker claims the row.
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def is_stale(self, stale_seconds, now=None):
+        """Queued or running, but no worker has touched it for stale_seconds (or ever)."""
+        if self.status not in self.ACTIVE_STATUSES:
+            return False
+        if self.heartbeat_at is None:
+            return True
+        return (now or datetime.utcnow()) - self.heartbeat_at > timedelta(seconds=stale_seconds)
+
+    def serialize(self):
+        return {
+            'payment_id': self.razorpay_payment_id,
+            'status': self.status,
+            'order_id': self.order_id,
+            'quote_id': self.quote_id,
+            'error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
@@ -0,0 +1,115 @@
+# FILE: models/payout_batch.py
+"""Bulk merchant payouts, one row per payout.
+
+The bulk payout route used to walk its list in the request and answer once every
+payout was handled. The weekly run covers every merchant, so one slow or failing
+gateway call held the whole batch hostage, and a dropped connection left nobody
+knowing which merchants had been paid.
+
+The request now writes a PayoutBatch with one Payout per merchant and answers.
+services/payout_batches submits the payouts to the gateway in chunks, several at a
+time under a rate limit, and commits each payout's outcome as it lands. The batch
+row reports the progress.
+
+`reference_id` is sent to the gateway as the idempotency key. A payout left
+'submitting' by a worker that died is submitted again with the same key, so the
+merchant is paid once.
+"""
+from datetime import datetime, timedelta
+
+from common.database import db
+
+
+class PayoutBatch(db.Model):
+    __tablename__ = 'payout_batches'
+
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    ACTIVE_STATUSES = (STATUS_QUEUED, STATUS_RUNNING)
+
+    batch_id = db.Column(db.Integer, primary_key=True)
+    created_by = db.Column(db.Integer, nullable=False, index=True)
+    # The request's Idempotency-Key header: a resubmitted request finds this batch.
+    idempotency_key = db.Column(db.String(100), nullable=True, unique=True)
+
+    status = db.Column(db.String(16), nullable=False, default=STATUS_QUEUED, index=True)
+    total_count = db.Column(db.Integer, nullable=False, default=0)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # NULL until a worker claims the batch; refreshed after every chunk.
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    payouts = db.relationship('Payout', backref='batch', lazy='dynamic',
+                              order_by='Payout.payout_id')
+
+    def is_stale(self, stale_seconds, now=None):
+        """Queued or running, but no worker has touched it for stale_seconds (or ever)."""
+        if self.status not in self.ACTIVE_STATUSES:
+            return False
+        if self.heartbeat_at is None:
+            return True
+        return (now or datetime.utcnow()) - self.heartbeat_at > timedelta(seconds=stale_seconds)
+
+    def serialize(self, counts=None):
+        counts = counts or {}
+        return {
+            'batch_id': self.batch_id,
+            'status': self.status,
+            'total': self.total_count,
+            'counts': {status: counts.get(status, 0) for status in Payout.STATUSES},
+            'error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class Payout(db.Model):
+    __tablename__ = 'payouts'
+
+    STATUS_PENDING = 'pending'
+    STATUS_SUBMITTING = 'submitting'
+    STATUS_INITIATED = 'initiated'
+    STATUS_FAILED = 'failed'
+    STATUSES = (STATUS_PENDING, STATUS_SUBMITTING, STATUS_INITIATED, STATUS_FAILED)
+    OPEN_STATUSES = (STATUS_PENDING, STATUS_SUBMITTING)
+
+    payout_id = db.Column(db.Integer, primary_key=True)
+    batch_id = db.Column(db.Integer, db.ForeignKey('payout_batches.batch_id', ondelete='CASCADE'),
+                         nullable=False, index=True)
+    merchant_id = db.Column(db.Integer, nullable=False, index=True)
+    # Major units (rupees), as merchant_transactions.final_payable_amount.
+    amount = db.Column(db.Numeric(12, 2), nullable=False)
+    currency = db.Column(db.String(3), nullable=False, default='INR')
+    fund_account_id = db.Column(db.String(100), nullable=True)
+    notes = db.Column(db.JSON, nullable=True)
+
+    reference_id = db.Column(db.String(64), nullable=True, unique=True)
+    status = db.Column(db.String(16), nullable=False, default=STATUS_PENDING, index=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    gateway_payout_id = db.Column(db.String(100), nullable=True)
+    gateway_status = db.Column(db.String(32), nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    # False for errors another attempt cannot fix (bad fund account, 4xx).
+    retryable = db.Column(db.Boolean, nullable=False, default=True)
+
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def serialize(self):
+        return {
+            'merchant_id': self.merchant_id,
+            'amount': float(self.amount) if self.amount is not None else None,
+            'currency': self.currency,
+            'status': self.status,
+            'payout_id': self.gateway_payout_id,
+            'reference_id': self.reference_id,
+            'gateway_status': self.gateway_status,
+            'attempts': self.attempts,
+            'error': self.last_error,
+            'notes': self.notes or {},
+        }
@@ -4,6 +4,7 @@ from auth.models.models import MerchantProfile
 from models.category import Category
 from models.brand import Brand
 from models.enums import MediaType
+from services.image_derivatives import srcset
 
 
 class ProductMedia(BaseModel):
@@ -19,6 +20,8 @@ class ProductMedia(BaseModel):
     created_at    = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at    = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     deleted_at    = db.Column(db.DateTime)
+    # Resized copies made on upload: {"webp": {"320": url, "640": url}, ...}
+    derivatives   = db.Column(db.JSON, nullable=True)
     product       = db.relationship('Product', backref='media')
     
     def serialize(self):
@@ -31,6 +34,8 @@ class ProductMedia(BaseModel):
             "public_id": self.public_id,
             "is_thumbnail": self.is_thumbnail,
             "is_main_image": self.is_main_image,
+            "derivatives": self.derivatives,
+            "srcset": srcset(self.derivatives),
             "created_at": self.created_at.isoformat(),
             "updated_at": self.updated_at.isoformat(),
             "deleted_at": self.deleted_at.isoformat() if self.deleted_at else None
@@ -27,6 +27,11 @@ class Reel(BaseModel):
     video_public_id = db.Column(db.String(255), nullable=True)  # Cloudinary public_id or S3 key
     thumbnail_url = db.Column(db.String(512), nullable=True)
     thumbnail_public_id = db.Column(db.String(255), nullable=True)
+    # Adaptive-bitrate copies made by the media worker. video_url stays the original
+    # upload and is what players fall back to until (or unless) these exist.
+    hls_url = db.Column(db.String(512), nullable=True)  # master.m3u8
+    hls_renditions = db.Column(db.JSON, nullable=True)  # {"360p": variant playlist url, ...}
+    preview_url = db.Column(db.String(512), nullable=True)  # short, muted, low-bitrate MP4
     
     # Metadata
     description = db.Column(db.Text, nullable=False)  # REQUIRED
@@ -34,6 +39,9 @@ class Reel(BaseModel):
     file_size_bytes = db.Column(db.BigInteger, nullable=True)
     video_format = db.Column(db.String(10), nullable=True)  # mp4, mov, avi, etc.
     resolution = db.Column(db.String(20), nullable=True)  # e.g., "1920x1080"
+    # processing | ready | failed. Thumbnail, duration and resolution are filled in by
+    # the media worker after upload (services/media_job_service.py).
+    processing_status = db.Column(db.String(20), default='ready', server_default='ready', nullable=False)
     
     # Stats
     views_count = db.Column(db.Integer, default=0, nullable=False)
@@ -151,11 +159,15 @@ class Reel(BaseModel):
             'platform': self.platform,
             'video_url': self.video_url,
             'thumbnail_url': self.thumbnail_url,
+            'hls_url': self.hls_url,
+            'hls_renditions': self.hls_renditions,
+            'preview_url': self.preview_url,
             'description': self.description,
             'duration_seconds': self.duration_seconds,
             'file_size_bytes': self.file_size_bytes,
             'video_format': self.video_format,
             'resolution': self.resolution,
+            'processing_status': self.processing_status,
             'views_count': self.views_count,
             'likes_count': self.likes_count,
             'shares_count': self.shares_count,
@@ -0,0 +1,56 @@
+# FILE: models/review_aggregate.py
+"""Maintained rating aggregates for products and shop products.
+
+Listings used to run AVG(rating) per product on the page and filtered min_rating
+with a join + GROUP BY + HAVING over every review. These rows hold the same
+numbers, kept current by services/review_aggregate_service whenever a review is
+created or deleted, in the same transaction as the review itself.
+
+Only live reviews (deleted_at IS NULL) are counted. A product with no reviews has
+no row; readers treat that as zero ratings.
+"""
+from datetime import datetime
+
+from common.database import db
+
+
+class _RatingSummaryColumns(db.Model):
+    __abstract__ = True
+
+    rating_count = db.Column(db.Integer, nullable=False, default=0)
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)
+    # rating_sum / rating_count, stored for sorting; filters use the exact sum.
+    rating_avg = db.Column(db.Numeric(3, 2), nullable=False, default=0)
+    count_1 = db.Column(db.Integer, nullable=False, default=0)
+    count_2 = db.Column(db.Integer, nullable=False, default=0)
+    count_3 = db.Column(db.Integer, nullable=False, default=0)
+    count_4 = db.Column(db.Integer, nullable=False, default=0)
+    count_5 = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @property
+    def average(self):
+        return self.rating_sum / self.rating_count if self.rating_count else 0.0
+
+    @property
+    def histogram(self):
+        return {str(star): getattr(self, f'count_{star}') or 0 for star in range(1, 6)}
+
+    def serialize(self):
+        return {
+            'average': round(self.average, 2),
+            'count': self.rating_count,
+            'histogram': self.histogram,
+        }
+
+
+class ProductRatingSummary(_RatingSummaryColumns):
+    __tablename__ = 'product_rating_summaries'
+
+    product_id = db.Column(db.Integer, db.ForeignKey('products.product_id', ondelete='CASCADE'), primary_key=True)
+
+
+class ShopProductRatingSummary(_RatingSummaryColumns):
+    __tablename__ = 'shop_product_rating_summaries'
+
+    shop_product_id = db.Column(db.Integer, db.ForeignKey('shop_products.product_id', ondelete='CASCADE'), primary_key=True)
@@ -0,0 +1,95 @@
+# FILE: models/shipment_job.py
+"""One merchant's (or shop's) share of a confirmed order, on its way to ShipRocket.
+
+Creating shipments used to run inside the confirmation request: for every merchant
+in the order, one after another, pickup location, serviceability, order create,
+AWB assignment and pickup generation. A five-merchant order was about 25 HTTP calls
+before the customer saw a response.
+
+The request now writes one row here per merchant (kind 'order') or per shop order
+(kind 'shop') and returns with them 'processing'. services/shipment_jobs runs the
+rows on a bounded thread pool. `step` is the next step to run and `progress` holds
+what the finished steps returned (pickup location, courier, ShipRocket ids, AWB),
+both committed after every step. A retry or a restart therefore carries on where
+the row stopped and never creates the ShipRocket order twice.
+"""
+from datetime import datetime, timedelta
+
+from common.database import db
+
+
+class ShipmentJob(db.Model):
+    __tablename__ = 'shipment_jobs'
+
+    KIND_ORDER = 'order'
+    KIND_SHOP = 'shop'
+
+    STATUS_PROCESSING = 'processing'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+
+    STEP_PICKUP_LOCATION = 'pickup_location'
+    STEP_SERVICEABILITY = 'serviceability'
+    STEP_CREATE_ORDER = 'create_order'
+    STEP_ASSIGN_AWB = 'assign_awb'
+    STEP_GENERATE_PICKUP = 'generate_pickup'
+    STEP_DONE = 'done'
+    STEPS = (STEP_PICKUP_LOCATION, STEP_SERVICEABILITY, STEP_CREATE_ORDER,
+             STEP_ASSIGN_AWB, STEP_GENERATE_PICKUP)
+
+    job_id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(10), nullable=False, default=KIND_ORDER)
+    # orders.order_id for 'order', shop_orders.order_id for 'shop'.
+    order_id = db.Column(db.String(50), nullable=False, index=True)
+    # merchant_profiles.id for 'order', shops.shop_id for 'shop'.
+    party_id = db.Column(db.Integer, nullable=False)
+    pickup_address_id = db.Column(db.Integer, nullable=True)
+    delivery_address_id = db.Column(db.Integer, nullable=False)
+    courier_id = db.Column(db.Integer, nullable=True)
+
+    status = db.Column(db.String(16), nullable=False, default=STATUS_PROCESSING, index=True)
+    step = db.Column(db.String(32), nullable=False, default=STEP_PICKUP_LOCATION)
+    progress = db.Column(db.JSON, nullable=True)
+    # Runs started, including resumes; per-step retries are not counted here.
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # NULL until a worker claims the row; refreshed after every step.
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('kind', 'order_id', 'party_id', name='uq_shipment_job_party'),
+    )
+
+    def is_stale(self, stale_seconds, now=None):
+        """Processing, but nobody has touched it for stale_seconds (or ever)."""
+        if self.status != self.STATUS_PROCESSING:
+            return False
+        if self.heartbeat_at is None:
+            return True
+        return (now or datetime.utcnow()) - self.heartbeat_at > timedelta(seconds=stale_seconds)
+
+    def serialize(self):
+        progress = self.progress or {}
+        courier = progress.get('courier') or {}
+        return {
+            'job_id': self.job_id,
+            'kind': self.kind,
+            'order_id': self.order_id,
+            'merchant_id' if self.kind == self.KIND_ORDER else 'shop_id': self.party_id,
+            'status': self.status,
+            'step': self.step,
+            'success': self.status == self.STATUS_DONE,
+            'error': self.last_error,
+            'shiprocket_order_id': progress.get('shiprocket_order_id'),
+            'shipment_id': progress.get('shiprocket_shipment_id'),
+            'awb_code': progress.get('awb_code'),
+            'tracking_number': progress.get('awb_code'),
+            'courier_name': progress.get('courier_name') or courier.get('courier_name'),
+            'courier_data': courier or None,
+            'db_shipment_id': progress.get('db_shipment_id'),
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
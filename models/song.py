@@ -48,6 +48,9 @@ class Song(db.Model):
     # JSON array of normalised 0..1 peaks, precomputed at ingest. Computing this on
     # the phone is slow and gives a different picture on every device.
     waveform_peaks = db.Column(db.Text, nullable=True)
+    # JSON object of finer levels for zooming, {"480": [...], "1920": [...]}, from
+    # the same decode and normalisation. Kept apart so the picker never loads it.
+    waveform_detail = db.Column(db.Text, nullable=True)
 
     # --- discovery ---
     # Comma-separated, lowercase. A join table would be tidier but this is read far
@@ -92,6 +95,23 @@ class Song(db.Model):
         except (TypeError, ValueError):
             return []
 
+    def peaks_at(self, points):
+        """The coarsest stored level with at least `points` peaks (the finest if none
+        has that many): [] when the song has no waveform."""
+        levels = {}
+        base = self.peaks()
+        if base:
+            levels[len(base)] = base
+        try:
+            for level in json.loads(self.waveform_detail or "{}").values():
+                levels[len(level)] = level
+        except (TypeError, ValueError, AttributeError):
+            pass
+        if not levels:
+            return []
+        enough = [n for n in levels if n >= points]
+        return levels[min(enough) if enough else max(levels)]
+
     def is_expired(self, now=None):
         if self.licence_expires_at is None:
             return False
@@ -40,6 +40,16 @@ class SystemMonitoring(BaseModel):
         db.Index('idx_monitoring_status', 'status'),
     )
 
+    @classmethod
+    def occurrences(cls):
+        """SQL expression for how many events a row stands for.
+
+        The buffered error writer collapses identical errors into one row and stores
+        the count in request_count. Rows written before that (and status rows) have
+        0 there and still count as one.
+        """
+        return db.case((cls.request_count > 1, cls.request_count), else_=1)
+
     @classmethod
     def create_service_status(cls, service_name, status, response_time=None, 
                             memory_usage=None, cpu_usage=None):
@@ -0,0 +1,164 @@
+from flask import Blueprint, request, current_app, redirect, send_file
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from auth.models.models import User
+from common.response import success_response, error_response
+
+export_job_bp = Blueprint('export_jobs', __name__, url_prefix='/api/exports')
+
+
+@export_job_bp.route('', methods=['POST'])
+@jwt_required()
+def create_export_job():
+    """
+    Queue a report export
+    ---
+    tags:
+      - Exports
+    security:
+      - Bearer: []
+    parameters:
+      - in: body
+        name: body
+        required: true
+        schema:
+          type: object
+          required: [kind, format]
+          properties:
+            kind:
+              type: string
+              enum: [merchant_inventory, merchant_sales, sales, plinko_leads, merchant_transactions, invoice_archive]
+            format:
+              type: string
+              enum: [pdf, excel, csv, zip]
+            params:
+              type: object
+              description: Filters of the matching synchronous export (dates as YYYY-MM-DD)
+    responses:
+      202:
+        description: Job queued or running; poll GET /api/exports/<job_id>
+      200:
+        description: The same export was requested recently and is ready to download
+      400:
+        description: Unknown kind, unsupported format or bad parameters
+      403:
+        description: The kind is not available to this user's role
+    """
+    from services import export_jobs
+
+    data = request.get_json(silent=True) or {}
+    user = User.get_by_id(get_jwt_identity())
+    if not user:
+        return error_response("User not found", 404)
+    spec = export_jobs.KINDS.get(data.get('kind'))
+    if spec is not None and user.role.value != spec.role:
+        return error_response(f"Not allowed to request {data.get('kind')} exports", 403)
+    try:
+        job, created = export_jobs.create(user.id, data.get('kind'), data.get('format'), data.get('params'))
+    except export_jobs.ExportJobError as e:
+        return error_response(str(e), 400)
+    except Exception as e:
+        current_app.logger.error(f"Error creating export job: {str(e)}", exc_info=True)
+        return error_response("Failed to create export job", 500)
+
+    payload = dict(job.serialize(), deduplicated=not created)
+    if job.status == job.STATUS_DONE:
+        return success_response("Export ready", payload)
+    return success_response("Export queued", payload, 202)
+
+
+@export_job_bp.route('', methods=['GET'])
+@jwt_required()
+def list_export_jobs():
+    """
+    The current user's recent exports, newest first
+    ---
+    tags:
+      - Exports
+    security:
+      - Bearer: []
+    responses:
+      200:
+        description: Up to 20 export jobs
+    """
+    from services import export_jobs
+
+    jobs = export_jobs.recent_for_user(get_jwt_identity())
+    return success_response("Export jobs retrieved successfully", [job.serialize() for job in jobs])
+
+
+@export_job_bp.route('/<int:job_id>', methods=['GET'])
+@jwt_required()
+def get_export_job(job_id):
+    """
+    Status of one export
+    ---
+    tags:
+      - Exports
+    security:
+      - Bearer: []
+    parameters:
+      - in: path
+        name: job_id
+        required: true
+        type: integer
+    responses:
+      200:
+        description: status is queued, running, done, failed or expired; download_url is set once done
+      404:
+        description: No such export for this user
+    """
+    from services import export_jobs
+
+    job = export_jobs.get_for_user(job_id, get_jwt_identity())
+    if job is None:
+        return error_response("Export job not found", 404)
+    return success_response("Export job retrieved successfully", job.serialize())
+
+
+@export_job_bp.route('/<int:job_id>/download', methods=['GET'])
+@jwt_required()
+def download_export_job(job_id):
+    """
+    Download a finished export
+    ---
+    tags:
+      - Exports
+    security:
+      - Bearer: []
+    parameters:
+      - in: path
+        name: job_id
+        required: true
+        type: integer
+    responses:
+      200:
+        description: The file (local storage)
+      302:
+        description: Redirect to a short-lived S3 URL (S3 storage)
+      404:
+        description: No such export for this user
+      409:
+        description: The export is not finished (or failed)
+      410:
+        description: The export has expired; request it again
+    """
+    from models.export_job import ExportJob
+    from services import export_jobs
+
+    job = export_jobs.get_for_user(job_id, get_jwt_identity())
+    if job is None:
+        return error_response("Export job not found", 404)
+    if job.status == ExportJob.STATUS_EXPIRED:
+        return error_response("Export has expired; request it again", 410)
+    if job.status != ExportJob.STATUS_DONE:
+        return error_response(f"Export is {job.status}", 409)
+    try:
+        if job.storage == ExportJob.STORAGE_S3:
+            return redirect(export_jobs.presigned_url(job))
+        path = export_jobs.local_path(job)
+        if path is None:
+            return error_response("Export has expired; request it again", 410)
+        return send_file(path, mimetype=job.mimetype, as_attachment=True, download_name=job.filename)
+    except Exception as e:
+        current_app.logger.error(f"Error downloading export {job_id}: {str(e)}", exc_info=True)
+        return error_response("Failed to download export", 500)
@@ -2229,7 +2229,8 @@ def create_product_media(pid):
             'url': media_url,
             'type': media_type_from_form, 
             'sort_order': sort_order,
-                'public_id': s3_key  # Store S3 key for images
+            'public_id': s3_key,  # Store S3 key for images
+            'derivatives': s3_upload_result.get('derivatives')
         }
         print(f"[STAGE 4] Media data: {media_data}")
 
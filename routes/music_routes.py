@@ -23,6 +23,7 @@ from common.response import error_response, success_response
 from models.reel import Reel
 from models.reel_audio import ReelAudio
 from models.song import Song
+from services import media_job_service
 
 music_bp = Blueprint("music", __name__)
 
@@ -97,6 +98,26 @@ def get_song(song_id):
                             song.serialize(include_audio=True, include_peaks=True))
 
 
+@music_bp.route("/api/music/songs/<int:song_id>/waveform", methods=["GET"])
+@jwt_required()
+def get_song_waveform(song_id):
+    """Peaks at a zoom level, for a trim bar wider than the default 120 points.
+
+    `points` is how many the client can draw; it gets the coarsest stored level
+    with at least that many, or the finest there is.
+    """
+    song = _visible_songs().filter(Song.song_id == song_id).first()
+    if not song or not song.is_available():
+        return error_response("Song not found or no longer available.", 404)
+    points = min(max(1, request.args.get("points", default=120, type=int)), 10000)
+    peaks = song.peaks_at(points)
+    return success_response("Waveform retrieved", {
+        "song_id": song.song_id,
+        "points": len(peaks),
+        "waveform_peaks": peaks,
+    })
+
+
 @music_bp.route("/api/music/categories", methods=["GET"])
 @jwt_required()
 def list_categories():
@@ -197,6 +218,8 @@ def set_reel_audio(reel_id):
     link.rendered_video_url = None
     link.rendered_at = None
     link.render_error = None
+    if current_app.config.get("REEL_AUDIO_RENDER_ENABLED", False):
+        media_job_service.enqueue_mux(link, song)
 
     # Usage drives the 'popular' tab. Adjust both sides when a merchant swaps
     # tracks, so counts stay honest rather than only ever going up.
@@ -288,9 +311,13 @@ def reels_using_song(song_id):
 @music_bp.route("/api/superadmin/music/ingest", methods=["POST"])
 @jwt_required()
 def admin_ingest():
-    """Pull a page of tracks from a provider into the catalogue."""
+    """Start pulling a page of tracks from a provider into the catalogue.
+
+    Returns 202 with the job; poll GET /api/superadmin/music/ingest/<job_id> for
+    progress. With MUSIC_INGEST_BACKGROUND off the job runs here and returns 200.
+    """
     from auth.models.models import User, UserRole
-    from services.music.ingest_service import IngestError, ingest_from_provider
+    from services.music.ingest_service import IngestError, create_ingest_job, start_ingest_job
 
     user = User.query.get(get_jwt_identity())
     if not user or user.role != UserRole.SUPER_ADMIN:
@@ -302,16 +329,63 @@ def admin_ingest():
         return error_response("provider is required.", 400)
 
     try:
-        result = ingest_from_provider(
+        job = create_ingest_job(
             provider,
             query=data.get("query"),
             limit=min(int(data.get("limit", 50)), 200),
             page=max(1, int(data.get("page", 1))),
+            created_by=user.id,
         )
+        finished = start_ingest_job(job.job_id)
     except IngestError as e:
         return error_response(str(e), 400)
 
-    return success_response("Ingest complete", result)
+    if finished is not None:
+        return success_response("Ingest complete", finished.serialize())
+    return success_response("Ingest started", job.serialize(), 202)
+
+
+@music_bp.route("/api/superadmin/music/ingest/<int:job_id>", methods=["GET"])
+@jwt_required()
+def admin_ingest_status(job_id):
+    """Progress of an ingest job: counts so far, recent errors, status."""
+    from auth.models.models import User, UserRole
+    from models.music_ingest_job import MusicIngestJob
+
+    user = User.query.get(get_jwt_identity())
+    if not user or user.role != UserRole.SUPER_ADMIN:
+        return error_response("Admin access required.", 403)
+
+    job = db.session.get(MusicIngestJob, job_id)
+    if job is None:
+        return error_response("Ingest job not found.", 404)
+    data = job.serialize()
+    data["resumable"] = job.is_resumable(current_app.config.get("MUSIC_INGEST_STALE_SECONDS", 600))
+    return success_response("Ingest job retrieved", data)
+
+
+@music_bp.route("/api/superadmin/music/ingest/<int:job_id>/resume", methods=["POST"])
+@jwt_required()
+def admin_ingest_resume(job_id):
+    """Carry on a failed or stalled job from the first track not yet written."""
+    from auth.models.models import User, UserRole
+    from models.music_ingest_job import MusicIngestJob
+    from services.music.ingest_service import IngestError, resume_ingest_job
+
+    user = User.query.get(get_jwt_identity())
+    if not user or user.role != UserRole.SUPER_ADMIN:
+        return error_response("Admin access required.", 403)
+
+    if db.session.get(MusicIngestJob, job_id) is None:
+        return error_response("Ingest job not found.", 404)
+    try:
+        finished = resume_ingest_job(job_id)
+    except IngestError as e:
+        return error_response(str(e), 409)
+
+    if finished is not None:
+        return success_response("Ingest complete", finished.serialize())
+    return success_response("Ingest resumed", db.session.get(MusicIngestJob, job_id).serialize(), 202)
 
 
 @music_bp.route("/api/superadmin/music/songs", methods=["POST"])
@@ -455,6 +529,7 @@ def admin_upload_song():
     if stored["waveform_peaks"]:
         import json as _json
         song.waveform_peaks = _json.dumps(stored["waveform_peaks"])
+        song.waveform_detail = stored.get("waveform_detail")
         db.session.commit()
 
     return success_response(
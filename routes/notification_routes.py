@@ -143,6 +143,51 @@ def get_unread_count():
     return NotificationController.get_unread_count()
 
 
+@notification_bp.route('/api/merchants/notifications/stream', methods=['GET', 'OPTIONS'])
+@cross_origin()
+@jwt_required()
+@merchant_role_required
+def stream_notifications():
+    """
+    Server-Sent Events stream of notifications for the current merchant
+    ---
+    tags:
+      - Notifications
+    security:
+      - Bearer: []
+    description: |
+      Replaces polling the list and unread-count endpoints. Events:
+      `unread_count` ({"unread_count": n}) on connect and whenever it changes, and
+      `notification` (a serialized notification) for each notification created or
+      updated while connected. Event ids let the client resume with Last-Event-ID.
+      The server closes the stream after NOTIFICATION_STREAM_MAX_SECONDS; clients
+      reconnect. Authenticate with the Authorization header (use a fetch-based
+      EventSource client; the browser EventSource cannot set headers).
+      Off unless NOTIFICATION_STREAM_ENABLED (it needs an async worker class);
+      clients fall back to polling unread-count on 404 or 503.
+    parameters:
+      - in: header
+        name: Last-Event-ID
+        type: string
+        required: false
+        description: Resume after this event id
+    produces:
+      - text/event-stream
+    responses:
+      200:
+        description: Event stream
+      401:
+        description: Unauthorized (authentication required)
+      403:
+        description: Merchant access required
+      404:
+        description: Merchant profile not found, or the stream is disabled
+      503:
+        description: Too many open streams on this server; retry later or poll
+    """
+    return NotificationController.stream_notifications()
+
+
 @notification_bp.route('/api/merchants/notifications/<int:notification_id>/read', methods=['PUT', 'OPTIONS'])
 @cross_origin()
 @jwt_required()
@@ -247,7 +247,9 @@ def download_invoice(order_id):
         description: ID of the order to invoice
     responses:
       200:
-        description: PDF invoice
+        description: PDF invoice (ETag is the invoice's content hash)
+      304:
+        description: Unchanged since the ETag sent in If-None-Match
       400:
         description: Order not paid yet
       401:
@@ -260,7 +262,7 @@ def download_invoice(order_id):
         description: Internal server error
     """
     from services.invoice_service import build_invoice_data, InvoiceError
-    from services.invoice_pdf import render_invoice_pdf
+    from services.invoice_cache import get_or_render
     from flask import make_response
 
     try:
@@ -270,13 +272,15 @@ def download_invoice(order_id):
         except InvoiceError as ie:
             return jsonify({'status': 'error', 'message': ie.message}), ie.status
 
-        pdf_bytes = render_invoice_pdf(data)
+        pdf_bytes, key = get_or_render(data)
         response = make_response(pdf_bytes)
         response.headers['Content-Type'] = 'application/pdf'
         response.headers['Content-Disposition'] = (
             f'attachment; filename="invoice_{order_id}.pdf"'
         )
-        return response
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.set_etag(key)
+        return response.make_conditional(request)
     except Exception as e:
         logger.error(f"Error generating invoice for order {order_id}: {str(e)}", exc_info=True)
         return jsonify({'status': 'error', 'message': 'Failed to generate invoice'}), 500
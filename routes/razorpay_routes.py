@@ -9,20 +9,22 @@ import hashlib
 import json
 from datetime import datetime
 from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
-from sqlalchemy.exc import IntegrityError
 
 from auth.models.models import User
+from auth.utils import super_admin_role_required
 from models.checkout_quote import CheckoutQuote
 from models.payment_refund import PaymentRefund, RefundStatus
+from models.payout_batch import PayoutBatch
 from models.subscription import SubscriptionPlan
 # checkout_quote_service imports minor_unit_factor from this module, but only inside a
 # function body, so this direction is safe to do at module scope.
 from services.checkout_quote_service import (
     QuoteError,
-    consume_quote,
     load_spendable_quote,
     minor_units,
 )
+from services import payout_batches
+from services.payout_batches import PayoutBatchError
 
 razorpay_bp = Blueprint('razorpay', __name__)
 
@@ -293,180 +295,16 @@ def verify_razorpay_payment():
         
         # Verify signature
         if hmac.compare_digest(generated_signature, razorpay_signature):
-            # Fetch the capture. A valid signature proves the message came from
-            # Razorpay; it says nothing about how much was captured, so the amount
-            # still has to be read from the gateway and checked.
+            # Everything past the signature (gateway fetches, quote, order, stock,
+            # promotion) runs in services/payment_finalization, once per payment id.
+            from services import payment_finalization
             try:
-                client = get_razorpay_client()
-                payment = client.payment.fetch(razorpay_payment_id)
-            except Exception as e:
-                payment = None
-                current_app.logger.warning(
-                    "Razorpay payment fetch failed for %s: %s", razorpay_payment_id, e
-                )
-
-            # Correlate back through the receipt, which for a quote-first checkout is
-            # the quote id — a row that existed before the gateway order did.
-            receipt = None
-            try:
-                r_order = get_razorpay_client().order.fetch(razorpay_order_id)
-                receipt = (r_order or {}).get('receipt')
-            except Exception as e:
-                current_app.logger.warning(
-                    "Razorpay order fetch failed for %s: %s", razorpay_order_id, e
-                )
-
-            # --- Quote-first path: assert, consume, then materialise the order. ---
-            quote = None
-            if receipt:
-                quote = CheckoutQuote.query.get(str(receipt))
-
-            if quote is not None:
-                # str() both sides: the JWT identity is a string, quote.user_id an int.
-                if str(quote.user_id) != str(user_id):
-                    current_app.logger.error(
-                        "Quote %s belongs to user %s but was verified by user %s",
-                        quote.quote_id, quote.user_id, user_id
-                    )
-                    return error_response('Payment verification failed.', 403)
-
-                # I2: what the gateway captured must equal what we quoted, to the
-                # minor unit, in the same currency. Integers, so there is nothing to
-                # round and nothing to nearly-match.
-                if payment is None:
-                    return error_response(
-                        'Could not confirm the captured amount with the payment gateway. '
-                        'Your payment has not been lost — please contact support.', 502
-                    )
-
-                captured_minor = int(payment.get('amount') or 0)
-                captured_currency = (payment.get('currency') or '').upper()
-                # Compare against what we actually asked the gateway to charge — the
-                # presentment (USD) figure when the quote has one, else the INR book.
-                expected_minor = int(quote.charge_amount_minor)
-                expected_currency = (quote.charge_currency or DEFAULT_CHARGE_CURRENCY).upper()
-
-                if captured_minor != expected_minor or captured_currency != expected_currency:
-                    current_app.logger.error(
-                        "Capture/quote mismatch on quote %s: captured %s %s, quoted %s %s",
-                        quote.quote_id, captured_minor, captured_currency,
-                        expected_minor, expected_currency
-                    )
-                    return error_response(
-                        'Payment amount does not match the quoted total. '
-                        'No order was created; please contact support.', 400
-                    )
-
-                # Single-use, enforced by a conditional UPDATE rather than a check.
-                # Two concurrent verifies of one quote: exactly one wins here.
-                if not consume_quote(quote.quote_id):
-                    db.session.rollback()
-                    existing = CheckoutQuote.query.get(quote.quote_id)
-                    if existing and existing.order_id:
-                        # Idempotent replay — the customer refreshed, the order exists.
-                        return success_response(
-                            'Payment already verified',
-                            {'payment_id': razorpay_payment_id,
-                             'order_id': existing.order_id,
-                             'verified': True}
-                        )
-                    return error_response('This quote has already been paid.', 409)
-
-                try:
-                    from controllers.order_controller import OrderController
-                    order = OrderController.create_order_from_quote(
-                        user_id=quote.user_id,
-                        quote=quote,
-                        gateway_refs={
-                            'razorpay_order_id': razorpay_order_id,
-                            'razorpay_payment_id': razorpay_payment_id,
-                        },
-                        extra=data.get('order') or {},
-                    )
-                    # Point the consumed quote at the order it became (I10).
-                    quote.order_id = order.order_id
-                    db.session.commit()
-                except IntegrityError as e:
-                    # Almost certainly uq_promo_redemption_promotion: the promo code was
-                    # spent by another order between this quote being priced and this
-                    # payment being captured. The customer paid and has no order, so
-                    # they need to know *why* — a generic "could not finalise" gives
-                    # support nothing to act on.
-                    db.session.rollback()
-                    current_app.logger.error(
-                        "Payment %s captured but order creation hit a constraint for "
-                        "quote %s (promo %s): %s",
-                        razorpay_payment_id, quote.quote_id, quote.promo_code, e,
-                        exc_info=True
-                    )
-                    if 'uq_promo_redemption_promotion' in str(e.orig or e):
-                        return error_response(
-                            'Your payment succeeded but the promo code on this order '
-                            'had already been used. Support has been notified and will '
-                            'resolve this — please do not pay again.', 409
-                        )
-                    return error_response(
-                        'Your payment succeeded but we could not finalise the order. '
-                        'Support has been notified — please do not pay again.', 500
-                    )
-                except Exception as e:
-                    db.session.rollback()
-                    current_app.logger.error(
-                        "Payment %s captured but order creation failed for quote %s: %s",
-                        razorpay_payment_id, quote.quote_id, e, exc_info=True
-                    )
-                    # Money moved and no order exists. Loud, and never a silent 200.
-                    return error_response(
-                        'Your payment succeeded but we could not finalise the order. '
-                        'Support has been notified — please do not pay again.', 500
-                    )
-
-                return success_response(
-                    'Payment verified successfully',
-                    {'payment_id': razorpay_payment_id,
-                     'order_id': order.order_id,
-                     'quote_id': quote.quote_id,
-                     'verified': True}
+                row, started = payment_finalization.enqueue(
+                    razorpay_payment_id, razorpay_order_id, user_id, data.get('order') or {}
                 )
-
-            # --- Legacy path: no quote behind this payment. ---
-            internal_order_id = receipt
-
-            if internal_order_id:
-                try:
-                    from models.order import Order
-                    order = Order.query.get(internal_order_id)
-                    if order:
-                        order.razorpay_order_id = razorpay_order_id
-                        order.razorpay_payment_id = razorpay_payment_id
-                        order.payment_gateway_transaction_id = razorpay_payment_id
-                        order.payment_gateway_name = 'Razorpay'
-                        db.session.commit()
-                        current_app.logger.info(
-                            "Razorpay refs stored on order %s", internal_order_id
-                        )
-                    else:
-                        current_app.logger.warning(
-                            "Razorpay receipt '%s' matched no internal order; gateway "
-                            "references were not stored for payment %s",
-                            internal_order_id, razorpay_payment_id
-                        )
-                except Exception as e:
-                    db.session.rollback()
-                    current_app.logger.error(
-                        "Failed storing Razorpay refs on order %s: %s",
-                        internal_order_id, e, exc_info=True
-                    )
-
-            # Payment verification successful
-            return success_response(
-                'Payment verified successfully',
-                {
-                    'payment_id': razorpay_payment_id,
-                    'order_id': razorpay_order_id,
-                    'verified': True
-                }
-            )
+            except payment_finalization.PaymentFinalizationError as e:
+                return error_response(e.message, e.status)
+            return _finalization_response(row, replay=not started)
         else:
             # Include more details in DEBUG to speed up diagnosis
             message = 'Payment verification failed - invalid signature'
@@ -480,6 +318,44 @@ def verify_razorpay_payment():
     except Exception as e:
         return error_response(f'Payment verification failed: {str(e)}', 500)
 
+def _finalization_response(row, replay=False):
+    """verify-payment's answer for a PaymentFinalization row, in the shape the
+    synchronous flow returned."""
+    from models.payment_finalization import PaymentFinalization
+
+    if row.status == PaymentFinalization.STATUS_FAILED:
+        return error_response(row.last_error or 'Payment verification failed', row.error_status or 500)
+    if row.status == PaymentFinalization.STATUS_DONE:
+        payload = {'payment_id': row.razorpay_payment_id,
+                   # Legacy payments without a matched order echo the gateway order.
+                   'order_id': row.order_id or row.razorpay_order_id,
+                   'verified': True}
+        if row.quote_id:
+            payload['quote_id'] = row.quote_id
+        return success_response(
+            'Payment already verified' if replay else 'Payment verified successfully', payload
+        )
+    return success_response(
+        'Payment received; your order is being confirmed',
+        {'payment_id': row.razorpay_payment_id,
+         'status': row.status,
+         'verified': True,
+         'status_url': f'/api/razorpay/verify-payment/{row.razorpay_payment_id}'},
+        202
+    )
+
+@razorpay_bp.route('/api/razorpay/verify-payment/<payment_id>', methods=['GET'])
+@jwt_required()
+def get_payment_verification(payment_id):
+    """Poll a verified payment until its order exists (200), or it failed (4xx/5xx).
+    202 while it is still being finalised."""
+    from services import payment_finalization
+
+    row = payment_finalization.get_for_user(payment_id, get_jwt_identity())
+    if row is None:
+        return error_response('Payment not found', 404)
+    return _finalization_response(row, replay=True)
+
 @razorpay_bp.route('/api/razorpay/payment-details/<payment_id>', methods=['GET'])
 @jwt_required()
 def get_payment_details(payment_id):
@@ -596,49 +472,62 @@ def create_refund():
         return error_response(f'Failed to create refund: {str(e)}', 500)
 
 
+def _payout_batch_response(batch, replay=False, status_filter=None):
+    """The batch's progress, with its payouts once none is left to submit."""
+    data = batch.serialize(payout_batches.progress(batch))
+    if batch.status in PayoutBatch.ACTIVE_STATUSES:
+        data['status_url'] = f"/api/razorpay/payouts/batches/{batch.batch_id}"
+        return success_response('Payouts queued', data, 202)
+    payouts = batch.payouts
+    if status_filter:
+        payouts = payouts.filter_by(status=status_filter)
+    data['payouts'] = [payout.serialize() for payout in payouts]
+    return success_response('Payouts already submitted' if replay else 'Payouts initiated', data)
+
+
 @razorpay_bp.route('/api/razorpay/payouts/bulk', methods=['POST'])
-@jwt_required()
+@super_admin_role_required
 def create_bulk_payouts():
-    """Initiate bulk payouts to merchants (server-side). This endpoint expects an array of
-    { merchant_id: number, amount: number, notes?: object } objects. If RazorpayX is not
-    configured, it will simulate success for development.
+    """Queue bulk payouts to merchants (server-side). This endpoint expects an array of
+    { merchant_id: number, amount: number, notes?: object, fund_account_id?: string }
+    objects, amounts in rupees. An Idempotency-Key header makes a resubmitted request
+    return the first batch. Payouts are submitted by services/payout_batches; poll the
+    status_url while the batch is queued or running.
     """
     try:
         payload = request.get_json() or {}
-        payouts = payload.get('payouts')
-
-        if not payouts or not isinstance(payouts, list):
-            return error_response('Invalid or missing payouts array', 400)
+        batch, created = payout_batches.create_batch(
+            get_jwt_identity(), payload.get('payouts'),
+            idempotency_key=request.headers.get('Idempotency-Key') or payload.get('idempotency_key'),
+        )
+        return _payout_batch_response(batch, replay=not created)
 
-        # Attempt to initialize client. If payouts API is not enabled, we'll simulate.
-        client = get_razorpay_client()
+    except PayoutBatchError as e:
+        db.session.rollback()
+        return error_response(e.message, e.status)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error("Bulk payout error: %s", e, exc_info=True)
+        return error_response(f'Failed to create payouts: {str(e)}', 500)
 
-        created = []
-        for p in payouts:
-            merchant_id = p.get('merchant_id')
-            amount = p.get('amount')
-            notes = p.get('notes', {})
 
-            if merchant_id is None or amount is None:
-                return error_response('Each payout must include merchant_id and amount', 400)
+@razorpay_bp.route('/api/razorpay/payouts/batches/<int:batch_id>', methods=['GET'])
+@super_admin_role_required
+def get_payout_batch(batch_id):
+    """Progress of a bulk payout batch; ?status=failed narrows the payout list."""
+    batch = db.session.get(PayoutBatch, batch_id)
+    if batch is None:
+        return error_response('Payout batch not found', 404)
+    return _payout_batch_response(batch, status_filter=request.args.get('status'))
 
-            # In a real integration, you would look up the merchant's fund account/contact,
-            # and create a payout via RazorpayX. Here we attempt a best-effort call if
-            # available; otherwise we simulate a created payout.
-            try:
-                # Example simulated structure. Replace with client.payout.create(...) if configured.
-                created.append({
-                    'merchant_id': merchant_id,
-                    'amount': amount,
-                    'currency': 'INR',
-                    'status': 'initiated',
-                    'payout_id': f"sim_{merchant_id}_{int(datetime.now().timestamp())}",
-                    'notes': notes
-                })
-            except Exception as inner:
-                return error_response(f'Failed to initiate payout for merchant {merchant_id}: {str(inner)}', 500)
-
-        return jsonify({ 'status': 'success', 'success': True, 'data': created, 'message': 'Payouts initiated' }), 200
 
-    except Exception as e:
-        return error_response(f'Failed to create payouts: {str(e)}', 500)
\ No newline at end of file
+@razorpay_bp.route('/api/razorpay/payouts/batches/<int:batch_id>/retry', methods=['POST'])
+@super_admin_role_required
+def retry_payout_batch(batch_id):
+    """Submit the batch's retryable failures again."""
+    try:
+        payout_batches.retry_failed(batch_id)
+    except PayoutBatchError as e:
+        db.session.rollback()
+        return error_response(e.message, e.status)
+    return _payout_batch_response(db.session.get(PayoutBatch, batch_id))
\ No newline at end of file
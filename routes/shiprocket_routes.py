@@ -779,6 +779,8 @@ def create_shiprocket_orders_for_all_merchants():
             courier_id=courier_id
         )
         
+        if response.get("processing_merchants"):
+            return success_response("ShipRocket orders are being created for all merchants", response, 202)
         return success_response("ShipRocket orders created successfully for all merchants", response)
         
     except ValueError as e:
@@ -987,6 +989,8 @@ def create_shiprocket_shop_order():
             courier_id=courier_id
         )
         
+        if response.get("status") == "processing":
+            return success_response("ShipRocket shop order is being created", response, 202)
         return success_response("ShipRocket shop order created successfully", response)
         
     except ValueError as e:
@@ -1062,4 +1066,106 @@ def get_shop_pickup_location(shop_id):
         })
         
     except Exception as e:
-        return error_response(f"Failed to get shop pickup location: {str(e)}", 500) 
\ No newline at end of file
+        return error_response(f"Failed to get shop pickup location: {str(e)}", 500) 
+
+
+def _current_merchant_id():
+    """The signed-in merchant's profile id, or None."""
+    from flask_jwt_extended import get_jwt_identity
+    from auth.models.models import MerchantProfile
+
+    merchant = MerchantProfile.get_by_user_id(get_jwt_identity())
+    return merchant.id if merchant else None
+
+
+@shiprocket_bp.route('/shipment-jobs', methods=['GET'])
+@merchant_role_required
+def get_shipment_jobs():
+    """
+    Progress of the signed-in merchant's shipment job for an order
+    ---
+    tags:
+      - ShipRocket
+    security:
+      - Bearer: []
+    parameters:
+      - in: query
+        name: order_id
+        required: true
+        type: string
+        description: Internal order ID (or shop order ID with kind=shop)
+      - in: query
+        name: kind
+        type: string
+        enum: [order]
+        default: order
+        description: Shop orders ship from platform shops, which no merchant owns
+    responses:
+      200:
+        description: The merchant's entry, with status processing, done or failed
+      400:
+        description: order_id missing
+      403:
+        description: Not a merchant, or kind=shop
+      404:
+        description: The merchant has no shipment job for this order
+    """
+    from models.shipment_job import ShipmentJob
+    from services import shipment_jobs
+
+    order_id = request.args.get('order_id')
+    if not order_id:
+        return error_response("order_id is required", 400)
+    if request.args.get('kind', ShipmentJob.KIND_ORDER) != ShipmentJob.KIND_ORDER:
+        return error_response("Shop shipment jobs are not available to merchants", 403)
+    merchant_id = _current_merchant_id()
+    if merchant_id is None:
+        return error_response("Merchant profile not found", 404)
+    summary = shipment_jobs.order_summary(order_id, merchant_id=merchant_id)
+    if not summary["total_merchants"]:
+        return error_response("No shipment jobs found for this order", 404)
+    return success_response("Shipment jobs retrieved successfully", summary)
+
+
+@shiprocket_bp.route('/shipment-jobs/<int:job_id>/retry', methods=['POST'])
+@merchant_role_required
+def retry_shipment_job(job_id):
+    """
+    Retry one of the signed-in merchant's failed shipment jobs from the step it stopped at
+    ---
+    tags:
+      - ShipRocket
+    security:
+      - Bearer: []
+    parameters:
+      - in: path
+        name: job_id
+        required: true
+        type: integer
+    responses:
+      202:
+        description: Job restarted
+      200:
+        description: Job ran to completion (inline mode)
+      404:
+        description: Job not found, or not this merchant's
+      409:
+        description: Job has not failed
+    """
+    from common.database import db
+    from models.shipment_job import ShipmentJob
+    from services import shipment_jobs
+
+    job = db.session.get(ShipmentJob, job_id)
+    merchant_id = _current_merchant_id()
+    if (job is None or merchant_id is None or job.kind != ShipmentJob.KIND_ORDER
+            or job.party_id != merchant_id):
+        return error_response("Shipment job not found", 404)
+    try:
+        job = shipment_jobs.retry_job(job_id)
+    except shipment_jobs.ShipmentJobError as e:
+        return error_response(str(e), 409)
+    if job is None:
+        return error_response("Shipment job not found", 404)
+    data = job.serialize()
+    return success_response("Shipment job restarted", data, 202 if data["status"] == "processing" else 200)
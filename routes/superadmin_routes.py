@@ -46,7 +46,8 @@ from controllers.superadmin.merchant_transaction_controller import (
     list_all_transactions, get_transaction_by_id, mark_as_paid,
     calculate_fee_preview, create_merchant_transaction_from_order,
     bulk_create_transactions_for_orders, get_merchant_transaction_summary,
-    get_merchant_pending_payments, bulk_mark_as_paid, get_transaction_statistics
+    get_merchant_pending_payments, bulk_mark_as_paid, get_transaction_statistics,
+    settle_orders
 )
 
 from controllers.superadmin.profile_controller import (
@@ -62,6 +63,7 @@ from controllers.superadmin import youtube_controller
 
 from controllers.superadmin.newsletter_controller import NewsletterController
 from controllers.superadmin.shop_analytics_controller import ShopAnalyticsController
+from common.exports import export_response
 
 superadmin_bp = Blueprint('superadmin_bp', __name__)
 
@@ -4535,12 +4537,7 @@ def export_daily_analytics():
         if data is None:
             return jsonify({"status": "error", "message": "Failed to generate report"}), 500
             
-        return send_file(
-            BytesIO(data),
-            mimetype=mimetype,
-            as_attachment=True,
-            download_name=filename
-        )
+        return export_response(data, mimetype, filename)
     except Exception as e:
         current_app.logger.error(f"Error exporting daily analytics: {e}")
         return jsonify({
@@ -4560,12 +4557,7 @@ def export_monthly_analytics():
         if data is None:
             return jsonify({"status": "error", "message": "Failed to generate report"}), 500
 
-        return send_file(
-            BytesIO(data),
-            mimetype=mimetype,
-            as_attachment=True,
-            download_name=filename
-        )
+        return export_response(data, mimetype, filename)
     except Exception as e:
         current_app.logger.error(f"Error exporting monthly analytics: {e}")
         return jsonify({
@@ -4578,7 +4570,6 @@ def export_monthly_analytics():
 def export_traffic_report():
     try:
         from controllers.superadmin.performance_analytics import PerformanceAnalyticsController
-        from io import BytesIO
 
         time_filter = request.args.get('time_filter', 'hourly', type=str)
         file_format = request.args.get('format', 'csv', type=str)
@@ -4595,12 +4586,7 @@ def export_traffic_report():
         if data is None:
             return jsonify({"status": "error", "message": "Failed to generate report"}), 500
 
-        return send_file(
-            BytesIO(data),
-            mimetype=mimetype,
-            as_attachment=True,
-            download_name=filename
-        )
+        return export_response(data, mimetype, filename)
     except Exception as e:
         current_app.logger.error(f"Error exporting traffic report: {e}")
         return jsonify({
@@ -5482,6 +5468,9 @@ def bulk_create_transactions():
                 type: string
                 format: date
                 description: Settlement date (optional, defaults to today)
+              batch_key:
+                type: string
+                description: Idempotency key; repeating it returns the same transactions
     responses:
       201:
         description: Merchant transactions created successfully
@@ -5521,12 +5510,87 @@ def bulk_create_transactions():
         if 'settlement_date' in data:
             settlement_date = date.fromisoformat(data['settlement_date'])
         
-        transactions = bulk_create_transactions_for_orders(data['order_ids'], settlement_date)
+        transactions = bulk_create_transactions_for_orders(data['order_ids'], settlement_date,
+                                                           batch_key=data.get('batch_key'))
         return jsonify([txn.serialize() for txn in transactions]), 201
     except Exception as e:
         current_app.logger.error(f"Error bulk creating transactions: {e}")
         return jsonify({'message': f'Failed to create transactions: {str(e)}'}), 500
 
+@superadmin_bp.route('/merchant-transactions/settle', methods=['POST'])
+@super_admin_role_required
+def settle_transactions():
+    """
+    Create pending merchant transactions for every eligible order in a date range
+    ---
+    tags:
+      - Merchant Transactions
+    security:
+      - Bearer: []
+    requestBody:
+      required: true
+      content:
+        application/json:
+          schema:
+            type: object
+            required:
+              - from_date
+              - to_date
+            properties:
+              from_date:
+                type: string
+                format: date
+                description: First order date (inclusive)
+              to_date:
+                type: string
+                format: date
+                description: Last order date (inclusive)
+              settlement_date:
+                type: string
+                format: date
+                description: Settlement date (optional, defaults to today)
+              batch_key:
+                type: string
+                description: Idempotency key, e.g. the month being settled; generated when omitted
+    responses:
+      201:
+        description: Settlement batch created (orders already settled are skipped)
+        schema:
+          type: object
+          properties:
+            batch_key:
+              type: string
+            created:
+              type: integer
+            transaction_count:
+              type: integer
+            total_payable:
+              type: number
+      400:
+        description: Bad request - Missing or invalid dates
+      500:
+        description: Internal server error
+    """
+    data = request.get_json() or {}
+    if not data.get('from_date') or not data.get('to_date'):
+        return jsonify({'message': 'from_date and to_date are required'}), 400
+    
+    try:
+        from datetime import date
+        from_date = date.fromisoformat(data['from_date'])
+        to_date = date.fromisoformat(data['to_date'])
+        settlement_date = date.fromisoformat(data['settlement_date']) if data.get('settlement_date') else None
+    except ValueError:
+        return jsonify({'message': 'Dates must be YYYY-MM-DD'}), 400
+    
+    try:
+        result = settle_orders(from_date=from_date, to_date=to_date, settlement_date=settlement_date,
+                               batch_key=data.get('batch_key'))
+        return jsonify(result), 201
+    except Exception as e:
+        current_app.logger.error(f"Error settling orders: {e}")
+        return jsonify({'message': f'Failed to settle orders: {str(e)}'}), 500
+
 @superadmin_bp.route('/merchant-transactions/summary', methods=['GET'])
 @super_admin_role_required
 def get_transaction_summary():
@@ -5654,14 +5718,15 @@ def bulk_mark_transactions_paid():
         application/json:
           schema:
             type: object
-            required:
-              - transaction_ids
             properties:
               transaction_ids:
                 type: array
                 items:
                   type: integer
                 description: List of transaction IDs to mark as paid
+              batch_key:
+                type: string
+                description: Mark a whole settlement batch instead (used when transaction_ids is absent)
     responses:
       200:
         description: Transactions marked as paid successfully
@@ -5680,11 +5745,11 @@ def bulk_mark_transactions_paid():
         description: Internal server error
     """
     data = request.get_json()
-    if not data or 'transaction_ids' not in data:
-        return jsonify({'message': 'Transaction IDs are required'}), 400
+    if not data or ('transaction_ids' not in data and not data.get('batch_key')):
+        return jsonify({'message': 'Transaction IDs or batch_key are required'}), 400
     
     try:
-        result = bulk_mark_as_paid(data['transaction_ids'])
+        result = bulk_mark_as_paid(data.get('transaction_ids'), batch_key=data.get('batch_key'))
         return jsonify(result), 200
     except Exception as e:
         current_app.logger.error(f"Error bulk marking transactions as paid: {e}")
@@ -6233,9 +6298,7 @@ def shop_analytics_export():
     if data is None:
       return jsonify({'status': 'error', 'message': 'Failed to generate export'}), HTTPStatus.INTERNAL_SERVER_ERROR
 
-    from io import BytesIO
-    response = send_file(BytesIO(data) if isinstance(data, bytes) else data, mimetype=mime_type, as_attachment=True, download_name=filename)
-    return response
+    return export_response(data, mime_type, filename)
   except Exception as e:
     current_app.logger.error(f"Shop analytics export error: {e}")
     return jsonify({'status': 'error', 'message': 'Failed to export report'}), HTTPStatus.INTERNAL_SERVER_ERROR
@@ -0,0 +1,72 @@
+"""
+Render WebP derivatives for product images uploaded before derivatives existed.
+
+Downloads each live product image that has no derivatives recorded, renders and
+uploads the resized copies beside it (services/image_derivatives.py), and stores
+them on the ProductMedia row. Commits every --batch rows, so it can be stopped and
+re-run; rows that already have derivatives are skipped.
+
+Usage:
+    python scripts/backfill_image_derivatives.py [--product-id ID] [--limit N] [--batch 50]
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from common.database import db
+from models.enums import MediaType
+from models.product_media import ProductMedia
+from services import image_derivatives
+from services.s3_service import get_s3_service
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--product-id', type=int)
+    parser.add_argument('--limit', type=int)
+    parser.add_argument('--batch', type=int, default=50)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        s3 = get_s3_service()
+        query = ProductMedia.query.filter(
+            ProductMedia.type == MediaType.IMAGE,
+            ProductMedia.deleted_at.is_(None),
+            ProductMedia.derivatives.is_(None),
+            ProductMedia.public_id.like('products/%'),
+        ).order_by(ProductMedia.media_id)
+        if args.product_id:
+            query = query.filter(ProductMedia.product_id == args.product_id)
+        if args.limit:
+            query = query.limit(args.limit)
+
+        done = skipped = 0
+        for media in query.all():
+            try:
+                obj = s3.s3_client.get_object(Bucket=s3.bucket_name, Key=media.public_id)
+            except Exception as e:
+                print(f"media {media.media_id}: could not download {media.public_id}: {e}")
+                skipped += 1
+                continue
+            if obj.get('ContentType', '').lower() not in image_derivatives.RASTER_CONTENT_TYPES:
+                skipped += 1
+                continue
+            derivatives = s3._create_derivatives(media.public_id, obj['Body'].read())
+            if not derivatives:
+                skipped += 1
+                continue
+            media.derivatives = derivatives
+            done += 1
+            if done % args.batch == 0:
+                db.session.commit()
+        db.session.commit()
+    print(f"Rendered derivatives for {done} image(s); skipped {skipped}.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Queue HLS renditions and previews for reels uploaded before the transcoding stage.
+
+Adds one 'hls' media job per live reel that has a stored video but no hls_url. The
+media worker (in-app scheduler or scripts/run_media_worker.py) downloads each video
+from S3 and does the work, so this only writes rows. Reels that already have a
+pending job are not queued twice.
+
+Usage:
+    python scripts/backfill_reel_renditions.py [--merchant-id ID] [--limit N] [--batch 200]
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from common.database import db
+from models.media_job import MediaJob
+from models.reel import Reel
+from services import media_job_service
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--merchant-id', type=int)
+    parser.add_argument('--limit', type=int)
+    parser.add_argument('--batch', type=int, default=200)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        query = Reel.query.filter(
+            Reel.deleted_at.is_(None),
+            Reel.hls_url.is_(None),
+            Reel.video_public_id.isnot(None),
+            Reel.video_public_id != '',
+        ).order_by(Reel.reel_id)
+        if args.merchant_id:
+            query = query.filter(Reel.merchant_id == args.merchant_id)
+        if args.limit:
+            query = query.limit(args.limit)
+
+        queued = 0
+        for (reel_id,) in query.with_entities(Reel.reel_id).all():
+            media_job_service.enqueue(reel_id, MediaJob.KIND_HLS)
+            queued += 1
+            if queued % args.batch == 0:
+                db.session.commit()
+        db.session.commit()
+    print(f"Queued HLS renditions for {queued} reel(s).")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+"""
+Recompute every product and shop-product rating aggregate from the review tables.
+
+Migration 014 fills the tables when it creates them; run this on databases built
+with init_db.py, or whenever an aggregate is suspected to be wrong. Safe to run
+repeatedly.
+
+Usage:
+    python scripts/backfill_review_aggregates.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from services.review_aggregate_service import rebuild_all
+
+
+def main():
+    app = create_app()
+    with app.app_context():
+        rows = rebuild_all()
+    print(f"Rebuilt {rows} rating aggregate(s).")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+"""
+Rebuild the merchant sales rollups from order_items.
+
+Run once after turning on SALES_ROLLUPS_MAINTAIN and before SALES_ROLLUPS_READ, and
+again any time the rollups are suspected to be wrong — it recomputes every
+(merchant, day) from the orders, so running it twice is harmless.
+
+Usage:
+    python scripts/backfill_sales_rollups.py
+    python scripts/backfill_sales_rollups.py --merchant-id 42
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from services.sales_rollup_service import rebuild_rollups
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--merchant-id', type=int, default=None,
+                        help='only rebuild this merchant (default: all merchants)')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        days = rebuild_rollups(merchant_id=args.merchant_id)
+    scope = f"merchant {args.merchant_id}" if args.merchant_id else "all merchants"
+    print(f"Rebuilt {days} rollup day(s) for {scope}.")
+
+
+if __name__ == '__main__':
+    main()
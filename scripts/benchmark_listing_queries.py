@@ -0,0 +1,131 @@
+"""
+Count the SQL statements it takes to build a page of product listing cards, the
+old per-product way versus services/product_hydrator.ProductHydrator.
+
+Seeds an in-memory SQLite database (testing config) with products, images and
+reviews, then for each page size prints statements and wall time for both paths.
+The hydrator's column should not change with the page size.
+
+Usage:
+    python scripts/benchmark_listing_queries.py [--sizes 5 20 50] [--reviews 4]
+"""
+
+import argparse
+import os
+import sys
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func
+
+from app import create_app
+from common.database import db
+from common.query_audit import QueryAudit
+
+
+def seed(product_count, reviews_per_product):
+    from auth.models.models import MerchantProfile, User, UserRole
+    from models.brand import Brand
+    from models.category import Category
+    from models.enums import MediaType
+    from models.product import Product
+    from models.product_media import ProductMedia
+    from models.product_stock import ProductStock
+    from models.review import Review
+    from services import review_aggregate_service
+
+    owner = User(email="seller@bench.local", first_name="Bench", last_name="Seller",
+                 role=UserRole.MERCHANT, is_email_verified=True)
+    owner.set_password("BenchPass123")
+    buyer = User(email="buyer@bench.local", first_name="Bench", last_name="Buyer",
+                 role=UserRole.USER, is_email_verified=True)
+    buyer.set_password("BenchPass123")
+    db.session.add_all([owner, buyer]); db.session.flush()
+    merchant = MerchantProfile(user_id=owner.id, business_name="Bench", business_email="bench@bench.local",
+                               business_phone="+919876543210", business_address="1 Bench Rd",
+                               country_code="IN", state_province="MH", city="Pune",
+                               postal_code="411001", gstin="27ABCDE1234F1Z5")
+    db.session.add(merchant); db.session.flush()
+    category = Category(name="Bench", slug="bench"); db.session.add(category)
+    brand = Brand(name="Bench", slug="bench"); db.session.add(brand); db.session.flush()
+
+    ids = []
+    for i in range(product_count):
+        product = Product(merchant_id=merchant.id, category_id=category.category_id, brand_id=brand.brand_id,
+                          sku=f"BENCH-{i}", product_name=f"Bench {i}", product_description="Benchmark product",
+                          cost_price=Decimal("50.00"), selling_price=Decimal("100.00"),
+                          active_flag=True, approval_status="approved")
+        db.session.add(product); db.session.flush()
+        db.session.add(ProductStock(product_id=product.product_id, stock_qty=10))
+        for n in range(3):
+            db.session.add(ProductMedia(product_id=product.product_id, type=MediaType.IMAGE,
+                                        url=f"https://cdn.bench/{i}/{n}.jpg", sort_order=n))
+        for n in range(reviews_per_product):
+            db.session.add(Review(user_id=buyer.id, product_id=product.product_id, order_id=f"ORD-{i}-{n}",
+                                  rating=1 + (i + n) % 5, title="t", body="b"))
+        db.session.flush()
+        review_aggregate_service.refresh_product_rating(product.product_id)
+        ids.append(product.product_id)
+    db.session.commit()
+    return ids
+
+
+def per_product_cards(product_ids):
+    """What the listing endpoints did before the hydrator, one product at a time."""
+    from controllers.product_controller import ProductController
+    from models.product import Product
+    from models.review import Review
+
+    cards = []
+    for product in Product.query.filter(Product.product_id.in_(product_ids)).all():
+        card = product.serialize()
+        card['stock'] = product.stock.stock_qty if product.stock else 0
+        media = ProductController.get_product_media(product.product_id)
+        card['primary_image'] = media['url'] if media else None
+        card['rating'] = float(db.session.query(func.avg(Review.rating))
+                               .filter(Review.product_id == product.product_id).scalar() or 0)
+        card['reviews'] = [{'id': r.review_id, 'user': r.user.first_name, 'rating': r.rating}
+                           for r in Review.query.filter_by(product_id=product.product_id).all()]
+        cards.append(card)
+    return cards
+
+
+def hydrated_cards(product_ids):
+    from services.product_hydrator import ProductHydrator
+    return ProductHydrator(reviews=True, media_list=True).cards(product_ids)
+
+
+def measure(build, product_ids):
+    db.session.expunge_all()
+    started = time.perf_counter()
+    with QueryAudit() as audit:
+        build(product_ids)
+    return audit.count, (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[5, 20, 50])
+    parser.add_argument('--reviews', type=int, default=4, help='reviews per product')
+    args = parser.parse_args()
+
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        ids = seed(max(args.sizes), args.reviews)
+
+        print(f"{'page':>6} {'before':>8} {'after':>8} {'before ms':>10} {'after ms':>10}")
+        for size in args.sizes:
+            page = ids[:size]
+            before, before_ms = measure(per_product_cards, page)
+            after, after_ms = measure(hydrated_cards, page)
+            print(f"{size:>6} {before:>8} {after:>8} {before_ms:>10.1f} {after_ms:>10.1f}")
+
+        db.session.remove()
+        db.drop_all()
+
+
+if __name__ == '__main__':
+    main()
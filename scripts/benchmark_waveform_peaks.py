@@ -0,0 +1,112 @@
+"""
+Time waveform peak extraction: the old struct.unpack loop versus the streaming
+BlockPeaks reducer in services/music/waveform_service.py.
+
+Synthesises a mono 16-bit PCM track at ENVELOPE_HZ (a tone under a slow amplitude
+ramp, so the peaks are not flat), then for each length prints wall time and the
+peak Python allocation of each path. The streaming paths are fed in CHUNK_BYTES
+pieces, as they are from ffmpeg's stdout, and must produce the same peaks as the
+old loop. No ffmpeg or database needed.
+
+Usage:
+    python scripts/benchmark_waveform_peaks.py [--seconds 30 180 600] [--buckets 120] [--repeat 3]
+"""
+
+import argparse
+import math
+import os
+import struct
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.music.waveform_service import (
+    CHUNK_BYTES, ENVELOPE_HZ, PYRAMID_LEVELS, BlockPeaks, fold_peaks, np,
+)
+
+
+def synth_pcm(seconds):
+    count = int(seconds * ENVELOPE_HZ)
+    if np is not None:
+        t = np.arange(count) / ENVELOPE_HZ
+        wave = np.sin(2 * math.pi * 440 * t) * (0.1 + 0.9 * t / max(seconds, 1))
+        return (wave * 32767).astype("<i2").tobytes()
+    return struct.pack(f"<{count}h", *(
+        int(32767 * math.sin(2 * math.pi * 440 * i / ENVELOPE_HZ) * (0.1 + 0.9 * i / count))
+        for i in range(count)
+    ))
+
+
+def legacy_peaks(raw, buckets):
+    """The pre-streaming generate_peaks body, minus the normalisation."""
+    count = len(raw) // 2
+    samples = struct.unpack(f"<{count}h", raw[: count * 2])
+    step = max(1, count // buckets)
+    peaks = []
+    for i in range(0, count, step):
+        window = samples[i : i + step]
+        if not window:
+            continue
+        peaks.append(max(abs(s) for s in window))
+        if len(peaks) == buckets:
+            break
+    return peaks
+
+
+def streamed_peaks(raw, levels, use_numpy):
+    reducer = BlockPeaks(use_numpy=use_numpy)
+    view = memoryview(raw)
+    for i in range(0, len(raw), CHUNK_BYTES):
+        reducer.feed(view[i : i + CHUNK_BYTES])
+    blocks = reducer.result()
+    return {n: fold_peaks(blocks, n) for n in levels}
+
+
+def measure(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, nargs='+', default=[30, 180, 600])
+    parser.add_argument('--buckets', type=int, default=120)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    paths = [('struct loop', None), ('array stream', False)]
+    if np is not None:
+        paths.append(('numpy stream', True))
+
+    print(f"{'seconds':>8} {'path':<14} {'levels':<24} {'best ms':>9} {'peak alloc':>11}")
+    for seconds in args.seconds:
+        raw = synth_pcm(seconds)
+        baseline = None
+        for name, use_numpy in paths:
+            if use_numpy is None:
+                peaks, best, alloc = measure(lambda: legacy_peaks(raw, args.buckets), args.repeat)
+                baseline, levels = peaks, str(args.buckets)
+            else:
+                pyramid, best, alloc = measure(
+                    lambda: streamed_peaks(raw, (args.buckets,) + PYRAMID_LEVELS[1:], use_numpy), args.repeat)
+                peaks, levels = pyramid[args.buckets], '+'.join(str(n) for n in pyramid)
+                # Bucket edges differ slightly (the old loop dropped the tail), so
+                # compare the shape rather than exact values.
+                drift = max(abs(a - b) for a, b in zip(peaks, baseline)) / 32768
+                levels += f" (Δ{drift:.3f})"
+            print(f"{seconds:>8g} {name:<14} {levels:<24} {best * 1000:>9.1f} {alloc / 1024:>9.0f}KB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""
+Warm the ShipRocket serviceability cache for merchants' pickup pincodes.
+
+Quotes each merchant's pickup pincode against the delivery pincodes recent orders
+shipped to most often, for a few weight bands, prepaid and (with --cod) COD, and
+stores the answers (services/serviceability_cache.py) so checkout views hit the
+cache. Run it from cron a little more often than SHIPROCKET_SERVICEABILITY_TTL_SECONDS.
+
+Usage:
+    python scripts/prefetch_serviceability.py [--merchant-id ID ...] [--top 50] [--days 90]
+        [--weights 0.5 1 2] [--cod 1000 ...] [--workers 8]
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from services import serviceability_cache
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--merchant-id', type=int, nargs='*')
+    parser.add_argument('--top', type=int, default=50, help='delivery pincodes to quote')
+    parser.add_argument('--days', type=int, default=90, help='order history to rank pincodes by')
+    parser.add_argument('--weights', type=float, nargs='+', default=[0.5, 1.0, 2.0])
+    parser.add_argument('--cod', type=float, nargs='*', default=[], help='COD amounts to quote besides prepaid')
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        pickups = serviceability_cache.pickup_pincodes(args.merchant_id)
+        deliveries = serviceability_cache.top_delivery_pincodes(args.top, args.days)
+        if not pickups or not deliveries:
+            print(f"Nothing to quote ({len(pickups)} pickup, {len(deliveries)} delivery pincodes).")
+            return
+        stats = serviceability_cache.prefetch(
+            pickups.values(), deliveries, weights=args.weights,
+            cod_amounts=[0] + args.cod, workers=args.workers,
+        )
+    print(f"{stats['quoted']} quoted ({stats['serviceable']} serviceable), {stats['failed']} failed")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Run queued reel video work (thumbnail, probe, audio mix) outside the web workers.
+
+This is how reel uploads get their thumbnail, probe, HLS and mix jobs done: the web
+hosts only queue them (MEDIA_JOBS_ENABLED is off by default), and one or more of
+these, on a host with ffmpeg, polls media_jobs (services/media_job_service.py). So
+ffmpeg never competes with requests for CPU. Claims are row-level, so several
+workers can run side by side. Set MEDIA_SPOOL_SHARED on the web hosts only when
+MEDIA_SPOOL_DIR is a volume this worker also mounts; otherwise it downloads each
+video from S3.
+
+Usage:
+    python scripts/run_media_worker.py [--once] [--poll 5] [--workers N]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from common.database import db
+from services.media_job_service import process_jobs, sweep_spool
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--once', action='store_true', help='process what is due and exit')
+    parser.add_argument('--poll', type=float, default=5, help='seconds to sleep when the queue is empty')
+    parser.add_argument('--workers', type=int, help='reels processed at once (default MEDIA_JOB_WORKERS)')
+    args = parser.parse_args()
+
+    app = create_app()
+    if args.workers:
+        app.config['MEDIA_JOB_WORKERS'] = args.workers
+
+    with app.app_context():
+        while True:
+            try:
+                result = process_jobs()
+                sweep_spool()
+            except Exception as e:
+                db.session.rollback()
+                app.logger.error("Media worker run failed: %s", e, exc_info=True)
+                result = {'done': 0, 'retrying': 0, 'failed': 0}
+            finally:
+                db.session.remove()
+            if any(result.values()):
+                print(f"{result['done']} done, {result['retrying']} retrying, {result['failed']} failed")
+            if args.once:
+                break
+            if not any(result.values()):
+                time.sleep(args.poll)
+
+
+if __name__ == '__main__':
+    main()
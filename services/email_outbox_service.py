@@ -0,0 +1,221 @@
+# services/email_outbox_service.py
+"""Background delivery for auth.email_utils.send_email.
+
+send_email used to open a fresh SMTP connection, STARTTLS and log in inside the
+request for every OTP, verification and password-reset mail, so registration held a
+worker for up to the 10s SMTP timeout. Now the request only renders the message and
+calls `enqueue()`; `flush_outbox()` runs on the app scheduler and:
+
+- claims a batch of due rows with a conditional UPDATE (services/work_queue.py), so
+  several gunicorn workers each running the job never send the same row twice;
+- sends the whole batch over one pooled connection, kept open between runs and
+  checked with NOOP before reuse;
+- retries failures with exponential backoff and gives up after
+  EMAIL_OUTBOX_MAX_ATTEMPTS, leaving the row 'failed' with the last error.
+
+EMAIL_TRANSPORT='file' swaps SMTP for a directory of .eml files, which is what tests
+and local development use instead of a real mail server.
+"""
+import os
+import smtplib
+import threading
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy.orm import Session
+
+from common.database import db
+from models.email_outbox import EmailOutbox
+from services import work_queue
+
+
+class SmtpTransport:
+    """One long-lived SMTP connection, reopened when the server has dropped it."""
+
+    def __init__(self, host, port, use_tls, username=None, password=None, timeout=10):
+        self.host = host
+        self.port = port
+        self.use_tls = use_tls
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self._server = None
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            server.starttls()
+        if self.username and self.password:
+            server.login(self.username, self.password)
+        return server
+
+    def _connection(self):
+        if self._server is not None:
+            try:
+                if self._server.noop()[0] == 250:
+                    return self._server
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.close()
+        self._server = self._connect()
+        return self._server
+
+    def send(self, outbox_id, sender, to_email, raw_message):
+        try:
+            self._connection().sendmail(sender, to_email, raw_message)
+        except smtplib.SMTPServerDisconnected:
+            # The NOOP can pass and the server still hang up before DATA. One fresh
+            # connection is worth trying; a second failure is a real failure.
+            self.close()
+            self._connection().sendmail(sender, to_email, raw_message)
+
+    def close(self):
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except Exception:
+            pass
+        self._server = None
+
+
+class FileSinkTransport:
+    """Writes each message to <directory>/<outbox_id>.eml instead of sending it."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def send(self, outbox_id, sender, to_email, raw_message):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{outbox_id}.eml")
+        with open(path, 'w', encoding='utf-8') as fh:
+            fh.write(raw_message)
+
+    def close(self):
+        pass
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_transport():
+    """The process-wide transport for the current app's EMAIL_TRANSPORT setting."""
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            config = current_app.config
+            if config.get('EMAIL_TRANSPORT', 'smtp') == 'file':
+                _transport = FileSinkTransport(config.get('EMAIL_FILE_SINK_DIR', 'instance/outbox'))
+            else:
+                _transport = SmtpTransport(
+                    config['MAIL_SERVER'],
+                    config['MAIL_PORT'],
+                    config.get('MAIL_USE_TLS', True),
+                    config.get('MAIL_USERNAME'),
+                    config.get('MAIL_PASSWORD'),
+                )
+        return _transport
+
+
+def reset_transport():
+    """Close and forget the cached transport (config changed, or tests)."""
+    global _transport
+    with _transport_lock:
+        if _transport is not None:
+            _transport.close()
+        _transport = None
+
+
+def enqueue(to_email, sender, subject, raw_message, in_transaction=False):
+    """Persist one rendered message for the background sender.
+
+    Never commits or rolls back the caller's transaction:
+    - in_transaction=True writes the row in a savepoint of db.session. It is only
+      delivered if the caller commits, so a status change and the mail announcing
+      it land together (merchant approval, document rejection, order confirmation).
+    - Otherwise the row is committed on a session of its own, so mail sent from a
+      request that commits nothing afterwards (OTP, password reset) is not lost.
+    A failure leaves the caller's pending changes as they were.
+    """
+    row = EmailOutbox(
+        to_email=to_email,
+        sender=sender,
+        subject=subject[:255],
+        raw_message=raw_message,
+        status=EmailOutbox.STATUS_PENDING,
+        next_attempt_at=datetime.utcnow(),
+    )
+    if in_transaction:
+        with db.session.begin_nested():
+            db.session.add(row)
+        return row
+    with Session(db.engine, expire_on_commit=False) as session:
+        session.add(row)
+        session.commit()
+    return row
+
+
+def _backoff(attempts):
+    config = current_app.config
+    return work_queue.backoff(attempts, int(config.get('EMAIL_OUTBOX_BACKOFF_SECONDS', 30)),
+                              int(config.get('EMAIL_OUTBOX_BACKOFF_MAX_SECONDS', 3600)))
+
+
+def _claim_batch(batch_size):
+    """Move up to batch_size due rows to 'sending' and return the ones we won."""
+    return work_queue.claim_batch(
+        EmailOutbox, 'outbox_id', EmailOutbox.STATUS_SENDING, batch_size,
+        int(current_app.config.get('EMAIL_OUTBOX_LOCK_TIMEOUT_SECONDS', 300)))
+
+
+def flush_outbox(batch_size=None):
+    """Send every due message, batch by batch, up to EMAIL_OUTBOX_MAX_BATCHES.
+
+    Returns counts so the scheduler job can log what it did.
+    """
+    config = current_app.config
+    batch_size = batch_size or int(config.get('EMAIL_OUTBOX_BATCH_SIZE', 50))
+    max_batches = int(config.get('EMAIL_OUTBOX_MAX_BATCHES', 10))
+    max_attempts = int(config.get('EMAIL_OUTBOX_MAX_ATTEMPTS', 6))
+
+    transport = get_transport()
+    stats = {'sent': 0, 'retrying': 0, 'failed': 0}
+
+    for _ in range(max_batches):
+        rows = _claim_batch(batch_size)
+        if not rows:
+            break
+        for row in rows:
+            row.attempts = (row.attempts or 0) + 1
+            try:
+                transport.send(row.outbox_id, row.sender, row.to_email, row.raw_message)
+            except Exception as e:
+                row.last_error = str(e)[:1000]
+                row.locked_at = None
+                if row.attempts >= max_attempts:
+                    row.status = EmailOutbox.STATUS_FAILED
+                    stats['failed'] += 1
+                    current_app.logger.error(
+                        "Email %s to %s failed permanently after %s attempts: %s",
+                        row.outbox_id, row.to_email, row.attempts, e,
+                    )
+                else:
+                    row.status = EmailOutbox.STATUS_PENDING
+                    row.next_attempt_at = datetime.utcnow() + _backoff(row.attempts)
+                    stats['retrying'] += 1
+                    current_app.logger.warning(
+                        "Email %s to %s failed (attempt %s), retrying at %s: %s",
+                        row.outbox_id, row.to_email, row.attempts, row.next_attempt_at, e,
+                    )
+                # A broken connection must not poison the rest of the batch.
+                transport.close()
+            else:
+                row.status = EmailOutbox.STATUS_SENT
+                row.sent_at = datetime.utcnow()
+                row.last_error = None
+                row.locked_at = None
+                stats['sent'] += 1
+        db.session.commit()
+
+    return stats
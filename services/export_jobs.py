@@ -0,0 +1,353 @@
+# services/export_jobs.py
+"""Render report exports in the background and keep the file for download.
+
+create() checks the kind, format and parameters and writes an ExportJob row. If
+the same user asked for the same export within EXPORT_JOB_DEDUP_SECONDS and that
+job is still queued, running or downloadable, create() returns that job instead.
+
+With EXPORT_JOBS_BACKGROUND on, jobs go to one process-wide pool of
+EXPORT_JOB_WORKERS threads, so a burst of export clicks renders at most that many
+reports at once. With it off (tests, local runs), the job renders in the calling
+request.
+
+A kind is a renderer that returns (data, mimetype, filename), in the same shape
+the synchronous export routes use. data may be bytes, a file or an iterator of
+chunks (common/exports.py). The artifact is written to EXPORT_JOB_STORAGE:
+- 'local': files under EXPORT_JOB_LOCAL_DIR, served by the download route.
+- 's3': objects under exports/ in the media bucket, served through a short-lived
+  presigned URL. Use this whenever more than one host serves the API.
+
+A running job refreshes its heartbeat at most every EXPORT_JOB_HEARTBEAT_SECONDS
+while it renders: between the fetches of every query_rows() read and between the
+chunks written to storage. Only a job whose worker is gone goes quiet for
+EXPORT_JOB_STALE_SECONDS, however large the export.
+
+Artifacts are kept for EXPORT_JOB_RETENTION_SECONDS, after which sweep() deletes
+them. sweep() also restarts jobs whose worker disappeared (services/job_runner.py).
+"""
+import hashlib
+import json
+import os
+import tempfile
+import time
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+from flask import current_app, g
+
+from common.database import db
+from common.metrics import registry
+from models.export_job import ExportJob
+from services.job_runner import JobRunner
+
+registry.describe('export_jobs_total', 'Background report exports by kind and outcome.')
+registry.describe('export_job_seconds', 'Time to render and store a background report export.')
+
+
+class ExportJobError(Exception):
+    """The request cannot become a job (unknown kind, bad format or parameters)."""
+
+
+# role: the UserRole value allowed to request it. params: the accepted parameter
+# names; anything else is dropped before hashing, so it cannot defeat dedup.
+ExportKind = namedtuple('ExportKind', 'role formats params render')
+KINDS = {}
+
+
+def kind(name, role, formats, params=()):
+    def register(render):
+        KINDS[name] = ExportKind(role, tuple(formats), tuple(params), render)
+        return render
+    return register
+
+
+def _parse_date(value):
+    return date.fromisoformat(value) if value else None
+
+
+@kind('merchant_inventory', 'merchant', ('pdf', 'excel', 'csv'),
+      params=('search', 'category', 'brand', 'stock_status'))
+def _merchant_inventory(user_id, export_format, params):
+    from controllers.merchant.inventory_export_controller import MerchantInventoryExportController
+    return MerchantInventoryExportController.render_inventory_report(user_id, export_format, params or None)
+
+
+@kind('merchant_sales', 'merchant', ('pdf', 'excel', 'csv'))
+def _merchant_sales(user_id, export_format, params):
+    from controllers.merchant.report_export_controller import MerchantReportExportController
+    return MerchantReportExportController.render_sales_report(user_id, export_format)
+
+
+@kind('sales', 'super_admin', ('pdf', 'excel', 'csv'))
+def _sales(user_id, export_format, params):
+    from controllers.superadmin.performance_analytics import PerformanceAnalyticsController
+    data, mimetype, filename = PerformanceAnalyticsController.export_sales_report(export_format)
+    if data is None:
+        raise ExportJobError("Failed to generate report")
+    return data, mimetype, filename
+
+
+@kind('plinko_leads', 'super_admin', ('csv',),
+      params=('status', 'campaign_id', 'search', 'date_from', 'date_to', 'sort_by'))
+def _plinko_leads(user_id, export_format, params):
+    from controllers.superadmin.plinko_admin_controller import PlinkoAdminController
+    filters = dict(params)
+    for key in ('date_from', 'date_to'):
+        filters[key] = _parse_date(filters.get(key))
+    return PlinkoAdminController.export_csv(**filters)
+
+
+@kind('merchant_transactions', 'super_admin', ('csv', 'excel'),
+      params=('status', 'merchant_id', 'from_date', 'to_date'))
+def _merchant_transactions(user_id, export_format, params):
+    from controllers.superadmin.merchant_transaction_controller import export_transactions
+    return export_transactions(params, export_format)
+
+
+@kind('invoice_archive', 'super_admin', ('zip',), params=('from_date', 'to_date'))
+def _invoice_archive(user_id, export_format, params):
+    from services import invoice_cache
+    from_date, to_date = _parse_date(params.get('from_date')), _parse_date(params.get('to_date'))
+    if not from_date or not to_date:
+        raise ExportJobError("from_date and to_date are required")
+    out = tempfile.TemporaryFile()
+    invoice_cache.write_archive(from_date, to_date, out)
+    out.seek(0)
+    return out, 'application/zip', f'gst_invoices_{from_date.isoformat()}_{to_date.isoformat()}.zip'
+
+
+runner = JobRunner('export job', ExportJob, 'job_id', ExportJob.ACTIVE_STATUSES, ExportJob.STATUS_RUNNING,
+                   background='EXPORT_JOBS_BACKGROUND', workers=('EXPORT_JOB_WORKERS', 4),
+                   stale_seconds=('EXPORT_JOB_STALE_SECONDS', 1800))
+start = runner.start
+
+
+# --------------------------------------------------------------------------- #
+# Requests
+# --------------------------------------------------------------------------- #
+
+def normalise(kind_name, export_format, params):
+    """(kind, format, params) as stored and hashed. Raises ExportJobError."""
+    spec = KINDS.get(kind_name)
+    if spec is None:
+        raise ExportJobError(f"Unknown export kind: {kind_name}")
+    export_format = (export_format or '').lower()
+    if export_format not in spec.formats:
+        raise ExportJobError(
+            f"Invalid export format for {kind_name}. Supported formats: {', '.join(spec.formats)}")
+    params = {key: value for key, value in (params or {}).items()
+              if key in spec.params and value not in (None, '')}
+    for key in params:
+        if 'date' in key.split('_'):
+            try:
+                _parse_date(params[key])
+            except (TypeError, ValueError):
+                raise ExportJobError(f"{key} must be YYYY-MM-DD")
+    return kind_name, export_format, params
+
+
+def params_hash(user_id, kind_name, export_format, params):
+    payload = json.dumps([int(user_id), kind_name, export_format, params], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def create(user_id, kind_name, export_format, params=None):
+    """The job for this request, new or deduplicated. Returns (job, created).
+
+    The caller checks that the user's role may request the kind (KINDS[kind].role).
+    """
+    kind_name, export_format, params = normalise(kind_name, export_format, params)
+
+    digest = params_hash(user_id, kind_name, export_format, params)
+    now = datetime.utcnow()
+    since = now - timedelta(seconds=int(current_app.config.get('EXPORT_JOB_DEDUP_SECONDS', 600)))
+    existing = ExportJob.query.filter(
+        ExportJob.params_hash == digest,
+        ExportJob.created_at >= since,
+        db.or_(ExportJob.status.in_(ExportJob.ACTIVE_STATUSES),
+               db.and_(ExportJob.status == ExportJob.STATUS_DONE, ExportJob.expires_at > now)),
+    ).order_by(ExportJob.job_id.desc()).first()
+    if existing is not None:
+        registry.inc('export_jobs_total', kind=kind_name, outcome='deduplicated')
+        return existing, False
+
+    job = ExportJob(kind=kind_name, format=export_format, params=params, params_hash=digest,
+                    requested_by=int(user_id), status=ExportJob.STATUS_QUEUED)
+    db.session.add(job)
+    db.session.commit()
+    job_id = job.job_id
+    start([job_id])
+    db.session.expire_all()
+    return db.session.get(ExportJob, job_id), True
+
+
+def get_for_user(job_id, user_id):
+    job = db.session.get(ExportJob, job_id)
+    if job is None or job.requested_by != int(user_id):
+        return None
+    return job
+
+
+def recent_for_user(user_id, limit=20):
+    return ExportJob.query.filter_by(requested_by=int(user_id)) \
+        .order_by(ExportJob.job_id.desc()).limit(limit).all()
+
+
+# --------------------------------------------------------------------------- #
+# Running
+# --------------------------------------------------------------------------- #
+
+@runner.job
+def run_job(job_id):
+    """Render and store the job. Returns the job (None if it was not claimable)."""
+    if not runner.claim(job_id):
+        return None
+    job = db.session.get(ExportJob, job_id)
+    db.session.refresh(job)
+    started = time.monotonic()
+    # query_rows() calls it between fetches (common/exports.py), _write between chunks.
+    g.export_heartbeat = beat = runner.heartbeat_every(
+        job_id, float(current_app.config.get('EXPORT_JOB_HEARTBEAT_SECONDS', 60)))
+    try:
+        data, mimetype, filename = KINDS[job.kind].render(job.requested_by, job.format, dict(job.params or {}))
+        storage, key, size = _store(job.job_id, filename, mimetype, data, beat)
+        job = db.session.get(ExportJob, job_id)
+        job.status = ExportJob.STATUS_DONE
+        job.storage, job.artifact_key, job.size_bytes = storage, key, size
+        job.filename, job.mimetype = filename, mimetype
+        job.last_error = None
+        job.expires_at = datetime.utcnow() + timedelta(
+            seconds=int(current_app.config.get('EXPORT_JOB_RETENTION_SECONDS', 86400)))
+        outcome = 'done'
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.warning(f"Export job {job_id} ({job.kind}) failed: {str(e)}", exc_info=True)
+        job = db.session.get(ExportJob, job_id)
+        job.status = ExportJob.STATUS_FAILED
+        job.last_error = str(e)[:2000]
+        outcome = 'failed'
+    finally:
+        g.pop('export_heartbeat', None)
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+    registry.inc('export_jobs_total', kind=job.kind, outcome=outcome)
+    registry.observe('export_job_seconds', time.monotonic() - started, kind=job.kind)
+    return job
+
+
+def sweep(limit=100):
+    """Restart abandoned jobs and delete expired artifacts. Returns (restarted, expired)."""
+    now = datetime.utcnow()
+    job_ids = runner.stale_ids(limit)
+    if job_ids:
+        start(job_ids)
+
+    expired = ExportJob.query.filter(
+        ExportJob.status == ExportJob.STATUS_DONE, ExportJob.expires_at <= now,
+    ).order_by(ExportJob.job_id).limit(limit).all()
+    for job in expired:
+        try:
+            _delete(job.storage, job.artifact_key)
+        except Exception as e:
+            current_app.logger.warning(f"Could not delete export artifact {job.artifact_key}: {str(e)}")
+            continue
+        job.status = ExportJob.STATUS_EXPIRED
+    db.session.commit()
+    return len(job_ids), len(expired)
+
+
+# --------------------------------------------------------------------------- #
+# Artifact storage
+# --------------------------------------------------------------------------- #
+
+COPY_CHUNK_BYTES = 1024 * 1024
+
+
+def _write(data, out, beat=None):
+    """Copy bytes, a file or an iterator of chunks into `out`, calling beat() between chunks."""
+    if isinstance(data, (bytes, bytearray)):
+        out.write(data)
+        return
+    if hasattr(data, 'read'):
+        with data:
+            for chunk in iter(lambda: data.read(COPY_CHUNK_BYTES), b''):
+                out.write(chunk)
+                if beat:
+                    beat()
+        return
+    for chunk in data:
+        out.write(chunk)
+        if beat:
+            beat()
+
+
+def _local_dir():
+    return os.path.abspath(current_app.config.get('EXPORT_JOB_LOCAL_DIR', 'instance/exports'))
+
+
+def _s3():
+    from services.s3_service import get_s3_service
+    service = get_s3_service()
+    return service.s3_client, current_app.config.get('EXPORT_JOB_S3_BUCKET') or service.bucket_name
+
+
+def _store(job_id, filename, mimetype, data, beat=None):
+    """Write the artifact where EXPORT_JOB_STORAGE says. Returns (storage, key, size)."""
+    key = f"{job_id}/{os.path.basename(filename)}"
+    if current_app.config.get('EXPORT_JOB_STORAGE', ExportJob.STORAGE_LOCAL) == ExportJob.STORAGE_S3:
+        client, bucket = _s3()
+        key = f"exports/{key}"
+        with tempfile.TemporaryFile() as spool:
+            _write(data, spool, beat)
+            size = spool.tell()
+            spool.seek(0)
+            client.upload_fileobj(spool, bucket, key, ExtraArgs={'ContentType': mimetype})
+        return ExportJob.STORAGE_S3, key, size
+
+    path = os.path.join(_local_dir(), key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = f"{path}.part"
+    try:
+        with open(partial, 'wb') as out:
+            _write(data, out, beat)
+            size = out.tell()
+        os.replace(partial, path)
+    except Exception:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    return ExportJob.STORAGE_LOCAL, key, size
+
+
+def _delete(storage, key):
+    if not key:
+        return
+    if storage == ExportJob.STORAGE_S3:
+        client, bucket = _s3()
+        client.delete_object(Bucket=bucket, Key=key)
+        return
+    path = os.path.join(_local_dir(), key)
+    if os.path.exists(path):
+        os.remove(path)
+    try:
+        os.rmdir(os.path.dirname(path))
+    except OSError:
+        pass
+
+
+def local_path(job):
+    """Absolute path of a locally stored artifact, or None if it is gone."""
+    path = os.path.join(_local_dir(), job.artifact_key)
+    return path if os.path.exists(path) else None
+
+
+def presigned_url(job):
+    """A short-lived download URL for an artifact stored in S3."""
+    client, bucket = _s3()
+    return client.generate_presigned_url(
+        'get_object',
+        Params={'Bucket': bucket, 'Key': job.artifact_key,
+                'ResponseContentDisposition': f'attachment; filename="{job.filename}"',
+                'ResponseContentType': job.mimetype},
+        ExpiresIn=int(current_app.config.get('EXPORT_JOB_URL_SECONDS', 300)),
+    )
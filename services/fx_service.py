@@ -16,7 +16,7 @@ historical order (I12).
 from datetime import date, datetime, timedelta
 from decimal import Decimal, ROUND_HALF_UP, ROUND_UP
 
-from flask import current_app
+from flask import current_app, has_request_context, request
 
 from common.database import db
 from models.fx_rate import FxRate
@@ -47,6 +47,9 @@ def _markup_percent():
     return Decimal(str(current_app.config.get("FX_MARKUP_PERCENT", "0")))
 
 
+_REQUEST_MEMO_KEY = 'fx_service.rate_rows'
+
+
 def get_rate_row(base, quote, on_date=None):
     """The most recent usable FxRate row for a pair, or raise.
 
@@ -62,6 +65,29 @@ def get_rate_row(base, quote, on_date=None):
         return None
 
     on_date = on_date or date.today()
+
+    # A listing page prices every product several times against the same pair. The
+    # first lookup in a request is remembered (including a failure) so a page costs
+    # one rate query, not four per product.
+    memo = request.environ.setdefault(_REQUEST_MEMO_KEY, {}) if has_request_context() else None
+    key = (base, quote, on_date)
+    if memo is not None and key in memo:
+        outcome = memo[key]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+    try:
+        row = _lookup_rate_row(base, quote, on_date)
+    except FxError as e:
+        if memo is not None:
+            memo[key] = e
+        raise
+    if memo is not None:
+        memo[key] = row
+    return row
+
+
+def _lookup_rate_row(base, quote, on_date):
     row = (
         FxRate.query.filter(
             FxRate.base_currency == base,
@@ -179,6 +205,8 @@ def record_rate(base, quote, rate, as_of, source):
     )
     db.session.add(row)
     db.session.commit()
+    if has_request_context():
+        request.environ.pop(_REQUEST_MEMO_KEY, None)
     return row
 
 
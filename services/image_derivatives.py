@@ -0,0 +1,112 @@
+# services/image_derivatives.py
+"""Resized WebP (and optionally AVIF) copies of uploaded images.
+
+Product, banner and review images were stored and served only as uploaded, often
+3-4000px JPEGs, so mobile listings downloaded full-resolution files for 200px
+cards. S3ProductMediaService now renders a derivative at each width in
+IMAGE_DERIVATIVE_WIDTHS that is smaller than the original, and stores it beside the
+original:
+
+    products/12/<uuid>_shoe.jpg
+    products/12/<uuid>_shoe_w320.webp
+    products/12/<uuid>_shoe_w640.webp
+
+The upload result carries {'webp': {'320': url, ...}}, which ProductMedia keeps in
+its `derivatives` column; serializers turn it into a `srcset`. Derivative keys are
+derived from the original key, so deleting the original deletes them too.
+
+Derivatives are an optimization: if rendering or uploading one fails the upload
+still succeeds without them, and scripts/backfill_image_derivatives.py can fill them
+in later. SVG, GIF and animated images are left alone.
+"""
+from io import BytesIO
+
+from flask import current_app
+from PIL import Image, ImageOps, features
+
+
+RASTER_CONTENT_TYPES = {'image/jpeg', 'image/jpg', 'image/png', 'image/webp', 'image/avif'}
+_CONTENT_TYPES = {'webp': 'image/webp', 'avif': 'image/avif'}
+_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def enabled():
+    return bool(current_app.config.get('IMAGE_DERIVATIVES_ENABLED', True))
+
+
+def widths():
+    return sorted({int(w) for w in current_app.config.get('IMAGE_DERIVATIVE_WIDTHS', (320, 640, 1080))})
+
+
+def formats():
+    """Configured formats this Pillow build can encode."""
+    wanted = current_app.config.get('IMAGE_DERIVATIVE_FORMATS', ('webp',))
+    return [fmt for fmt in wanted if fmt in _CONTENT_TYPES and features.check(fmt)]
+
+
+def wants(content_type):
+    return enabled() and (content_type or '').lower() in RASTER_CONTENT_TYPES
+
+
+def derivative_key(s3_key, width, fmt):
+    """products/1/abc_shoe.jpg -> products/1/abc_shoe_w320.webp"""
+    folder, _, name = s3_key.rpartition('/')
+    stem = name.rsplit('.', 1)[0] if '.' in name else name
+    return f"{folder}/{stem}_w{width}.{fmt}" if folder else f"{stem}_w{width}.{fmt}"
+
+
+def all_keys(s3_key):
+    """Every derivative key the current settings could have produced for an original."""
+    return [derivative_key(s3_key, w, fmt) for fmt in _CONTENT_TYPES for w in widths()]
+
+
+def render(data):
+    """[(width, fmt, bytes)] for one image, smallest first. [] for animated images."""
+    quality = int(current_app.config.get('IMAGE_DERIVATIVE_QUALITY', 80))
+    with Image.open(BytesIO(data)) as source:
+        if getattr(source, 'is_animated', False):
+            return []
+        image = ImageOps.exif_transpose(source)
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+
+        targets = [w for w in widths() if w < image.width] or [image.width]
+        rendered = []
+        for width in targets:
+            height = max(1, round(image.height * width / image.width))
+            resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+            for fmt in formats():
+                out = BytesIO()
+                resized.save(out, format=fmt.upper(), quality=quality)
+                rendered.append((width, fmt, out.getvalue()))
+        return rendered
+
+
+def create(s3_client, bucket, base_url, s3_key, data):
+    """Render and upload derivatives for one original. {fmt: {width: url}} or None."""
+    try:
+        rendered = render(data)
+    except Exception as e:
+        current_app.logger.warning(f"Could not render image derivatives for {s3_key}: {str(e)}")
+        return None
+
+    derivatives = {}
+    for width, fmt, body in rendered:
+        key = derivative_key(s3_key, width, fmt)
+        try:
+            s3_client.put_object(
+                Bucket=bucket, Key=key, Body=body,
+                ContentType=_CONTENT_TYPES[fmt], CacheControl=_CACHE_CONTROL,
+            )
+        except Exception as e:
+            current_app.logger.warning(f"Could not upload image derivative {key}: {str(e)}")
+            continue
+        derivatives.setdefault(fmt, {})[str(width)] = f"{base_url.rstrip('/')}/{key}"
+    return derivatives or None
+
+
+def srcset(derivatives, fmt='webp'):
+    """'url 320w, url 640w' for one format, or None."""
+    urls = (derivatives or {}).get(fmt) or {}
+    if not urls:
+        return None
+    return ', '.join(f"{urls[w]} {w}w" for w in sorted(urls, key=int))
@@ -0,0 +1,247 @@
+# services/invoice_cache.py
+"""Render each invoice once and keep the PDF.
+
+An invoice is a pure function of build_invoice_data's dict and the renderer
+(invoice_pdf.RENDER_VERSION). The key is a hash of both. A re-download of an
+unchanged order therefore reads the stored PDF instead of running ReportLab
+again. An order whose data changes (a refund changes payment_status) gets a new
+key and is rendered again. Bumping RENDER_VERSION re-renders everything lazily.
+
+PDFs live in INVOICE_CACHE_STORAGE:
+- 'local': files under INVOICE_CACHE_DIR.
+- 's3': objects under invoices/ in the media bucket. Use this when more than one
+  host serves the API.
+A storage failure never fails a download: the PDF is rendered and served anyway.
+
+render_range() fills the cache for every paid order in a date range, rendering
+misses in INVOICE_BATCH_PROCESSES worker processes. write_archive() zips the
+result for the monthly GST archive and is also available as the
+'invoice_archive' export job (services/export_jobs).
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from flask import current_app
+from sqlalchemy.orm import selectinload
+
+from common.database import db
+from common.metrics import registry
+from models.order import Order, OrderItem
+from services.invoice_pdf import RENDER_VERSION, render_invoice_pdf
+from services.invoice_service import PAID_PAYMENT_STATUSES, invoice_data_for_order
+
+registry.describe('invoice_renders_total', 'Invoice PDF requests by outcome (hit, miss, uncached).')
+
+STORAGE_LOCAL = 'local'
+STORAGE_S3 = 's3'
+
+
+def invoice_key(data):
+    """Content hash of an invoice: its data and the renderer version."""
+    payload = json.dumps([RENDER_VERSION, data], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _artifact(order_id, key):
+    return f"{os.path.basename(str(order_id))}/{key}.pdf"
+
+
+# --------------------------------------------------------------------------- #
+# Storage
+# --------------------------------------------------------------------------- #
+
+def _storage():
+    return current_app.config.get('INVOICE_CACHE_STORAGE', STORAGE_LOCAL)
+
+
+def _local_path(artifact):
+    return os.path.join(os.path.abspath(current_app.config.get('INVOICE_CACHE_DIR', 'instance/invoices')),
+                        artifact)
+
+
+def _s3():
+    from services.s3_service import get_s3_service
+    service = get_s3_service()
+    return service.s3_client, current_app.config.get('INVOICE_CACHE_S3_BUCKET') or service.bucket_name
+
+
+def _read(artifact):
+    """The stored PDF, or None."""
+    if _storage() == STORAGE_S3:
+        client, bucket = _s3()
+        try:
+            return client.get_object(Bucket=bucket, Key=f"invoices/{artifact}")['Body'].read()
+        except client.exceptions.NoSuchKey:
+            return None
+    path = _local_path(artifact)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def _exists(artifact):
+    if _storage() == STORAGE_S3:
+        client, bucket = _s3()
+        try:
+            client.head_object(Bucket=bucket, Key=f"invoices/{artifact}")
+            return True
+        except Exception:
+            return False
+    return os.path.exists(_local_path(artifact))
+
+
+def _write(artifact, pdf):
+    if _storage() == STORAGE_S3:
+        client, bucket = _s3()
+        client.put_object(Bucket=bucket, Key=f"invoices/{artifact}", Body=pdf, ContentType='application/pdf')
+        return
+    path = _local_path(artifact)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = f"{path}.{os.getpid()}.part"
+    try:
+        with open(partial, 'wb') as out:
+            out.write(pdf)
+        os.replace(partial, path)
+    except Exception:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+
+
+# --------------------------------------------------------------------------- #
+# Single invoice
+# --------------------------------------------------------------------------- #
+
+def get_or_render(data):
+    """(pdf_bytes, key) for the invoice data, from the cache when possible."""
+    key = invoice_key(data)
+    artifact = _artifact(data['order_id'], key)
+    try:
+        pdf = _read(artifact)
+    except Exception as e:
+        current_app.logger.warning(f"Invoice cache read failed for {artifact}: {str(e)}")
+        pdf, outcome = render_invoice_pdf(data), 'uncached'
+    else:
+        if pdf is not None:
+            registry.inc('invoice_renders_total', outcome='hit')
+            return pdf, key
+        pdf, outcome = render_invoice_pdf(data), 'miss'
+        try:
+            _write(artifact, pdf)
+        except Exception as e:
+            current_app.logger.warning(f"Invoice cache write failed for {artifact}: {str(e)}")
+            outcome = 'uncached'
+    registry.inc('invoice_renders_total', outcome=outcome)
+    return pdf, key
+
+
+# --------------------------------------------------------------------------- #
+# Batches
+# --------------------------------------------------------------------------- #
+
+def paid_order_ids(from_date, to_date):
+    """Paid orders placed between the dates (inclusive), oldest first."""
+    return [order_id for (order_id,) in db.session.query(Order.order_id).filter(
+        Order.payment_status.in_(PAID_PAYMENT_STATUSES),
+        db.func.date(Order.order_date) >= from_date,
+        db.func.date(Order.order_date) <= to_date,
+    ).order_by(Order.order_date, Order.order_id)]
+
+
+def _invoice_data(order_ids):
+    """Invoice data for order_ids, INVOICE_BATCH_SIZE orders per query."""
+    size = max(1, int(current_app.config.get('INVOICE_BATCH_SIZE', 200)))
+    for i in range(0, len(order_ids), size):
+        chunk = order_ids[i:i + size]
+        orders = Order.query.options(selectinload(Order.items).joinedload(OrderItem.merchant)) \
+            .filter(Order.order_id.in_(chunk)).all()
+        by_id = {order.order_id: order for order in orders}
+        for order_id in chunk:
+            yield invoice_data_for_order(by_id[order_id])
+
+
+def _pool(processes):
+    # spawn, not fork: the parent may be a web or export-job thread with live DB
+    # connections. The child only imports invoice_pdf.
+    return ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'))
+
+
+def render_range(from_date, to_date, processes=None):
+    """Make sure every paid order in the range has a stored invoice.
+
+    Orders are read INVOICE_BATCH_SIZE at a time and each miss is rendered as it is
+    found. With a process pool at most two renders per process are in flight, and
+    each PDF is written and dropped as soon as it is done, so memory does not grow
+    with the size of the range.
+
+    Returns {'orders', 'rendered', 'cached', 'failed': [order_id, ...],
+    'invoices': [(order_id, artifact), ...]} where invoices lists the stored ones.
+    """
+    if processes is None:
+        processes = int(current_app.config.get('INVOICE_BATCH_PROCESSES', 0))
+    order_ids = paid_order_ids(from_date, to_date)
+    invoices, failed = [], []
+    rendered = 0
+    in_flight = {}  # future -> artifact
+    pool = None
+
+    def store(artifact, render):
+        nonlocal rendered
+        try:
+            _write(artifact, render())
+            rendered += 1
+        except Exception as e:
+            current_app.logger.warning(f"Invoice {artifact} failed to render: {str(e)}", exc_info=True)
+            failed.append(artifact.split('/')[0])
+
+    def drain(limit):
+        """Store finished renders until no more than `limit` are in flight."""
+        while len(in_flight) > limit:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                store(in_flight.pop(future), future.result)
+
+    try:
+        for data in _invoice_data(order_ids):
+            artifact = _artifact(data['order_id'], invoice_key(data))
+            invoices.append((data['order_id'], artifact))
+            if _exists(artifact):
+                continue
+            if processes <= 0:
+                store(artifact, lambda: render_invoice_pdf(data))
+                continue
+            if pool is None:
+                pool = _pool(processes)
+            in_flight[pool.submit(render_invoice_pdf, data)] = artifact
+            drain(2 * processes - 1)
+        drain(0)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    registry.inc('invoice_renders_total', rendered, outcome='miss')
+    failed_ids = set(failed)
+    return {
+        'orders': len(order_ids),
+        'rendered': rendered,
+        'cached': len(order_ids) - rendered - len(failed),
+        'failed': failed,
+        'invoices': [(order_id, artifact) for order_id, artifact in invoices if order_id not in failed_ids],
+    }
+
+
+def write_archive(from_date, to_date, out, processes=None):
+    """Zip the range's invoices (invoice_<order_id>.pdf) into the file object `out`.
+
+    Returns render_range's summary.
+    """
+    result = render_range(from_date, to_date, processes)
+    with zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for order_id, artifact in result['invoices']:
+            archive.writestr(f"invoice_{order_id}.pdf", _read(artifact))
+    return result
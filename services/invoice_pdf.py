@@ -3,7 +3,11 @@
 
 Defensive: every field access falls back to a safe default so a partially-populated
 invoice still renders rather than throwing.
+
+Pure function of its input (no Flask, no database), so services/invoice_cache can
+run it in worker processes.
 """
+from functools import lru_cache
 from io import BytesIO
 
 from reportlab.lib import colors
@@ -16,6 +20,10 @@ from reportlab.platypus import (
 
 BRAND_COLOR = colors.HexColor("#F2631F")
 
+# Part of every cached invoice's key (services/invoice_cache). Bump it whenever a
+# change here alters the PDF, so stored invoices are rendered again.
+RENDER_VERSION = 1
+
 
 def _fmt_money(currency, value):
     try:
@@ -42,6 +50,18 @@ def _addr_lines(addr):
     return lines or ["N/A"]
 
 
+@lru_cache(maxsize=1)
+def _styles():
+    """Paragraph styles, built once per process; reportlab only reads them."""
+    styles = getSampleStyleSheet()
+    normal = styles["Normal"]
+    small = ParagraphStyle("small", parent=normal, fontSize=8, leading=11)
+    h_title = ParagraphStyle("title", parent=styles["Heading1"], textColor=BRAND_COLOR, fontSize=20)
+    h_sec = ParagraphStyle("sec", parent=styles["Heading4"], spaceAfter=2)
+    right = ParagraphStyle("right", parent=normal, alignment=2)
+    return normal, small, h_title, h_sec, right
+
+
 def render_invoice_pdf(data):
     """Return PDF bytes for the given invoice data dict."""
     buf = BytesIO()
@@ -50,12 +70,7 @@ def render_invoice_pdf(data):
         leftMargin=18 * mm, rightMargin=18 * mm, topMargin=16 * mm, bottomMargin=16 * mm,
         title=f"Invoice {data.get('invoice_number', '')}",
     )
-    styles = getSampleStyleSheet()
-    normal = styles["Normal"]
-    small = ParagraphStyle("small", parent=normal, fontSize=8, leading=11)
-    h_title = ParagraphStyle("title", parent=styles["Heading1"], textColor=BRAND_COLOR, fontSize=20)
-    h_sec = ParagraphStyle("sec", parent=styles["Heading4"], spaceAfter=2)
-    right = ParagraphStyle("right", parent=normal, alignment=2)
+    normal, small, h_title, h_sec, right = _styles()
 
     currency = data.get("currency", "INR")
     elems = []
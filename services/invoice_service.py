@@ -109,6 +109,11 @@ def build_invoice_data(order_id, user_id, require_paid=True):
     if require_paid and order.payment_status not in PAID_PAYMENT_STATUSES:
         raise InvoiceError("Invoice is available only after successful payment", 400)
 
+    return invoice_data_for_order(order)
+
+
+def invoice_data_for_order(order):
+    """The invoice data dict for a loaded order, without ownership or payment checks."""
     seller = _seller_block(order)
     billing = _address_dict(order.billing_address_obj) or _address_dict(order.shipping_address_obj)
     shipping = _address_dict(order.shipping_address_obj)
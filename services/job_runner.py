@@ -0,0 +1,146 @@
+# services/job_runner.py
+"""Run background jobs whose state is a database row.
+
+shipment_jobs, export_jobs, payment_finalization and payout_batches each keep one
+row per job and share the same machinery, which lives here:
+
+- One process-wide pool per job type, of as many threads as its workers setting
+  says, so a burst of requests cannot start more jobs than that at once.
+- start(ids) hands ids to the pool. With the background setting off (tests, local
+  runs) it runs them in the calling thread instead.
+- claim(id) takes the row with one conditional UPDATE. It wins only if the row is
+  active and no worker has refreshed heartbeat_at within the stale setting's
+  seconds, so two workers never run the same job.
+- The job refreshes heartbeat_at while it runs: heartbeat() with the commit after
+  each step or chunk, or heartbeat_every() from inside a streamed read.
+- stale_ids() lists active rows that nobody is running, for the module's sweep().
+
+A module builds one JobRunner and registers its run function with @runner.job.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from common.database import db
+
+
+class JobRunner:
+    """The pool, claim, heartbeat and sweep query for one job table.
+
+    key: the primary key column's name. active_statuses: statuses a worker may
+    claim. running_status: set by a claim (None leaves the status alone). The
+    settings are config keys: (name, default) for workers and stale_seconds.
+    """
+
+    def __init__(self, name, model, key, active_statuses, running_status=None, *,
+                 background, workers, stale_seconds):
+        self.name = name
+        self.model = model
+        self.key = getattr(model, key)
+        self.active_statuses = tuple(active_statuses)
+        self.running_status = running_status
+        self.background_setting = background
+        self.workers_setting = workers
+        self.stale_setting = stale_seconds
+        self._run = None
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def job(self, run):
+        """Decorator for the module's run(id): what start() and the pool call."""
+        self._run = run
+        return run
+
+    def pool(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=max(1, int(current_app.config.get(*self.workers_setting))),
+                        thread_name_prefix=self.name.replace(' ', '-'),
+                    )
+        return self._executor
+
+    def start(self, ids):
+        """Hand the jobs to the shared pool (the background setting) or run them here."""
+        app = current_app._get_current_object()
+        if not app.config.get(self.background_setting, True):
+            for job_id in ids:
+                self._run(job_id)
+            return
+        pool = self.pool()
+        for job_id in ids:
+            pool.submit(self._run_in_app, app, job_id)
+
+    def _run_in_app(self, app, job_id):
+        with app.app_context():
+            try:
+                self._run(job_id)
+            except Exception as e:
+                db.session.rollback()
+                app.logger.error("%s %s crashed: %s", self.name, job_id, e, exc_info=True)
+            finally:
+                db.session.remove()
+
+    def stale_before(self, now=None):
+        seconds = int(current_app.config.get(*self.stale_setting))
+        return (now or datetime.utcnow()) - timedelta(seconds=seconds)
+
+    def _active(self):
+        model = self.model
+        if len(self.active_statuses) == 1:
+            return model.status == self.active_statuses[0]
+        return model.status.in_(self.active_statuses)
+
+    def _unattended(self, stale_before):
+        return db.or_(self.model.heartbeat_at.is_(None), self.model.heartbeat_at < stale_before)
+
+    def claim(self, job_id):
+        """Take the row unless another worker is running it. Commits; True if this call won."""
+        now = datetime.utcnow()
+        values = {'heartbeat_at': now, 'attempts': self.model.attempts + 1}
+        if self.running_status is not None:
+            values['status'] = self.running_status
+        won = db.session.query(self.model).filter(
+            self.key == job_id, self._active(), self._unattended(self.stale_before(now)),
+        ).update(values, synchronize_session=False)
+        db.session.commit()
+        return bool(won)
+
+    def heartbeat(self, job_id):
+        """Refresh heartbeat_at in the session; the caller's next commit writes it."""
+        db.session.query(self.model).filter(self.key == job_id).update(
+            {'heartbeat_at': datetime.utcnow()}, synchronize_session=False)
+
+    def heartbeat_every(self, job_id, seconds):
+        """A callable that refreshes heartbeat_at at most every `seconds`.
+
+        It writes on a connection of its own, so it is safe to call between chunks
+        of a streamed read (a server-side cursor holds the session's connection) and
+        never commits the session's work.
+        """
+        last = [time.monotonic()]
+
+        def beat():
+            if time.monotonic() - last[0] < seconds:
+                return
+            last[0] = time.monotonic()
+            with db.engine.begin() as connection:
+                connection.execute(
+                    self.model.__table__.update()
+                    .where(self.model.__table__.c[self.key.key] == job_id)
+                    .where(self.model.__table__.c.status.in_(self.active_statuses))
+                    .values(heartbeat_at=datetime.utcnow()))
+        return beat
+
+    def stale_ids(self, limit):
+        """Active rows nobody has touched within the stale window, oldest first."""
+        stale_before = self.stale_before()
+        return [job_id for (job_id,) in db.session.query(self.key).filter(
+            self._active(), self._unattended(stale_before),
+            # Rows queued a moment ago are still on their way to the pool.
+            self.model.created_at < stale_before,
+        ).order_by(self.key).limit(limit).all()]
@@ -0,0 +1,526 @@
+# services/media_job_service.py
+"""Off-request processing for reel videos: thumbnail, probe, HLS ladder and audio mix.
+
+upload_reel_video used to extract the thumbnail inside the request. It read the
+whole upload into memory, wrote it to a temp file, searched for ffmpeg again and
+ran it (twice if the first seek failed) before the video itself went to S3. Now the
+request:
+
+1. streams the upload to a file under MEDIA_SPOOL_DIR with `spool()`, in fixed-size
+   chunks, so a 200MB reel never sits in memory;
+2. uploads that file to S3 (boto3 multipart), then deletes it unless the worker
+   reads the same directory (`spool_is_shared()`); the worker downloads from S3
+   otherwise, so nothing is left on a web host nobody sweeps;
+3. calls `enqueue_reel_processing()`, which marks the reel 'processing' and adds
+   one media_jobs row per kind in the same transaction as the reel.
+
+`process_jobs()` runs in scripts/run_media_worker.py, a process of its own on a
+host with ffmpeg, so transcodes never take CPU from the web workers. The in-app
+scheduler (MEDIA_JOBS_ENABLED, off by default) is for single-process setups. It:
+
+- claims due rows with a conditional UPDATE (services/work_queue.py), so several
+  worker processes can share the table;
+- groups the batch by reel and works on MEDIA_JOB_WORKERS reels at a time. Each
+  group uses the spooled upload when it is on this host and downloads the video
+  from S3 once otherwise; ffmpeg and ffprobe run as child processes;
+- writes the results back (thumbnail, duration, resolution, HLS manifests and
+  preview, rendered mix), retries failures with backoff and gives up after
+  MEDIA_JOB_MAX_ATTEMPTS;
+- sets reels.processing_status to 'ready' (or 'failed') once no thumbnail/probe job
+  is left for the reel, and deletes the spooled upload once no job needs it.
+
+The HLS job (REEL_HLS_ENABLED) encodes the REEL_HLS_LADDER rungs no larger than the
+source in a single ffmpeg run, plus a short muted low-bitrate preview, and uploads
+them under a fresh `<reel>_hls/<token>/` prefix. Reel.serialize exposes hls_url,
+hls_renditions and preview_url beside video_url, which stays the original upload
+and is the fallback for players without HLS and for reels not transcoded yet.
+
+Mixes (REEL_AUDIO_RENDER_ENABLED) are stored under a content-addressed
+`mixes/<sha256>.mp4` key (REEL_MIX_CACHE_ENABLED), so the same song, trim and
+volumes on the same video bytes render once, whichever reel asks for it.
+
+The worker threads never touch the DB session; only the thread that called
+process_jobs() reads and writes rows.
+"""
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+from botocore.exceptions import ClientError
+from flask import current_app
+
+from common.database import db
+from models.media_job import MediaJob
+from models.reel import Reel
+from models.reel_audio import ReelAudio
+from services import media_tools, work_queue
+
+# Jobs that decide reels.processing_status. HLS and mixes only add alternatives to
+# the original upload, so a reel without them is still ready to play; a failed mix
+# is recorded on reel_audio.render_error.
+PROCESSING_KINDS = (MediaJob.KIND_THUMBNAIL, MediaJob.KIND_PROBE)
+_CHUNK_BYTES = 1024 * 1024
+
+
+class MediaJobError(Exception):
+    """A job ran but could not produce its result. The message is stored on the row."""
+
+
+# --------------------------------------------------------------------------- #
+# Spooling uploads
+# --------------------------------------------------------------------------- #
+
+def spool_dir():
+    path = current_app.config.get('MEDIA_SPOOL_DIR') or os.path.join(tempfile.gettempdir(), 'aoin-media-spool')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def spool_is_shared():
+    """Whether the media worker can read this host's spool: MEDIA_SPOOL_SHARED, or
+    the in-app scheduler (MEDIA_JOBS_ENABLED), which sweeps it too."""
+    config = current_app.config
+    return bool(config.get('MEDIA_SPOOL_SHARED', False) or config.get('MEDIA_JOBS_ENABLED', False))
+
+
+def spool(file, suffix='.mp4'):
+    """Stream an upload to a file under MEDIA_SPOOL_DIR. Returns (path, size_in_bytes)."""
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=spool_dir())
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            if hasattr(file, 'seek'):
+                file.seek(0)
+            shutil.copyfileobj(file, out, _CHUNK_BYTES)
+    except Exception:
+        discard(path)
+        raise
+    return path, os.path.getsize(path)
+
+
+def discard(path):
+    """Delete a spooled upload. Never raises."""
+    if not path:
+        return
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def sweep_spool():
+    """Delete spooled uploads older than MEDIA_SPOOL_MAX_AGE_HOURS.
+
+    Catches files whose jobs ran on another host, or whose request failed after
+    spooling. The age is well past MEDIA_JOB_LOCK_TIMEOUT_SECONDS, so a job still
+    working on a file never loses it (it would download from S3 if it did).
+    """
+    cutoff = time.time() - 3600 * float(current_app.config.get('MEDIA_SPOOL_MAX_AGE_HOURS', 24))
+    removed = 0
+    directory = spool_dir()
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            if os.path.isfile(path) and os.path.getmtime(path) < cutoff:
+                os.unlink(path)
+                removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+# --------------------------------------------------------------------------- #
+# Enqueueing
+# --------------------------------------------------------------------------- #
+
+def enqueue(reel_id, kind, payload=None):
+    """Add a job to the session; the caller commits, normally together with the reel.
+
+    A job of the same kind still pending for the reel is reused with the new payload.
+    """
+    job = MediaJob.query.filter_by(reel_id=reel_id, kind=kind, status=MediaJob.STATUS_PENDING).first()
+    if job is None:
+        job = MediaJob(reel_id=reel_id, kind=kind, status=MediaJob.STATUS_PENDING, attempts=0)
+        db.session.add(job)
+    job.payload = payload
+    job.next_attempt_at = datetime.utcnow()
+    return job
+
+
+def enqueue_reel_processing(reel, source_path=None):
+    """Queue thumbnail and probe jobs (and HLS, if enabled) for a freshly uploaded reel."""
+    reel.processing_status = 'processing'
+    payload = {'source_path': source_path} if source_path else None
+    kinds = PROCESSING_KINDS
+    if current_app.config.get('REEL_HLS_ENABLED', False):
+        kinds += (MediaJob.KIND_HLS,)
+    return [enqueue(reel.reel_id, kind, payload) for kind in kinds]
+
+
+def _selection(link):
+    """The reel_audio settings a mix was rendered from, comparable after a JSON round trip."""
+    return [
+        int(link.song_id), int(link.start_ms or 0),
+        int(link.end_ms) if link.end_ms is not None else None,
+        round(float(link.music_volume), 3), round(float(link.original_volume), 3),
+    ]
+
+
+def enqueue_mux(link, song):
+    """Queue a render of the reel with its chosen song mixed in."""
+    return enqueue(link.reel_id, MediaJob.KIND_MUX, {
+        'audio_s3_key': song.audio_s3_key,
+        'audio_url': song.audio_url,
+        'start_ms': int(link.start_ms or 0),
+        'duration_ms': link.duration_ms(song.duration_ms) or None,
+        'music_volume': float(link.music_volume),
+        'original_volume': float(link.original_volume),
+        'selection': _selection(link),
+    })
+
+
+# --------------------------------------------------------------------------- #
+# Claiming
+# --------------------------------------------------------------------------- #
+
+def _backoff(attempts):
+    config = current_app.config
+    return work_queue.backoff(attempts, int(config.get('MEDIA_JOB_BACKOFF_SECONDS', 30)),
+                              int(config.get('MEDIA_JOB_BACKOFF_MAX_SECONDS', 1800)))
+
+
+def _claim_batch(batch_size):
+    """Move up to batch_size due rows to 'running' and return the ones we won."""
+    return work_queue.claim_batch(
+        MediaJob, 'job_id', MediaJob.STATUS_RUNNING, batch_size,
+        int(current_app.config.get('MEDIA_JOB_LOCK_TIMEOUT_SECONDS', 900)))
+
+
+# --------------------------------------------------------------------------- #
+# Work (runs on pool threads: no DB access below this line until _apply)
+# --------------------------------------------------------------------------- #
+
+def _temp_path(suffix):
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    os.close(fd)
+    return path
+
+
+def _stem(video_key):
+    return video_key.rsplit('.', 1)[0] if '.' in video_key.rsplit('/', 1)[-1] else video_key
+
+
+def _thumbnail(s3, video_key, source, payload):
+    out = _temp_path('.jpg')
+    try:
+        if not media_tools.extract_thumbnail(source, out):
+            raise MediaJobError('ffmpeg not available' if not media_tools.ffmpeg_path()
+                                else 'ffmpeg could not extract a frame')
+        key = f"{_stem(video_key)}_thumb.jpg"
+        s3.s3_client.upload_file(out, s3.bucket_name, key, ExtraArgs={'ContentType': 'image/jpeg'})
+        return {'thumbnail_url': s3._generate_cloudfront_url(key), 'thumbnail_public_id': key}
+    finally:
+        discard(out)
+
+
+def _probe(s3, video_key, source, payload):
+    info = media_tools.probe(source)
+    if info is None:
+        raise MediaJobError('ffprobe not available' if not media_tools.ffprobe_path()
+                            else 'ffprobe could not read the video')
+    width, height = info.get('width'), info.get('height')
+    return {
+        'duration_seconds': info.get('duration_seconds'),
+        'resolution': f"{width}x{height}" if width and height else None,
+    }
+
+
+def _download_audio(s3, payload, path):
+    if payload.get('audio_s3_key'):
+        s3.s3_client.download_file(s3.bucket_name, payload['audio_s3_key'], path)
+        return
+    with requests.get(payload['audio_url'], stream=True, timeout=30) as response:
+        response.raise_for_status()
+        with open(path, 'wb') as out:
+            for chunk in response.iter_content(_CHUNK_BYTES):
+                out.write(chunk)
+
+
+def _stored(s3, key):
+    try:
+        s3.s3_client.head_object(Bucket=s3.bucket_name, Key=key)
+        return True
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+            return False
+        raise
+
+
+def _mux(s3, video_key, source, payload):
+    from services.music import audio_mux_service
+    from services.music.audio_mux_service import AudioMuxError
+
+    settings = {
+        'start_ms': payload.get('start_ms', 0), 'duration_ms': payload.get('duration_ms'),
+        'music_volume': payload.get('music_volume', 1.0),
+        'original_volume': payload.get('original_volume', 0.15),
+    }
+    if current_app.config.get('REEL_MIX_CACHE_ENABLED', True):
+        # Content-addressed: the same video bytes, song and settings always name the
+        # same object, whichever reel asks. A hit skips the song download and ffmpeg.
+        # Objects are shared, so deleting a reel leaves them (expire the prefix with
+        # a bucket lifecycle rule).
+        digest = audio_mux_service.mix_cache_key(
+            audio_mux_service.file_digest(source),
+            payload.get('audio_s3_key') or payload.get('audio_url'), **settings)
+        key = f"{s3.s3_prefix}mixes/{digest}.mp4"
+        if _stored(s3, key):
+            return {'rendered_video_url': s3._generate_cloudfront_url(key), 'cache_hit': True}
+    else:
+        # A new key per render: the CDN can cache it forever and a re-mix never
+        # serves the old audio.
+        key = f"{_stem(video_key)}_mix_{uuid.uuid4().hex[:12]}.mp4"
+
+    audio = _temp_path('.audio')
+    rendered = None
+    try:
+        _download_audio(s3, payload, audio)
+        try:
+            rendered = audio_mux_service.mux_to_tempfile(source, audio, **settings)
+        except AudioMuxError as e:
+            raise MediaJobError(str(e))
+        s3.s3_client.upload_file(rendered, s3.bucket_name, key,
+                                 ExtraArgs={'ContentType': 'video/mp4', 'CacheControl': _IMMUTABLE})
+        return {'rendered_video_url': s3._generate_cloudfront_url(key), 'cache_hit': False}
+    finally:
+        discard(audio)
+        discard(rendered)
+
+
+_CONTENT_TYPES = {'.m3u8': 'application/vnd.apple.mpegurl', '.ts': 'video/mp2t', '.mp4': 'video/mp4'}
+# Every rendition key carries a fresh token, so objects never change once written.
+_IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def _hls(s3, video_key, source, payload):
+    config = current_app.config
+    info = media_tools.probe(source) or {}
+    sides = [v for v in (info.get('width'), info.get('height')) if v]
+    rungs = media_tools.ladder_for(
+        media_tools.parse_ladder(config.get('REEL_HLS_LADDER', '360:800,540:1400,720:2800')),
+        min(sides) if len(sides) == 2 else None,
+    )
+    work = tempfile.mkdtemp(prefix='reel-hls-')
+    try:
+        if not media_tools.transcode_hls(source, work, rungs, has_audio=info.get('has_audio', True),
+                                         segment_seconds=int(config.get('REEL_HLS_SEGMENT_SECONDS', 4))):
+            raise MediaJobError('ffmpeg not available' if not media_tools.ffmpeg_path()
+                                else 'ffmpeg could not produce the HLS renditions')
+        preview = os.path.join(work, 'preview.mp4')
+        if not media_tools.transcode_preview(source, preview,
+                                             short_side=int(config.get('REEL_PREVIEW_SIZE', 240)),
+                                             kbps=int(config.get('REEL_PREVIEW_KBPS', 300)),
+                                             seconds=int(config.get('REEL_PREVIEW_SECONDS', 6))):
+            raise MediaJobError('ffmpeg could not produce the preview')
+
+        token = uuid.uuid4().hex[:12]
+        prefix = f"{_stem(video_key)}_hls/{token}"
+        preview_key = f"{_stem(video_key)}_preview_{token}.mp4"
+        uploads = [(preview, preview_key)] + [
+            (os.path.join(work, name), f"{prefix}/{name}")
+            for name in sorted(os.listdir(work)) if name != 'preview.mp4'
+        ]
+
+        def put(item):
+            path, key = item
+            s3.s3_client.upload_file(path, s3.bucket_name, key, ExtraArgs={
+                'ContentType': _CONTENT_TYPES.get(os.path.splitext(path)[1], 'application/octet-stream'),
+                'CacheControl': _IMMUTABLE,
+            })
+
+        # A reel is dozens of small segments; upload them side by side.
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(put, uploads))
+
+        return {
+            'hls_url': s3._generate_cloudfront_url(f"{prefix}/master.m3u8"),
+            'hls_renditions': {
+                f"{size}p": s3._generate_cloudfront_url(f"{prefix}/{size}p.m3u8") for size, _ in rungs
+            },
+            'preview_url': s3._generate_cloudfront_url(preview_key),
+        }
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+_HANDLERS = {
+    MediaJob.KIND_THUMBNAIL: _thumbnail,
+    MediaJob.KIND_PROBE: _probe,
+    MediaJob.KIND_HLS: _hls,
+    MediaJob.KIND_MUX: _mux,
+}
+
+
+def _run_group(app, video_key, jobs):
+    """Run every claimed job for one reel against one local copy of its video.
+
+    Returns {job_id: (ok, result_or_error_message)}.
+    """
+    with app.app_context():
+        from services.reels_s3_service import get_reels_s3_service
+
+        outcomes = {}
+        downloaded = None
+        try:
+            s3 = get_reels_s3_service()
+            source = next((p['source_path'] for _, _, p in jobs
+                           if p and p.get('source_path') and os.path.exists(p['source_path'])), None)
+            if source is None:
+                downloaded = source = _temp_path('.mp4')
+                s3.s3_client.download_file(s3.bucket_name, video_key, source)
+        except Exception as e:
+            discard(downloaded)
+            return {job_id: (False, f"could not fetch video: {str(e)}") for job_id, _, _ in jobs}
+
+        try:
+            for job_id, kind, payload in jobs:
+                try:
+                    outcomes[job_id] = (True, _HANDLERS[kind](s3, video_key, source, payload or {}))
+                except Exception as e:
+                    if not isinstance(e, MediaJobError):
+                        app.logger.error(f"Media job {job_id} ({kind}) crashed: {str(e)}", exc_info=True)
+                    outcomes[job_id] = (False, str(e) or type(e).__name__)
+        finally:
+            discard(downloaded)
+        return outcomes
+
+
+# --------------------------------------------------------------------------- #
+# Applying results
+# --------------------------------------------------------------------------- #
+
+def _apply(job, reel, result):
+    if job.kind == MediaJob.KIND_THUMBNAIL:
+        reel.thumbnail_url = result['thumbnail_url']
+        reel.thumbnail_public_id = result['thumbnail_public_id']
+    elif job.kind == MediaJob.KIND_PROBE:
+        if result.get('duration_seconds') is not None:
+            reel.duration_seconds = result['duration_seconds']
+        if result.get('resolution'):
+            reel.resolution = result['resolution']
+    elif job.kind == MediaJob.KIND_HLS:
+        reel.hls_url = result['hls_url']
+        reel.hls_renditions = result['hls_renditions']
+        reel.preview_url = result['preview_url']
+    elif job.kind == MediaJob.KIND_MUX:
+        link = ReelAudio.query.filter_by(reel_id=reel.reel_id).first()
+        # The merchant may have changed or removed the song while this rendered;
+        # a newer job (if any) will render the current selection.
+        if link is not None and _selection(link) == (job.payload or {}).get('selection'):
+            link.rendered_video_url = result['rendered_video_url']
+            link.rendered_at = datetime.utcnow()
+            link.render_error = None
+
+
+def _record_failure(job, error):
+    if job.kind != MediaJob.KIND_MUX:
+        return
+    link = ReelAudio.query.filter_by(reel_id=job.reel_id).first()
+    if link is not None and _selection(link) == (job.payload or {}).get('selection'):
+        link.render_error = error[:500]
+
+
+def _settle_reels(reel_ids, reels):
+    """Update processing_status and drop spooled uploads no job still needs."""
+    if not reel_ids:
+        return
+    open_statuses = (MediaJob.STATUS_PENDING, MediaJob.STATUS_RUNNING)
+    rows = MediaJob.query.filter(MediaJob.reel_id.in_(reel_ids)).all()
+    by_reel = {}
+    for row in rows:
+        by_reel.setdefault(row.reel_id, []).append(row)
+
+    for reel_id in reel_ids:
+        jobs = by_reel.get(reel_id, [])
+        reel = reels.get(reel_id)
+        processing = [j for j in jobs if j.kind in PROCESSING_KINDS]
+        if reel is not None and processing and not any(j.status in open_statuses for j in processing):
+            failed = any(j.status == MediaJob.STATUS_FAILED for j in processing)
+            reel.processing_status = 'failed' if failed else 'ready'
+        if not any(j.status in open_statuses for j in jobs):
+            for path in {(j.payload or {}).get('source_path') for j in jobs} - {None}:
+                discard(path)
+
+
+def process_jobs(batch_size=None):
+    """Run every due job, batch by batch, up to MEDIA_JOB_MAX_BATCHES.
+
+    Returns counts so the scheduler job can log what it did.
+    """
+    config = current_app.config
+    batch_size = batch_size or int(config.get('MEDIA_JOB_BATCH_SIZE', 8))
+    max_batches = int(config.get('MEDIA_JOB_MAX_BATCHES', 5))
+    max_attempts = int(config.get('MEDIA_JOB_MAX_ATTEMPTS', 5))
+    workers = max(1, int(config.get('MEDIA_JOB_WORKERS', 2)))
+    app = current_app._get_current_object()
+
+    stats = {'done': 0, 'retrying': 0, 'failed': 0}
+    for _ in range(max_batches):
+        jobs = _claim_batch(batch_size)
+        if not jobs:
+            break
+
+        reels = {r.reel_id: r for r in Reel.query.filter(Reel.reel_id.in_({j.reel_id for j in jobs})).all()}
+        groups = {}
+        for job in jobs:
+            if job.reel_id in reels:
+                groups.setdefault(job.reel_id, []).append((job.job_id, job.kind, job.payload))
+
+        outcomes = {}
+        with ThreadPoolExecutor(max_workers=min(workers, len(groups) or 1)) as pool:
+            futures = [
+                pool.submit(_run_group, app, reels[reel_id].video_public_id, group)
+                for reel_id, group in groups.items()
+            ]
+            for future in futures:
+                outcomes.update(future.result())
+
+        for job in jobs:
+            job.attempts = (job.attempts or 0) + 1
+            job.locked_at = None
+            ok, result = outcomes.get(job.job_id, (False, 'reel not found'))
+            if ok:
+                _apply(job, reels[job.reel_id], result)
+                job.status = MediaJob.STATUS_DONE
+                job.finished_at = datetime.utcnow()
+                job.last_error = None
+                stats['done'] += 1
+            elif job.attempts >= max_attempts or job.reel_id not in reels:
+                job.status = MediaJob.STATUS_FAILED
+                job.finished_at = datetime.utcnow()
+                job.last_error = result[:1000]
+                _record_failure(job, result)
+                stats['failed'] += 1
+                current_app.logger.error(
+                    "Media job %s (%s) for reel %s failed permanently after %s attempts: %s",
+                    job.job_id, job.kind, job.reel_id, job.attempts, result,
+                )
+            else:
+                job.status = MediaJob.STATUS_PENDING
+                job.next_attempt_at = datetime.utcnow() + _backoff(job.attempts)
+                job.last_error = result[:1000]
+                stats['retrying'] += 1
+                current_app.logger.warning(
+                    "Media job %s (%s) for reel %s failed (attempt %s), retrying at %s: %s",
+                    job.job_id, job.kind, job.reel_id, job.attempts, job.next_attempt_at, result,
+                )
+
+        db.session.flush()
+        _settle_reels({j.reel_id for j in jobs}, reels)
+        db.session.commit()
+
+    return stats
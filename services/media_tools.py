@@ -0,0 +1,234 @@
+# services/media_tools.py
+"""ffmpeg and ffprobe, located once per process.
+
+Every reel upload used to look for ffmpeg from scratch (shutil.which, a list of
+common paths, a `which` subprocess, then `ffmpeg -version`) before doing any work,
+and app.py did the same search again at boot only to log the answer. The paths are
+now resolved once by init_media_tools() at startup and reused by the reel media
+worker, the intro-video probe and the audio mixer.
+
+The search itself is waveform_service.find_binary: under systemd PATH holds only
+the venv, so shutil.which alone misses /usr/bin/ffmpeg.
+
+Both binaries are optional in this deployment. A missing one is logged at startup
+and the helpers below report failure instead of raising, so reels still upload and
+play; they just wait for a worker that can thumbnail them.
+"""
+import json
+import os
+import subprocess
+import threading
+
+from flask import current_app
+
+from services.music.waveform_service import find_binary
+
+
+_paths = {}
+_lock = threading.Lock()
+
+
+def resolve(logger=None, force=False):
+    """Find and verify ffmpeg/ffprobe. {'ffmpeg': path|None, 'ffprobe': path|None}."""
+    with _lock:
+        if _paths and not force:
+            return dict(_paths)
+        for name in ('ffmpeg', 'ffprobe'):
+            path = find_binary(name)
+            if path:
+                try:
+                    ok = subprocess.run([path, '-version'], capture_output=True, timeout=5).returncode == 0
+                except (OSError, subprocess.TimeoutExpired):
+                    ok = False
+                if not ok:
+                    if logger:
+                        logger.error(f"{name} found at {path} but `{name} -version` failed; treating it as missing")
+                    path = None
+            _paths[name] = path
+        return dict(_paths)
+
+
+def init_media_tools(app):
+    """Resolve the binaries once at startup and log what reel processing can do."""
+    paths = resolve(app.logger, force=True)
+    app.extensions['media_tools'] = paths
+    if paths['ffmpeg']:
+        app.logger.info(f"ffmpeg: {paths['ffmpeg']}; ffprobe: {paths['ffprobe'] or 'not found'}")
+    else:
+        app.logger.warning(
+            "ffmpeg not found: reels will upload but thumbnails, probing and audio mixing "
+            "will wait in media_jobs until a worker with ffmpeg runs "
+            "(Ubuntu: sudo apt-get install -y ffmpeg; macOS: brew install ffmpeg)"
+        )
+    return paths
+
+
+def ffmpeg_path():
+    return resolve().get('ffmpeg')
+
+
+def ffprobe_path():
+    return resolve().get('ffprobe')
+
+
+def reset():
+    """Forget the resolved paths (tests, or after installing ffmpeg)."""
+    with _lock:
+        _paths.clear()
+
+
+def _run(cmd, timeout):
+    try:
+        return subprocess.run(cmd, capture_output=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        current_app.logger.warning(f"{os.path.basename(cmd[0])} timed out after {timeout}s")
+    except OSError as e:
+        current_app.logger.warning(f"Could not run {cmd[0]}: {str(e)}")
+    return None
+
+
+def extract_thumbnail(video_path, out_path, timeout=30):
+    """Write a JPEG of the frame at 1s (or the first frame of shorter clips). True on success."""
+    ffmpeg = ffmpeg_path()
+    if not ffmpeg:
+        return False
+    # -ss before -i seeks the input instead of decoding up to the timestamp.
+    attempts = (
+        [ffmpeg, '-v', 'error', '-ss', '1', '-i', str(video_path), '-frames:v', '1', '-q:v', '2', '-y', str(out_path)],
+        [ffmpeg, '-v', 'error', '-i', str(video_path), '-frames:v', '1', '-q:v', '2', '-y', str(out_path)],
+    )
+    for cmd in attempts:
+        proc = _run(cmd, timeout)
+        if proc is not None and proc.returncode == 0 and os.path.exists(out_path) and os.path.getsize(out_path) > 0:
+            return True
+        if proc is not None and proc.returncode != 0:
+            current_app.logger.info(f"ffmpeg thumbnail attempt failed: {proc.stderr.decode(errors='ignore')[:300]}")
+    return False
+
+
+def probe(video_path, timeout=30):
+    """{'duration_seconds', 'width', 'height', 'video_codec', 'has_audio'} (values may be None),
+    or None if unreadable."""
+    ffprobe = ffprobe_path()
+    if not ffprobe:
+        return None
+    proc = _run([
+        ffprobe, '-v', 'error',
+        '-show_entries', 'stream=codec_type,codec_name,width,height:format=duration',
+        '-of', 'json', str(video_path),
+    ], timeout)
+    if proc is None or proc.returncode != 0:
+        return None
+    try:
+        data = json.loads(proc.stdout.decode('utf-8', errors='ignore') or '{}')
+    except ValueError:
+        return None
+
+    streams = data.get('streams') or []
+    video = next((st for st in streams if st.get('codec_type') == 'video'), {})
+    try:
+        duration = int(round(float(data.get('format', {}).get('duration'))))
+    except (TypeError, ValueError):
+        duration = None
+    return {
+        'duration_seconds': duration,
+        'width': video.get('width'),
+        'height': video.get('height'),
+        'video_codec': video.get('codec_name'),
+        'has_audio': any(st.get('codec_type') == 'audio' for st in streams),
+    }
+
+
+# --------------------------------------------------------------------------- #
+# HLS ladder and preview
+# --------------------------------------------------------------------------- #
+
+def parse_ladder(spec):
+    """'360:800,540:1400' -> [(360, 800), (540, 1400)]: short side in px, video kbps."""
+    rungs = []
+    for part in (spec or '').split(','):
+        if ':' in part:
+            size, kbps = part.split(':', 1)
+            rungs.append((int(size), int(kbps)))
+    return sorted(rungs)
+
+
+def ladder_for(rungs, short_side):
+    """The rungs no larger than the source; the smallest one if the source is smaller still."""
+    fitting = [r for r in rungs if short_side is None or r[0] <= short_side]
+    return fitting or rungs[:1]
+
+
+def _scale(short_side):
+    # Scale the shorter side, so a portrait 720x1280 reel counts as 720p just as a
+    # landscape 1280x720 video does. -2 keeps the other side even for x264.
+    return f"scale='if(gt(iw,ih),-2,{short_side})':'if(gt(iw,ih),{short_side},-2)'"
+
+
+def build_hls_command(video_path, out_dir, rungs, has_audio=True, segment_seconds=4):
+    """One ffmpeg run that writes every rendition plus master.m3u8 into out_dir.
+
+    Files are flat (360p.m3u8, 360p_000.ts, ...) so the master playlist's relative
+    links survive being uploaded under any prefix.
+    """
+    n = len(rungs)
+    graph = [f"[0:v]split={n}" + ''.join(f"[s{i}]" for i in range(n))]
+    graph += [f"[s{i}]{_scale(size)}[v{i}]" for i, (size, _) in enumerate(rungs)]
+
+    cmd = [ffmpeg_path() or 'ffmpeg', '-v', 'error', '-i', str(video_path), '-filter_complex', ';'.join(graph)]
+    for i in range(n):
+        cmd += ['-map', f'[v{i}]'] + (['-map', '0:a:0'] if has_audio else [])
+    for i, (_, kbps) in enumerate(rungs):
+        cmd += [f'-b:v:{i}', f'{kbps}k', f'-maxrate:v:{i}', f'{int(kbps * 1.1)}k', f'-bufsize:v:{i}', f'{kbps * 2}k']
+    cmd += [
+        '-c:v', 'libx264', '-preset', 'veryfast', '-profile:v', 'main', '-pix_fmt', 'yuv420p',
+        # A keyframe at every segment boundary, so players can switch rendition at any segment.
+        '-force_key_frames', f'expr:gte(t,n_forced*{segment_seconds})', '-sc_threshold', '0',
+    ]
+    if has_audio:
+        cmd += ['-c:a', 'aac', '-b:a', '96k', '-ac', '2']
+    stream_map = ' '.join(
+        f"v:{i},a:{i},name:{size}p" if has_audio else f"v:{i},name:{size}p"
+        for i, (size, _) in enumerate(rungs)
+    )
+    cmd += [
+        '-f', 'hls', '-hls_time', str(segment_seconds), '-hls_playlist_type', 'vod',
+        '-hls_segment_filename', os.path.join(str(out_dir), '%v_%03d.ts'),
+        '-master_pl_name', 'master.m3u8', '-var_stream_map', stream_map,
+        '-y', os.path.join(str(out_dir), '%v.m3u8'),
+    ]
+    return cmd
+
+
+def build_preview_command(video_path, out_path, short_side=240, kbps=300, seconds=6):
+    """A small muted MP4 for feed autoplay: the first `seconds` (0 = all) at `short_side`."""
+    cmd = [ffmpeg_path() or 'ffmpeg', '-v', 'error', '-i', str(video_path)]
+    if seconds:
+        cmd += ['-t', str(seconds)]
+    cmd += [
+        '-vf', _scale(short_side), '-an',
+        '-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p',
+        '-b:v', f'{kbps}k', '-maxrate', f'{int(kbps * 1.1)}k', '-bufsize', f'{kbps * 2}k',
+        '-movflags', '+faststart', '-y', str(out_path),
+    ]
+    return cmd
+
+
+def transcode_hls(video_path, out_dir, rungs, has_audio=True, segment_seconds=4, timeout=600):
+    """Run build_hls_command. True if master.m3u8 was written."""
+    if not ffmpeg_path():
+        return False
+    proc = _run(build_hls_command(video_path, out_dir, rungs, has_audio, segment_seconds), timeout)
+    if proc is not None and proc.returncode != 0:
+        current_app.logger.warning(f"ffmpeg HLS transcode failed: {proc.stderr.decode(errors='ignore')[:500]}")
+    return proc is not None and proc.returncode == 0 and os.path.exists(os.path.join(str(out_dir), 'master.m3u8'))
+
+
+def transcode_preview(video_path, out_path, short_side=240, kbps=300, seconds=6, timeout=300):
+    """Run build_preview_command. True if the preview was written."""
+    if not ffmpeg_path():
+        return False
+    proc = _run(build_preview_command(video_path, out_path, short_side, kbps, seconds), timeout)
+    if proc is not None and proc.returncode != 0:
+        current_app.logger.warning(f"ffmpeg preview transcode failed: {proc.stderr.decode(errors='ignore')[:500]}")
+    return proc is not None and proc.returncode == 0 and os.path.exists(out_path) and os.path.getsize(out_path) > 0
@@ -12,7 +12,18 @@ of truth and the rendered file can be treated as a cache.
 
 The original audio is ducked rather than dropped, so a merchant talking over their
 own video is still audible under the music.
+
+Copy is only possible when MP4 can carry the upload's video codec as-is. mux()
+probes the codec first and re-encodes (libx264) only when it cannot, or when a
+copy attempt fails; that is the exception, not the rule.
+
+A finished mix is content-addressed: mix_cache_key() hashes the video bytes, the
+song and the exact trim/volume settings, so the same selection on a re-uploaded or
+duplicated reel reuses the stored file instead of running ffmpeg again
+(media_job_service._mux).
 """
+import hashlib
+import json
 import os
 import shutil
 import subprocess
@@ -21,20 +32,28 @@ import tempfile
 from flask import current_app
 
 
+# Video codecs an MP4 can carry without re-encoding.
+COPYABLE_VIDEO_CODECS = frozenset({"h264", "hevc", "av1", "mpeg4", "vp9"})
+
+# Part of every mix cache key. Bump it whenever build_mux_command's output for the
+# same inputs changes (filters, audio bitrate), so old mixes stop matching.
+MIX_CACHE_VERSION = 1
+
+
 class AudioMuxError(Exception):
     """The mix could not be produced. The message is for logs, not merchants."""
 
 
 def _ffmpeg_path():
-    # Resolved the same way as the waveform service: PATH under systemd contains
-    # only the venv, so shutil.which alone misses /usr/bin/ffmpeg.
-    from services.music.waveform_service import find_binary
-    return find_binary("ffmpeg") or "ffmpeg"
+    # Resolved once per process by services/media_tools (PATH under systemd contains
+    # only the venv, so shutil.which alone misses /usr/bin/ffmpeg).
+    from services import media_tools
+    return media_tools.ffmpeg_path() or "ffmpeg"
 
 
 def build_mux_command(video_path, audio_path, out_path, *, start_ms=0,
                       duration_ms=None, music_volume=1.0, original_volume=0.15,
-                      keep_original_audio=True):
+                      keep_original_audio=True, reencode_video=False, video_codec=None):
     """The exact ffmpeg argv. Split out so it can be asserted on in tests."""
     start_s = max(0, int(start_ms)) / 1000.0
 
@@ -58,8 +77,14 @@ def build_mux_command(video_path, audio_path, out_path, *, start_ms=0,
         cmd += ["-filter_complex", f"[1:a]volume={float(music_volume):.3f}[aout]",
                 "-map", "0:v", "-map", "[aout]"]
 
+    if reencode_video:
+        cmd += ["-c:v", "libx264", "-preset", "veryfast", "-crf", "20", "-pix_fmt", "yuv420p"]
+    else:
+        cmd += ["-c:v", "copy"]          # the whole reason this is fast
+        if video_codec == "hevc":
+            # Apple players only accept copied HEVC in MP4 under the hvc1 tag.
+            cmd += ["-tag:v", "hvc1"]
     cmd += [
-        "-c:v", "copy",          # the whole reason this is fast
         "-c:a", "aac", "-b:a", "128k",
         "-shortest",
         "-movflags", "+faststart",   # so it starts playing before it fully downloads
@@ -70,23 +95,42 @@ def build_mux_command(video_path, audio_path, out_path, *, start_ms=0,
 
 def mux(video_path, audio_path, out_path, *, start_ms=0, duration_ms=None,
         music_volume=1.0, original_volume=0.15, keep_original_audio=True,
-        timeout=300):
-    """Mix and write to `out_path`. Raises AudioMuxError on failure."""
-    cmd = build_mux_command(
-        video_path, audio_path, out_path,
-        start_ms=start_ms, duration_ms=duration_ms,
-        music_volume=music_volume, original_volume=original_volume,
-        keep_original_audio=keep_original_audio,
-    )
-    try:
-        proc = subprocess.run(cmd, capture_output=True, timeout=timeout)
-    except subprocess.TimeoutExpired:
-        raise AudioMuxError(f"ffmpeg timed out after {timeout}s")
-    except (FileNotFoundError, OSError) as e:
-        raise AudioMuxError(f"ffmpeg not available: {e}")
+        reencode_video=None, timeout=300):
+    """Mix and write to `out_path`. Raises AudioMuxError on failure.
+
+    reencode_video=None decides from the probed codec, and falls back to a
+    re-encode if ffmpeg rejects the copy.
+    """
+    codec = None
+    if reencode_video is None:
+        from services import media_tools
+        codec = (media_tools.probe(video_path) or {}).get("video_codec")
+        reencode_video = codec is not None and codec not in COPYABLE_VIDEO_CODECS
+
+    def run(reencode):
+        cmd = build_mux_command(
+            video_path, audio_path, out_path,
+            start_ms=start_ms, duration_ms=duration_ms,
+            music_volume=music_volume, original_volume=original_volume,
+            keep_original_audio=keep_original_audio,
+            reencode_video=reencode, video_codec=codec,
+        )
+        try:
+            proc = subprocess.run(cmd, capture_output=True, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            raise AudioMuxError(f"ffmpeg timed out after {timeout}s")
+        except (FileNotFoundError, OSError) as e:
+            raise AudioMuxError(f"ffmpeg not available: {e}")
+        if proc.returncode != 0:
+            raise AudioMuxError(f"ffmpeg failed: {proc.stderr.decode()[:500]}")
 
-    if proc.returncode != 0:
-        raise AudioMuxError(f"ffmpeg failed: {proc.stderr.decode()[:500]}")
+    try:
+        run(reencode_video)
+    except AudioMuxError as e:
+        if reencode_video or "ffmpeg failed" not in str(e):
+            raise
+        _log("info", "mux: stream copy of %s (%s) failed, re-encoding: %s", video_path, codec, e)
+        run(True)
 
     if not os.path.exists(out_path) or os.path.getsize(out_path) == 0:
         raise AudioMuxError("ffmpeg reported success but produced no output")
@@ -94,6 +138,35 @@ def mux(video_path, audio_path, out_path, *, start_ms=0, duration_ms=None,
     return out_path
 
 
+def file_digest(path, chunk_size=1024 * 1024):
+    """sha256 of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def mix_cache_key(video_digest, audio_ref, *, start_ms=0, duration_ms=None,
+                  music_volume=1.0, original_volume=0.15, keep_original_audio=True):
+    """Hex digest naming the mix of these exact inputs.
+
+    `audio_ref` is the song's S3 key or URL: catalogue audio is immutable (a new
+    track is a new key), so its name stands in for its bytes. Volumes are rounded
+    as reel_audio stores them, so 0.8 and 0.8000001 share a mix.
+    """
+    inputs = {
+        "v": MIX_CACHE_VERSION,
+        "video": video_digest,
+        "audio": audio_ref,
+        "start_ms": max(0, int(start_ms or 0)),
+        "duration_ms": int(duration_ms) if duration_ms else None,
+        "music_volume": round(float(music_volume), 3),
+        "original_volume": round(float(original_volume), 3) if keep_original_audio else None,
+    }
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+
 def mux_to_tempfile(video_path, audio_path, **kwargs):
     """Convenience for callers that will upload the result and discard it."""
     fd, out_path = tempfile.mkstemp(suffix=".mp4")
@@ -111,3 +184,10 @@ def mux_to_tempfile(video_path, audio_path, **kwargs):
 def has_ffmpeg():
     from services.music.waveform_service import find_binary
     return find_binary("ffmpeg") is not None
+
+
+def _log(level, msg, *args):
+    try:
+        getattr(current_app.logger, level)(msg, *args)
+    except RuntimeError:
+        pass
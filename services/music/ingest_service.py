@@ -10,19 +10,32 @@ by this code remembering to check.
 Waveforms are generated here rather than lazily on first view, because the trim UI
 needs one the instant a merchant taps a song, and generating it then would put an
 ffmpeg run on the critical path of a tap.
+
+A provider page runs as an ingest job (models/music_ingest_job.py) on a JobRunner
+(services/job_runner.py): one process-wide pool of MUSIC_INGEST_WORKERS threads, so
+a burst of ingest requests cannot fork more analysis pools than that at once. Within
+a job, downloads overlap on a thread pool, ffmpeg analysis runs in a process pool as
+each download lands, and songs are written a batch per commit together with the
+job's progress and heartbeat. sweep() restarts jobs whose worker went quiet.
+upsert_song remains the one-track path.
 """
+import json
+import multiprocessing
 import os
 import tempfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import datetime
 
 import requests
 from flask import current_app
+from sqlalchemy import update
 
 from common.database import db
+from models.music_ingest_job import MusicIngestJob
 from models.song import Song
 from services.music.providers import ProviderError, get_provider
-from services.music.waveform_service import generate_peaks, probe_duration_ms
-
-import json
+from services.job_runner import JobRunner
+from services.music.waveform_service import DEFAULT_BUCKETS, analyse_audio, detail_json
 
 
 MAX_AUDIO_BYTES = 25 * 1024 * 1024   # 25MB — a long track at a sane bitrate
@@ -67,22 +80,14 @@ def _unlink(path):
         pass
 
 
-def upsert_song(provider_name, track, *, analyse=True):
-    """Create or update one song. Returns (song, created)."""
+def _validate(track):
     required = ("provider_track_id", "title", "audio_url")
     missing = [k for k in required if not track.get(k)]
     if missing:
         raise IngestError(f"Track is missing {', '.join(missing)}.")
 
-    song = Song.query.filter_by(
-        provider=provider_name,
-        provider_track_id=str(track["provider_track_id"]),
-    ).first()
-    created = song is None
-    if created:
-        song = Song(provider=provider_name,
-                    provider_track_id=str(track["provider_track_id"]))
 
+def _assign(song, track):
     song.title = track["title"][:255]
     song.artist = (track.get("artist") or None) and track["artist"][:255]
     song.artwork_url = track.get("artwork_url")
@@ -98,24 +103,57 @@ def upsert_song(provider_name, track, *, analyse=True):
     if track.get("trending_rank") is not None:
         song.trending_rank = int(track["trending_rank"])
 
+
+def _apply_analysis(song, analysis):
+    if not analysis:
+        return
+    pyramid = analysis.get("pyramid")
+    if pyramid:
+        song.waveform_peaks = json.dumps(pyramid[DEFAULT_BUCKETS])
+        song.waveform_detail = detail_json(pyramid)
+    if not song.duration_ms:
+        song.duration_ms = int(analysis.get("duration_ms") or 0)
+
+
+def _download_and_analyse(song):
+    tmp = None
+    try:
+        tmp = _download_to_temp(song.audio_url)
+        return analyse_audio(tmp)
+    except IngestError as e:
+        # A track without a waveform is still usable — the trim bar just has
+        # no picture. Losing the whole ingest over it would be worse.
+        _log("warning", "ingest: analysis skipped for %s: %s", song.title, e)
+        return None
+    finally:
+        if tmp:
+            _unlink(tmp)
+
+
+def upsert_song(provider_name, track, *, analyse=True, analysis=None):
+    """Create or update one song. Returns (song, created).
+
+    `analysis` is an analyse_audio() result the caller already has (bulk ingest);
+    without one the audio is downloaded and analysed here if `analyse` is set.
+    """
+    _validate(track)
+
+    song = Song.query.filter_by(
+        provider=provider_name,
+        provider_track_id=str(track["provider_track_id"]),
+    ).first()
+    created = song is None
+    if created:
+        song = Song(provider=provider_name,
+                    provider_track_id=str(track["provider_track_id"]))
+
+    _assign(song, track)
+
     # Analysis needs the actual bytes. Skipped when the caller already has the
     # numbers, or in tests where downloading is neither possible nor the point.
-    if analyse and (not song.waveform_peaks or not song.duration_ms):
-        tmp = None
-        try:
-            tmp = _download_to_temp(song.audio_url)
-            peaks = generate_peaks(tmp)
-            if peaks:
-                song.waveform_peaks = json.dumps(peaks)
-            if not song.duration_ms:
-                song.duration_ms = probe_duration_ms(tmp)
-        except IngestError as e:
-            # A track without a waveform is still usable — the trim bar just has
-            # no picture. Losing the whole ingest over it would be worse.
-            _log("warning", "ingest: analysis skipped for %s: %s", song.title, e)
-        finally:
-            if tmp:
-                _unlink(tmp)
+    if analysis is None and analyse and (not song.waveform_peaks or not song.duration_ms):
+        analysis = _download_and_analyse(song)
+    _apply_analysis(song, analysis)
 
     if created:
         db.session.add(song)
@@ -123,36 +161,295 @@ def upsert_song(provider_name, track, *, analyse=True):
     return song, created
 
 
-def ingest_from_provider(provider_name, *, query=None, limit=50, page=1, analyse=True):
-    """Pull a page from a catalogue and upsert it. Returns a summary."""
+# --------------------------------------------------------------------------- #
+# bulk ingest jobs
+# --------------------------------------------------------------------------- #
+
+def create_ingest_job(provider_name, *, query=None, limit=50, page=1, analyse=True, created_by=None):
+    """Record a provider page to ingest; start_ingest_job runs it."""
+    _provider(provider_name)
+    job = MusicIngestJob(provider=provider_name, query=(query or None) and str(query)[:255],
+                         limit=limit, page=page, analyse=bool(analyse), created_by=created_by)
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+runner = JobRunner('music ingest job', MusicIngestJob, 'job_id', MusicIngestJob.ACTIVE_STATUSES,
+                   MusicIngestJob.STATUS_RUNNING, background='MUSIC_INGEST_BACKGROUND',
+                   workers=('MUSIC_INGEST_WORKERS', 1), stale_seconds=('MUSIC_INGEST_STALE_SECONDS', 600))
+
+
+def start_ingest_job(job_id):
+    """Hand the job to the shared pool (MUSIC_INGEST_BACKGROUND) and return None, or
+    run it here and return the finished job."""
+    if current_app.config.get("MUSIC_INGEST_BACKGROUND", True):
+        runner.start([job_id])
+        return None
+    return run_ingest_job(job_id)
+
+
+def resume_ingest_job(job_id):
+    """Re-run a job that failed, stalled or left failed tracks. Written tracks are skipped."""
+    stale_seconds = current_app.config.get("MUSIC_INGEST_STALE_SECONDS", 600)
+    job = db.session.get(MusicIngestJob, job_id)
+    if job is None:
+        raise IngestError("Ingest job not found.")
+    if not job.is_resumable(stale_seconds):
+        raise IngestError(f"Ingest job is {job.status} and cannot be resumed.")
+    # Reopened by one conditional UPDATE: of two admins resuming at once, or a
+    # resume racing a worker that is still alive, only one matches the row. The
+    # worker then claims it like a new job.
+    reopened = db.session.execute(
+        update(MusicIngestJob)
+        .where(MusicIngestJob.job_id == job_id, MusicIngestJob.resumable_clause(stale_seconds))
+        .values(status=MusicIngestJob.STATUS_QUEUED, heartbeat_at=None, finished_at=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    if reopened != 1:
+        raise IngestError("Ingest job was resumed by someone else, or is running again.")
+    return start_ingest_job(job_id)
+
+
+def sweep(limit=20):
+    """Restart jobs whose worker disappeared (deploys, crashes). Returns how many."""
+    job_ids = runner.stale_ids(limit)
+    if job_ids:
+        runner.start(job_ids)
+    return len(job_ids)
+
+
+@runner.job
+def run_ingest_job(job_id):
+    """Fetch the page (first run only), then analyse and write what is not yet written.
+
+    Returns the job (None if another worker has it).
+    """
+    if not runner.claim(job_id):
+        return None
+    job = db.session.get(MusicIngestJob, job_id)
+    db.session.refresh(job)
+    job.started_at = job.started_at or datetime.utcnow()
+    job.failed_count = 0
+    job.errors = []
+    job.last_error = None
+    db.session.commit()
+
+    try:
+        if job.tracks is None:
+            # Kept on the row: a resume must see the page it started on, not
+            # whatever the provider's page 3 holds an hour later.
+            try:
+                tracks = _provider(job.provider).fetch(query=job.query, limit=job.limit, page=job.page)
+            except ProviderError as e:
+                raise IngestError(str(e))
+            job.tracks = list(tracks)
+            job.total = len(job.tracks)
+            db.session.commit()
+        _IngestRun(job, current_app.config).execute()
+        job.status = MusicIngestJob.STATUS_DONE
+    except Exception as e:
+        db.session.rollback()
+        job = db.session.get(MusicIngestJob, job_id)
+        job.status = MusicIngestJob.STATUS_FAILED
+        job.last_error = str(e)[:2000]
+        _log("error", "ingest job %s failed: %s", job_id, e)
+    job.finished_at = job.heartbeat_at = datetime.utcnow()
+    db.session.commit()
+
+    _log("info", "ingest %s (job %s): %s created, %s updated, %s failed",
+         job.provider, job.job_id, job.created_count, job.updated_count, job.failed_count)
+    return job
+
+
+def _provider(name):
     try:
-        provider = get_provider(provider_name)
-        tracks = provider.fetch(query=query, limit=limit, page=page)
+        return get_provider(name)
     except ProviderError as e:
         raise IngestError(str(e))
 
-    created = updated = failed = 0
-    errors = []
-    for track in tracks:
+
+class _IngestRun:
+    """One pass over a job's unwritten tracks.
+
+    Pool threads and processes only download and analyse; every Song and job write
+    happens on the calling thread, which owns the session.
+    """
+
+    def __init__(self, job, config):
+        self.job = job
+        self.batch_size = max(1, int(config.get("MUSIC_INGEST_BATCH_SIZE", 25)))
+        self.download_workers = max(1, int(config.get("MUSIC_INGEST_DOWNLOAD_WORKERS", 8)))
+        self.analysis_processes = int(config.get("MUSIC_INGEST_ANALYSIS_PROCESSES", 0))
+        self.existing = {}
+        self.ready = []
+
+    def execute(self):
+        done = set(self.job.completed or [])
+        todo = []
+        for track in self.job.tracks:
+            try:
+                _validate(track)
+            except IngestError as e:
+                self._fail(track, e)
+                continue
+            if str(track["provider_track_id"]) not in done:
+                todo.append(track)
+        self._load_existing(todo)
+
+        to_analyse = []
+        for track in todo:
+            song = self._song(track)
+            # Same test as upsert_song: analyse when peaks or duration are missing.
+            if self.job.analyse and not (song is not None and song.waveform_peaks and track.get("duration_ms")):
+                to_analyse.append(track)
+            else:
+                self._ready(track, None)
+        if to_analyse:
+            self._analyse_all(to_analyse)
+        self._flush()
+
+    def _load_existing(self, tracks):
+        """One query per 500 tracks instead of one per track."""
+        ids = [str(t["provider_track_id"]) for t in tracks]
+        for i in range(0, len(ids), 500):
+            for song in Song.query.filter(Song.provider == self.job.provider,
+                                          Song.provider_track_id.in_(ids[i:i + 500])):
+                self.existing[song.provider_track_id] = song
+
+    def _song(self, track):
+        return self.existing.get(str(track["provider_track_id"]))
+
+    def _analysis_pool(self):
+        if self.analysis_processes > 0:
+            # spawn, not fork: the parent has live download threads and DB
+            # connections, neither of which survives a fork. The child only
+            # imports waveform_service.
+            return ProcessPoolExecutor(max_workers=self.analysis_processes,
+                                       mp_context=multiprocessing.get_context("spawn"))
+        return ThreadPoolExecutor(max_workers=self.download_workers)
+
+    def _analyse_all(self, tracks):
+        """Download on threads and hand each file to the analysis pool as it lands."""
+        temp_paths = {}
+        with ThreadPoolExecutor(max_workers=self.download_workers) as downloads, \
+                self._analysis_pool() as analysers:
+            fetching = {downloads.submit(_download_to_temp, t["audio_url"]): t for t in tracks}
+            analysing = {}
+            waiting = set(fetching)
+            try:
+                while waiting:
+                    finished, waiting = wait(waiting, return_when=FIRST_COMPLETED)
+                    for fut in finished:
+                        if fut in fetching:
+                            track = fetching.pop(fut)
+                            try:
+                                path = fut.result()
+                            except IngestError as e:
+                                # Still written, without a waveform, as upsert_song does.
+                                _log("warning", "ingest: analysis skipped for %s: %s", track["title"], e)
+                                self._ready(track, None)
+                                continue
+                            temp_paths[id(track)] = path
+                            nxt = analysers.submit(analyse_audio, path)
+                            analysing[nxt] = track
+                            waiting.add(nxt)
+                        else:
+                            track = analysing.pop(fut)
+                            try:
+                                analysis = fut.result()
+                            except Exception as e:
+                                _log("warning", "ingest: analysis failed for %s: %s", track["title"], e)
+                                analysis = None
+                            _unlink(temp_paths.pop(id(track)))
+                            self._ready(track, analysis)
+            finally:
+                for fut in list(fetching) + list(analysing):
+                    fut.cancel()
+                for path in temp_paths.values():
+                    _unlink(path)
+
+    def _ready(self, track, analysis):
+        self.ready.append((track, analysis))
+        if len(self.ready) >= self.batch_size:
+            self._flush()
+        else:
+            self._heartbeat()
+
+    def _heartbeat(self):
+        """Show the job is alive after every track, not only every batch_size: a
+        slow batch of downloads must not look stale and be resumed twice."""
+        self.job.heartbeat_at = datetime.utcnow()
+        db.session.commit()
+
+    def _flush(self):
+        """Write the ready songs and the job's progress in one commit."""
+        batch, self.ready = self.ready, []
+        if not batch:
+            return
         try:
-            _, was_created = upsert_song(provider_name, track, analyse=analyse)
-            created += 1 if was_created else 0
-            updated += 0 if was_created else 1
+            created = [self._write(track, analysis) for track, analysis in batch]
+            self._record([track for track, _ in batch], created)
+            db.session.commit()
+            return
         except Exception as e:
-            # One bad track must not abandon the rest of the page.
+            # Usually another ingest inserted one of these pairs first. Retry one
+            # track per commit so only the offender fails.
             db.session.rollback()
-            failed += 1
-            errors.append(f"{track.get('title', '?')}: {e}")
+            _log("warning", "ingest job %s: batch write failed, retrying singly: %s", self.job.job_id, e)
+        self.existing.clear()
+        for track, analysis in batch:
+            try:
+                _, was_created = upsert_song(self.job.provider, track, analyse=False, analysis=analysis)
+            except Exception as e:
+                # One bad track must not abandon the rest of the page.
+                db.session.rollback()
+                self._fail(track, e)
+            else:
+                self._record([track], [was_created])
+            db.session.commit()
+
+    def _write(self, track, analysis):
+        song = self._song(track)
+        created = song is None
+        if created:
+            song = Song(provider=self.job.provider, provider_track_id=str(track["provider_track_id"]))
+            db.session.add(song)
+            self.existing[song.provider_track_id] = song
+        _assign(song, track)
+        _apply_analysis(song, analysis)
+        return created
 
-    _log("info", "ingest %s: %s created, %s updated, %s failed",
-         provider_name, created, updated, failed)
+    def _record(self, tracks, created):
+        job = self.job
+        # Reassigned, not appended to, so the JSON column is seen as changed.
+        job.completed = (job.completed or []) + [str(t["provider_track_id"]) for t in tracks]
+        job.created_count += sum(1 for c in created if c)
+        job.updated_count += sum(1 for c in created if not c)
+        job.heartbeat_at = datetime.utcnow()
+
+    def _fail(self, track, error):
+        job = self.job
+        job.failed_count += 1
+        job.errors = ((job.errors or []) + [f"{track.get('title', '?')}: {error}"])[-50:]
+        job.heartbeat_at = datetime.utcnow()
+
+
+def ingest_from_provider(provider_name, *, query=None, limit=50, page=1, analyse=True):
+    """Pull a page from a catalogue and upsert it, inline. Returns a summary."""
+    job = create_ingest_job(provider_name, query=query, limit=limit, page=page, analyse=analyse)
+    job = run_ingest_job(job.job_id)
+    if job.status == MusicIngestJob.STATUS_FAILED and not job.completed:
+        raise IngestError(job.last_error or "Ingest failed.")
 
     return {
+        "job_id": job.job_id,
         "provider": provider_name,
-        "created": created,
-        "updated": updated,
-        "failed": failed,
-        "errors": errors[:10],
+        "created": job.created_count,
+        "updated": job.updated_count,
+        "failed": job.failed_count,
+        "errors": (job.errors or [])[:10],
     }
 
 
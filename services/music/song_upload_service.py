@@ -18,7 +18,8 @@ from flask import current_app
 from werkzeug.utils import secure_filename
 
 from services.music.waveform_service import (
-    audio_tooling_available, generate_peaks, probe_duration_ms,
+    DEFAULT_BUCKETS, audio_tooling_available, detail_json, generate_peak_pyramid,
+    probe_duration_ms,
 )
 
 
@@ -147,7 +148,7 @@ def upload_song_file(file_storage):
                 "This file does not look like playable audio."
             )
 
-        peaks = generate_peaks(tmp_path)
+        pyramid = generate_peak_pyramid(tmp_path)
 
         key = f"{prefix}/{uuid.uuid4().hex}.{ext}"
         try:
@@ -168,7 +169,8 @@ def upload_song_file(file_storage):
             "audio_url": f"{cdn}/{key}",
             "s3_key": key,
             "duration_ms": duration_ms,
-            "waveform_peaks": peaks,
+            "waveform_peaks": pyramid.get(DEFAULT_BUCKETS, []),
+            "waveform_detail": detail_json(pyramid),
             "size_bytes": size,
         }
     finally:
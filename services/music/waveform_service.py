@@ -6,17 +6,27 @@ cheap Android hardware and, worse, gives a slightly different picture on every
 device — the same song would look different to two merchants.
 
 The output is deliberately tiny: 120 buckets of 3 decimal places is about 600
-bytes, which is cheaper to ship than one extra thumbnail.
+bytes, which is cheaper to ship than one extra thumbnail. Finer levels for zooming
+in on the trim bar come from the same decode (generate_peak_pyramid) and are fetched
+separately, so the picker never pays for them.
 """
 import json
 import os
 import re
 import shutil
-import struct
 import subprocess
+import sys
+import tempfile
+import threading
+from array import array
 
 from flask import current_app
 
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy ships with pandas in requirements
+    np = None
+
 
 DEFAULT_BUCKETS = 120
 # Decode at a reduced rate to keep the Python-side loop small, but NOT so low that
@@ -28,6 +38,17 @@ DEFAULT_BUCKETS = 120
 # track.
 ENVELOPE_HZ = 8000
 
+# ffmpeg's stdout is reduced as it arrives instead of being collected whole: the
+# PCM of a 10 minute upload is ~10MB, held alongside a tuple of Python ints ten
+# times that size. Each chunk is folded to one peak per 4ms block, and only the
+# block peaks are kept; buckets are cut from those once the length is known.
+CHUNK_BYTES = 64 * 1024
+BLOCK_SAMPLES = 32
+
+# Zoom levels for the trim UI. The first is what the library stores in
+# waveform_peaks; the rest go to waveform_detail for zooming in on a long track.
+PYRAMID_LEVELS = (DEFAULT_BUCKETS, 480, 1920)
+
 
 # Where the binaries actually live when PATH cannot be trusted.
 #
@@ -61,6 +82,54 @@ def generate_peaks(audio_path, buckets=DEFAULT_BUCKETS, timeout=120):
     Never raises. A missing waveform degrades the trim UI to a plain scrub bar,
     which is worth far less than failing an ingest over.
     """
+    return generate_peak_pyramid(audio_path, levels=(buckets,), timeout=timeout).get(buckets, [])
+
+
+def generate_peak_pyramid(audio_path, levels=PYRAMID_LEVELS, timeout=120):
+    """{buckets: peaks} for every level in `levels`, from one decode. {} on failure.
+
+    The levels share one normalisation, so zooming in on the trim bar shows more
+    detail of the same shape instead of a rescaled one. Never raises, like
+    generate_peaks.
+    """
+    blocks = _decode_block_peaks(audio_path, timeout)
+    if blocks is None or len(blocks) == 0:
+        return {}
+    loudest = int(blocks.max() if np is not None and isinstance(blocks, np.ndarray) else max(blocks))
+    pyramid = {}
+    for buckets in levels:
+        peaks = fold_peaks(blocks, buckets)
+        # Normalise to the loudest point so a quiet track still fills the bar.
+        # Without this a soft acoustic song renders as a nearly flat line and
+        # cannot be trimmed by eye.
+        if loudest > 0:
+            peaks = [round(int(p) / loudest, 3) for p in peaks]
+        else:
+            peaks = [0.0 for _ in peaks]
+        pyramid[buckets] = peaks
+    return pyramid
+
+
+def analyse_audio(audio_path):
+    """{'pyramid': generate_peak_pyramid(), 'duration_ms': probe_duration_ms()}.
+
+    Module-level and free of app state so bulk ingest can run it in a process pool.
+    """
+    return {"pyramid": generate_peak_pyramid(audio_path), "duration_ms": probe_duration_ms(audio_path)}
+
+
+def peaks_json(audio_path, buckets=DEFAULT_BUCKETS):
+    return json.dumps(generate_peaks(audio_path, buckets=buckets))
+
+
+def detail_json(pyramid):
+    """The zoom levels of a pyramid as stored in Song.waveform_detail, or None."""
+    detail = {str(n): peaks for n, peaks in pyramid.items() if n != DEFAULT_BUCKETS}
+    return json.dumps(detail) if detail else None
+
+
+def _decode_block_peaks(audio_path, timeout):
+    """Stream ffmpeg's PCM through a BlockPeaks. None if ffmpeg fails."""
     cmd = [
         _ffmpeg_path(), "-v", "error",
         "-i", str(audio_path),
@@ -70,45 +139,110 @@ def generate_peaks(audio_path, buckets=DEFAULT_BUCKETS, timeout=120):
         "-c:a", "pcm_s16le",
         "-f", "data", "-",
     ]
-    try:
-        proc = subprocess.run(cmd, capture_output=True, timeout=timeout)
-    except (subprocess.TimeoutExpired, FileNotFoundError, OSError) as e:
-        _log("warning", "waveform: ffmpeg unavailable or timed out: %s", e)
-        return []
-
-    if proc.returncode != 0:
-        _log("warning", "waveform: ffmpeg failed: %s", proc.stderr.decode()[:300])
-        return []
-
-    raw = proc.stdout
-    count = len(raw) // 2
-    if count == 0:
-        return []
-
-    samples = struct.unpack(f"<{count}h", raw[: count * 2])
-    step = max(1, count // buckets)
-
-    peaks = []
-    for i in range(0, count, step):
-        window = samples[i : i + step]
-        if not window:
-            continue
-        peaks.append(round(max(abs(s) for s in window) / 32768.0, 3))
-        if len(peaks) == buckets:
-            break
+    # stderr goes to a file rather than a pipe: nobody reads a pipe until stdout
+    # is done, and a corrupt file can log enough decode errors to fill one and
+    # stall ffmpeg.
+    with tempfile.TemporaryFile() as err:
+        try:
+            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=err)
+        except (FileNotFoundError, OSError) as e:
+            _log("warning", "waveform: ffmpeg unavailable: %s", e)
+            return None
+
+        # A blocking read cannot watch the clock, so the timeout kills the process
+        # instead; the read then sees EOF.
+        timer = threading.Timer(timeout, proc.kill)
+        timer.start()
+        reducer = BlockPeaks()
+        try:
+            with proc.stdout:
+                for chunk in iter(lambda: proc.stdout.read(CHUNK_BYTES), b""):
+                    reducer.feed(chunk)
+            proc.wait()
+        finally:
+            timed_out = not timer.is_alive()
+            timer.cancel()
+
+        if timed_out:
+            _log("warning", "waveform: ffmpeg timed out after %ss", timeout)
+            return None
+        if proc.returncode != 0:
+            err.seek(0)
+            _log("warning", "waveform: ffmpeg failed: %s", err.read(300).decode(errors="ignore"))
+            return None
+    return reducer.result()
 
-    # Normalise to the loudest point so a quiet track still fills the bar. Without
-    # this a soft acoustic song renders as a nearly flat line and cannot be trimmed
-    # by eye.
-    loudest = max(peaks) if peaks else 0
-    if loudest > 0:
-        peaks = [round(p / loudest, 3) for p in peaks]
 
-    return peaks
+class BlockPeaks:
+    """Reduce 16-bit little-endian mono PCM, fed in arbitrary chunks, to the loudest
+    |sample| of every BLOCK_SAMPLES window.
 
+    Only the block maxima are kept: 4 bytes per 4ms, against 2 bytes per sample for
+    the PCM itself. Chunks need not align to samples or blocks; the remainder is
+    carried into the next feed. The final partial block counts as a block.
+    """
 
-def peaks_json(audio_path, buckets=DEFAULT_BUCKETS):
-    return json.dumps(generate_peaks(audio_path, buckets=buckets))
+    def __init__(self, block=BLOCK_SAMPLES, use_numpy=None):
+        self.block = block
+        self.use_numpy = (np is not None) if use_numpy is None else use_numpy
+        self._carry = b""
+        self._parts = []
+
+    def feed(self, chunk):
+        data = self._carry + chunk if self._carry else chunk
+        usable = len(data) - len(data) % (self.block * 2)
+        self._carry = bytes(data[usable:])
+        if usable:
+            self._parts.append(self._reduce(memoryview(data)[:usable]))
+
+    def result(self):
+        tail = self._carry[: len(self._carry) - len(self._carry) % 2]
+        self._carry = b""
+        if tail:
+            self._parts.append(self._reduce(memoryview(tail), partial=True))
+        if self.use_numpy:
+            return np.concatenate(self._parts) if self._parts else np.zeros(0, dtype=np.int32)
+        out = array("i")
+        for part in self._parts:
+            out.extend(part)
+        return out
+
+    def _reduce(self, data, partial=False):
+        if self.use_numpy:
+            samples = np.frombuffer(data, dtype="<i2")
+            if partial:
+                samples = samples.reshape(1, -1)
+            else:
+                samples = samples.reshape(-1, self.block)
+            # max(x, -min) in int32: abs() of int16 -32768 overflows back to itself.
+            return np.maximum(samples.max(axis=1).astype(np.int32),
+                              -samples.min(axis=1).astype(np.int32))
+        samples = array("h")
+        samples.frombytes(data)
+        if sys.byteorder == "big":
+            samples.byteswap()
+        step = len(samples) if partial else self.block
+        return array("i", (
+            max(max(w), -min(w))
+            for w in (samples[i:i + step] for i in range(0, len(samples), step))
+        ))
+
+
+def fold_peaks(blocks, buckets):
+    """Max of `blocks` over `buckets` equal spans covering the whole track.
+
+    Fewer blocks than buckets (a clip under half a second) returns the blocks as they
+    are rather than inventing resolution.
+    """
+    n = len(blocks)
+    if n <= buckets:
+        return list(blocks)
+    # n > buckets, so the edges are strictly increasing and no span is empty.
+    edges = [i * n // buckets for i in range(buckets)]
+    if np is not None and isinstance(blocks, np.ndarray):
+        return np.maximum.reduceat(blocks, edges).tolist()
+    edges.append(n)
+    return [max(blocks[a:b]) for a, b in zip(edges, edges[1:])]
 
 
 def probe_duration_ms(audio_path, timeout=30):
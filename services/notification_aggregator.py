@@ -0,0 +1,129 @@
+# services/notification_aggregator.py
+"""
+Buffered writer for reel-like and follow notifications.
+
+like_reel used to look up (and lock) the merchant's unread REEL_LIKED notification
+and update it inside every like request, so a viral reel turned every like into a
+write on one hot row. Likes and follows now call record_reel_like() /
+record_follow(), which only touch an in-memory dict:
+
+- likes on the same (merchant, reel) within one window collapse into one entry
+  holding the number of likes and the latest liker;
+- follows are kept one per follower (follow notifications are not aggregated) but
+  written together;
+- the buffer holds at most NOTIFICATION_AGGREGATOR_MAX_PENDING entries. Past that,
+  events are counted and dropped, so a slow DB cannot grow memory without bound.
+
+BufferedWriter (common/buffered_writer.py) supplies the lock, the size cap and the
+thread that flushes every NOTIFICATION_AGGREGATOR_FLUSH_SECONDS. A flush is one
+SELECT for the unread reel-like notifications the window touched, one UPDATE or
+INSERT per (merchant, reel), one commit. A reel liked 1,000 times in a window costs
+one row write instead of 1,000. With NOTIFICATION_AGGREGATOR_BACKGROUND off (tests)
+events flush inline.
+
+Notifications are best-effort: a window that fails to write, or is pending when the
+process is killed, is logged and lost. Likes and follows themselves are committed
+before they are recorded here.
+"""
+from flask import current_app
+from sqlalchemy import and_, or_
+
+from common.buffered_writer import BufferedWriter
+from models.enums import NotificationType
+from models.merchant_notification import MerchantNotification
+
+
+class NotificationAggregator(BufferedWriter):
+    """Per-app buffer of pending notification events plus the thread that drains it."""
+
+    label = 'Notification aggregator'
+    thread_name = 'notification-aggregator'
+    settings_prefix = 'NOTIFICATION_AGGREGATOR'
+    default_max_pending = 5000
+
+    def record_reel_like(self, merchant_id, reel_id, user_id, user_name):
+        """Buffer one like. Never raises and never touches the DB in background mode."""
+        key = (merchant_id, reel_id)
+        with self._lock:
+            entry = self._likes.get(key)
+            if entry is not None:
+                entry['count'] += 1
+                entry['user_id'] = user_id
+                entry['user_name'] = user_name
+            elif self._full():
+                self._lose('dropped (buffer full)')
+                return
+            else:
+                self._likes[key] = {'count': 1, 'user_id': user_id, 'user_name': user_name}
+
+        self._recorded()
+
+    def record_follow(self, merchant_id, follower_user_id, follower_name):
+        """Buffer one follow notification."""
+        with self._lock:
+            if self._full():
+                self._lose('dropped (buffer full)')
+                return
+            self._follows.append((merchant_id, follower_user_id, follower_name))
+
+        self._recorded()
+
+    def _reset(self):
+        self._likes = {}
+        self._follows = []
+
+    def _take(self):
+        return self._likes, self._follows
+
+    def _size(self):
+        return len(self._likes) + len(self._follows)
+
+    def _write(self, batch):
+        likes, follows = batch
+        self._write_likes(likes)
+        for merchant_id, follower_user_id, follower_name in follows:
+            MerchantNotification.create_follow_notification(merchant_id, follower_user_id, follower_name)
+        return len(likes) + len(follows)
+
+    def _describe(self, batch):
+        likes, follows = batch
+        return f"{len(likes)} reel(s), {len(follows)} follow(s)"
+
+    @staticmethod
+    def _write_likes(likes):
+        if not likes:
+            return
+        existing = {
+            (n.merchant_id, n.related_entity_id): n
+            for n in MerchantNotification.query.filter(
+                MerchantNotification.notification_type == NotificationType.REEL_LIKED,
+                MerchantNotification.related_entity_type == 'reel',
+                MerchantNotification.is_read.is_(False),
+                or_(*[
+                    and_(MerchantNotification.merchant_id == merchant_id,
+                         MerchantNotification.related_entity_id == reel_id)
+                    for merchant_id, reel_id in likes
+                ]),
+            ).with_for_update().all()
+        }
+        for (merchant_id, reel_id), entry in likes.items():
+            MerchantNotification.add_reel_likes(
+                merchant_id, reel_id, entry['count'], entry['user_id'], entry['user_name'],
+                notification=existing.get((merchant_id, reel_id)),
+            )
+
+
+def init_notification_aggregator(app):
+    """Create the app's NotificationAggregator, start its writer thread and register it on the app."""
+    aggregator = NotificationAggregator(app)
+    app.extensions['notification_aggregator'] = aggregator
+    aggregator.start()
+    return aggregator
+
+
+def record_reel_like(merchant_id, reel_id, user_id, user_name):
+    current_app.extensions['notification_aggregator'].record_reel_like(merchant_id, reel_id, user_id, user_name)
+
+
+def record_follow(merchant_id, follower_user_id, follower_name):
+    current_app.extensions['notification_aggregator'].record_follow(merchant_id, follower_user_id, follower_name)
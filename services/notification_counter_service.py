@@ -0,0 +1,154 @@
+# services/notification_counter_service.py
+"""Maintain and read merchant notification counters (models/merchant_notification_counter.py).
+
+Write side. Session events watch MerchantNotification. Before a flush, the net
+change per merchant is worked out from the pending objects (new rows, deletes,
+is_read flips); after it, each merchant's counter row gets
+`unread_count = unread_count + :delta` on the same connection, so it commits or
+rolls back with the notifications. A missing row is created from a COUNT instead.
+Bulk statements skip the ORM events, so code that issues them calls adjust() with
+the rowcount (see MerchantNotification.mark_all_as_read).
+
+Read side. counts() is a primary-key lookup, falling back to live COUNTs for a
+merchant without a row. rebuild() recomputes the rows from the notifications table
+if a counter is ever suspected to be wrong.
+"""
+from collections import defaultdict
+from datetime import datetime
+from types import SimpleNamespace
+
+from sqlalchemy import case, event, func, insert, inspect, select, update
+from sqlalchemy.orm import Session
+
+from common.database import db
+from models.merchant_notification import MerchantNotification
+from models.merchant_notification_counter import MerchantNotificationCounter
+
+
+_PENDING_KEY = 'notification_counter_pending'
+_counters = MerchantNotificationCounter.__table__
+_notifications = MerchantNotification.__table__
+
+
+def _was_read(notification):
+    """is_read as it is in the database, before this flush."""
+    history = inspect(notification).attrs.is_read.history
+    if history.deleted:
+        return bool(history.deleted[0])
+    if history.unchanged:
+        return bool(history.unchanged[0])
+    return bool(notification.is_read)
+
+
+def _before_flush(session, flush_context, instances):
+    deltas = defaultdict(lambda: [0, 0])    # merchant_id -> [unread, total]
+    for obj in session.new:
+        if isinstance(obj, MerchantNotification):
+            deltas[obj.merchant_id][0] += 0 if obj.is_read else 1
+            deltas[obj.merchant_id][1] += 1
+    for obj in session.deleted:
+        if isinstance(obj, MerchantNotification):
+            deltas[obj.merchant_id][0] -= 0 if _was_read(obj) else 1
+            deltas[obj.merchant_id][1] -= 1
+    for obj in session.dirty:
+        if isinstance(obj, MerchantNotification) and session.is_modified(obj):
+            # Any change bumps the version, even with nothing to count.
+            deltas[obj.merchant_id][0] += int(_was_read(obj)) - int(bool(obj.is_read))
+    if not deltas:
+        return
+    pending = session.info.setdefault(_PENDING_KEY, defaultdict(lambda: [0, 0]))
+    for merchant_id, (unread, total) in deltas.items():
+        pending[merchant_id][0] += unread
+        pending[merchant_id][1] += total
+
+
+def _after_flush(session, flush_context):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+    connection = session.connection()
+    for merchant_id, (unread, total) in pending.items():
+        if merchant_id is not None:
+            _apply(connection, merchant_id, unread, total)
+
+
+def _apply(connection, merchant_id, unread, total):
+    result = connection.execute(
+        update(_counters)
+        .where(_counters.c.merchant_id == merchant_id)
+        .values(
+            unread_count=_counters.c.unread_count + unread,
+            total_count=_counters.c.total_count + total,
+            version=_counters.c.version + 1,
+            updated_at=datetime.utcnow(),
+        )
+    )
+    if result.rowcount == 0:
+        # First change for this merchant: the notifications table already holds
+        # the flushed rows, so count it rather than trusting the delta.
+        unread_now, total_now = _live_counts(connection, merchant_id)
+        connection.execute(insert(_counters).values(
+            merchant_id=merchant_id, unread_count=unread_now, total_count=total_now,
+            version=1, updated_at=datetime.utcnow(),
+        ))
+
+
+def _live_counts(connection, merchant_id):
+    row = connection.execute(
+        select(
+            func.coalesce(func.sum(case((_notifications.c.is_read.is_(False), 1), else_=0)), 0),
+            func.count(),
+        ).where(_notifications.c.merchant_id == merchant_id)
+    ).one()
+    return int(row[0] or 0), int(row[1] or 0)
+
+
+def adjust(merchant_id, unread=0, total=0):
+    """Record a change made by a bulk statement, inside the caller's transaction."""
+    if unread or total:
+        _apply(db.session.connection(), merchant_id, unread, total)
+
+
+def init_notification_counters(app):
+    """Register the flush hooks once per process."""
+    if not event.contains(Session, 'before_flush', _before_flush):
+        event.listen(Session, 'before_flush', _before_flush)
+        event.listen(Session, 'after_flush', _after_flush)
+
+
+def counts(merchant_id):
+    """unread_count, total_count and version for one merchant."""
+    row = db.session.get(MerchantNotificationCounter, merchant_id)
+    if row is not None:
+        return SimpleNamespace(unread_count=row.unread_count, total_count=row.total_count, version=row.version)
+    unread, total = _live_counts(db.session.connection(), merchant_id)
+    return SimpleNamespace(unread_count=unread, total_count=total, version=0)
+
+
+def rebuild(merchant_id=None):
+    """Recompute counter rows from the notifications table. Commits. Returns rows written."""
+    query = db.session.query(MerchantNotificationCounter)
+    if merchant_id is not None:
+        query = query.filter(MerchantNotificationCounter.merchant_id == merchant_id)
+    query.delete(synchronize_session=False)
+
+    grouped = (
+        select(
+            _notifications.c.merchant_id,
+            func.sum(case((_notifications.c.is_read.is_(False), 1), else_=0)),
+            func.count(),
+        )
+        .group_by(_notifications.c.merchant_id)
+    )
+    if merchant_id is not None:
+        grouped = grouped.where(_notifications.c.merchant_id == merchant_id)
+    now = datetime.utcnow()
+    rows = [
+        {'merchant_id': m, 'unread_count': int(unread or 0), 'total_count': int(total),
+         'version': 1, 'updated_at': now}
+        for m, unread, total in db.session.execute(grouped)
+    ]
+    if rows:
+        db.session.execute(insert(_counters), rows)
+    db.session.commit()
+    return len(rows)
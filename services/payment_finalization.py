@@ -0,0 +1,378 @@
+# services/payment_finalization.py
+"""Turn a verified Razorpay payment into an order, exactly once.
+
+verify-payment checks the signature (no network) and calls enqueue(). That writes
+a PaymentFinalization row keyed by the gateway payment id and answers straight
+away. A retry of the same payment finds the same row, so two clicks or a refresh
+can never finalise a payment twice.
+
+With PAYMENT_FINALIZE_BACKGROUND on, rows go to one process-wide pool of
+PAYMENT_FINALIZE_WORKERS threads and the client polls
+GET /api/razorpay/verify-payment/<payment_id>. With it off (tests, local runs)
+the row is finalised in the calling request, which then answers with the result.
+
+run() does what the request used to do. It finds the quote the gateway order was
+created for, fetches the capture, checks the owner and the amount, consumes the
+quote and creates the order (stock and promotion redemption commit with it). The
+gateway fetches are retried PAYMENT_FINALIZE_ATTEMPTS times with backoff. A row
+that still could not reach the gateway fails with 502, which is not final: the
+next verify-payment for it reopens it, and so does the sweep after
+PAYMENT_FINALIZE_REQUEUE_SECONDS (doubling per run, up to PAYMENT_FINALIZE_MAX_RUNS).
+
+Exactly once:
+- The quote is consumed in the same transaction as the order, so only one worker
+  can create it.
+- A worker that dies after that commit leaves a row the sweep restarts. The rerun
+  finds the order through orders.razorpay_payment_id and only marks the row done.
+- The confirmation email is queued through the email outbox in the same commit as
+  notified_at. With EMAIL_OUTBOX_ENABLED off, the email is sent inline and a crash
+  right after sending can repeat it.
+"""
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from common.database import db
+from common.metrics import registry
+from models.checkout_quote import CheckoutQuote
+from models.order import Order
+from models.payment_finalization import PaymentFinalization
+from services.checkout_quote_service import consume_quote
+from services.job_runner import JobRunner
+
+registry.describe('payment_finalizations_total', 'Razorpay payment finalisations by outcome.')
+registry.describe('payment_finalization_seconds', 'Time from verify-payment to a finished order.')
+
+DEFAULT_CHARGE_CURRENCY = 'INR'
+
+
+class PaymentFinalizationError(Exception):
+    """Raised with (message, http_status) so the route can map it cleanly."""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+class _GatewayUnavailable(Exception):
+    pass
+
+
+runner = JobRunner('payment finalization', PaymentFinalization, 'finalization_id',
+                   PaymentFinalization.ACTIVE_STATUSES, PaymentFinalization.STATUS_RUNNING,
+                   background='PAYMENT_FINALIZE_BACKGROUND', workers=('PAYMENT_FINALIZE_WORKERS', 8),
+                   stale_seconds=('PAYMENT_FINALIZE_STALE_SECONDS', 120))
+start = runner.start
+
+
+# --------------------------------------------------------------------------- #
+# Enqueue
+# --------------------------------------------------------------------------- #
+
+def enqueue(razorpay_payment_id, razorpay_order_id, user_id, order_extra=None):
+    """The row for this payment, new or existing. Returns (row, started).
+
+    started is False when the call only found a finalisation already under way or
+    finished. A row that failed because the gateway was unreachable is reopened
+    and run again, so a retry after a gateway blip still places the order.
+
+    Raises PaymentFinalizationError(403) if the payment is already being finalised
+    for another user.
+    """
+    row = PaymentFinalization(
+        razorpay_payment_id=razorpay_payment_id, razorpay_order_id=razorpay_order_id,
+        user_id=int(user_id), order_extra=order_extra or None,
+        status=PaymentFinalization.STATUS_QUEUED,
+    )
+    db.session.add(row)
+    try:
+        db.session.commit()
+        created = True
+    except IntegrityError:
+        db.session.rollback()
+        row = PaymentFinalization.query.filter_by(razorpay_payment_id=razorpay_payment_id).one()
+        created = False
+        registry.inc('payment_finalizations_total', outcome='replayed')
+
+    if row.user_id != int(user_id) or row.razorpay_order_id != razorpay_order_id:
+        current_app.logger.error(
+            "Payment %s was verified by user %s for %s but is finalising for user %s, %s",
+            razorpay_payment_id, user_id, razorpay_order_id, row.user_id, row.razorpay_order_id,
+        )
+        raise PaymentFinalizationError('Payment verification failed.', 403)
+
+    started = created or _reopen(row.finalization_id)
+    if started:
+        finalization_id = row.finalization_id
+        start([finalization_id])
+        db.session.expire_all()
+        row = db.session.get(PaymentFinalization, finalization_id)
+    return row, started
+
+
+def _reopen(finalization_id):
+    """Queue a row that failed on a retryable error again. True if this call did."""
+    won = PaymentFinalization.query.filter(
+        PaymentFinalization.finalization_id == finalization_id,
+        PaymentFinalization.status == PaymentFinalization.STATUS_FAILED,
+        PaymentFinalization.error_status.in_(PaymentFinalization.RETRYABLE_ERROR_STATUSES),
+    ).update({'status': PaymentFinalization.STATUS_QUEUED, 'heartbeat_at': None, 'finished_at': None,
+              'last_error': None, 'error_status': None}, synchronize_session=False)
+    db.session.commit()
+    if won:
+        registry.inc('payment_finalizations_total', outcome='reopened')
+    return bool(won)
+
+
+def get_for_user(razorpay_payment_id, user_id):
+    row = PaymentFinalization.query.filter_by(razorpay_payment_id=razorpay_payment_id).first()
+    if row is None or row.user_id != int(user_id):
+        return None
+    return row
+
+
+# --------------------------------------------------------------------------- #
+# Running
+# --------------------------------------------------------------------------- #
+
+@runner.job
+def run(finalization_id):
+    """Finalise the row. Returns it (None if it was not claimable)."""
+    if not runner.claim(finalization_id):
+        return None
+    row = db.session.get(PaymentFinalization, finalization_id)
+    db.session.refresh(row)
+    try:
+        order_id, quote_id, created = _finalize(row)
+    except PaymentFinalizationError as e:
+        db.session.rollback()
+        row = db.session.get(PaymentFinalization, finalization_id)
+        row.status = PaymentFinalization.STATUS_FAILED
+        row.last_error, row.error_status = e.message, e.status
+        outcome = 'failed'
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(
+            "Payment %s captured but order creation failed: %s", row.razorpay_payment_id, e, exc_info=True
+        )
+        row = db.session.get(PaymentFinalization, finalization_id)
+        row.status = PaymentFinalization.STATUS_FAILED
+        # Money moved and no order exists. Loud, and never a silent 200.
+        row.last_error = ('Your payment succeeded but we could not finalise the order. '
+                          'Support has been notified — please do not pay again.')
+        row.error_status = 500
+        outcome = 'failed'
+    else:
+        row = db.session.get(PaymentFinalization, finalization_id)
+        row.status = PaymentFinalization.STATUS_DONE
+        row.order_id, row.quote_id = order_id, quote_id
+        row.last_error = row.error_status = None
+        outcome = 'created' if created else 'done'
+    row.finished_at = datetime.utcnow()
+    db.session.commit()
+    registry.inc('payment_finalizations_total', outcome=outcome)
+    registry.observe('payment_finalization_seconds', (row.finished_at - row.created_at).total_seconds())
+
+    if row.status == PaymentFinalization.STATUS_DONE and row.quote_id and row.order_id:
+        _notify(finalization_id)
+    return db.session.get(PaymentFinalization, finalization_id)
+
+
+def _due_for_retry(row, now):
+    """A gateway failure is retried PAYMENT_FINALIZE_REQUEUE_SECONDS after it
+    happened, doubling per attempt, until PAYMENT_FINALIZE_MAX_RUNS runs."""
+    if row.attempts >= int(current_app.config.get('PAYMENT_FINALIZE_MAX_RUNS', 8)):
+        return False
+    base = float(current_app.config.get('PAYMENT_FINALIZE_REQUEUE_SECONDS', 60))
+    delay = base * 2 ** min(max(row.attempts - 1, 0), 6)
+    return row.finished_at is None or now - row.finished_at >= timedelta(seconds=delay)
+
+
+def sweep(limit=100):
+    """Restart rows whose worker disappeared, and gateway failures whose backoff has
+    passed. Returns how many were restarted."""
+    now = datetime.utcnow()
+    failed = PaymentFinalization.query.filter(
+        PaymentFinalization.status == PaymentFinalization.STATUS_FAILED,
+        PaymentFinalization.error_status.in_(PaymentFinalization.RETRYABLE_ERROR_STATUSES),
+    ).order_by(PaymentFinalization.finished_at).limit(limit).all()
+    reopened = [row.finalization_id for row in failed if _due_for_retry(row, now)]
+    reopened = [finalization_id for finalization_id in reopened if _reopen(finalization_id)]
+    if reopened:
+        start(reopened)
+    finalization_ids = runner.stale_ids(limit)
+    if finalization_ids:
+        start(finalization_ids)
+    return len(finalization_ids) + len(reopened)
+
+
+# --------------------------------------------------------------------------- #
+# Steps
+# --------------------------------------------------------------------------- #
+
+def _with_retries(label, call):
+    attempts = max(1, int(current_app.config.get('PAYMENT_FINALIZE_ATTEMPTS', 3)))
+    backoff = float(current_app.config.get('PAYMENT_FINALIZE_RETRY_BACKOFF_SECONDS', 0.5))
+    for attempt in range(1, attempts + 1):
+        try:
+            return call()
+        except Exception as e:
+            current_app.logger.warning("Razorpay %s failed (attempt %s): %s", label, attempt, e)
+            if attempt == attempts:
+                raise _GatewayUnavailable(str(e))
+            if backoff:
+                time.sleep(backoff * (2 ** (attempt - 1)))
+
+
+def _finalize(row):
+    """(order_id, quote_id, created) for the row's payment. Raises PaymentFinalizationError."""
+    from routes.razorpay_routes import get_razorpay_client
+
+    # A previous run may have committed the order and died before marking the row.
+    existing = Order.query.filter_by(razorpay_payment_id=row.razorpay_payment_id).first()
+    if existing is not None:
+        quote = CheckoutQuote.query.filter_by(order_id=existing.order_id).first()
+        return existing.order_id, quote.quote_id if quote else None, False
+
+    # create-order binds the gateway order to its quote, so that is one local read.
+    # Only an unbound gateway order costs a fetch, to correlate through the receipt
+    # (the quote id for a quote-first checkout, an internal order id for legacy).
+    quote = CheckoutQuote.query.filter_by(razorpay_order_id=row.razorpay_order_id).first()
+    receipt = None
+    if quote is None:
+        try:
+            r_order = _with_retries('order fetch',
+                                    lambda: get_razorpay_client().order.fetch(row.razorpay_order_id))
+            receipt = (r_order or {}).get('receipt')
+        except _GatewayUnavailable:
+            receipt = None
+        quote = CheckoutQuote.query.get(str(receipt)) if receipt else None
+
+    if quote is None:
+        return _store_legacy_refs(row, receipt), None, False
+
+    # str() both sides: the row's user_id is an int, quote.user_id may not be.
+    if str(quote.user_id) != str(row.user_id):
+        current_app.logger.error(
+            "Quote %s belongs to user %s but was verified by user %s",
+            quote.quote_id, quote.user_id, row.user_id
+        )
+        raise PaymentFinalizationError('Payment verification failed.', 403)
+
+    # A valid signature proves the message came from Razorpay; it says nothing about
+    # how much was captured, so the amount is read from the gateway and checked (I2).
+    try:
+        payment = _with_retries('payment fetch', lambda: get_razorpay_client().payment.fetch(row.razorpay_payment_id))
+    except _GatewayUnavailable:
+        raise PaymentFinalizationError(
+            'Could not confirm the captured amount with the payment gateway. '
+            'Your payment has not been lost — please contact support.', 502
+        )
+    captured_minor = int((payment or {}).get('amount') or 0)
+    captured_currency = ((payment or {}).get('currency') or '').upper()
+    expected_minor = int(quote.charge_amount_minor)
+    expected_currency = (quote.charge_currency or DEFAULT_CHARGE_CURRENCY).upper()
+    if captured_minor != expected_minor or captured_currency != expected_currency:
+        current_app.logger.error(
+            "Capture/quote mismatch on quote %s: captured %s %s, quoted %s %s",
+            quote.quote_id, captured_minor, captured_currency, expected_minor, expected_currency
+        )
+        raise PaymentFinalizationError(
+            'Payment amount does not match the quoted total. '
+            'No order was created; please contact support.', 400
+        )
+
+    # Single-use, enforced by a conditional UPDATE rather than a check.
+    if not consume_quote(quote.quote_id):
+        db.session.rollback()
+        spent = CheckoutQuote.query.get(quote.quote_id)
+        if spent and spent.order_id:
+            return spent.order_id, spent.quote_id, False
+        raise PaymentFinalizationError('This quote has already been paid.', 409)
+
+    from controllers.order_controller import OrderController
+    try:
+        order = OrderController.create_order_from_quote(
+            user_id=quote.user_id,
+            quote=quote,
+            gateway_refs={
+                'razorpay_order_id': row.razorpay_order_id,
+                'razorpay_payment_id': row.razorpay_payment_id,
+            },
+            extra=row.order_extra or {},
+        )
+    except IntegrityError as e:
+        # Almost certainly uq_promo_redemption_promotion: the promo code was spent by
+        # another order between this quote being priced and this payment being
+        # captured. The customer paid and has no order, so they need to know *why*.
+        current_app.logger.error(
+            "Payment %s captured but order creation hit a constraint for quote %s (promo %s): %s",
+            row.razorpay_payment_id, quote.quote_id, quote.promo_code, e, exc_info=True
+        )
+        if 'uq_promo_redemption_promotion' in str(e.orig or e):
+            raise PaymentFinalizationError(
+                'Your payment succeeded but the promo code on this order had already been '
+                'used. Support has been notified and will resolve this — please do not pay again.', 409
+            )
+        raise
+    # Point the consumed quote at the order it became (I10).
+    quote.order_id = order.order_id
+    db.session.commit()
+    return order.order_id, quote.quote_id, True
+
+
+def _store_legacy_refs(row, internal_order_id):
+    """No quote behind this payment: record the gateway refs on the order the
+    receipt names, if any. Returns that order's id or None."""
+    if not internal_order_id:
+        return None
+    order = Order.query.get(internal_order_id)
+    if order is None:
+        current_app.logger.warning(
+            "Razorpay receipt '%s' matched no internal order; gateway references were not "
+            "stored for payment %s", internal_order_id, row.razorpay_payment_id
+        )
+        return None
+    order.razorpay_order_id = row.razorpay_order_id
+    order.razorpay_payment_id = row.razorpay_payment_id
+    order.payment_gateway_transaction_id = row.razorpay_payment_id
+    order.payment_gateway_name = 'Razorpay'
+    db.session.commit()
+    current_app.logger.info("Razorpay refs stored on order %s", internal_order_id)
+    return order.order_id
+
+
+def _notify(finalization_id):
+    """Queue the customer's confirmation email, once per row."""
+    from auth.email_utils import send_order_confirmation_email
+    from auth.models.models import User
+
+    try:
+        # Uncommitted until the outbox row joins it, so both land or neither.
+        won = PaymentFinalization.query.filter(
+            PaymentFinalization.finalization_id == finalization_id,
+            PaymentFinalization.notified_at.is_(None),
+        ).update({'notified_at': datetime.utcnow()}, synchronize_session=False)
+        if not won:
+            db.session.rollback()
+            return
+        row = db.session.get(PaymentFinalization, finalization_id)
+        user = User.query.get(row.user_id)
+        order = Order.query.get(row.order_id)
+        if user is None or order is None or not user.email:
+            db.session.commit()
+            return
+        # Queued in this transaction (a savepoint); an outbox failure falls back to
+        # an inline send and leaves the marker pending either way.
+        if send_order_confirmation_email(user, order, in_transaction=True):
+            db.session.commit()
+        else:
+            db.session.rollback()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(
+            "Order confirmation for finalization %s failed: %s", finalization_id, e, exc_info=True
+        )
@@ -0,0 +1,404 @@
+# services/payout_batches.py
+"""Submit bulk merchant payouts in the background, several at a time.
+
+create_batch() checks the list and writes a PayoutBatch with one Payout row per
+merchant, then answers. With PAYOUT_BATCH_BACKGROUND on, the batch goes to one
+process-wide pool of PAYOUT_BATCH_WORKERS threads and the caller polls
+GET /api/razorpay/payouts/batches/<batch_id>. With it off (tests, local runs) the
+batch runs in the calling request.
+
+run() takes PAYOUT_CHUNK_SIZE open payouts at a time. It submits them on
+PAYOUT_CONCURRENCY threads and commits each outcome as it lands. The threads only
+talk to the gateway; every database write happens on the batch's own thread.
+Calls go through one process-wide limiter of PAYOUT_RATE_PER_SECOND, so parallel
+batches share the gateway's budget. A call that fails with a retryable error
+(timeout, 429, 5xx) is tried PAYOUT_ATTEMPTS times with exponential backoff. A
+payout that still fails is marked 'failed' and can be retried with retry_failed().
+
+Each payout carries a reference_id, sent to the gateway as its idempotency key. A
+worker that dies mid-chunk leaves payouts 'submitting'. The sweep restarts the
+batch and submits them again with the same key, so RazorpayX answers with the
+payout it already made instead of paying twice.
+
+PAYOUT_GATEWAY picks the gateway:
+- 'simulated' (default): accepts every payout without moving money. This is the
+  behaviour the route had before RazorpayX was set up, and tests use it.
+- 'razorpayx': POST /v1/payouts from RAZORPAYX_ACCOUNT_NUMBER. Each payout needs
+  the merchant's fund_account_id.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+import requests
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from common.database import db
+from common.metrics import registry
+from models.payout_batch import Payout, PayoutBatch
+from services.job_runner import JobRunner
+
+registry.describe('payouts_total', 'Bulk payout submissions by outcome.')
+registry.describe('payout_batch_seconds', 'Time to submit every payout in a batch.')
+
+GATEWAY_SIMULATED = 'simulated'
+GATEWAY_RAZORPAYX = 'razorpayx'
+
+
+class PayoutBatchError(Exception):
+    """Raised with (message, http_status) so the route can map it cleanly."""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+class PayoutGatewayError(Exception):
+    """A payout call failed. retryable=False stops its retries (bad fund account, 4xx)."""
+
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+# --------------------------------------------------------------------------- #
+# Gateways
+# --------------------------------------------------------------------------- #
+
+class SimulatedPayoutGateway:
+    """Accepts every payout and moves no money.
+
+    Like RazorpayX, it answers a repeated reference_id with the payout it already
+    made.
+    """
+
+    def __init__(self):
+        self.payouts = {}
+        self._lock = threading.Lock()
+
+    def create_payout(self, payout):
+        with self._lock:
+            made = self.payouts.get(payout['reference_id'])
+            if made is None:
+                made = {'id': f"sim_{payout['reference_id']}", 'status': 'processing',
+                        'amount': payout['amount'], 'currency': payout['currency']}
+                self.payouts[payout['reference_id']] = made
+            return made
+
+
+class RazorpayXGateway:
+    URL = 'https://api.razorpay.com/v1/payouts'
+
+    def __init__(self, key_id, key_secret, account_number, mode='IMPS', timeout=15):
+        self.auth = (key_id, key_secret)
+        self.account_number = account_number
+        self.mode = mode
+        self.timeout = timeout
+
+    def create_payout(self, payout):
+        body = {
+            'account_number': self.account_number,
+            'fund_account_id': payout['fund_account_id'],
+            'amount': payout['amount'],
+            'currency': payout['currency'],
+            'mode': self.mode,
+            'purpose': 'payout',
+            'queue_if_low_balance': True,
+            'reference_id': payout['reference_id'],
+            'notes': payout['notes'],
+        }
+        try:
+            response = requests.post(self.URL, json=body, auth=self.auth, timeout=self.timeout,
+                                     headers={'X-Payout-Idempotency': payout['reference_id']})
+        except requests.RequestException as e:
+            raise PayoutGatewayError(f"RazorpayX unreachable: {e}")
+        if response.status_code == 429 or response.status_code >= 500:
+            raise PayoutGatewayError(f"RazorpayX answered {response.status_code}")
+        if response.status_code >= 400:
+            try:
+                description = response.json()['error']['description']
+            except (ValueError, KeyError, TypeError):
+                description = response.text[:200]
+            raise PayoutGatewayError(f"RazorpayX rejected the payout: {description}", retryable=False)
+        return response.json()
+
+
+_simulated = SimulatedPayoutGateway()
+
+
+def get_gateway():
+    config = current_app.config
+    if config.get('PAYOUT_GATEWAY', GATEWAY_SIMULATED) == GATEWAY_RAZORPAYX:
+        return RazorpayXGateway(config.get('RAZORPAY_KEY_ID'), config.get('RAZORPAY_KEY_SECRET'),
+                                config.get('RAZORPAYX_ACCOUNT_NUMBER'),
+                                mode=config.get('RAZORPAYX_PAYOUT_MODE', 'IMPS'))
+    return _simulated
+
+
+class RateLimiter:
+    """Spaces calls 1/rate seconds apart across threads. rate <= 0 turns it off."""
+
+    def __init__(self, rate, clock=time.monotonic, sleep=time.sleep):
+        self.interval = 1.0 / rate if rate > 0 else 0
+        self._clock, self._sleep = clock, sleep
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = self._clock()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            self._sleep(slot - now)
+
+
+runner = JobRunner('payout batch', PayoutBatch, 'batch_id', PayoutBatch.ACTIVE_STATUSES,
+                   PayoutBatch.STATUS_RUNNING,
+                   background='PAYOUT_BATCH_BACKGROUND', workers=('PAYOUT_BATCH_WORKERS', 2),
+                   stale_seconds=('PAYOUT_BATCH_STALE_SECONDS', 300))
+start = runner.start
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def _rate_limiter():
+    global _limiter
+    rate = float(current_app.config.get('PAYOUT_RATE_PER_SECOND', 10))
+    if _limiter is None or _limiter.interval != (1.0 / rate if rate > 0 else 0):
+        with _limiter_lock:
+            _limiter = RateLimiter(rate)
+    return _limiter
+
+
+# --------------------------------------------------------------------------- #
+# Requests
+# --------------------------------------------------------------------------- #
+
+def _normalise(items):
+    """The payout rows' fields for the request's list. Raises PayoutBatchError."""
+    from auth.models.models import MerchantProfile
+
+    if not items or not isinstance(items, list):
+        raise PayoutBatchError('Invalid or missing payouts array', 400)
+    limit = int(current_app.config.get('PAYOUT_BATCH_MAX_ITEMS', 5000))
+    if len(items) > limit:
+        raise PayoutBatchError(f'A batch can hold at most {limit} payouts', 400)
+    needs_fund_account = current_app.config.get('PAYOUT_GATEWAY', GATEWAY_SIMULATED) == GATEWAY_RAZORPAYX
+
+    rows = []
+    for item in items:
+        if not isinstance(item, dict) or item.get('merchant_id') is None or item.get('amount') is None:
+            raise PayoutBatchError('Each payout must include merchant_id and amount', 400)
+        try:
+            merchant_id = int(item['merchant_id'])
+            amount = Decimal(str(item['amount'])).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        except (TypeError, ValueError, InvalidOperation):
+            raise PayoutBatchError(f"Invalid payout for merchant {item.get('merchant_id')}", 400)
+        if amount <= 0:
+            raise PayoutBatchError(f'Payout amount for merchant {merchant_id} must be positive', 400)
+        notes = item.get('notes') or {}
+        if not isinstance(notes, dict):
+            raise PayoutBatchError(f'Payout notes for merchant {merchant_id} must be an object', 400)
+        if needs_fund_account and not item.get('fund_account_id'):
+            raise PayoutBatchError(f'Payout for merchant {merchant_id} needs a fund_account_id', 400)
+        rows.append({
+            'merchant_id': merchant_id, 'amount': amount,
+            'currency': (item.get('currency') or 'INR').upper(),
+            'fund_account_id': item.get('fund_account_id'), 'notes': notes,
+        })
+
+    merchant_ids = {row['merchant_id'] for row in rows}
+    known = {merchant_id for (merchant_id,) in db.session.query(MerchantProfile.id).filter(
+        MerchantProfile.id.in_(merchant_ids))}
+    unknown = sorted(merchant_ids - known)
+    if unknown:
+        raise PayoutBatchError(f"Unknown merchant ids: {', '.join(map(str, unknown))}", 400)
+    return rows
+
+
+def create_batch(user_id, items, idempotency_key=None):
+    """The batch for these payouts. Returns (batch, created).
+
+    A repeat with the same idempotency_key returns the first batch untouched.
+    """
+    if idempotency_key:
+        existing = PayoutBatch.query.filter_by(idempotency_key=idempotency_key).first()
+        if existing is not None:
+            return _replay(existing, user_id), False
+    rows = _normalise(items)
+
+    batch = PayoutBatch(created_by=int(user_id), idempotency_key=idempotency_key or None,
+                        status=PayoutBatch.STATUS_QUEUED, total_count=len(rows))
+    db.session.add(batch)
+    try:
+        db.session.flush()
+    except IntegrityError:
+        db.session.rollback()
+        existing = PayoutBatch.query.filter_by(idempotency_key=idempotency_key).one()
+        return _replay(existing, user_id), False
+    db.session.bulk_insert_mappings(Payout, [
+        dict(row, batch_id=batch.batch_id, reference_id=f"payout_{batch.batch_id}_{n}",
+             status=Payout.STATUS_PENDING, attempts=0, retryable=True)
+        for n, row in enumerate(rows, start=1)
+    ])
+    db.session.commit()
+
+    batch_id = batch.batch_id
+    start([batch_id])
+    db.session.expire_all()
+    return db.session.get(PayoutBatch, batch_id), True
+
+
+def _replay(batch, user_id):
+    if batch.created_by != int(user_id):
+        raise PayoutBatchError('Idempotency-Key was already used for another batch', 409)
+    registry.inc('payouts_total', batch.total_count, outcome='replayed')
+    return batch
+
+
+def progress(batch):
+    """{status: count} for the batch's payouts."""
+    return dict(db.session.query(Payout.status, db.func.count(Payout.payout_id))
+                .filter(Payout.batch_id == batch.batch_id).group_by(Payout.status).all())
+
+
+def retry_failed(batch_id):
+    """Queue the batch's retryable failures again. Returns how many."""
+    batch = db.session.get(PayoutBatch, batch_id)
+    if batch is None:
+        raise PayoutBatchError('Payout batch not found', 404)
+    if batch.status in PayoutBatch.ACTIVE_STATUSES:
+        raise PayoutBatchError(f'Payout batch is {batch.status} and cannot be retried yet', 409)
+    count = Payout.query.filter(
+        Payout.batch_id == batch_id,
+        Payout.status == Payout.STATUS_FAILED,
+        Payout.retryable.is_(True),
+    ).update({'status': Payout.STATUS_PENDING, 'last_error': None}, synchronize_session=False)
+    if count:
+        batch.status, batch.heartbeat_at, batch.finished_at = PayoutBatch.STATUS_QUEUED, None, None
+    db.session.commit()
+    if count:
+        start([batch_id])
+    return count
+
+
+# --------------------------------------------------------------------------- #
+# Running
+# --------------------------------------------------------------------------- #
+
+@runner.job
+def run(batch_id):
+    """Submit the batch's open payouts. Returns the batch (None if it was not claimable)."""
+    if not runner.claim(batch_id):
+        return None
+    started = time.monotonic()
+    try:
+        _submit_open_payouts(batch_id)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error("Payout batch %s failed: %s", batch_id, e, exc_info=True)
+        batch = db.session.get(PayoutBatch, batch_id)
+        batch.status, batch.last_error = PayoutBatch.STATUS_FAILED, str(e)
+    else:
+        batch = db.session.get(PayoutBatch, batch_id)
+        batch.status, batch.last_error = PayoutBatch.STATUS_DONE, None
+    batch.finished_at = datetime.utcnow()
+    db.session.commit()
+    registry.observe('payout_batch_seconds', time.monotonic() - started)
+    return batch
+
+
+def sweep(limit=20):
+    """Restart batches whose worker disappeared. Returns how many were restarted."""
+    batch_ids = runner.stale_ids(limit)
+    if batch_ids:
+        start(batch_ids)
+    return len(batch_ids)
+
+
+# --------------------------------------------------------------------------- #
+# Submitting
+# --------------------------------------------------------------------------- #
+
+def _gateway_request(payout):
+    return {
+        'reference_id': payout.reference_id,
+        'merchant_id': payout.merchant_id,
+        'fund_account_id': payout.fund_account_id,
+        # RazorpayX takes paise.
+        'amount': int(payout.amount * 100),
+        'currency': payout.currency,
+        'notes': dict(payout.notes or {}, merchant_id=str(payout.merchant_id)),
+    }
+
+
+def _submit(gateway, limiter, request, attempts, backoff):
+    """(response, error, tries) for one payout. Runs on a submit thread: no DB, no app."""
+    for attempt in range(1, attempts + 1):
+        limiter.acquire()
+        try:
+            return gateway.create_payout(request), None, attempt
+        except PayoutGatewayError as e:
+            error = e
+        except Exception as e:
+            error = PayoutGatewayError(str(e))
+        if not error.retryable or attempt == attempts:
+            return None, error, attempt
+        if backoff:
+            time.sleep(backoff * 2 ** (attempt - 1))
+
+
+def _submit_open_payouts(batch_id):
+    config = current_app.config
+    chunk_size = max(1, int(config.get('PAYOUT_CHUNK_SIZE', 50)))
+    attempts = max(1, int(config.get('PAYOUT_ATTEMPTS', 4)))
+    backoff = float(config.get('PAYOUT_RETRY_BACKOFF_SECONDS', 1.0))
+    gateway, limiter = get_gateway(), _rate_limiter()
+
+    last_id = 0
+    with ThreadPoolExecutor(max_workers=max(1, int(config.get('PAYOUT_CONCURRENCY', 4))),
+                            thread_name_prefix='payout-submit') as calls:
+        while True:
+            chunk = Payout.query.filter(
+                Payout.batch_id == batch_id,
+                Payout.status.in_(Payout.OPEN_STATUSES),
+                Payout.payout_id > last_id,
+            ).order_by(Payout.payout_id).limit(chunk_size).all()
+            if not chunk:
+                return
+            last_id = chunk[-1].payout_id
+            for payout in chunk:
+                payout.status = Payout.STATUS_SUBMITTING
+            runner.heartbeat(batch_id)
+            db.session.commit()
+
+            futures = {calls.submit(_submit, gateway, limiter, _gateway_request(payout), attempts, backoff):
+                       payout.payout_id for payout in chunk}
+            for future in as_completed(futures):
+                payout = db.session.get(Payout, futures[future])
+                response, error, tries = future.result()
+                payout.attempts += tries
+                if error is None:
+                    payout.status = Payout.STATUS_INITIATED
+                    payout.gateway_payout_id = response.get('id')
+                    payout.gateway_status = response.get('status')
+                    payout.last_error = None
+                    outcome = 'initiated'
+                else:
+                    current_app.logger.warning("Payout %s to merchant %s failed after %s attempt(s): %s",
+                                               payout.reference_id, payout.merchant_id, tries, error)
+                    payout.status = Payout.STATUS_FAILED
+                    payout.last_error, payout.retryable = str(error), error.retryable
+                    outcome = 'failed'
+                db.session.commit()
+                registry.inc('payouts_total', outcome=outcome)
+                if tries > 1:
+                    registry.inc('payouts_total', tries - 1, outcome='retried')
@@ -0,0 +1,346 @@
+# services/product_hydrator.py
+"""Turn a page of product ids into listing cards in a fixed number of queries.
+
+Every listing endpoint used to serialize its page on its own: one query for the
+primary image (up to three, with the thumbnail/main-image fallbacks), lazy loads for
+category, brand, stock, attributes and variants inside Product.serialize(), a rating
+lookup, and sometimes every review. A 20-product page ran a few hundred statements,
+and each endpoint had different holes.
+
+ProductHydrator loads the page once with its relationships eager-loaded, then one
+query each for images, ratings and (optionally) review previews, whatever the page
+size. Prices in a presentment currency need one FX lookup per request, which
+fx_service.get_rate_row remembers for the rest of the request.
+
+ShopProductHydrator does the same for shop products (meta, media, stock).
+
+scripts/benchmark_listing_queries.py prints statements per page before and after.
+"""
+from sqlalchemy.orm import joinedload, selectinload
+
+from models.enums import MediaType
+from models.product import Product
+from models.product_attribute import ProductAttribute
+from models.product_media import ProductMedia
+from services import review_aggregate_service
+from services.image_derivatives import srcset
+
+
+def _product_load_options():
+    # Built on first use: Product.stock and Product.variants are backrefs and only
+    # exist once the mappers are configured.
+    def card_relations(path):
+        return [
+            path.joinedload(Product.category),
+            path.joinedload(Product.brand),
+            path.joinedload(Product.stock),
+            path.selectinload(Product.product_attributes).options(
+                joinedload(ProductAttribute.attribute),
+                joinedload(ProductAttribute.attribute_value),
+            ),
+        ]
+
+    variants = selectinload(Product.variants)
+    return [
+        joinedload(Product.category),
+        joinedload(Product.brand),
+        joinedload(Product.stock),
+        selectinload(Product.product_attributes).options(
+            joinedload(ProductAttribute.attribute),
+            joinedload(ProductAttribute.attribute_value),
+        ),
+        # Product.serialize() serializes each variant, which in turn touches its
+        # own relationships (and its own, normally empty, variants).
+        *card_relations(variants),
+        variants.selectinload(Product.variants),
+    ]
+
+
+def pick_primary_image(images):
+    """Explicit thumbnail, then main image, then the first by sort order.
+
+    `images` must already be in (sort_order, created_at) order.
+    """
+    for flag in ('is_thumbnail', 'is_main_image'):
+        for media in images:
+            if getattr(media, flag):
+                return media
+    return images[0] if images else None
+
+
+class ProductHydrator:
+    """Serialized product cards for a page of marketplace products.
+
+    reviews     embed up to REVIEW_PREVIEW_LIMIT recent reviews per product
+    media_list  include every image as `media`, not just the primary one
+    taxonomy    include the serialized category and brand
+    """
+
+    def __init__(self, reviews=False, media_list=False, taxonomy=False):
+        self.reviews = reviews
+        self.media_list = media_list
+        self.taxonomy = taxonomy
+
+    @staticmethod
+    def load(product_ids):
+        """{product_id: Product} with everything serialize() touches eager-loaded."""
+        if not product_ids:
+            return {}
+        products = (
+            Product.query
+            .options(*_product_load_options())
+            .filter(Product.product_id.in_(product_ids))
+            .all()
+        )
+        return {p.product_id: p for p in products}
+
+    @staticmethod
+    def images(product_ids):
+        """{product_id: [ProductMedia, ...]} live images in display order."""
+        if not product_ids:
+            return {}
+        rows = (
+            ProductMedia.query
+            .filter(
+                ProductMedia.product_id.in_(product_ids),
+                ProductMedia.deleted_at.is_(None),
+                ProductMedia.type == MediaType.IMAGE,
+            )
+            .order_by(ProductMedia.product_id, ProductMedia.sort_order.asc(), ProductMedia.created_at.asc())
+            .all()
+        )
+        by_product = {}
+        for media in rows:
+            by_product.setdefault(media.product_id, []).append(media)
+        return by_product
+
+    def cards(self, products):
+        """Cards in the order given. Accepts Product instances or product ids."""
+        product_ids = [p.product_id if isinstance(p, Product) else p for p in products]
+        loaded = self.load(product_ids)
+        images = self.images(product_ids)
+        ratings = review_aggregate_service.product_ratings(product_ids)
+        previews = review_aggregate_service.preview_reviews(product_ids) if self.reviews else {}
+
+        # Brand.serialize() queries its (dynamic) categories relationship, so each
+        # distinct brand on the page is serialized once.
+        self._brands = {}
+        cards = []
+        for product_id in product_ids:
+            product = loaded.get(product_id)
+            if product is None:
+                continue
+            cards.append(self._card(
+                product, images.get(product_id, []), ratings.get(product_id), previews.get(product_id, []),
+            ))
+        return cards
+
+    def _brand(self, brand):
+        if brand is None:
+            return None
+        if brand.brand_id not in self._brands:
+            self._brands[brand.brand_id] = brand.serialize()
+        return self._brands[brand.brand_id]
+
+    def _card(self, product, images, rating_summary, previews):
+        card = product.serialize()
+        card.update({
+            'id': str(product.product_id),
+            'name': product.product_name,
+            'description': product.product_description,
+            'stock': product.stock.stock_qty if product.stock else 0,
+            'isNew': True,
+            'isBuiltIn': False,
+            **review_aggregate_service.rating_fields(rating_summary),
+            'discount_pct': float(product.discount_pct or 0),
+        })
+        if self.taxonomy:
+            card['category'] = product.category.serialize() if product.category else None
+            card['brand'] = self._brand(product.brand)
+        if self.reviews:
+            card['reviews'] = [review_aggregate_service.serialize_preview(r) for r in previews]
+        if self.media_list:
+            card['media'] = [
+                {
+                    'media_id': m.media_id,
+                    'type': m.type.value,
+                    'url': m.url,
+                    'sort_order': m.sort_order,
+                    'public_id': m.public_id,
+                    'srcset': srcset(m.derivatives),
+                }
+                for m in images
+            ]
+        primary = pick_primary_image(images)
+        if primary is not None:
+            card['primary_image'] = primary.url
+            card['image'] = primary.url
+            card['primary_image_srcset'] = srcset(primary.derivatives)
+        return card
+
+
+# --------------------------------------------------------------------------- #
+# shop products
+# --------------------------------------------------------------------------- #
+
+def _shop_load_options():
+    from models.shop.shop_product import ShopProduct
+    from models.shop.shop_product_variant import ShopProductVariant
+
+    def card_relations(path):
+        return [
+            path.joinedload(ShopProduct.shop),
+            path.joinedload(ShopProduct.category),
+            path.joinedload(ShopProduct.brand),
+            path.joinedload(ShopProduct.stock),
+            path.selectinload(ShopProduct.product_attributes),
+            path.selectinload(ShopProduct.variants),
+        ]
+
+    relations = selectinload(ShopProduct.variant_relations).joinedload(ShopProductVariant.variant_product)
+    return [
+        joinedload(ShopProduct.shop),
+        joinedload(ShopProduct.category),
+        joinedload(ShopProduct.brand),
+        joinedload(ShopProduct.stock),
+        selectinload(ShopProduct.product_attributes),
+        selectinload(ShopProduct.variants),
+        *card_relations(relations),
+    ]
+
+
+def optimized_shop_media(media_list):
+    """The {'images', 'videos', 'primary_image', 'total_media'} block for one product.
+
+    `media_list` is that product's live media in sort order. The primary image is the
+    image with the lowest sort_order; without sort orders, the is_primary flag, then
+    the first image.
+    """
+    if not media_list:
+        return {'images': [], 'videos': [], 'primary_image': None, 'total_media': 0}
+
+    sort_orders = [m.sort_order for m in media_list if m.sort_order is not None]
+    min_sort_order = min(sort_orders) if sort_orders else None
+    any_flagged = any(m.is_primary for m in media_list if m.type == MediaType.IMAGE)
+
+    images, videos, primary_image = [], [], None
+    for index, media in enumerate(media_list):
+        is_primary = False
+        if media.type == MediaType.IMAGE:
+            if min_sort_order is not None and media.sort_order == min_sort_order:
+                is_primary = True
+            elif min_sort_order is None and media.is_primary:
+                is_primary = True
+            elif min_sort_order is None and not any_flagged and index == 0:
+                is_primary = True
+
+        item = {
+            'url': media.url,
+            'type': media.type.value if hasattr(media.type, 'value') else str(media.type),
+            'is_primary': is_primary,
+        }
+        if is_primary and media.type == MediaType.IMAGE:
+            primary_image = media.url
+        if media.type == MediaType.IMAGE:
+            images.append(item)
+        elif media.type == MediaType.VIDEO:
+            videos.append(item)
+
+    return {'images': images, 'videos': videos, 'primary_image': primary_image, 'total_media': len(media_list)}
+
+
+class ShopProductHydrator:
+    """Listing cards for shop products: serialize() plus meta, primary image and stock."""
+
+    def __init__(self, stock=True, media=False):
+        self.stock = stock
+        self.media = media
+
+    @staticmethod
+    def load(product_ids):
+        from models.shop.shop_product import ShopProduct
+        if not product_ids:
+            return {}
+        products = (
+            ShopProduct.query
+            .options(*_shop_load_options())
+            .filter(ShopProduct.product_id.in_(product_ids))
+            .all()
+        )
+        return {p.product_id: p for p in products}
+
+    @staticmethod
+    def media_by_product(product_ids):
+        """{product_id: [ShopProductMedia, ...]} live media (all types) in sort order."""
+        from models.shop.shop_product_media import ShopProductMedia
+        if not product_ids:
+            return {}
+        rows = (
+            ShopProductMedia.query
+            .filter(ShopProductMedia.product_id.in_(product_ids), ShopProductMedia.deleted_at.is_(None))
+            .order_by(ShopProductMedia.product_id, ShopProductMedia.sort_order, ShopProductMedia.media_id)
+            .all()
+        )
+        by_product = {}
+        for media in rows:
+            by_product.setdefault(media.product_id, []).append(media)
+        return by_product
+
+    @staticmethod
+    def metas(product_ids):
+        from models.shop.shop_product_meta import ShopProductMeta
+        if not product_ids:
+            return {}
+        rows = ShopProductMeta.query.filter(ShopProductMeta.product_id.in_(product_ids)).all()
+        return {row.product_id: row for row in rows}
+
+    def cards(self, products):
+        from models.shop.shop_product import ShopProduct
+        product_ids = [p.product_id if isinstance(p, ShopProduct) else p for p in products]
+        loaded = self.load(product_ids)
+        media = self.media_by_product(product_ids)
+        metas = self.metas(product_ids)
+
+        cards = []
+        for product_id in product_ids:
+            product = loaded.get(product_id)
+            if product is None:
+                continue
+            cards.append(self._card(product, media.get(product_id, []), metas.get(product_id)))
+        return cards
+
+    def _card(self, product, media_list, meta):
+        card = apply_shop_meta(product.serialize(), meta)
+        images = [m for m in media_list if m.type == MediaType.IMAGE]
+        if self.media:
+            card['media'] = optimized_shop_media(media_list)
+            card['primary_image'] = card['media']['primary_image']
+        elif images:
+            card['primary_image'] = images[0].url
+        if self.stock:
+            stock = product.stock
+            if stock:
+                card['stock'] = stock.serialize()
+                card['is_in_stock'] = stock.stock_qty > 0
+            else:
+                card['is_in_stock'] = False
+        return card
+
+
+def apply_shop_meta(product_dict, meta):
+    """Fold ShopProductMeta into a serialized shop product (as the public API expects)."""
+    if meta:
+        # Override product_description with short_desc for better UX
+        product_dict['product_description'] = meta.short_desc or product_dict.get('product_description', '')
+        product_dict['short_description'] = meta.short_desc
+        product_dict['full_description'] = meta.full_desc
+        product_dict['meta_title'] = meta.meta_title
+        product_dict['meta_description'] = meta.meta_desc
+        product_dict['meta_keywords'] = meta.meta_keywords
+    else:
+        product_dict['short_description'] = product_dict.get('product_description', '')
+        product_dict['full_description'] = product_dict.get('product_description', '')
+        product_dict['meta_title'] = None
+        product_dict['meta_description'] = None
+        product_dict['meta_keywords'] = None
+    return product_dict
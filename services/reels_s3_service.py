@@ -6,7 +6,6 @@ Uses boto3 (Python AWS SDK) with multipart upload support for large files
 import os
 import uuid
 import shutil
-import subprocess
 import tempfile
 from flask import current_app
 from werkzeug.utils import secure_filename
@@ -139,6 +138,13 @@ class ReelsS3Service:
         Upload a reel video file to S3.
         For AOIN reels pass product_id; for external reels pass product_id=None.
 
+        The upload is streamed to a spool file and sent to S3 from there; thumbnail,
+        duration and resolution are produced afterwards by the media worker
+        (services/media_job_service.py), so this returns as soon as the bytes are
+        stored. Callers pass `source_path` to media_job_service.enqueue_reel_processing;
+        it is None when the spool is not shared with the worker (the file is deleted
+        once S3 has the bytes).
+
         Args:
             file: FileStorage object from Flask request
             merchant_id: Merchant ID
@@ -147,14 +153,18 @@ class ReelsS3Service:
             file_extension: File extension (default: mp4)
 
         Returns:
-            dict: url, s3_key, bytes, thumbnail_url, thumbnail_s3_key
+            dict: url, s3_key, bytes, source_path, thumbnail_url and
+            thumbnail_s3_key (always None here; the worker fills them in)
         """
+        from services import media_job_service
+
         if not file:
             raise ValueError("File object is required")
         if not isinstance(merchant_id, int) or merchant_id <= 0:
             raise ValueError(f"Invalid merchant_id: {merchant_id}")
         if not isinstance(reel_id, int) or reel_id <= 0:
             raise ValueError(f"Invalid reel_id: {reel_id}")
+        source_path = None
         try:
             current_app.logger.info(
                 f"[REELS_S3] Starting S3 upload for reel {reel_id}: "
@@ -162,26 +172,7 @@ class ReelsS3Service:
                 f"filename={getattr(file, 'filename', 'unknown')}, bucket={self.bucket_name}"
             )
             s3_key = self._generate_s3_key(merchant_id, reel_id, product_id=product_id)
-            current_app.logger.info(f"[REELS_S3] Generated S3 key: {s3_key}")
-            
-            # Reset file pointer to beginning (critical for file streams)
-            file_position_reset = False
-            if hasattr(file, 'seek') and hasattr(file, 'tell'):
-                try:
-                    current_pos = file.tell()
-                    if current_pos != 0:
-                        file.seek(0)
-                        file_position_reset = True
-                        current_app.logger.info(f"[REELS_S3] Reset file pointer from position {current_pos} to 0")
-                except (IOError, OSError, AttributeError) as seek_error:
-                    current_app.logger.warning(f"[REELS_S3] Could not seek file to beginning: {seek_error}")
-                    # Try to reset anyway if possible
-                    try:
-                        file.seek(0)
-                        file_position_reset = True
-                    except:
-                        pass
-            
+
             # Determine content type based on extension
             content_type_map = {
                 'mp4': 'video/mp4',
@@ -189,126 +180,50 @@ class ReelsS3Service:
                 'mov': 'video/quicktime'
             }
             content_type = content_type_map.get(file_extension.lower(), 'video/mp4')
-            
-            # Get file size (handle different file object types)
-            file_size = 0
-            try:
-                if hasattr(file, 'content_length') and file.content_length:
-                    file_size = file.content_length
-                elif hasattr(file, 'seek') and hasattr(file, 'tell'):
-                    # Try to get size by seeking to end
-                    try:
-                        file.seek(0, 2)  # Move to end
-                        file_size = file.tell()
-                        file.seek(0)  # Reset to start
-                    except (IOError, OSError, AttributeError):
-                        # If we can't determine size, that's okay - S3 will handle it
-                        current_app.logger.warning("[REELS_S3] Could not determine file size, proceeding anyway")
-                        file_size = 0
-            except Exception as size_error:
-                current_app.logger.warning(f"[REELS_S3] Error getting file size: {size_error}, proceeding anyway")
-            
-            upload_args = {
-                'ContentType': content_type
-            }
-            
-            # Generate thumbnail S3 key and URL
-            thumbnail_s3_key = s3_key.replace('.mp4', '_thumb.jpg')
-            thumbnail_url = self._generate_cloudfront_url(thumbnail_s3_key)
-            
-            current_app.logger.info("=" * 80)
-            current_app.logger.info(f"[REELS_S3] 🖼️  STARTING THUMBNAIL GENERATION PROCESS")
-            current_app.logger.info(f"[REELS_S3] 📋 Reel ID: {reel_id}")
-            current_app.logger.info(f"[REELS_S3] 📋 Merchant ID: {merchant_id}")
-            current_app.logger.info(f"[REELS_S3] 📋 Product ID: {product_id}")
-            current_app.logger.info(f"[REELS_S3] 📋 Thumbnail S3 Key: {thumbnail_s3_key}")
-            current_app.logger.info(f"[REELS_S3] 📋 Thumbnail URL: {thumbnail_url}")
-            current_app.logger.info("=" * 80)
-            
-            # Generate thumbnail BEFORE uploading video (so we can read from original file)
-            thumbnail_generated = False
-            try:
-                # Reset file pointer for thumbnail generation
-                current_app.logger.info(f"[REELS_S3] ⏳ Step 1: Resetting file pointer for thumbnail generation...")
-                if hasattr(file, 'seek'):
-                    try:
-                        file.seek(0)
-                        file_position = file.tell()
-                        current_app.logger.info(f"[REELS_S3] ✅ File pointer reset to position: {file_position}")
-                    except Exception as seek_error:
-                        current_app.logger.error(f"[REELS_S3] ❌ Failed to reset file pointer: {str(seek_error)}")
-                        raise
-                else:
-                    current_app.logger.warning(f"[REELS_S3] ⚠️  File object does not have 'seek' method")
-                
-                current_app.logger.info(f"[REELS_S3] ⏳ Step 2: Calling thumbnail generation method...")
-                thumbnail_generated = self._generate_and_upload_thumbnail(
-                    file, merchant_id, reel_id, thumbnail_s3_key, product_id=product_id
-                )
-                
-                if thumbnail_generated:
-                    current_app.logger.info("=" * 80)
-                    current_app.logger.info(f"[REELS_S3] ✅ SUCCESS: Thumbnail generated and uploaded!")
-                    current_app.logger.info(f"[REELS_S3] 📋 Thumbnail URL: {thumbnail_url}")
-                    current_app.logger.info("=" * 80)
-                else:
-                    current_app.logger.warning("=" * 80)
-                    current_app.logger.warning(f"[REELS_S3] ⚠️  WARNING: Thumbnail generation returned False")
-                    current_app.logger.warning(f"[REELS_S3] 📋 This might be due to ffmpeg not being available")
-                    current_app.logger.warning("=" * 80)
-                    
-            except Exception as thumb_error:
-                # Log but don't fail the upload if thumbnail generation fails
-                current_app.logger.error("=" * 80)
-                current_app.logger.error(f"[REELS_S3] ❌ ERROR: Thumbnail generation failed for reel {reel_id}")
-                current_app.logger.error(f"[REELS_S3] ❌ Error Type: {type(thumb_error).__name__}")
-                current_app.logger.error(f"[REELS_S3] ❌ Error Message: {str(thumb_error)}")
-                current_app.logger.error(f"[REELS_S3] ❌ Error Details:", exc_info=True)
-                current_app.logger.error("=" * 80)
-            
-            # Reset file pointer again for video upload
-            if hasattr(file, 'seek'):
-                file.seek(0)
-            
+
+            # Stream to disk in chunks: the worker reads the same file later, and the
+            # request never holds the whole video in memory.
+            source_path, file_size = media_job_service.spool(file, suffix=f".{file_extension.lower()}")
+
             current_app.logger.info(
                 f"[REELS_S3] Uploading to S3: bucket={self.bucket_name}, "
                 f"key={s3_key}, content_type={content_type}, size={file_size} bytes"
             )
-            
-            # Upload to S3 (boto3 automatically uses multipart upload for large files >8MB)
-            # This handles large video files efficiently
+
+            # upload_file switches to parallel multipart uploads for large files (>8MB)
             try:
-                self.s3_client.upload_fileobj(
-                    file,
+                self.s3_client.upload_file(
+                    source_path,
                     self.bucket_name,
                     s3_key,
-                    ExtraArgs=upload_args
+                    ExtraArgs={'ContentType': content_type}
                 )
             except Exception as upload_error:
                 # Log detailed error before re-raising
                 current_app.logger.error(
-                    f"[REELS_S3] S3 upload_fileobj failed: {str(upload_error)}",
+                    f"[REELS_S3] S3 upload_file failed: {str(upload_error)}",
                     exc_info=True
                 )
                 raise
-            
+
             current_app.logger.info(f"[REELS_S3] S3 upload completed successfully for key: {s3_key}")
-            
-            # Construct CloudFront URL
-            cloudfront_url = self._generate_cloudfront_url(s3_key)
-            current_app.logger.info(f"[REELS_S3] CloudFront URL: {cloudfront_url}")
-            
-            result = {
-                'url': cloudfront_url,
+
+            # No worker will read this host's spool, so the file would only leak disk.
+            if not media_job_service.spool_is_shared():
+                media_job_service.discard(source_path)
+                source_path = None
+
+            return {
+                'url': self._generate_cloudfront_url(s3_key),
                 's3_key': s3_key,
                 'bytes': file_size,
-                'thumbnail_url': thumbnail_url if thumbnail_generated else None,
-                'thumbnail_s3_key': thumbnail_s3_key if thumbnail_generated else None
+                'source_path': source_path,
+                'thumbnail_url': None,
+                'thumbnail_s3_key': None,
             }
-            
-            return result
-            
+
         except ClientError as e:
+            media_job_service.discard(source_path)
             error_code = e.response.get('Error', {}).get('Code', 'Unknown')
             error_message = e.response.get('Error', {}).get('Message', str(e))
             current_app.logger.error(
@@ -334,8 +249,10 @@ class ReelsS3Service:
                 raise Exception(f"AWS S3 upload failed ({error_code}): {error_message}")
         except ValueError as ve:
             # Re-raise validation errors as-is
+            media_job_service.discard(source_path)
             raise
         except Exception as e:
+            media_job_service.discard(source_path)
             current_app.logger.error(
                 f"[REELS_S3] Unexpected error uploading reel video to S3: {str(e)}",
                 exc_info=True
@@ -351,7 +268,11 @@ class ReelsS3Service:
         product_id: Optional[int] = None,
     ) -> bool:
         """
-        Generate thumbnail from video and upload to S3.
+        Generate thumbnail from video and upload to S3, synchronously.
+
+        Reels no longer use this (the media worker makes their thumbnails); merchant
+        intro videos still do. The upload is streamed to a temp file rather than read
+        into memory, and ffmpeg is the path resolved at startup (services/media_tools.py).
         
         Args:
             video_file: Video file object
@@ -363,286 +284,68 @@ class ReelsS3Service:
         Returns:
             bool: True if thumbnail was generated and uploaded successfully
         """
-        current_app.logger.info(f"[REELS_S3] 🎬 THUMBNAIL GENERATION METHOD CALLED")
-        
+        from services import media_tools
+
+        if not media_tools.ffmpeg_path():
+            current_app.logger.warning(f"[REELS_S3] ffmpeg not available; no thumbnail for {thumbnail_s3_key}")
+            return False
+
+        temp_video = None
+        temp_thumbnail = None
         try:
-            # Step 1: Reset file pointer
-            current_app.logger.info(f"[REELS_S3] 📍 Step 2.1: Checking file object type and resetting pointer...")
-            current_app.logger.info(f"[REELS_S3] 📍 File object type: {type(video_file)}")
-            current_app.logger.info(f"[REELS_S3] 📍 File object has 'seek': {hasattr(video_file, 'seek')}")
-            current_app.logger.info(f"[REELS_S3] 📍 File object has 'read': {hasattr(video_file, 'read')}")
-            
             if hasattr(video_file, 'seek'):
-                try:
-                    video_file.seek(0)
-                    position = video_file.tell() if hasattr(video_file, 'tell') else 'unknown'
-                    current_app.logger.info(f"[REELS_S3] ✅ File pointer reset successfully. Position: {position}")
-                except Exception as seek_error:
-                    current_app.logger.error(f"[REELS_S3] ❌ Failed to seek file: {str(seek_error)}")
-                    raise
-            else:
-                current_app.logger.warning(f"[REELS_S3] ⚠️  File object does not support seeking")
-            
-            # Step 2: Create temporary files
-            current_app.logger.info(f"[REELS_S3] 📍 Step 2.2: Creating temporary files...")
-            temp_video = None
-            temp_thumbnail = None
-            
-            try:
-                # Save video to temp file
-                current_app.logger.info(f"[REELS_S3] 📍 Step 2.3: Saving video to temporary file...")
-                temp_video = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
-                current_app.logger.info(f"[REELS_S3] 📍 Temp video file path: {temp_video.name}")
-                
-                # Reset file pointer before reading
-                if hasattr(video_file, 'seek'):
-                    video_file.seek(0)
-                
-                # Read video file
-                current_app.logger.info(f"[REELS_S3] 📍 Reading video file content...")
-                video_content = video_file.read()
-                video_size = len(video_content) if video_content else 0
-                current_app.logger.info(f"[REELS_S3] ✅ Video content read. Size: {video_size} bytes")
-                
-                if video_size == 0:
-                    current_app.logger.error(f"[REELS_S3] ❌ Video file is empty! Cannot generate thumbnail.")
-                    return False
-                
-                # Write to temp file
-                temp_video.write(video_content)
-                temp_video.flush()
-                temp_video.close()
-                current_app.logger.info(f"[REELS_S3] ✅ Video saved to temp file: {temp_video.name}")
-                
-                # Verify temp file exists and has content
-                if not os.path.exists(temp_video.name):
-                    current_app.logger.error(f"[REELS_S3] ❌ Temp video file was not created!")
-                    return False
-                
-                temp_file_size = os.path.getsize(temp_video.name)
-                current_app.logger.info(f"[REELS_S3] ✅ Temp video file verified. Size: {temp_file_size} bytes")
-                
-                if temp_file_size == 0:
-                    current_app.logger.error(f"[REELS_S3] ❌ Temp video file is empty!")
-                    return False
-                
-                # Create temp thumbnail file
-                current_app.logger.info(f"[REELS_S3] 📍 Step 2.4: Creating temporary thumbnail file...")
-                temp_thumbnail = tempfile.NamedTemporaryFile(delete=False, suffix='.jpg')
-                current_app.logger.info(f"[REELS_S3] 📍 Temp thumbnail file path: {temp_thumbnail.name}")
-                temp_thumbnail.close()
-                current_app.logger.info(f"[REELS_S3] ✅ Temp thumbnail file created")
-                
-                # Step 3: Check if ffmpeg is available and find its path
-                current_app.logger.info(f"[REELS_S3] 📍 Step 2.5: Checking if ffmpeg is available...")
-                current_app.logger.info(f"[REELS_S3] 📍 Current PATH: {os.environ.get('PATH', 'Not set')}")
-                
-                # Try to find ffmpeg using multiple methods
-                ffmpeg_path = None
-                possible_paths = [
-                    '/usr/bin/ffmpeg',
-                    '/usr/local/bin/ffmpeg',
-                    '/bin/ffmpeg',
-                    'ffmpeg'  # Try PATH as fallback
-                ]
-                
-                # First try shutil.which (more reliable)
-                ffmpeg_path = shutil.which('ffmpeg')
-                if ffmpeg_path:
-                    current_app.logger.info(f"[REELS_S3] ✅ Found ffmpeg using shutil.which: {ffmpeg_path}")
-                else:
-                    # Try common paths
-                    current_app.logger.info(f"[REELS_S3] 📍 shutil.which didn't find ffmpeg, trying common paths...")
-                    for path in possible_paths:
-                        if os.path.exists(path) and os.access(path, os.X_OK):
-                            ffmpeg_path = path
-                            current_app.logger.info(f"[REELS_S3] ✅ Found ffmpeg at: {ffmpeg_path}")
-                            break
-                
-                if not ffmpeg_path:
-                    # Try subprocess to find it
-                    try:
-                        which_result = subprocess.run(
-                            ['which', 'ffmpeg'],
-                            stdout=subprocess.PIPE,
-                            stderr=subprocess.PIPE,
-                            timeout=5
-                        )
-                        if which_result.returncode == 0:
-                            ffmpeg_path = which_result.stdout.decode().strip()
-                            current_app.logger.info(f"[REELS_S3] ✅ Found ffmpeg using 'which': {ffmpeg_path}")
-                    except Exception as which_error:
-                        current_app.logger.warning(f"[REELS_S3] ⚠️  'which' command failed: {str(which_error)}")
-                
-                if not ffmpeg_path:
-                    current_app.logger.error(f"[REELS_S3] ❌ ffmpeg not found in PATH or common locations!")
-                    current_app.logger.error(f"[REELS_S3] 📍 PATH: {os.environ.get('PATH', 'Not set')}")
-                    current_app.logger.error(f"[REELS_S3] 📍 Tried paths: {possible_paths}")
-                    return False
-                
-                # Verify ffmpeg works
-                try:
-                    ffmpeg_check = subprocess.run(
-                        [ffmpeg_path, '-version'],
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.PIPE,
-                        timeout=5
-                    )
-                    if ffmpeg_check.returncode == 0:
-                        version_output = ffmpeg_check.stderr.decode()[:100] if ffmpeg_check.stderr else ffmpeg_check.stdout.decode()[:100]
-                        current_app.logger.info(f"[REELS_S3] ✅ ffmpeg is working!")
-                        current_app.logger.info(f"[REELS_S3] 📍 ffmpeg version info: {version_output[:200]}")
-                    else:
-                        current_app.logger.error(f"[REELS_S3] ❌ ffmpeg found but check failed with return code: {ffmpeg_check.returncode}")
-                        if ffmpeg_check.stderr:
-                            current_app.logger.error(f"[REELS_S3] ❌ Error: {ffmpeg_check.stderr.decode()[:200]}")
-                        return False
-                except Exception as check_error:
-                    current_app.logger.error(f"[REELS_S3] ❌ Error running ffmpeg: {str(check_error)}")
-                    return False
-                
-                # Step 4: Use ffmpeg to extract frame at 1 second
-                current_app.logger.info(f"[REELS_S3] 📍 Step 2.6: Running ffmpeg to extract frame at 1 second...")
-                current_app.logger.info(f"[REELS_S3] 📍 Command: {ffmpeg_path} -i {temp_video.name} -ss 00:00:01 -vframes 1 -q:v 2 -y {temp_thumbnail.name}")
-                
-                cmd = [
-                    ffmpeg_path,  # Use the found path
-                    '-i', temp_video.name,
-                    '-ss', '00:00:01',  # Seek to 1 second
-                    '-vframes', '1',    # Extract 1 frame
-                    '-q:v', '2',        # High quality
-                    '-y',               # Overwrite output
-                    temp_thumbnail.name
-                ]
-                
-                current_app.logger.info(f"[REELS_S3] 📍 Full command: {' '.join(cmd)}")
-                
-                # Run ffmpeg
-                result = subprocess.run(
-                    cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    timeout=30  # 30 second timeout
-                )
-                
-                current_app.logger.info(f"[REELS_S3] 📍 ffmpeg return code: {result.returncode}")
-                
-                if result.stdout:
-                    current_app.logger.info(f"[REELS_S3] 📍 ffmpeg stdout: {result.stdout.decode()[:200]}")
-                
-                if result.stderr:
-                    stderr_output = result.stderr.decode()
-                    current_app.logger.info(f"[REELS_S3] 📍 ffmpeg stderr (first 500 chars): {stderr_output[:500]}")
-                
-                if result.returncode != 0:
-                    # If seeking to 1 second fails, try first frame
-                    current_app.logger.warning(f"[REELS_S3] ⚠️  First attempt failed. Trying to extract first frame instead...")
-                    
-                    cmd_fallback = [
-                        ffmpeg_path,  # Use the found path
-                        '-i', temp_video.name,
-                        '-vframes', '1',
-                        '-q:v', '2',
-                        '-y',
-                        temp_thumbnail.name
-                    ]
-                    
-                    current_app.logger.info(f"[REELS_S3] 📍 Fallback command: {' '.join(cmd_fallback)}")
-                    
-                    result = subprocess.run(
-                        cmd_fallback,
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.PIPE,
-                        timeout=30
-                    )
-                    
-                    current_app.logger.info(f"[REELS_S3] 📍 Fallback return code: {result.returncode}")
-                    
-                    if result.stderr:
-                        stderr_output = result.stderr.decode()
-                        current_app.logger.info(f"[REELS_S3] 📍 Fallback stderr (first 500 chars): {stderr_output[:500]}")
-                
-                if result.returncode != 0:
-                    current_app.logger.error(f"[REELS_S3] ❌ ffmpeg failed to generate thumbnail!")
-                    current_app.logger.error(f"[REELS_S3] ❌ Return code: {result.returncode}")
-                    if result.stderr:
-                        current_app.logger.error(f"[REELS_S3] ❌ Error output: {result.stderr.decode()}")
-                    return False
-                
-                current_app.logger.info(f"[REELS_S3] ✅ ffmpeg executed successfully!")
-                
-                # Step 5: Check if thumbnail was created
-                current_app.logger.info(f"[REELS_S3] 📍 Step 2.7: Verifying thumbnail file was created...")
-                if not os.path.exists(temp_thumbnail.name):
-                    current_app.logger.error(f"[REELS_S3] ❌ Thumbnail file does not exist at: {temp_thumbnail.name}")
-                    return False
-                
-                thumbnail_size = os.path.getsize(temp_thumbnail.name)
-                current_app.logger.info(f"[REELS_S3] ✅ Thumbnail file exists. Size: {thumbnail_size} bytes")
-                
-                if thumbnail_size == 0:
-                    current_app.logger.error(f"[REELS_S3] ❌ Thumbnail file is empty!")
-                    return False
-                
-                # Step 6: Upload thumbnail to S3
-                current_app.logger.info(f"[REELS_S3] 📍 Step 2.8: Uploading thumbnail to S3...")
-                current_app.logger.info(f"[REELS_S3] 📍 Bucket: {self.bucket_name}")
-                current_app.logger.info(f"[REELS_S3] 📍 Key: {thumbnail_s3_key}")
-                
-                with open(temp_thumbnail.name, 'rb') as thumb_file:
-                    self.s3_client.upload_fileobj(
-                        thumb_file,
-                        self.bucket_name,
-                        thumbnail_s3_key,
-                        ExtraArgs={'ContentType': 'image/jpeg'}
-                    )
-                
-                current_app.logger.info(f"[REELS_S3] ✅ Thumbnail uploaded to S3 successfully!")
-                current_app.logger.info(f"[REELS_S3] 📍 S3 Key: {thumbnail_s3_key}")
-                
-                # Verify the upload
-                try:
-                    self.s3_client.head_object(Bucket=self.bucket_name, Key=thumbnail_s3_key)
-                    current_app.logger.info(f"[REELS_S3] ✅ Thumbnail verified in S3!")
-                except Exception as verify_error:
-                    current_app.logger.warning(f"[REELS_S3] ⚠️  Could not verify thumbnail in S3: {str(verify_error)}")
-                
-                return True
-                
-            finally:
-                # Cleanup temp files
-                current_app.logger.info(f"[REELS_S3] 📍 Step 2.9: Cleaning up temporary files...")
-                try:
-                    if temp_video and os.path.exists(temp_video.name):
-                        os.unlink(temp_video.name)
-                        current_app.logger.info(f"[REELS_S3] ✅ Deleted temp video: {temp_video.name}")
-                    if temp_thumbnail and os.path.exists(temp_thumbnail.name):
-                        os.unlink(temp_thumbnail.name)
-                        current_app.logger.info(f"[REELS_S3] ✅ Deleted temp thumbnail: {temp_thumbnail.name}")
-                except Exception as cleanup_error:
-                    current_app.logger.warning(f"[REELS_S3] ⚠️  Failed to cleanup temp files: {str(cleanup_error)}")
-            
-        except FileNotFoundError as fnf_error:
-            current_app.logger.error("=" * 80)
-            current_app.logger.error(f"[REELS_S3] ❌ FileNotFoundError: {str(fnf_error)}")
-            current_app.logger.error(f"[REELS_S3] 📍 PATH environment: {os.environ.get('PATH', 'Not set')}")
-            current_app.logger.error(f"[REELS_S3] 📍 Install ffmpeg: sudo apt-get install ffmpeg (Ubuntu) or brew install ffmpeg (macOS)")
-            current_app.logger.error("=" * 80)
-            return False
-        except subprocess.TimeoutExpired as timeout_error:
-            current_app.logger.error("=" * 80)
-            current_app.logger.error(f"[REELS_S3] ❌ TimeoutError: Thumbnail generation timed out after 30 seconds!")
-            current_app.logger.error(f"[REELS_S3] 📍 The video file might be corrupted or too large to process")
-            current_app.logger.error("=" * 80)
-            return False
+                video_file.seek(0)
+            with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as temp:
+                temp_video = temp.name
+                shutil.copyfileobj(video_file, temp, 1024 * 1024)
+            if hasattr(video_file, 'seek'):
+                video_file.seek(0)
+
+            with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp:
+                temp_thumbnail = temp.name
+
+            if not media_tools.extract_thumbnail(temp_video, temp_thumbnail):
+                current_app.logger.error(f"[REELS_S3] ffmpeg failed to generate thumbnail {thumbnail_s3_key}")
+                return False
+
+            self.s3_client.upload_file(
+                temp_thumbnail,
+                self.bucket_name,
+                thumbnail_s3_key,
+                ExtraArgs={'ContentType': 'image/jpeg'}
+            )
+            current_app.logger.info(f"[REELS_S3] Thumbnail uploaded to S3: {thumbnail_s3_key}")
+            return True
         except Exception as e:
-            current_app.logger.error("=" * 80)
-            current_app.logger.error(f"[REELS_S3] ❌ Unexpected error generating thumbnail!")
-            current_app.logger.error(f"[REELS_S3] ❌ Error Type: {type(e).__name__}")
-            current_app.logger.error(f"[REELS_S3] ❌ Error Message: {str(e)}")
-            current_app.logger.error(f"[REELS_S3] ❌ Full traceback:", exc_info=True)
-            current_app.logger.error("=" * 80)
+            current_app.logger.error(
+                f"[REELS_S3] Unexpected error generating thumbnail {thumbnail_s3_key}: {str(e)}",
+                exc_info=True
+            )
             return False
+        finally:
+            for path in (temp_video, temp_thumbnail):
+                if path and os.path.exists(path):
+                    try:
+                        os.unlink(path)
+                    except OSError:
+                        pass
+    
+    def _delete_renditions(self, s3_key: str) -> None:
+        """
+        Delete the media worker's output for a video: HLS segments and manifests,
+        previews and rendered mixes, all keyed off the video's stem, e.g.
+        reels/1/product-5/12_hls/<token>/360p_000.ts. Never raises.
+        """
+        stem = s3_key.rsplit('.', 1)[0]
+        for prefix in (f"{stem}_hls/", f"{stem}_preview_", f"{stem}_mix_"):
+            try:
+                paginator = self.s3_client.get_paginator('list_objects_v2')
+                for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix):
+                    keys = [{'Key': obj['Key']} for obj in page.get('Contents', [])]
+                    if keys:
+                        self.s3_client.delete_objects(Bucket=self.bucket_name, Delete={'Objects': keys, 'Quiet': True})
+            except Exception as e:
+                current_app.logger.warning(f"[REELS_S3] Failed to delete renditions under {prefix}: {str(e)}")
     
     def delete_reel_video(self, url_or_s3_key: str, delete_thumbnail: bool = True) -> bool:
         """
@@ -687,6 +390,7 @@ class ReelsS3Service:
                     # Don't fail if thumbnail deletion fails
                     current_app.logger.warning(f"[REELS_S3] Failed to delete thumbnail {thumbnail_s3_key}: {str(thumb_error)}")
             
+            self._delete_renditions(s3_key)
             return True
             
         except ClientError as e:
@@ -765,7 +469,6 @@ def generate_thumbnail_for_existing_reel(video_s3_key: str) -> Optional[Dict]:
     """
     import tempfile
     import os
-    import subprocess
     
     service = get_reels_s3_service()
     temp_video = None
@@ -791,42 +494,8 @@ def generate_thumbnail_for_existing_reel(video_s3_key: str) -> Optional[Dict]:
         temp_thumbnail = tempfile.NamedTemporaryFile(delete=False, suffix='.jpg')
         temp_thumbnail.close()
         
-        # Use ffmpeg to extract frame
-        cmd = [
-            'ffmpeg',
-            '-i', temp_video.name,
-            '-ss', '00:00:01',
-            '-vframes', '1',
-            '-q:v', '2',
-            '-y',
-            temp_thumbnail.name
-        ]
-        
-        result = subprocess.run(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            timeout=30
-        )
-        
-        if result.returncode != 0:
-            # Try first frame
-            cmd_fallback = [
-                'ffmpeg',
-                '-i', temp_video.name,
-                '-vframes', '1',
-                '-q:v', '2',
-                '-y',
-                temp_thumbnail.name
-            ]
-            result = subprocess.run(
-                cmd_fallback,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                timeout=30
-            )
-        
-        if result.returncode != 0 or not os.path.exists(temp_thumbnail.name) or os.path.getsize(temp_thumbnail.name) == 0:
+        from services import media_tools
+        if not media_tools.extract_thumbnail(temp_video.name, temp_thumbnail.name):
             return None
         
         # Upload thumbnail to S3
@@ -0,0 +1,226 @@
+# services/review_aggregate_service.py
+"""Keep rating aggregates (models/review_aggregate.py) in step with reviews, and
+give product listings what they need about reviews in a fixed number of queries.
+
+Write side. Create paths call add_product_rating / add_shop_product_rating and
+delete paths remove_product_rating / remove_shop_product_rating before their
+commit, so the aggregate commits or rolls back with the review. Each is a single
+statement applying the change to the stored counts: an upsert
+(common.database.additive_upsert, count + 1, sum + rating) when adding, and a
+conditional UPDATE when removing. Two reviews landing at once both count without a
+lock, even for a product's first review, where there is no row yet to lock.
+refresh_product_rating / refresh_shop_product_rating recompute a row from the
+reviews table; rebuild_all uses them to repair drift.
+
+Read side. product_ratings() is one query for a page of products and
+preview_reviews() is one query (plus one for images) returning at most
+REVIEW_PREVIEW_LIMIT recent reviews per product. min_rating_clause() replaces the
+join + GROUP BY + HAVING filter with a predicate on the aggregate row.
+"""
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import case, func, or_, update
+from sqlalchemy.orm import joinedload, selectinload
+
+from common.database import additive_upsert, db
+from models.review import Review
+from models.review_aggregate import ProductRatingSummary, ShopProductRatingSummary
+from models.shop.shop_review import ShopReview
+
+
+_STARS = range(1, 6)
+
+
+def _average(count, total):
+    return case((count > 0, func.round(total * 1.0 / count, 2)), else_=0)
+
+
+def _add(summary_model, key_name, key, rating):
+    table, rating = summary_model.__table__, int(rating)
+    counted = ('rating_count', 'rating_sum', *(f'count_{star}' for star in _STARS))
+    stmt = additive_upsert(db.session.connection(), table, (key_name,), counted, {
+        'rating_avg': lambda current, inserted: _average(current.rating_count + inserted.rating_count,
+                                                         current.rating_sum + inserted.rating_sum),
+        'updated_at': lambda current, inserted: inserted.updated_at,
+    })
+    db.session.execute(stmt, [dict(
+        {key_name: key, 'rating_count': 1, 'rating_sum': rating, 'rating_avg': rating,
+         'updated_at': datetime.utcnow()},
+        **{f'count_{star}': int(star == rating) for star in _STARS},
+    )])
+
+
+def _remove(summary_model, key_name, key, rating):
+    table, rating = summary_model.__table__, int(rating)
+    # The average is assigned first: MySQL evaluates SET left to right.
+    values = [
+        (table.c.rating_avg, _average(table.c.rating_count - 1, table.c.rating_sum - rating)),
+        (table.c.rating_count, table.c.rating_count - 1),
+        (table.c.rating_sum, table.c.rating_sum - rating),
+        (table.c.updated_at, datetime.utcnow()),
+    ]
+    if rating in _STARS:
+        star = table.c[f'count_{rating}']
+        values.append((star, star - 1))
+    db.session.execute(
+        update(table)
+        .where(table.c[key_name] == key, table.c.rating_count > 0)
+        .ordered_values(*values)
+    )
+
+
+def add_product_rating(product_id, rating):
+    """Count a new live review in the product's aggregate (no commit)."""
+    _add(ProductRatingSummary, 'product_id', product_id, rating)
+
+
+def remove_product_rating(product_id, rating):
+    """Uncount a live review that is being deleted (no commit)."""
+    _remove(ProductRatingSummary, 'product_id', product_id, rating)
+
+
+def add_shop_product_rating(shop_product_id, rating):
+    """Count a new live shop review in the shop product's aggregate (no commit)."""
+    _add(ShopProductRatingSummary, 'shop_product_id', shop_product_id, rating)
+
+
+def remove_shop_product_rating(shop_product_id, rating):
+    """Uncount a live shop review that is being deleted (no commit)."""
+    _remove(ShopProductRatingSummary, 'shop_product_id', shop_product_id, rating)
+
+
+def _refresh(summary_model, key_column, review_model, review_key_column, key):
+    summary = db.session.query(summary_model).filter(key_column == key).one_or_none()
+    row = (
+        db.session.query(
+            func.count(review_model.rating),
+            func.coalesce(func.sum(review_model.rating), 0),
+            *[func.coalesce(func.sum(case((review_model.rating == star, 1), else_=0)), 0) for star in range(1, 6)],
+        )
+        .filter(review_key_column == key, review_model.deleted_at.is_(None))
+        .one()
+    )
+    count, total, *stars = (int(value or 0) for value in row)
+
+    if summary is None:
+        summary = summary_model(**{key_column.key: key})
+        db.session.add(summary)
+    summary.rating_count = count
+    summary.rating_sum = total
+    summary.rating_avg = round(total / count, 2) if count else 0
+    for star, value in zip(range(1, 6), stars):
+        setattr(summary, f'count_{star}', value)
+    summary.updated_at = datetime.utcnow()
+    db.session.flush()
+    return summary
+
+
+def refresh_product_rating(product_id):
+    """Recompute one product's aggregate inside the caller's transaction (no commit)."""
+    return _refresh(ProductRatingSummary, ProductRatingSummary.product_id, Review, Review.product_id, product_id)
+
+
+def refresh_shop_product_rating(shop_product_id):
+    """Recompute one shop product's aggregate inside the caller's transaction (no commit)."""
+    return _refresh(ShopProductRatingSummary, ShopProductRatingSummary.shop_product_id,
+                    ShopReview, ShopReview.shop_product_id, shop_product_id)
+
+
+def rebuild_all():
+    """Recompute every aggregate from the review tables. Commits. Returns rows written."""
+    written = 0
+    product_ids = [pid for (pid,) in db.session.query(Review.product_id).distinct()]
+    product_ids += [pid for (pid,) in db.session.query(ProductRatingSummary.product_id)]
+    for product_id in set(product_ids):
+        refresh_product_rating(product_id)
+        written += 1
+    shop_ids = [pid for (pid,) in db.session.query(ShopReview.shop_product_id).distinct()]
+    shop_ids += [pid for (pid,) in db.session.query(ShopProductRatingSummary.shop_product_id)]
+    for shop_product_id in set(shop_ids):
+        refresh_shop_product_rating(shop_product_id)
+        written += 1
+    db.session.commit()
+    return written
+
+
+# --------------------------------------------------------------------------- #
+# read side
+# --------------------------------------------------------------------------- #
+
+def product_ratings(product_ids):
+    """{product_id: ProductRatingSummary} for the products that have one."""
+    if not product_ids:
+        return {}
+    rows = ProductRatingSummary.query.filter(ProductRatingSummary.product_id.in_(product_ids)).all()
+    return {row.product_id: row for row in rows}
+
+
+def rating_fields(summary):
+    """The listing keys derived from a (possibly missing) summary."""
+    if summary is None:
+        return {'rating': 0.0, 'rating_count': 0}
+    return {'rating': round(summary.average, 1), 'rating_count': summary.rating_count}
+
+
+def min_rating_clause(min_rating, include_unrated=False):
+    """Filter for Product queries outer-joined to ProductRatingSummary.
+
+    Compares the exact sum rather than the rounded stored average. include_unrated
+    keeps the old COALESCE(AVG(rating), 0) behaviour, where a product with no
+    reviews passes a min_rating of 0 or below.
+    """
+    rated = ProductRatingSummary.rating_sum >= min_rating * ProductRatingSummary.rating_count
+    clause = (ProductRatingSummary.rating_count > 0) & rated
+    if include_unrated and min_rating <= 0:
+        return or_(clause, func.coalesce(ProductRatingSummary.rating_count, 0) == 0)
+    return clause
+
+
+def preview_reviews(product_ids, limit=None):
+    """{product_id: [Review, ...]} newest first, at most `limit` per product."""
+    if limit is None:
+        limit = int(current_app.config.get('REVIEW_PREVIEW_LIMIT', 3))
+    if not product_ids or limit <= 0:
+        return {}
+    position = func.row_number().over(
+        partition_by=Review.product_id,
+        order_by=(Review.created_at.desc(), Review.review_id.desc()),
+    ).label('position')
+    ranked = (
+        db.session.query(Review.review_id, position)
+        .filter(Review.product_id.in_(product_ids), Review.deleted_at.is_(None))
+        .subquery()
+    )
+    reviews = (
+        Review.query
+        .join(ranked, ranked.c.review_id == Review.review_id)
+        .filter(ranked.c.position <= limit)
+        .options(joinedload(Review.user), selectinload(Review.images))
+        .order_by(Review.product_id, ranked.c.position)
+        .all()
+    )
+    previews = {}
+    for review in reviews:
+        previews.setdefault(review.product_id, []).append(review)
+    return previews
+
+
+def serialize_preview(review):
+    """Review shape embedded in product listings."""
+    user = review.user
+    return {
+        "id": review.review_id,
+        "user": {
+            "id": user.id,
+            "first_name": getattr(user, 'first_name', 'Anonymous'),
+            "last_name": getattr(user, 'last_name', ''),
+            "email": getattr(user, 'email', None),
+            "avatar": getattr(user, 'avatar_url', None),
+        } if user else None,
+        "rating": review.rating,
+        "title": review.title,
+        "body": review.body,
+        "created_at": review.created_at.isoformat() if review.created_at else None,
+        "images": [img.serialize() for img in sorted(review.images, key=lambda img: img.sort_order or 0)],
+    }
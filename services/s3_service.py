@@ -10,6 +10,12 @@ import boto3
 from botocore.exceptions import ClientError
 from botocore.config import Config
 
+from services import image_derivatives
+
+
+# Asset folders whose images are uploaded with derivatives (see upload_*_image below).
+DERIVATIVE_ASSET_PREFIXES = ('assets/carousel/', 'assets/explore-banners/', 'assets/reviews/', 'assets/variants/')
+
 
 class S3ProductMediaService:
     """Service for handling product media (images and videos) uploads to AWS S3"""
@@ -60,6 +66,34 @@ class S3ProductMediaService:
         
         return s3_key
     
+    def _read_for_derivatives(self, file, content_type):
+        """The original's bytes when this upload should get image derivatives, else None."""
+        if not image_derivatives.wants(content_type):
+            return None
+        try:
+            data = file.read()
+            file.seek(0)
+            return data
+        except (IOError, OSError):
+            return None
+    
+    def _create_derivatives(self, s3_key, data):
+        """Upload resized WebP/AVIF copies beside s3_key. {fmt: {width: url}} or None."""
+        if data is None:
+            return None
+        return image_derivatives.create(self.s3_client, self.bucket_name, self.cloudfront_base_url, s3_key, data)
+    
+    def _delete_derivatives(self, s3_key):
+        """Remove any derivatives of s3_key. Missing keys are not an error."""
+        keys = image_derivatives.all_keys(s3_key)
+        try:
+            self.s3_client.delete_objects(
+                Bucket=self.bucket_name,
+                Delete={'Objects': [{'Key': key} for key in keys], 'Quiet': True}
+            )
+        except Exception as e:
+            current_app.logger.warning(f"Could not delete image derivatives of {s3_key}: {str(e)}")
+    
     def upload_product_media(self, file, product_id):
         """
         Upload a product media file (image or video) to S3
@@ -138,6 +172,8 @@ class S3ProductMediaService:
             
             # boto3 automatically uses multipart upload for large files
             # The client is already configured with multipart support in __init__
+            derivative_source = self._read_for_derivatives(file, content_type)
+
             log.debug("[S3_UPLOAD] upload_args=%s", upload_args)
             log.info(
                 "[S3_UPLOAD] upload_fileobj bucket=%s key=%s content_type=%s",
@@ -164,6 +200,9 @@ class S3ProductMediaService:
                 "s3_key": s3_key,
                 "filename": file.filename,
             }
+            derivatives = self._create_derivatives(s3_key, derivative_source)
+            if derivatives:
+                result["derivatives"] = derivatives
             log.debug("[S3_UPLOAD] result keys=%s", list(result.keys()))
             return result
             
@@ -220,6 +259,8 @@ class S3ProductMediaService:
                 Key=s3_key
             )
             
+            self._delete_derivatives(s3_key)
+            
             current_app.logger.info(f"Successfully deleted product media from S3: {s3_key}")
             return True
             
@@ -614,6 +655,9 @@ class S3ProductMediaService:
                 Key=s3_key
             )
             
+            if s3_key.startswith(DERIVATIVE_ASSET_PREFIXES):
+                self._delete_derivatives(s3_key)
+            
             current_app.logger.info(f"Successfully deleted generic asset from S3: {s3_key}")
             return True
             
@@ -710,7 +754,7 @@ class S3ProductMediaService:
             file_ext = '.' + file.filename.rsplit('.', 1)[1].lower()
         secure_name = secure_filename(file.filename.rsplit('.', 1)[0] if '.' in file.filename else file.filename)
         s3_key = f"assets/carousel/{uuid.uuid4()}_{secure_name}{file_ext}"
-        return self._upload_asset_with_path(file, s3_key)
+        return self._upload_asset_with_path(file, s3_key, derivatives=True)
     
     def upload_explore_banner_image(self, file):
         """
@@ -722,7 +766,7 @@ class S3ProductMediaService:
             file_ext = '.' + file.filename.rsplit('.', 1)[1].lower()
         secure_name = secure_filename(file.filename.rsplit('.', 1)[0] if '.' in file.filename else file.filename)
         s3_key = f"assets/explore-banners/{uuid.uuid4()}_{secure_name}{file_ext}"
-        return self._upload_asset_with_path(file, s3_key)
+        return self._upload_asset_with_path(file, s3_key, derivatives=True)
 
     def upload_support_attachment(self, file, folder_name="support_attachments"):
         """
@@ -746,7 +790,7 @@ class S3ProductMediaService:
             file_ext = '.' + file.filename.rsplit('.', 1)[1].lower()
         secure_name = secure_filename(file.filename.rsplit('.', 1)[0] if '.' in file.filename else file.filename)
         s3_key = f"assets/reviews/{review_id}/{uuid.uuid4()}_{secure_name}{file_ext}"
-        return self._upload_asset_with_path(file, s3_key)
+        return self._upload_asset_with_path(file, s3_key, derivatives=True)
     
     def upload_variant_image(self, file, shop_id, product_id):
         """
@@ -758,11 +802,12 @@ class S3ProductMediaService:
             file_ext = '.' + file.filename.rsplit('.', 1)[1].lower()
         secure_name = secure_filename(file.filename.rsplit('.', 1)[0] if '.' in file.filename else file.filename)
         s3_key = f"assets/variants/shop_{shop_id}/product_{product_id}/{uuid.uuid4()}_{secure_name}{file_ext}"
-        return self._upload_asset_with_path(file, s3_key)
+        return self._upload_asset_with_path(file, s3_key, derivatives=True)
     
-    def _upload_asset_with_path(self, file, s3_key):
+    def _upload_asset_with_path(self, file, s3_key, derivatives=False):
         """
-        Internal helper to upload an asset with a specific S3 key path
+        Internal helper to upload an asset with a specific S3 key path.
+        With derivatives=True, raster images also get resized WebP copies.
         """
         if not self.cloudfront_base_url:
             raise ValueError("CLOUDFRONT_ASSETS_BASE_URL environment variable is required for S3 operations")
@@ -799,6 +844,8 @@ class S3ProductMediaService:
                 'ContentType': content_type
             }
             
+            derivative_source = self._read_for_derivatives(file, content_type) if derivatives else None
+            
             current_app.logger.info(f"Uploading to S3: bucket={self.bucket_name}, key={s3_key}, content_type={content_type}, size={file_size}")
             
             # Upload to S3
@@ -826,6 +873,10 @@ class S3ProductMediaService:
             if file_size:
                 result['bytes'] = file_size
             
+            resized = self._create_derivatives(s3_key, derivative_source)
+            if resized:
+                result['derivatives'] = resized
+            
             return result
             
         except ClientError as e:
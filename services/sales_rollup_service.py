@@ -0,0 +1,365 @@
+# services/sales_rollup_service.py
+"""Maintain and read the merchant sales rollups (models/merchant_sales_rollup.py).
+
+The merchant dashboard and report endpoints used to aggregate the merchant's whole
+order history on every call, and get_monthly_summary ran a query per month, so a
+large merchant's dashboard took seconds. They now read pre-aggregated daily rows.
+
+Write side. Session events watch Orders and OrderItems. Whenever a flush creates,
+deletes, or changes the date or the money columns of either, the touched orders'
+lines are read just before and just after the flush, on the same connection inside
+the same transaction. Their difference is added to the affected rollup rows with
+one upsert per table (common.database.additive_upsert: INSERT … ON DUPLICATE KEY
+UPDATE units_sold = units_sold + delta), so a busy day costs the same as a quiet
+one, and concurrent writers add to a row instead of overwriting each other's totals. Rows whose order count drops to zero
+are removed. Status is not tracked: rollups count every order regardless of it.
+rebuild_rollups() recomputes days from scratch, should a rollup ever drift.
+
+Read side. Controllers call the query helpers below when SALES_ROLLUPS_READ is on.
+Each returns rows labelled like the query it replaces, so the controller's
+formatting code is unchanged.
+
+Two flags, because the order matters: turn on SALES_ROLLUPS_MAINTAIN, run
+scripts/backfill_sales_rollups.py, then turn on SALES_ROLLUPS_READ.
+"""
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from flask import current_app, has_app_context
+from sqlalchemy import delete, event, extract, func, insert, inspect, select, tuple_
+from sqlalchemy.orm import Session
+
+from common.database import additive_upsert, db
+from models.category import Category
+from models.merchant_sales_rollup import MerchantDailySales, MerchantProductDailySales
+from models.order import Order, OrderItem
+from models.product import Product
+
+
+_ORDER_ATTRS = ('order_date',)
+_ITEM_ATTRS = ('order_id', 'merchant_id', 'product_id', 'quantity', 'line_item_total_inclusive_gst')
+_PENDING_KEY = 'sales_rollup_pending'
+
+
+def maintain_enabled():
+    return has_app_context() and bool(current_app.config.get('SALES_ROLLUPS_MAINTAIN'))
+
+
+def reads_enabled():
+    return bool(current_app.config.get('SALES_ROLLUPS_READ'))
+
+
+def _as_date(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    # SQLite hands DATE() and DATETIME columns back as text.
+    text = str(value)
+    return datetime.fromisoformat(text).date() if len(text) > 10 else date.fromisoformat(text)
+
+
+# --------------------------------------------------------------------------- #
+# write side
+# --------------------------------------------------------------------------- #
+
+def _changed(obj, attrs):
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in attrs)
+
+
+def _touched_objects(session):
+    touched = []
+    for obj in session.new:
+        if isinstance(obj, (Order, OrderItem)):
+            touched.append(obj)
+    for obj in session.deleted:
+        if isinstance(obj, (Order, OrderItem)):
+            touched.append(obj)
+    for obj in session.dirty:
+        if isinstance(obj, Order) and _changed(obj, _ORDER_ATTRS):
+            touched.append(obj)
+        elif isinstance(obj, OrderItem) and _changed(obj, _ITEM_ATTRS):
+            touched.append(obj)
+    return touched
+
+
+def _order_ids(objects):
+    ids = set()
+    for obj in objects:
+        if obj.order_id:
+            ids.add(obj.order_id)
+        if isinstance(obj, OrderItem):
+            # An item moved between orders affects both.
+            for old in inspect(obj).attrs.order_id.history.deleted or ():
+                if old:
+                    ids.add(old)
+    return ids
+
+
+def _lines_by_key(connection, order_ids):
+    """These orders' lines as the DB has them now, summed per rollup row:
+    ({(merchant_id, day): bucket}, {(merchant_id, day, product_id): bucket})."""
+    days = defaultdict(lambda: {'orders': set(), 'units': 0, 'revenue': Decimal('0')})
+    products = defaultdict(lambda: {'orders': set(), 'units': 0, 'revenue': Decimal('0')})
+    if not order_ids:
+        return days, products
+    rows = connection.execute(
+        select(OrderItem.order_id, OrderItem.merchant_id, OrderItem.product_id, OrderItem.quantity,
+               OrderItem.line_item_total_inclusive_gst, Order.order_date)
+        .join(Order, Order.order_id == OrderItem.order_id)
+        .where(OrderItem.order_id.in_(order_ids), OrderItem.merchant_id.isnot(None))
+    ).all()
+    for order_id, merchant_id, product_id, quantity, line_total, order_date in rows:
+        day = _as_date(order_date)
+        if day is None:
+            continue
+        for bucket in (days[(merchant_id, day)], products[(merchant_id, day, product_id or 0)]):
+            bucket['orders'].add(order_id)
+            bucket['units'] += quantity or 0
+            bucket['revenue'] += Decimal(str(line_total or 0))
+    return days, products
+
+
+def _deltas(before, after):
+    """{key: {order_count, units_sold, revenue}} changes between two _lines_by_key maps.
+
+    Both cover the same orders, and an order counts once per row, so the change in
+    distinct orders is the change in the row's order_count."""
+    empty = {'orders': (), 'units': 0, 'revenue': Decimal('0')}
+    deltas = {}
+    for key in before.keys() | after.keys():
+        old, new = before.get(key, empty), after.get(key, empty)
+        delta = {'order_count': len(new['orders']) - len(old['orders']),
+                 'units_sold': new['units'] - old['units'],
+                 'revenue': new['revenue'] - old['revenue']}
+        if any(delta.values()):
+            deltas[key] = delta
+    return deltas
+
+
+def _before_flush(session, flush_context, instances):
+    if not maintain_enabled():
+        return
+    touched = _touched_objects(session)
+    if not touched:
+        return
+    order_ids = _order_ids(touched)
+    # Replaces anything left by a flush that failed before its after_flush ran.
+    session.info[_PENDING_KEY] = {
+        'objects': touched, 'order_ids': order_ids,
+        # The lines *before* the flush: covers deletes, moves and changed amounts.
+        'before': _lines_by_key(session.connection(), order_ids),
+    }
+
+
+def _after_flush(session, flush_context):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+    connection = session.connection()
+    # New orders only have their ids now.
+    after = _lines_by_key(connection, pending['order_ids'] | _order_ids(pending['objects']))
+    before_days, before_products = pending['before']
+    now = datetime.utcnow()
+    _apply(connection, MerchantDailySales.__table__, ('merchant_id', 'sales_date'),
+           _deltas(before_days, after[0]), now)
+    _apply(connection, MerchantProductDailySales.__table__, ('merchant_id', 'sales_date', 'product_id'),
+           _deltas(before_products, after[1]), now)
+
+
+def _apply(connection, table, key_columns, deltas, now):
+    """Add each delta to its rollup row, creating missing rows; drop rows left with no orders."""
+    if not deltas:
+        return
+    delta_columns = ('order_count', 'units_sold', 'revenue')
+    stmt = additive_upsert(connection, table, key_columns, delta_columns,
+                           {'updated_at': lambda current, inserted: inserted.updated_at})
+    connection.execute(stmt, [
+        dict(zip(key_columns, key), updated_at=now, **delta) for key, delta in deltas.items()
+    ])
+    keys = tuple_(*(table.c[name] for name in key_columns))
+    connection.execute(delete(table).where(keys.in_(list(deltas)), table.c.order_count <= 0))
+
+
+def recompute_day(connection, merchant_id, day):
+    """Replace one merchant's rollup rows for one day with fresh totals (rebuilds only)."""
+    start = datetime.combine(day, time.min)
+    end = start + timedelta(days=1)
+    lines = connection.execute(
+        select(OrderItem.order_id, OrderItem.product_id, OrderItem.quantity,
+               OrderItem.line_item_total_inclusive_gst)
+        .join(Order, Order.order_id == OrderItem.order_id)
+        .where(OrderItem.merchant_id == merchant_id, Order.order_date >= start, Order.order_date < end)
+    ).all()
+
+    products = defaultdict(lambda: {'orders': set(), 'units': 0, 'revenue': Decimal('0')})
+    all_orders = set()
+    for order_id, product_id, quantity, line_total in lines:
+        bucket = products[product_id or 0]
+        bucket['orders'].add(order_id)
+        bucket['units'] += quantity or 0
+        bucket['revenue'] += Decimal(str(line_total or 0))
+        all_orders.add(order_id)
+
+    connection.execute(delete(MerchantProductDailySales.__table__).where(
+        MerchantProductDailySales.merchant_id == merchant_id, MerchantProductDailySales.sales_date == day))
+    connection.execute(delete(MerchantDailySales.__table__).where(
+        MerchantDailySales.merchant_id == merchant_id, MerchantDailySales.sales_date == day))
+    if not lines:
+        return
+
+    now = datetime.utcnow()
+    connection.execute(insert(MerchantProductDailySales.__table__), [
+        {
+            'merchant_id': merchant_id, 'sales_date': day, 'product_id': product_id,
+            'order_count': len(b['orders']), 'units_sold': b['units'], 'revenue': b['revenue'],
+            'updated_at': now,
+        }
+        for product_id, b in products.items()
+    ])
+    connection.execute(insert(MerchantDailySales.__table__), [{
+        'merchant_id': merchant_id, 'sales_date': day,
+        'order_count': len(all_orders),
+        'units_sold': sum(b['units'] for b in products.values()),
+        'revenue': sum((b['revenue'] for b in products.values()), Decimal('0')),
+        'updated_at': now,
+    }])
+
+
+def rebuild_rollups(merchant_id=None):
+    """Recompute every rollup day (for one merchant, or all). Commits. Returns days rebuilt."""
+    query = (
+        db.session.query(OrderItem.merchant_id, func.date(Order.order_date))
+        .join(Order, Order.order_id == OrderItem.order_id)
+        .filter(OrderItem.merchant_id.isnot(None))
+    )
+    if merchant_id is not None:
+        query = query.filter(OrderItem.merchant_id == merchant_id)
+    keys = {(m, _as_date(d)) for m, d in query.distinct().yield_per(5000)}
+
+    connection = db.session.connection()
+    stale = delete(MerchantDailySales.__table__)
+    stale_products = delete(MerchantProductDailySales.__table__)
+    if merchant_id is not None:
+        stale = stale.where(MerchantDailySales.merchant_id == merchant_id)
+        stale_products = stale_products.where(MerchantProductDailySales.merchant_id == merchant_id)
+    connection.execute(stale)
+    connection.execute(stale_products)
+    for m, day in sorted(keys):
+        recompute_day(connection, m, day)
+    db.session.commit()
+    return len(keys)
+
+
+def init_sales_rollups(app):
+    """Register the flush hooks once per process; they check the flag per flush."""
+    if not event.contains(Session, 'before_flush', _before_flush):
+        event.listen(Session, 'before_flush', _before_flush)
+        event.listen(Session, 'after_flush', _after_flush)
+
+
+# --------------------------------------------------------------------------- #
+# read side
+# --------------------------------------------------------------------------- #
+
+_month = extract('month', MerchantDailySales.sales_date)
+_year = extract('year', MerchantDailySales.sales_date)
+_p_month = extract('month', MerchantProductDailySales.sales_date)
+_p_year = extract('year', MerchantProductDailySales.sales_date)
+
+
+def monthly_totals(merchant_id, months):
+    """Rows (month, year, orders, units, sales) for the given [(month, year)]."""
+    return (
+        db.session.query(
+            _month.label('month'),
+            _year.label('year'),
+            func.sum(MerchantDailySales.order_count).label('orders'),
+            func.sum(MerchantDailySales.units_sold).label('units'),
+            func.sum(MerchantDailySales.revenue).label('sales'),
+        )
+        .filter(MerchantDailySales.merchant_id == merchant_id, tuple_(_month, _year).in_(months))
+        .group_by(_month, _year)
+        .all()
+    )
+
+
+def daily_units(merchant_id, start_day, end_day):
+    """{date: units_sold} for start_day..end_day inclusive."""
+    rows = (
+        db.session.query(MerchantDailySales.sales_date, MerchantDailySales.units_sold)
+        .filter(
+            MerchantDailySales.merchant_id == merchant_id,
+            MerchantDailySales.sales_date >= start_day,
+            MerchantDailySales.sales_date <= end_day,
+        )
+        .all()
+    )
+    return {_as_date(day): units for day, units in rows}
+
+
+def top_products(merchant_id, since=None, limit=5, by='units'):
+    """Rows (product_id, name, sold, revenue) ranked by units or revenue."""
+    sold = func.sum(MerchantProductDailySales.units_sold)
+    revenue = func.sum(MerchantProductDailySales.revenue)
+    query = (
+        db.session.query(
+            MerchantProductDailySales.product_id.label('product_id'),
+            Product.product_name.label('name'),
+            sold.label('sold'),
+            revenue.label('revenue'),
+        )
+        .join(Product, Product.product_id == MerchantProductDailySales.product_id)
+        .filter(MerchantProductDailySales.merchant_id == merchant_id)
+    )
+    if since is not None:
+        query = query.filter(MerchantProductDailySales.sales_date >= since)
+    return (
+        query.group_by(MerchantProductDailySales.product_id, Product.product_name)
+        .order_by((sold if by == 'units' else revenue).desc())
+        .limit(limit)
+        .all()
+    )
+
+
+def monthly_product_breakdown(merchant_id, months):
+    """Rows (month, year, product_name, category, selling_price, quantity, revenue)."""
+    return monthly_product_breakdown_query(merchant_id, months).all()
+
+
+def monthly_product_breakdown_query(merchant_id, months):
+    """The query behind monthly_product_breakdown, for exports that stream it."""
+    return (
+        db.session.query(
+            _p_month.label('month'),
+            _p_year.label('year'),
+            Product.product_name,
+            Category.name.label('category'),
+            Product.selling_price,
+            func.sum(MerchantProductDailySales.units_sold).label('quantity'),
+            func.sum(MerchantProductDailySales.revenue).label('revenue'),
+        )
+        .join(Product, Product.product_id == MerchantProductDailySales.product_id)
+        .join(Category, Category.category_id == Product.category_id)
+        .filter(MerchantProductDailySales.merchant_id == merchant_id, tuple_(_p_month, _p_year).in_(months))
+        .group_by(_p_year, _p_month, Product.product_name, Category.name, Product.selling_price)
+        .order_by('year', 'month')
+    )
+
+
+def category_revenue(merchant_id, since):
+    """[(category_name, revenue)] since a date, highest first."""
+    revenue = func.sum(MerchantProductDailySales.revenue)
+    return (
+        db.session.query(Category.name.label('category'), revenue.label('revenue'))
+        .join(Product, Product.category_id == Category.category_id)
+        .join(MerchantProductDailySales, MerchantProductDailySales.product_id == Product.product_id)
+        .filter(MerchantProductDailySales.merchant_id == merchant_id, MerchantProductDailySales.sales_date >= since)
+        .group_by(Category.name)
+        .order_by(revenue.desc())
+        .all()
+    )
@@ -0,0 +1,177 @@
+# services/serviceability_cache.py
+"""Cached ShipRocket serviceability answers.
+
+Every cart and checkout view asked ShipRocket, live, which couriers serve a
+pincode pair and at what rate. That answer depends on the pickup and delivery
+pincodes, the weight slab and whether the shipment is COD, and it changes rarely.
+It is now cached under exactly those inputs, quantised:
+
+- Weight is rounded up to SHIPROCKET_SERVICEABILITY_WEIGHT_BAND (default 0.5kg,
+  ShipRocket's own slab), and the band is what gets quoted. So 0.3kg and 0.45kg
+  share one entry and the rate shown covers either.
+- The COD amount is rounded up to SHIPROCKET_SERVICEABILITY_COD_BAND, because COD
+  charges scale with the amount. A prepaid quote has amount 0.
+
+Answers that have couriers live for SHIPROCKET_SERVICEABILITY_TTL_SECONDS.
+"Unserviceable" answers are cached too, for the shorter
+SHIPROCKET_SERVICEABILITY_NEGATIVE_TTL_SECONDS, so a pincode that nobody serves
+does not cost a round trip on every view either. Errors and timeouts are never
+cached.
+
+Entries go to Redis when it is reachable, so all workers share them, and to a
+small in-process map otherwise. Booking a shipment bypasses the cache and asks
+with the real weight (ShipRocketController.check_serviceability(use_cache=False)).
+
+prefetch() warms the cache for merchants' pickup pincodes against the most
+common delivery pincodes; scripts/prefetch_serviceability.py runs it.
+"""
+import copy
+import json
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from common.metrics import record_cache
+
+_LOCAL_MAX_ENTRIES = 5000
+_local = {}
+_local_lock = threading.Lock()
+
+
+def enabled():
+    return bool(current_app.config.get('SHIPROCKET_SERVICEABILITY_CACHE_ENABLED', True))
+
+
+def _round_up(value, band):
+    if band <= 0:
+        return value
+    return round(math.ceil(round(value / band, 6)) * band, 3)
+
+
+def quantise(weight, cod_amount):
+    """(weight_kg, cod_amount) as quoted and cached."""
+    config = current_app.config
+    weight = _round_up(float(weight), float(config.get('SHIPROCKET_SERVICEABILITY_WEIGHT_BAND', 0.5)))
+    cod_amount = float(cod_amount or 0)
+    if cod_amount > 0:
+        cod_amount = _round_up(cod_amount, float(config.get('SHIPROCKET_SERVICEABILITY_COD_BAND', 500)))
+    return weight, cod_amount
+
+
+def cache_key(pickup_pincode, delivery_pincode, weight, cod_amount):
+    return f"shiprocket:svc:{pickup_pincode}:{delivery_pincode}:{weight:g}:{cod_amount:g}"
+
+
+def _redis_call(method, *args, **kwargs):
+    from services.shiprocket_client import get_shiprocket_client
+    return get_shiprocket_client().redis_call(method, *args, **kwargs)
+
+
+def get(key):
+    """The cached response, or None. Callers get their own copy."""
+    raw = _redis_call('get', key)
+    if raw is not None:
+        record_cache('shiprocket_serviceability', True)
+        return json.loads(raw)
+    with _local_lock:
+        entry = _local.get(key)
+        if entry is not None and entry[0] <= time.monotonic():
+            _local.pop(key, None)
+            entry = None
+    record_cache('shiprocket_serviceability', entry is not None)
+    return copy.deepcopy(entry[1]) if entry is not None else None
+
+
+def put(key, response):
+    """Store a successful answer; unserviceable ones for the negative TTL."""
+    config = current_app.config
+    serviceable = bool((response.get('data') or {}).get('available_courier_companies'))
+    ttl = int(config.get('SHIPROCKET_SERVICEABILITY_TTL_SECONDS' if serviceable
+                         else 'SHIPROCKET_SERVICEABILITY_NEGATIVE_TTL_SECONDS',
+                         6 * 3600 if serviceable else 3600))
+    if ttl <= 0:
+        return
+    _redis_call('setex', key, ttl, json.dumps(response, default=str))
+    with _local_lock:
+        if len(_local) >= _LOCAL_MAX_ENTRIES:
+            # Drop whatever expires soonest; the map is a fallback, not the store.
+            for stale in sorted(_local, key=lambda k: _local[k][0])[:_LOCAL_MAX_ENTRIES // 10]:
+                _local.pop(stale, None)
+        _local[key] = (time.monotonic() + ttl, copy.deepcopy(response))
+
+
+def clear_local():
+    with _local_lock:
+        _local.clear()
+
+
+# --------------------------------------------------------------------------- #
+# Prefetch
+# --------------------------------------------------------------------------- #
+
+def top_delivery_pincodes(limit=50, days=90):
+    """The delivery pincodes that recent orders shipped to most often."""
+    from common.database import db
+    from models.order import Order
+    from models.user_address import UserAddress
+
+    since = datetime.utcnow() - timedelta(days=days)
+    rows = (
+        db.session.query(UserAddress.postal_code, db.func.count(Order.order_id))
+        .join(Order, Order.shipping_address_id == UserAddress.address_id)
+        .filter(Order.created_at >= since)
+        .group_by(UserAddress.postal_code)
+        .order_by(db.func.count(Order.order_id).desc())
+        .limit(limit)
+        .all()
+    )
+    return [code.strip() for code, _ in rows if code and len(code.strip()) == 6]
+
+
+def pickup_pincodes(merchant_ids=None):
+    """{merchant_id: pickup pincode} from merchant profiles."""
+    from auth.models.models import MerchantProfile
+
+    query = MerchantProfile.query.with_entities(MerchantProfile.id, MerchantProfile.postal_code)
+    if merchant_ids:
+        query = query.filter(MerchantProfile.id.in_(merchant_ids))
+    return {mid: code.strip() for mid, code in query.all() if code and len(code.strip()) == 6}
+
+
+def prefetch(pickups, deliveries, weights=(0.5, 1.0, 2.0), cod_amounts=(0,), workers=8):
+    """Quote every pickup x delivery x weight x COD combination into the cache.
+
+    Runs on `workers` threads over the shared ShipRocket session. Returns
+    {'quoted', 'serviceable', 'failed'}.
+    """
+    from controllers.shiprocket_controller import ShipRocketController
+
+    app = current_app._get_current_object()
+    combos = sorted({
+        (pickup, delivery) + quantise(weight, cod)
+        for pickup in set(pickups) for delivery in set(deliveries)
+        for weight in weights for cod in cod_amounts
+        if pickup != delivery
+    })
+
+    def quote(combo):
+        pickup, delivery, weight, cod = combo
+        with app.app_context():
+            response = ShipRocketController().check_serviceability(
+                pickup, delivery, weight, cod=cod, refresh=True)
+            # Only real answers are stored, so a missing entry means the call failed.
+            if get(cache_key(pickup, delivery, weight, cod)) is None:
+                return 'failed'
+        return 'serviceable' if response['data']['available_courier_companies'] else 'quoted'
+
+    stats = {'quoted': 0, 'serviceable': 0, 'failed': 0}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for outcome in pool.map(quote, combos):
+            stats['quoted'] += outcome != 'failed'
+            stats['serviceable'] += outcome == 'serviceable'
+            stats['failed'] += outcome == 'failed'
+    return stats
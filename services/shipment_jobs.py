@@ -0,0 +1,416 @@
+# services/shipment_jobs.py
+"""Create ShipRocket shipments for a confirmed order in the background.
+
+Confirming a multi-merchant order used to book every merchant's shipment inside the
+request, one merchant after another. Each booking is five dependent calls: pickup
+location get-or-create, serviceability, order create, AWB assignment and pickup
+generation. enqueue_order() and enqueue_shop() now write one ShipmentJob row per
+merchant (or shop order) and return straight away with the rows 'processing'.
+
+With SHIPMENT_JOBS_BACKGROUND on, the rows go to one process-wide pool of
+SHIPMENT_JOB_WORKERS threads, so merchants are booked side by side and a burst of
+confirmations cannot start more than that many bookings at once. With it off
+(tests, local runs) they run in the calling request, one after another.
+
+Each step is retried up to SHIPMENT_JOB_STEP_ATTEMPTS times with exponential backoff.
+Its result is committed with the row before the next step starts. A row that still
+fails is marked 'failed', keeps its step and can be retried (retry_job). A row that
+stops being updated for SHIPMENT_JOB_STALE_SECONDS, for example because the worker
+restarted, is picked up again by sweep(). Both carry on from the saved step.
+
+Order create is never retried in place unless the connection failed before the
+request went out (ShipRocketNotSent). After a timeout, a 5xx or an error body,
+ShipRocket may have created the order, so the row fails instead. The step records
+that it sent the request before sending it; a later run (retry_job, sweep) first
+looks the order up by our order id and pickup location, and only creates it if
+ShipRocket has none.
+"""
+import time
+from datetime import datetime, timezone
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from common.database import db
+from common.metrics import registry
+from models.enums import ShipmentStatusEnum
+from models.shipment_job import ShipmentJob
+from services.job_runner import JobRunner
+from services.shiprocket_client import ShipRocketNotSent
+
+registry.describe('shipment_job_steps_total', 'ShipRocket shipment job steps by step and outcome.')
+
+
+class ShipmentJobError(Exception):
+    """A step failed. retryable=False stops the step's retries (bad data, no courier)."""
+
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+# Claims leave the status alone: a job is 'processing' from enqueue to its end.
+runner = JobRunner('shipment job', ShipmentJob, 'job_id', (ShipmentJob.STATUS_PROCESSING,),
+                   background='SHIPMENT_JOBS_BACKGROUND', workers=('SHIPMENT_JOB_WORKERS', 8),
+                   stale_seconds=('SHIPMENT_JOB_STALE_SECONDS', 300))
+start = runner.start
+
+
+# --------------------------------------------------------------------------- #
+# Enqueue
+# --------------------------------------------------------------------------- #
+
+def _upsert(kind, order_id, party_id, delivery_address_id, courier_id, pickup_address_id=None):
+    """The row for this party. A finished one is returned as is; a failed one is
+    reopened at its saved step."""
+    job = ShipmentJob.query.filter_by(kind=kind, order_id=order_id, party_id=party_id).first()
+    if job is None:
+        try:
+            with db.session.begin_nested():
+                job = ShipmentJob(kind=kind, order_id=order_id, party_id=party_id,
+                                  pickup_address_id=pickup_address_id,
+                                  delivery_address_id=delivery_address_id, courier_id=courier_id,
+                                  status=ShipmentJob.STATUS_PROCESSING,
+                                  step=ShipmentJob.STEP_PICKUP_LOCATION, progress={})
+                db.session.add(job)
+            return job
+        except IntegrityError:
+            # A concurrent confirmation inserted it first (uq_shipment_job_party).
+            job = ShipmentJob.query.filter_by(kind=kind, order_id=order_id, party_id=party_id).one()
+    if job.status == ShipmentJob.STATUS_FAILED:
+        _reopen(job)
+    return job
+
+
+def _reopen(job):
+    job.status = ShipmentJob.STATUS_PROCESSING
+    job.heartbeat_at = None
+    job.finished_at = None
+
+
+def enqueue_order(order_id, delivery_address_id, courier_id=None):
+    """One job per merchant in the order, started. Returns the summary for the route."""
+    from models.order import Order
+    from models.user_address import UserAddress
+
+    order = Order.query.filter_by(order_id=order_id).first()
+    if not order:
+        raise Exception(f"Order {order_id} not found")
+    if not UserAddress.query.filter_by(address_id=delivery_address_id).first():
+        raise Exception(f"Delivery address {delivery_address_id} not found")
+
+    merchant_ids = sorted({item.merchant_id for item in order.items if item.merchant_id})
+    if not merchant_ids:
+        raise Exception("No merchant items found in order")
+    current_app.logger.info(f"Queueing ShipRocket shipments for order {order_id}: merchants {merchant_ids}")
+
+    jobs = [_upsert(ShipmentJob.KIND_ORDER, order_id, merchant_id, delivery_address_id, courier_id)
+            for merchant_id in merchant_ids]
+    db.session.commit()
+    start([job.job_id for job in jobs])
+    return order_summary(order_id)
+
+
+def enqueue_shop(shop_order_id, shop_id, delivery_address_id, courier_id=None):
+    """The job for one shop order, started. Returns its serialized state."""
+    from models.shop.shop import Shop
+    from models.shop.shop_order import ShopOrder
+    from models.user_address import UserAddress
+
+    if not ShopOrder.query.filter_by(order_id=shop_order_id).first():
+        raise Exception(f"Shop order {shop_order_id} not found")
+    if not Shop.query.filter_by(shop_id=shop_id).first():
+        raise Exception(f"Shop {shop_id} not found")
+    if not UserAddress.query.filter_by(address_id=delivery_address_id).first():
+        raise Exception(f"Delivery address {delivery_address_id} not found")
+
+    job = _upsert(ShipmentJob.KIND_SHOP, shop_order_id, shop_id, delivery_address_id, courier_id)
+    db.session.commit()
+    job_id = job.job_id
+    start([job_id])
+    return db.session.get(ShipmentJob, job_id).serialize()
+
+
+def run_now(kind, order_id, party_id, delivery_address_id, courier_id=None, pickup_address_id=None):
+    """Book one party in the calling thread (single-merchant callers). Returns the job."""
+    job = _upsert(kind, order_id, party_id, delivery_address_id, courier_id, pickup_address_id)
+    db.session.commit()
+    job_id = job.job_id
+    run_job(job_id)
+    db.session.expire_all()
+    return db.session.get(ShipmentJob, job_id)
+
+
+def order_summary(order_id, merchant_id=None):
+    """Per-merchant state of an order's shipment jobs, in the shape the route always returned.
+    With merchant_id, only that merchant's job."""
+    db.session.expire_all()
+    query = ShipmentJob.query.filter_by(kind=ShipmentJob.KIND_ORDER, order_id=order_id)
+    if merchant_id is not None:
+        query = query.filter_by(party_id=merchant_id)
+    jobs = query.order_by(ShipmentJob.party_id).all()
+    by_status = {status: [j.party_id for j in jobs if j.status == status]
+                 for status in (ShipmentJob.STATUS_PROCESSING, ShipmentJob.STATUS_DONE,
+                                ShipmentJob.STATUS_FAILED)}
+    processing = by_status[ShipmentJob.STATUS_PROCESSING]
+    return {
+        "success": not by_status[ShipmentJob.STATUS_FAILED] or bool(by_status[ShipmentJob.STATUS_DONE]),
+        "status": ShipmentJob.STATUS_PROCESSING if processing else "completed",
+        "order_id": order_id,
+        "total_merchants": len(jobs),
+        "successful_merchants": by_status[ShipmentJob.STATUS_DONE],
+        "failed_merchants": by_status[ShipmentJob.STATUS_FAILED],
+        "processing_merchants": processing,
+        "merchant_responses": {job.party_id: job.serialize() for job in jobs},
+    }
+
+
+def retry_job(job_id):
+    """Reopen a failed job at its saved step and start it. Returns the job, or None."""
+    job = db.session.get(ShipmentJob, job_id)
+    if job is None:
+        return None
+    if job.status != ShipmentJob.STATUS_FAILED:
+        raise ShipmentJobError(f"Shipment job is {job.status} and cannot be retried.", retryable=False)
+    _reopen(job)
+    db.session.commit()
+    start([job_id])
+    return db.session.get(ShipmentJob, job_id)
+
+
+# --------------------------------------------------------------------------- #
+# Running
+# --------------------------------------------------------------------------- #
+
+@runner.job
+def run_job(job_id):
+    """Run the job's remaining steps. Returns the job (None if it was not claimable)."""
+    if not runner.claim(job_id):
+        return None
+    job = db.session.get(ShipmentJob, job_id)
+    db.session.refresh(job)
+    steps = _Steps(job)
+    try:
+        while job.step in ShipmentJob.STEPS:
+            result = _with_retries(job, getattr(steps, job.step))
+            progress = dict(job.progress or {})
+            progress.update(result or {})
+            job.progress = progress
+            job.step = ShipmentJob.STEPS[ShipmentJob.STEPS.index(job.step) + 1] \
+                if job.step != ShipmentJob.STEPS[-1] else ShipmentJob.STEP_DONE
+            job.heartbeat_at = datetime.utcnow()
+            db.session.commit()
+        job.status = ShipmentJob.STATUS_DONE
+        job.last_error = None
+        current_app.logger.info(f"ShipRocket shipment booked for {job.kind} {job.order_id} / {job.party_id}")
+    except Exception as e:
+        db.session.rollback()
+        job = db.session.get(ShipmentJob, job_id)
+        job.status = ShipmentJob.STATUS_FAILED
+        job.last_error = str(e)[:2000]
+        current_app.logger.warning(
+            f"ShipRocket shipment failed at {job.step} for {job.kind} {job.order_id} / {job.party_id}: {str(e)}")
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+    return job
+
+
+def _with_retries(job, step_fn):
+    config = current_app.config
+    attempts = max(1, int(config.get('SHIPMENT_JOB_STEP_ATTEMPTS', 3)))
+    backoff = float(config.get('SHIPMENT_JOB_RETRY_BACKOFF_SECONDS', 1.0))
+    step = job.step
+    for attempt in range(1, attempts + 1):
+        try:
+            result = step_fn()
+            registry.inc('shipment_job_steps_total', step=step, outcome='ok')
+            return result
+        except ShipmentJobError as e:
+            if not e.retryable:
+                registry.inc('shipment_job_steps_total', step=step, outcome='failed')
+                raise
+            error = e
+        except Exception as e:
+            error = e
+        db.session.rollback()
+        if attempt < attempts:
+            registry.inc('shipment_job_steps_total', step=step, outcome='retry')
+            current_app.logger.info(f"Shipment job {job.job_id} {step} attempt {attempt} failed: {error}")
+            time.sleep(backoff * 2 ** (attempt - 1))
+    registry.inc('shipment_job_steps_total', step=step, outcome='failed')
+    raise error
+
+
+def sweep(limit=100):
+    """Restart processing jobs that nobody is running any more. Returns how many."""
+    job_ids = runner.stale_ids(limit)
+    if job_ids:
+        start(job_ids)
+    return len(job_ids)
+
+
+# --------------------------------------------------------------------------- #
+# Steps
+# --------------------------------------------------------------------------- #
+
+class _Steps:
+    """The five booking steps for one job. Each returns what to add to job.progress."""
+
+    def __init__(self, job):
+        from controllers.shiprocket_controller import ShipRocketController
+
+        self.job = job
+        self.shiprocket = ShipRocketController()
+        self.is_shop = job.kind == ShipmentJob.KIND_SHOP
+        self._loaded = None
+
+    @property
+    def progress(self):
+        return self.job.progress or {}
+
+    def _load(self):
+        """(order, seller_name, delivery_address, package) from the database."""
+        if self._loaded is not None:
+            return self._loaded
+        from auth.models.models import MerchantProfile
+        from models.user_address import UserAddress
+
+        job = self.job
+        if self.is_shop:
+            from models.shop.shop import Shop
+            from models.shop.shop_order import ShopOrder
+            order = ShopOrder.query.filter_by(order_id=job.order_id).first()
+            seller = Shop.query.filter_by(shop_id=job.party_id).first()
+            seller_name = seller.name if seller else None
+        else:
+            from models.order import Order
+            order = Order.query.filter_by(order_id=job.order_id).first()
+            seller = MerchantProfile.query.filter_by(id=job.party_id).first()
+            seller_name = seller.business_name if seller else None
+        delivery_address = UserAddress.query.filter_by(address_id=job.delivery_address_id).first()
+        if order is None or seller is None or delivery_address is None:
+            raise ShipmentJobError(
+                f"Order, {'shop' if self.is_shop else 'merchant'} or delivery address missing "
+                f"for {job.order_id} / {job.party_id}", retryable=False)
+        package = (self.shiprocket._shop_package(order) if self.is_shop
+                   else self.shiprocket._merchant_package(order, job.party_id))
+        self._loaded = (order, seller, seller_name, delivery_address, package)
+        return self._loaded
+
+    def pickup_location(self):
+        order, seller, _, _, _ = self._load()
+        if self.is_shop:
+            return {
+                'pickup_location': self.shiprocket.get_or_create_shop_pickup_location(self.job.party_id),
+                'pickup_pincode': self.shiprocket._primary_pickup_pincode(),
+            }
+        pincode = seller.postal_code
+        if self.job.pickup_address_id:
+            from models.user_address import UserAddress
+            address = UserAddress.query.filter_by(address_id=self.job.pickup_address_id).first()
+            if address:
+                pincode = address.postal_code
+        return {
+            'pickup_location': self.shiprocket.get_or_create_merchant_pickup_location(self.job.party_id),
+            'pickup_pincode': pincode,
+        }
+
+    def serviceability(self):
+        order, _, _, delivery_address, package = self._load()
+        response = self.shiprocket.check_serviceability(
+            pickup_pincode=self.progress.get('pickup_pincode'),
+            delivery_pincode=delivery_address.postal_code,
+            weight=float(package['weight']),
+            cod=0 if self.shiprocket._is_prepaid(order) else float(order.total_amount),
+            # Booking: the live answer for the real weight, not a cached band.
+            use_cache=False,
+        )
+        available = (response.get('data') or {}).get('available_courier_companies')
+        if not available:
+            # check_serviceability folds errors into an empty answer; keep retrying those.
+            raise ShipmentJobError("No courier services available for this route",
+                                   retryable=bool(response.get('message')))
+        courier = self.shiprocket._select_courier(available, self.job.courier_id)
+
+        shipment = self._shipment()
+        shipment.carrier_name = courier.get('courier_name', 'Unknown')
+        shipment.shipment_status = ShipmentStatusEnum.PENDING_PICKUP
+        shipment.courier_id = courier.get('courier_company_id')
+        shipment.pickup_address_id = self.job.pickup_address_id
+        shipment.delivery_address_id = self.job.delivery_address_id
+        db.session.flush()
+        return {'courier': self.shiprocket._clean_courier_data(courier),
+                'db_shipment_id': shipment.shipment_id}
+
+    def create_order(self):
+        progress = self.progress
+        if progress.get('create_sent'):
+            existing = self.shiprocket.find_order(self.job.order_id, progress['pickup_location'])
+            if existing:
+                return {'shiprocket_order_id': existing['order_id'],
+                        'shiprocket_shipment_id': existing['shipment_id']}
+        order, _, seller_name, delivery_address, package = self._load()
+        payload = self.shiprocket._shiprocket_order_payload(
+            self.job.order_id, order, seller_name, progress['pickup_location'],
+            delivery_address, package)
+        # Saved before the POST, so every later run looks the order up first.
+        self.job.progress = dict(progress, create_sent=True)
+        db.session.commit()
+        try:
+            response = self.shiprocket.create_order(payload)
+        except ShipRocketNotSent:
+            raise
+        except Exception as e:
+            raise ShipmentJobError(
+                f"{e}. ShipRocket may have created the order; a retry looks it up before creating it again.",
+                retryable=False)
+        if response.get('status') != 200:
+            raise ShipmentJobError(
+                f"ShipRocket order creation failed: {response.get('message', 'Unknown error')}", retryable=False)
+        return {'shiprocket_order_id': response['data']['order_id'],
+                'shiprocket_shipment_id': response['data']['shipment_id']}
+
+    def assign_awb(self):
+        response = self.shiprocket.assign_awb(self.progress['shiprocket_shipment_id'],
+                                              self.progress['courier']['courier_company_id'])
+        if response.get('status') != 200:
+            raise ShipmentJobError(f"AWB assignment failed: {response.get('message', 'Unknown error')}")
+        return {'awb_code': response['data']['awb_code'],
+                'courier_name': response['data']['courier_name']}
+
+    def generate_pickup(self):
+        progress = self.progress
+        response = self.shiprocket.generate_pickup(progress['shiprocket_shipment_id'])
+        if response.get('status') != 200:
+            raise ShipmentJobError(f"Pickup generation failed: {response.get('message', 'Unknown error')}")
+        now = datetime.now(timezone.utc)
+        shipment = self._shipment()
+        shipment.shiprocket_order_id = progress['shiprocket_order_id']
+        shipment.shiprocket_shipment_id = progress['shiprocket_shipment_id']
+        shipment.awb_code = progress['awb_code']
+        shipment.tracking_number = progress['awb_code']
+        shipment.carrier_name = progress['courier_name']
+        shipment.shipment_status = ShipmentStatusEnum.LABEL_CREATED
+        shipment.shipped_date = now
+        shipment.pickup_generated = True
+        shipment.pickup_generated_at = now
+        return {}
+
+    def _shipment(self):
+        """The Shipment (or ShopShipment) row for this job, created if missing."""
+        if self.is_shop:
+            from models.shop.shop_shipment import ShopShipment
+            shipment = ShopShipment.query.filter_by(shop_order_id=self.job.order_id,
+                                                    shop_id=self.job.party_id).first()
+            if shipment is None:
+                shipment = ShopShipment(shop_order_id=self.job.order_id, shop_id=self.job.party_id,
+                                        shipment_status=ShipmentStatusEnum.PENDING_PICKUP)
+                db.session.add(shipment)
+            return shipment
+        from models.shipment import Shipment
+        shipment = Shipment.query.filter_by(order_id=self.job.order_id, merchant_id=self.job.party_id).first()
+        if shipment is None:
+            shipment = Shipment(order_id=self.job.order_id, merchant_id=self.job.party_id,
+                                shipment_status=ShipmentStatusEnum.PENDING_PICKUP)
+            db.session.add(shipment)
+        return shipment
@@ -0,0 +1,289 @@
+# services/shiprocket_client.py
+"""One ShipRocket API client per process.
+
+Every shipping route built a new ShipRocketController, and the controller kept its
+auth token on the instance, so each request logged in to ShipRocket again before
+making the call it actually needed. Every call also used a bare requests.get/post,
+which opened a new TLS connection each time.
+
+get_shiprocket_client() returns a shared client instead:
+
+- The token is cached in the process and in Redis (when reachable), so one login
+  serves every request in every gunicorn worker until it nears expiry. Refreshes
+  are serialised by a lock in the process and a short SET NX lock in Redis, so an
+  expired token causes one login, not one per waiting request. A 401 drops the
+  token and retries once with a fresh login.
+- Calls share one requests.Session whose adapter keeps SHIPROCKET_HTTP_POOL_SIZE
+  connections alive. Connection failures are retried for every method. 429/5xx
+  responses are retried for GETs only, because repeating a POST could create a
+  second order or pickup.
+- Each call is timed into the metrics registry as
+  shiprocket_request_duration_seconds{endpoint, status}. Numeric path segments are
+  folded into ':id' so AWB codes and shipment ids do not become labels.
+"""
+import hashlib
+import re
+import threading
+import time
+
+import requests
+from flask import current_app
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from common.cache import get_redis_client
+from common.metrics import registry
+
+registry.describe('shiprocket_request_duration_seconds', 'ShipRocket API latency by endpoint.')
+registry.describe('shiprocket_logins_total', 'ShipRocket auth/login calls.')
+
+DEFAULT_BASE_URL = "https://apiv2.shiprocket.in/v1/external"
+_REDIS_RETRY_SECONDS = 60
+
+
+class ShipRocketError(Exception):
+    """A ShipRocket call failed. Messages match what the controller always raised."""
+
+
+class ShipRocketTimeout(ShipRocketError):
+    """No answer in time. The call may still have gone through, so a POST is not
+    safe to repeat blindly."""
+
+
+class ShipRocketNotSent(ShipRocketError):
+    """The connection failed before the request went out, so any call is safe to
+    repeat."""
+
+
+def _endpoint_label(endpoint):
+    path = endpoint.split('?', 1)[0].strip('/')
+    return '/'.join(':id' if re.search(r'\d', part) else part for part in path.split('/'))
+
+
+def _never_sent(error):
+    """True if requests failed while connecting (DNS, refused), before sending anything."""
+    from urllib3.exceptions import NewConnectionError
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(error, requests.exceptions.ConnectionError) and isinstance(reason, NewConnectionError)
+
+
+class ShipRocketClient:
+    """Thread-safe; share one instance (get_shiprocket_client)."""
+
+    def __init__(self, email, password, base_url=DEFAULT_BASE_URL, timeout=10,
+                 pool_size=20, retries=2, token_ttl=23 * 3600, redis_client=None, app=None):
+        self.email = email
+        self.password = password
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.token_ttl = token_ttl
+        self._app = app
+        self._redis = redis_client
+        self._redis_checked_at = time.monotonic() if redis_client is not None else None
+        self._token = None
+        self._token_expires = 0.0
+        self._lock = threading.Lock()
+        account = hashlib.sha1((email or '').encode()).hexdigest()[:12]
+        self._token_key = f"shiprocket:token:{account}"
+        self._login_lock_key = f"shiprocket:login-lock:{account}"
+
+        self.session = requests.Session()
+        retry = Retry(
+            total=retries, connect=retries, read=retries, status=retries,
+            backoff_factor=0.3,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({'GET'}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    # ------------------------------------------------------------------ #
+    # token
+    # ------------------------------------------------------------------ #
+
+    def _redis_client(self):
+        """Redis, or None. A failed connection is retried once a minute, not per call."""
+        now = time.monotonic()
+        if self._redis is None and (self._redis_checked_at is None
+                                    or now - self._redis_checked_at > _REDIS_RETRY_SECONDS):
+            self._redis_checked_at = now
+            self._redis = get_redis_client(self._app)
+        return self._redis
+
+    def redis_call(self, method, *args, **kwargs):
+        """Run one Redis command, or return None if Redis is down. Shared with the
+        ShipRocket caches (services/serviceability_cache.py)."""
+        client = self._redis_client()
+        if client is None:
+            return None
+        try:
+            return getattr(client, method)(*args, **kwargs)
+        except Exception as e:
+            current_app.logger.warning(f"ShipRocket token cache unavailable: {str(e)}")
+            self._redis = None
+            return None
+
+    def token(self):
+        """A valid bearer token, logging in only when no cache has one."""
+        if self._token and time.monotonic() < self._token_expires:
+            return self._token
+        with self._lock:
+            if self._token and time.monotonic() < self._token_expires:
+                return self._token
+            shared = self.redis_call('get', self._token_key)
+            if shared:
+                ttl = self.redis_call('ttl', self._token_key)
+                self._remember(shared.decode() if isinstance(shared, bytes) else shared,
+                               ttl if isinstance(ttl, int) and ttl > 0 else 300)
+                return self._token
+
+            # Another worker may be logging in right now; give it a moment to publish.
+            locked = self.redis_call('set', self._login_lock_key, '1', nx=True, ex=15)
+            if self._redis is not None and not locked:
+                for _ in range(20):
+                    time.sleep(0.25)
+                    shared = self.redis_call('get', self._token_key)
+                    if shared:
+                        self._remember(shared.decode() if isinstance(shared, bytes) else shared, 300)
+                        return self._token
+            try:
+                token = self._login()
+                self.redis_call('setex', self._token_key, self.token_ttl, token)
+            finally:
+                if locked:
+                    self.redis_call('delete', self._login_lock_key)
+            self._remember(token, self.token_ttl)
+            return token
+
+    def _remember(self, token, ttl):
+        self._token = token
+        self._token_expires = time.monotonic() + ttl
+
+    def invalidate_token(self, token=None):
+        """Forget the token (after a 401). Only drops the shared copy if it is the same one."""
+        with self._lock:
+            if token is None or token == self._token:
+                self._token, self._token_expires = None, 0.0
+            shared = self.redis_call('get', self._token_key)
+            if shared is not None and (token is None or
+                                       (shared.decode() if isinstance(shared, bytes) else shared) == token):
+                self.redis_call('delete', self._token_key)
+
+    def _login(self):
+        url = f"{self.base_url}/auth/login"
+        registry.inc('shiprocket_logins_total')
+        start = time.perf_counter()
+        status = 'error'
+        try:
+            response = self.session.post(url, json={"email": self.email, "password": self.password},
+                                         timeout=self.timeout)
+            status = f"{response.status_code // 100}xx"
+            response.raise_for_status()
+        except requests.exceptions.Timeout:
+            current_app.logger.error(f"ShipRocket authentication timeout: {url}")
+            raise ShipRocketError(
+                f"Failed to authenticate with ShipRocket: Request timed out after {self.timeout:g} seconds")
+        except requests.exceptions.RequestException as e:
+            current_app.logger.error(f"ShipRocket authentication failed: {str(e)}")
+            raise ShipRocketError("Failed to authenticate with ShipRocket")
+        finally:
+            registry.observe('shiprocket_request_duration_seconds', time.perf_counter() - start,
+                             endpoint='auth/login', status=status)
+        token = (response.json() or {}).get('token')
+        if not token:
+            raise ShipRocketError("Failed to authenticate with ShipRocket")
+        return token
+
+    # ------------------------------------------------------------------ #
+    # calls
+    # ------------------------------------------------------------------ #
+
+    def request(self, method, endpoint, data=None, params=None):
+        """Authenticated call; returns the decoded JSON body. Raises ShipRocketError."""
+        method = method.upper()
+        if method not in ('GET', 'POST'):
+            raise ValueError(f"Unsupported HTTP method: {method}")
+        url = f"{self.base_url}/{endpoint}"
+        current_app.logger.info(f"Making {method} request to {url}")
+        if params:
+            current_app.logger.info(f"Request params: {params}")
+        if data:
+            current_app.logger.info(f"Request data: {data}")
+
+        for attempt in (1, 2):
+            token = self.token()
+            response = self._send(method, url, endpoint, token, data, params)
+            # An expired or revoked token: log in again once, then give up.
+            if response.status_code == 401 and attempt == 1:
+                current_app.logger.info("ShipRocket token rejected; logging in again")
+                self.invalidate_token(token)
+                continue
+            break
+
+        current_app.logger.info(f"ShipRocket API response status: {response.status_code}")
+        if response.status_code >= 400:
+            error_content = response.text
+            current_app.logger.error(f"ShipRocket API error response: {error_content}")
+            raise ShipRocketError(
+                f"ShipRocket API request failed: {response.status_code} {response.reason}: {error_content}")
+        return response.json()
+
+    def _send(self, method, url, endpoint, token, data, params):
+        headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
+        start = time.perf_counter()
+        status = 'error'
+        try:
+            response = self.session.request(method, url, headers=headers, params=params,
+                                            json=data if method == 'POST' else None,
+                                            timeout=self.timeout)
+            status = f"{response.status_code // 100}xx"
+            return response
+        except requests.exceptions.ConnectTimeout:
+            current_app.logger.error(f"ShipRocket API connect timeout: {method} {url}")
+            raise ShipRocketNotSent(f"ShipRocket API connection timed out after {self.timeout:g} seconds")
+        except requests.exceptions.Timeout:
+            current_app.logger.error(f"ShipRocket API timeout: {method} {url}")
+            raise ShipRocketTimeout(f"ShipRocket API request timed out after {self.timeout:g} seconds")
+        except requests.exceptions.RequestException as e:
+            current_app.logger.error(f"ShipRocket API error: {method} {url} - {str(e)}")
+            if _never_sent(e):
+                raise ShipRocketNotSent(f"ShipRocket API request failed: {str(e)}")
+            raise ShipRocketError(f"ShipRocket API request failed: {str(e)}")
+        finally:
+            registry.observe('shiprocket_request_duration_seconds', time.perf_counter() - start,
+                             endpoint=_endpoint_label(endpoint), status=status)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_shiprocket_client():
+    """The process-wide client, built from config on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                config = current_app.config
+                _client = ShipRocketClient(
+                    email=config.get('SHIPROCKET_EMAIL'),
+                    password=config.get('SHIPROCKET_PASSWORD'),
+                    base_url=config.get('SHIPROCKET_BASE_URL') or DEFAULT_BASE_URL,
+                    timeout=config.get('SHIPROCKET_TIMEOUT_SECONDS', 10),
+                    pool_size=config.get('SHIPROCKET_HTTP_POOL_SIZE', 20),
+                    retries=config.get('SHIPROCKET_HTTP_RETRIES', 2),
+                    token_ttl=config.get('SHIPROCKET_TOKEN_TTL_SECONDS', 23 * 3600),
+                    app=current_app._get_current_object(),
+                )
+    return _client
+
+
+def reset_shiprocket_client():
+    """Drop the shared client (tests, or after changing credentials)."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.session.close()
+        _client = None
@@ -1,16 +1,105 @@
-"""AWS Translate with Redis-backed cache. If Redis is unavailable, see docs/backend_cache_redis.md."""
+"""AWS Translate with an in-process LRU and a Redis-backed cache.
+
+A lookup goes to the LRU first, then Redis, then AWS:
+- The LRU holds TRANSLATE_LRU_SIZE translations per process.
+- Redis is read with one MGET for the whole batch and written with one pipeline.
+  Without Redis (None, or erroring mid-request) the service still works on the
+  LRU alone. See docs/backend_cache_redis.md.
+- AWS is only asked for misses. Short plain-text strings are packed into one
+  newline-joined request of up to TRANSLATE_PACK_MAX_BYTES. A pack whose answer
+  does not split back into the same number of lines is translated string by
+  string instead.
+- Requests run on one process-wide pool of TRANSLATE_MAX_CONCURRENCY threads,
+  which caps how hard a burst of product pages can hit the AWS rate limit.
+"""
 import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Tuple
 from flask import current_app
 from common.cache import get_redis_client
+from common.metrics import registry
 import boto3
 
+registry.describe('translate_lookups_total', 'Translation lookups by the layer that answered (lru, redis, aws).')
+registry.describe('translate_requests_total', 'AWS Translate requests by kind (single, packed, unpacked).')
+
+PACK_DELIMITER = '\n'
+
+
+class _LRU:
+    """A thread-safe least-recently-used map of at most maxsize entries."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_lru = None
+_executor = None
+_clients = {}
+_lock = threading.Lock()
+
+
+def _local_cache():
+    global _lru
+    if _lru is None:
+        with _lock:
+            if _lru is None:
+                _lru = _LRU(int(current_app.config.get('TRANSLATE_LRU_SIZE', 10000)))
+    return _lru
+
+
+def _pool():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=max(1, int(current_app.config.get('TRANSLATE_MAX_CONCURRENCY', 8))),
+                    thread_name_prefix='translate',
+                )
+    return _executor
+
+
+def _translate_client(region):
+    # boto3 clients are thread-safe and slow to build; one per region is plenty.
+    with _lock:
+        if region not in _clients:
+            _clients[region] = boto3.client('translate', region_name=region)
+        return _clients[region]
+
 
 class AmazonTranslateService:
-    def __init__(self):
-        region = current_app.config.get('AWS_REGION')
-        self.client = boto3.client('translate', region_name=region)
-        self.redis = get_redis_client(current_app)
+    def __init__(self, client=None, redis_client=None):
+        self.client = client or _translate_client(current_app.config.get('AWS_REGION'))
+        self.redis = redis_client if redis_client is not None else get_redis_client(current_app)
+        self.lru = _local_cache()
+        self.ttl_seconds = int(current_app.config.get('TRANSLATE_CACHE_TTL_SECONDS', 60 * 60 * 24 * 30))
+        self.pack_max_chars = int(current_app.config.get('TRANSLATE_PACK_MAX_CHARS', 200))
+        self.pack_max_bytes = int(current_app.config.get('TRANSLATE_PACK_MAX_BYTES', 4500))
 
     @staticmethod
     def _cache_key(text: str, src: str, tgt: str, content_type: str) -> str:
@@ -19,66 +108,147 @@ class AmazonTranslateService:
         key_hash = h.hexdigest()
         return f"translate:{src}:{tgt}:{content_type}:{key_hash}"
 
-    def translate_text(self, text: str, target_lang: str, source_lang: str = 'en', content_type: str = 'text/plain', ttl_seconds: int = 60*60*24*30) -> str:
+    def translate_text(self, text: str, target_lang: str, source_lang: str = 'en', content_type: str = 'text/plain', ttl_seconds: int = None) -> str:
         if not text:
             return ''
-        key = self._cache_key(text, source_lang, target_lang, content_type)
-        cached = self.redis.get(key)
-        if cached:
-            return cached.decode('utf-8')
-
-        resp = self.client.translate_text(
-            Text=text,
-            SourceLanguageCode=source_lang,
-            TargetLanguageCode=target_lang,
-            Settings={
-                'Formality': 'INFORMAL'
-            },
-            TerminologyNames=[],
-        ) if content_type == 'text/plain' else self.client.translate_text(
-            Text=text,
-            SourceLanguageCode=source_lang,
-            TargetLanguageCode=target_lang,
-            Settings={
-                'Formality': 'INFORMAL'
-            },
-        )
-
-        translated = resp.get('TranslatedText', '')
-        if translated:
-            self.redis.setex(key, ttl_seconds, translated)
-        return translated
+        return self._translate_texts([text], target_lang, source_lang, content_type, ttl_seconds).get(text, '')
 
     def translate_batch(self, items: List[Tuple[str, str]], target_lang: str, source_lang: str = 'en', content_type: str = 'text/plain') -> Dict[str, str]:
-        # items is list of (id, text)
-        result: Dict[str, str] = {}
-        # dedupe identical texts
-        unique_map: Dict[str, List[str]] = {}
-        for id_, text in items:
-            if not text:
-                result[id_] = ''
+        # items is list of (id, text); identical texts are translated once
+        translated = self._translate_texts(dict.fromkeys(text for _, text in items if text),
+                                           target_lang, source_lang, content_type)
+        return {id_: translated.get(text, '') if text else '' for id_, text in items}
+
+    # ------------------------------------------------------------------ #
+    # Cache layers
+    # ------------------------------------------------------------------ #
+
+    def _translate_texts(self, texts, target_lang, source_lang, content_type, ttl_seconds=None):
+        """{text: translation} for every text, asking AWS only for cache misses."""
+        keys = {text: self._cache_key(text, source_lang, target_lang, content_type) for text in texts}
+        found = {}
+        for text, key in keys.items():
+            cached = self.lru.get(key)
+            if cached is not None:
+                found[text] = cached
+        if found:
+            registry.inc('translate_lookups_total', len(found), layer='lru')
+
+        from_redis = self._redis_get({text: keys[text] for text in keys if text not in found})
+        for text, value in from_redis.items():
+            self.lru.set(keys[text], value)
+        found.update(from_redis)
+
+        missing = [text for text in keys if text not in found]
+        if missing:
+            fresh, error = self._translate_missing(missing, source_lang, target_lang, content_type)
+            fresh = {text: value for text, value in fresh.items() if value}
+            for text, value in fresh.items():
+                self.lru.set(keys[text], value)
+            self._redis_set({keys[text]: value for text, value in fresh.items()},
+                            ttl_seconds or self.ttl_seconds)
+            found.update(fresh)
+            if error is not None:
+                raise error
+        return found
+
+    def _redis_get(self, keys_by_text):
+        """{text: translation} found in Redis, in one MGET. {} without Redis."""
+        if not keys_by_text or self.redis is None:
+            return {}
+        texts = list(keys_by_text)
+        try:
+            values = self.redis.mget([keys_by_text[text] for text in texts])
+        except Exception as e:
+            current_app.logger.warning(f"Translation cache read failed: {str(e)}")
+            return {}
+        found = {text: value.decode('utf-8') if isinstance(value, bytes) else value
+                 for text, value in zip(texts, values) if value}
+        if found:
+            registry.inc('translate_lookups_total', len(found), layer='redis')
+        return found
+
+    def _redis_set(self, values_by_key, ttl_seconds):
+        if not values_by_key or self.redis is None:
+            return
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for key, value in values_by_key.items():
+                pipe.setex(key, ttl_seconds, value)
+            pipe.execute()
+        except Exception as e:
+            current_app.logger.warning(f"Translation cache write failed: {str(e)}")
+
+    # ------------------------------------------------------------------ #
+    # AWS
+    # ------------------------------------------------------------------ #
+
+    def _packs(self, texts, content_type):
+        """Texts grouped into requests: short one-line plain texts share one."""
+        packs, current, size = [], [], 0
+        for text in texts:
+            packable = (content_type == 'text/plain' and PACK_DELIMITER not in text
+                        and len(text) <= self.pack_max_chars)
+            if not packable:
+                packs.append([text])
                 continue
-            unique_map.setdefault(text, []).append(id_)
-
-        # first fetch from cache
-        missing_texts: List[str] = []
-        cached_pairs: Dict[str, str] = {}
-        for text, ids in unique_map.items():
-            key = self._cache_key(text, source_lang, target_lang, content_type)
-            cached = self.redis.get(key)
-            if cached:
-                translated = cached.decode('utf-8')
-                cached_pairs[text] = translated
-            else:
-                missing_texts.append(text)
-
-        # translate missing one by one
-        for text in missing_texts:
-            translated = self.translate_text(text, target_lang, source_lang, content_type)
-            cached_pairs[text] = translated
-
-        # map back
-        for text, ids in unique_map.items():
-            for id_ in ids:
-                result[id_] = cached_pairs.get(text, '')
-        return result
+            length = len(text.encode('utf-8')) + 1
+            if current and size + length > self.pack_max_bytes:
+                packs.append(current)
+                current, size = [], 0
+            current.append(text)
+            size += length
+        if current:
+            packs.append(current)
+        return packs
+
+    def _translate_missing(self, texts, source_lang, target_lang, content_type):
+        """({text: translation}, first error or None) for texts nobody has cached."""
+        registry.inc('translate_lookups_total', len(texts), layer='aws')
+        packs = self._packs(texts, content_type)
+        if len(packs) == 1:
+            futures = None
+        else:
+            pool = _pool()
+            futures = [pool.submit(self._translate_pack, pack, source_lang, target_lang, content_type)
+                       for pack in packs]
+
+        translated, error = {}, None
+        for i, pack in enumerate(packs):
+            try:
+                if futures is None:
+                    translated.update(self._translate_pack(pack, source_lang, target_lang, content_type))
+                else:
+                    translated.update(futures[i].result())
+            except Exception as e:
+                current_app.logger.error(f"AWS Translate failed for {len(pack)} text(s): {str(e)}")
+                error = error or e
+        return translated, error
+
+    def _translate_pack(self, pack, source_lang, target_lang, content_type):
+        """{text: translation} for one request's worth of texts. Runs on the pool: no app context."""
+        if len(pack) == 1:
+            registry.inc('translate_requests_total', kind='single')
+            return {pack[0]: self._call(pack[0], source_lang, target_lang, content_type)}
+        registry.inc('translate_requests_total', kind='packed')
+        joined = self._call(PACK_DELIMITER.join(pack), source_lang, target_lang, content_type)
+        parts = joined.split(PACK_DELIMITER)
+        if len(parts) == len(pack):
+            return {text: part if text != text.strip() else part.strip() for text, part in zip(pack, parts)}
+        # The translation merged or split lines; no way to tell which went where.
+        registry.inc('translate_requests_total', len(pack), kind='unpacked')
+        return {text: self._call(text, source_lang, target_lang, content_type) for text in pack}
+
+    def _call(self, text, source_lang, target_lang, content_type):
+        kwargs = {
+            'Text': text,
+            'SourceLanguageCode': source_lang,
+            'TargetLanguageCode': target_lang,
+            'Settings': {
+                'Formality': 'INFORMAL'
+            },
+        }
+        if content_type == 'text/plain':
+            kwargs['TerminologyNames'] = []
+        resp = self.client.translate_text(**kwargs)
+        return resp.get('TranslatedText', '')
@@ -0,0 +1,58 @@
+# services/work_queue.py
+"""Tables used as work queues: claiming due rows and backing off failures.
+
+email_outbox and media_jobs rows wait as 'pending' until next_attempt_at. A worker
+claims a batch by moving each row to its working status ('sending', 'running') and
+stamping locked_at, one conditional UPDATE per row. If another worker got there
+first the UPDATE matches nothing and the row is theirs, so several schedulers and
+worker processes can share one table. A row left in the working status for longer
+than the lock timeout belonged to a worker that died and can be claimed again.
+
+A failed row goes back to 'pending' with next_attempt_at pushed out by backoff().
+"""
+from datetime import datetime, timedelta
+
+from common.database import db
+
+
+def backoff(attempts, base_seconds, max_seconds):
+    """The wait before the next try after `attempts` failures: base, then doubling, capped."""
+    return timedelta(seconds=min(max_seconds, base_seconds * (2 ** max(0, attempts - 1))))
+
+
+def claim_batch(model, key, working_status, batch_size, lock_timeout_seconds):
+    """Move up to batch_size due rows to working_status and return the ones we won.
+
+    model has status, next_attempt_at and locked_at columns and a STATUS_PENDING;
+    key is its primary key column's name. Rows come back in key order.
+    """
+    key = getattr(model, key)
+    now = datetime.utcnow()
+    stale_before = now - timedelta(seconds=lock_timeout_seconds)
+    claimable = db.or_(
+        db.and_(model.status == model.STATUS_PENDING, model.next_attempt_at <= now),
+        db.and_(model.status == working_status, model.locked_at < stale_before),
+    )
+
+    candidate_ids = [
+        row_id for (row_id,) in db.session.query(key)
+        .filter(claimable)
+        .order_by(model.next_attempt_at.asc(), key.asc())
+        .limit(batch_size)
+        .all()
+    ]
+
+    claimed = []
+    for row_id in candidate_ids:
+        # Conditional on what we just read: rowcount is 0 if another worker won.
+        won = model.query.filter(key == row_id, claimable).update(
+            {'status': working_status, 'locked_at': now},
+            synchronize_session=False,
+        )
+        if won:
+            claimed.append(row_id)
+    db.session.commit()
+
+    if not claimed:
+        return []
+    return model.query.filter(key.in_(claimed)).order_by(key).all()
@@ -1,6 +1,7 @@
 import pytest
 
 from app import create_app
+from common.query_audit import QueryAudit
 
 
 @pytest.fixture
@@ -13,3 +14,18 @@ def app():
 @pytest.fixture
 def client(app):
     return app.test_client()
+
+
+@pytest.fixture
+def query_budget():
+    """Fail the test if a block runs too many SQL statements.
+
+        with query_budget(8, max_repeats=2):
+            client.get("/api/products")
+
+    max_repeats catches N+1: the same statement shape run more than that many
+    times. On failure the assertion lists the worst offenders.
+    """
+    def _budget(max_queries=None, max_repeats=None):
+        return QueryAudit(max_queries=max_queries, max_repeats=max_repeats)
+    return _budget
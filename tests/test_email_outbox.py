@@ -0,0 +1,154 @@
+"""Queued outbound mail (services/email_outbox_service.py).
+
+send_email must return without touching SMTP when the outbox is on, and the
+background flush must deliver, retry with backoff, and eventually give up. The file
+sink stands in for the mail server throughout.
+"""
+import email
+import os
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+
+from app import create_app
+from common.database import db
+
+
+@pytest.fixture
+def app(tmp_path):
+    application = create_app("testing")
+    application.config["EMAIL_OUTBOX_ENABLED"] = True
+    application.config["EMAIL_TRANSPORT"] = "file"
+    application.config["EMAIL_FILE_SINK_DIR"] = str(tmp_path / "outbox")
+    application.config["MAIL_DEFAULT_SENDER"] = ("AOIN", "noreply@aoin.test")
+    from services.email_outbox_service import reset_transport
+    reset_transport()
+    with application.app_context():
+        db.create_all()
+        yield application
+        db.session.remove()
+        db.drop_all()
+    reset_transport()
+
+
+def _send(to="buyer@example.com"):
+    from auth.email_utils import send_email
+    return send_email(to, "Your code", "<p>{{ otp }}</p>", {"otp": "123456"})
+
+
+def test_send_email_queues_instead_of_connecting(app):
+    from models.email_outbox import EmailOutbox
+
+    with patch("auth.email_utils.smtplib.SMTP") as smtp:
+        assert _send() is True
+    assert not smtp.called
+
+    row = EmailOutbox.query.one()
+    assert row.status == EmailOutbox.STATUS_PENDING
+    assert row.to_email == "buyer@example.com"
+    assert row.sender == "noreply@aoin.test"
+    body = email.message_from_string(row.raw_message).get_payload()[0]
+    assert "123456" in body.get_payload(decode=True).decode()
+
+
+def test_flush_delivers_through_file_sink(app, tmp_path):
+    from models.email_outbox import EmailOutbox
+    from services.email_outbox_service import flush_outbox
+
+    _send("a@example.com")
+    _send("b@example.com")
+
+    stats = flush_outbox()
+    assert stats == {"sent": 2, "retrying": 0, "failed": 0}
+
+    rows = EmailOutbox.query.order_by(EmailOutbox.outbox_id).all()
+    assert all(r.status == EmailOutbox.STATUS_SENT and r.sent_at for r in rows)
+    written = sorted(os.listdir(tmp_path / "outbox"))
+    assert written == [f"{rows[0].outbox_id}.eml", f"{rows[1].outbox_id}.eml"]
+
+    # Nothing left to do: a second run sends nothing twice.
+    assert flush_outbox()["sent"] == 0
+
+
+def test_failure_backs_off_then_gives_up(app):
+    from models.email_outbox import EmailOutbox
+    from services.email_outbox_service import FileSinkTransport, flush_outbox
+
+    app.config["EMAIL_OUTBOX_MAX_ATTEMPTS"] = 2
+    _send()
+
+    with patch.object(FileSinkTransport, "send", side_effect=OSError("relay down")):
+        assert flush_outbox()["retrying"] == 1
+        row = EmailOutbox.query.one()
+        assert row.status == EmailOutbox.STATUS_PENDING
+        assert row.attempts == 1
+        assert row.next_attempt_at > datetime.utcnow()
+        assert "relay down" in row.last_error
+
+        # Not due yet, so a flush right away leaves it alone.
+        assert flush_outbox() == {"sent": 0, "retrying": 0, "failed": 0}
+
+        row.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+        assert flush_outbox()["failed"] == 1
+
+    row = EmailOutbox.query.one()
+    assert row.status == EmailOutbox.STATUS_FAILED
+    assert row.attempts == 2
+
+
+def test_stale_claim_is_recovered(app):
+    """A row left 'sending' by a worker that died is picked up again."""
+    from models.email_outbox import EmailOutbox
+    from services.email_outbox_service import flush_outbox
+
+    _send()
+    row = EmailOutbox.query.one()
+    row.status = EmailOutbox.STATUS_SENDING
+    row.locked_at = datetime.utcnow() - timedelta(hours=1)
+    db.session.commit()
+
+    assert flush_outbox()["sent"] == 1
+    assert EmailOutbox.query.one().status == EmailOutbox.STATUS_SENT
+
+
+def _mk_user():
+    from auth.models.models import User, UserRole
+    u = User(email="merchant@example.com", first_name="Before", last_name="B",
+             role=UserRole.MERCHANT, is_email_verified=True)
+    u.set_password("StrongPass123")
+    db.session.add(u)
+    db.session.commit()
+    return u
+
+
+def test_transactional_mail_lands_with_the_callers_commit(app):
+    from auth.email_utils import send_email
+    from models.email_outbox import EmailOutbox
+
+    user = _mk_user()
+    user.first_name = "Approved"
+    assert send_email(user.email, "Approved", "<p>ok</p>", {}, in_transaction=True)
+    db.session.rollback()
+    assert EmailOutbox.query.count() == 0 and user.first_name == "Before"
+
+    user.first_name = "Approved"
+    assert send_email(user.email, "Approved", "<p>ok</p>", {}, in_transaction=True)
+    db.session.commit()
+    assert EmailOutbox.query.count() == 1 and user.first_name == "Approved"
+
+
+def test_an_outbox_failure_leaves_the_callers_changes_alone(app):
+    from auth.email_utils import send_email
+
+    user = _mk_user()
+    for in_transaction in (True, False):
+        user.first_name = f"Changed {in_transaction}"
+        with patch("services.email_outbox_service.EmailOutbox", side_effect=RuntimeError("no table")), \
+                patch("auth.email_utils.smtplib.SMTP") as smtp:
+            assert send_email(user.email, "Hi", "<p>hi</p>", {}, in_transaction=in_transaction)
+        assert smtp.called
+        db.session.commit()
+        db.session.expire_all()
+        assert user.first_name == f"Changed {in_transaction}"
@@ -0,0 +1,89 @@
+"""Buffered error monitoring (common/error_monitor.py).
+
+The point of the buffer is that an error storm costs one row per distinct error per
+flush window, not one row per response, and that the buffer stays bounded.
+"""
+import pytest
+
+from app import create_app
+from common.database import db
+from common.error_monitor import ErrorMonitor
+
+
+@pytest.fixture
+def app():
+    application = create_app("testing")
+    with application.app_context():
+        db.create_all()
+        yield application
+        db.session.remove()
+        db.drop_all()
+
+
+def _monitor(app, **overrides):
+    app.config["ERROR_MONITOR_BACKGROUND"] = True  # buffer only; the test flushes
+    app.config.update(overrides)
+    return ErrorMonitor(app)
+
+
+def _record_401(monitor, message="Missing Authorization Header"):
+    monitor.record(
+        service_name="orders.list", error_type="HTTP_401", error_message=message,
+        endpoint="/api/orders", http_method="GET", http_status=401,
+    )
+
+
+def test_identical_errors_collapse_into_one_row(app):
+    from models.system_monitoring import SystemMonitoring
+
+    monitor = _monitor(app)
+    for _ in range(250):
+        _record_401(monitor)
+    _record_401(monitor, message="Token has expired")
+
+    assert SystemMonitoring.query.count() == 0  # nothing written until flush
+    assert monitor.flush() == 2
+
+    rows = {r.error_message: r for r in SystemMonitoring.query.all()}
+    assert rows["Missing Authorization Header"].request_count == 250
+    assert rows["Token has expired"].request_count == 1
+
+    total = db.session.query(db.func.sum(SystemMonitoring.occurrences())).scalar()
+    assert total == 251
+
+
+def test_buffer_is_bounded(app):
+    from models.system_monitoring import SystemMonitoring
+
+    monitor = _monitor(app, ERROR_MONITOR_MAX_PENDING=3)
+    for i in range(10):
+        _record_401(monitor, message=f"distinct {i}")
+
+    assert monitor.flush() == 3
+    assert SystemMonitoring.query.count() == 3
+
+
+def test_4xx_sampling_never_drops_5xx(app):
+    from models.system_monitoring import SystemMonitoring
+
+    monitor = _monitor(app, ERROR_MONITOR_4XX_SAMPLE_RATE=0.0)
+    _record_401(monitor)
+    monitor.record(
+        service_name="orders.create", error_type="OperationalError", error_message="db gone",
+        endpoint="/api/orders", http_method="POST", http_status=500,
+    )
+    monitor.flush()
+
+    rows = SystemMonitoring.query.all()
+    assert [r.http_status for r in rows] == [500]
+
+
+def test_unauthorized_response_is_recorded(app):
+    """End to end: the after_request hook still produces a monitoring row."""
+    from models.system_monitoring import SystemMonitoring
+
+    resp = app.test_client().get("/api/orders/")
+    assert resp.status_code >= 400
+    row = SystemMonitoring.query.filter_by(http_status=resp.status_code).first()
+    assert row is not None
+    assert row.request_count == 1
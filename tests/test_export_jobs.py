@@ -0,0 +1,238 @@
+"""Export jobs: queued by POST, rendered off the request, stored, downloaded once
+done, deduplicated while fresh and cleaned up after retention."""
+import csv
+import io
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+from app import create_app
+from common.database import db
+
+
+@pytest.fixture
+def app(tmp_path):
+    application = create_app("testing")
+    application.config["EXPORT_JOB_LOCAL_DIR"] = str(tmp_path / "exports")
+    with application.app_context():
+        db.create_all()
+        yield application
+        db.session.remove()
+        db.drop_all()
+
+
+def _mk_user(email, role):
+    from auth.models.models import User
+    u = User(email=email, first_name="A", last_name="B", role=role, is_email_verified=True)
+    u.set_password("StrongPass123")
+    db.session.add(u); db.session.flush()
+    return u
+
+
+def _merchant_headers():
+    from flask_jwt_extended import create_access_token
+    from auth.models.models import MerchantProfile, UserRole
+    from models.brand import Brand
+    from models.category import Category
+    from models.product import Product
+    from models.product_stock import ProductStock
+
+    owner = _mk_user("owner@ex.com", UserRole.MERCHANT)
+    m = MerchantProfile(user_id=owner.id, business_name="Acme", business_email="b@ex.com",
+                        business_phone="+919876543210", business_address="1 Rd",
+                        country_code="IN", state_province="MH", city="Pune", postal_code="411001")
+    c = Category(name="Cat", slug="cat")
+    b = Brand(name="Br", slug="br")
+    db.session.add_all([m, c, b]); db.session.flush()
+    for i in range(3):
+        p = Product(merchant_id=m.id, category_id=c.category_id, brand_id=b.brand_id, sku=f"W-{i}",
+                    product_name=f"Widget {i}", product_description="A widget",
+                    cost_price=Decimal("50.00"), selling_price=Decimal("100.00"),
+                    active_flag=True, approval_status="approved")
+        db.session.add(p); db.session.flush()
+        db.session.add(ProductStock(product_id=p.product_id, stock_qty=10))
+    db.session.commit()
+    return {"Authorization": f"Bearer {create_access_token(identity=str(owner.id))}"}
+
+
+def _admin_headers():
+    from flask_jwt_extended import create_access_token
+    from auth.models.models import UserRole
+
+    admin = _mk_user("admin@ex.com", UserRole.SUPER_ADMIN)
+    db.session.commit()
+    return {"Authorization": f"Bearer {create_access_token(identity=str(admin.id))}"}
+
+
+def test_a_job_is_rendered_stored_and_downloaded(app):
+    with app.app_context():
+        headers = _merchant_headers()
+        client = app.test_client()
+
+        resp = client.post("/api/exports", json={"kind": "merchant_inventory", "format": "csv"}, headers=headers)
+        assert resp.status_code == 200, resp.get_data(as_text=True)[:300]
+        job = resp.get_json()["data"]
+        assert job["status"] == "done" and job["download_url"] == f"/api/exports/{job['job_id']}/download"
+
+        status = client.get(f"/api/exports/{job['job_id']}", headers=headers).get_json()["data"]
+        assert status["size_bytes"] > 0 and status["filename"].endswith(".csv")
+
+        download = client.get(job["download_url"], headers=headers)
+        assert download.status_code == 200 and download.mimetype == "text/csv"
+        assert "Widget 2" in download.get_data(as_text=True)
+
+
+def test_a_repeat_request_reuses_the_recent_job(app):
+    from models.export_job import ExportJob
+
+    with app.app_context():
+        headers = _merchant_headers()
+        client = app.test_client()
+        body = {"kind": "merchant_inventory", "format": "excel", "params": {"search": "Widget"}}
+
+        first = client.post("/api/exports", json=body, headers=headers).get_json()["data"]
+        # Unknown parameters are dropped, so they do not make a request look new.
+        again = client.post("/api/exports", json=dict(body, params={"search": "Widget", "x": 1}),
+                            headers=headers).get_json()["data"]
+        other = client.post("/api/exports", json=dict(body, format="csv"), headers=headers).get_json()["data"]
+
+        assert again["job_id"] == first["job_id"] and again["deduplicated"]
+        assert other["job_id"] != first["job_id"] and not other["deduplicated"]
+        assert ExportJob.query.count() == 2
+
+
+def test_requests_are_checked_against_the_kind(app):
+    with app.app_context():
+        merchant = _merchant_headers()
+        client = app.test_client()
+
+        assert client.post("/api/exports", json={"kind": "sales", "format": "csv"},
+                           headers=merchant).status_code == 403
+        assert client.post("/api/exports", json={"kind": "nope", "format": "csv"},
+                           headers=merchant).status_code == 400
+        assert client.post("/api/exports", json={"kind": "merchant_sales", "format": "docx"},
+                           headers=merchant).status_code == 400
+
+        admin = _admin_headers()
+        resp = client.post("/api/exports", json={"kind": "plinko_leads", "format": "csv",
+                                                 "params": {"date_from": "yesterday"}}, headers=admin)
+        assert resp.status_code == 400 and "YYYY-MM-DD" in resp.get_json()["message"]
+        # Another user's job is not visible.
+        job_id = client.post("/api/exports", json={"kind": "merchant_inventory", "format": "csv"},
+                             headers=merchant).get_json()["data"]["job_id"]
+        assert client.get(f"/api/exports/{job_id}", headers=admin).status_code == 404
+
+
+def test_merchant_transactions_export_applies_filters(app):
+    from models.merchant_transaction import MerchantTransaction
+
+    with app.app_context():
+        admin_headers = _admin_headers()
+        for i, status in enumerate(["pending", "paid", "pending"]):
+            db.session.add(MerchantTransaction(
+                order_id=f"ORD-{i}", merchant_id=7, order_amount=Decimal("1000"),
+                platform_fee_percent=Decimal("5"), platform_fee_amount=Decimal("50"),
+                gst_on_fee_amount=Decimal("9"), payment_gateway_fee=Decimal("20"),
+                final_payable_amount=Decimal("921"), payment_status=status,
+                settlement_date=date(2026, 10, 1 + i)))
+        db.session.commit()
+
+        resp = app.test_client().post("/api/exports", json={
+            "kind": "merchant_transactions", "format": "csv", "params": {"status": "pending"},
+        }, headers=admin_headers)
+        job = resp.get_json()["data"]
+        body = app.test_client().get(job["download_url"], headers=admin_headers).get_data(as_text=True)
+        rows = list(csv.reader(io.StringIO(body)))
+
+        assert rows[0][:3] == ["ID", "Order ID", "Merchant ID"]
+        assert [r[1] for r in rows[1:]] == ["ORD-2", "ORD-0"]
+
+
+def test_background_mode_answers_before_rendering(app, monkeypatch):
+    from models.export_job import ExportJob
+    from services import export_jobs
+
+    submitted = []
+
+    class Pool:
+        def submit(self, fn, app_, job_id):
+            submitted.append(job_id)
+
+    monkeypatch.setattr(export_jobs.runner, "pool", lambda: Pool())
+    app.config["EXPORT_JOBS_BACKGROUND"] = True
+    with app.app_context():
+        headers = _merchant_headers()
+        client = app.test_client()
+        resp = client.post("/api/exports", json={"kind": "merchant_sales", "format": "pdf"}, headers=headers)
+
+        assert resp.status_code == 202
+        job = resp.get_json()["data"]
+        assert job["status"] == "queued" and submitted == [job["job_id"]]
+        assert client.get(f"/api/exports/{job['job_id']}/download", headers=headers).status_code == 409
+
+        # The worker picks it up from the pool.
+        export_jobs.run_job(job["job_id"])
+        assert db.session.get(ExportJob, job["job_id"]).status == "done"
+
+
+def test_failures_are_recorded_and_expired_files_removed(app, monkeypatch):
+    from models.export_job import ExportJob
+    from services import export_jobs
+
+    def broken(user_id, export_format, params):
+        return iter([b"partial", None]), "text/csv", "broken.csv"
+
+    monkeypatch.setitem(export_jobs.KINDS, "merchant_sales",
+                        export_jobs.KINDS["merchant_sales"]._replace(render=broken))
+    with app.app_context():
+        headers = _merchant_headers()
+        client = app.test_client()
+        failed = client.post("/api/exports", json={"kind": "merchant_sales", "format": "csv"},
+                             headers=headers).get_json()["data"]
+        assert failed["status"] == "failed" and failed["error"]
+
+        done = client.post("/api/exports", json={"kind": "merchant_inventory", "format": "csv"},
+                           headers=headers).get_json()["data"]
+        job = db.session.get(ExportJob, done["job_id"])
+        path = export_jobs.local_path(job)
+        job.expires_at = datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+
+        assert export_jobs.sweep() == (0, 1)
+        assert export_jobs.local_path(job) is None and path is not None
+        assert client.get(done["download_url"], headers=headers).status_code == 410
+
+
+def test_a_long_render_keeps_its_heartbeat_fresh(app, monkeypatch):
+    from common.exports import query_rows
+    from models.export_job import ExportJob
+    from models.product import Product
+    from services import export_jobs
+
+    seen = []
+
+    def heartbeat():
+        return db.session.query(ExportJob.heartbeat_at).scalar()
+
+    def slow(user_id, export_format, params):
+        # Between fetches of a streamed read, then between chunks written to storage.
+        for _ in query_rows(db.session.query(Product.product_id), batch_size=1):
+            seen.append(heartbeat())
+
+        def chunks():
+            for _ in range(2):
+                seen.append(heartbeat())
+                yield b"row\n"
+        return chunks(), "text/csv", "slow.csv"
+
+    monkeypatch.setitem(export_jobs.KINDS, "merchant_sales",
+                        export_jobs.KINDS["merchant_sales"]._replace(render=slow))
+    app.config["EXPORT_JOB_HEARTBEAT_SECONDS"] = 0
+    with app.app_context():
+        headers = _merchant_headers()
+        job = app.test_client().post("/api/exports", json={"kind": "merchant_sales", "format": "csv"},
+                                     headers=headers).get_json()["data"]
+
+        assert job["status"] == "done"
+        assert len(seen) == 5 and seen == sorted(set(seen))
@@ -0,0 +1,130 @@
+"""Image derivatives: resized WebP copies made on upload, stored beside the original,
+recorded on ProductMedia and exposed as srcset."""
+from io import BytesIO
+
+import pytest
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+
+from app import create_app
+from common.database import db
+
+
+@pytest.fixture
+def app():
+    application = create_app("testing")
+    application.config["IMAGE_DERIVATIVE_WIDTHS"] = [320, 640, 1080]
+    application.config["IMAGE_DERIVATIVE_FORMATS"] = ["webp"]
+    with application.app_context():
+        db.create_all()
+        yield application
+        db.session.remove()
+        db.drop_all()
+
+
+class FakeS3Client:
+    """Records puts and deletes instead of calling AWS."""
+
+    def __init__(self):
+        self.objects = {}
+        self.deleted = []
+
+    def upload_fileobj(self, fileobj, bucket, key, ExtraArgs=None):
+        self.objects[key] = fileobj.read()
+
+    def put_object(self, Bucket, Key, Body, ContentType=None, CacheControl=None):
+        self.objects[Key] = Body
+
+    def delete_object(self, Bucket, Key):
+        self.deleted.append(Key)
+
+    def delete_objects(self, Bucket, Delete):
+        self.deleted.extend(o["Key"] for o in Delete["Objects"])
+
+
+@pytest.fixture
+def s3():
+    from services.s3_service import S3ProductMediaService
+    service = S3ProductMediaService.__new__(S3ProductMediaService)
+    service.bucket_name = "bucket"
+    service.region = "ap-south-1"
+    service.cloudfront_base_url = "https://cdn.test/"
+    service.s3_client = FakeS3Client()
+    return service
+
+
+def _png(width, height, mode="RGB"):
+    out = BytesIO()
+    color = (255, 0, 0, 128) if mode == "RGBA" else "red"
+    Image.new(mode, (width, height), color).save(out, format="PNG")
+    return out.getvalue()
+
+
+def _upload(name, data, content_type):
+    return FileStorage(stream=BytesIO(data), filename=name, content_type=content_type)
+
+
+def test_render_only_downsizes_and_keeps_aspect_ratio(app):
+    from services.image_derivatives import render
+    rendered = render(_png(800, 400))
+    assert [(w, fmt) for w, fmt, _ in rendered] == [(320, "webp"), (640, "webp")]
+    for width, _, body in rendered:
+        with Image.open(BytesIO(body)) as im:
+            assert im.format == "WEBP" and im.size == (width, width // 2)
+
+    # Smaller than every width: one copy at the original size.
+    assert [w for w, _, _ in render(_png(200, 100))] == [200]
+    # Transparency survives.
+    _, _, body = render(_png(400, 400, "RGBA"))[0]
+    with Image.open(BytesIO(body)) as im:
+        assert "A" in im.getbands()
+
+
+def test_animated_images_are_left_alone(app):
+    from services.image_derivatives import render
+    out = BytesIO()
+    frames = [Image.new("RGB", (400, 400), c) for c in ("red", "blue")]
+    frames[0].save(out, format="GIF", save_all=True, append_images=frames[1:])
+    assert render(out.getvalue()) == []
+
+
+def test_product_upload_stores_derivatives_beside_the_original(app, s3):
+    result = s3.upload_product_media(_upload("shoe.png", _png(1200, 900), "image/png"), 12)
+    key = result["s3_key"]
+    stem = key.rsplit(".", 1)[0]
+
+    assert set(s3.s3_client.objects) == {key, f"{stem}_w320.webp", f"{stem}_w640.webp", f"{stem}_w1080.webp"}
+    assert result["derivatives"]["webp"]["640"] == f"https://cdn.test/{stem}_w640.webp"
+    assert s3.s3_client.objects[key][:8] == b"\x89PNG\r\n\x1a\n"   # original untouched
+
+    s3.delete_product_media(key)
+    assert f"{stem}_w320.webp" in s3.s3_client.deleted and key in s3.s3_client.deleted
+
+
+def test_non_raster_uploads_and_plain_assets_get_no_derivatives(app, s3):
+    svg = _upload("logo.svg", b"<svg xmlns='http://www.w3.org/2000/svg'/>", "image/svg+xml")
+    assert "derivatives" not in s3.upload_product_media(svg, 1)
+    profile = s3.upload_profile_image(_upload("me.png", _png(800, 800), "image/png"), 5)
+    assert "derivatives" not in profile
+    review = s3.upload_review_image(_upload("r.png", _png(800, 800), "image/png"), 9)
+    assert set(review["derivatives"]["webp"]) == {"320", "640"}
+
+
+def test_broken_image_still_uploads(app, s3):
+    result = s3.upload_product_media(_upload("bad.jpg", b"not an image", "image/jpeg"), 3)
+    assert "derivatives" not in result
+    assert list(s3.s3_client.objects) == [result["s3_key"]]
+
+
+def test_product_media_serializes_srcset(app):
+    from models.enums import MediaType
+    from models.product_media import ProductMedia
+    from datetime import datetime
+    media = ProductMedia(product_id=1, type=MediaType.IMAGE, url="https://cdn.test/a.jpg",
+                         created_at=datetime.utcnow(), updated_at=datetime.utcnow(),
+                         derivatives={"webp": {"640": "https://cdn.test/a_w640.webp",
+                                               "320": "https://cdn.test/a_w320.webp"}})
+    data = media.serialize()
+    assert data["srcset"] == "https://cdn.test/a_w320.webp 320w, https://cdn.test/a_w640.webp 640w"
+    media.derivatives = None
+    assert media.serialize()["srcset"] is None
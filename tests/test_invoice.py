@@ -8,8 +8,10 @@ from common.database import db
 
 
 @pytest.fixture
-def app():
+def app(tmp_path):
     application = create_app("testing")
+    application.config["INVOICE_CACHE_DIR"] = str(tmp_path / "invoices")
+    application.config["EXPORT_JOB_LOCAL_DIR"] = str(tmp_path / "exports")
     with application.app_context():
         db.create_all()
         yield application
@@ -204,3 +206,163 @@ def test_gst_fallback_when_seller_state_unknown(app):
         data = build_invoice_data(order.order_id, buyer.id)
         assert data["tax_mode"] == "GST"
         assert data["tax_summary"][0]["total_tax"] == Decimal("18.00")
+
+
+def _count_renders(monkeypatch):
+    from services import invoice_cache, invoice_pdf
+    calls = []
+
+    def render(data):
+        calls.append(data["order_id"])
+        return invoice_pdf.render_invoice_pdf(data)
+
+    monkeypatch.setattr(invoice_cache, "render_invoice_pdf", render)
+    return calls
+
+
+def test_invoice_is_rendered_once_and_revalidated(client, app, monkeypatch):
+    from models.enums import PaymentStatusEnum
+    from models.order import Order
+
+    calls = _count_renders(monkeypatch)
+    with app.app_context():
+        m = _mk_merchant(_mk_user("so8@ex.com"))
+        buyer = _mk_user("buyer8@ex.com")
+        order = _mk_paid_order(buyer, m, _mk_address(buyer))
+        oid, bid = order.order_id, buyer.id
+    headers = _login(client, bid)
+
+    first = client.get(f"/api/orders/{oid}/invoice", headers=headers)
+    second = client.get(f"/api/orders/{oid}/invoice", headers=headers)
+    assert calls == [oid]
+    assert second.get_data() == first.get_data() and second.headers["ETag"] == first.headers["ETag"]
+
+    unchanged = client.get(f"/api/orders/{oid}/invoice",
+                           headers=dict(headers, **{"If-None-Match": first.headers["ETag"]}))
+    assert unchanged.status_code == 304 and calls == [oid]
+
+    # New invoice data is a new invoice.
+    with app.app_context():
+        db.session.get(Order, oid).payment_status = PaymentStatusEnum.REFUNDED
+        db.session.commit()
+    refunded = client.get(f"/api/orders/{oid}/invoice", headers=headers)
+    assert refunded.status_code == 200 and refunded.headers["ETag"] != first.headers["ETag"]
+    assert calls == [oid, oid]
+
+
+def test_invoice_served_when_cache_storage_fails(client, app, monkeypatch):
+    from services import invoice_cache
+
+    def broken(*args):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(invoice_cache, "_write", broken)
+    with app.app_context():
+        m = _mk_merchant(_mk_user("so9@ex.com"))
+        buyer = _mk_user("buyer9@ex.com")
+        order = _mk_paid_order(buyer, m, _mk_address(buyer))
+        oid, bid = order.order_id, buyer.id
+
+    resp = client.get(f"/api/orders/{oid}/invoice", headers=_login(client, bid))
+    assert resp.status_code == 200 and resp.get_data()[:4] == b"%PDF"
+
+
+def _mk_orders_in(month_days, paid=True):
+    from datetime import datetime
+    m = _mk_merchant(_mk_user(f"seller{month_days[0]}{paid}@ex.com"))
+    buyer = _mk_user(f"buyer{month_days[0]}{paid}@ex.com")
+    addr = _mk_address(buyer)
+    ids = []
+    for day in month_days:
+        order = _mk_paid_order(buyer, m, addr, paid=paid)
+        order.order_date = datetime(2026, 9, day, 12)
+        ids.append(order.order_id)
+    db.session.commit()
+    return ids
+
+
+def test_render_range_fills_the_cache(app, monkeypatch):
+    from datetime import date
+    from services import invoice_cache
+
+    calls = _count_renders(monkeypatch)
+    with app.app_context():
+        september = _mk_orders_in([1, 15, 30])
+        _mk_orders_in([10], paid=False)
+        invoice_cache.get_or_render(
+            invoice_cache.invoice_data_for_order(db.session.get(invoice_cache.Order, september[0])))
+
+        result = invoice_cache.render_range(date(2026, 9, 1), date(2026, 9, 30))
+        assert (result["orders"], result["rendered"], result["cached"], result["failed"]) == (3, 2, 1, [])
+        assert [order_id for order_id, _ in result["invoices"]] == september
+        assert sorted(calls) == sorted(september)
+
+        again = invoice_cache.render_range(date(2026, 9, 1), date(2026, 9, 30))
+        assert (again["rendered"], again["cached"]) == (0, 3) and len(calls) == 3
+
+
+def test_render_range_in_worker_processes(app):
+    from datetime import date
+    from services import invoice_cache
+
+    with app.app_context():
+        september = _mk_orders_in([2, 3])
+        result = invoice_cache.render_range(date(2026, 9, 1), date(2026, 9, 30), processes=2)
+        assert result["rendered"] == 2
+        for order_id, artifact in result["invoices"]:
+            assert invoice_cache._read(artifact)[:4] == b"%PDF"
+        assert {order_id for order_id, _ in result["invoices"]} == set(september)
+
+
+def test_render_range_keeps_a_bounded_number_of_renders_in_flight(app, monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+    from datetime import date
+    from services import invoice_cache
+
+    submitted, written, outstanding = [], [], []
+    real_write = invoice_cache._write
+
+    class Pool(ThreadPoolExecutor):
+        def submit(self, fn, *args):
+            outstanding.append(len(submitted) - len(written))
+            submitted.append(args)
+            return super().submit(fn, *args)
+
+    monkeypatch.setattr(invoice_cache, "_pool", lambda processes: Pool(max_workers=processes))
+    monkeypatch.setattr(invoice_cache, "_write", lambda artifact, pdf: (written.append(artifact),
+                                                                       real_write(artifact, pdf)))
+    with app.app_context():
+        _mk_orders_in([1, 2, 3, 4, 5, 6])
+        result = invoice_cache.render_range(date(2026, 9, 1), date(2026, 9, 30), processes=1)
+
+    assert result["rendered"] == 6 and len(written) == 6
+    # Two per process: a render is submitted only when at most one is still running.
+    assert max(outstanding) <= 1
+
+
+def test_invoice_archive_export_job(app):
+    import io
+    import zipfile
+    from flask_jwt_extended import create_access_token
+    from auth.models.models import UserRole
+
+    with app.app_context():
+        september = _mk_orders_in([5, 6])
+        admin = _mk_user("finance@ex.com", role=UserRole.SUPER_ADMIN)
+        db.session.commit()
+        headers = {"Authorization": f"Bearer {create_access_token(identity=str(admin.id))}"}
+        client = app.test_client()
+
+        missing = client.post("/api/exports", json={"kind": "invoice_archive", "format": "zip"},
+                              headers=headers).get_json()["data"]
+        assert missing["status"] == "failed" and "from_date" in missing["error"]
+
+        job = client.post("/api/exports", json={
+            "kind": "invoice_archive", "format": "zip",
+            "params": {"from_date": "2026-09-01", "to_date": "2026-09-30"},
+        }, headers=headers).get_json()["data"]
+        assert job["status"] == "done", job
+        download = client.get(job["download_url"], headers=headers)
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(download.response)))
+        assert sorted(archive.namelist()) == sorted(f"invoice_{oid}.pdf" for oid in september)
+        assert archive.read(f"invoice_{september[0]}.pdf")[:4] == b"%PDF"
@@ -0,0 +1,354 @@
+"""Reel uploads store the bytes and return; thumbnail, probe, HLS and mix run from media_jobs.
+
+ffmpeg is never run here: media_tools is replaced with fakes and S3 with a recorder.
+"""
+import os
+from datetime import datetime, timedelta
+from io import BytesIO
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from app import create_app
+from common.database import db
+
+
+@pytest.fixture
+def app(tmp_path):
+    application = create_app("testing")
+    application.config["MEDIA_SPOOL_DIR"] = str(tmp_path / "spool")
+    application.config["MEDIA_SPOOL_SHARED"] = True
+    with application.app_context():
+        db.create_all()
+        yield application
+        db.session.remove()
+        db.drop_all()
+
+
+class FakeS3Client:
+    """Records uploads and serves downloads from the same dict."""
+
+    def __init__(self):
+        self.objects = {}
+        self.downloads = []
+
+    def upload_file(self, path, bucket, key, ExtraArgs=None):
+        with open(path, "rb") as fh:
+            self.objects[key] = fh.read()
+
+    def upload_fileobj(self, fileobj, bucket, key, ExtraArgs=None):
+        self.objects[key] = fileobj.read()
+
+    def download_file(self, bucket, key, path):
+        self.downloads.append(key)
+        with open(path, "wb") as fh:
+            fh.write(self.objects[key])
+
+    def head_object(self, Bucket, Key):
+        from botocore.exceptions import ClientError
+        if Key not in self.objects:
+            raise ClientError({"Error": {"Code": "404", "Message": "Not Found"}}, "HeadObject")
+        return {"ContentLength": len(self.objects[Key])}
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop(Key, None)
+
+    def delete_objects(self, Bucket, Delete):
+        for obj in Delete["Objects"]:
+            self.objects.pop(obj["Key"], None)
+
+    def get_paginator(self, name):
+        objects = self.objects
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix):
+                yield {"Contents": [{"Key": k} for k in sorted(objects) if k.startswith(Prefix)]}
+        return Paginator()
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    from services import reels_s3_service
+    service = reels_s3_service.ReelsS3Service.__new__(reels_s3_service.ReelsS3Service)
+    service.bucket_name = "bucket"
+    service.region = "ap-south-1"
+    service.cloudfront_base_url = "https://cdn.test"
+    service.s3_prefix = "reels/"
+    service.s3_client = FakeS3Client()
+    monkeypatch.setattr(reels_s3_service, "_reels_s3_service_instance", service)
+    return service
+
+
+@pytest.fixture
+def ffmpeg(monkeypatch):
+    """Working fake ffmpeg/ffprobe; tests flip `ok` to simulate failures."""
+    from services import media_tools
+    state = {"ok": True, "thumbnails": 0}
+
+    def extract_thumbnail(video_path, out_path, timeout=30):
+        assert os.path.getsize(video_path) > 0
+        if not state["ok"]:
+            return False
+        state["thumbnails"] += 1
+        with open(out_path, "wb") as fh:
+            fh.write(b"\xff\xd8jpeg")
+        return True
+
+    monkeypatch.setattr(media_tools, "extract_thumbnail", extract_thumbnail)
+    monkeypatch.setattr(media_tools, "probe",
+                        lambda path, timeout=30: {"duration_seconds": 12, "width": 720, "height": 1280})
+    monkeypatch.setattr(media_tools, "ffmpeg_path", lambda: "/usr/bin/ffmpeg" if state["ok"] else None)
+    monkeypatch.setattr(media_tools, "ffprobe_path", lambda: "/usr/bin/ffprobe")
+    return state
+
+
+def _reel(s3, video=b"\x00\x00\x00\x20ftypisom" + b"v" * 4096):
+    from models.reel import Reel
+    reel = Reel(merchant_id=1, platform="aoin", video_url="", video_public_id="", description="d")
+    db.session.add(reel)
+    db.session.flush()
+    upload = FileStorage(stream=BytesIO(video), filename="clip.mp4", content_type="video/mp4")
+    result = s3.upload_reel_video(upload, merchant_id=1, reel_id=reel.reel_id, product_id=5)
+    reel.video_url, reel.video_public_id = result["url"], result["s3_key"]
+    return reel, result
+
+
+def _jobs(reel_id):
+    from models.media_job import MediaJob
+    db.session.expire_all()
+    return {j.kind: j for j in MediaJob.query.filter_by(reel_id=reel_id)}
+
+
+def test_upload_stores_the_bytes_and_runs_no_ffmpeg(app, s3, monkeypatch):
+    from services import media_tools
+
+    def fail(*args, **kwargs):
+        raise AssertionError("ffmpeg ran inside the request")
+    monkeypatch.setattr(media_tools, "extract_thumbnail", fail)
+
+    reel, result = _reel(s3, video=b"abc" * 1000)
+    assert result["thumbnail_url"] is None and result["bytes"] == 3000
+    assert s3.s3_client.objects[result["s3_key"]] == b"abc" * 1000
+    with open(result["source_path"], "rb") as fh:
+        assert fh.read() == b"abc" * 1000
+    assert os.path.dirname(result["source_path"]) == app.config["MEDIA_SPOOL_DIR"]
+
+
+def test_worker_fills_in_thumbnail_probe_and_status(app, s3, ffmpeg):
+    from services import media_job_service
+    reel, result = _reel(s3)
+    media_job_service.enqueue_reel_processing(reel, result["source_path"])
+    db.session.commit()
+    assert reel.serialize(include_reasons=False, include_product=False)["processing_status"] == "processing"
+
+    assert media_job_service.process_jobs() == {"done": 2, "retrying": 0, "failed": 0}
+
+    db.session.refresh(reel)
+    stem = result["s3_key"].rsplit(".", 1)[0]
+    assert reel.thumbnail_url == f"https://cdn.test/{stem}_thumb.jpg"
+    assert s3.s3_client.objects[f"{stem}_thumb.jpg"].startswith(b"\xff\xd8")
+    assert (reel.duration_seconds, reel.resolution, reel.processing_status) == (12, "720x1280", "ready")
+    # The spooled upload was used (no download) and is gone once nothing needs it.
+    assert s3.s3_client.downloads == []
+    assert not os.path.exists(result["source_path"])
+    assert media_job_service.process_jobs() == {"done": 0, "retrying": 0, "failed": 0}
+
+
+def test_without_the_spool_the_video_is_downloaded_once_per_reel(app, s3, ffmpeg):
+    from services import media_job_service
+    reel, result = _reel(s3)
+    media_job_service.discard(result["source_path"])
+    media_job_service.enqueue_reel_processing(reel)
+    db.session.commit()
+
+    media_job_service.process_jobs()
+    assert s3.s3_client.downloads == [result["s3_key"]]
+    assert ffmpeg["thumbnails"] == 1
+
+
+def test_an_unshared_spool_is_deleted_once_s3_has_the_upload(app, s3, ffmpeg):
+    from services import media_job_service
+    app.config["MEDIA_SPOOL_SHARED"] = False
+    reel, result = _reel(s3)
+    assert result["source_path"] is None and result["s3_key"] in s3.s3_client.objects
+    assert os.listdir(app.config["MEDIA_SPOOL_DIR"]) == []
+
+    media_job_service.enqueue_reel_processing(reel, result["source_path"])
+    db.session.commit()
+    assert media_job_service.process_jobs() == {"done": 2, "retrying": 0, "failed": 0}
+    assert s3.s3_client.downloads == [result["s3_key"]]
+
+
+def test_failures_retry_with_backoff_then_mark_the_reel_failed(app, s3, ffmpeg):
+    from models.media_job import MediaJob
+    from services import media_job_service
+    app.config["MEDIA_JOB_MAX_ATTEMPTS"] = 2
+    ffmpeg["ok"] = False
+    reel, result = _reel(s3)
+    media_job_service.enqueue_reel_processing(reel, result["source_path"])
+    db.session.commit()
+
+    assert media_job_service.process_jobs() == {"done": 1, "retrying": 1, "failed": 0}
+    jobs = _jobs(reel.reel_id)
+    assert jobs["probe"].status == MediaJob.STATUS_DONE
+    thumb = jobs["thumbnail"]
+    assert thumb.status == MediaJob.STATUS_PENDING and thumb.next_attempt_at > datetime.utcnow()
+    assert thumb.last_error == "ffmpeg not available"
+    assert reel.processing_status == "processing"
+    assert os.path.exists(result["source_path"])     # still needed by the retry
+
+    thumb.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+    assert media_job_service.process_jobs() == {"done": 0, "retrying": 0, "failed": 1}
+    db.session.refresh(reel)
+    assert reel.processing_status == "failed" and reel.duration_seconds == 12
+    assert not os.path.exists(result["source_path"])
+
+
+def test_running_jobs_are_not_claimed_twice(app, s3, ffmpeg):
+    from services import media_job_service
+    reel, result = _reel(s3)
+    media_job_service.enqueue_reel_processing(reel, result["source_path"])
+    db.session.commit()
+    assert len(media_job_service._claim_batch(10)) == 2
+    assert media_job_service._claim_batch(10) == []
+
+
+def test_mux_job_records_the_render_unless_the_selection_changed(app, s3, ffmpeg, monkeypatch):
+    from models.reel_audio import ReelAudio
+    from models.song import Song
+    from services import media_job_service
+    from services.music import audio_mux_service
+
+    def fake_mux(video_path, audio_path, **kwargs):
+        assert open(audio_path, "rb").read() == b"ID3song"
+        out = os.path.join(app.config["MEDIA_SPOOL_DIR"], "mixed.mp4")
+        with open(out, "wb") as fh:
+            fh.write(b"mixed")
+        return out
+    monkeypatch.setattr(audio_mux_service, "mux_to_tempfile", fake_mux)
+
+    reel, result = _reel(s3)
+    s3.s3_client.objects["music/1.mp3"] = b"ID3song"
+    song = Song(provider="manual", provider_track_id="t1", title="T", duration_ms=60000,
+                audio_url="https://cdn.test/music/1.mp3", audio_s3_key="music/1.mp3")
+    db.session.add(song); db.session.flush()
+    link = ReelAudio(reel_id=reel.reel_id, song_id=song.song_id, start_ms=1000,
+                     music_volume=0.8, original_volume=0.2)
+    db.session.add(link); db.session.flush()
+    media_job_service.enqueue_mux(link, song)
+    db.session.commit()
+
+    assert media_job_service.process_jobs()["done"] == 1
+    db.session.refresh(link)
+    assert "/mixes/" in link.rendered_video_url and link.rendered_at is not None
+    assert reel.processing_status == "ready"       # a mix does not gate processing
+
+    # The merchant moves the clip while a render is in flight: the stale result is dropped.
+    media_job_service.enqueue_mux(link, song)
+    link.start_ms, link.rendered_video_url = 5000, None
+    db.session.commit()
+    media_job_service.process_jobs()
+    db.session.refresh(link)
+    assert link.rendered_video_url is None
+
+
+def test_the_same_mix_on_a_duplicated_reel_reuses_the_stored_render(app, s3, ffmpeg, monkeypatch):
+    from models.reel_audio import ReelAudio
+    from models.song import Song
+    from services import media_job_service
+    from services.music import audio_mux_service
+
+    renders = []
+
+    def fake_mux(video_path, audio_path, **kwargs):
+        renders.append(kwargs)
+        out = os.path.join(app.config["MEDIA_SPOOL_DIR"], f"mixed{len(renders)}.mp4")
+        with open(out, "wb") as fh:
+            fh.write(b"mixed")
+        return out
+    monkeypatch.setattr(audio_mux_service, "mux_to_tempfile", fake_mux)
+
+    s3.s3_client.objects["music/1.mp3"] = b"ID3song"
+    song = Song(provider="manual", provider_track_id="t1", title="T", duration_ms=60000,
+                audio_url="https://cdn.test/music/1.mp3", audio_s3_key="music/1.mp3")
+    db.session.add(song); db.session.flush()
+
+    def attach(reel, start_ms):
+        link = ReelAudio(reel_id=reel.reel_id, song_id=song.song_id, start_ms=start_ms,
+                         music_volume=0.8, original_volume=0.2)
+        db.session.add(link); db.session.flush()
+        media_job_service.enqueue_mux(link, song)
+        db.session.commit()
+        media_job_service.process_jobs()
+        db.session.refresh(link)
+        return link
+
+    first = attach(_reel(s3)[0], 1000)
+    copy = attach(_reel(s3)[0], 1000)          # same bytes uploaded again
+    moved = attach(_reel(s3)[0], 2000)         # same video, different trim
+
+    assert len(renders) == 2
+    assert copy.rendered_video_url == first.rendered_video_url
+    assert moved.rendered_video_url != first.rendered_video_url
+    assert s3.s3_client.downloads.count("music/1.mp3") == 2, "song fetched for a cache hit"
+
+
+def test_hls_ladder_skips_rungs_larger_than_the_source(app):
+    from services import media_tools
+    ladder = media_tools.parse_ladder("720:2800,360:800,540:1400")
+    assert ladder == [(360, 800), (540, 1400), (720, 2800)]
+    assert media_tools.ladder_for(ladder, 720) == ladder
+    assert media_tools.ladder_for(ladder, 600) == ladder[:2]
+    assert media_tools.ladder_for(ladder, 240) == ladder[:1]
+    assert media_tools.ladder_for(ladder, None) == ladder
+
+    cmd = media_tools.build_hls_command("in.mp4", "/out", ladder[:2], has_audio=False)
+    assert cmd[cmd.index("-var_stream_map") + 1] == "v:0,name:360p v:1,name:540p"
+    assert cmd[-1] == "/out/%v.m3u8" and "-c:a" not in cmd
+    assert cmd[cmd.index("-b:v:1") + 1] == "1400k"
+    with_audio = media_tools.build_hls_command("in.mp4", "/out", ladder[:1])
+    assert with_audio[with_audio.index("-var_stream_map") + 1] == "v:0,a:0,name:360p"
+
+
+def test_hls_job_stores_manifests_and_keeps_the_original(app, s3, ffmpeg, monkeypatch):
+    from services import media_job_service, media_tools
+    app.config["REEL_HLS_ENABLED"] = True
+    seen = {}
+
+    def transcode_hls(video_path, out_dir, rungs, has_audio=True, segment_seconds=4, timeout=600):
+        seen["rungs"] = rungs
+        for name in ["master.m3u8"] + [f"{size}p.m3u8" for size, _ in rungs] + [f"{size}p_000.ts" for size, _ in rungs]:
+            with open(os.path.join(out_dir, name), "w") as fh:
+                fh.write(name)
+        return True
+
+    def transcode_preview(video_path, out_path, **kwargs):
+        with open(out_path, "wb") as fh:
+            fh.write(b"preview")
+        return True
+
+    monkeypatch.setattr(media_tools, "transcode_hls", transcode_hls)
+    monkeypatch.setattr(media_tools, "transcode_preview", transcode_preview)
+    monkeypatch.setattr(media_tools, "probe",
+                        lambda path, timeout=30: {"duration_seconds": 9, "width": 540, "height": 960})
+
+    reel, result = _reel(s3)
+    media_job_service.enqueue_reel_processing(reel, result["source_path"])
+    db.session.commit()
+    assert set(_jobs(reel.reel_id)) == {"thumbnail", "probe", "hls"}
+    assert media_job_service.process_jobs()["done"] == 3
+
+    db.session.refresh(reel)
+    assert seen["rungs"] == [(360, 800), (540, 1400)]      # no 720p from a 540p upload
+    stem = result["s3_key"].rsplit(".", 1)[0]
+    assert reel.hls_url.startswith(f"https://cdn.test/{stem}_hls/") and reel.hls_url.endswith("/master.m3u8")
+    assert set(reel.hls_renditions) == {"360p", "540p"}
+    data = reel.serialize(include_reasons=False, include_product=False)
+    assert data["video_url"] == result["url"]              # the original stays the fallback
+    assert data["hls_url"] == reel.hls_url and data["preview_url"] == reel.preview_url
+    key = reel.hls_url.replace("https://cdn.test/", "")
+    assert s3.s3_client.objects[key] == b"master.m3u8"
+
+    s3.delete_reel_video(result["s3_key"])
+    assert not [k for k in s3.s3_client.objects if k.startswith(stem)]
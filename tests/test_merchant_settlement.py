@@ -0,0 +1,221 @@
+"""Merchant settlement: one INSERT ... SELECT per run, fees matching the Python
+calculator, idempotent by (order, merchant) and by batch key, and totals from SQL."""
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+
+from app import create_app
+from common.database import db
+
+
+@pytest.fixture
+def app():
+    application = create_app("testing")
+    with application.app_context():
+        db.create_all()
+        yield application
+        db.session.remove()
+        db.drop_all()
+
+
+def _mk_merchant(i):
+    from auth.models.models import MerchantProfile, User, UserRole
+    owner = User(email=f"seller{i}@ex.com", first_name="Sam", last_name="Seller",
+                 role=UserRole.MERCHANT, is_email_verified=True)
+    owner.set_password("StrongPass123")
+    db.session.add(owner); db.session.flush()
+    m = MerchantProfile(user_id=owner.id, business_name=f"Shop {i}", business_email=f"shop{i}@ex.com",
+                        business_phone="+919876543210", business_address="1 Market Rd",
+                        country_code="IN", state_province="MH", city="Pune", postal_code="411001")
+    db.session.add(m); db.session.flush()
+    return m
+
+
+def _seed():
+    from auth.models.models import User, UserRole
+    buyer = User(email="buyer@ex.com", first_name="Bob", last_name="Buyer",
+                 role=UserRole.USER, is_email_verified=True)
+    buyer.set_password("StrongPass123")
+    db.session.add(buyer); db.session.flush()
+    merchants = [_mk_merchant(1), _mk_merchant(2)]
+    db.session.commit()
+    return buyer, merchants
+
+
+def _order(buyer, lines, when, status=None, payment=None):
+    """lines: [(merchant, line_total)]"""
+    from models.enums import OrderStatusEnum, PaymentMethodEnum, PaymentStatusEnum
+    from models.order import Order, OrderItem
+    order = Order(
+        user_id=buyer.id, order_status=status or OrderStatusEnum.DELIVERED, order_date=when,
+        subtotal_amount=Decimal("0"), discount_amount=Decimal("0"), tax_amount=Decimal("0"),
+        shipping_amount=Decimal("0"), total_amount=Decimal("0"), currency="INR",
+        payment_method=PaymentMethodEnum.CREDIT_CARD,
+        payment_status=payment or PaymentStatusEnum.SUCCESSFUL,
+    )
+    for merchant, total in lines:
+        order.items.append(OrderItem(
+            merchant_id=merchant.id, product_name_at_purchase="Widget", sku_at_purchase="W-1",
+            quantity=1, final_base_price_for_gst_calc=Decimal(total),
+            gst_rate_applied_at_purchase=Decimal("0"), gst_amount_per_unit=Decimal("0"),
+            unit_price_inclusive_gst=Decimal(total), line_item_total_inclusive_gst=Decimal(total),
+        ))
+    db.session.add(order)
+    db.session.commit()
+    return order.order_id
+
+
+def test_sql_fees_match_the_python_calculator(app):
+    from controllers.merchant_transaction_controller import calculate_transaction_fees, settle_orders
+    from models.merchant_transaction import MerchantTransaction
+
+    with app.app_context():
+        buyer, (m1, m2) = _seed()
+        # Every tier, including both edges of the 500 boundary; m1 has two lines in one order.
+        order_ids = [
+            _order(buyer, [(m1, "300"), (m1, "200"), (m2, "500.01")], datetime(2026, 9, 3)),
+            _order(buyer, [(m1, "1999.99")], datetime(2026, 9, 4)),
+            _order(buyer, [(m2, "25000")], datetime(2026, 9, 5)),
+        ]
+        result = settle_orders(order_ids=order_ids, settlement_date=date(2026, 10, 1), batch_key="2026-09")
+
+        assert result["created"] == 4 and result["transaction_count"] == 4
+        rows = MerchantTransaction.query.order_by(MerchantTransaction.order_amount).all()
+        assert [float(r.order_amount) for r in rows] == [500.0, 500.01, 1999.99, 25000.0]
+        for row in rows:
+            fees = calculate_transaction_fees(Decimal(str(row.order_amount)))
+            assert row.platform_fee_percent == fees["platform_fee_percent"]
+            for key in ("platform_fee_amount", "gst_on_fee_amount", "payment_gateway_fee", "final_payable_amount"):
+                assert abs(Decimal(str(getattr(row, key))) - fees[key]) < Decimal("0.01"), key
+            assert row.payment_status == "pending" and row.settlement_batch == "2026-09"
+            assert row.settlement_date == date(2026, 10, 1)
+        assert result["total_payable"] == pytest.approx(sum(float(r.final_payable_amount) for r in rows))
+
+
+def test_settlement_is_idempotent(app):
+    from controllers.merchant_transaction_controller import (
+        bulk_create_transactions_for_orders, create_merchant_transaction_from_order, settle_orders,
+    )
+    from models.merchant_transaction import MerchantTransaction
+
+    with app.app_context():
+        buyer, (m1, m2) = _seed()
+        first = _order(buyer, [(m1, "100"), (m2, "100")], datetime(2026, 9, 3))
+        second = _order(buyer, [(m1, "100")], datetime(2026, 9, 4))
+
+        assert len(create_merchant_transaction_from_order(first)) == 2
+        assert len(create_merchant_transaction_from_order(first)) == 2
+        # Overlapping runs only add the pairs nobody settled yet.
+        rows = bulk_create_transactions_for_orders([first, second], batch_key="b1")
+        assert [r.order_id for r in rows] == [second]
+        again = settle_orders(order_ids=[first, second], batch_key="b1")
+        assert again["created"] == 0 and again["transaction_count"] == 1
+        assert MerchantTransaction.query.count() == 3
+
+
+def test_a_settlement_that_keeps_colliding_gives_up(app, monkeypatch):
+    from sqlalchemy.exc import IntegrityError
+    from controllers import merchant_transaction_controller as mtc
+    from models.merchant_transaction import MerchantTransaction
+
+    with app.app_context():
+        buyer, (m1, _) = _seed()
+        order_id = _order(buyer, [(m1, "100")], datetime(2026, 9, 3))
+
+        execute, inserts = db.session.execute, []
+
+        def colliding(statement, *args, **kwargs):
+            if getattr(statement, "is_insert", False):
+                inserts.append(statement)
+                if len(inserts) < 3:
+                    raise IntegrityError("INSERT", {}, Exception("duplicate pair"))
+            return execute(statement, *args, **kwargs)
+
+        # Two collisions are retried; the third attempt goes through.
+        monkeypatch.setattr(db.session, "execute", colliding)
+        assert mtc.settle_orders(order_ids=[order_id], batch_key="b1")["created"] == 1
+
+        # One collision too many is raised instead of retried for ever.
+        inserts.clear()
+        monkeypatch.setattr(mtc, "SETTLEMENT_INSERT_ATTEMPTS", 2)
+        with pytest.raises(IntegrityError):
+            mtc.settle_orders(order_ids=[order_id], batch_key="b2")
+        assert len(inserts) == 2
+        assert MerchantTransaction.query.count() == 1
+
+
+def test_date_range_settles_only_paid_open_orders(app):
+    from controllers.merchant_transaction_controller import settle_orders
+    from models.enums import OrderStatusEnum, PaymentStatusEnum
+    from models.merchant_transaction import MerchantTransaction
+
+    with app.app_context():
+        buyer, (m1, m2) = _seed()
+        kept = _order(buyer, [(m1, "100"), (m2, "200")], datetime(2026, 9, 1, 8))
+        _order(buyer, [(m1, "100")], datetime(2026, 9, 2), status=OrderStatusEnum.CANCELLED_BY_CUSTOMER)
+        _order(buyer, [(m1, "100")], datetime(2026, 9, 3), payment=PaymentStatusEnum.PENDING)
+        _order(buyer, [(m1, "100")], datetime(2026, 10, 1))
+        last = _order(buyer, [(m2, "300")], datetime(2026, 9, 30, 23))
+
+        result = settle_orders(from_date=date(2026, 9, 1), to_date=date(2026, 9, 30), batch_key="2026-09")
+        assert result["created"] == 3
+        assert {r.order_id for r in MerchantTransaction.query} == {kept, last}
+        with pytest.raises(ValueError):
+            settle_orders()
+
+
+def test_mark_paid_and_totals_are_set_based(app):
+    from controllers.merchant_transaction_controller import (
+        bulk_mark_as_paid, get_merchant_transaction_summary, get_transaction_statistics, settle_orders,
+    )
+    from models.merchant_transaction import MerchantTransaction
+
+    with app.app_context():
+        buyer, (m1, m2) = _seed()
+        ids = [_order(buyer, [(m1, "400"), (m2, "1500")], datetime(2026, 9, 3)),
+               _order(buyer, [(m1, "20000")], datetime(2026, 9, 4))]
+        settle_orders(order_ids=ids, settlement_date=date(2026, 10, 1), batch_key="2026-09")
+        one = MerchantTransaction.query.filter_by(merchant_id=m2.id).one()
+
+        assert bulk_mark_as_paid([one.id]) == {"total_transactions": 1, "updated_count": 1, "already_paid_count": 0}
+        assert bulk_mark_as_paid(batch_key="2026-09") == {
+            "total_transactions": 3, "updated_count": 2, "already_paid_count": 1}
+        assert bulk_mark_as_paid([]) == {"total_transactions": 0, "updated_count": 0, "already_paid_count": 0}
+
+        summary = get_merchant_transaction_summary(merchant_id=m1.id)
+        assert summary["total_transactions"] == 2 and summary["paid_transactions"] == 2
+        assert summary["total_order_amount"] == 20400.0
+        assert summary["paid_amount"] == summary["total_payable_to_merchants"]
+
+        stats = get_transaction_statistics(from_date=date(2026, 10, 1))
+        assert stats["total_transactions"] == 3 and stats["status_distribution"] == {"pending": 0, "paid": 3}
+        assert {k: v["count"] for k, v in stats["fee_distribution"].items()} == {"5%": 1, "4%": 1, "3%": 0, "2%": 1}
+        assert stats["fee_distribution"]["4%"]["amount"] == 60.0
+        assert get_transaction_statistics(from_date=date(2027, 1, 1))["total_transactions"] == 0
+
+
+def test_superadmin_settle_route(app):
+    from flask_jwt_extended import create_access_token
+    from auth.models.models import User, UserRole
+
+    with app.app_context():
+        buyer, (m1, _) = _seed()
+        _order(buyer, [(m1, "100")], datetime(2026, 9, 3))
+        admin = User(email="admin@ex.com", first_name="A", last_name="B",
+                     role=UserRole.SUPER_ADMIN, is_email_verified=True)
+        admin.set_password("StrongPass123")
+        db.session.add(admin); db.session.commit()
+        headers = {"Authorization": f"Bearer {create_access_token(identity=str(admin.id))}"}
+        client = app.test_client()
+        url = "/api/superadmin/merchant-transactions/settle"
+
+        assert client.post(url, json={"from_date": "2026-09-01"}, headers=headers).status_code == 400
+        body = {"from_date": "2026-09-01", "to_date": "2026-09-30", "batch_key": "2026-09"}
+        resp = client.post(url, json=body, headers=headers)
+        assert resp.status_code == 201 and resp.get_json()["created"] == 1
+        assert client.post(url, json=body, headers=headers).get_json() == dict(resp.get_json(), created=0)
+
+        paid = client.post("/api/superadmin/merchant-transactions/bulk-mark-paid",
+                           json={"batch_key": "2026-09"}, headers=headers)
+        assert paid.get_json()["updated_count"] == 1
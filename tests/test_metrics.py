@@ -0,0 +1,118 @@
+"""/metrics and the in-process registry (common/metrics.py)."""
+import json
+
+import pytest
+
+from app import create_app
+from common.database import db
+from common.metrics import (
+    clear_multiproc_dir, record_cache, registry, render_prometheus, retire_snapshot, write_snapshot,
+)
+
+TOKEN = {"Authorization": "Bearer s3cret"}
+
+
+@pytest.fixture
+def app():
+    application = create_app("testing")
+    application.config["METRICS_TOKEN"] = "s3cret"
+    registry.reset()
+    with application.app_context():
+        db.create_all()
+        yield application
+        db.session.remove()
+        db.drop_all()
+
+
+def test_request_latency_is_labelled_by_route_template(app):
+    client = app.test_client()
+    client.get("/health")
+    client.get("/health")
+
+    body = client.get("/metrics", headers=TOKEN).get_data(as_text=True)
+    assert "# TYPE http_request_duration_seconds histogram" in body
+    assert 'http_request_duration_seconds_count{method="GET",route="/health",status="2xx"} 2' in body
+    assert 'db_queries_per_request_count{route="/health"} 2' in body
+
+
+def test_db_queries_are_counted_per_request(app):
+    @app.route("/_test/two-queries")
+    def two_queries():
+        db.session.execute(db.text("SELECT 1"))
+        db.session.execute(db.text("SELECT 2"))
+        return "ok"
+
+    client = app.test_client()
+    client.get("/_test/two-queries")
+
+    body = client.get("/metrics", headers=TOKEN).get_data(as_text=True)
+    # Exactly one request with 2 statements: it lands in the le=2 bucket, not le=1.
+    assert 'db_queries_per_request_bucket{route="/_test/two-queries",le="1.0"} 0' in body
+    assert 'db_queries_per_request_bucket{route="/_test/two-queries",le="2.0"} 1' in body
+    assert "db_query_duration_seconds_count" in body
+
+
+def test_cache_hits_and_misses(app):
+    record_cache("translate", True)
+    record_cache("translate", False)
+    record_cache("translate", False)
+
+    body = app.test_client().get("/metrics", headers=TOKEN).get_data(as_text=True)
+    assert 'cache_requests_total{cache="translate",result="hit"} 1' in body
+    assert 'cache_requests_total{cache="translate",result="miss"} 2' in body
+
+
+def test_snapshots_from_other_workers_are_merged(app, tmp_path):
+    registry.inc("cache_requests_total", cache="x", result="hit")
+    # Another worker's snapshot, as it would have written it.
+    (tmp_path / "99999.json").write_text(json.dumps(registry.snapshot()))
+    app.config["METRICS_MULTIPROC_DIR"] = str(tmp_path)
+
+    body = app.test_client().get("/metrics", headers=TOKEN).get_data(as_text=True)
+    assert 'cache_requests_total{cache="x",result="hit"} 2' in body
+
+
+def test_token_protects_endpoint(app):
+    client = app.test_client()
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    ok = client.get("/metrics", headers=TOKEN)
+    assert ok.status_code == 200
+    assert ok.mimetype == "text/plain"
+
+    # No token configured: nobody gets in, rather than everybody.
+    app.config["METRICS_TOKEN"] = None
+    assert client.get("/metrics").status_code == 403
+    assert client.get("/metrics", headers={"Authorization": "Bearer "}).status_code == 403
+
+
+def test_exited_workers_are_archived_and_a_reused_pid_adds_to_them(app, tmp_path):
+    app.config["METRICS_MULTIPROC_DIR"] = str(tmp_path)
+    worker = {"counters": [["cache_requests_total", [["cache", "x"], ["result", "hit"]], 3]],
+              "histograms": [], "help": {}}
+    for pid in ("99998", "99999"):
+        (tmp_path / f"{pid}.json").write_text(json.dumps(worker))
+
+    retire_snapshot(str(tmp_path), 99998)
+    retire_snapshot(str(tmp_path), 99999)
+    retire_snapshot(str(tmp_path), 99997)  # no file: nothing to do
+    assert sorted(p.name for p in tmp_path.glob("*.json")) == ["archive.json"]
+
+    # A new worker that got pid 99999 starts from zero without hiding the old counts.
+    worker["counters"][0][2] = 1
+    (tmp_path / "99999.json").write_text(json.dumps(worker))
+    body = app.test_client().get("/metrics", headers=TOKEN).get_data(as_text=True)
+    assert 'cache_requests_total{cache="x",result="hit"} 7' in body
+
+    clear_multiproc_dir(str(tmp_path))
+    assert list(tmp_path.glob("*.json")) == []
+
+
+def test_write_snapshot_round_trips(tmp_path):
+    registry.reset()
+    registry.observe("http_request_duration_seconds", 0.2, method="GET", route="/a", status="2xx")
+    write_snapshot(str(tmp_path))
+    files = list(tmp_path.iterdir())
+    assert len(files) == 1
+    text = render_prometheus([json.loads(files[0].read_text())])
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/a",status="2xx",le="0.25"} 1' in text
@@ -0,0 +1,269 @@
+"""Bulk music ingest as a background job: concurrent analysis, batched writes,
+progress on the job row, and resuming after a partial failure."""
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import create_app
+from common.database import db
+
+
+@pytest.fixture
+def app():
+    application = create_app("testing")
+    application.config["MUSIC_INGEST_BATCH_SIZE"] = 2
+    application.config["MUSIC_INGEST_DOWNLOAD_WORKERS"] = 4
+    with application.app_context():
+        db.create_all()
+        yield application
+        db.session.remove()
+        db.drop_all()
+
+
+def _tracks(n, prefix="t"):
+    return [{"provider_track_id": f"{prefix}{i}", "title": f"Song {i}",
+             "audio_url": f"https://cdn.example/{prefix}{i}.mp3", "duration_ms": 0}
+            for i in range(n)]
+
+
+class FakeProvider:
+    def __init__(self, tracks):
+        self.tracks = tracks
+        self.fetches = 0
+
+    def fetch(self, query=None, limit=50, page=1):
+        self.fetches += 1
+        return list(self.tracks)
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    """A provider, downloads into real temp files, and analysis without ffmpeg."""
+    from services.music import ingest_service
+
+    provider = FakeProvider(_tracks(5))
+    downloaded = []
+
+    def download(url, timeout=60):
+        fd, path = tempfile.mkstemp(suffix=".audio")
+        os.close(fd)
+        downloaded.append(path)
+        return path
+
+    def analyse(path):
+        return {"pyramid": {120: [0.5] * 120, 480: [0.25] * 480}, "duration_ms": 90000}
+
+    monkeypatch.setattr(ingest_service, "get_provider", lambda name: provider)
+    monkeypatch.setattr(ingest_service, "_download_to_temp", download)
+    monkeypatch.setattr(ingest_service, "analyse_audio", analyse)
+    provider.downloaded = downloaded
+    return provider
+
+
+def test_a_page_is_analysed_and_written_with_progress(app, fake):
+    from models.song import Song
+    from services.music.ingest_service import ingest_from_provider
+
+    with app.app_context():
+        result = ingest_from_provider("jamendo")
+
+        assert (result["created"], result["updated"], result["failed"]) == (5, 0, 0)
+        songs = Song.query.all()
+        assert len(songs) == 5
+        assert all(s.duration_ms == 90000 and len(s.peaks()) == 120 for s in songs)
+        assert all(len(s.peaks_at(400)) == 480 for s in songs)
+        assert not any(os.path.exists(p) for p in fake.downloaded), "temp audio left behind"
+
+        from models.music_ingest_job import MusicIngestJob
+        job = db.session.get(MusicIngestJob, result["job_id"])
+        assert job.status == "done" and job.serialize()["processed"] == 5
+
+
+def test_rerunning_a_page_updates_without_reanalysing(app, fake):
+    from services.music.ingest_service import ingest_from_provider
+
+    with app.app_context():
+        for t in fake.tracks:
+            t["duration_ms"] = 120000
+        ingest_from_provider("jamendo")
+        fake.downloaded.clear()
+
+        result = ingest_from_provider("jamendo")
+
+        assert (result["created"], result["updated"]) == (0, 5)
+        assert fake.downloaded == [], "songs with peaks and a duration were downloaded again"
+
+
+def test_a_failed_download_still_writes_the_song(app, fake, monkeypatch):
+    from models.song import Song
+    from services.music import ingest_service
+
+    real = ingest_service._download_to_temp
+
+    def flaky(url, timeout=60):
+        if url.endswith("t2.mp3"):
+            raise ingest_service.IngestError("Could not download audio (404).")
+        return real(url, timeout)
+
+    monkeypatch.setattr(ingest_service, "_download_to_temp", flaky)
+    with app.app_context():
+        result = ingest_service.ingest_from_provider("jamendo")
+
+        assert result["created"] == 5 and result["failed"] == 0
+        song = Song.query.filter_by(provider_track_id="t2").one()
+        assert song.peaks() == []
+
+
+def test_a_resumed_job_only_writes_what_is_left(app, fake, monkeypatch):
+    from models.music_ingest_job import MusicIngestJob
+    from models.song import Song
+    from services.music import ingest_service
+
+    real_assign = ingest_service._assign
+    broken = {"t3"}
+
+    def assign(song, track):
+        if track["provider_track_id"] in broken:
+            raise ValueError("bad tags")
+        real_assign(song, track)
+
+    monkeypatch.setattr(ingest_service, "_assign", assign)
+    with app.app_context():
+        job = ingest_service.create_ingest_job("jamendo")
+        job = ingest_service.run_ingest_job(job.job_id)
+
+        assert job.status == "done"
+        assert (job.created_count, job.failed_count) == (4, 1)
+        assert "bad tags" in job.errors[0]
+        assert Song.query.count() == 4
+        assert job.is_resumable(600)
+
+        broken.clear()
+        fake.downloaded.clear()
+        job = ingest_service.resume_ingest_job(job.job_id)
+
+        assert fake.fetches == 1, "resume refetched the page"
+        assert len(fake.downloaded) == 1, "resume re-analysed written tracks"
+        assert (job.created_count, job.failed_count, job.errors) == (5, 0, [])
+        assert sorted(job.completed) == [f"t{i}" for i in range(5)]
+        assert not db.session.get(MusicIngestJob, job.job_id).is_resumable(600)
+
+
+def test_only_a_stale_running_job_can_be_resumed(app):
+    from models.music_ingest_job import MusicIngestJob
+
+    with app.app_context():
+        job = MusicIngestJob(provider="jamendo", status="running", heartbeat_at=datetime.utcnow())
+        db.session.add(job)
+        db.session.commit()
+        assert not job.is_resumable(600)
+        assert job.is_resumable(600, now=datetime.utcnow() + timedelta(minutes=11))
+
+
+def test_a_resume_claims_the_job_once(app, fake, monkeypatch):
+    from models.music_ingest_job import MusicIngestJob
+    from services.music import ingest_service
+
+    with app.app_context():
+        job = MusicIngestJob(provider="jamendo", status="failed", tracks=_tracks(3), total=3)
+        db.session.add(job)
+        db.session.commit()
+
+        # The second admin's resume sees the row as failed, but the first one's
+        # claim lands between that read and its own UPDATE.
+        started = []
+        monkeypatch.setattr(ingest_service, "start_ingest_job", started.append)
+        monkeypatch.setattr(MusicIngestJob, "is_resumable", lambda self, *a, **kw: True)
+        ingest_service.resume_ingest_job(job.job_id)
+        with pytest.raises(ingest_service.IngestError, match="resumed by someone else"):
+            ingest_service.resume_ingest_job(job.job_id)
+        assert started == [job.job_id]
+
+
+def test_the_sweeper_restarts_a_stalled_job(app, fake):
+    from models.music_ingest_job import MusicIngestJob
+    from services.music import ingest_service
+
+    with app.app_context():
+        stale = datetime.utcnow() - timedelta(hours=1)
+        job = MusicIngestJob(provider="jamendo", status="running", tracks=_tracks(5), total=5,
+                             completed=["t0", "t1"], created_count=2, attempts=1,
+                             created_at=stale, heartbeat_at=stale)
+        live = MusicIngestJob(provider="jamendo", status="running", tracks=_tracks(2, "l"), total=2,
+                              created_at=stale, heartbeat_at=datetime.utcnow())
+        db.session.add_all([job, live])
+        db.session.commit()
+
+        assert ingest_service.sweep() == 1
+        db.session.expire_all()
+        job = db.session.get(MusicIngestJob, job.job_id)
+        assert (job.status, job.created_count, job.attempts) == ("done", 5, 2)
+        assert len(fake.downloaded) == 3, "the restart re-analysed written tracks"
+        assert db.session.get(MusicIngestJob, live.job_id).status == "running"
+
+
+def test_background_jobs_share_one_bounded_pool(app, fake, monkeypatch):
+    from services.music import ingest_service
+
+    submitted = []
+
+    class Pool:
+        def submit(self, fn, app_, job_id):
+            submitted.append(job_id)
+
+    monkeypatch.setattr(ingest_service.runner, "pool", lambda: Pool())
+    app.config["MUSIC_INGEST_BACKGROUND"] = True
+    with app.app_context():
+        ids = [ingest_service.create_ingest_job("jamendo").job_id for _ in range(3)]
+        assert [ingest_service.start_ingest_job(job_id) for job_id in ids] == [None] * 3
+        assert submitted == ids and fake.fetches == 0
+
+        # Whoever runs a job first claims it; a second run of it does nothing.
+        assert ingest_service.run_ingest_job(ids[0]).status == "done"
+        assert ingest_service.run_ingest_job(ids[0]) is None
+        assert fake.fetches == 1
+
+
+def test_the_heartbeat_moves_with_every_track(app, fake, monkeypatch):
+    from models.music_ingest_job import MusicIngestJob
+    from services.music import ingest_service
+
+    app.config["MUSIC_INGEST_BATCH_SIZE"] = 25
+    beats = []
+    real = ingest_service._IngestRun._heartbeat
+
+    def heartbeat(run):
+        real(run)
+        beats.append(db.session.get(MusicIngestJob, run.job.job_id).heartbeat_at)
+
+    monkeypatch.setattr(ingest_service._IngestRun, "_heartbeat", heartbeat)
+    with app.app_context():
+        job = ingest_service.create_ingest_job("jamendo")
+        ingest_service.run_ingest_job(job.job_id)
+        # Five tracks, one batch: a beat per track before the batch is written.
+        assert len(beats) == 5 and beats == sorted(beats)
+
+
+def test_ingest_endpoints_report_progress(app, fake):
+    from flask_jwt_extended import create_access_token
+    from auth.models.models import User, UserRole
+
+    with app.app_context():
+        admin = User(email="admin@example.com", first_name="A", last_name="Dmin",
+                     role=UserRole.SUPER_ADMIN, is_email_verified=True)
+        db.session.add(admin)
+        db.session.commit()
+        headers = {"Authorization": f"Bearer {create_access_token(identity=str(admin.id))}"}
+        client = app.test_client()
+
+        resp = client.post("/api/superadmin/music/ingest", json={"provider": "jamendo"}, headers=headers)
+        assert resp.status_code == 200
+        job_id = resp.get_json()["data"]["job_id"]
+
+        status = client.get(f"/api/superadmin/music/ingest/{job_id}", headers=headers).get_json()["data"]
+        assert status["status"] == "done" and status["created"] == 5 and status["resumable"] is False
+
+        assert client.post(f"/api/superadmin/music/ingest/{job_id}/resume", headers=headers).status_code == 409
+        assert client.get("/api/superadmin/music/ingest/999", headers=headers).status_code == 404
@@ -211,6 +211,57 @@ def test_mux_can_drop_the_original_audio(app):
         assert "-c:v copy" in cmd
 
 
+def test_mux_reencodes_only_what_mp4_cannot_carry(app, monkeypatch):
+    """Copy is the rule; a codec MP4 cannot hold, or a rejected copy, re-encodes."""
+    from services import media_tools
+    from services.music import audio_mux_service
+
+    runs = []
+
+    def run(cmd, capture_output=True, timeout=None):
+        runs.append(" ".join(cmd))
+        if "-c:v copy" in runs[-1] and reject_copy:
+            return subprocess.CompletedProcess(cmd, 1, b"", b"codec not supported in mp4")
+        with open(cmd[-1], "wb") as fh:
+            fh.write(b"mp4")
+        return subprocess.CompletedProcess(cmd, 0, b"", b"")
+
+    monkeypatch.setattr(audio_mux_service.subprocess, "run", run)
+    codec = {"value": "h264"}
+    monkeypatch.setattr(media_tools, "probe", lambda path, timeout=30: {"video_codec": codec["value"]})
+    out = os.path.join(tempfile.mkdtemp(), "out.mp4")
+
+    with app.app_context():
+        reject_copy = False
+        audio_mux_service.mux("in.mp4", "s.mp3", out)
+        codec["value"] = "hevc"
+        audio_mux_service.mux("in.mp4", "s.mp3", out)
+        codec["value"] = "prores"
+        audio_mux_service.mux("in.mov", "s.mp3", out)
+        codec["value"] = "h264"
+        reject_copy = True
+        audio_mux_service.mux("in.mp4", "s.mp3", out)
+
+    assert "-c:v copy" in runs[0]
+    assert "-c:v copy -tag:v hvc1" in runs[1]
+    assert "-c:v libx264" in runs[2]
+    assert "-c:v copy" in runs[3] and "-c:v libx264" in runs[4] and len(runs) == 5
+
+
+def test_mix_cache_key_changes_with_every_input(app):
+    from services.music.audio_mux_service import mix_cache_key
+
+    base = dict(start_ms=1000, duration_ms=15000, music_volume=0.8, original_volume=0.2)
+    key = mix_cache_key("v1", "music/1.mp3", **base)
+
+    assert key == mix_cache_key("v1", "music/1.mp3", **dict(base, music_volume=0.8000001))
+    assert key != mix_cache_key("v2", "music/1.mp3", **base)
+    assert key != mix_cache_key("v1", "music/2.mp3", **base)
+    for field, value in (("start_ms", 2000), ("duration_ms", 10000),
+                         ("music_volume", 0.5), ("original_volume", 0.0)):
+        assert key != mix_cache_key("v1", "music/1.mp3", **dict(base, **{field: value})), field
+
+
 @pytest.mark.skipif(not HAS_FFMPEG, reason="ffmpeg not installed")
 def test_mux_actually_produces_a_playable_file(app):
     """End to end against real ffmpeg, not just the argv."""
@@ -278,6 +329,77 @@ def test_missing_audio_file_yields_no_peaks_rather_than_raising(app):
         assert generate_peaks("/nonexistent/file.mp3") == []
 
 
+def _pcm(samples):
+    import struct
+    return struct.pack(f"<{len(samples)}h", *samples)
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_block_peaks_do_not_depend_on_how_ffmpeg_chunks_its_output(use_numpy):
+    """stdout arrives in pipe-sized reads that split samples and blocks anywhere."""
+    from services.music.waveform_service import BlockPeaks, np
+
+    if use_numpy and np is None:
+        pytest.skip("numpy not installed")
+    samples = [((i * 7919) % 65536) - 32768 for i in range(1000)]
+    raw = _pcm(samples)
+    expected = [max(abs(s) for s in samples[i:i + 32]) for i in range(0, len(samples), 32)]
+
+    for size in (1, 3, 63, 64, 1001, len(raw)):
+        reducer = BlockPeaks(use_numpy=use_numpy)
+        for i in range(0, len(raw), size):
+            reducer.feed(raw[i:i + size])
+        assert [int(p) for p in reducer.result()] == expected, f"chunk size {size}"
+    # -32768 has no positive int16; it must not wrap to a negative peak.
+    assert 32768 in expected
+
+
+def test_pyramid_levels_share_one_normalisation(app, monkeypatch):
+    """Zooming in shows more of the same shape, not a rescaled one."""
+    from services.music import waveform_service
+
+    blocks = waveform_service.BlockPeaks()
+    # 8s of a quiet ramp: the loudest block is the last, at a quarter of full scale.
+    blocks.feed(_pcm([i // 32 for i in range(8000 * 8)]))
+    monkeypatch.setattr(waveform_service, "_decode_block_peaks",
+                        lambda path, timeout: blocks.result())
+
+    pyramid = waveform_service.generate_peak_pyramid("song.mp3", levels=(120, 480, 1920))
+
+    assert sorted(pyramid) == [120, 480, 1920]
+    assert all(len(pyramid[n]) == n for n in pyramid)
+    for peaks in pyramid.values():
+        assert peaks[-1] == 1.0 and peaks == sorted(peaks)
+    assert pyramid[120][59] == pytest.approx(pyramid[480][239], abs=0.01)
+
+
+def test_waveform_endpoint_serves_the_nearest_zoom_level(app):
+    import json
+    from flask_jwt_extended import create_access_token
+
+    with app.app_context():
+        song = _mk_song()
+        song.waveform_peaks = json.dumps([0.5] * 120)
+        song.waveform_detail = json.dumps({"480": [0.25] * 480, "1920": [0.125] * 1920})
+        db.session.commit()
+        token = create_access_token(identity="1")
+        client = app.test_client()
+
+        def points(n):
+            resp = client.get(f"/api/music/songs/{song.song_id}/waveform?points={n}",
+                              headers={"Authorization": f"Bearer {token}"})
+            assert resp.status_code == 200
+            return resp.get_json()["data"]["points"]
+
+        assert points(100) == 120
+        assert points(300) == 480
+        assert points(5000) == 1920
+
+        song.waveform_detail = None
+        db.session.commit()
+        assert points(5000) == 120
+
+
 # --------------------------------------------------------------------------- #
 # duration probing — the production failure
 # --------------------------------------------------------------------------- #
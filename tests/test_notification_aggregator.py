@@ -0,0 +1,111 @@
+"""Reel-like and follow notifications are buffered and written once per window."""
+import pytest
+
+from app import create_app
+from common.database import db
+from common.query_audit import QueryAudit
+
+
+@pytest.fixture
+def app():
+    application = create_app("testing")
+    with application.app_context():
+        db.create_all()
+        yield application
+        db.session.remove()
+        db.drop_all()
+
+
+def _merchant(email="m@ex.com"):
+    from auth.models.models import MerchantProfile, User, UserRole
+    user = User(email=email, first_name="M", last_name="P", role=UserRole.MERCHANT,
+                is_email_verified=True)
+    user.set_password("StrongPass123")
+    db.session.add(user); db.session.flush()
+    profile = MerchantProfile(user_id=user.id, business_name=f"Shop {email}", business_email=email,
+                              business_phone="9990001111", business_address="1 Main St",
+                              country_code="IN", state_province="UP", city="Moradabad",
+                              postal_code="244001")
+    db.session.add(profile); db.session.commit()
+    return profile
+
+
+@pytest.fixture
+def aggregator(app):
+    """An aggregator that buffers (background mode) but has no thread; tests flush it."""
+    from services.notification_aggregator import NotificationAggregator
+    app.config["NOTIFICATION_AGGREGATOR_BACKGROUND"] = True
+    return NotificationAggregator(app)
+
+
+def _reel_notifications(merchant_id):
+    from models.merchant_notification import MerchantNotification
+    db.session.expire_all()
+    return MerchantNotification.query.filter_by(merchant_id=merchant_id, related_entity_type="reel").all()
+
+
+def test_likes_in_one_window_become_one_write(app, aggregator):
+    m, other = _merchant(), _merchant("o@ex.com")
+    for n in range(50):
+        aggregator.record_reel_like(m.id, 7, n, f"User {n}")
+    aggregator.record_reel_like(m.id, 8, 1, "User 1")
+    aggregator.record_reel_like(other.id, 7, 2, "")
+
+    with QueryAudit() as audit:
+        assert aggregator.flush() == 3
+    inserts = [s for s in audit.statements if s.startswith("INSERT INTO merchant_notifications")]
+    assert len(inserts) <= 3     # one per (merchant, reel), never one per like
+
+    by_reel = {n.related_entity_id: n for n in _reel_notifications(m.id)}
+    assert by_reel[7].like_count == 50
+    assert by_reel[7].last_liked_by_user_name == "User 49"
+    assert by_reel[7].message == "Your reel has received 50 likes"
+    assert by_reel[8].message == "Your reel has received 1 like"
+    assert _reel_notifications(other.id)[0].last_liked_by_user_name == "Someone"
+
+
+def test_next_window_adds_to_the_unread_notification(app, aggregator):
+    from services import notification_counter_service
+    m = _merchant()
+    for n in range(3):
+        aggregator.record_reel_like(m.id, 7, n, "A")
+    aggregator.flush()
+    for n in range(4):
+        aggregator.record_reel_like(m.id, 7, n, "B")
+    aggregator.flush()
+
+    (notification,) = _reel_notifications(m.id)
+    assert notification.like_count == 7
+    assert notification_counter_service.counts(m.id).unread_count == 1
+
+    # Once read, further likes start a fresh notification.
+    notification.mark_as_read(); db.session.commit()
+    aggregator.record_reel_like(m.id, 7, 9, "C")
+    aggregator.flush()
+    assert sorted(n.like_count for n in _reel_notifications(m.id)) == [1, 7]
+
+
+def test_follows_are_buffered_but_not_merged(app, aggregator):
+    from models.enums import NotificationType
+    from models.merchant_notification import MerchantNotification
+    m = _merchant()
+    aggregator.record_follow(m.id, 1, "Ann")
+    aggregator.record_follow(m.id, 2, "Bob")
+    assert MerchantNotification.query.count() == 0
+    assert aggregator.flush() == 2
+    messages = sorted(n.message for n in MerchantNotification.query.filter_by(
+        notification_type=NotificationType.MERCHANT_FOLLOWED))
+    assert messages == ["Ann started following you", "Bob started following you"]
+
+
+def test_full_buffer_drops_new_keys_but_still_counts_known_ones(app):
+    from services.notification_aggregator import NotificationAggregator
+    app.config.update(NOTIFICATION_AGGREGATOR_BACKGROUND=True, NOTIFICATION_AGGREGATOR_MAX_PENDING=1)
+    aggregator = NotificationAggregator(app)
+    m = _merchant()
+    aggregator.record_reel_like(m.id, 1, 1, "A")
+    aggregator.record_reel_like(m.id, 2, 1, "A")     # dropped
+    aggregator.record_reel_like(m.id, 1, 2, "B")     # same key: still counted
+    assert aggregator.flush() == 1
+    (notification,) = _reel_notifications(m.id)
+    assert (notification.related_entity_id, notification.like_count) == (1, 2)
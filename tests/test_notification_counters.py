@@ -0,0 +1,210 @@
+"""Merchant notification counters: kept in step with every notification change, read
+by the list/badge endpoints instead of COUNT queries, and pushed over SSE."""
+import json
+
+import pytest
+
+from app import create_app
+from common.database import db
+from common.query_audit import QueryAudit
+
+
+@pytest.fixture
+def app():
+    application = create_app("testing")
+    application.config["NOTIFICATION_STREAM_ENABLED"] = True
+    application.config["NOTIFICATION_STREAM_POLL_SECONDS"] = 0
+    application.config["NOTIFICATION_STREAM_MAX_SECONDS"] = 0
+    with application.app_context():
+        db.create_all()
+        yield application
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def _merchant():
+    from auth.models.models import MerchantProfile, User, UserRole
+    user = User(email="m@ex.com", first_name="M", last_name="P", role=UserRole.MERCHANT,
+                is_email_verified=True)
+    user.set_password("StrongPass123")
+    db.session.add(user); db.session.flush()
+    profile = MerchantProfile(user_id=user.id, business_name="Brass Works", business_email="m@ex.com",
+                              business_phone="9990001111", business_address="1 Main St",
+                              country_code="IN", state_province="UP", city="Moradabad",
+                              postal_code="244001")
+    db.session.add(profile); db.session.commit()
+    return user, profile
+
+
+def _auth(user_id):
+    from flask_jwt_extended import create_access_token
+    from auth.models.models import UserRole
+    token = create_access_token(identity=str(user_id), additional_claims={"role": UserRole.MERCHANT.value})
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _follow(merchant_id, n):
+    from models.merchant_notification import MerchantNotification
+    MerchantNotification.create_follow_notification(merchant_id, n, f"Follower {n}")
+    db.session.commit()
+
+
+def _counter(merchant_id):
+    from models.merchant_notification import MerchantNotification
+    from services import notification_counter_service
+    db.session.expire_all()
+    counts = notification_counter_service.counts(merchant_id)
+    live = MerchantNotification.query.filter_by(merchant_id=merchant_id)
+    assert counts.unread_count == live.filter_by(is_read=False).count()
+    assert counts.total_count == live.count()
+    return counts.unread_count, counts.total_count
+
+
+def test_counter_follows_every_kind_of_change(app):
+    from models.merchant_notification import MerchantNotification
+    from services import notification_counter_service
+    _, m = _merchant()
+    for n in range(4):
+        _follow(m.id, n)
+    MerchantNotification.get_or_create_reel_like_notification(m.id, 7, 1, "A")
+    db.session.commit()
+    MerchantNotification.get_or_create_reel_like_notification(m.id, 7, 2, "B")   # aggregated
+    db.session.commit()
+    assert _counter(m.id) == (5, 5)
+
+    first = MerchantNotification.query.filter_by(merchant_id=m.id).first()
+    first.mark_as_read(); db.session.commit()
+    assert _counter(m.id) == (4, 5)
+
+    db.session.delete(first); db.session.commit()
+    assert _counter(m.id) == (4, 4)
+
+    ids = [n.id for n in MerchantNotification.query.filter_by(merchant_id=m.id).limit(2)]
+    assert MerchantNotification.bulk_delete(m.id, ids) == 2
+    db.session.commit()
+    assert _counter(m.id) == (2, 2)
+
+    with QueryAudit() as audit:
+        assert MerchantNotification.mark_all_as_read(m.id) == 2
+        db.session.commit()
+    assert not any("SELECT merchant_notifications.id" in s for s in audit.statements)
+    assert _counter(m.id) == (0, 2)
+
+    db.session.rollback()
+    assert notification_counter_service.rebuild() == 1
+    assert _counter(m.id) == (0, 2)
+
+
+def test_rolled_back_changes_leave_the_counter_alone(app):
+    _, m = _merchant()
+    _follow(m.id, 1)
+    from models.merchant_notification import MerchantNotification
+    MerchantNotification.create_follow_notification(m.id, 2, "Nope")
+    db.session.flush()
+    db.session.rollback()
+    assert _counter(m.id) == (1, 1)
+
+
+def test_list_endpoint_reads_counts_without_count_queries(app, client):
+    user, m = _merchant()
+    for n in range(3):
+        _follow(m.id, n)
+    headers = _auth(user.id)
+
+    with QueryAudit() as audit:
+        resp = client.get("/api/merchants/notifications?per_page=2", headers=headers)
+    assert resp.status_code == 200
+    body = resp.get_json()
+    assert body["unread_count"] == 3 and body["pagination"]["total"] == 3
+    assert len(body["data"]) == 2
+    assert not any("count(" in s.lower() for s in audit.statements)
+
+    resp = client.get("/api/merchants/notifications/unread-count", headers=headers)
+    assert resp.get_json()["unread_count"] == 3
+
+
+def _stream(client, user, last_event_id):
+    resp = client.get("/api/merchants/notifications/stream",
+                      headers={**_auth(user.id), "Last-Event-ID": last_event_id})
+    events = []
+    for block in resp.get_data(as_text=True).split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if ": " in line and not line.startswith(":"))
+        if fields.get("event") == "notification":
+            events.append((fields["id"], json.loads(fields["data"])["message"]))
+    return events
+
+
+def test_stream_resumes_between_notifications_sharing_a_timestamp(app, client, monkeypatch):
+    from datetime import datetime
+    from controllers import notification_controller
+    from models.merchant_notification import MerchantNotification
+    monkeypatch.setattr(notification_controller, "STREAM_BATCH_SIZE", 1)
+    user, m = _merchant()
+    for n in (1, 2, 3):
+        _follow(m.id, n)
+    same = datetime(2026, 10, 19, 9, 30)
+    MerchantNotification.query.update({"updated_at": same})
+    db.session.commit()
+
+    # One row per query, all at the same instant: each is sent once, in id order.
+    events = _stream(client, user, "2026-10-19T09:00:00")
+    assert [message for _, message in events] == [f"Follower {n} started following you" for n in (1, 2, 3)]
+    assert _stream(client, user, events[0][0]) == events[1:]
+    assert _stream(client, user, events[-1][0]) == []
+
+
+def test_stream_pushes_unread_count_and_new_notifications(app, client):
+    from models.merchant_notification import MerchantNotification
+    user, m = _merchant()
+    _follow(m.id, 1)
+    earlier = MerchantNotification.query.first().updated_at
+    _follow(m.id, 2)
+
+    resp = client.get("/api/merchants/notifications/stream",
+                      headers={**_auth(user.id), "Last-Event-ID": earlier.isoformat()})
+    assert resp.status_code == 200
+    assert resp.mimetype == "text/event-stream"
+
+    events = []
+    for block in resp.get_data(as_text=True).split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if ": " in line and not line.startswith(":"))
+        if "event" in fields:
+            events.append((fields["event"], json.loads(fields["data"])))
+
+    kinds = [name for name, _ in events]
+    assert kinds.count("unread_count") == 1 and events[-1][1] == {"unread_count": 2}
+    pushed = [data["message"] for name, data in events if name == "notification"]
+    assert pushed == ["Follower 2 started following you"]
+
+
+def test_polling_keeps_working_while_streams_are_open(app, client):
+    user, m = _merchant()
+    _follow(m.id, 1)
+    headers = _auth(user.id)
+    app.config["NOTIFICATION_STREAM_MAX_OPEN"] = 1
+
+    # The response is not read, so its stream stays open and holds the only slot.
+    held = client.get("/api/merchants/notifications/stream", headers=headers)
+    assert held.status_code == 200
+    refused = client.get("/api/merchants/notifications/stream", headers=headers)
+    assert refused.status_code == 503 and refused.headers["Retry-After"]
+
+    assert client.get("/api/merchants/notifications/unread-count", headers=headers).get_json()["unread_count"] == 1
+    assert client.get("/api/merchants/notifications", headers=headers).status_code == 200
+
+    held.close()
+    reopened = client.get("/api/merchants/notifications/stream", headers=headers)
+    assert reopened.status_code == 200
+    reopened.close()
+
+
+def test_stream_is_off_unless_enabled(app, client):
+    user, _ = _merchant()
+    app.config["NOTIFICATION_STREAM_ENABLED"] = False
+    resp = client.get("/api/merchants/notifications/stream", headers=_auth(user.id))
+    assert resp.status_code == 404 and "unread-count" in resp.get_json()["error"]
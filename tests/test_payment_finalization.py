@@ -0,0 +1,274 @@
+"""verify-payment: signature in the request, the order from a PaymentFinalization
+row, created once per gateway payment id however often the client retries."""
+import hashlib
+import hmac
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+from app import create_app
+from common.database import db
+
+SECRET = "rzp_test_secret"
+
+
+@pytest.fixture
+def app():
+    application = create_app("testing")
+    application.config["RAZORPAY_KEY_SECRET"] = SECRET
+    # Confirmation emails go to the outbox table, never to SMTP.
+    application.config["EMAIL_OUTBOX_ENABLED"] = True
+    application.config["MAIL_DEFAULT_SENDER"] = ("AOIN", "noreply@aoin.test")
+    with application.app_context():
+        db.create_all()
+        yield application
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+class FakeGateway:
+    """razorpay.Client stand-in: payment.fetch and order.fetch, with a call log."""
+
+    def __init__(self):
+        self.payments = {}
+        self.orders = {}
+        self.calls = []
+        self.down = False
+        self.payment = self._Resource(self, self.payments, "payment")
+        self.order = self._Resource(self, self.orders, "order")
+
+    class _Resource:
+        def __init__(self, gateway, items, name):
+            self.gateway, self.items, self.name = gateway, items, name
+
+        def fetch(self, key):
+            self.gateway.calls.append((self.name, key))
+            if self.gateway.down:
+                raise ConnectionError("gateway unreachable")
+            return self.items[key]
+
+
+@pytest.fixture
+def gateway(monkeypatch):
+    from routes import razorpay_routes
+    fake = FakeGateway()
+    monkeypatch.setattr(razorpay_routes, "get_razorpay_client", lambda: fake)
+    return fake
+
+
+def _mk_user(email):
+    from auth.models.models import User, UserRole
+    u = User(email=email, first_name="Bob", last_name="Buyer",
+             role=UserRole.USER, is_email_verified=True)
+    u.set_password("StrongPass123")
+    db.session.add(u)
+    db.session.flush()
+    return u
+
+
+def _seed():
+    """A buyer, another user and a product with 10 in stock under an 18% GST rule."""
+    from auth.models.models import MerchantProfile
+    from models.brand import Brand
+    from models.category import Category
+    from models.gst_rule import GSTRule
+    from models.product import Product
+    from models.product_stock import ProductStock
+
+    owner = _mk_user("owner@ex.com")
+    m = MerchantProfile(user_id=owner.id, business_name="Acme Seller", business_email="s@ex.com",
+                        business_phone="+919876543210", business_address="1 Market Rd",
+                        country_code="IN", state_province="Maharashtra", city="Pune",
+                        postal_code="411001", gstin="27ABCDE1234F1Z5")
+    c = Category(name="Widgets", slug="widgets")
+    b = Brand(name="Acme", slug="acme")
+    db.session.add_all([m, c, b]); db.session.flush()
+    p = Product(merchant_id=m.id, category_id=c.category_id, brand_id=b.brand_id, sku="W-1",
+                product_name="Widget", product_description="A widget",
+                cost_price=Decimal("500.00"), selling_price=Decimal("1180.00"),
+                active_flag=True, approval_status="approved")
+    db.session.add(p); db.session.flush()
+    db.session.add(ProductStock(product_id=p.product_id, stock_qty=10))
+    db.session.add(GSTRule(name="GST 18", category_id=c.category_id, gst_rate_percentage=Decimal("18.00"),
+                           is_active=True, start_date=date.today() - timedelta(days=30)))
+    buyer, other = _mk_user("buyer@ex.com"), _mk_user("other@ex.com")
+    db.session.commit()
+    return buyer, other, p
+
+
+def _checkout(gateway, buyer, product, quantity=2, n=1):
+    """A quote bound to gateway order order_<n>, captured as pay_<n>. Returns the request body."""
+    from services.checkout_quote_service import build_quote
+    quote = build_quote(buyer.id, {"items": [{"product_id": product.product_id, "quantity": quantity}]})
+    quote.razorpay_order_id = f"order_{n}"
+    db.session.commit()
+    gateway.orders[f"order_{n}"] = {"receipt": quote.quote_id}
+    gateway.payments[f"pay_{n}"] = {"amount": int(quote.charge_amount_minor), "currency": "INR"}
+    signature = hmac.new(SECRET.encode(), f"order_{n}|pay_{n}".encode(), hashlib.sha256).hexdigest()
+    return {"razorpay_order_id": f"order_{n}", "razorpay_payment_id": f"pay_{n}",
+            "razorpay_signature": signature}
+
+
+def _login(user_id):
+    from flask_jwt_extended import create_access_token
+    return {"Authorization": f"Bearer {create_access_token(identity=str(user_id))}"}
+
+
+def test_a_retried_verify_creates_one_order(client, app, gateway):
+    from models.order import Order
+    from models.product_stock import ProductStock
+
+    with app.app_context():
+        buyer, _, product = _seed()
+        body = _checkout(gateway, buyer, product)
+        headers, pid = _login(buyer.id), product.product_id
+
+    first = client.post("/api/razorpay/verify-payment", json=body, headers=headers)
+    assert first.status_code == 200, first.get_data(as_text=True)
+    data = first.get_json()["data"]
+    assert data["verified"] and data["order_id"] and data["quote_id"]
+
+    again = client.post("/api/razorpay/verify-payment", json=body, headers=headers)
+    assert again.status_code == 200 and again.get_json()["message"] == "Payment already verified"
+    assert again.get_json()["data"]["order_id"] == data["order_id"]
+
+    with app.app_context():
+        assert Order.query.filter_by(razorpay_payment_id="pay_1").count() == 1
+        assert ProductStock.query.filter_by(product_id=pid).first().stock_qty == 8
+    # The bound quote is found locally; only the capture is fetched, and only once.
+    assert gateway.calls == [("payment", "pay_1")]
+
+
+def test_background_mode_acknowledges_then_finalises(client, app, gateway, monkeypatch):
+    from services import payment_finalization
+
+    submitted = []
+
+    class Pool:
+        def submit(self, fn, app_, finalization_id):
+            submitted.append(finalization_id)
+
+    monkeypatch.setattr(payment_finalization.runner, "pool", lambda: Pool())
+    app.config["PAYMENT_FINALIZE_BACKGROUND"] = True
+    with app.app_context():
+        buyer, other, product = _seed()
+        body = _checkout(gateway, buyer, product)
+        headers, other_headers = _login(buyer.id), _login(other.id)
+
+    resp = client.post("/api/razorpay/verify-payment", json=body, headers=headers)
+    assert resp.status_code == 202
+    status_url = resp.get_json()["data"]["status_url"]
+    assert status_url == "/api/razorpay/verify-payment/pay_1" and len(submitted) == 1
+    assert gateway.calls == []
+    assert client.get(status_url, headers=headers).status_code == 202
+    assert client.get(status_url, headers=other_headers).status_code == 404
+
+    with app.app_context():
+        payment_finalization.run(submitted[0])
+    done = client.get(status_url, headers=headers)
+    assert done.status_code == 200 and done.get_json()["data"]["order_id"]
+
+
+def test_a_worker_that_died_after_the_order_is_not_repeated(app, gateway):
+    from models.order import Order
+    from models.payment_finalization import PaymentFinalization
+    from services import payment_finalization
+
+    with app.app_context():
+        buyer, _, product = _seed()
+        body = _checkout(gateway, buyer, product)
+        row, _ = payment_finalization.enqueue(body["razorpay_payment_id"], body["razorpay_order_id"], buyer.id)
+        order_id = row.order_id
+
+        # As if the worker committed the order and died before marking its row.
+        row.status, row.order_id, row.notified_at = PaymentFinalization.STATUS_RUNNING, None, None
+        row.created_at = row.heartbeat_at = datetime.utcnow() - timedelta(hours=1)
+        db.session.commit()
+
+        assert payment_finalization.sweep() == 1
+        row = PaymentFinalization.query.one()
+        assert row.status == "done" and row.order_id == order_id and row.attempts == 2
+        assert Order.query.count() == 1
+
+
+def test_failures_are_recorded_with_their_status(client, app, gateway):
+    with app.app_context():
+        buyer, other, product = _seed()
+        mismatch = _checkout(gateway, buyer, product, n=1)
+        gateway.payments["pay_1"]["amount"] -= 100
+        unreachable = _checkout(gateway, buyer, product, n=2)
+        stolen = _checkout(gateway, buyer, product, n=3)
+        headers, other_headers = _login(buyer.id), _login(other.id)
+    app.config["PAYMENT_FINALIZE_ATTEMPTS"] = 2
+
+    resp = client.post("/api/razorpay/verify-payment", json=mismatch, headers=headers)
+    assert resp.status_code == 400 and "does not match" in resp.get_json()["message"]
+    # The failure is the row's state, so a retry answers the same without redoing it.
+    calls = len(gateway.calls)
+    assert client.post("/api/razorpay/verify-payment", json=mismatch, headers=headers).status_code == 400
+    assert len(gateway.calls) == calls
+
+    gateway.down = True
+    resp = client.post("/api/razorpay/verify-payment", json=unreachable, headers=headers)
+    assert resp.status_code == 502 and gateway.calls[-2:] == [("payment", "pay_2")] * 2
+    # An unreachable gateway is not final: once it is back, a retry places the order.
+    gateway.down = False
+    resp = client.post("/api/razorpay/verify-payment", json=unreachable, headers=headers)
+    assert resp.status_code == 200, resp.get_data(as_text=True)
+    assert resp.get_json()["data"]["order_id"].startswith("ORD")
+
+    # Somebody else's quote, verified with a valid signature, never becomes their order.
+    assert client.post("/api/razorpay/verify-payment", json=stolen,
+                       headers=other_headers).status_code == 403
+    bad = dict(stolen, razorpay_signature="0" * 64)
+    assert client.post("/api/razorpay/verify-payment", json=bad, headers=headers).status_code == 400
+
+
+def test_confirmation_email_is_queued_once(app, gateway):
+    from models.email_outbox import EmailOutbox
+    from models.payment_finalization import PaymentFinalization
+    from services import payment_finalization
+
+    with app.app_context():
+        buyer, _, product = _seed()
+        body = _checkout(gateway, buyer, product)
+        row, _ = payment_finalization.enqueue(body["razorpay_payment_id"], body["razorpay_order_id"], buyer.id)
+        assert row.notified_at is not None
+
+        mail = EmailOutbox.query.one()
+        assert mail.to_email == "buyer@ex.com" and row.order_id in mail.subject
+
+        payment_finalization._notify(row.finalization_id)
+        PaymentFinalization.query.filter_by(finalization_id=row.finalization_id) \
+            .update({"status": "running", "heartbeat_at": None})
+        db.session.commit()
+        payment_finalization.run(row.finalization_id)
+        assert EmailOutbox.query.count() == 1
+
+
+def test_sweep_retries_gateway_failures_after_backoff(app, gateway):
+    from models.order import Order
+    from models.payment_finalization import PaymentFinalization
+    from services import payment_finalization
+
+    with app.app_context():
+        buyer, _, product = _seed()
+        body = _checkout(gateway, buyer, product)
+        gateway.down = True
+        row, _ = payment_finalization.enqueue(body["razorpay_payment_id"], body["razorpay_order_id"], buyer.id)
+        assert row.status == "failed" and row.error_status == 502
+        gateway.down = False
+
+        # Not before the backoff has passed.
+        assert payment_finalization.sweep() == 0
+        row.finished_at = datetime.utcnow() - timedelta(minutes=5)
+        db.session.commit()
+        assert payment_finalization.sweep() == 1
+        row = PaymentFinalization.query.one()
+        assert row.status == "done" and Order.query.filter_by(order_id=row.order_id).count() == 1
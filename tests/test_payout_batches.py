@@ -0,0 +1,221 @@
+"""Bulk payouts: written as a batch, submitted concurrently under a rate limit with
+retries, one state per payout, and never paid twice across retries and restarts."""
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import create_app
+from common.database import db
+
+
+@pytest.fixture
+def app():
+    application = create_app("testing")
+    with application.app_context():
+        db.create_all()
+        yield application
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+class FakeGateway:
+    """SimulatedPayoutGateway with scripted failures and a log of calls in flight."""
+
+    def __init__(self, delay=0):
+        from services.payout_batches import SimulatedPayoutGateway
+        self.inner = SimulatedPayoutGateway()
+        self.delay = delay
+        self.failures = {}  # merchant_id -> [PayoutGatewayError, ...] raised in order
+        self.calls = []
+        self.in_flight = self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def create_payout(self, payout):
+        with self._lock:
+            self.calls.append(payout["reference_id"])
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            script = self.failures.get(payout["merchant_id"])
+            error = script.pop(0) if script else None
+        try:
+            if self.delay:
+                time.sleep(self.delay)
+            if error:
+                raise error
+            return self.inner.create_payout(payout)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+@pytest.fixture
+def gateway(monkeypatch):
+    from services import payout_batches
+    fake = FakeGateway()
+    monkeypatch.setattr(payout_batches, "get_gateway", lambda: fake)
+    return fake
+
+
+def _mk_user(email, role):
+    from auth.models.models import User
+    u = User(email=email, first_name="A", last_name="B", role=role, is_email_verified=True)
+    u.set_password("StrongPass123")
+    db.session.add(u); db.session.flush()
+    return u
+
+
+def _seed(merchants=3):
+    """Merchant ids and (admin, merchant-owner) auth headers."""
+    from flask_jwt_extended import create_access_token
+    from auth.models.models import MerchantProfile, UserRole
+
+    ids = []
+    for i in range(merchants):
+        owner = _mk_user(f"owner{i}@ex.com", UserRole.MERCHANT)
+        m = MerchantProfile(user_id=owner.id, business_name=f"Shop {i}", business_email=f"s{i}@ex.com",
+                            business_phone="+919876543210", business_address="1 Rd",
+                            country_code="IN", state_province="MH", city="Pune", postal_code="411001")
+        db.session.add(m); db.session.flush()
+        ids.append(m.id)
+    admin = _mk_user("admin@ex.com", UserRole.SUPER_ADMIN)
+    db.session.commit()
+    return ids, ({"Authorization": f"Bearer {create_access_token(identity=str(admin.id))}"},
+                 {"Authorization": f"Bearer {create_access_token(identity=str(owner.id))}"})
+
+
+def _body(merchant_ids, amount=1500.5):
+    return {"payouts": [{"merchant_id": m, "amount": amount, "notes": {"week": "2026-42"}}
+                        for m in merchant_ids]}
+
+
+def test_a_batch_pays_each_merchant_once(client, app, gateway):
+    with app.app_context():
+        ids, (admin, _) = _seed()
+    headers = dict(admin, **{"Idempotency-Key": "weekly-2026-42"})
+
+    resp = client.post("/api/razorpay/payouts/bulk", json=_body(ids), headers=headers)
+    assert resp.status_code == 200, resp.get_data(as_text=True)
+    data = resp.get_json()["data"]
+    assert data["status"] == "done" and data["counts"]["initiated"] == 3
+    assert [p["merchant_id"] for p in data["payouts"]] == ids
+    assert all(p["status"] == "initiated" and p["payout_id"].startswith("sim_") for p in data["payouts"])
+    assert data["payouts"][0]["amount"] == 1500.5
+
+    # A resubmitted request returns the same batch without calling the gateway again.
+    again = client.post("/api/razorpay/payouts/bulk", json=_body(ids), headers=headers)
+    assert again.get_json()["message"] == "Payouts already submitted"
+    assert again.get_json()["data"]["batch_id"] == data["batch_id"]
+    assert len(gateway.calls) == 3
+
+
+def test_calls_run_concurrently_and_retry_transient_errors(client, app, gateway):
+    from services.payout_batches import PayoutGatewayError
+
+    gateway.delay = 0.05
+    app.config.update(PAYOUT_CONCURRENCY=4, PAYOUT_CHUNK_SIZE=3, PAYOUT_ATTEMPTS=3)
+    with app.app_context():
+        ids, (admin, _) = _seed(merchants=6)
+    gateway.failures[ids[0]] = [PayoutGatewayError("RazorpayX answered 503")] * 2
+    gateway.failures[ids[1]] = [PayoutGatewayError("RazorpayX answered 503")] * 3
+    gateway.failures[ids[2]] = [PayoutGatewayError("Invalid fund account", retryable=False)]
+
+    data = client.post("/api/razorpay/payouts/bulk", json=_body(ids), headers=admin).get_json()["data"]
+    by_merchant = {p["merchant_id"]: p for p in data["payouts"]}
+
+    assert gateway.max_in_flight > 1
+    assert by_merchant[ids[0]]["status"] == "initiated" and by_merchant[ids[0]]["attempts"] == 3
+    assert by_merchant[ids[1]]["status"] == "failed" and by_merchant[ids[1]]["attempts"] == 3
+    assert by_merchant[ids[2]]["status"] == "failed" and by_merchant[ids[2]]["attempts"] == 1
+    assert data["counts"] == {"pending": 0, "submitting": 0, "initiated": 4, "failed": 2}
+
+    # Retrying sends only the failure another attempt can fix.
+    calls = len(gateway.calls)
+    retried = client.post(f"/api/razorpay/payouts/batches/{data['batch_id']}/retry", headers=admin)
+    assert retried.get_json()["data"]["counts"]["initiated"] == 5
+    assert len(gateway.calls) == calls + 1
+    failed = client.get(f"/api/razorpay/payouts/batches/{data['batch_id']}?status=failed",
+                        headers=admin).get_json()["data"]["payouts"]
+    assert [p["merchant_id"] for p in failed] == [ids[2]] and "fund account" in failed[0]["error"]
+
+
+def test_background_mode_reports_progress(client, app, gateway, monkeypatch):
+    from services import payout_batches
+
+    submitted = []
+
+    class Pool:
+        def submit(self, fn, app_, batch_id):
+            submitted.append(batch_id)
+
+    monkeypatch.setattr(payout_batches.runner, "pool", lambda: Pool())
+    app.config["PAYOUT_BATCH_BACKGROUND"] = True
+    with app.app_context():
+        ids, (admin, _) = _seed()
+
+    resp = client.post("/api/razorpay/payouts/bulk", json=_body(ids), headers=admin)
+    assert resp.status_code == 202 and gateway.calls == []
+    data = resp.get_json()["data"]
+    assert data["counts"]["pending"] == 3 and "payouts" not in data
+    assert submitted == [data["batch_id"]]
+    assert client.get(data["status_url"], headers=admin).status_code == 202
+
+    with app.app_context():
+        payout_batches.run(submitted[0])
+    done = client.get(data["status_url"], headers=admin)
+    assert done.status_code == 200 and done.get_json()["data"]["counts"]["initiated"] == 3
+
+
+def test_a_restarted_batch_resubmits_with_the_same_reference(app, gateway):
+    from auth.models.models import User
+    from models.payout_batch import Payout, PayoutBatch
+    from services import payout_batches
+
+    with app.app_context():
+        ids, _ = _seed()
+        admin = User.query.filter_by(email="admin@ex.com").one()
+        batch, _ = payout_batches.create_batch(admin.id, _body(ids)["payouts"])
+        first = {p.reference_id: p.gateway_payout_id for p in batch.payouts}
+
+        # As if the worker died mid-chunk: payouts sent, outcomes never written.
+        Payout.query.update({"status": Payout.STATUS_SUBMITTING, "gateway_payout_id": None},
+                            synchronize_session=False)
+        stale = datetime.utcnow() - timedelta(hours=1)
+        batch.status, batch.heartbeat_at, batch.created_at = PayoutBatch.STATUS_RUNNING, stale, stale
+        db.session.commit()
+
+        assert payout_batches.sweep() == 1
+        batch = db.session.get(PayoutBatch, batch.batch_id)
+        assert batch.status == "done" and batch.attempts == 2
+        assert {p.reference_id: p.gateway_payout_id for p in batch.payouts} == first
+        # Six calls, three distinct payouts at the gateway.
+        assert len(gateway.calls) == 6 and len(gateway.inner.payouts) == 3
+
+
+def test_requests_are_checked(client, app, gateway):
+    from services.payout_batches import RateLimiter
+
+    with app.app_context():
+        ids, (admin, merchant) = _seed()
+
+    assert client.post("/api/razorpay/payouts/bulk", json=_body(ids), headers=merchant).status_code == 403
+    for body in ({}, {"payouts": [{"merchant_id": ids[0]}]}, _body(ids, amount=-5),
+                 _body([ids[0], 999999])):
+        assert client.post("/api/razorpay/payouts/bulk", json=body, headers=admin).status_code == 400
+    app.config["PAYOUT_GATEWAY"] = "razorpayx"
+    resp = client.post("/api/razorpay/payouts/bulk", json=_body(ids), headers=admin)
+    assert resp.status_code == 400 and "fund_account_id" in resp.get_json()["message"]
+    assert gateway.calls == []
+
+    # Four calls at 2/s from one instant are spaced half a second apart.
+    now, slept = [0.0], []
+    limiter = RateLimiter(2, clock=lambda: now[0], sleep=slept.append)
+    for _ in range(4):
+        limiter.acquire()
+    assert slept == [0.5, 1.0, 1.5]
@@ -0,0 +1,141 @@
+"""Product listing cards: built in a fixed number of statements whatever the page
+size, with the same fields the per-product serialization produced."""
+from decimal import Decimal
+
+import pytest
+
+from app import create_app
+from common.database import db
+from common.query_audit import QueryAudit
+
+
+@pytest.fixture
+def app():
+    application = create_app("testing")
+    with application.app_context():
+        db.create_all()
+        yield application
+        db.session.remove()
+        db.drop_all()
+
+
+def _seed(product_count):
+    from auth.models.models import MerchantProfile, User, UserRole
+    from models.brand import Brand
+    from models.category import Category
+    from models.enums import MediaType
+    from models.product import Product
+    from models.product_media import ProductMedia
+    from models.product_stock import ProductStock
+
+    owner = User(email="seller@ex.com", first_name="Sam", last_name="Seller",
+                 role=UserRole.MERCHANT, is_email_verified=True)
+    owner.set_password("StrongPass123")
+    db.session.add(owner); db.session.flush()
+    m = MerchantProfile(user_id=owner.id, business_name="Acme", business_email="acme@ex.com",
+                        business_phone="+919876543210", business_address="1 Market Rd",
+                        country_code="IN", state_province="MH", city="Pune",
+                        postal_code="411001", gstin="27ABCDE1234F1Z5")
+    db.session.add(m); db.session.flush()
+    c = Category(name="Widgets", slug="widgets"); db.session.add(c)
+    b = Brand(name="Acme", slug="acme"); db.session.add(b); db.session.flush()
+    products = []
+    for i in range(product_count):
+        p = Product(merchant_id=m.id, category_id=c.category_id, brand_id=b.brand_id,
+                    sku=f"W-{i}", product_name=f"Widget {i}", product_description="A widget",
+                    cost_price=Decimal("50.00"), selling_price=Decimal("100.00"),
+                    discount_pct=Decimal("10.00"), active_flag=True, approval_status="approved")
+        db.session.add(p); db.session.flush()
+        db.session.add(ProductStock(product_id=p.product_id, stock_qty=i + 1))
+        for n in range(2):
+            db.session.add(ProductMedia(product_id=p.product_id, type=MediaType.IMAGE,
+                                        url=f"https://cdn.ex/{i}/{n}.jpg", sort_order=n))
+        products.append(p)
+    db.session.commit()
+    return products
+
+
+def _count(product_ids, **options):
+    from services.product_hydrator import ProductHydrator
+    db.session.expunge_all()
+    with QueryAudit() as audit:
+        cards = ProductHydrator(**options).cards(product_ids)
+    return audit.count, cards
+
+
+def test_statement_count_does_not_grow_with_page_size(app):
+    ids = [p.product_id for p in _seed(8)]
+    for options in ({}, {"reviews": True, "media_list": True}, {"taxonomy": True}):
+        small, _ = _count(ids[:2], **options)
+        large, cards = _count(ids, **options)
+        assert small == large, options
+        assert len(cards) == 8
+
+
+def test_card_fields_and_order(app):
+    products = _seed(3)
+    ids = [p.product_id for p in reversed(products)]
+    _, cards = _count(ids, reviews=True, media_list=True, taxonomy=True)
+
+    assert [c["id"] for c in cards] == [str(i) for i in ids]
+    card = cards[-1]
+    assert card["name"] == "Widget 0" and card["stock"] == 1
+    assert card["rating"] == 0.0 and card["rating_count"] == 0 and card["reviews"] == []
+    assert card["discount_pct"] == 10.0
+    assert card["category"]["name"] == "Widgets" and card["brand"]["name"] == "Acme"
+    assert [m["url"] for m in card["media"]] == ["https://cdn.ex/0/0.jpg", "https://cdn.ex/0/1.jpg"]
+    assert card["image"] == card["primary_image"] == "https://cdn.ex/0/0.jpg"
+
+
+def test_primary_image_prefers_thumbnail_then_main_image():
+    from types import SimpleNamespace
+    from services.product_hydrator import pick_primary_image
+
+    def img(name, thumb=False, main=False):
+        return SimpleNamespace(url=name, is_thumbnail=thumb, is_main_image=main)
+
+    assert pick_primary_image([]) is None
+    assert pick_primary_image([img("a"), img("b")]).url == "a"
+    assert pick_primary_image([img("a"), img("b", main=True)]).url == "b"
+    assert pick_primary_image([img("a"), img("b", main=True), img("c", thumb=True)]).url == "c"
+
+
+def test_shop_cards_match_the_per_product_helpers(app):
+    from controllers.shop.public.public_shop_product_controller import PublicShopProductController as C
+    from models.enums import MediaType
+    from models.shop.shop import Shop
+    from models.shop.shop_category import ShopCategory
+    from models.shop.shop_product import ShopProduct
+    from models.shop.shop_product_media import ShopProductMedia
+    from models.shop.shop_product_stock import ShopProductStock
+    from services.product_hydrator import ShopProductHydrator
+
+    shop = Shop(name="Corner", slug="corner"); db.session.add(shop); db.session.flush()
+    cat = ShopCategory(shop_id=shop.shop_id, name="Tools", slug="tools"); db.session.add(cat); db.session.flush()
+    ids = []
+    for i in range(4):
+        p = ShopProduct(shop_id=shop.shop_id, category_id=cat.category_id, sku=f"S-{i}",
+                        product_name=f"Tool {i}", product_description="A tool",
+                        cost_price=Decimal("5"), selling_price=Decimal("10"), is_published=True)
+        db.session.add(p); db.session.flush()
+        if i % 2 == 0:
+            db.session.add(ShopProductStock(product_id=p.product_id, stock_qty=i))
+        db.session.add(ShopProductMedia(product_id=p.product_id, type=MediaType.IMAGE,
+                                        url=f"https://cdn.ex/s{i}.jpg", sort_order=0))
+        ids.append(p.product_id)
+    db.session.commit()
+
+    db.session.expunge_all()
+    with QueryAudit() as small:
+        ShopProductHydrator(media=True).cards(ids[:1])
+    db.session.expunge_all()
+    with QueryAudit() as large:
+        cards = ShopProductHydrator(media=True).cards(ids)
+    assert small.count == large.count
+
+    for card in cards:
+        pid = card["product_id"]
+        assert card["media"] == C.get_optimized_media(pid)
+        assert card["primary_image"] == f"https://cdn.ex/s{ids.index(pid)}.jpg"
+        assert card["short_description"] == "A tool" and card["meta_title"] is None
+    assert [c["is_in_stock"] for c in cards] == [False, False, True, False]
@@ -0,0 +1,65 @@
+"""N+1 detection and the query_budget fixture (common/query_audit.py)."""
+import logging
+
+import pytest
+
+from app import create_app
+from common.database import db
+from common.query_audit import fingerprint
+
+
+@pytest.fixture
+def app():
+    application = create_app("testing")
+    with application.app_context():
+        db.create_all()
+
+        @application.route("/_test/n-plus-one")
+        def n_plus_one():
+            for i in range(6):
+                db.session.execute(db.text(f"SELECT {i}"))
+            return "ok"
+
+        yield application
+        db.session.remove()
+        db.drop_all()
+
+
+def test_fingerprint_ignores_values_and_in_list_length():
+    a = fingerprint("SELECT * FROM reviews WHERE product_id = 12 AND status = 'ok'")
+    b = fingerprint("SELECT * FROM reviews WHERE product_id = 9731 AND status = 'hidden'")
+    assert a == b
+
+    c = fingerprint("SELECT * FROM media WHERE product_id IN (?, ?, ?)")
+    d = fingerprint("SELECT * FROM media WHERE product_id IN (?)")
+    assert c == d
+
+
+def test_repeated_statement_is_logged_as_n_plus_one(app, caplog):
+    with caplog.at_level(logging.WARNING):
+        resp = app.test_client().get("/_test/n-plus-one")
+    assert resp.headers["X-Query-Count"] == "6"
+    assert any("Possible N+1" in r.getMessage() and "6x" in r.getMessage() for r in caplog.records)
+
+
+def test_endpoint_budget_is_enforced_in_logs(app, caplog):
+    app.config["QUERY_BUDGETS"] = {"n_plus_one": 3}
+    with caplog.at_level(logging.WARNING):
+        app.test_client().get("/_test/n-plus-one")
+    assert any("Query budget exceeded" in r.getMessage() for r in caplog.records)
+
+
+def test_query_budget_fixture_passes_within_budget(app, query_budget):
+    client = app.test_client()
+    with query_budget(0):
+        client.get("/health")
+    with query_budget(6) as audit:
+        client.get("/_test/n-plus-one")
+    assert audit.count == 6
+
+
+def test_query_budget_fixture_fails_on_n_plus_one(app, query_budget):
+    client = app.test_client()
+    with pytest.raises(AssertionError, match="likely N\\+1"):
+        with query_budget(max_repeats=2):
+            client.get("/_test/n-plus-one")
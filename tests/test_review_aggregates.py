@@ -0,0 +1,171 @@
+"""Review aggregates: kept in step by create/delete, and read by product listings
+in place of per-product AVG queries and full review embedding."""
+from decimal import Decimal
+
+import pytest
+
+from app import create_app
+from common.database import db
+
+
+@pytest.fixture
+def app():
+    application = create_app("testing")
+    application.config["REVIEW_PREVIEW_LIMIT"] = 2
+    with application.app_context():
+        db.create_all()
+        yield application
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def _seed(product_count=2):
+    from auth.models.models import MerchantProfile, User, UserRole
+    from models.brand import Brand
+    from models.category import Category
+    from models.product import Product
+    from models.product_stock import ProductStock
+
+    owner = User(email="seller@ex.com", first_name="Sam", last_name="Seller",
+                 role=UserRole.MERCHANT, is_email_verified=True)
+    owner.set_password("StrongPass123")
+    db.session.add(owner); db.session.flush()
+    m = MerchantProfile(user_id=owner.id, business_name="Acme", business_email="acme@ex.com",
+                        business_phone="+919876543210", business_address="1 Market Rd",
+                        country_code="IN", state_province="MH", city="Pune",
+                        postal_code="411001", gstin="27ABCDE1234F1Z5")
+    db.session.add(m); db.session.flush()
+    c = Category(name="Widgets", slug="widgets"); db.session.add(c)
+    b = Brand(name="Acme", slug="acme"); db.session.add(b); db.session.flush()
+    products = []
+    for i in range(product_count):
+        p = Product(merchant_id=m.id, category_id=c.category_id, brand_id=b.brand_id,
+                    sku=f"W-{i}", product_name=f"Widget {i}", product_description="A widget",
+                    cost_price=Decimal("50.00"), selling_price=Decimal("100.00"),
+                    active_flag=True, approval_status="approved")
+        db.session.add(p); db.session.flush()
+        db.session.add(ProductStock(product_id=p.product_id, stock_qty=5))
+        products.append(p)
+    db.session.commit()
+    return m, products
+
+
+def _buyer_with_delivered_order(n, merchant, products):
+    from auth.models.models import User, UserRole
+    from models.enums import OrderStatusEnum, PaymentMethodEnum, PaymentStatusEnum
+    from models.order import Order, OrderItem
+    buyer = User(email=f"buyer{n}@ex.com", first_name=f"B{n}", last_name="Buyer",
+                 role=UserRole.USER, is_email_verified=True)
+    buyer.set_password("StrongPass123")
+    db.session.add(buyer); db.session.flush()
+    order = Order(
+        user_id=buyer.id, order_status=OrderStatusEnum.DELIVERED,
+        subtotal_amount=Decimal("0"), discount_amount=Decimal("0"), tax_amount=Decimal("0"),
+        shipping_amount=Decimal("0"), total_amount=Decimal("0"), currency="INR",
+        payment_method=PaymentMethodEnum.CREDIT_CARD, payment_status=PaymentStatusEnum.SUCCESSFUL,
+    )
+    for p in products:
+        order.items.append(OrderItem(
+            product_id=p.product_id, merchant_id=merchant.id, product_name_at_purchase=p.product_name,
+            sku_at_purchase=p.sku, quantity=1, final_base_price_for_gst_calc=Decimal("100"),
+            gst_rate_applied_at_purchase=Decimal("0"), gst_amount_per_unit=Decimal("0"),
+            unit_price_inclusive_gst=Decimal("100"), line_item_total_inclusive_gst=Decimal("100"),
+        ))
+    db.session.add(order); db.session.commit()
+    return buyer, order
+
+
+def _review(buyer, order, product, rating):
+    from controllers.review_controller import ReviewController
+    return ReviewController.create_review(buyer.id, {
+        "order_id": order.order_id, "product_id": product.product_id,
+        "rating": rating, "title": "t", "body": "b",
+    })
+
+
+def test_create_and_delete_keep_the_aggregate_current(app, monkeypatch):
+    from controllers import review_controller
+    from controllers.review_controller import ReviewController
+    from models.review_aggregate import ProductRatingSummary
+    monkeypatch.setattr(review_controller, "get_s3_service", lambda: None)   # no images to delete
+    m, (p, _other) = _seed()
+    reviews = []
+    for n, rating in enumerate((5, 4, 4)):
+        buyer, order = _buyer_with_delivered_order(n, m, [p])
+        reviews.append((buyer, _review(buyer, order, p, rating)))
+
+    summary = db.session.get(ProductRatingSummary, p.product_id)
+    assert (summary.rating_count, summary.rating_sum) == (3, 13)
+    assert summary.histogram == {"1": 0, "2": 0, "3": 0, "4": 2, "5": 1}
+    assert float(summary.rating_avg) == pytest.approx(4.33)
+
+    buyer, data = reviews[0]
+    ReviewController.delete_review(data["review_id"], buyer.id)
+    db.session.expire_all()
+    summary = db.session.get(ProductRatingSummary, p.product_id)
+    assert (summary.rating_count, summary.rating_sum, summary.count_5) == (2, 8, 0)
+
+
+def test_changes_apply_to_the_stored_counts_in_one_statement(app, query_budget):
+    from controllers.superadmin.review_controller import ReviewController
+    from models.review_aggregate import ProductRatingSummary
+    from services import review_aggregate_service
+    m, (p, _other) = _seed()
+    buyer, order = _buyer_with_delivered_order(0, m, [p])
+    review = _review(buyer, order, p, 2)
+    rated, unrated = p.product_id, _other.product_id
+
+    # Upserts add to the row without reading it, whether or not it exists yet.
+    with query_budget(max_queries=2):
+        review_aggregate_service.add_product_rating(rated, 5)
+        review_aggregate_service.add_product_rating(unrated, 3)
+    db.session.commit()
+    summary = db.session.get(ProductRatingSummary, rated)
+    assert (summary.rating_count, summary.rating_sum, float(summary.rating_avg)) == (2, 7, 3.5)
+    assert db.session.get(ProductRatingSummary, unrated).rating_count == 1
+
+    # A soft-deleted review is uncounted once, however often it is deleted.
+    for _ in range(2):
+        ReviewController.delete(review["review_id"])
+    db.session.expire_all()
+    summary = db.session.get(ProductRatingSummary, rated)
+    assert (summary.rating_count, summary.rating_sum, summary.count_2, float(summary.rating_avg)) == (1, 5, 0, 5.0)
+
+
+def test_listing_reads_aggregates_and_caps_embedded_reviews(app, client, query_budget):
+    m, products = _seed(product_count=3)
+    for n in range(4):
+        buyer, order = _buyer_with_delivered_order(n, m, products[:2])
+        _review(buyer, order, products[0], 5 - n % 2)   # 5, 4, 5, 4
+        _review(buyer, order, products[1], 2)
+
+    # Shape of the statements must not grow with the number of products or reviews.
+    with query_budget(max_repeats=3):
+        resp = client.get("/api/products?per_page=10")
+    assert resp.status_code == 200
+    by_id = {p["id"]: p for p in resp.get_json()["products"]}
+
+    first = by_id[str(products[0].product_id)]
+    assert first["rating"] == 4.5 and first["rating_count"] == 4
+    assert len(first["reviews"]) == 2
+    assert by_id[str(products[1].product_id)]["rating"] == 2.0
+    unrated = by_id[str(products[2].product_id)]
+    assert unrated["rating"] == 0.0 and unrated["reviews"] == []
+
+
+def test_min_rating_filter_uses_aggregates(app, client):
+    m, products = _seed(product_count=3)
+    buyer, order = _buyer_with_delivered_order(0, m, products[:2])
+    _review(buyer, order, products[0], 5)
+    _review(buyer, order, products[1], 3)
+
+    ids = lambda r: {p["id"] for p in r.get_json()["products"]}
+    assert ids(client.get("/api/products?min_rating=4")) == {str(products[0].product_id)}
+    assert ids(client.get("/api/products?min_rating=3")) == {str(p.product_id) for p in products[:2]}
+    # COALESCE(AVG, 0) semantics: unrated products pass a zero threshold.
+    assert len(ids(client.get("/api/products?min_rating=0"))) == 3
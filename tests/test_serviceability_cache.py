@@ -0,0 +1,101 @@
+"""Checkout serviceability quotes come from a cache keyed by pincode pair, weight
+band and COD band; booking still asks ShipRocket live."""
+import pytest
+
+from app import create_app
+
+
+@pytest.fixture
+def app():
+    application = create_app("testing")
+    application.config.update(SHIPROCKET_EMAIL="ops@example.com", SHIPROCKET_PASSWORD="pw")
+    from services import serviceability_cache
+    from services.shiprocket_client import reset_shiprocket_client
+    reset_shiprocket_client()
+    serviceability_cache.clear_local()
+    with application.app_context():
+        yield application
+    reset_shiprocket_client()
+    serviceability_cache.clear_local()
+
+
+class FakeResponse:
+    def __init__(self, status, body):
+        self.status_code, self.reason, self._body, self.text = status, "", body, str(body)
+
+    def json(self):
+        return self._body
+
+
+@pytest.fixture
+def shiprocket(app):
+    """Serves 110001 and nothing else; 999999 is down."""
+    from services.shiprocket_client import get_shiprocket_client
+
+    client = get_shiprocket_client()
+    client._remember("token", 3600)
+    calls = []
+
+    def request(method, url, headers=None, params=None, json=None, timeout=None):
+        calls.append(params)
+        if params["delivery_postcode"] == "999999":
+            return FakeResponse(502, {"message": "bad gateway"})
+        couriers = [{"courier_company_id": 1, "courier_name": "Fast", "rate": 40 * params["weight"],
+                     "etd": "2 days"}] if params["delivery_postcode"] == "110001" else []
+        return FakeResponse(200, {"data": {"available_courier_companies": couriers}})
+
+    client.session.request = request
+    return calls
+
+
+def _quote(weight, delivery="110001", cod=0, **kwargs):
+    from controllers.shiprocket_controller import ShipRocketController
+    return ShipRocketController().check_serviceability("560001", delivery, weight, cod=cod, **kwargs)
+
+
+def test_views_in_one_weight_band_share_a_quote(app, shiprocket):
+    first = _quote(0.3)
+    assert _quote(0.45) == first
+    _quote(0.7)
+
+    assert [c["weight"] for c in shiprocket] == [0.5, 1.0], "quoted the raw weight, not the band"
+    assert first["data"]["available_courier_companies"][0]["rate"] == 20.0
+
+
+def test_cod_is_part_of_the_key(app, shiprocket):
+    _quote(1, cod=0)
+    _quote(1, cod=1200)
+    _quote(1, cod=1400)
+
+    assert len(shiprocket) == 2
+    assert shiprocket[1]["cod"] == 1 and shiprocket[1]["cod_amount"] == 1500
+
+
+def test_unserviceable_pairs_are_cached_but_failures_are_not(app, shiprocket):
+    assert _quote(1, delivery="400001")["data"]["available_courier_companies"] == []
+    _quote(1, delivery="400001")
+    _quote(1, delivery="999999")
+    _quote(1, delivery="999999")
+
+    assert [c["delivery_postcode"] for c in shiprocket] == ["400001", "999999", "999999"]
+
+
+def test_booking_asks_live_with_the_real_weight(app, shiprocket):
+    _quote(0.3)
+    _quote(0.3, use_cache=False)
+    _quote(0.3, use_cache=False)
+
+    assert [c["weight"] for c in shiprocket] == [0.5, 0.3, 0.3]
+
+
+def test_prefetch_warms_every_combination(app, shiprocket):
+    from services import serviceability_cache
+
+    stats = serviceability_cache.prefetch(["560001"], ["110001", "400001", "999999"],
+                                          weights=(0.4, 0.5, 1.5), workers=4)
+
+    # 0.4 and 0.5 are one band: 3 deliveries x 2 bands.
+    assert len(shiprocket) == 6
+    assert stats == {"quoted": 4, "serviceable": 2, "failed": 2}
+    _quote(1.2)
+    assert len(shiprocket) == 6, "a prefetched quote went to ShipRocket again"
@@ -0,0 +1,360 @@
+"""Shipment jobs: one per merchant, steps retried and saved, resumed without
+booking twice, and the confirmation route answering before ShipRocket does."""
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+from app import create_app
+from common.database import db
+
+
+@pytest.fixture
+def app():
+    application = create_app("testing")
+    with application.app_context():
+        db.create_all()
+        yield application
+        db.session.remove()
+        db.drop_all()
+
+
+def _mk_user(email, role=None):
+    from auth.models.models import User, UserRole
+    u = User(email=email, first_name="Bob", last_name="Buyer", role=role or UserRole.USER, is_email_verified=True)
+    u.set_password("StrongPass123")
+    db.session.add(u)
+    db.session.flush()
+    return u
+
+
+def _mk_merchant(owner, postal_code):
+    from auth.models.models import MerchantProfile
+    m = MerchantProfile(
+        user_id=owner.id, business_name=f"Seller {owner.id}", business_email=f"sell{owner.id}@ex.com",
+        business_phone="+919876543210", business_address="1 Market Rd",
+        country_code="IN", state_province="Maharashtra", city="Pune", postal_code=postal_code,
+        shiprocket_pickup_location_name=f"Merchant_{owner.id}",
+    )
+    db.session.add(m)
+    db.session.flush()
+    return m
+
+
+def _mk_order(merchant_count=2):
+    """An order with one item from each of merchant_count merchants."""
+    from auth.models.models import UserRole
+    from models.enums import AddressTypeEnum, OrderStatusEnum, PaymentMethodEnum, PaymentStatusEnum
+    from models.order import Order, OrderItem
+    from models.user_address import UserAddress
+
+    buyer = _mk_user("buyer@ex.com")
+    addr = UserAddress(
+        user_id=buyer.id, contact_name="Bob Buyer", contact_phone="+919811111111",
+        address_line1="42 Residency Rd", city="Pune", state_province="Maharashtra",
+        postal_code="411001", country_code="IN", address_type=AddressTypeEnum.SHIPPING,
+    )
+    db.session.add(addr)
+    db.session.flush()
+    order = Order(
+        user_id=buyer.id, order_status=OrderStatusEnum.PROCESSING,
+        subtotal_amount=Decimal("200.00"), discount_amount=Decimal("0.00"),
+        tax_amount=Decimal("36.00"), shipping_amount=Decimal("0.00"),
+        total_amount=Decimal("236.00"), currency="INR",
+        payment_method=PaymentMethodEnum.CREDIT_CARD, payment_status=PaymentStatusEnum.SUCCESSFUL,
+        shipping_address_id=addr.address_id, billing_address_id=addr.address_id,
+    )
+    db.session.add(order)
+    db.session.flush()
+    merchants = []
+    for i in range(merchant_count):
+        merchant = _mk_merchant(_mk_user(f"seller{i}@ex.com", UserRole.MERCHANT), f"41100{i + 2}")
+        merchants.append(merchant)
+        db.session.add(OrderItem(
+            order_id=order.order_id, product_id=None, merchant_id=merchant.id,
+            product_name_at_purchase=f"Widget {i}", sku_at_purchase=f"W-{i}", quantity=1,
+            final_base_price_for_gst_calc=Decimal("100.00"),
+            gst_rate_applied_at_purchase=Decimal("18.00"), gst_amount_per_unit=Decimal("18.00"),
+            unit_price_inclusive_gst=Decimal("118.00"), line_item_total_inclusive_gst=Decimal("118.00"),
+        ))
+    db.session.commit()
+    return order.order_id, addr.address_id, [m.id for m in merchants]
+
+
+class FakeShipRocket:
+    """Stands in for the ShipRocket calls the booking steps make."""
+
+    def __init__(self):
+        self.calls = []
+        self.failures = {}
+        self.orders = {}  # (channel order id, pickup location) -> ShipRocket order
+
+    def _call(self, name, *args):
+        self.calls.append((name,) + args)
+        failure = self.failures.get(name)
+        if failure:
+            if isinstance(failure, list):
+                error = failure.pop(0)
+                if not failure:
+                    self.failures.pop(name)
+            else:
+                error = failure
+            raise error
+
+    def count(self, name):
+        return sum(1 for call in self.calls if call[0] == name)
+
+    def install(self, monkeypatch):
+        from controllers.shiprocket_controller import ShipRocketController
+        fake = self
+        created = iter(range(1000, 2000))
+
+        def pickup(self, merchant_id):
+            fake._call("pickup_location", merchant_id)
+            return f"Merchant_{merchant_id}"
+
+        def serviceability(self, pickup_pincode, delivery_pincode, weight, cod=0, **kwargs):
+            fake._call("serviceability", pickup_pincode)
+            return {"data": {"available_courier_companies": [
+                {"courier_company_id": 7, "courier_name": "Slow", "rating": "3.0", "rate": 40},
+                {"courier_company_id": 9, "courier_name": "Fast", "rating": "4.5", "rate": 60},
+            ]}}
+
+        def create_order(self, order_data):
+            fake._call("create_order", order_data["pickup_location"])
+            n = next(created)
+            return {"status": 200, "data": {"order_id": n, "shipment_id": n + 5000}}
+
+        def find_order(self, channel_order_id, pickup_location=None):
+            fake._call("find_order", channel_order_id)
+            return fake.orders.get((channel_order_id, pickup_location))
+
+        def assign_awb(self, shipment_id, courier_id):
+            fake._call("assign_awb", shipment_id, courier_id)
+            return {"status": 200, "data": {"awb_code": f"AWB{shipment_id}", "courier_name": "Fast"}}
+
+        def generate_pickup(self, shipment_id):
+            fake._call("generate_pickup", shipment_id)
+            return {"status": 200}
+
+        monkeypatch.setattr(ShipRocketController, "get_or_create_merchant_pickup_location", pickup)
+        monkeypatch.setattr(ShipRocketController, "check_serviceability", serviceability)
+        monkeypatch.setattr(ShipRocketController, "create_order", create_order)
+        monkeypatch.setattr(ShipRocketController, "find_order", find_order)
+        monkeypatch.setattr(ShipRocketController, "assign_awb", assign_awb)
+        monkeypatch.setattr(ShipRocketController, "generate_pickup", generate_pickup)
+        return self
+
+
+@pytest.fixture
+def shiprocket(monkeypatch):
+    return FakeShipRocket().install(monkeypatch)
+
+
+def test_every_merchant_is_booked_with_its_own_pickup(app, shiprocket):
+    from controllers.shiprocket_controller import ShipRocketController
+    from models.enums import ShipmentStatusEnum
+    from models.shipment import Shipment
+
+    with app.app_context():
+        order_id, addr_id, merchant_ids = _mk_order(3)
+        result = ShipRocketController().create_shiprocket_orders_for_all_merchants(order_id, addr_id)
+
+        assert result["status"] == "completed" and result["success"]
+        assert result["successful_merchants"] == merchant_ids and result["failed_merchants"] == []
+        assert sorted(c[1] for c in shiprocket.calls if c[0] == "serviceability") == ["411002", "411003", "411004"]
+        shipments = Shipment.query.order_by(Shipment.merchant_id).all()
+        assert [s.merchant_id for s in shipments] == merchant_ids
+        assert all(s.shipment_status == ShipmentStatusEnum.LABEL_CREATED and s.courier_id == 9
+                   and s.awb_code.startswith("AWB") for s in shipments)
+        response = result["merchant_responses"][merchant_ids[0]]
+        assert response["awb_code"] == shipments[0].awb_code and response["courier_name"] == "Fast"
+
+
+def test_a_flaky_step_is_retried_in_place(app, shiprocket):
+    from controllers.shiprocket_controller import ShipRocketController
+    from services.shiprocket_client import ShipRocketError
+
+    shiprocket.failures["assign_awb"] = [ShipRocketError("ShipRocket API request failed: 502")]
+    with app.app_context():
+        order_id, addr_id, _ = _mk_order(1)
+        result = ShipRocketController().create_shiprocket_orders_for_all_merchants(order_id, addr_id)
+
+        assert result["failed_merchants"] == []
+        assert (shiprocket.count("create_order"), shiprocket.count("assign_awb")) == (1, 2)
+
+
+def test_a_failed_job_resumes_from_its_step_without_booking_twice(app, shiprocket):
+    from models.shipment_job import ShipmentJob
+    from services import shipment_jobs
+    from services.shiprocket_client import ShipRocketError
+
+    shiprocket.failures["generate_pickup"] = ShipRocketError("ShipRocket API request failed: 500")
+    with app.app_context():
+        order_id, addr_id, (merchant_id,) = _mk_order(1)
+        result = shipment_jobs.enqueue_order(order_id, addr_id)
+
+        assert result["failed_merchants"] == [merchant_id]
+        job = ShipmentJob.query.one()
+        assert job.status == "failed" and job.step == "generate_pickup"
+        assert job.progress["awb_code"] and "500" in job.last_error
+        assert shiprocket.count("generate_pickup") == 3
+
+        shiprocket.failures.clear()
+        job = shipment_jobs.retry_job(job.job_id)
+
+        assert job.status == "done" and job.step == "done"
+        assert (shiprocket.count("create_order"), shiprocket.count("assign_awb")) == (1, 1)
+        # Confirming the order again leaves a booked merchant alone.
+        shipment_jobs.enqueue_order(order_id, addr_id)
+        assert shiprocket.count("create_order") == 1
+
+
+def test_order_create_is_not_repeated_after_a_timeout(app, shiprocket):
+    from models.shipment_job import ShipmentJob
+    from services import shipment_jobs
+    from services.shiprocket_client import ShipRocketTimeout
+
+    shiprocket.failures["create_order"] = ShipRocketTimeout("ShipRocket API request timed out after 10 seconds")
+    with app.app_context():
+        order_id, addr_id, _ = _mk_order(1)
+        shipment_jobs.enqueue_order(order_id, addr_id)
+
+        job = ShipmentJob.query.one()
+        assert shiprocket.count("create_order") == 1
+        assert job.status == "failed" and job.step == "create_order"
+        assert "looks it up before creating it again" in job.last_error
+
+        # ShipRocket did create it: the retry adopts that order instead of a second one.
+        shiprocket.orders[(order_id, job.progress["pickup_location"])] = {"order_id": 1500, "shipment_id": 6500}
+        job = shipment_jobs.retry_job(job.job_id)
+        assert job.status == "done" and job.progress["shiprocket_order_id"] == 1500
+        assert shiprocket.count("create_order") == 1 and shiprocket.count("find_order") == 1
+
+
+def test_order_create_is_only_retried_when_nothing_was_sent(app, shiprocket):
+    from models.shipment_job import ShipmentJob
+    from services import shipment_jobs
+    from services.shiprocket_client import ShipRocketError, ShipRocketNotSent
+
+    with app.app_context():
+        order_id, addr_id, _ = _mk_order(2)
+        shiprocket.failures["create_order"] = [ShipRocketNotSent("connection refused"),
+                                               ShipRocketError("ShipRocket API request failed: 502 Bad Gateway")]
+        shipment_jobs.enqueue_order(order_id, addr_id)
+
+        statuses = sorted(job.status for job in ShipmentJob.query.all())
+        # One merchant: refused, then created. The other: a 502 after sending, not repeated.
+        assert statuses == ["done", "failed"] and shiprocket.count("create_order") == 3
+
+
+def test_confirmation_returns_processing_and_the_pool_gets_every_merchant(app, shiprocket, monkeypatch):
+    from flask_jwt_extended import create_access_token
+    from services import shipment_jobs
+
+    submitted = []
+
+    class Pool:
+        def submit(self, fn, app_, job_id):
+            submitted.append(job_id)
+
+    monkeypatch.setattr(shipment_jobs.runner, "pool", lambda: Pool())
+    app.config["SHIPMENT_JOBS_BACKGROUND"] = True
+    with app.app_context():
+        order_id, addr_id, merchant_ids = _mk_order(2)
+        headers = {"Authorization": f"Bearer {create_access_token(identity='1')}"}
+        client = app.test_client()
+
+        resp = client.post("/api/shiprocket/create-orders-for-all-merchants",
+                           json={"order_id": order_id, "delivery_address_id": addr_id}, headers=headers)
+
+        assert resp.status_code == 202, resp.get_data(as_text=True)[:300]
+        data = resp.get_json()["data"]
+        assert data["status"] == "processing" and data["processing_merchants"] == merchant_ids
+        assert len(submitted) == 2 and shiprocket.calls == []
+
+        seller = {"Authorization": f"Bearer {create_access_token(identity=str(_owner(merchant_ids[0])))}"}
+        status = client.get(f"/api/shiprocket/shipment-jobs?order_id={order_id}", headers=seller).get_json()["data"]
+        assert [r["status"] for r in status["merchant_responses"].values()] == ["processing"]
+        assert status["processing_merchants"] == merchant_ids[:1]
+
+
+def _owner(merchant_id):
+    from auth.models.models import MerchantProfile
+    return db.session.get(MerchantProfile, merchant_id).user_id
+
+
+def test_merchants_only_see_and_retry_their_own_jobs(app, shiprocket):
+    from flask_jwt_extended import create_access_token
+    from models.shipment_job import ShipmentJob
+    from services import shipment_jobs
+    from services.shiprocket_client import ShipRocketError
+
+    with app.app_context():
+        order_id, addr_id, (m1, m2) = _mk_order(2)
+        buyer, first, second = ({"Authorization": f"Bearer {create_access_token(identity=str(user_id))}"}
+                                for user_id in (1, _owner(m1), _owner(m2)))
+        shiprocket.failures["create_order"] = [ShipRocketError("ShipRocket API request failed: 500")]
+        shipment_jobs.enqueue_order(order_id, addr_id)
+        failed = ShipmentJob.query.filter_by(status="failed").one()
+        owner, other = (first, second) if failed.party_id == m1 else (second, first)
+        client = app.test_client()
+
+        url = f"/api/shiprocket/shipment-jobs?order_id={order_id}"
+        assert client.get(url, headers=buyer).status_code == 403
+        assert client.get(url + "&kind=shop", headers=owner).status_code == 403
+        assert client.get("/api/shiprocket/shipment-jobs?order_id=nope", headers=owner).status_code == 404
+        assert client.get(url, headers=owner).get_json()["data"]["failed_merchants"] == [failed.party_id]
+
+        retry = f"/api/shiprocket/shipment-jobs/{failed.job_id}/retry"
+        assert client.post(retry, headers=buyer).status_code == 403
+        assert client.post(retry, headers=other).status_code == 404
+        assert client.post(retry, headers=owner).status_code == 200
+
+
+def test_a_concurrent_enqueue_reuses_the_row_it_lost_to(app, shiprocket, monkeypatch):
+    from models.shipment_job import ShipmentJob
+    from services import shipment_jobs
+
+    with app.app_context():
+        order_id, addr_id, (m1,) = _mk_order(1)
+        db.session.add(ShipmentJob(order_id=order_id, party_id=m1, delivery_address_id=addr_id,
+                                   status="failed", step="create_order", progress={}))
+        db.session.commit()
+
+        # The lookup misses, as if the other request committed just after it.
+        real, missed = ShipmentJob.query, []
+
+        class Racing:
+            def filter_by(self, **kwargs):
+                if not missed:
+                    missed.append(kwargs)
+                    return type("Miss", (), {"first": lambda self: None})()
+                return real.filter_by(**kwargs)
+
+        monkeypatch.setattr(ShipmentJob, "query", Racing())
+        job = shipment_jobs._upsert(ShipmentJob.KIND_ORDER, order_id, m1, addr_id, None)
+        monkeypatch.undo()
+
+        assert missed and job.status == "processing" and job.step == "create_order"
+        db.session.commit()
+        assert ShipmentJob.query.count() == 1
+
+
+def test_only_stalled_jobs_are_swept(app, shiprocket):
+    from models.shipment_job import ShipmentJob
+    from services import shipment_jobs
+
+    with app.app_context():
+        order_id, addr_id, (m1, m2) = _mk_order(2)
+        old = datetime.utcnow() - timedelta(minutes=30)
+        db.session.add_all([
+            ShipmentJob(order_id=order_id, party_id=m1, delivery_address_id=addr_id,
+                        created_at=old, heartbeat_at=old, step="pickup_location"),
+            ShipmentJob(order_id=order_id, party_id=m2, delivery_address_id=addr_id,
+                        created_at=old, heartbeat_at=datetime.utcnow(), step="pickup_location"),
+        ])
+        db.session.commit()
+
+        assert shipment_jobs.sweep() == 1
+        assert shipment_jobs.order_summary(order_id)["successful_merchants"] == [m1]
@@ -0,0 +1,155 @@
+"""The shared ShipRocket client: one login per token lifetime, across controllers
+and workers, and per-endpoint latency metrics."""
+import pytest
+
+from app import create_app
+from common.metrics import registry
+
+
+@pytest.fixture
+def app():
+    application = create_app("testing")
+    application.config.update(SHIPROCKET_EMAIL="ops@example.com", SHIPROCKET_PASSWORD="pw")
+    from services.shiprocket_client import reset_shiprocket_client
+    reset_shiprocket_client()
+    registry.reset()
+    with application.app_context():
+        yield application
+    reset_shiprocket_client()
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value.encode() if isinstance(value, str) else value
+        return True
+
+    def setex(self, key, ttl, value):
+        self.data[key] = value.encode()
+
+    def ttl(self, key):
+        return 3600 if key in self.data else -2
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+class FakeResponse:
+    def __init__(self, status, body=None):
+        self.status_code = status
+        self.reason = "OK" if status < 400 else "Error"
+        self._body = body or {}
+        self.text = str(self._body)
+
+    def json(self):
+        return self._body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            import requests
+            raise requests.exceptions.HTTPError(f"{self.status_code}")
+
+
+class FakeShipRocket:
+    """Issues token-1, token-2, ... and accepts only the latest."""
+
+    def __init__(self, client):
+        self.logins = 0
+        self.calls = []
+        client.session.post = self.login
+        client.session.request = self.request
+
+    def login(self, url, json=None, timeout=None):
+        self.logins += 1
+        return FakeResponse(200, {"token": f"token-{self.logins}"})
+
+    def request(self, method, url, headers=None, params=None, json=None, timeout=None):
+        self.calls.append((method, url, headers["Authorization"]))
+        if headers["Authorization"] != f"Bearer token-{self.logins}":
+            return FakeResponse(401, {"message": "Token expired"})
+        if url.endswith("/fail"):
+            return FakeResponse(500, {"message": "boom"})
+        return FakeResponse(200, {"ok": True})
+
+
+def test_controllers_share_one_login(app):
+    from controllers.shiprocket_controller import ShipRocketController
+
+    fake = FakeShipRocket(ShipRocketController().client)
+    for _ in range(5):
+        assert ShipRocketController()._make_request("GET", "courier/serviceability/") == {"ok": True}
+
+    assert fake.logins == 1
+    assert len(fake.calls) == 5
+
+
+def test_workers_share_the_token_through_redis(app):
+    from services.shiprocket_client import ShipRocketClient
+
+    redis = FakeRedis()
+    first = ShipRocketClient("ops@example.com", "pw", redis_client=redis)
+    second = ShipRocketClient("ops@example.com", "pw", redis_client=redis)
+    fake = FakeShipRocket(first)
+    second.session.post, second.session.request = fake.login, fake.request
+
+    first.request("GET", "orders")
+    second.request("GET", "orders")
+
+    assert fake.logins == 1, "second worker logged in despite the shared token"
+
+
+def test_a_rejected_token_is_refreshed_once(app):
+    from services.shiprocket_client import ShipRocketClient
+
+    client = ShipRocketClient("ops@example.com", "pw", redis_client=FakeRedis())
+    fake = FakeShipRocket(client)
+    client.request("GET", "orders")
+    fake.logins += 1          # ShipRocket revoked token-1 behind our back
+
+    assert client.request("GET", "orders") == {"ok": True}
+    assert fake.logins == 3
+    assert [c[2] for c in fake.calls] == ["Bearer token-1", "Bearer token-1", "Bearer token-3"]
+
+
+def test_errors_keep_the_controller_messages_and_are_timed_per_endpoint(app):
+    from services.shiprocket_client import ShipRocketClient, ShipRocketError
+
+    client = ShipRocketClient("ops@example.com", "pw", redis_client=FakeRedis())
+    FakeShipRocket(client)
+    client.request("GET", "courier/track/awb/1234567890")
+    with pytest.raises(ShipRocketError, match="ShipRocket API request failed: 500"):
+        client.request("POST", "fail", data={})
+
+    labels = {dict(labels).get("endpoint"): dict(labels)["status"]
+              for name, labels, _ in registry.snapshot()["histograms"]
+              if name == "shiprocket_request_duration_seconds"}
+    assert labels == {"auth/login": "2xx", "courier/track/awb/:id": "2xx", "fail": "5xx"}
+
+
+def test_only_failures_before_sending_are_marked_safe_to_repeat(app):
+    import requests
+    from urllib3.exceptions import MaxRetryError, NewConnectionError
+    from services.shiprocket_client import ShipRocketClient, ShipRocketNotSent, ShipRocketTimeout
+
+    client = ShipRocketClient("ops@example.com", "pw", redis_client=FakeRedis())
+    FakeShipRocket(client)
+    refused = NewConnectionError(None, "Connection refused")
+    errors = iter([requests.exceptions.ConnectionError(MaxRetryError(None, "/", refused)),
+                   requests.exceptions.ConnectTimeout("connect timed out"),
+                   requests.exceptions.ReadTimeout("read timed out")])
+
+    def request(*args, **kwargs):
+        raise next(errors)
+
+    client.session.request = request
+    for expected in (ShipRocketNotSent, ShipRocketNotSent, ShipRocketTimeout):
+        with pytest.raises(expected) as raised:
+            client.request("POST", "orders/create/adhoc", data={})
+        assert type(raised.value) is expected
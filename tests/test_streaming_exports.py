@@ -0,0 +1,221 @@
+"""Streaming exports: CSV goes out in chunks, XLSX is a write-only workbook on disk,
+and the inventory and shop sales exports carry every row, not a first page."""
+import csv
+import io
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+from openpyxl import load_workbook
+
+from app import create_app
+from common.database import db
+
+
+@pytest.fixture
+def app():
+    application = create_app("testing")
+    with application.app_context():
+        db.create_all()
+        yield application
+        db.session.remove()
+        db.drop_all()
+
+
+def _mk_merchant_with_products(count):
+    from auth.models.models import MerchantProfile, User, UserRole
+    from models.brand import Brand
+    from models.category import Category
+    from models.product import Product
+    from models.product_stock import ProductStock
+
+    owner = User(email="owner@ex.com", first_name="A", last_name="B",
+                 role=UserRole.MERCHANT, is_email_verified=True)
+    owner.set_password("StrongPass123")
+    db.session.add(owner); db.session.flush()
+    m = MerchantProfile(user_id=owner.id, business_name="Acme", business_email="b@ex.com",
+                        business_phone="+919876543210", business_address="1 Rd",
+                        country_code="IN", state_province="MH", city="Pune", postal_code="411001")
+    c = Category(name="Cat", slug="cat")
+    b = Brand(name="Br", slug="br")
+    db.session.add_all([m, c, b]); db.session.flush()
+    for i in range(count):
+        p = Product(merchant_id=m.id, category_id=c.category_id, brand_id=b.brand_id, sku=f"W-{i}",
+                    product_name=f"Widget {i}", product_description="A widget",
+                    cost_price=Decimal("50.00"), selling_price=Decimal("100.00"),
+                    active_flag=True, approval_status="approved")
+        db.session.add(p); db.session.flush()
+        db.session.add(ProductStock(product_id=p.product_id, stock_qty=i % 3 * 10))
+    db.session.commit()
+    return owner.id
+
+
+def _read_csv(response):
+    return list(csv.reader(io.StringIO(b"".join(response.response).decode())))
+
+
+def test_csv_stream_yields_bounded_chunks_in_section_order(app):
+    from common.exports import CSV_CHUNK_BYTES, Table, csv_stream
+
+    rows = ([i, "x" * 50] for i in range(5000))
+    chunks = list(csv_stream([Table("Rows", ["n", "pad"], rows), Table("Totals", ["n"], [[5000]])],
+                             preamble=("Report",)))
+
+    assert len(chunks) > 3 and all(len(c) < CSV_CHUNK_BYTES + 200 for c in chunks)
+    lines = list(csv.reader(io.StringIO(b"".join(chunks).decode())))
+    assert lines[:3] == [["Report"], ["Rows"], ["n", "pad"]]
+    assert lines[-1] == ["5000"] and lines[-3] == ["Totals"]
+
+
+def test_xlsx_file_writes_every_table_as_a_sheet(app):
+    from common.exports import Table, xlsx_file
+
+    out = xlsx_file([Table("Data", ["a", "b"], ([i, i * 2] for i in range(300))),
+                     Table("Summary", ["total"], [[300]])], header_fill="FF5733", column_width=20)
+    book = load_workbook(out)
+
+    assert book.sheetnames == ["Data", "Summary"]
+    assert book["Data"].max_row == 301 and book["Data"]["B301"].value == 598
+    assert book["Data"]["A1"].font.bold and book["Summary"]["A2"].value == 300
+
+
+def test_inventory_export_includes_products_past_the_first_page(app):
+    from controllers.merchant.inventory_export_controller import MerchantInventoryExportController
+
+    user_id = _mk_merchant_with_products(130)
+    app.config["EXPORT_BATCH_SIZE"] = 25
+    with app.test_request_context():
+        response = MerchantInventoryExportController.export_inventory_report(user_id, "csv")
+        lines = _read_csv(response)
+
+        assert response.mimetype == "text/csv"
+        header = lines.index(MerchantInventoryExportController.PRODUCT_COLUMNS)
+        assert len(lines) - header - 1 == 130
+
+        response = MerchantInventoryExportController.export_inventory_report(user_id, "excel")
+        book = load_workbook(io.BytesIO(b"".join(response.response)))
+        assert book["Product Inventory"].max_row == 131
+        statuses = {row[0]: row[3] for row in book["Stock Status Summary"].iter_rows(min_row=2, values_only=True)}
+        assert statuses == {"In Stock": 86, "Out of Stock": 44}
+
+        # The PDF stays a capped preview.
+        response = MerchantInventoryExportController.export_inventory_report(user_id, "pdf")
+        assert response.mimetype == "application/pdf" and b"".join(response.response).startswith(b"%PDF")
+
+
+def test_shop_sales_export_streams_rows_and_totals_in_sql(app):
+    from controllers.superadmin.shop_analytics_controller import ShopAnalyticsController
+    from models.shop.shop import Shop
+    from models.shop.shop_order import ShopOrder, ShopOrderItem
+
+    shop = Shop(name="Shop", slug="shop")
+    db.session.add(shop); db.session.flush()
+    when = datetime.utcnow() - timedelta(days=1)
+    for i in range(3):
+        db.session.add(ShopOrder(order_id=f"SO-{i}", shop_id=shop.shop_id, order_date=when,
+                                 subtotal_amount=Decimal("200"), total_amount=Decimal("200")))
+        for j in range(2):
+            db.session.add(ShopOrderItem(
+                order_id=f"SO-{i}", shop_id=shop.shop_id, product_name_at_purchase=f"P{j}",
+                quantity=j + 1, final_base_price_for_gst_calc=Decimal("100"),
+                unit_price_inclusive_gst=Decimal("100"), line_item_total_inclusive_gst=Decimal("100")))
+    db.session.commit()
+
+    with app.test_request_context():
+        data, mime, filename = ShopAnalyticsController.export(shop.shop_id, None, None, "csv")
+        lines = list(csv.reader(io.StringIO(b"".join(data).decode())))
+        assert mime == "text/csv" and filename.endswith("last-6-months.csv")
+        assert lines[0] == ["Date", "Order ID", "Product", "Quantity", "Amount"] and len(lines) == 7
+
+        data, mime, _ = ShopAnalyticsController.export(shop.shop_id, None, None, "excel")
+        summary = list(load_workbook(data)["Summary"].iter_rows(min_row=2, values_only=True))
+        assert summary == [(3, 600.0, 9, 200.0)]
+
+
+def test_csv_stream_ends_a_failed_export_with_a_trailer_and_raises(app):
+    from common.exports import EXPORT_INCOMPLETE, Table, csv_stream
+
+    def rows():
+        yield [1]
+        yield [2]
+        raise RuntimeError("connection lost")
+
+    chunks = []
+    with pytest.raises(RuntimeError):
+        for chunk in csv_stream([Table("Rows", ["n"], rows())]):
+            chunks.append(chunk)
+
+    lines = b"".join(chunks).decode().splitlines()
+    assert lines[:4] == ["Rows", "n", "1", "2"]
+    assert lines[-1].startswith(EXPORT_INCOMPLETE)
+
+
+def _order(user_id, when, items=()):
+    """items: [(product, quantity)] at the product's selling price."""
+    from models.enums import OrderStatusEnum, PaymentMethodEnum, PaymentStatusEnum
+    from models.order import Order, OrderItem
+
+    order = Order(
+        user_id=user_id, order_status=OrderStatusEnum.DELIVERED, order_date=when,
+        subtotal_amount=Decimal("0"), discount_amount=Decimal("0"), tax_amount=Decimal("0"),
+        shipping_amount=Decimal("0"), total_amount=Decimal("0"), currency="INR",
+        payment_method=PaymentMethodEnum.CREDIT_CARD, payment_status=PaymentStatusEnum.SUCCESSFUL,
+    )
+    for product, quantity in items:
+        order.items.append(OrderItem(
+            product_id=product.product_id, merchant_id=product.merchant_id,
+            product_name_at_purchase=product.product_name, sku_at_purchase=product.sku,
+            quantity=quantity, final_base_price_for_gst_calc=product.selling_price,
+            gst_rate_applied_at_purchase=Decimal("0"), gst_amount_per_unit=Decimal("0"),
+            unit_price_inclusive_gst=product.selling_price,
+            line_item_total_inclusive_gst=product.selling_price * quantity))
+    db.session.add(order)
+    db.session.commit()
+
+
+def test_sales_report_streams_the_detailed_sales_from_the_query(app):
+    from controllers.merchant.report_export_controller import MerchantReportExportController
+    from models.product import Product
+
+    user_id = _mk_merchant_with_products(40)
+    for product in Product.query.order_by(Product.product_id).all():
+        _order(user_id, datetime.utcnow(), [(product, 2)])
+    app.config["EXPORT_BATCH_SIZE"] = 7
+
+    with app.test_request_context():
+        data, mime, _ = MerchantReportExportController.render_sales_report(user_id, "csv")
+        lines = list(csv.reader(io.StringIO(b"".join(data).decode())))
+        header = lines.index(["month", "product", "category", "price", "quantity", "revenue"])
+        assert mime == "text/csv" and lines[header - 1] == ["Detailed Sales Data"]
+        assert len(lines) - header - 1 == 40 and lines[-1][4:] == ["2", "200.0"]
+
+        data, _, _ = MerchantReportExportController.render_sales_report(user_id, "excel")
+        assert load_workbook(data)["Detailed Sales"].max_row == 41
+
+
+def test_traffic_export_streams_periods_with_their_conversions(app):
+    from controllers.superadmin.performance_analytics import PerformanceAnalyticsController
+    from models.visit_tracking import VisitTracking
+
+    user_id = _mk_merchant_with_products(0)
+    yesterday = datetime.utcnow().replace(hour=12) - timedelta(days=1)
+    earlier = yesterday - timedelta(days=2)
+    for when, ip, seconds in ((yesterday, "1.1.1.1", 5), (yesterday, "2.2.2.2", 60), (earlier, "3.3.3.3", 60)):
+        db.session.add(VisitTracking(session_id=f"s-{ip}-{when:%d}", ip_address=ip, visit_time=when,
+                                     landing_page="/", exited_page="/p", time_spent=seconds))
+    db.session.commit()
+    _order(user_id, yesterday)
+
+    with app.test_request_context():
+        data, mime, filename = PerformanceAnalyticsController.export_traffic_analytics_report("daily", "csv", days=30)
+        lines = list(csv.reader(io.StringIO(b"".join(data).decode())))
+        assert mime == "text/csv" and filename.endswith(".csv")
+        assert lines[0] == ["Date", "Total Visits", "Unique Visitors", "Bounced Visits",
+                            "Conversions", "Bounce Rate (%)", "Conversion Rate (%)"]
+        assert lines[1] == [f"{earlier:%A} ({earlier:%Y-%m-%d})", "1", "1", "0", "0", "0.0", "0.0"]
+        assert lines[2] == [f"{yesterday:%A} ({yesterday:%Y-%m-%d})", "2", "2", "1", "1", "50.0", "50.0"]
+
+        data, _, _ = PerformanceAnalyticsController.export_traffic_analytics_report("monthly", "excel")
+        book = load_workbook(data)
+        assert book.sheetnames == ["Monthly Data", "Summary"]
+        assert list(book["Summary"].iter_rows(min_row=2, values_only=True)) == [(3, 3, 1, 1, 33.33, 33.33)]
@@ -0,0 +1,123 @@
+"""AWS Translate: LRU, then one Redis MGET, then AWS for misses only, with short
+strings packed into shared requests that run side by side."""
+import threading
+
+import pytest
+
+from app import create_app
+
+
+@pytest.fixture
+def app(monkeypatch):
+    from services import translate_service
+    monkeypatch.setattr(translate_service, "_lru", None)
+    application = create_app("testing")
+    with application.app_context():
+        yield application
+
+
+class FakeTranslate:
+    """boto3 translate client: upper-cases each line, or merges them when told to."""
+
+    def __init__(self, merge_lines=False):
+        self.merge_lines = merge_lines
+        self.texts = []
+        self._lock = threading.Lock()
+
+    def translate_text(self, Text, SourceLanguageCode, TargetLanguageCode, Settings, **kwargs):
+        with self._lock:
+            self.texts.append(Text)
+        if self.merge_lines:
+            Text = Text.replace("\n", " ")
+        return {"TranslatedText": Text.upper()}
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+        self.commands = []
+
+    def mget(self, keys):
+        self.commands.append("MGET")
+        return [self.data.get(key) for key in keys]
+
+    def pipeline(self, transaction=True):
+        redis = self
+
+        class Pipeline:
+            def __init__(self):
+                self.writes = []
+
+            def setex(self, key, ttl, value):
+                self.writes.append((key, value))
+
+            def execute(self):
+                redis.commands.append("EXEC")
+                for key, value in self.writes:
+                    redis.data[key] = value.encode()
+        return Pipeline()
+
+
+def test_a_batch_costs_one_cache_read_one_write_and_packed_requests(app):
+    from services.translate_service import AmazonTranslateService
+
+    aws, redis = FakeTranslate(), FakeRedis()
+    items = [(str(i), f"label {i % 20}") for i in range(40)] + [("empty", "")]
+    result = AmazonTranslateService(client=aws, redis_client=redis).translate_batch(items, "hi")
+
+    assert result["3"] == "LABEL 3" and result["23"] == "LABEL 3" and result["empty"] == ""
+    # Twenty distinct short strings fit in one request.
+    assert len(aws.texts) == 1 and redis.commands == ["MGET", "EXEC"] and len(redis.data) == 20
+
+
+def test_each_layer_answers_before_the_next(app, monkeypatch):
+    from services import translate_service
+    from services.translate_service import AmazonTranslateService
+
+    aws, redis = FakeTranslate(), FakeRedis()
+    AmazonTranslateService(client=aws, redis_client=redis).translate_batch([("a", "cart")], "hi")
+
+    # Same process: the LRU answers without Redis or AWS.
+    redis.commands.clear()
+    assert AmazonTranslateService(client=aws, redis_client=redis).translate_text("cart", "hi") == "CART"
+    assert redis.commands == [] and len(aws.texts) == 1
+
+    # Another process: Redis answers and warms its LRU.
+    monkeypatch.setattr(translate_service, "_lru", None)
+    assert AmazonTranslateService(client=aws, redis_client=redis).translate_text("cart", "hi") == "CART"
+    assert redis.commands == ["MGET"] and len(aws.texts) == 1
+
+
+def test_without_redis_the_lru_still_caches(app):
+    from services.translate_service import AmazonTranslateService
+
+    class DownRedis:
+        def mget(self, keys):
+            raise ConnectionError("redis went away")
+
+        def pipeline(self, transaction=True):
+            raise ConnectionError("redis went away")
+
+    aws = FakeTranslate()
+    service = AmazonTranslateService(client=aws, redis_client=DownRedis())
+    assert service.translate_text("Buy now", "hi") == "BUY NOW"
+    service.redis = None
+    assert service.translate_batch([("x", "Buy now")], "hi") == {"x": "BUY NOW"}
+    assert aws.texts == ["Buy now"]
+
+
+def test_long_and_unsplittable_texts_are_sent_alone(app):
+    from services.translate_service import AmazonTranslateService
+
+    app.config["TRANSLATE_PACK_MAX_BYTES"] = 20
+    aws = FakeTranslate(merge_lines=True)
+    service = AmazonTranslateService(client=aws, redis_client=FakeRedis())
+    long_text, multiline = "x" * 300, "line one\nline two"
+    result = service.translate_batch([("1", "red"), ("2", "blue"), ("3", long_text), ("4", multiline),
+                                      ("5", "a much longer label")], "hi")
+
+    assert result == {"1": "RED", "2": "BLUE", "3": long_text.upper(),
+                      "4": "LINE ONE LINE TWO", "5": "A MUCH LONGER LABEL"}
+    # red+blue were packed, came back merged, and were retried one by one.
+    assert sorted(aws.texts) == sorted(["red\nblue", "red", "blue", long_text, multiline,
+                                        "a much longer label"])